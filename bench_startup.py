@@ -0,0 +1,71 @@
+"""
+⏱ سنجشِ هزینه‌ی بالا آمدنِ mafia_bot — قبل/بعد از هر تغییری که روی زمانِ شروع اثر دارد.
+
+اجرا:
+    python bench_startup.py [تعدادِ تکرار]
+
+هر سنجش در یک پروسه‌ی تازه، روی کپیِ فایل‌ها در یک پوشه‌ی موقت (نه state واقعی، نه گیست):
+  compile      کامپایلِ کلِ فایل — همان چیزی که «python mafia_bot.py» هر بار می‌پردازد
+  import/cold  import بدونِ بایت‌کدِ کش‌شده (اولین اجرا بعد از دیپلوی بدونِ compileall)
+  import/warm  import با __pycache__ آماده (start.py بعد از build)
+  rss          بیشینه‌ی حافظه‌ی پروسه بعد از import
+"""
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_PROBE = r"""
+import json, resource, sys, time
+sys.path.insert(0, ".")
+t0 = time.perf_counter()
+if {compile_only!r}:
+    with open({src!r}, encoding="utf-8-sig") as f:
+        compile(f.read(), "mafia_bot.py", "exec")
+else:
+    import mafia_bot
+dt = time.perf_counter() - t0
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print("@@" + json.dumps({{"sec": dt, "rss_kb": rss}}))
+"""
+
+
+def _probe(compile_only: bool, workdir: str) -> dict:
+    code = _PROBE.format(compile_only=compile_only, src="mafia_bot.py")
+    env = {**os.environ, "GH_TOKEN": "", "GIST_ID": ""}   # گیست خاموش — فقط هزینه‌ی خودِ کد
+    env.pop("PYTHONDONTWRITEBYTECODE", None)               # کش‌شدنِ بایت‌کد خودِ موضوعِ سنجش است
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    line = [ln for ln in out.splitlines() if ln.startswith("@@")][-1]
+    return json.loads(line[2:])
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rows = {"compile": [], "import/cold": [], "import/warm": []}
+    rss = []
+    for _ in range(n):
+        with tempfile.TemporaryDirectory() as work:
+            for fn in ("mafia_bot.py", "voice_god.py", "voice_worker.py"):
+                shutil.copy(os.path.join(HERE, fn), work)
+            shutil.copytree(os.path.join(HERE, "engines"), os.path.join(work, "engines"),
+                            ignore=shutil.ignore_patterns("__pycache__"))
+            rows["compile"].append(_probe(True, work)["sec"])
+            cold = _probe(False, work)          # بایت‌کدِ mafia_bot اینجا نوشته می‌شود
+            warm = _probe(False, work)
+            rows["import/cold"].append(cold["sec"])
+            rows["import/warm"].append(warm["sec"])
+            rss.append(warm["rss_kb"])
+    for name, vals in rows.items():
+        print(f"{name:<12} median {statistics.median(vals) * 1000:7.0f} ms"
+              f"   min {min(vals) * 1000:7.0f} ms")
+    print(f"{'rss':<12} median {statistics.median(rss) / 1024:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+🗜 تبدیلِ جمله‌های صوتی از PCM خام (.raw) به Ogg/Opus (.opus) — یک‌بار، روی کامپیوترِ خودت.
+
+اجرا:
+    pip install imageio-ffmpeg
+    python convert_voice.py            # همه‌ی voice/*/*.raw → .opus و حذفِ .raw
+    python convert_voice.py --keep     # .raw را نگه دار (برای مقایسه)
+    python convert_voice.py voice/farid
+
+هر فایل بعد از تبدیل یک‌بار باز می‌شود تا مطمئن شویم سالم است و طولش با اصل می‌خواند؛
+اگر نخواند، .raw دست نمی‌خورد. کارگرِ صوتی هر دو قالب را می‌خواند، پس تبدیلِ نیمه‌کاره
+چیزی را خراب نمی‌کند. بعد از تبدیل، نتیجه را گوش کن و بعد commit کن.
+"""
+import os
+import subprocess
+import sys
+
+import voice_god as VG
+
+MAX_DRIFT_SEC = 0.1     # اختلافِ مجازِ طولِ بازشده با اصل (padding/pre-skipِ Opus)
+
+
+def _encode(ff: str, src: str, dst: str) -> bool:
+    r = subprocess.run([ff, "-hide_banner", "-loglevel", "error", "-y",
+                        "-f", "s16le", "-ar", "48000", "-ac", "1", "-i", src,
+                        *VG.OPUS_ARGS, "-f", "ogg", dst],
+                       capture_output=True)
+    if r.returncode != 0:
+        print(f"⛔ {src}: {(r.stderr or b'')[:200].decode('utf-8', 'ignore')}")
+        return False
+    return True
+
+
+def convert(folder: str, ff: str, keep: bool) -> tuple[int, int, int]:
+    n = before = after = 0
+    for fn in sorted(os.listdir(folder)):
+        if not fn.endswith(".raw"):
+            continue
+        src = os.path.join(folder, fn)
+        dst = src[:-4] + ".opus"
+        if not _encode(ff, src, dst):
+            continue
+        pcm = VG.decode_pcm(dst)
+        drift = abs(len(pcm or b"") - os.path.getsize(src)) / VG.PCM_BYTES_PER_SEC
+        if not pcm or drift > MAX_DRIFT_SEC:
+            print(f"⛔ {dst}: بازکردن نشد یا طول {drift:.2f}s فرق دارد — .raw می‌ماند")
+            os.remove(dst)
+            continue
+        n += 1
+        before += os.path.getsize(src)
+        after += os.path.getsize(dst)
+        if not keep:
+            os.remove(src)
+    return n, before, after
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    keep = "--keep" in sys.argv
+    ff = VG.ffmpeg_exe()
+    if not ff:
+        print("⛔ اول این را بزن:  pip install imageio-ffmpeg")
+        sys.exit(1)
+    folders = args or [os.path.join(VG.VOICE_DIR, d) for d in sorted(os.listdir(VG.VOICE_DIR))
+                       if os.path.isdir(os.path.join(VG.VOICE_DIR, d))]
+    for folder in folders:
+        n, before, after = convert(folder, ff, keep)
+        if n:
+            print(f"✅ {folder}: {n} فایل — {before / 1024:.0f}KB → {after / 1024:.0f}KB")
+        else:
+            print(f"— {folder}: فایلِ .raw ندارد")
+
+
+if __name__ == "__main__":
+    main()
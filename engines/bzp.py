@@ -0,0 +1,785 @@
+# 🧩 بدنه‌ی موتورِ سناریو «بازپرس» و «کاوربازپرس»
+# این فایل import نمی‌شود: mafia_bot._engine_load آن را (با اولین صدا زدنِ یکی از
+# توابعش) داخلِ فضای نامِ mafia_bot اجرا می‌کند؛ ثابت‌ها، _R_*ها و کمک‌تابع‌های
+# مشترک از همان‌جا دیده می‌شوند. ثبتِ callbackها و جانشین‌ها در mafia_bot است.
+from __future__ import annotations
+
+
+# ═════════════════════════════════════════════════════════════
+#  🕵️ کاوربازپرس — دقیقاً همان بازپرس (اسمش «بازپرس» را دارد، پس
+#  همان موتورِ شب را می‌گیرد)، فقط با یک نقشِ «مجهول» و یک دعوت‌نامه:
+#  در معارفه ناتو یک نفر را به تیم می‌آورد؛ او گادفادر می‌شود و
+#  نقشِ شهروندی‌اش به مجهول می‌رسد. اگر نپذیرد، خودِ مجهول گادفادر است.
+# ═════════════════════════════════════════════════════════════
+def _cvb_find_game(uid):
+    """بازیِ کاوربازپرسِ این کاربر.
+    ⚠️ عمداً به night_active/maarefe_active وابسته نیست — ممکن است گاد «روز» را
+       زده باشد و دعوت‌شده تازه بعدش دکمه را بزند؛ نباید گم شود."""
+    for cid, game, _seat in store.index.player_games(uid):
+        if game.phase in ("idle", "ended"):
+            continue
+        if _is_cover_scenario(game):
+            return game, cid
+    return None, None
+
+
+def _cvb_pick_targets(g, nato):
+    """همهٔ بازیکن‌ها به‌جز خودِ ناتو و شیاد."""
+    shiad = _find_seat_by_role(g, _R_SHIAD, alive_only=False)
+    return [s for s in sorted(g.seats) if s != nato and s != shiad]
+
+
+async def _cvb_start(ctx, chat_id, g):
+    """🕵️ معارفهٔ کاوربازپرس: ناتو انتخاب می‌کند چه کسی به تیم اضافه شود."""
+    nato = _find_seat_by_role(g, _R_NATO, alive_only=False)
+    if nato is None:
+        await _night_report(ctx, g, "🕵️ ناتو در بازی نیست — دعوت‌نامهٔ کاوربازپرس انجام نشد.")
+        return
+    g.cvb_asking = True
+    g.cvb_invite_seat = None
+    store.save(chat_id)
+    nuid = g.seats[nato][0]
+    m = await _safe_pm(ctx, nuid, "🕵️ کدام شماره را دوست داری به تیمت اضافه کنی؟",
+                       _kb_night_seats(_cvb_pick_targets(g, nato), g, "cvb_pick_",
+                                       selected=g.night_sel.get(nuid),
+                                       confirm_cb="cvb_pick_confirm"))
+    if m:
+        g.night_pm_msgs[nuid] = m.message_id
+    else:
+        await _night_report(ctx, g, "⚠️ پیویِ ناتو بسته است — دعوت‌نامه فرستاده نشد؛ "
+                                    "با «اکتِ دستی» می‌توانی جای او انتخاب کنی.")
+    store.save(chat_id)
+
+
+async def _cvb_make_godfather(ctx, g, seat):
+    """😈 این صندلی گادفادرِ تیم می‌شود: نقش و ساید عوض، لینکِ اتاق، اعلام در اتاق."""
+    old = (g.assigned_roles or {}).get(seat, "—")
+    if not getattr(g, "cvb_orig_roles", None):
+        g.cvb_orig_roles = {}
+    g.cvb_orig_roles.setdefault(seat, old)
+    g.assigned_roles[seat] = "گادفادر"
+    if getattr(g, "seat_sides", None) is not None:
+        g.seat_sides[seat] = "مافیا"
+    g.cvb_gf_seat = seat
+    g.cvb_done = True
+    g.cvb_asking = False
+    g.cvb_invite_seat = None
+    store.save(_game_chat_id(g))
+    uid = g.seats[seat][0]
+    mates = [f"{m}. {g.seats[m][1]} — {g.assigned_roles.get(m, '—')}"
+             for m in sorted(_mafia_seats(g)) if m != seat]
+    try:
+        await ctx.bot.send_message(
+            uid, "😈 نقش شما: <b>گادفادر</b>\n\n😈 یاران مافیای شما:\n"
+                 + ("\n".join(mates) if mates else "—"), parse_mode="HTML")
+    except Exception:
+        pass
+    await _room_send_link(ctx, g, uid)
+    await _room_note(ctx, g, f"😈 <b>{_room_who(g, seat)}</b> به تیم اضافه شد — گادفادر.")
+    await _night_report(ctx, g, f"😈 گادفادرِ تیم: <b>{_room_who(g, seat)}</b> "
+                                f"(نقشِ قبلی: {escape(str(old), quote=False)})")
+
+
+async def _cvb_accept(ctx, g, seat):
+    """✅ دعوت پذیرفته شد: نقشِ شهروندیِ این نفر به مجهول می‌رسد و خودش گادفادر می‌شود."""
+    old = (g.assigned_roles or {}).get(seat, "—")
+    mj = _find_seat_by_role(g, _R_MAJHOOL, alive_only=False)
+    if mj is not None:
+        if not getattr(g, "cvb_orig_roles", None):
+            g.cvb_orig_roles = {}
+        g.cvb_orig_roles.setdefault(mj, (g.assigned_roles or {}).get(mj, "مجهول"))
+        g.assigned_roles[mj] = old
+        if getattr(g, "seat_sides", None) is not None:
+            g.seat_sides[mj] = "شهر"
+        store.save(_game_chat_id(g))
+        try:
+            await ctx.bot.send_message(g.seats[mj][0],
+                                       f"🎭 نقش شما: <b>{escape(str(old), quote=False)}</b>",
+                                       parse_mode="HTML")
+        except Exception:
+            pass
+        await _night_report(ctx, g, f"🎭 مجهول ({_room_who(g, mj)}) نقشِ "
+                                    f"<b>{escape(str(old), quote=False)}</b> را گرفت.")
+    else:
+        await _night_report(ctx, g, "⚠️ مجهولی در بازی نیست — نقشِ آزادشده به کسی نرسید.")
+    await _cvb_make_godfather(ctx, g, seat)
+
+
+# 🔀 مسیر در mafia_bot: callback_route('cvb_', after=_after_night_act)
+async def handle_cover_callback(update, ctx):
+    """🕵️ دعوت‌نامهٔ کاوربازپرس — انتخابِ ناتو و جوابِ دعوت‌شده."""
+    q = update.callback_query
+    data = q.data
+    uid = _q_uid(q)   # 🎛 اکتِ دستیِ گاد هم پشتیبانی می‌شود
+    g, chat_id = _cvb_find_game(uid)
+    if g is None:
+        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
+        return
+    await safe_q_answer(q)
+    mid = q.message.message_id if q.message else None
+
+    # ── انتخابِ ناتو ──
+    if data == "cvb_pick_confirm":
+        if getattr(g, "cvb_done", False) or not getattr(g, "cvb_asking", False):
+            return
+        if _seat_of_uid(g, uid) != _find_seat_by_role(g, _R_NATO, alive_only=False):
+            return
+        s = g.night_sel.get(uid)
+        if not s or s not in g.seats:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.cvb_asking = False
+        g.cvb_invite_seat = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        tname = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"🕵️ {s}. {tname} را انتخاب کردی.")
+        await _night_report(ctx, g, f"🕵️ ناتو → دعوت به تیم: <b>{s}. {escape(tname, quote=False)}</b>")
+        # 🎭 اگر خودِ مجهول انتخاب شود، دعوت‌نامه‌ای در کار نیست — مستقیم گادفادر می‌شود
+        if _seat_role_norm(g, s) == _R_MAJHOOL:
+            await _cvb_make_godfather(ctx, g, s)
+            return
+        kb = InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ بله", callback_data="cvb_ans_yes")],
+            [InlineKeyboardButton("🚫 خیر", callback_data="cvb_ans_no")],
+        ])
+        m = await _safe_pm(ctx, g.seats[s][0],
+                           "😈 شما دعوت به تیمِ مافیا شدید — آیا قبول می‌کنید؟", kb)
+        if m:
+            g.night_pm_msgs[g.seats[s][0]] = m.message_id
+        else:
+            await _night_report(ctx, g, "⚠️ پیویِ دعوت‌شده بسته است — دعوت‌نامه نرسید؛ "
+                                        "با «اکتِ دستی» می‌توانی جای او جواب بدهی.")
+        store.save(chat_id)
+        return
+
+    if data.startswith("cvb_pick_"):
+        if getattr(g, "cvb_done", False) or not getattr(g, "cvb_asking", False):
+            return
+        nato = _seat_of_uid(g, uid)
+        if nato != _find_seat_by_role(g, _R_NATO, alive_only=False):
+            return
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "🕵️ کدام شماره را دوست داری به تیمت اضافه کنی؟",
+                       _kb_night_seats(_cvb_pick_targets(g, nato), g, "cvb_pick_",
+                                       selected=s, confirm_cb="cvb_pick_confirm"))
+        return
+
+    # ── جوابِ دعوت‌شده ──
+    if data in ("cvb_ans_yes", "cvb_ans_no"):
+        if getattr(g, "cvb_done", False):
+            return
+        s = _seat_of_uid(g, uid)
+        if s is None or s != getattr(g, "cvb_invite_seat", None):
+            return
+        if data == "cvb_ans_yes":
+            await _close_pm(ctx, uid, mid, "✅ دعوت را پذیرفتی — به تیمِ مافیا خوش آمدی.")
+            await _night_report(ctx, g, f"✅ {_room_who(g, s)} دعوت را پذیرفت.")
+            await _cvb_accept(ctx, g, s)
+            return
+        await _close_pm(ctx, uid, mid, "🚫 دعوت را نپذیرفتی — نقشت همان است که بود.")
+        await _night_report(ctx, g, f"🚫 {_room_who(g, s)} دعوت را نپذیرفت.")
+        mj = _find_seat_by_role(g, _R_MAJHOOL, alive_only=False)
+        if mj is None:
+            await _night_report(ctx, g, "⚠️ مجهولی در بازی نیست — گادفادری به کسی نرسید.")
+            g.cvb_done = True
+            g.cvb_invite_seat = None
+            store.save(chat_id)
+            return
+        await _cvb_make_godfather(ctx, g, mj)
+        return
+
+
+def _bzp_detective_positive(g, seat) -> bool:
+    rn = _seat_role_norm(g, seat)
+    # نقش‌هایی که معمولاً مثبت‌اند: شیاد، ناتو، و فرد یاکوزایی‌شده
+    positive_role = (seat in (g.negotiated_seats or set())) or (rn in (_R_SHIAD, _R_NATO))
+    if not positive_role:
+        return False  # گادفادر و شهروندان منفی
+    # اگر شیاد کاراگاه را درست حدس زده باشد → استتار (هر سه منفی می‌شوند)
+    det = _find_seat_by_role(g, _R_DETECTIVE)
+    if g.night_shiad_guess is not None and det is not None and g.night_shiad_guess == det:
+        return False
+    return True
+
+
+async def _bzp_open_hunter(ctx, chat_id, g):
+    h = _find_seat_by_role(g, _R_HUNTER)
+    if not h:
+        g.night_done.add("hunter")
+        store.save(chat_id)
+        if _dead_priority_delay(g, _R_HUNTER):
+            # ⏳ هانترِ مرده — اکتِ مافیا/شیاد با ۱ دقیقه تأخیر (شیاد نفهمد هانتر نیست)
+            _open_next_delayed(ctx, chat_id, g, _bzp_open_gf_shiad)
+        else:
+            await _bzp_open_gf_shiad(ctx, chat_id, g)
+        return
+    huid, _hn = g.seats[h]
+    targets = [s for s in _alive_seats(g) if s != h]
+    m = await _safe_pm(ctx, huid, "🪢 خودت را به چه کسی می‌بندی؟",
+                       _kb_night_seats(targets, g, "bzp_hunt_",
+                                       selected=g.night_sel.get(huid), confirm_cb="bzp_hunt_confirm"))
+    if m:
+        g.night_pm_msgs[huid] = m.message_id
+    store.save(chat_id)
+
+
+async def _bzp_open_gf_shiad(ctx, chat_id, g):
+    # 🔒 فقط یک‌بار در هر شب باز شود (مسیرِ عادی و مسیرِ سوزاندن هر دو صدایش می‌زنند)
+    if "bzp_mafia_opened" in (g.night_done or set()):
+        return
+    g.night_done.add("bzp_mafia_opened")
+    store.save(chat_id)
+    # ── تصمیم‌گیرندهٔ مافیا: گادفادر → ناتو → شیاد → فرد یاکوزایی‌شده ──
+    gf_alive = _find_seat_by_role(g, _R_GODFATHER)
+    nato_alive = _find_seat_by_role(g, _R_NATO)
+    shiad_alive = _find_seat_by_role(g, _R_SHIAD)
+    converted = sorted(_mafia_seats(g, alive_only=True))
+    decider = gf_alive or nato_alive or shiad_alive or (converted[0] if converted else None)
+    if not decider:
+        g.night_done.add("mafia")
+    else:
+        g.bzp_decider_seat = decider
+        duid, _dn = g.seats[decider]
+        rows = [[InlineKeyboardButton("🔫 شات", callback_data="bzp_gf_shoot")]]
+        # یاکوزایی فقط وقتی گادفادر زنده است و مصرف نشده
+        if gf_alive is not None and not g.yakuza_used:
+            rows.append([InlineKeyboardButton("🥷 یاکوزایی", callback_data="bzp_gf_yakuza")])
+        # ناتویی فقط وقتی ناتو زنده است و یک‌بارِ مصرفش نرفته
+        if nato_alive is not None and not g.nato_used:
+            rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="bzp_gf_nato")])
+        m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:",
+                           InlineKeyboardMarkup(rows))
+        if m:
+            g.night_pm_msgs[duid] = m.message_id
+
+    # ── شیاد (حدس شمارهٔ کاراگاه) ──
+    sh = _find_seat_by_role(g, _R_SHIAD)
+    if not sh:
+        g.night_done.add("shiad")
+    else:
+        suid, _sn = g.seats[sh]
+        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
+        m = await _safe_pm(ctx, suid, "🎭 حدس بزن کدام شماره کاراگاه است:",
+                           _kb_night_seats(targets, g, "bzp_shiad_",
+                                           selected=g.night_sel.get(suid), confirm_cb="bzp_shiad_confirm"))
+        if m:
+            g.night_pm_msgs[suid] = m.message_id
+    store.save(chat_id)
+    await _bzp_check_open_rest(ctx, chat_id, g)
+
+
+async def _bzp_check_open_rest(ctx, chat_id, g):
+    """بعد از اینکه هم اکت مافیا (گادفادر) و هم شیاد تمام شد، بقیهٔ اکت‌ها باز می‌شوند."""
+    if g.night_rest_opened:
+        return
+    if "mafia" not in g.night_done or "shiad" not in g.night_done:
+        return
+    g.night_rest_opened = True
+    store.save(chat_id)
+
+    # 🔎 کاراگاه
+    det = _find_seat_by_role(g, _R_DETECTIVE)
+    if det:
+        duid, _dn = g.seats[det]
+        targets = [s for s in _alive_seats(g) if s != det]
+        if not targets:
+            await _night_report(ctx, g, "⚠️ کاراگاه هدفی برای استعلام ندارد (لیست خالی)!")
+        m = await _safe_pm(ctx, duid, "🔎 استعلام چه کسی را می‌گیری؟",
+                           _kb_night_seats(targets, g, "bzp_det_"))
+        if m:
+            g.night_pm_msgs[duid] = m.message_id
+        else:
+            await _night_report(ctx, g, "⚠️ سؤالِ اکتِ کاراگاه ارسال نشد (پیوی بسته یا خطای تلگرام) — "
+                                        "دوباره «شب» لازم نیست؛ اگر تکرار شد خبر بده.")
+
+    # 💉 پزشک — در شب یاکوزایی/ناتویی حق سیو ندارد
+    if not g.night_doctor_blocked:
+        doc = _find_seat_by_role(g, _R_DOCTOR)
+        if doc:
+            duid, _dn = g.seats[doc]
+            g.night_doc_need = 1
+            targets = _doctor_targets(g, doc)
+            m = await _safe_pm(ctx, duid, "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
+                               _kb_night_seats(targets, g, "bzp_doc_", selected=set(),
+                                               confirm_cb="bzp_doc_confirm"))
+            if m:
+                g.night_pm_msgs[duid] = m.message_id
+
+    # 🧑‍⚖️ بازپرس — یکبار در کل بازی
+    if not g.baazpors_used:
+        bz = _find_seat_by_role(g, _R_BAAZPORS)
+        if bz:
+            buid, _bn = g.seats[bz]
+            kb = InlineKeyboardMarkup([
+                [InlineKeyboardButton("✅ بله", callback_data="bzp_baz_yes")],
+                [InlineKeyboardButton("🚫 خیر", callback_data="bzp_baz_no")],
+            ])
+            m = await _safe_pm(ctx, buid, "🧑‍⚖️ امشب از حق بازپرسی استفاده می‌کنی؟", kb)
+            if m:
+                g.night_pm_msgs[buid] = m.message_id
+
+    # 🎯 اسنایپر (فقط ۱۲/۱۳ نفره) — یک تیر در کل بازی
+    if not g.sniper_used:
+        sn = _find_seat_by_role(g, _R_SNIPER_BZP)
+        if sn:
+            suid, _sn2 = g.seats[sn]
+            kb = InlineKeyboardMarkup([
+                [InlineKeyboardButton("🎯 بله، شلیک می‌کنم", callback_data="bzp_snipe_yes")],
+                [InlineKeyboardButton("🚫 خیر",            callback_data="bzp_snipe_no")],
+            ])
+            m = await _safe_pm(ctx, suid, "🎯 امشب از تیرت استفاده می‌کنی؟", kb)
+            if m:
+                g.night_pm_msgs[suid] = m.message_id
+    store.save(chat_id)
+
+
+# 🔀 مسیر در mafia_bot: callback_route('bzp_', after=_after_night_act)
+async def handle_baazpors_callback(update, ctx):
+    q = update.callback_query
+    data = q.data
+    uid = _q_uid(q)   # 🎛 اکتِ دستی
+    g, chat_id = _find_active_night_game(uid, q)
+    if g is None:
+        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
+        return
+    await safe_q_answer(q)
+    mid = q.message.message_id if q.message else None
+
+    # ── هانتر ──
+    if data == "bzp_hunt_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_hunter_target = s
+        _tu, tname = g.seats[s]
+        # درست = هر مافیایی جز گادفادر (شیاد، ناتو، مافیا ساده، یاکوزایی‌شده)
+        correct = (s in _mafia_seats(g)) and (_seat_role_norm(g, s) != _R_GODFATHER)
+        tick = "✅" if correct else "❌"
+        await _close_pm(ctx, uid, mid, f"🪢 خودت را به {s}. {tname} بستی.")
+        await _night_report(ctx, g, f"🪢 هانتر → بست به {s}. {escape(tname, quote=False)} {tick}")
+        g.night_done.add("hunter")
+        store.save(chat_id)
+        await _bzp_open_gf_shiad(ctx, chat_id, g)
+        return
+
+    if data.startswith("bzp_hunt_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        h = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != h]
+        await _edit_pm(ctx, uid, mid, "🪢 خودت را به چه کسی می‌بندی؟",
+                       _kb_night_seats(targets, g, "bzp_hunt_", selected=s, confirm_cb="bzp_hunt_confirm"))
+        return
+
+    # ── تصمیم گادفادر ──
+    if data == "bzp_act_back":
+        # ↩️ برگشت به منوی اکتِ مافیا — یاکوزاییِ تأییدنشده آزاد می‌شود
+        g.night_sel.pop(uid, None)
+        if getattr(g, "bzp_yak_tmp", False):
+            g.yakuza_used = False
+            g.night_yakuza_sacrifice = None
+            g.bzp_yak_tmp = False
+        store.save(chat_id)
+        _gf = _find_seat_by_role(g, _R_GODFATHER)
+        _nato = _find_seat_by_role(g, _R_NATO)
+        rows = [[InlineKeyboardButton("🔫 شات", callback_data="bzp_gf_shoot")]]
+        if _gf is not None and not g.yakuza_used:
+            rows.append([InlineKeyboardButton("🥷 یاکوزایی", callback_data="bzp_gf_yakuza")])
+        if _nato is not None and not g.nato_used:
+            rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="bzp_gf_nato")])
+        kb = InlineKeyboardMarkup(rows)
+        dec = getattr(g, "bzp_decider_seat", None)
+        dec_uid = g.seats[dec][0] if dec in g.seats else None
+        if dec_uid == uid or dec_uid is None:
+            await _edit_pm(ctx, uid, mid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
+        else:
+            await _close_pm(ctx, uid, mid, "↩️ تصمیم به تصمیم‌گیرِ مافیا برگشت.")
+            m = await _safe_pm(ctx, dec_uid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
+            if m:
+                g.night_pm_msgs[dec_uid] = m.message_id
+                store.save(chat_id)
+        return
+
+    if data == "bzp_gf_shoot":
+        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_add_back(_kb_night_seats(targets, g, "bzp_shot_",
+                                                    selected=g.night_sel.get(uid),
+                                                    confirm_cb="bzp_shot_confirm"),
+                                    "bzp_act_back"))
+        return
+
+    if data == "bzp_gf_yakuza":
+        g.yakuza_used = True
+        g.bzp_yak_tmp = True   # ↩️ تا تأیید، قابلِ برگشت
+        store.save(chat_id)
+        me = _seat_of_uid(g, uid)
+        teammates = [s for s in _mafia_seats(g, alive_only=True) if s != me]
+        if not teammates:
+            g.night_yakuza_sacrifice = me
+            g.night_sel.pop(uid, None)
+            store.save(chat_id)
+            targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
+            await _edit_pm(ctx, uid, mid, "🥷 یاری نداری؛ خودت فدا می‌شوی.\nبا چه کسی یاکوزایی می‌کنی؟",
+                           _kb_add_back(_kb_night_seats(targets, g, "bzp_yakrec_",
+                                                        confirm_cb="bzp_yakrec_confirm"),
+                                        "bzp_act_back"))
+        else:
+            await _edit_pm(ctx, uid, mid, "🥷 کدام یارت را فدا می‌کنی؟",
+                           _kb_add_back(_kb_night_seats(teammates, g, "bzp_yaksac_",
+                                                        selected=g.night_sel.get(uid),
+                                                        confirm_cb="bzp_yaksac_confirm"),
+                                        "bzp_act_back"))
+        return
+
+    if data == "bzp_gf_nato":
+        # 🕵️ یک‌بار در کلِ بازی — نگهبانِ اینجا برای کیبوردِ کهنه‌ی شب‌های قبل است
+        if g.nato_used:
+            await safe_q_answer(q, "ناتویی قبلاً استفاده شده.", show_alert=True)
+            return
+        nato = _find_seat_by_role(g, _R_NATO)
+        if nato is None:
+            await safe_q_answer(q, "ناتو زنده نیست.", show_alert=True)
+            return
+        nato_uid, _nn = g.seats[nato]
+        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
+        kb = _kb_add_back(_kb_night_seats(targets, g, "bzp_nato_",
+                                          selected=g.night_sel.get(nato_uid),
+                                          confirm_cb="bzp_nato_confirm"),
+                          "bzp_act_back")
+        if nato_uid == uid:
+            await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟", kb)
+            g.night_pm_msgs[nato_uid] = mid
+        else:
+            await _close_pm(ctx, uid, mid, "🕵️ ناتویی انتخاب شد. منتظر ناتو بمانید.")
+            m = await _safe_pm(ctx, nato_uid, "🕵️ چه کسی را ناتویی می‌کنی؟", kb)
+            if m:
+                g.night_pm_msgs[nato_uid] = m.message_id
+        store.save(chat_id)
+        return
+
+    # ── شلیک گادفادر ──
+    if data == "bzp_shot_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_shot_target = s
+        await _room_announce_shot(ctx, g, s)
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {tname}")
+        await _night_report(ctx, g, f"🔫 شلیک مافیا → <b>{s}. {escape(tname, quote=False)}</b>")
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _bzp_check_open_rest(ctx, chat_id, g)
+        return
+
+    if data.startswith("bzp_shot_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_add_back(_kb_night_seats(targets, g, "bzp_shot_", selected=s,
+                                                    confirm_cb="bzp_shot_confirm"),
+                                    "bzp_act_back"))
+        return
+
+    # ── یاکوزایی: فدا کردن یار ──
+    if data == "bzp_yaksac_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک یار را انتخاب کن.", show_alert=True)
+            return
+        g.night_yakuza_sacrifice = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
+        await _edit_pm(ctx, uid, mid, "🥷 با چه کسی یاکوزایی می‌کنی؟",
+                       _kb_night_seats(targets, g, "bzp_yakrec_", confirm_cb="bzp_yakrec_confirm"))
+        return
+
+    if data.startswith("bzp_yaksac_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        me = _seat_of_uid(g, uid)
+        teammates = [x for x in _mafia_seats(g, alive_only=True) if x != me]
+        await _edit_pm(ctx, uid, mid, "🥷 کدام یارت را فدا می‌کنی؟",
+                       _kb_add_back(_kb_night_seats(teammates, g, "bzp_yaksac_", selected=s,
+                                                    confirm_cb="bzp_yaksac_confirm"),
+                                    "bzp_act_back"))
+        return
+
+    # ── یاکوزایی: جذب شهروند ──
+    if data == "bzp_yakrec_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        tu, tname = g.seats[s]
+        rn = _seat_role_norm(g, s)
+        if rn in _R_CITIZEN:
+            converted = True
+        elif rn == _R_ROUIN:
+            converted = (g.max_seats != 12)  # در بازپرس ۱۲ نفره رویین‌تن خریداری نمی‌شود
+        else:
+            converted = False
+        sac = g.night_yakuza_sacrifice
+        sac_txt = f"{sac}. {g.seats[sac][1]}" if sac in g.seats else "—"
+        if converted:
+            g.negotiated_seats.add(s)
+            try:
+                await ctx.bot.send_message(tu, "🥷 با شما یاکوزایی شد. اکنون «مافیا ساده» هستید.")
+            except Exception:
+                pass
+            await _room_send_link(ctx, g, tu)   # لینک اتاق مافیا فوری
+            await _night_report(ctx, g, f"🥷 یاکوزایی → فدا: {sac_txt} | جذب: <b>{s}. {escape(tname, quote=False)}</b> → مافیا ساده ✅")
+        else:
+            await _night_report(ctx, g, f"🥷 یاکوزایی → فدا: {sac_txt} | جذب: <b>{s}. {escape(tname, quote=False)}</b> → ناموفق ❌")
+        # 📣 اتاقِ مافیا: بدونِ تیک/ضربدر و بدونِ «ناموفق» — هر دو حالت یک متنِ یکسان،
+        #    وگرنه تیم از روی همین پیام می‌فهمد اکت گرفته یا نه
+        await _room_note(ctx, g, f"🥷 یاکوزایی — فدا: <b>{escape(sac_txt, quote=False)}</b> | "
+                         f"جذب: <b>{_room_who(g, s)}</b>")
+        await _close_pm(ctx, uid, mid, "✅ یاکوزایی ثبت شد.")
+        g.night_doctor_blocked = True
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _bzp_broadcast_special(ctx, g, "یاکوزایی")
+        await _bzp_check_open_rest(ctx, chat_id, g)
+        return
+
+    if data.startswith("bzp_yakrec_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
+        await _edit_pm(ctx, uid, mid, "🥷 با چه کسی یاکوزایی می‌کنی؟",
+                       _kb_add_back(_kb_night_seats(targets, g, "bzp_yakrec_", selected=s,
+                                                    confirm_cb="bzp_yakrec_confirm"),
+                                    "bzp_act_back"))
+        return
+
+    # ── ناتویی: انتخاب هدف، سپس حدس نقش ──
+    if data.startswith("bzp_natorole_"):
+        i = int(data.rsplit("_", 1)[1])
+        guess_name = _BZP_CITIZEN_ROLE_NAMES[i]
+        s = g.night_nato_seat
+        if not s:
+            await safe_q_answer(q, "اول هدف را انتخاب کن.", show_alert=True)
+            return
+        _tu, tname = g.seats[s]
+        correct = (_nz(guess_name) == _seat_role_norm(g, s))
+        g.night_nato_correct = correct
+        tick = "✅" if correct else "❌"
+        g.night_nato_target = s
+        g.nato_used = True   # 🕵️ مصرف شد — از شبِ بعد دکمه‌اش نمی‌آید
+        await _close_pm(ctx, uid, mid, f"🕵️ ناتویی روی {s}. {tname} ثبت شد.")
+        await _night_report(ctx, g, f"🕵️ ناتو → صندلی {s}. {escape(tname, quote=False)} | حدس نقش: {guess_name} {tick}")
+        g.night_doctor_blocked = True
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _bzp_broadcast_special(ctx, g, "ناتویی")
+        await _bzp_check_open_rest(ctx, chat_id, g)
+        return
+
+    if data == "bzp_nato_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_nato_seat = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _room_note(ctx, g, f"🕵️ ناتویی روی <b>{_room_who(g, s)}</b>")
+        rows = [[InlineKeyboardButton(rn, callback_data=f"bzp_natorole_{i}")]
+                for i, rn in enumerate(_BZP_CITIZEN_ROLE_NAMES)]
+        await _edit_pm(ctx, uid, mid, f"🕵️ نقش صندلی {s} را حدس بزن:", InlineKeyboardMarkup(rows))
+        return
+
+    if data.startswith("bzp_nato_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
+        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟",
+                       _kb_add_back(_kb_night_seats(targets, g, "bzp_nato_", selected=s,
+                                                    confirm_cb="bzp_nato_confirm"),
+                                    "bzp_act_back"))
+        return
+
+    # ── شیاد: حدس کاراگاه ──
+    if data == "bzp_shiad_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_shiad_guess = s
+        det = _find_seat_by_role(g, _R_DETECTIVE)
+        correct = (det is not None and s == det)
+        tick = "✅" if correct else "❌"
+        # 🎭 اکتِ شیاد عمداً در اتاقِ مافیا اعلام نمی‌شود — فقط در پیویِ گاد
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, "🎭 حدس ثبت شد.")
+        await _night_report(ctx, g, f"🎭 شیاد → حدس کاراگاه: {s}. {escape(tname, quote=False)} {tick}")
+        g.night_done.add("shiad")
+        store.save(chat_id)
+        await _bzp_check_open_rest(ctx, chat_id, g)
+        return
+
+    if data.startswith("bzp_shiad_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
+        await _edit_pm(ctx, uid, mid, "🎭 حدس بزن کدام شماره کاراگاه است:",
+                       _kb_night_seats(targets, g, "bzp_shiad_", selected=s, confirm_cb="bzp_shiad_confirm"))
+        return
+
+    # ── کاراگاه (مستقیم) ──
+    if data.startswith("bzp_det_"):
+        s = int(data.rsplit("_", 1)[1])
+        _tu, tname = g.seats[s]
+        res = "مثبت ✅" if _bzp_detective_positive(g, s) else "منفی ❌"
+        if "مثبت" in res:
+            _sc_add(g, _seat_of_uid(g, uid), "inq", 5, f"استعلام مثبت ({s})")
+        await _close_pm(ctx, uid, mid, f"🔎 استعلام {s}. {tname}: {res}")
+        await _night_report(ctx, g, f"🔎 کاراگاه → استعلام {s}. {escape(tname, quote=False)}: <b>{res}</b>")
+        g.night_done.add("detective")
+        store.save(chat_id)
+        return
+
+    # ── پزشک (۱ نفر) ──
+    if data == "bzp_doc_confirm":
+        sel = list(g.night_doc_sel.get(uid, []))
+        if not sel:
+            await safe_q_answer(q, "یک نفر را انتخاب کن.", show_alert=True)
+            return
+        doc = _seat_of_uid(g, uid)
+        if doc in sel:
+            g.doctor_self_saves = (g.doctor_self_saves or 0) + 1
+        g.night_doc_saved = list(sel)
+        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
+        await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {names}")
+        await _night_report(ctx, g, f"💉 پزشک → سیو: <b>{escape(names, quote=False)}</b>")
+        g.night_done.add("doctor")
+        store.save(chat_id)
+        return
+
+    if data.startswith("bzp_doc_"):
+        s = int(data.rsplit("_", 1)[1])
+        sel = set(g.night_doc_sel.get(uid, []))
+        if s in sel:
+            sel.remove(s)
+        elif len(sel) >= 1:
+            await safe_q_answer(q, "فقط ۱ نفر.", show_alert=True)
+            return
+        else:
+            sel.add(s)
+        g.night_doc_sel[uid] = list(sel)
+        store.save(chat_id)
+        doc = _seat_of_uid(g, uid)
+        await _edit_pm(ctx, uid, mid, "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
+                       _kb_night_seats(_doctor_targets(g, doc), g, "bzp_doc_",
+                                       selected=sel, confirm_cb="bzp_doc_confirm"))
+        return
+
+    # ── بازپرس (یکبار: انتخاب ۲ نفر) ──
+    if data == "bzp_baz_no":
+        await _close_pm(ctx, uid, mid, "🧑‍⚖️ از حق بازپرسی استفاده نکردی.")
+        await _night_report(ctx, g, "🧑‍⚖️ بازپرس → استفاده نکرد")
+        g.night_done.add("baazpors")
+        store.save(chat_id)
+        return
+
+    if data == "bzp_baz_yes":
+        bz = _seat_of_uid(g, uid)
+        targets = [s for s in _alive_seats(g) if s != bz]
+        await _edit_pm(ctx, uid, mid, "🧑‍⚖️ دو نفر را برای بازپرسی انتخاب کن:",
+                       _kb_night_seats(targets, g, "bzp_baz_",
+                                       selected=set(g.night_baz_sel.get(uid, [])), confirm_cb="bzp_baz_confirm"))
+        return
+
+    if data == "bzp_baz_confirm":
+        sel = list(g.night_baz_sel.get(uid, []))
+        if len(sel) != 2:
+            await safe_q_answer(q, "باید دقیقاً ۲ نفر را انتخاب کنی.", show_alert=True)
+            return
+        g.baazpors_used = True
+        g.night_baz_targets = list(sel)   # اگر یکی امشب کشته شود، حقِ بازپرسی برمی‌گردد
+        # 🏅 حداقل یک مافیا در احضارشده‌ها = اکتِ درست؛ هر دو شهروند = −۵
+        _bz = _seat_of_uid(g, uid)
+        _mf = [x for x in sel if _sc_side(g, x) == "مافیا"]
+        if _mf:
+            _sc_add(g, _bz, "act", 15, f"بازپرسیِ درست ({len(_mf)} مافیا)")
+        else:
+            _sc_add(g, _bz, "act", -5, "بازپرسیِ هر دو شهروند")
+        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
+        await _close_pm(ctx, uid, mid, f"🧑‍⚖️ بازپرسی: {names}")
+        await _night_report(ctx, g, f"🧑‍⚖️ بازپرس → احضار به بازپرسی: <b>{escape(names, quote=False)}</b>")
+        g.night_done.add("baazpors")
+        store.save(chat_id)
+        return
+
+    if data.startswith("bzp_baz_"):
+        s = int(data.rsplit("_", 1)[1])
+        sel = set(g.night_baz_sel.get(uid, []))
+        if s in sel:
+            sel.remove(s)
+        elif len(sel) >= 2:
+            await safe_q_answer(q, "حداکثر ۲ نفر.", show_alert=True)
+            return
+        else:
+            sel.add(s)
+        g.night_baz_sel[uid] = list(sel)
+        store.save(chat_id)
+        bz = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != bz]
+        await _edit_pm(ctx, uid, mid, "🧑‍⚖️ دو نفر را برای بازپرسی انتخاب کن:",
+                       _kb_night_seats(targets, g, "bzp_baz_", selected=sel, confirm_cb="bzp_baz_confirm"))
+        return
+
+    # ── اسنایپر (۱۲/۱۳ نفره) ──
+    if data == "bzp_snipe_no":
+        await _close_pm(ctx, uid, mid, "🚫 از تیر استفاده نکردی.")
+        await _night_report(ctx, g, "🎯 اسنایپر → شلیک نکرد")
+        g.night_done.add("sniper")
+        store.save(chat_id)
+        return
+
+    if data == "bzp_snipe_yes":
+        sn = _seat_of_uid(g, uid)
+        targets = [s for s in _alive_seats(g) if s != sn]
+        await _edit_pm(ctx, uid, mid, "🎯 به چه کسی شلیک می‌کنی؟",
+                       _kb_night_seats(targets, g, "bzp_snipe_",
+                                       selected=g.night_sel.get(uid), confirm_cb="bzp_snipe_confirm"))
+        return
+
+    if data == "bzp_snipe_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.sniper_used = True
+        g.night_sniper_target = s
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"🎯 شلیک ثبت شد: {s}. {tname}")
+        await _night_report(ctx, g, f"🎯 اسنایپر → شلیک به <b>{s}. {escape(tname, quote=False)}</b>")
+        g.night_done.add("sniper")
+        store.save(chat_id)
+        return
+
+    if data.startswith("bzp_snipe_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        sn = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != sn]
+        await _edit_pm(ctx, uid, mid, "🎯 به چه کسی شلیک می‌کنی؟",
+                       _kb_night_seats(targets, g, "bzp_snipe_", selected=s, confirm_cb="bzp_snipe_confirm"))
+        return
@@ -0,0 +1,1049 @@
+# 🧩 بدنه‌ی موتورِ سناریو «گیمر»
+# این فایل import نمی‌شود: mafia_bot._engine_load آن را (با اولین صدا زدنِ یکی از
+# توابعش) داخلِ فضای نامِ mafia_bot اجرا می‌کند؛ ثابت‌ها، _R_*ها و کمک‌تابع‌های
+# مشترک از همان‌جا دیده می‌شوند. ثبتِ callbackها و جانشین‌ها در mafia_bot است.
+from __future__ import annotations
+
+
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «گیمر» (۱۰/۱۲/۱۷ نفره)
+#  تشخیص بر اساس «نقش‌ها» است نه اسم سناریو (دن‌کارلئونه = گیمر)
+#  ترتیب: رابین‌هود → مسترهلمز → مافیا (دن/تووفیس/موریارتی) → شهروندان
+# ═════════════════════════════════════════════════════════════
+def _gm_actor_for(g, role_seat):
+    """چه صندلی‌ای امشب اکتِ این نقش را انجام می‌دهد؟ (انتقالِ رابین‌هود)"""
+    if role_seat is None:
+        return None
+    if g.gm_gift_accepted and g.gm_robbed_seat == role_seat:
+        return g.gm_gift_to
+    return role_seat
+
+
+def _gm_own_act_skipped(g, seat) -> bool:
+    """گیرنده‌ی هدیه، اکتِ نقشِ خودش را در آن شب از دست می‌دهد."""
+    return bool(g.gm_gift_accepted and g.gm_gift_to == seat and g.gm_robbed_seat != seat)
+
+
+def _gm_rick_unlocked(g) -> bool:
+    """ریک بعد از خروجِ ۲ شهروند آزاد می‌شود (شهروند = غیرمافیا، بر اساس نقش)."""
+    mafia = _mafia_seats(g)
+    return sum(1 for s in (g.striked or set()) if s not in mafia) >= 2
+
+
+def _gm_dexter_unlocked(g) -> bool:
+    """🔪 اکتِ دکستر تا وقتی یکی از مافیاها از بازی خارج نشده، اصلاً باز نمی‌شود."""
+    return bool(_mafia_seats(g) & (g.striked or set()))
+
+
+def _gm_dexter_targets(g):
+    """🔪 هدف‌های مجازِ دکستر: زنده‌های غیرمافیایی که در آخرین رأی‌گیریِ نهایی
+    به یک «شهروند» رأی داده‌اند. (چه کسی به چه کسی رأی داد، عمومی است — چیزی لو نمی‌رود.)"""
+    alive = set(_alive_seats(g))
+    mafia = _mafia_seats(g, alive_only=True)
+    out = []
+    for t, voters in (getattr(g, "last_final_votes", {}) or {}).items():
+        if t not in g.seats or _sc_side(g, t) == "مافیا":
+            continue                      # فقط رأی‌هایی که به شهروند داده شده
+        for v in (voters or []):
+            if v in alive and v not in mafia and v != t and v not in out:
+                out.append(v)
+    return sorted(out)
+
+
+async def _gm_smeagol_join(ctx, g, seat):
+    """🌀 پیوستنِ اسمیگل به تیمِ مافیا — کاملاً خاموش:
+    نه لینکِ اتاق می‌گیرد، نه تیمِ مافیا خبردار می‌شود، نه در شمارشِ ساید مافیا حساب می‌شود.
+    فقط خودش تیم را می‌شناسد و در لیستِ پایانی «مافیا» نمایش داده می‌شود."""
+    g.gm_smeagol_turned = True
+    store.save(_game_chat_id(g))
+    mates = []
+    for m in sorted(_mafia_seats(g)):
+        if m == seat or m not in g.seats:
+            continue
+        tag = " (خارج‌شده)" if m in (g.striked or set()) else ""
+        mates.append(f"{m}. {g.seats[m][1]} — {(g.assigned_roles or {}).get(m, '—')}{tag}")
+    try:
+        await ctx.bot.send_message(
+            g.seats[seat][0],
+            "🖤 از این لحظه به تیمِ مافیا خیانت‌شده‌ای و عضوِ آن‌ها هستی.\n\n"
+            "😈 تیمِ مافیا:\n" + ("\n".join(mates) if mates else "—")
+            + "\n\n⚠️ آن‌ها از پیوستنِ تو خبر ندارند و لینکِ اتاقِ مافیا هم به تو داده نمی‌شود.")
+    except Exception:
+        pass
+    await _night_report(
+        ctx, g,
+        f"🌀 اسمیگل ({seat}. {escape(g.seats[seat][1], quote=False)}) به تیمِ مافیا پیوست — "
+        "«مافیای خاموش» (در شمارش، شهروند؛ فقط در لیستِ پایانی مافیا).")
+
+
+def _gm_citizen_role_names(g):
+    mafia = set(_mafia_role_set(g))
+    names, seen = [], set()
+    for rname in (g.scenario.roles.keys() if g.scenario else []):
+        n = _nz(rname)
+        if n in mafia or n in seen:
+            continue
+        seen.add(n); names.append(rname)
+    return names
+
+
+async def _gm_prompt(ctx, g, seat, key, text, kb=None):
+    """پرامپت اکت به بازیکن + ثبت در فهرست انتظار."""
+    uid = g.seats[seat][0]
+    m = await _safe_pm(ctx, uid, text, kb)
+    if m:
+        g.night_pm_msgs[uid] = m.message_id
+    g.gm_expected.add(key)
+    store.save(_game_chat_id(g))
+    return m
+
+
+def _gm_yesno_kb(yes_cb, no_cb):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ بله", callback_data=yes_cb)],
+        [InlineKeyboardButton("🚫 خیر", callback_data=no_cb)],
+    ])
+
+
+# ── مرحله ۱: رابین‌هود ─────────────────────────────────────────
+async def _gm_open_robin(ctx, chat_id, g):
+    rb = _find_seat_by_role(g, _R_ROBIN)
+    if not rb or g.gm_robin_uses >= 2:
+        g.night_done.add("robin")
+        store.save(chat_id)
+        if _dead_priority_delay(g, _R_ROBIN):
+            # ⏳ رابینِ مرده — مرحله‌ی بعد با ۱ دقیقه تأخیر تا غیبتش لو نرود
+            _open_next_delayed(ctx, chat_id, g, _gm_open_holmes)
+        else:
+            await _gm_open_holmes(ctx, chat_id, g)
+        return
+    await _gm_prompt(ctx, g, rb, "robin",
+                     f"🏹 شب {g.night_number} — می‌خواهی راهزنی کنی؟ (باقی‌مانده: {2 - g.gm_robin_uses})",
+                     _gm_yesno_kb("gm_rb_yes", "gm_rb_no"))
+
+
+# ── مرحله ۲: مسترهلمز ─────────────────────────────────────────
+async def _gm_open_holmes(ctx, chat_id, g):
+    hs = _find_seat_by_role(g, _R_HOLMES)
+    if not hs or g.gm_holmes_uses >= 3 or _gm_own_act_skipped(g, hs):
+        g.night_done.add("holmes")
+        store.save(chat_id)
+        if _dead_priority_delay(g, _R_HOLMES):
+            # ⏳ هلمزِ مرده — مافیا با ۱ دقیقه تأخیر باز شود
+            _open_next_delayed(ctx, chat_id, g, _gm_open_mafia)
+        else:
+            await _gm_open_mafia(ctx, chat_id, g)
+        return
+    actor = _gm_actor_for(g, hs)
+    await _gm_prompt(ctx, g, actor, "holmes",
+                     f"🕵️ می‌خواهی حدس بزنی دن‌کارلئونه کیست؟ (باقی‌مانده: {3 - g.gm_holmes_uses})",
+                     _gm_yesno_kb("gm_hm_yes", "gm_hm_no"))
+
+
+# ── مرحله ۳: مافیا (موازی: شات / بمب / موریارتی) ─────────────
+async def _gm_open_mafia(ctx, chat_id, g):
+    if "mafia_opened" in g.night_done:
+        return
+    g.night_done.add("mafia_opened")
+    store.save(chat_id)
+
+    don = _find_seat_by_role(g, _R_DONC)
+    tf = _find_seat_by_role(g, _R_TWOFACE)
+    mo = _find_seat_by_role(g, _R_MORIARTY)
+    dx = _find_seat_by_role(g, _R_DEXTER)
+
+    # 🔫 شات — دزدیده‌شدنِ دن یا حدسِ درستِ هلمز = بدون شات برای مافیا
+    don_robbed = (g.gm_gift_accepted and g.gm_robbed_seat == don and don is not None)
+    if g.gm_holmes_correct:
+        decider = don or mo or tf or dx
+        if decider:
+            await _safe_pm(ctx, g.seats[decider][0], "😶 امشب مافیا توانِ شات ندارد.")
+        await _night_report(ctx, g, "😶 مافیا امشب شات ندارد (حدسِ درستِ هلمز).")
+        g.night_done.add("shot")
+    elif don_robbed:
+        await _safe_pm(ctx, g.seats[don][0], "🏹 نقش شما دزدیده شده و حق شات ندارید.")
+        await _night_report(ctx, g, "🏹 شاتِ مافیا امشب دستِ گیرنده‌ی هدیه‌ی رابین‌هود است.")
+        # شات را گیرنده‌ی هدیه می‌زند — می‌تواند «هر کسی» را بزند، حتی مافیا (فقط خودش نه)
+        actor = g.gm_gift_to
+        targets = [s for s in _alive_seats(g) if s != actor]
+        await _gm_prompt(ctx, g, actor, "shot", "🔫 (اکتِ هدیه) هدف شلیک را انتخاب کن:",
+                         _kb_night_seats(targets, g, "gm_st_", confirm_cb="gm_st_ok"))
+    else:
+        decider = don or mo or tf or dx   # 🔫 وراثتِ شات: دن → موریارتی → تووفیس → دکستر
+        if not decider:
+            # 🤝 اگر مافیای اصلی نمانده، جذب‌شده (مذاکره/یاکوزایی/خریداری) صاحبِ شات می‌شود
+            converted = sorted(_mafia_seats(g, alive_only=True))
+            decider = converted[0] if converted else None
+        odd_n = (g.night_number % 2 == 1)
+        tf_dual = (decider is not None and tf is not None and decider == tf
+                   and odd_n and not _gm_own_act_skipped(g, tf))
+        if not decider:
+            g.night_done.add("shot")
+        elif tf_dual:
+            # 🔀 شات به تووفیس رسیده و شبِ بمبش هم هست → فقط یکی از دو اکت
+            kb = InlineKeyboardMarkup([[
+                InlineKeyboardButton("💣 بمب", callback_data="gm_tfc_bomb"),
+                InlineKeyboardButton("🔫 شات", callback_data="gm_tfc_shot"),
+            ]])
+            await _gm_prompt(ctx, g, tf, "tfchoice",
+                             "🔀 شات به تو رسیده و امشب شبِ بمب هم هست — فقط یکی: بمب یا شات؟",
+                             kb)
+        else:
+            targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
+            await _gm_prompt(ctx, g, decider, "shot", "🔫 هدف شلیک را انتخاب کن:",
+                             _kb_night_seats(targets, g, "gm_st_", confirm_cb="gm_st_ok"))
+
+    # 💣 تووفیس — فقط شب‌های فرد
+    odd = (g.night_number % 2 == 1)
+    if ("tfchoice" in (getattr(g, "gm_expected", set()) or set())
+            and "tfchoice" not in (g.night_done or set())):
+        pass   # 🔀 منتظرِ انتخابِ تووفیس — بعد از انتخابش، شات «یا» بمب باز می‌شود
+    elif odd and tf and not _gm_own_act_skipped(g, tf):
+        actor = _gm_actor_for(g, tf)
+        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
+        await _gm_prompt(ctx, g, actor, "bomb", "💣 جلوی چه کسی بمب می‌گذاری؟",
+                         _kb_night_seats(targets, g, "gm_tf_", confirm_cb="gm_tf_ok"))
+    else:
+        g.night_done.add("bomb")
+
+    # 🎭 موریارتی — اختیاری، ۳ حدس در کل بازی
+    if mo and g.gm_moriarty_uses < 3 and not _gm_own_act_skipped(g, mo):
+        actor = _gm_actor_for(g, mo)
+        await _gm_prompt(ctx, g, actor, "moriarty",
+                         f"🎭 می‌خواهی حدس بزنی مسترهلمز کیست؟ (باقی‌مانده: {3 - g.gm_moriarty_uses})",
+                         _gm_yesno_kb("gm_mo_yes", "gm_mo_no"))
+    else:
+        g.night_done.add("moriarty")
+
+    # 🔪 دکستر — هم‌زمان با بقیهٔ تیمِ مافیا؛ فقط اگر یکی از مافیاها خارج شده باشد
+    #    و فقط یک‌بار در کلِ بازی (بار بعد که یارش بمیرد دیگر باز نمی‌شود).
+    dx_actor = _gm_actor_for(g, dx) if dx else None
+    if (dx and not getattr(g, "gm_dexter_used", False) and _gm_dexter_unlocked(g)
+            and not _gm_own_act_skipped(g, dx)
+            and dx_actor is not None
+            and dx_actor not in (g.night_burned or set())
+            and _gm_dexter_targets(g)):
+        await _gm_prompt(ctx, g, dx_actor, "dexter",
+                         "🔪 می‌خواهی امشب اکتت را بزنی؟ (فقط یک‌بار در کلِ بازی)",
+                         _gm_yesno_kb("gm_dx_yes", "gm_dx_no"))
+    else:
+        g.night_done.add("dexter")
+    store.save(chat_id)
+    await _gm_check_open_citizens(ctx, chat_id, g)
+
+
+async def _gm_check_open_citizens(ctx, chat_id, g):
+    if "citizens_opened" in g.night_done:
+        return
+    if not ({"shot", "bomb", "moriarty", "dexter"} <= g.night_done):
+        return
+    g.night_done.add("citizens_opened")
+    store.save(chat_id)
+
+    # 💉 کستیل (دکتر) — ۱ نفر در شب؛ خودش حداکثر ۲ بار در کل بازی
+    cs = _find_seat_by_role(g, _R_CASTIEL)
+    if cs and not _gm_own_act_skipped(g, cs):
+        actor = _gm_actor_for(g, cs)
+        targets = _doctor_targets(g, actor)
+        await _gm_prompt(ctx, g, actor, "doctor", "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
+                         _kb_night_seats(targets, g, "gm_doc_", confirm_cb="gm_doc_ok"))
+
+    # 🛡 الیوت — فقط شب‌های فرد، اختیاری
+    el = _find_seat_by_role(g, _R_ELLIOT)
+    if (g.night_number % 2 == 1) and el and not _gm_own_act_skipped(g, el):
+        actor = _gm_actor_for(g, el)
+        await _gm_prompt(ctx, g, actor, "eliot",
+                         "🛡 می‌خواهی امشب از کسی در برابر بمب محافظت کنی؟",
+                         _gm_yesno_kb("gm_el_yes", "gm_el_no"))
+
+    # 🎲 جیمزهالیدی — اختیاری، ۲ بار در کل بازی
+    jm = _find_seat_by_role(g, _R_JAMES)
+    if jm and g.gm_james_uses < 2 and not _gm_own_act_skipped(g, jm):
+        actor = _gm_actor_for(g, jm)
+        await _gm_prompt(ctx, g, actor, "james",
+                         f"🎲 می‌خواهی بازی کنی؟ (باقی‌مانده: {2 - g.gm_james_uses})",
+                         _gm_yesno_kb("gm_jm_yes", "gm_jm_no"))
+
+    # 🔫 ریک‌گرایمز — بعد از خروج ۲ شهروند، هر شب یک شات
+    rk = _find_seat_by_role(g, _R_RICK)
+    if rk and _gm_rick_unlocked(g) and not _gm_own_act_skipped(g, rk):
+        actor = _gm_actor_for(g, rk)
+        await _gm_prompt(ctx, g, actor, "rick", "🔫 می‌خواهی شات بزنی؟",
+                         _gm_yesno_kb("gm_rk_yes", "gm_rk_no"))
+    store.save(chat_id)
+
+
+def _gm_james_nums_kb(g):
+    rows = []
+    row = []
+    for n in range(1, 7):
+        mark = "✅ " if n in (g.gm_james_nums or []) else ""
+        row.append(InlineKeyboardButton(f"{mark}{n}", callback_data=f"gm_jn_{n}"))
+        if len(row) == 3:
+            rows.append(row); row = []
+    if row:
+        rows.append(row)
+    rows.append([InlineKeyboardButton("✅ تأیید (دقیقاً ۲ عدد)", callback_data="gm_jn_ok")])
+    return InlineKeyboardMarkup(rows)
+
+
+# 🔀 مسیر در mafia_bot: callback_route('gm_', after=_after_night_act)
+async def handle_gamer_callback(update, ctx):
+    q = update.callback_query
+    data = q.data
+    uid = _q_uid(q)   # 🎛 اکتِ دستی
+
+    # 🔀 انتخابِ تووفیس (شات یا بمب) — وقتی شات از راهِ وراثت به او رسیده و شبِ فرد است
+    if data in ("gm_tfc_bomb", "gm_tfc_shot"):
+        g = None; chat_id = None
+        for cid, game in store.index.games_of(uid):
+            if not getattr(game, "night_active", False) or not _is_gamer_scenario(game):
+                continue
+            tf = _find_seat_by_role(game, _R_TWOFACE)
+            if tf is None:
+                continue
+            actor = _gm_actor_for(game, tf)
+            if actor in game.seats and game.seats[actor][0] == uid:
+                g, chat_id = game, cid
+                break
+        if g is None:
+            await safe_q_answer(q, "درخواستِ فعالی یافت نشد.", show_alert=True)
+            return
+        if "tfchoice" in (g.night_done or set()):
+            await safe_q_answer(q, "قبلاً انتخاب شده.", show_alert=True)
+            return
+        await safe_q_answer(q)
+        mid = q.message.message_id if q.message else None
+        tf = _find_seat_by_role(g, _R_TWOFACE)
+        g.night_done.add("tfchoice")
+        if data == "gm_tfc_shot":
+            g.night_done.add("bomb")
+            store.save(chat_id)
+            await _close_pm(ctx, uid, mid, "🔫 شات انتخاب شد.")
+            await _night_report(ctx, g, "🔀 تووفیس: شات را انتخاب کرد — بمبِ امشب ندارد.")
+            targets = list(_alive_seats(g))
+            await _gm_prompt(ctx, g, tf, "shot", "🔫 هدف شلیک را انتخاب کن:",
+                             _kb_night_seats(targets, g, "gm_st_", confirm_cb="gm_st_ok"))
+        else:
+            g.night_done.add("shot")
+            store.save(chat_id)
+            await _close_pm(ctx, uid, mid, "💣 بمب انتخاب شد.")
+            await _night_report(ctx, g, "🔀 تووفیس: بمب را انتخاب کرد — شاتِ امشب ندارد.")
+            actor = _gm_actor_for(g, tf)
+            targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
+            await _gm_prompt(ctx, g, actor, "bomb", "💣 جلوی چه کسی بمب می‌گذاری؟",
+                             _kb_night_seats(targets, g, "gm_tf_", confirm_cb="gm_tf_ok"))
+        await _gm_check_open_citizens(ctx, chat_id, g)
+        return
+
+    # 💣 خنثی‌سازیِ روز (بعد از /باز) — خارج از شبِ فعال
+    if data.startswith(("gm_bz_", "gm_bc_")):
+        g = None; chat_id = None
+        for cid, game in store.index.games_of(uid):
+            if getattr(game, "gm_bomb_seat", None) is None:
+                continue
+            el = _find_seat_by_role(game, _R_ELLIOT)
+            if el and game.seats[el][0] == uid:
+                g, chat_id = game, cid
+                break
+        if g is None:
+            await safe_q_answer(q, "بمبی فعال نیست.", show_alert=True)
+            return
+        await safe_q_answer(q)
+        mid = q.message.message_id if q.message else None
+        if data == "gm_bz_no":
+            await _close_pm(ctx, uid, mid, "🙅 کاری نکردی. بمب سرِ جای خودش است.")
+            await _night_report(ctx, g, "💣 الیوت کاری با بمب نکرد.")
+            return
+        if data == "gm_bz_yes":
+            rows = [[InlineKeyboardButton(c, callback_data=f"gm_bc_{i}")]
+                    for i, c in enumerate(_GM_FUSE_COLORS)]
+            await _edit_pm(ctx, uid, mid, "✂️ کدام رنگ را انتخاب می‌کنی؟", InlineKeyboardMarkup(rows))
+            return
+        if data.startswith("gm_bc_"):
+            i = int(data.rsplit("_", 1)[1])
+            color = _GM_FUSE_COLORS[i]
+            ftype = (g.gm_bomb_fuses or {}).get(color, "خنثی")
+            seat = g.gm_bomb_seat
+            tname = g.seats[seat][1] if seat in g.seats else "؟"
+            await _close_pm(ctx, uid, mid, f"✂️ رنگ {color} را انتخاب کردی.")
+            await ctx.bot.send_message(chat_id, f"💥 چاشنی «{ftype}» فعال شد!")
+            await _night_report(ctx, g, f"💣 الیوت رنگ {color} را زد → چاشنی «{ftype}»")
+            if ftype == "خنثی":
+                await ctx.bot.send_message(chat_id, "✅ الیوت با موفقیت بمب را خنثی کرد.")
+            elif ftype == "انفجار":
+                if seat in g.seats and seat not in (g.striked or set()):
+                    g.striked.add(seat)
+                await ctx.bot.send_message(chat_id, f"💥 بمب منفجر شد! {seat}. {tname} از بازی خارج شد.")
+                try:
+                    await publish_seating(ctx, chat_id, g, mode=CTRL)
+                except Exception:
+                    pass
+                await _check_auto_end(ctx, chat_id, g)   # 🏁
+            else:  # سرعت
+                await ctx.bot.send_message(
+                    chat_id, "⏩ چاشنی سرعت! بمب پس از صحبتِ نیمی از بازیکنان منفجر می‌شود (با گاد).")
+            g.gm_bomb_seat = None
+            g.gm_bomb_fuses = {}
+            store.save(chat_id)
+            return
+        return
+
+    g, chat_id = _find_active_night_game(uid, q)
+    if g is None:
+        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
+        return
+    await safe_q_answer(q)
+    mid = q.message.message_id if q.message else None
+
+    # ── رابین‌هود ──
+    if data == "gm_rb_no":
+        await _close_pm(ctx, uid, mid, "🏹 امشب راهزنی نکردی.")
+        await _night_report(ctx, g, "🏹 رابین‌هود → راهزنی نکرد")
+        g.night_done.add("robin")
+        store.save(chat_id)
+        await _gm_open_holmes(ctx, chat_id, g)
+        return
+
+    if data == "gm_rb_yes":
+        rb = _seat_of_uid(g, uid)
+        targets = [s for s in _alive_seats(g) if s != rb]
+        await _edit_pm(ctx, uid, mid, "🏹 اکتِ چه کسی را می‌دزدی؟",
+                       _kb_night_seats(targets, g, "gm_rbx_", confirm_cb="gm_rbx_ok"))
+        return
+
+    if data == "gm_rbx_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.gm_robin_steal_from = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        rb = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != rb and x != s]
+        await _edit_pm(ctx, uid, mid, "🎁 به چه کسی هدیه می‌دهی؟",
+                       _kb_night_seats(targets, g, "gm_rby_", confirm_cb="gm_rby_ok"))
+        return
+
+    if data.startswith("gm_rbx_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        rb = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != rb]
+        await _edit_pm(ctx, uid, mid, "🏹 اکتِ چه کسی را می‌دزدی؟",
+                       _kb_night_seats(targets, g, "gm_rbx_", selected=s, confirm_cb="gm_rbx_ok"))
+        return
+
+    if data == "gm_rby_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        x = g.gm_robin_steal_from
+        g.gm_robbed_seat = x
+        g.gm_gift_to = s
+        g.gm_gift_pending = True
+        g.gm_robin_uses += 1
+        g.night_sel.pop(uid, None)
+        await _close_pm(ctx, uid, mid, "✅ راهزنی ثبت شد.")
+        await _night_report(ctx, g, f"🏹 رابین‌هود → اکتِ {x}. {escape(g.seats[x][1], quote=False)} "
+                            f"به {s}. {escape(g.seats[s][1], quote=False)} هدیه شد (منتظر پاسخ)")
+        g.night_done.add("robin")
+        store.save(chat_id)
+        await _gm_prompt(ctx, g, s, "gift",
+                         "🎁 از رابین‌هود هدیه داری! آیا قبول می‌کنی؟",
+                         _gm_yesno_kb("gm_gift_yes", "gm_gift_no"))
+        return
+
+    if data.startswith("gm_rby_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        rb = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != rb and x != g.gm_robin_steal_from]
+        await _edit_pm(ctx, uid, mid, "🎁 به چه کسی هدیه می‌دهی؟",
+                       _kb_night_seats(targets, g, "gm_rby_", selected=s, confirm_cb="gm_rby_ok"))
+        return
+
+    # ── پاسخ هدیه ──
+    if data in ("gm_gift_yes", "gm_gift_no"):
+        accepted = (data == "gm_gift_yes")
+        g.gm_gift_accepted = accepted
+        g.gm_gift_pending = False
+        g.night_done.add("gift")
+        if accepted:
+            await _close_pm(ctx, uid, mid, "🎁 قبول کردی! اکتِ جدیدت به‌زودی برایت می‌آید.")
+            await _night_report(ctx, g, "🎁 هدیه‌ی رابین‌هود پذیرفته شد ✅")
+        else:
+            await _close_pm(ctx, uid, mid, "🙅 هدیه را رد کردی.")
+            await _night_report(ctx, g, "🎁 هدیه‌ی رابین‌هود رد شد ❌")
+            g.gm_robbed_seat = None
+            g.gm_gift_to = None
+        store.save(chat_id)
+        await _gm_open_holmes(ctx, chat_id, g)
+        return
+
+    # ── هلمز ──
+    if data == "gm_hm_no":
+        await _close_pm(ctx, uid, mid, "🕵️ امشب حدس نزدی.")
+        await _night_report(ctx, g, "🕵️ هلمز → حدس نزد")
+        g.night_done.add("holmes")
+        store.save(chat_id)
+        await _gm_open_mafia(ctx, chat_id, g)
+        return
+
+    if data == "gm_hm_yes":
+        actor = _seat_of_uid(g, uid)
+        targets = [s for s in _alive_seats(g) if s != actor]
+        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی دن‌کارلئونه است؟",
+                       _kb_night_seats(targets, g, "gm_hmg_", confirm_cb="gm_hmg_ok"))
+        return
+
+    if data == "gm_hmg_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_sel.pop(uid, None)
+        don = _find_seat_by_role(g, _R_DONC)
+        actor = _seat_of_uid(g, uid)
+        correct = (don is not None and s == don)
+        _tn = g.seats[s][1]
+        if correct:
+            g.gm_holmes_correct = True
+            await _close_pm(ctx, uid, mid, f"🕵️ حدس زدی: {s}. {_tn}")
+            try:
+                await ctx.bot.send_message(uid, "👍")
+            except Exception:
+                pass
+            await _night_report(ctx, g, f"🕵️ هلمز → حدس: {s}. {escape(_tn, quote=False)} ✅ (مافیا امشب شات ندارد)")
+        else:
+            g.gm_holmes_uses += 1
+            await _close_pm(ctx, uid, mid, f"🕵️ حدس زدی: {s}. {_tn}")
+            try:
+                await ctx.bot.send_message(uid, "👎")
+            except Exception:
+                pass
+            await _night_report(ctx, g, f"🕵️ هلمز → حدس: {s}. {escape(_tn, quote=False)} ❌ ({g.gm_holmes_uses}/3)")
+            if g.gm_holmes_uses >= 3:
+                g.gm_holmes_despair = actor
+                await _night_report(ctx, g, "⚰️ سومین حدسِ غلطِ هلمز — از غصه می‌میرد (قطعی).")
+        g.night_done.add("holmes")
+        store.save(chat_id)
+        await _gm_open_mafia(ctx, chat_id, g)
+        return
+
+    if data.startswith("gm_hmg_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        actor = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != actor]
+        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی دن‌کارلئونه است؟",
+                       _kb_night_seats(targets, g, "gm_hmg_", selected=s, confirm_cb="gm_hmg_ok"))
+        return
+
+    # ── شات مافیا ──
+    if data == "gm_st_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_shot_target = s
+        await _room_announce_shot(ctx, g, s)
+        g.night_sel.pop(uid, None)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {_tn}")
+        await _night_report(ctx, g, f"🔫 شلیک مافیا → <b>{s}. {escape(_tn, quote=False)}</b>")
+        g.night_done.add("shot")
+        store.save(chat_id)
+        await _gm_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data.startswith("gm_st_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        me = _seat_of_uid(g, uid)
+        if me in _mafia_seats(g, alive_only=True):
+            # تیرانداز مافیاست → همه‌ی زنده‌ها، شاملِ خودِ تیم (شاید بخواهند خودی بزنند)
+            targets = list(_alive_seats(g))
+        else:
+            # گیرنده‌ی هدیه‌ی رابین‌هود → همه به‌جز خودش (مافیا هم شامل)
+            targets = [x for x in _alive_seats(g) if x != me]
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_night_seats(targets, g, "gm_st_", selected=s, confirm_cb="gm_st_ok"))
+        return
+
+    # ── بمب تووفیس ──
+    if data == "gm_tf_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.gm_tf_target = s
+        g.gm_tf_map = {}
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        rows = [[InlineKeyboardButton(t, callback_data=f"gm_fz_{i}")]
+                for i, t in enumerate(_GM_FUSE_TYPES)]
+        await _edit_pm(ctx, uid, mid, "🟡 چاشنیِ رنگ «زرد» کدام باشد؟", InlineKeyboardMarkup(rows))
+        return
+
+    if data.startswith("gm_tf_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
+        await _edit_pm(ctx, uid, mid, "💣 جلوی چه کسی بمب می‌گذاری؟",
+                       _kb_night_seats(targets, g, "gm_tf_", selected=s, confirm_cb="gm_tf_ok"))
+        return
+
+    if data.startswith("gm_fz_"):
+        i = int(data.rsplit("_", 1)[1])
+        g.gm_tf_map["زرد"] = _GM_FUSE_TYPES[i]
+        store.save(chat_id)
+        remaining = [t for t in _GM_FUSE_TYPES if t not in g.gm_tf_map.values()]
+        rows = [[InlineKeyboardButton(t, callback_data=f"gm_fr_{_GM_FUSE_TYPES.index(t)}")]
+                for t in remaining]
+        await _edit_pm(ctx, uid, mid, "🔴 چاشنیِ رنگ «قرمز» کدام باشد؟", InlineKeyboardMarkup(rows))
+        return
+
+    if data.startswith("gm_fr_"):
+        i = int(data.rsplit("_", 1)[1])
+        g.gm_tf_map["قرمز"] = _GM_FUSE_TYPES[i]
+        last = [t for t in _GM_FUSE_TYPES if t not in g.gm_tf_map.values()][0]
+        g.gm_tf_map["آبی"] = last
+        g.gm_bomb_seat = g.gm_tf_target
+        g.gm_bomb_fuses = dict(g.gm_tf_map)
+        await _room_note(ctx, g, f"💣 بمب جلوی <b>{_room_who(g, g.gm_bomb_seat)}</b> | "
+                         f"زرد:{g.gm_tf_map['زرد']} · قرمز:{g.gm_tf_map['قرمز']} · آبی:{last}")
+        seat = g.gm_bomb_seat
+        _tn = g.seats[seat][1] if seat in g.seats else "؟"
+        await _close_pm(ctx, uid, mid,
+                        f"💣 بمب جلوی {seat}. {_tn} — زرد:{g.gm_tf_map['زرد']} | قرمز:{g.gm_tf_map['قرمز']} | آبی:{last}")
+        await _night_report(ctx, g,
+                            f"💣 تووفیس → بمب جلوی <b>{seat}. {escape(_tn, quote=False)}</b> | "
+                            f"زرد:{g.gm_tf_map['زرد']} · قرمز:{g.gm_tf_map['قرمز']} · آبی:{last}")
+        g.night_done.add("bomb")
+        store.save(chat_id)
+        await _gm_check_open_citizens(ctx, chat_id, g)
+        return
+
+    # ── موریارتی ──
+    if data == "gm_mo_no":
+        await _close_pm(ctx, uid, mid, "🎭 امشب حدس نزدی.")
+        await _night_report(ctx, g, "🎭 موریارتی → حدس نزد")
+        g.night_done.add("moriarty")
+        store.save(chat_id)
+        await _gm_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data == "gm_mo_yes":
+        actor = _seat_of_uid(g, uid)
+        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
+        await _edit_pm(ctx, uid, mid, "🎭 چه کسی مسترهلمز است؟",
+                       _kb_night_seats(targets, g, "gm_mog_", confirm_cb="gm_mog_ok"))
+        return
+
+    if data == "gm_mog_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_sel.pop(uid, None)
+        holmes = _find_seat_by_role(g, _R_HOLMES)
+        correct = (holmes is not None and s == holmes)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"🎭 حدس ثبت شد: {s}. {_tn}")
+        if correct:
+            g.gm_moriarty_correct = True
+            await _night_report(ctx, g, f"🎭 موریارتی → حدس: {s}. {escape(_tn, quote=False)} ✅ (هلمز می‌میرد)")
+        else:
+            g.gm_moriarty_uses += 1
+            await _night_report(ctx, g, f"🎭 موریارتی → حدس: {s}. {escape(_tn, quote=False)} ❌ ({g.gm_moriarty_uses}/3)")
+            if g.gm_moriarty_uses >= 3:
+                g.gm_moriarty_despair = True
+                await _night_report(ctx, g, "⚰️ سومین حدسِ غلطِ موریارتی — می‌میرد (قطعی).")
+        g.night_done.add("moriarty")
+        store.save(chat_id)
+        await _gm_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data.startswith("gm_mog_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
+        await _edit_pm(ctx, uid, mid, "🎭 چه کسی مسترهلمز است؟",
+                       _kb_night_seats(targets, g, "gm_mog_", selected=s, confirm_cb="gm_mog_ok"))
+        return
+
+    # ── دکستر (قاتلِ تیمِ مافیا) ──
+    if data == "gm_dx_no":
+        await _close_pm(ctx, uid, mid, "🔪 امشب اکت نزدی — اکتت هنوز دستِ خودت است.")
+        await _night_report(ctx, g, "🔪 دکستر → اکت نزد")
+        g.night_done.add("dexter")
+        store.save(chat_id)
+        await _gm_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data == "gm_dx_yes":
+        targets = _gm_dexter_targets(g)
+        if not targets:
+            await _close_pm(ctx, uid, mid, "🔪 امشب کسی در دسترسِ تو نیست.")
+            await _night_report(ctx, g, "🔪 دکستر → هدفی برای انتخاب نبود")
+            g.night_done.add("dexter")
+            store.save(chat_id)
+            await _gm_check_open_citizens(ctx, chat_id, g)
+            return
+        await _edit_pm(ctx, uid, mid, "🔪 چه کسی را به قتل می‌رسانی؟ (نجات پیدا نمی‌کند)",
+                       _kb_night_seats(targets, g, "gm_dxt_", confirm_cb="gm_dxt_ok"))
+        return
+
+    if data == "gm_dxt_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.gm_dexter_target = s
+        g.gm_dexter_used = True     # 🔒 سوخت — دیگر تا آخرِ بازی باز نمی‌شود
+        await _room_note(ctx, g, f"🔪 قتلِ دکستر روی <b>{_room_who(g, s)}</b> (غیرقابلِ نجات)")
+        g.night_sel.pop(uid, None)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"🔪 ثبت شد: {s}. {_tn}")
+        await _night_report(ctx, g,
+                            f"🔪 دکستر → قتلِ <b>{s}. {escape(_tn, quote=False)}</b> (غیرقابلِ نجات)")
+        g.night_done.add("dexter")
+        store.save(chat_id)
+        await _gm_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data.startswith("gm_dxt_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "🔪 چه کسی را به قتل می‌رسانی؟ (نجات پیدا نمی‌کند)",
+                       _kb_night_seats(_gm_dexter_targets(g), g, "gm_dxt_",
+                                       selected=s, confirm_cb="gm_dxt_ok"))
+        return
+
+    # ── اسمیگل (شهروندِ دیوانه) — انتخاب بعد از شاتِ ریک‌گرایمز ──
+    if data in ("gm_sm_die", "gm_sm_maf"):
+        g.gm_smeagol_choice = "mafia" if data == "gm_sm_maf" else "die"
+        g.night_done.add("smeagol")
+        store.save(chat_id)
+        if g.gm_smeagol_choice == "mafia":
+            await _close_pm(ctx, uid, mid, "🖤 انتخابت ثبت شد.")
+            await _night_report(ctx, g, "🌀 اسمیگل → خیانت را انتخاب کرد")
+        else:
+            await _close_pm(ctx, uid, mid, "🤍 انتخابت ثبت شد.")
+            await _night_report(ctx, g, "🌀 اسمیگل → مرگ برای شهروند را انتخاب کرد")
+        return
+
+    # ── کستیل (دکتر) ──
+    if data == "gm_doc_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        me = _seat_of_uid(g, uid)
+        if s == me:
+            g.doctor_self_saves = (g.doctor_self_saves or 0) + 1
+        g.night_doc_saved = [s]
+        g.night_sel.pop(uid, None)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {s}. {_tn}")
+        await _night_report(ctx, g, f"💉 کستیل → سیو: <b>{s}. {escape(_tn, quote=False)}</b>")
+        g.night_done.add("doctor")
+        store.save(chat_id)
+        return
+
+    if data.startswith("gm_doc_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        me = _seat_of_uid(g, uid)
+        await _edit_pm(ctx, uid, mid, "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
+                       _kb_night_seats(_doctor_targets(g, me), g, "gm_doc_", selected=s, confirm_cb="gm_doc_ok"))
+        return
+
+    # ── الیوت ──
+    if data == "gm_el_no":
+        await _close_pm(ctx, uid, mid, "🛡 امشب محافظت نکردی.")
+        await _night_report(ctx, g, "🛡 الیوت → محافظت نکرد")
+        g.night_done.add("eliot")
+        store.save(chat_id)
+        return
+
+    if data == "gm_el_yes":
+        actor = _seat_of_uid(g, uid)
+        targets = list(_alive_seats(g))
+        await _edit_pm(ctx, uid, mid, "🛡 از چه کسی در برابر بمب محافظت می‌کنی؟",
+                       _kb_night_seats(targets, g, "gm_el_", confirm_cb="gm_el_ok"))
+        return
+
+    if data == "gm_el_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.gm_eliot_protect = s
+        g.night_sel.pop(uid, None)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"🛡 محافظت ثبت شد: {s}. {_tn}")
+        await _night_report(ctx, g, f"🛡 الیوت → محافظت از <b>{s}. {escape(_tn, quote=False)}</b>")
+        g.night_done.add("eliot")
+        store.save(chat_id)
+        return
+
+    if data.startswith("gm_el_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "🛡 از چه کسی در برابر بمب محافظت می‌کنی؟",
+                       _kb_night_seats(list(_alive_seats(g)), g, "gm_el_", selected=s, confirm_cb="gm_el_ok"))
+        return
+
+    # ── جیمزهالیدی ──
+    if data == "gm_jm_no":
+        await _close_pm(ctx, uid, mid, "🎲 امشب بازی نکردی.")
+        await _night_report(ctx, g, "🎲 جیمز → بازی نکرد")
+        g.night_done.add("james")
+        store.save(chat_id)
+        return
+
+    if data == "gm_jm_yes":
+        g.gm_james_nums = []
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "🎲 دو عدد بین ۱ تا ۶ انتخاب کن:", _gm_james_nums_kb(g))
+        return
+
+    if data == "gm_jn_ok":
+        if len(g.gm_james_nums or []) != 2:
+            await safe_q_answer(q, "دقیقاً ۲ عدد انتخاب کن.", show_alert=True)
+            return
+        actor = _seat_of_uid(g, uid)
+        targets = [s for s in _alive_seats(g) if s != actor]
+        await _edit_pm(ctx, uid, mid, f"🎲 اعداد: {g.gm_james_nums[0]} و {g.gm_james_nums[1]} — با چه کسی بازی می‌کنی؟",
+                       _kb_night_seats(targets, g, "gm_jt_", confirm_cb="gm_jt_ok"))
+        return
+
+    if data.startswith("gm_jn_"):
+        n = int(data.rsplit("_", 1)[1])
+        nums = list(g.gm_james_nums or [])
+        if n in nums:
+            nums.remove(n)
+        elif len(nums) < 2:
+            nums.append(n)
+        else:
+            await safe_q_answer(q, "حداکثر ۲ عدد.", show_alert=True)
+            return
+        g.gm_james_nums = nums
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "🎲 دو عدد بین ۱ تا ۶ انتخاب کن:", _gm_james_nums_kb(g))
+        return
+
+    if data == "gm_jt_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.gm_james_target = s
+        g.gm_james_uses += 1
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"🎲 تاس برای {s}. {_tn} انداخته شد...")
+        target_uid = g.seats[s][0]
+        val = None
+        try:
+            dm = await ctx.bot.send_dice(target_uid)
+            val = dm.dice.value
+        except Exception:
+            val = random.randint(1, 6)
+        await asyncio.sleep(4)
+        nums = list(g.gm_james_nums or [])
+        don = _find_seat_by_role(g, _R_DONC)
+        hit = (val in nums)
+        await _night_report(ctx, g, f"🎲 جیمز ({nums[0]} و {nums[1]}) با {s}. {escape(_tn, quote=False)} — تاس: {val} → "
+                            + ("گرفت ✅" if hit else "نگرفت ❌"))
+        if not hit:
+            await _safe_pm(ctx, uid, f"🎲 تاس {val} آمد — نگرفت!")
+            g.night_done.add("james")
+            store.save(chat_id)
+            return
+        don_robbed = (g.gm_gift_accepted and g.gm_robbed_seat == don)
+        if don is not None and s == don and not don_robbed:
+            # دن دروغ می‌گوید: انتخاب نقش شهروندی
+            g.gm_james_waiting_don = True
+            g.gm_james_dice_val = val
+            store.save(chat_id)
+            names = _gm_citizen_role_names(g)
+            rows = [[InlineKeyboardButton(rn, callback_data=f"gm_lie_{i}")] for i, rn in enumerate(names)]
+            await _safe_pm(ctx, g.seats[don][0],
+                           "🎲 جیمز با تو بازی کرد و تاس گرفت! کدام نقش شهروندی را به دروغ بفرستم؟",
+                           InlineKeyboardMarkup(rows))
+            return
+        real_role = (g.assigned_roles or {}).get(s, "؟")
+        await _safe_pm(ctx, uid, f"🎲 تاس {val} آمد — گرفتی! نقشِ {s}. {_tn}: «{real_role}»")
+        await _night_report(ctx, g, f"🎲 نقشِ واقعی «{escape(real_role, quote=False)}» برای جیمز فرستاده شد.")
+        g.night_done.add("james")
+        store.save(chat_id)
+        return
+
+    if data.startswith("gm_jt_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        actor = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != actor]
+        await _edit_pm(ctx, uid, mid, "🎲 با چه کسی بازی می‌کنی؟",
+                       _kb_night_seats(targets, g, "gm_jt_", selected=s, confirm_cb="gm_jt_ok"))
+        return
+
+    if data.startswith("gm_lie_"):
+        i = int(data.rsplit("_", 1)[1])
+        names = _gm_citizen_role_names(g)
+        if i >= len(names):
+            return
+        lie = names[i]
+        await _close_pm(ctx, uid, mid, f"🤥 «{lie}» فرستاده شد.")
+        jm = _find_seat_by_role(g, _R_JAMES)
+        jm_actor = _gm_actor_for(g, jm)
+        t = g.gm_james_target
+        _tn = g.seats[t][1] if t in g.seats else "؟"
+        _v = g.gm_james_dice_val or "?"
+        if jm_actor:
+            # ⚠️ فرمتِ پیام باید دقیقاً مثل نقشِ واقعی باشد تا دروغِ دن لو نرود
+            await _safe_pm(ctx, g.seats[jm_actor][0], f"🎲 تاس {_v} آمد — گرفتی! نقشِ {t}. {_tn}: «{lie}»")
+        await _night_report(ctx, g, f"🤥 دن به دروغ «{escape(lie, quote=False)}» را برای جیمز فرستاد.")
+        g.gm_james_waiting_don = False
+        g.night_done.add("james")
+        store.save(chat_id)
+        return
+
+    # ── ریک‌گرایمز ──
+    if data == "gm_rk_no":
+        await _close_pm(ctx, uid, mid, "🔫 امشب شات نزدی.")
+        await _night_report(ctx, g, "🔫 ریک → شات نزد")
+        g.night_done.add("rick")
+        store.save(chat_id)
+        return
+
+    if data == "gm_rk_yes":
+        actor = _seat_of_uid(g, uid)
+        targets = [s for s in _alive_seats(g) if s != actor]
+        await _edit_pm(ctx, uid, mid, "🔫 به چه کسی شلیک می‌کنی؟",
+                       _kb_night_seats(targets, g, "gm_rk_", confirm_cb="gm_rk_ok"))
+        return
+
+    if data == "gm_rk_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.gm_rick_target = s
+        g.night_sel.pop(uid, None)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"🔫 شلیک ثبت شد: {s}. {_tn}")
+        await _night_report(ctx, g, f"🔫 ریک‌گرایمز → شلیک به <b>{s}. {escape(_tn, quote=False)}</b>")
+        g.night_done.add("rick")
+        store.save(chat_id)
+        # 🌀 اگر هدف اسمیگل باشد، خودش انتخاب می‌کند: برای شهروند بمیرد یا خیانت کند
+        _sm = _find_seat_by_role(g, _R_SMEAGOL)
+        if (_sm is not None and s == _sm and not getattr(g, "gm_smeagol_turned", False)
+                and _sm not in (g.night_burned or set())):
+            await _gm_prompt(
+                ctx, g, _sm, "smeagol",
+                "🌀 امشب به تو شلیک شد. انتخاب کن:",
+                InlineKeyboardMarkup([
+                    [InlineKeyboardButton("🤍 برای شهروند می‌میرم", callback_data="gm_sm_die")],
+                    [InlineKeyboardButton("🖤 خیانت می‌کنم و مافیا می‌شوم", callback_data="gm_sm_maf")],
+                ]))
+        return
+
+    if data.startswith("gm_rk_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        actor = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != actor]
+        await _edit_pm(ctx, uid, mid, "🔫 به چه کسی شلیک می‌کنی؟",
+                       _kb_night_seats(targets, g, "gm_rk_", selected=s, confirm_cb="gm_rk_ok"))
+        return
+
+
+def _mafia_decider_key(g):
+    """کلیدِ «تصمیم‌گیرندهٔ مافیا» در هر سناریو (گیمر وراثتِ شاتِ خودش را دارد)."""
+    if _is_nemayande_scenario(g):
+        return "nem_decider_seat"
+    if _is_baazpors_scenario(g):
+        return "bzp_decider_seat"
+    if _is_takavar_scenario(g):
+        return "tk_decider_seat"
+    if _is_kapu_scenario(g):
+        return "kp_decider_seat"
+    if _is_gamer_scenario(g):
+        return None
+    if _is_shahname_scenario(g):
+        return "sh_decider_seat"
+    return "night_decider_seat"
+
+
+async def _pass_shot_to_next_mafia(ctx, g, ks):
+    """👢→🔫 اگر کیک‌شده «تصمیم‌گیرندهٔ مافیا» بود و هنوز اکتش را ثبت نکرده،
+    نوبت به مافیای بعدی می‌رسد — با منویِ درستِ همان سناریو."""
+    try:
+        if getattr(g, "night_shot_target", None) or getattr(g, "night_don_act", None):
+            return   # اکتِ مافیا قبلاً ثبت شده
+        key = _mafia_decider_key(g)
+        if not key or getattr(g, key, None) != ks:
+            return   # ⚠️ این نفر تصمیم‌گیرندهٔ مافیا نبود (مثلاً هکر) → چیزی معطل نیست
+
+        nxt = None
+        for s in sorted(_alive_seats(g)):
+            if s != ks and s not in (g.night_burned or set()) and _sc_side(g, s) == "مافیا":
+                nxt = s
+                break
+        if nxt is None:
+            return
+        nuid = g.seats[nxt][0]
+        setattr(g, key, nxt)
+        head = "🔫 اکتِ مافیا به تو رسید (هم‌تیمی‌ات کیک شد)"
+
+        # ⚠️ هر سناریو باید منویِ خودش را بگیرد، وگرنه جریانِ بازی به‌هم می‌ریزد
+        if _is_nemayande_scenario(g):
+            rows = [[InlineKeyboardButton("🔫 شات", callback_data="nem_don_shot")]]
+            # ناتویی اکتِ خودِ دن است — دنِ کیک‌شده هنوز خط نخورده، پس دستی کنارش می‌گذاریم
+            _don = _find_seat_by_role(g, _R_DON)
+            if (_don is not None and _don != ks and not g.nato_used
+                    and _don not in (g.night_burned or set())):
+                rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="nem_don_nato")])
+            kb = InlineKeyboardMarkup(rows)
+            text = f"{head}\nاکت مافیا را انتخاب کن:"
+        elif _is_shahname_scenario(g):
+            rows = [[InlineKeyboardButton("🔫 شات", callback_data="sh_act_shot")]]
+            _bf = _sh_seat(g, _R_BOOF)
+            if _bf is not None and _bf != ks and not getattr(g, "sh_boof_used", False):
+                rows.append([InlineKeyboardButton("🪶 پر بوف", callback_data="sh_act_boof")])
+            kb = InlineKeyboardMarkup(rows)
+            text = f"{head}\nاکت تیم اهریمن را انتخاب کن:"
+        else:
+            prefix, confirm = {
+                "bzp_decider_seat": ("bzp_shot_", "bzp_shot_confirm"),
+                "tk_decider_seat":  ("tk_st_", "tk_st_confirm"),
+                "kp_decider_seat":  ("kp_st_", "kp_st_confirm"),
+            }.get(key, ("night_shot_", "night_shot_confirm"))
+            kb = _kb_night_seats(list(_alive_seats(g)), g, prefix, confirm_cb=confirm)
+            text = f"{head} — هدف را انتخاب کن:"
+
+        m = await _safe_pm(ctx, nuid, text, kb)
+        if m:
+            g.night_pm_msgs[nuid] = m.message_id
+            store.save(_game_chat_id(g))
+            await _night_report(ctx, g, f"🔫 اکتِ مافیا از {ks} به {nxt} منتقل شد (کیک شب).")
+    except Exception as e:
+        print("⚠️ pass shot err:", e)
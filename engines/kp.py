@@ -0,0 +1,1330 @@
+# 🧩 بدنه‌ی موتورِ سناریو «کاپو»
+# این فایل import نمی‌شود: mafia_bot._engine_load آن را (با اولین صدا زدنِ یکی از
+# توابعش) داخلِ فضای نامِ mafia_bot اجرا می‌کند؛ ثابت‌ها، _R_*ها و کمک‌تابع‌های
+# مشترک از همان‌جا دیده می‌شوند. ثبتِ callbackها و جانشین‌ها در mafia_bot است.
+from __future__ import annotations
+
+
+# ═══════════════ 🤝 موتورِ معتمدِ کاپو (کاپو — روز ۱) ═══════════════
+def _kp_deng_end_kb():
+    return InlineKeyboardMarkup([[InlineKeyboardButton("✅ پایان شمارش", callback_data="kpe_end")]])
+
+
+def _kp_deng_roles(g):
+    alive = set(_alive_seats(g))
+    if int(getattr(g, "kp_deng_stage", 0) or 0) <= 1:
+        return alive, alive
+    cands = set(getattr(g, "kp_deng_cands", []) or []) & alive
+    return alive - cands, cands
+
+
+async def _kp_round_msg(ctx, chat_id, g, text):
+    old = getattr(g, "kp_deng_kb_mid", None)
+    if old:
+        try:
+            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=old, reply_markup=None)
+        except Exception:
+            pass
+    m = await ctx.bot.send_message(chat_id, text, parse_mode="HTML", reply_markup=_kp_deng_end_kb())
+    g.kp_deng_kb_mid = m.message_id
+    store.save(chat_id)
+
+
+async def _kp_deng_capture(ctx, g, msg, uid, text) -> bool:
+    vs = _seat_of_uid(g, uid)
+    if vs is None or vs in (g.striked or set()) or uid == g.god_id:
+        return False
+    voters, cands = _kp_deng_roles(g)
+    if vs not in voters:
+        return True
+    v = _deng_parse_strict(text, tuple(c for c in cands if c != vs))
+    if v is not None:
+        g.kp_deng_seq = int(getattr(g, "kp_deng_seq", 0) or 0) + 1
+        g.kp_deng_votes[uid] = (v, g.kp_deng_seq)
+        g.kp_deng_unread.discard(uid)
+        store.save(_game_chat_id(g))
+        if all(g.seats[s][0] in g.kp_deng_votes for s in voters):
+            await _kp_deng_count(ctx, msg.chat.id, g)
+        return True
+    if uid not in (g.kp_deng_votes or {}):
+        _first = uid not in (g.kp_deng_unread or set())
+        g.kp_deng_unread.add(uid)
+        store.save(_game_chat_id(g))
+        if _first:
+            try:
+                await msg.reply_text(f"⚠️ {vs}. {g.seats[vs][1]} دنگت خوانده نشد — "
+                                     f"فقط شماره‌ی یکی از صندلی‌ها را بنویس (به‌جز خودت).")
+            except Exception:
+                pass
+        return True
+    return False
+
+
+async def _kp_deng_count(ctx, chat_id, g):
+    """شمارشِ معتمدِ کاپو — یک برنده؛ هر تساوی‌ای → حذفی (متناوب از ۱ و ۱۰) تا یکتا شدن."""
+    if not getattr(g, "kp_deng_active", False):
+        return
+    voters_now, cands_now = _kp_deng_roles(g)
+    votes = {}
+    for u, (seat, seq) in dict(g.kp_deng_votes or {}).items():
+        vs = _seat_of_uid(g, u)
+        if vs is None or vs not in voters_now or seat == vs or seat not in cands_now:
+            continue
+        votes[u] = (seat, seq)
+    counts, tops = _nem_deng_tally(votes)
+    if not tops:
+        await ctx.bot.send_message(chat_id, "🗳 هنوز دنگِ معتبری ثبت نشده — رأی‌گیری ادامه دارد.")
+        return
+    g.kp_deng_votes = {}
+    g.kp_deng_unread = set()
+    store.save(chat_id)
+    alive = set(_alive_seats(g))
+
+    if len(tops) == 1:
+        w = tops[0]
+        old = getattr(g, "kp_deng_kb_mid", None)
+        if old:
+            try:
+                await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=old, reply_markup=None)
+            except Exception:
+                pass
+        g.kp_deng_kb_mid = None
+        g.kp_deng_result = w
+        g.kp_deng_active = False
+        g.kp_deng_stage = 0
+        g.kp_deng_cands = []
+        store.save(chat_id)
+        await ctx.bot.send_message(
+            chat_id, f"🤝 معتمدِ کاپو: <b>{w}. {escape(g.seats[w][1], quote=False)}</b> "
+                     f"({counts[w]} دنگ)", parse_mode="HTML")
+        await _night_report(ctx, g, f"🤝 معتمدِ کاپو: {w} — با «باز» ازت تأیید می‌گیرم.")
+        return
+
+    # تساوی (هر اندازه) → حذفی
+    if not (alive - set(tops)):
+        old = getattr(g, "kp_deng_kb_mid", None)
+        if old:
+            try:
+                await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=old, reply_markup=None)
+            except Exception:
+                pass
+        g.kp_deng_kb_mid = None
+        g.kp_deng_active = False
+        g.kp_deng_stage = 0
+        g.kp_deng_cands = []
+        g.kp_need_manual = True
+        store.save(chat_id)
+        await ctx.bot.send_message(chat_id, "⚖️ حذفی رأی‌دهنده ندارد — تعیینِ معتمد با گاد.")
+        return
+    g.kp_deng_cands = list(tops)
+    g.kp_deng_stage = max(2, int(getattr(g, "kp_deng_stage", 1) or 1))
+    g.kp_deng_round = int(getattr(g, "kp_deng_round", 1) or 1) + 1
+    store.save(chat_id)
+    frm = "۱" if (g.kp_deng_round % 2 == 1) else "۱۰"
+    lst = "، ".join(str(s) for s in tops)
+    await _kp_round_msg(
+        ctx, chat_id, g,
+        f"⚖️ تساوی بینِ: <b>{lst}</b>\n"
+        f"🗳 حذفی — از صندلی {frm}: فقط شماره‌ی یکی از همین‌ها را بنویسید "
+        f"(خودِ این افراد رأی نمی‌دهند).")
+
+
+async def _kp_ask_gun_type(ctx, g):
+    """🔫 از کاپو (یا اگر مرده، از گاد): گانِ اول چه باشد؟ دومی خودکار برعکس."""
+    kb = InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔴 جنگی", callback_data="kpg_war"),
+        InlineKeyboardButton("⚪ مشقی", callback_data="kpg_blank"),
+    ]])
+    kapo = _sc_find_role(g, _SC_SHOOTER_ROLES)
+    target_uid = g.seats[kapo][0] if kapo is not None else g.god_id
+    m = await _safe_pm(ctx, target_uid,
+                       "🔫 گانِ اول چه باشد؟ (گانِ دوم خودکار برعکسِ آن است)", kb)
+    if not m and target_uid != g.god_id:
+        await _safe_pm(ctx, g.god_id,
+                       "🔫 پیویِ کاپو بسته بود — گانِ اول چه باشد؟ (دومی برعکس)", kb)
+
+
+async def _kp_pair_kb_update(ctx, chat_id, g):
+    """👥 روی پیامِ گان: انتخابِ دو نفرِ دفاع توسط گاد (با ✅ و تأیید)."""
+    tmp = getattr(g, "kp_pair_tmp", []) or []
+    rows = []
+    for s in _alive_seats(g):
+        mark = "✅ " if s in tmp else ""
+        rows.append([InlineKeyboardButton(f"{mark}{s} {g.seats[s][1]}", callback_data=f"kpd_{s}")])
+    rows.append([InlineKeyboardButton("✅ تأیید (۲ نفر)", callback_data="kpd_ok")])
+    txt = "👥 چه کسانی در دفاع هستند؟ دو نفر را انتخاب و تأیید کن (فقط گاد)."
+    mid = getattr(g, "kp_gun_msg_id", None)
+    try:
+        await ctx.bot.edit_message_text(chat_id=chat_id, message_id=mid, text=txt,
+                                        reply_markup=InlineKeyboardMarkup(rows))
+    except Exception:
+        try:
+            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=mid,
+                                                    reply_markup=InlineKeyboardMarkup(rows))
+        except Exception:
+            m = await ctx.bot.send_message(chat_id, txt, reply_markup=InlineKeyboardMarkup(rows))
+            g.kp_gun_msg_id = m.message_id
+            store.save(chat_id)
+
+
+async def _kp_gun_prompt(ctx, chat_id, g):
+    """🔫 پرامپتِ اکتِ گان برای معتمد — با نامِ واقعیِ دو نفرِ انتخابیِ گاد."""
+    t = getattr(g, "kp_trust", None)
+    pair = list(getattr(g, "kp_gun_targets", []) or [])
+    if t is None or t not in g.seats or len(pair) != 2:
+        return
+    stage = int(getattr(g, "kp_gun_stage", 0) or 0)
+    used = getattr(g, "kp_gun_used_opt", None)
+    lbl = "اول" if stage == 1 else "دوم"
+    rows = []
+    if used != "t1" and pair[0] in g.seats:
+        rows.append([InlineKeyboardButton(f"{pair[0]}. {g.seats[pair[0]][1]}", callback_data="kpf_t1")])
+    if used != "t2" and pair[1] in g.seats:
+        rows.append([InlineKeyboardButton(f"{pair[1]}. {g.seats[pair[1]][1]}", callback_data="kpf_t2")])
+    if used != "air":
+        rows.append([InlineKeyboardButton("🌫 هوایی", callback_data="kpf_air")])
+    txt = (f"🤝 معتمدِ کاپو {t}. {escape(g.seats[t][1], quote=False)} — "
+           f"گانِ {lbl} را چگونه استفاده می‌کنی؟")
+    mid = getattr(g, "kp_gun_msg_id", None)
+    try:
+        await ctx.bot.edit_message_text(chat_id=chat_id, message_id=mid, text=txt,
+                                        parse_mode="HTML", reply_markup=InlineKeyboardMarkup(rows))
+    except Exception:
+        m = await ctx.bot.send_message(chat_id, txt, parse_mode="HTML",
+                                       reply_markup=InlineKeyboardMarkup(rows))
+        g.kp_gun_msg_id = m.message_id
+        store.save(chat_id)
+
+
+async def _kp_gun_resolve(ctx, chat_id, g, opt):
+    """🔫 شلیک: مشقی=هیچ؛ جنگی به شخص=خطِ خودکار + ساید بعد از ۵۰ ثانیه؛ هوایی=هدر."""
+    stage = int(getattr(g, "kp_gun_stage", 0) or 0)
+    g1 = getattr(g, "kp_gun1_type", None) or "blank"
+    typ = g1 if stage == 1 else ("blank" if g1 == "war" else "war")
+    lbl = "اول" if stage == 1 else "دوم"
+    pair = list(getattr(g, "kp_gun_targets", []) or [])
+    hit_person = opt in ("t1", "t2") and len(pair) == 2
+    target = pair[0] if opt == "t1" else (pair[1] if opt == "t2" else None)
+
+    if not hit_person:
+        await ctx.bot.send_message(chat_id, f"🌫 گانِ {lbl} هوایی شلیک شد.", parse_mode="HTML")
+        await _night_report(ctx, g, f"🔫 گانِ {lbl} ({'جنگی' if typ == 'war' else 'مشقی'}) → هوایی")
+    elif typ != "war":
+        _tn = escape(g.seats[target][1], quote=False)
+        await ctx.bot.send_message(chat_id, f"💨 تفنگ مشقی بود — {target}. {_tn} وصیت نکند.",
+                                   parse_mode="HTML")
+        await _night_report(ctx, g, f"🔫 گانِ {lbl} (مشقی) → {target}. {_tn}")
+    else:
+        _tn = escape(g.seats[target][1], quote=False)
+        g.striked.add(target)
+        store.save(chat_id)
+        await ctx.bot.send_message(chat_id, f"💥 گان جنگی — {target}. {_tn} وصیت کند.",
+                                   parse_mode="HTML")
+        try:
+            await publish_seating(ctx, chat_id, g, mode=CTRL)
+        except Exception:
+            pass
+        await _night_report(ctx, g, f"🔫 گانِ {lbl} (جنگی) → {target}. {_tn} خارج شد "
+                                    f"({_sc_side(g, target)})")
+        await _check_auto_end(ctx, chat_id, g)   # 🏁
+        _lside = _sc_side(g, target)
+
+        async def _kp_side_later():
+            try:
+                await asyncio.sleep(SIDE_ANNOUNCE_DELAY)
+                if g.phase in ("idle", "ended"):
+                    return
+                await ctx.bot.send_message(chat_id, f"ساید {target}. {_tn}: <b>{_lside}</b>",
+                                           parse_mode="HTML")
+            except Exception as e:
+                print("⚠️ kp side err:", e)
+        asyncio.create_task(_kp_side_later())
+
+    # پایان یا گانِ دوم
+    if stage == 1 and not (typ == "war" and hit_person):
+        g.kp_gun_stage = 2
+        g.kp_gun_used_opt = opt
+        store.save(chat_id)
+        await _kp_gun_prompt(ctx, chat_id, g)
+        return
+    # جنگیِ خورده به شخص در گانِ اول، یا پایانِ گانِ دوم
+    g.kp_gun_done = True
+    store.save(chat_id)
+    mid = getattr(g, "kp_gun_msg_id", None)
+    try:
+        await ctx.bot.edit_message_text(chat_id=chat_id, message_id=mid,
+                                        text="🔫 اکتِ گان تمام شد.", parse_mode="HTML")
+    except Exception:
+        pass
+
+
+# 🔀 مسیر در mafia_bot: callback_route('kpe_', 'kpc_', 'kpg_', 'kpd_', 'kpf_')
+async def handle_kapu_trust_callback(update, ctx):
+    """🤝 کاپو: پایانِ شمارش، تأیید/انتخابِ معتمد، نوعِ گان، انتخابِ جفتِ دفاع، اکتِ گان."""
+    q = update.callback_query
+    data = q.data
+    uid = _q_uid(q)   # 🎛 اکتِ دستی
+
+    # پایانِ شمارش — دکمه‌ی گروهی، چت-محور
+    if data == "kpe_end":
+        chat_id = q.message.chat.id if q.message else None
+        g = store.games.get(chat_id) if chat_id is not None else None
+        if (g is None or g.god_id != uid or not _is_kapu_scenario(g)
+                or not getattr(g, "kp_deng_active", False)):
+            await safe_q_answer(q, "شمارشِ فعالی نیست.", show_alert=True)
+            return
+        await safe_q_answer(q)
+        await _kp_deng_count(ctx, chat_id, g)
+        return
+
+    # اکتِ گان — دکمه‌ی گروهی
+    if data == "kpg_act":
+        chat_id = q.message.chat.id if q.message else None
+        g = store.games.get(chat_id) if chat_id is not None else None
+        if g is None or not _is_kapu_scenario(g) or getattr(g, "kp_gun_done", False):
+            await safe_q_answer(q, "درخواست معتبر نیست.", show_alert=True)
+            return
+        if uid != g.god_id:
+            await safe_q_answer(q, "⛔ فقط گادِ بازی.", show_alert=True)
+            return
+        if getattr(g, "kp_gun_stage", 0):
+            await safe_q_answer(q, "اکتِ گان در جریان است.", show_alert=True)
+            return
+        await safe_q_answer(q)
+        # 👥 دکمه‌ها تبدیل می‌شوند به انتخابِ دو نفرِ دفاع (وسطِ گروه، فقط گاد)
+        g.kp_pair_tmp = []
+        g.kp_gun_used_opt = None
+        store.save(chat_id)
+        await _kp_pair_kb_update(ctx, chat_id, g)
+        return
+
+    # 👥 انتخاب/تأییدِ دو نفرِ دفاع — دکمه‌های گروهی، فقط گاد
+    if data.startswith("kpd_"):
+        chat_id = q.message.chat.id if q.message else None
+        g = store.games.get(chat_id) if chat_id is not None else None
+        if (g is None or not _is_kapu_scenario(g) or getattr(g, "kp_gun_done", False)
+                or getattr(g, "kp_gun_stage", 0)):
+            await safe_q_answer(q, "درخواست معتبر نیست.", show_alert=True)
+            return
+        if uid != g.god_id:
+            await safe_q_answer(q, "⛔ فقط گادِ بازی.", show_alert=True)
+            return
+        if data == "kpd_ok":
+            if len(g.kp_pair_tmp or []) != 2:
+                await safe_q_answer(q, "دقیقاً ۲ نفر را انتخاب کن.", show_alert=True)
+                return
+            await safe_q_answer(q)
+            g.kp_gun_targets = list(g.kp_pair_tmp)
+            g.kp_pair_tmp = []
+            g.kp_gun_stage = 1
+            _bump_defense_history(g, g.kp_gun_targets)   # 📜 جفتِ دفاعِ کاپویی سابقه‌دار می‌شوند
+            store.save(chat_id)
+            await _kp_gun_prompt(ctx, chat_id, g)
+            return
+        await safe_q_answer(q)
+        s = int(data.rsplit("_", 1)[1])
+        if s in g.seats and s not in (g.striked or set()):
+            tmp = list(g.kp_pair_tmp or [])
+            if s in tmp:
+                tmp.remove(s)
+            elif len(tmp) < 2:
+                tmp.append(s)
+            g.kp_pair_tmp = tmp
+            store.save(chat_id)
+            await _kp_pair_kb_update(ctx, chat_id, g)
+        return
+
+    # بقیه: پیویِ گاد/کاپو/معتمد → بازیِ کاپوی فعالِ مرتبط
+    g = None; chat_id = None
+    for cid, game in store.index.games_of(uid):
+        if game.phase in ("idle", "ended") or not _is_kapu_scenario(game):
+            continue
+        if data.startswith("kpc_") and game.god_id == uid:
+            g, chat_id = game, cid
+            break
+        if data.startswith("kpg_"):
+            kapo = _sc_find_role(game, _SC_SHOOTER_ROLES)
+            if (game.god_id == uid or (kapo is not None and game.seats[kapo][0] == uid)) \
+                    and getattr(game, "kp_trust", None) and not getattr(game, "kp_gun1_type", None):
+                g, chat_id = game, cid
+                break
+        if data.startswith("kpf_"):
+            t = getattr(game, "kp_trust", None)
+            if (t is not None and t in game.seats and game.seats[t][0] == uid
+                    and getattr(game, "kp_gun_stage", 0)):
+                g, chat_id = game, cid
+                break
+    if g is None:
+        await safe_q_answer(q, "درخواستِ فعالی یافت نشد.", show_alert=True)
+        return
+    mid = q.message.message_id if q.message else None
+
+    if data == "kpc_yes":
+        res = getattr(g, "kp_deng_result", None)
+        if not res or res not in g.seats or res in (g.striked or set()) or getattr(g, "kp_trust", None):
+            await safe_q_answer(q, "درخواست معتبر نیست.", show_alert=True)
+            return
+        await safe_q_answer(q)
+        g.kp_trust = res
+        g.kp_deng_result = None
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, f"✅ معتمدِ کاپو: {res}. {g.seats[res][1]}")
+        await _kp_ask_gun_type(ctx, g)
+        return
+
+    if data == "kpc_no":
+        if getattr(g, "kp_trust", None):
+            await safe_q_answer(q, "درخواست معتبر نیست.", show_alert=True)
+            return
+        await safe_q_answer(q)
+        g.kp_deng_result = None
+        g.kp_need_manual = True
+        store.save(chat_id)
+        rows = [[InlineKeyboardButton(f"{s} {g.seats[s][1]}", callback_data=f"kpc_p_{s}")]
+                for s in _alive_seats(g)]
+        await _edit_pm(ctx, uid, mid, "🤝 معتمدِ کاپو را انتخاب کن:", InlineKeyboardMarkup(rows))
+        return
+
+    if data.startswith("kpc_p_"):
+        if getattr(g, "kp_trust", None):
+            await safe_q_answer(q, "قبلاً ثبت شده.", show_alert=True)
+            return
+        await safe_q_answer(q)
+        s = int(data.rsplit("_", 1)[1])
+        if s not in g.seats or s in (g.striked or set()):
+            return
+        g.kp_trust = s
+        g.kp_need_manual = False
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, f"✅ معتمدِ کاپو: {s}. {g.seats[s][1]}")
+        await _kp_ask_gun_type(ctx, g)
+        return
+
+    if data in ("kpg_war", "kpg_blank"):
+        if getattr(g, "kp_gun1_type", None):
+            await safe_q_answer(q, "قبلاً ثبت شده.", show_alert=True)
+            return
+        await safe_q_answer(q)
+        g.kp_gun1_type = "war" if data == "kpg_war" else "blank"
+        store.save(chat_id)
+        g2 = "مشقی" if g.kp_gun1_type == "war" else "جنگی"
+        g1 = "جنگی" if g.kp_gun1_type == "war" else "مشقی"
+        await _close_pm(ctx, uid, mid, f"🔫 گان اول: {g1} — گان دوم: {g2}")
+        await _night_report(ctx, g, f"🔫 گان‌های معتمد: اول {g1}، دوم {g2} — "
+                                    f"بعد از «بسته» دکمه‌ی اکتِ گان می‌آید.")
+        return
+
+    if data.startswith("kpf_"):
+        opt = data.rsplit("_", 1)[1]   # t1 / t2 / air
+        if opt == getattr(g, "kp_gun_used_opt", None) or opt not in ("t1", "t2", "air"):
+            await safe_q_answer(q, "گزینه معتبر نیست.", show_alert=True)
+            return
+        await safe_q_answer(q)
+        await _kp_gun_resolve(ctx, chat_id, g, opt)
+        return
+
+
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «کاپو» (مرحله ۱: هسته)
+#  ترتیب: دن (شات/یاکوزایی/جلادی) → جلاد → جادوگر → شهروندان
+# ═════════════════════════════════════════════════════════════
+def _kp_heir_immune(g, seat) -> bool:
+    """وارث تا وقتی فردِ انتخابیِ شهروندش زنده است و هنوز ارث نبرده، نامیراست (جز جلادی)."""
+    if seat != g.heir_seat or g.heir_inherited:
+        return False
+    ht = g.heir_target
+    if ht is None or ht in (g.striked or set()):
+        return False
+    if ht in _mafia_seats(g):
+        return False  # اگر مافیا انتخاب کرده باشد نامیرا نیست
+    return True
+
+
+def _kp_detective_positive(g, seat) -> bool:
+    # مظنون، جلاد، جادوگر مثبت؛ دن‌مافیا همیشه منفی؛ بقیه منفی
+    rn = _seat_role_norm(g, seat)
+    if seat in (g.negotiated_seats or set()):
+        return True
+    return rn in (_R_SUSPECT, _R_EXECUTIONER, _R_WITCH)
+
+
+async def _kp_open_don(ctx, chat_id, g):
+    # ترتیب شات: دن → جادوگر → جلاد
+    don = _find_seat_by_role(g, _R_DON)
+    witch = _find_seat_by_role(g, _R_WITCH)
+    ex = _find_seat_by_role(g, _R_EXECUTIONER)
+    decider = don or witch or ex
+    if not decider:
+        # 🥷 اگر مافیای اصلی نمانده، یاکوزایی/جذب‌شده صاحبِ شات می‌شود
+        for _s in sorted(_mafia_seats(g, alive_only=True)):
+            decider = _s
+            break
+    if not decider:
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _kp_check_open_witch(ctx, chat_id, g)
+        return
+    g.kp_decider_seat = decider
+    duid = g.seats[decider][0]
+    rows = [[InlineKeyboardButton("🔫 شات", callback_data="kp_don_shot")]]
+    # یاکوزایی فقط اگر دن زنده و مصرف نشده
+    if don is not None and not g.yakuza_used:
+        rows.append([InlineKeyboardButton("🥷 یاکوزایی", callback_data="kp_don_yakuza")])
+    # جلادی فقط اگر جلاد زنده و مصرف نشده
+    if ex is not None and not g.jalad_used:
+        rows.append([InlineKeyboardButton("⚔️ جلادی", callback_data="kp_don_jalad")])
+    m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:",
+                       InlineKeyboardMarkup(rows))
+    if m:
+        g.night_pm_msgs[duid] = m.message_id
+    store.save(chat_id)
+
+
+async def _kp_check_open_witch(ctx, chat_id, g):
+    if "witch_opened" in g.night_done:
+        return
+    if "mafia" not in g.night_done:
+        return
+    g.night_done.add("witch_opened")
+    store.save(chat_id)
+    witch = _find_seat_by_role(g, _R_WITCH)
+    if not witch:
+        g.night_done.add("witch")
+        store.save(chat_id)
+        await _kp_check_open_citizens(ctx, chat_id, g)
+        return
+    wuid = g.seats[witch][0]
+    targets = [s for s in _alive_seats(g) if s != witch]
+    m = await _safe_pm(ctx, wuid, "🔮 روی چه کسی جادو می‌کنی؟",
+                       _kb_night_seats(targets, g, "kp_witch_",
+                                       selected=g.night_sel.get(wuid), confirm_cb="kp_witch_confirm"))
+    if m:
+        g.night_pm_msgs[wuid] = m.message_id
+    store.save(chat_id)
+
+
+async def _kp_check_open_citizens(ctx, chat_id, g):
+    if "citizens_opened" in g.night_done:
+        return
+    if "witch" not in g.night_done:
+        return
+    g.night_done.add("citizens_opened")
+    store.save(chat_id)
+
+    # 🔎 کاراگاه
+    det = _find_seat_by_role(g, _R_DETECTIVE)
+    if det:
+        duid = g.seats[det][0]
+        targets = [s for s in _alive_seats(g) if s != det]
+        m = await _safe_pm(ctx, duid, "🔎 استعلام چه کسی را می‌گیری؟",
+                           _kb_night_seats(targets, g, "kp_det_"))
+        if m:
+            g.night_pm_msgs[duid] = m.message_id
+
+    # 🛡 زره‌ساز — در شب جلادی و یاکوزایی استراحت
+    if not g.night_doctor_blocked:
+        arm = _find_seat_by_role(g, _R_ARMORER)
+        if arm:
+            auid = g.seats[arm][0]
+            targets = _kp_armorer_targets(g, arm)
+            m = await _safe_pm(ctx, auid, "🛡 تن چه کسی را زره می‌پوشانی؟",
+                               _kb_night_seats(targets, g, "kp_arm_",
+                                               selected=g.night_sel.get(auid), confirm_cb="kp_arm_confirm"))
+            if m:
+                g.night_pm_msgs[auid] = m.message_id
+
+    # 🧪 عطار — سم فقط یک‌بار در کل بازی
+    attar = _find_seat_by_role(g, _R_ATTAR)
+    if attar and not g.attar_poison_used:
+        auid = g.seats[attar][0]
+        kb = InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ بله", callback_data="kp_attar_yes")],
+            [InlineKeyboardButton("🚫 خیر", callback_data="kp_attar_no")],
+        ])
+        m = await _safe_pm(ctx, auid, "🧪 امشب می‌خواهی به کسی سم بدهی؟", kb)
+        if m:
+            g.night_pm_msgs[auid] = m.message_id
+    store.save(chat_id)
+
+
+def _kp_armorer_targets(g, arm_seat):
+    out = []
+    for s in _alive_seats(g):
+        if s == arm_seat and (g.doctor_self_saves or 0) >= 1:
+            continue  # خودش فقط یک‌بار در کل بازی
+        out.append(s)
+    return out
+
+
+# 🔀 مسیر در mafia_bot: callback_route('kp_', after=_after_night_act)
+async def handle_kapu_callback(update, ctx):
+    q = update.callback_query
+    data = q.data
+    uid = _q_uid(q)   # 🎛 اکتِ دستی
+    g, chat_id = _find_active_night_game(uid, q)
+    if g is None:
+        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
+        return
+    await safe_q_answer(q)
+    mid = q.message.message_id if q.message else None
+
+    # ── رأی پادزهر (همه به‌جز عطار) ──
+    if data in ("kp_anti_yes", "kp_anti_no"):
+        g.antidote_votes[uid] = (data == "kp_anti_yes")
+        await _close_pm(ctx, uid, mid, "✅ رأی شما ثبت شد.")
+        store.save(chat_id)
+        await _kp_vote_report(ctx, g, voter_uid=uid)   # 🧪 گزارشِ زنده به گاد
+        # ✅ کیک‌شده/سوخته‌ها از انتظار خارج‌اند — فقط زنده‌های رأی‌نداده ملاک‌اند
+        if not _kp_antidote_pending(g):
+            await _kp_after_vote(ctx, chat_id, g)
+        return
+
+    # ── تصمیم عطار برای پادزهر ──
+    if data in ("kp_ag_yes", "kp_ag_no"):
+        survived = (data == "kp_ag_yes")
+        await _close_pm(ctx, uid, mid, "✅ تصمیم ثبت شد.")
+        await _kp_apply_poison(ctx, chat_id, g, g.attar_poisoned_seat, survived)
+        return
+
+    # ── تصمیم دن ──
+    if data == "kp_act_back":
+        # ↩️ برگشت به منوی اکتِ مافیا — یاکوزاییِ تأییدنشده هم آزاد می‌شود
+        g.night_sel.pop(uid, None)
+        if getattr(g, "kp_yak_tmp", False):
+            g.yakuza_used = False
+            g.night_yakuza_sacrifice = None
+            g.kp_yak_tmp = False
+        store.save(chat_id)
+        _don = _find_seat_by_role(g, _R_DON)
+        _ex = _find_seat_by_role(g, _R_EXECUTIONER)
+        rows = [[InlineKeyboardButton("🔫 شات", callback_data="kp_don_shot")]]
+        if _don is not None and not g.yakuza_used:
+            rows.append([InlineKeyboardButton("🥷 یاکوزایی", callback_data="kp_don_yakuza")])
+        if _ex is not None and not g.jalad_used:
+            rows.append([InlineKeyboardButton("⚔️ جلادی", callback_data="kp_don_jalad")])
+        kb = InlineKeyboardMarkup(rows)
+        dec = getattr(g, "kp_decider_seat", None)
+        dec_uid = g.seats[dec][0] if dec in g.seats else None
+        if dec_uid == uid or dec_uid is None:
+            await _edit_pm(ctx, uid, mid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
+        else:
+            await _close_pm(ctx, uid, mid, "↩️ تصمیم به تصمیم‌گیرِ مافیا برگشت.")
+            m = await _safe_pm(ctx, dec_uid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
+            if m:
+                g.night_pm_msgs[dec_uid] = m.message_id
+                store.save(chat_id)
+        return
+
+    if data == "kp_don_shot":
+        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_add_back(_kb_night_seats(targets, g, "kp_st_",
+                                                    selected=g.night_sel.get(uid),
+                                                    confirm_cb="kp_st_confirm"),
+                                    "kp_act_back"))
+        return
+
+    if data == "kp_don_yakuza":
+        g.yakuza_used = True
+        g.kp_yak_tmp = True   # ↩️ تا تأیید، قابلِ برگشت
+        store.save(chat_id)
+        me = _seat_of_uid(g, uid)
+        teammates = [s for s in _mafia_seats(g, alive_only=True) if s != me]
+        if not teammates:
+            g.night_yakuza_sacrifice = me
+            g.night_sel.pop(uid, None)
+            store.save(chat_id)
+            targets = _kp_yakuza_recruit_targets(g)
+            await _edit_pm(ctx, uid, mid, "🥷 یاری نداری؛ خودت فدا می‌شوی.\nچه کسی را جذب می‌کنی؟",
+                           _kb_add_back(_kb_night_seats(targets, g, "kp_yakrec_",
+                                                        confirm_cb="kp_yakrec_confirm"),
+                                        "kp_act_back"))
+        else:
+            await _edit_pm(ctx, uid, mid, "🥷 کدام یارت را فدا می‌کنی؟",
+                           _kb_add_back(_kb_night_seats(teammates, g, "kp_yaksac_",
+                                                        selected=g.night_sel.get(uid),
+                                                        confirm_cb="kp_yaksac_confirm"),
+                                        "kp_act_back"))
+        return
+
+    if data == "kp_don_jalad":
+        # ⚔️ یک‌بار در کلِ بازی — نگهبان برای کیبوردِ کهنه‌ی شب‌های قبل
+        if g.jalad_used:
+            await safe_q_answer(q, "جلادی قبلاً استفاده شده.", show_alert=True)
+            return
+        ex = _find_seat_by_role(g, _R_EXECUTIONER)
+        if ex is None:
+            await safe_q_answer(q, "جلاد زنده نیست.", show_alert=True)
+            return
+        ex_uid = g.seats[ex][0]
+        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
+        kb = _kb_add_back(_kb_night_seats(targets, g, "kp_jt_",
+                                          selected=g.night_sel.get(ex_uid),
+                                          confirm_cb="kp_jt_confirm"),
+                          "kp_act_back")
+        if ex_uid == uid:
+            await _edit_pm(ctx, uid, mid, "⚔️ نقشِ چه کسی را حدس می‌زنی؟", kb)
+            g.night_pm_msgs[ex_uid] = mid
+        else:
+            await _close_pm(ctx, uid, mid, "⚔️ جلادی انتخاب شد. منتظر جلاد بمانید.")
+            m = await _safe_pm(ctx, ex_uid, "⚔️ نقشِ چه کسی را حدس می‌زنی؟", kb)
+            if m:
+                g.night_pm_msgs[ex_uid] = m.message_id
+        store.save(chat_id)
+        return
+
+    # ── شلیک ──
+    if data == "kp_st_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_shot_target = s
+        g.night_don_act = "shot"
+        await _room_announce_shot(ctx, g, s)
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {tname}")
+        await _night_report(ctx, g, f"🔫 شلیک مافیا → <b>{s}. {escape(tname, quote=False)}</b>")
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _kp_check_open_witch(ctx, chat_id, g)
+        return
+
+    if data.startswith("kp_st_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_add_back(_kb_night_seats(targets, g, "kp_st_", selected=s,
+                                                    confirm_cb="kp_st_confirm"),
+                                    "kp_act_back"))
+        return
+
+    # ── یاکوزایی: فدا ──
+    if data == "kp_yaksac_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک یار را انتخاب کن.", show_alert=True)
+            return
+        g.night_yakuza_sacrifice = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        targets = _kp_yakuza_recruit_targets(g)
+        await _edit_pm(ctx, uid, mid, "🥷 چه کسی را جذب می‌کنی؟",
+                       _kb_night_seats(targets, g, "kp_yakrec_", confirm_cb="kp_yakrec_confirm"))
+        return
+
+    if data.startswith("kp_yaksac_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        me = _seat_of_uid(g, uid)
+        teammates = [x for x in _mafia_seats(g, alive_only=True) if x != me]
+        await _edit_pm(ctx, uid, mid, "🥷 کدام یارت را فدا می‌کنی؟",
+                       _kb_add_back(_kb_night_seats(teammates, g, "kp_yaksac_", selected=s,
+                                                    confirm_cb="kp_yaksac_confirm"),
+                                    "kp_act_back"))
+        return
+
+    # ── یاکوزایی: جذب (فقط شهرساده یا مظنون) ──
+    if data == "kp_yakrec_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_don_act = "yakuza"
+        tu, tname = g.seats[s]
+        rn = _seat_role_norm(g, s)
+        convertible = (rn in _R_CITIZEN or rn == _R_SUSPECT) and not (
+            s == g.heir_seat and g.heir_no_yakuza)
+        sac = g.night_yakuza_sacrifice
+        sac_txt = f"{sac}. {g.seats[sac][1]}" if sac in g.seats else "—"
+        if convertible:
+            g.negotiated_seats.add(s)
+            try:
+                await ctx.bot.send_message(tu, "🥷 با شما یاکوزایی انجام شده است. اکنون مافیا هستید.")
+            except Exception:
+                pass
+            await _room_send_link(ctx, g, tu)   # لینک اتاق مافیا فوری
+            await _night_report(ctx, g, f"🥷 یاکوزایی → فدا: {sac_txt} | جذب: <b>{s}. {escape(tname, quote=False)}</b> ✅")
+        else:
+            await _night_report(ctx, g, f"🥷 یاکوزایی → فدا: {sac_txt} | جذب: <b>{s}. {escape(tname, quote=False)}</b> → ناموفق ❌")
+        # 📣 اتاقِ مافیا: بدونِ تیک/ضربدر — هر دو حالت یک متنِ یکسان
+        await _room_note(ctx, g, f"🥷 یاکوزایی — فدا: <b>{escape(sac_txt, quote=False)}</b> | "
+                         f"جذب: <b>{_room_who(g, s)}</b>")
+        await _close_pm(ctx, uid, mid, "✅ یاکوزایی ثبت شد.")
+        # 🎙 اعلامِ صوتی در وویس‌چتِ گروه (کاپو جداگانه به همه پیام نمی‌دهد)
+        _cid = _game_chat_id(g)
+        if _cid is not None:
+            voice_god.say(_cid, "yakuza")
+        g.night_doctor_blocked = True   # 🥷 شبِ یاکوزایی → زره‌ساز حقِ سیو ندارد
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _kp_check_open_witch(ctx, chat_id, g)
+        return
+
+    if data.startswith("kp_yakrec_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = _kp_yakuza_recruit_targets(g)
+        await _edit_pm(ctx, uid, mid, "🥷 چه کسی را جذب می‌کنی؟",
+                       _kb_add_back(_kb_night_seats(targets, g, "kp_yakrec_", selected=s,
+                                                    confirm_cb="kp_yakrec_confirm"),
+                                    "kp_act_back"))
+        return
+
+    # ── جلادی (حدس نقش) ──
+    if data.startswith("kp_jrole_"):
+        i = int(data.rsplit("_", 1)[1])
+        names = _nem_citizen_role_names(g)
+        if i >= len(names):
+            return
+        guess_name = names[i]
+        s = g.night_jalad_seat
+        if not s:
+            await safe_q_answer(q, "اول هدف را انتخاب کن.", show_alert=True)
+            return
+        _tu, tname = g.seats[s]
+        correct = (_nz(guess_name) == _seat_role_norm(g, s))
+        g.night_jalad_correct = correct
+        g.night_jalad_target = s
+        tick = "✅" if correct else "❌"
+        await _room_note(ctx, g, f"⚔️ جلادی روی <b>{_room_who(g, s)}</b> — "
+                         f"حدس: «{escape(str(guess_name), quote=False)}»")
+        g.jalad_used = True
+        await _close_pm(ctx, uid, mid, f"⚔️ جلادی روی {s}. {tname} ثبت شد.")
+        await _night_report(ctx, g, f"⚔️ جلاد → صندلی {s}. {escape(tname, quote=False)} | حدس نقش: {guess_name} {tick}")
+        g.night_doctor_blocked = True
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _kp_broadcast_jalad(ctx, g)
+        await _kp_check_open_witch(ctx, chat_id, g)
+        return
+
+    if data == "kp_jt_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_jalad_seat = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        names = _nem_citizen_role_names(g)
+        rows = [[InlineKeyboardButton(rn, callback_data=f"kp_jrole_{i}")] for i, rn in enumerate(names)]
+        await _edit_pm(ctx, uid, mid, f"⚔️ نقش صندلی {s} را حدس بزن:", InlineKeyboardMarkup(rows))
+        return
+
+    if data.startswith("kp_jt_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
+        await _edit_pm(ctx, uid, mid, "⚔️ نقشِ چه کسی را حدس می‌زنی؟",
+                       _kb_add_back(_kb_night_seats(targets, g, "kp_jt_", selected=s,
+                                                    confirm_cb="kp_jt_confirm"),
+                                    "kp_act_back"))
+        return
+
+    # ── جادوگر ──
+    if data == "kp_witch_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_witch_target = s
+        await _room_note(ctx, g, f"🔮 جادو روی <b>{_room_who(g, s)}</b>")
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"🔮 جادو ثبت شد: {s}. {tname}")
+        await _night_report(ctx, g, f"🔮 جادوگر → جادو روی <b>{s}. {escape(tname, quote=False)}</b>")
+        g.night_done.add("witch")
+        store.save(chat_id)
+        await _kp_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data.startswith("kp_witch_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        witch = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != witch]
+        await _edit_pm(ctx, uid, mid, "🔮 روی چه کسی جادو می‌کنی؟",
+                       _kb_night_seats(targets, g, "kp_witch_", selected=s, confirm_cb="kp_witch_confirm"))
+        return
+
+    # ── کاراگاه (با اثر جادو) ──
+    if data.startswith("kp_det_"):
+        s = int(data.rsplit("_", 1)[1])
+        det = _seat_of_uid(g, uid)
+        witched = (g.night_witch_target == det)
+        _tu, tname = g.seats[s]
+        if witched:
+            pos = False  # جادوشده → استعلامش همیشه منفی (روی خودش)
+        else:
+            pos = _kp_detective_positive(g, s)
+        res = "مثبت ✅" if pos else "منفی ❌"
+        if pos:
+            _sc_add(g, _seat_of_uid(g, uid), "inq", 5, f"استعلام مثبت ({s})")
+        await _close_pm(ctx, uid, mid, f"🔎 استعلام {s}. {tname}: {res}")
+        await _night_report(ctx, g, f"🔎 کاراگاه → استعلام {s}. {escape(tname, quote=False)}: <b>{res}</b>"
+                            + (f" (جادو شده — انتخابش {s}. {escape(tname, quote=False)} بود؛ "
+                               f"استعلام روی خودش برگشت و منفی شد)" if witched else ""))
+        g.night_done.add("detective")
+        store.save(chat_id)
+        return
+
+    # ── زره‌ساز (با اثر جادو) ──
+    if data == "kp_arm_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        arm = _seat_of_uid(g, uid)
+        witched = (g.night_witch_target == arm)
+        if witched:
+            target = arm  # جادو → زره روی خودش (بدون مصرفِ تک‌سیو)
+        else:
+            target = s
+            if target == arm:
+                g.doctor_self_saves = (g.doctor_self_saves or 0) + 1
+        g.night_doc_saved = [target]
+        # ⚠️ به خودِ زره‌ساز همیشه «انتخابِ خودش» را نشان بده تا جادوشدن لو نرود
+        _sn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"🛡 زره ثبت شد: {s}. {_sn}")
+        _tn = g.seats[target][1]
+        await _night_report(ctx, g, f"🛡 زره‌ساز → زره روی <b>{target}. {escape(_tn, quote=False)}</b>"
+                            + (f" (جادو شده — انتخابش {s}. {escape(_sn, quote=False)} بود)" if witched else ""))
+        g.night_done.add("armorer")
+        store.save(chat_id)
+        return
+
+    if data.startswith("kp_arm_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        arm = _seat_of_uid(g, uid)
+        await _edit_pm(ctx, uid, mid, "🛡 تن چه کسی را زره می‌پوشانی؟",
+                       _kb_night_seats(_kp_armorer_targets(g, arm), g, "kp_arm_", selected=s, confirm_cb="kp_arm_confirm"))
+        return
+
+    # ── عطار (مرحلهٔ ۱: ثبت سم؛ سازوکار کامل در مرحلهٔ ۲) ──
+    if data == "kp_attar_no":
+        await _close_pm(ctx, uid, mid, "🧪 امشب سم ندادی.")
+        await _night_report(ctx, g, "🧪 عطار → سم نداد")
+        g.night_done.add("attar")
+        store.save(chat_id)
+        return
+
+    if data == "kp_attar_yes":
+        attar = _seat_of_uid(g, uid)
+        targets = [s for s in _alive_seats(g) if s != attar]
+        await _edit_pm(ctx, uid, mid, "🧪 به چه کسی سم می‌دهی؟",
+                       _kb_night_seats(targets, g, "kp_att_", confirm_cb="kp_att_confirm"))
+        return
+
+    if data == "kp_att_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        attar = _seat_of_uid(g, uid)
+        witched = (g.night_witch_target == attar)
+        target = attar if witched else s
+        g.night_attar_poison_target = target
+        g.attar_poisoned_seat = target      # شب بعد تعیین‌تکلیف می‌شود
+        g.attar_poison_used = True           # سم یک‌بار در کل بازی
+        _tu, tname = g.seats[target]
+        await _close_pm(ctx, uid, mid, "🧪 سم ثبت شد.")
+        await _night_report(ctx, g, f"🧪 عطار → سم به <b>{target}. {escape(tname, quote=False)}</b>"
+                            + (f" (جادو شده — انتخابش {s}. "
+                               f"{escape(g.seats[s][1], quote=False)} بود؛ سم روی خودش برگشت)"
+                               if witched else ""))
+        g.night_done.add("attar")
+        store.save(chat_id)
+        return
+
+    if data.startswith("kp_att_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        attar = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != attar]
+        await _edit_pm(ctx, uid, mid, "🧪 به چه کسی سم می‌دهی؟",
+                       _kb_night_seats(targets, g, "kp_att_", selected=s, confirm_cb="kp_att_confirm"))
+        return
+
+    # ── انتخاب وارث (شب معارفه) ──
+    if data == "kp_heir_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.heir_seat = _seat_of_uid(g, uid)
+        g.heir_target = s
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"⚱️ انتخاب وارث ثبت شد: {s}. {tname}")
+        await _night_report(ctx, g, f"⚱️ وارث → انتخاب: <b>{s}. {escape(tname, quote=False)}</b>")
+        store.save(chat_id)
+        return
+
+    if data.startswith("kp_heir_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        heir = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != heir]
+        await _edit_pm(ctx, uid, mid, "⚱️ چه کسی را انتخاب می‌کنی؟",
+                       _kb_night_seats(targets, g, "kp_heir_", selected=s, confirm_cb="kp_heir_confirm"))
+        return
+
+
+def _kp_yakuza_recruit_targets(g):
+    """🥷 همهٔ زنده‌های غیرِمافیا — دقیقاً مثلِ بازپرس.
+
+    ⚠️ این فهرست نباید فیلتر شود: اگر فقط «قابلِ جذب‌ها» را نشان بدهیم، دن از روی
+    بود‌ونبودِ اسم‌ها می‌فهمد چه کسانی نقش‌دارند. موفق/ناموفق بودنِ جذب موقعِ
+    تأیید (kp_yakrec_confirm) تعیین می‌شود، نه با پنهان‌کردنِ گزینه‌ها."""
+    return [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
+
+
+async def _kp_broadcast_jalad(ctx, g):
+    # 🎙 اعلامِ صوتی در وویس‌چتِ گروه
+    _cid = _game_chat_id(g)
+    if _cid is not None:
+        voice_god.say(_cid, "jalad")
+    for s in _alive_seats(g):
+        try:
+            await ctx.bot.send_message(g.seats[s][0], "🌙 امشب جلادی می‌شود.")
+        except Exception:
+            pass
+    arm = _find_seat_by_role(g, _R_ARMORER)
+    if arm:
+        try:
+            await ctx.bot.send_message(g.seats[arm][0], "💤 امشب استراحت کن — حق زره دادن نداری.")
+        except Exception:
+            pass
+
+
+def _kp_antidote_pending(g):
+    """رأی‌ندادگانِ «هنوز در بازی» — کیک‌شده/سوخته/خط‌خورده/سوزانده‌شده منتظر نمی‌مانیم."""
+    pending = []
+    skipped = getattr(g, "antidote_skipped", set()) or set()
+    for u in (g.antidote_expected or []):
+        if u in (g.antidote_votes or {}) or u in skipped:
+            continue
+        s = _seat_of_uid(g, u)
+        if s is None or s in (g.striked or set()) or s in (g.night_burned or set()):
+            continue
+        pending.append(u)
+    return pending
+
+
+def _kp_vote_panel_kb(g):
+    """دکمه‌های سوزاندنِ رأیِ کسانی که هنوز رأی نداده‌اند."""
+    rows = []
+    for u in _kp_antidote_pending(g):
+        s = _seat_of_uid(g, u)
+        if s is None:
+            continue
+        rows.append([InlineKeyboardButton(f"🔥 {s}. {g.seats[s][1]}", callback_data=f"kpv_b_{s}")])
+    if rows:
+        rows.append([InlineKeyboardButton("🔥 سوزاندنِ همه‌ی رأی‌های مانده", callback_data="kpv_all")])
+    return InlineKeyboardMarkup(rows) if rows else None
+
+
+async def _kp_vote_report(ctx, g, voter_uid=None):
+    """🧪 گزارشِ زنده‌ی رأی‌گیریِ پادزهر در پیویِ گاد (چه کسی رأی داد، چه کسی نداده)."""
+    votes = g.antidote_votes or {}
+    lines = ["🧪 <b>رأی‌گیریِ پادزهر</b>"]
+    if voter_uid is not None:
+        vs = _seat_of_uid(g, voter_uid)
+        if vs is not None:
+            v = votes.get(voter_uid)
+            lines.append(f"🗳 {vs}. {escape(g.seats[vs][1], quote=False)} رأی داد: "
+                         f"<b>{'بله (پادزهر)' if v else 'خیر'}</b>")
+    yes = sum(1 for v in votes.values() if v)
+    no = len(votes) - yes
+    lines.append(f"📊 تا اینجا: <b>{yes}</b> بله | <b>{no}</b> خیر")
+
+    burned = []
+    for u in (getattr(g, "antidote_skipped", set()) or set()):
+        s = _seat_of_uid(g, u)
+        if s is not None:
+            burned.append(f"{s}. {escape(g.seats[s][1], quote=False)}")
+    if burned:
+        lines.append("🔥 رأیِ سوزانده‌شده: " + "، ".join(burned))
+
+    pend = _kp_antidote_pending(g)
+    if pend:
+        names = []
+        for u in pend:
+            s = _seat_of_uid(g, u)
+            if s is not None:
+                names.append(f"{s}. {escape(g.seats[s][1], quote=False)}")
+        lines.append(f"⏳ <b>هنوز رأی نداده‌اند ({len(pend)})</b>: " + "، ".join(names))
+        lines.append("🔥 اگر کسی آفلاین است، رأیش را بسوزان تا شمارش معطل نماند.")
+    else:
+        lines.append("✅ همه تعیین‌تکلیف شدند.")
+
+    txt = "\n".join(lines)
+    kb = _kp_vote_panel_kb(g)
+    mid = getattr(g, "kp_vote_panel_mid", None)
+    if mid:
+        try:
+            await ctx.bot.edit_message_text(chat_id=g.god_id, message_id=mid, text=txt,
+                                            parse_mode="HTML", reply_markup=kb)
+            return
+        except Exception:
+            pass
+    try:
+        m = await ctx.bot.send_message(g.god_id, txt, parse_mode="HTML", reply_markup=kb)
+        g.kp_vote_panel_mid = m.message_id
+        store.save(_game_chat_id(g))
+    except Exception:
+        pass
+
+
+# 🔀 مسیر در mafia_bot: callback_route('kpv_')
+async def handle_kp_vote_callback(update, ctx):
+    """🔥 سوزاندنِ رأیِ پادزهر توسط گاد (برای آفلاین‌ها)."""
+    q = update.callback_query
+    data = q.data
+    uid = q.from_user.id
+    g = None; chat_id = None
+    for cid, game in store.index.god_games(uid):
+        if game.god_id == uid and getattr(game, "poison_phase", False):
+            g, chat_id = game, cid
+            break
+    if g is None:
+        await safe_q_answer(q, "رأی‌گیریِ فعالی نیست.", show_alert=True)
+        return
+    await safe_q_answer(q)
+
+    if getattr(g, "antidote_done", False):
+        await _kp_vote_report(ctx, g)
+        return
+
+    targets = []
+    if data == "kpv_all":
+        targets = list(_kp_antidote_pending(g))
+    elif data.startswith("kpv_b_"):
+        s = int(data.rsplit("_", 1)[1])
+        if s in g.seats:
+            targets = [g.seats[s][0]]
+    if not targets:
+        await _kp_vote_report(ctx, g)
+        return
+
+    for u in targets:
+        g.antidote_skipped.add(u)
+        s = _seat_of_uid(g, u)
+        # پرامپتِ بازِ همان بازیکن بسته شود تا دکمه‌ای برایش نماند
+        pm = (g.night_pm_msgs or {}).get(u)
+        if pm:
+            try:
+                await _close_pm(ctx, u, pm, "🔥 گاد رأیت را سوزاند — این دور رأیی نداری.")
+            except Exception:
+                pass
+        if s is not None:
+            await _night_report(ctx, g, f"🔥 رأیِ پادزهرِ <b>{s}. "
+                                        f"{escape(g.seats[s][1], quote=False)}</b> سوزانده شد.")
+    store.save(chat_id)
+    await _kp_vote_report(ctx, g)
+    if not _kp_antidote_pending(g):
+        await _kp_after_vote(ctx, chat_id, g)
+
+
+def _kp_antidote_holder(g):
+    """دارندهٔ پادزهر: دن‌مافیا اگر زنده باشد، وگرنه جادوگر."""
+    don = _find_seat_by_role(g, _R_DON)
+    if don is not None:
+        return don
+    return _find_seat_by_role(g, _R_WITCH)
+
+
+async def _kp_check_heir_inherit(ctx, g):
+    """اگر فردِ انتخابیِ وارث مُرده باشد، وارث صاحب نقش/شهرساده می‌شود."""
+    if not (g.heir_seat and not g.heir_inherited and g.heir_target):
+        return
+    if g.heir_target not in (g.striked or set()) or g.heir_target in _mafia_seats(g):
+        return
+    role = (g.assigned_roles or {}).get(g.heir_target)
+    rn = _nz(role or "")
+    g.heir_inherited = True
+    if rn in (_R_DETECTIVE, _R_ARMORER, _R_ATTAR):
+        g.assigned_roles[g.heir_seat] = role
+        new_txt = role
+    else:
+        g.assigned_roles[g.heir_seat] = "شهرساده"
+        g.heir_no_yakuza = True
+        new_txt = "شهرساده (بدون توانایی)"
+    store.save(_game_chat_id(g))
+    try:
+        await ctx.bot.send_message(g.seats[g.heir_seat][0], f"⚱️ شما اکنون «{new_txt}» هستید.")
+    except Exception:
+        pass
+    await _night_report(ctx, g, f"⚱️ وارث → نقشِ جدید: «{escape(new_txt, quote=False)}»")
+
+
+async def _kp_open_night(ctx, chat_id, g):
+    """☠️ اگر عطار شبِ قبل مسموم کرده، شب با رأیِ پادزهر شروع می‌شود؛ وگرنه با دن."""
+    if g.attar_poisoned_seat is not None:
+        await _kp_begin_poison(ctx, chat_id, g)
+    else:
+        await _kp_open_don(ctx, chat_id, g)
+
+
+async def _kp_begin_poison(ctx, chat_id, g):
+    """شروع شب: اعلام سم + رأی‌گیری پادزهر از همه (جز عطار)."""
+    target = g.attar_poisoned_seat
+    # اگر فردِ سم‌دار پیش از تعیین‌تکلیف از بازی خارج شده → بدون رأی‌گیری
+    if target not in g.seats or target in (g.striked or set()):
+        if target in g.seats:
+            tname = g.seats[target][1]
+            for s in _alive_seats(g):
+                try:
+                    await ctx.bot.send_message(
+                        g.seats[s][0],
+                        f"🧪 سم در بدن {target}. {tname} بود، اما ایشان دیگر در بازی نیستند.")
+                except Exception:
+                    pass
+            await _night_report(ctx, g, f"🧪 سم در بدن {target}. {escape(tname, quote=False)} بود؛ از بازی خارج شده — رأی‌گیری لازم نیست.")
+        g.attar_poisoned_seat = None
+        store.save(chat_id)
+        await _kp_open_don(ctx, chat_id, g)
+        return
+    g.poison_phase = True
+    g.antidote_votes = {}
+    g.antidote_skipped = set()
+    g.kp_vote_panel_mid = None
+    tname = g.seats[target][1]
+    attar = _find_seat_by_role(g, _R_ATTAR)
+    for s in _alive_seats(g):
+        try:
+            await ctx.bot.send_message(g.seats[s][0], f"🧪 سم عطار وارد خون سیت {target}. {tname} شده است.")
+        except Exception:
+            pass
+    kb = InlineKeyboardMarkup([[
+        InlineKeyboardButton("✅ بله (پادزهر)", callback_data="kp_anti_yes"),
+        InlineKeyboardButton("🚫 خیر", callback_data="kp_anti_no"),
+    ]])
+    expected = []
+    for s in _alive_seats(g):
+        if s == attar or s == target:
+            continue   # نه عطار، نه خودِ سم‌خورده حقِ رأی دارند
+        uid = g.seats[s][0]
+        m = await _safe_pm(ctx, uid, "آیا موافق دادنِ پادزهر هستید؟", kb)
+        if m:
+            g.night_pm_msgs[uid] = m.message_id
+            expected.append(uid)
+    g.antidote_expected = expected
+    store.save(chat_id)
+    # 🧪 پنلِ زنده‌ی گاد: چه کسی رأی داده / نداده + دکمه‌ی سوزاندنِ رأیِ آفلاین‌ها
+    await _kp_vote_report(ctx, g)
+    if not expected:
+        await _kp_after_vote(ctx, chat_id, g)
+
+
+async def _kp_after_vote(ctx, chat_id, g):
+    # 🔒 فقط یک‌بار (رأیِ آخر و ماشه‌ی کیک ممکن است هم‌زمان برسند)
+    if getattr(g, "antidote_done", False):
+        return
+    g.antidote_done = True
+    store.save(chat_id)
+    target = g.attar_poisoned_seat
+    votes = g.antidote_votes or {}
+    yes = sum(1 for v in votes.values() if v)
+    no = sum(1 for v in votes.values() if not v)
+    alive = len(_alive_seats(g))
+    threshold = alive // 2 + 1
+    majority_for = (yes >= threshold)
+
+    def _names(want):
+        out = []
+        for u, v in votes.items():
+            if v is want:
+                seat = _seat_of_uid(g, u)
+                if seat:
+                    out.append(f"{seat}. {g.seats[seat][1]}")
+        return "، ".join(out) if out else "—"
+
+    tname = g.seats[target][1] if target in g.seats else "—"
+    _burned = []
+    for u in (getattr(g, "antidote_skipped", set()) or set()):
+        _s = _seat_of_uid(g, u)
+        if _s:
+            _burned.append(f"{_s}. {g.seats[_s][1]}")
+    _bline = (f"\n🔥 رأیِ سوزانده‌شده: {escape('، '.join(_burned), quote=False)}"
+              if _burned else "")
+    await _night_report(
+        ctx, g,
+        f"🧪 <b>رأی پادزهر</b> (هدف {target}. {escape(tname, quote=False)})\n"
+        f"موافق: {yes} | مخالف: {no} (نصاب اکثریت: {threshold})\n"
+        f"✅ موافقان: {escape(_names(True), quote=False)}\n"
+        f"❌ مخالفان: {escape(_names(False), quote=False)}{_bline}"
+    )
+    # پنلِ زنده بی‌دکمه شود (رأی‌گیری تمام شد)
+    _pmid = getattr(g, "kp_vote_panel_mid", None)
+    if _pmid:
+        try:
+            await ctx.bot.edit_message_reply_markup(chat_id=g.god_id, message_id=_pmid,
+                                                    reply_markup=None)
+        except Exception:
+            pass
+
+    holder = _kp_antidote_holder(g)
+    attar = _find_seat_by_role(g, _R_ATTAR)
+    if target == holder:
+        # دن/دارندهٔ پادزهر → زنده (پنهان)
+        await _kp_apply_poison(ctx, chat_id, g, target, survived=True)
+    elif attar is None:
+        # عطار در بازی نیست → تصمیم با اکثریت
+        await _kp_apply_poison(ctx, chat_id, g, target, survived=majority_for)
+    else:
+        attar_uid = g.seats[attar][0]
+        mtxt = "اکثریت موافقِ دادن پادزهر هستند." if majority_for else "اکثریت مخالفِ دادن پادزهر هستند."
+        kb = InlineKeyboardMarkup([[
+            InlineKeyboardButton("✅ پادزهر می‌دهم", callback_data="kp_ag_yes"),
+            InlineKeyboardButton("🚫 نمی‌دهم", callback_data="kp_ag_no"),
+        ]])
+        m = await _safe_pm(ctx, attar_uid, f"🧪 {mtxt}\nآیا پادزهر می‌دهی؟", kb)
+        if m:
+            g.night_pm_msgs[attar_uid] = m.message_id
+        store.save(chat_id)
+
+
+async def _kp_apply_poison(ctx, chat_id, g, target, survived):
+    recipients = list(_alive_seats(g))  # قبل از خط‌زدن
+    tname = g.seats[target][1] if target in g.seats else "—"
+    if survived:
+        msg = f"🧪 {target}. {tname} پادزهر گرفت و زنده ماند."
+        await _night_report(ctx, g, msg)
+    else:
+        if target in g.seats and target not in (g.striked or set()):
+            g.striked.add(target)
+        msg = f"🧪 {target}. {tname} پادزهر نگرفت و کشته شد."
+        await _night_report(ctx, g, msg + " (خط خورد)")
+    for s in recipients:
+        try:
+            await ctx.bot.send_message(g.seats[s][0], msg)
+        except Exception:
+            pass
+    g.attar_poisoned_seat = None
+    g.poison_phase = False
+    g.antidote_votes = {}
+    g.antidote_expected = []
+    g.antidote_done = False
+    g.antidote_skipped = set()
+    g.kp_vote_panel_mid = None
+    store.save(chat_id)
+    # ⚠️ هیچ‌کدام از این‌ها نباید جلوی بازشدنِ اکت‌های شب را بگیرد
+    try:
+        await _kp_check_heir_inherit(ctx, g)   # وارث ممکن است عطار جدید شود
+    except Exception as e:
+        print("⚠️ heir inherit err:", e)
+    try:
+        await publish_seating(ctx, chat_id, g, mode=CTRL)
+    except Exception:
+        pass
+    await _kp_open_don(ctx, chat_id, g)     # حالا شبِ عادی باز می‌شود
@@ -0,0 +1,620 @@
+# 🧩 بدنه‌ی موتورِ سناریو «میتیک»
+# این فایل import نمی‌شود: mafia_bot._engine_load آن را (با اولین صدا زدنِ یکی از
+# توابعش) داخلِ فضای نامِ mafia_bot اجرا می‌کند؛ ثابت‌ها، _R_*ها و کمک‌تابع‌های
+# مشترک از همان‌جا دیده می‌شوند. ثبتِ callbackها و جانشین‌ها در mafia_bot است.
+from __future__ import annotations
+
+
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «میتیک» (۱۲ نفره)
+#  شب: اول شاتِ مافیا (+ کانسورت) → بعد اکت‌های شهروندی، بدون اولویت
+# ═════════════════════════════════════════════════════════════
+def _my_rn(x) -> str:
+    """نرمالِ نقش برای میتیک — بی‌اعتنا به فاصله و نیم‌فاصله («شهرساده» == «شهر ساده»)."""
+    return _nz(x or "").replace(" ", "").replace("‌", "")
+
+
+def _my_seat(g, role, alive_only=True):
+    """صندلیِ یک نقش: اول تطبیقِ دقیق، بعد جزئی (تحملِ اسم‌های تزئین‌شده)."""
+    want = _my_rn(role)
+    seats = _alive_seats(g) if alive_only else sorted(g.seats)
+    for s in seats:
+        if _my_rn((g.assigned_roles or {}).get(s, "")) == want:
+            return s
+    for s in seats:
+        if want and want in _my_rn((g.assigned_roles or {}).get(s, "")):
+            return s
+    return None
+
+
+def _my_role_is(g, seat, role) -> bool:
+    return _my_rn((g.assigned_roles or {}).get(seat, "")) == _my_rn(role)
+
+
+def _my_burned(g, seat) -> bool:
+    return seat is not None and seat in (getattr(g, "night_burned", set()) or set())
+
+
+def _my_has_act(g, seat) -> bool:
+    """آیا این صندلی اصلاً اکتِ شبانه دارد؟ (برای پیامِ «کانسورتی شدی»)"""
+    return any(_my_role_is(g, seat, r) for r in
+               (_R_MY_GF, _R_MY_NINJA, _R_MY_CONSORT,
+                _R_MY_BODY, _R_MY_SNIPER, _R_MY_DOC, _R_MY_DET))
+
+
+def _my_yesno(yes_cb, no_cb, no_text="🚫 امشب اکت نمی‌زنم"):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ بله", callback_data=yes_cb)],
+        [InlineKeyboardButton(no_text, callback_data=no_cb)],
+    ])
+
+
+async def _my_prompt(ctx, g, seat, key, text, kb=None):
+    """پرامپتِ اکت + ثبت در فهرستِ انتظار. اکتِ سوخته همان‌جا «انجام‌شده» علامت می‌خورد."""
+    if seat is None or _my_burned(g, seat):
+        g.night_done.add(key)
+        store.save(_game_chat_id(g))
+        return None
+    uid = g.seats[seat][0]
+    m = await _safe_pm(ctx, uid, text, kb)
+    if m:
+        g.night_pm_msgs[uid] = m.message_id
+    g.my_expected.add(key)
+    store.save(_game_chat_id(g))
+    return m
+
+
+async def _my_consort_notice(ctx, g, seat):
+    """🎭 هدفِ کانسورت — اگر اکت‌دار باشد، در پیویش خبر می‌گیرد."""
+    if seat is None or seat not in g.seats or not _my_has_act(g, seat):
+        return
+    try:
+        await ctx.bot.send_message(g.seats[seat][0],
+                                   "🎭 شما کانسورتی شدید و امشب حق اکت ندارید.")
+    except Exception:
+        pass
+
+
+def _my_both_acts(g) -> bool:
+    """🔫+🎭 هر دو اکت فقط وقتی هر سهِ رئیس/کانسورت/نینجا در بازی‌اند."""
+    return all(_my_seat(g, r) is not None
+               for r in (_R_MY_GF, _R_MY_CONSORT, _R_MY_NINJA))
+
+
+def _my_doc_targets(g, doc_seat):
+    """💉 دکتر: خودش فقط یک‌بار در کلِ بازی، بقیه بی‌نهایت."""
+    return [s for s in _alive_seats(g)
+            if s != doc_seat or not getattr(g, "my_doc_self_used", False)]
+
+
+def _my_bg_targets(g, bg_seat):
+    """🛡 بادیگارد: خودش فقط یک‌بار در کلِ بازی، بقیه بی‌نهایت."""
+    return [s for s in _alive_seats(g)
+            if s != bg_seat or not getattr(g, "my_bg_self_used", False)]
+
+
+def _my_detective_positive(g, seat) -> bool:
+    """🔎 استعلام: گادفادر منفی؛ نینجا/کانسورت/تروریست مثبت؛ شهروندها منفی."""
+    return any(_my_role_is(g, seat, r)
+               for r in (_R_MY_NINJA, _R_MY_CONSORT, _R_MY_TERROR))
+
+
+# ── شبِ میتیک: مرحلهٔ ۱ — تیمِ مافیا ────────────────────────────
+async def _my_start(ctx, chat_id, g):
+    await _my_open_mafia(ctx, chat_id, g)
+
+
+async def _my_ask_shot(ctx, g, decider):
+    await _my_prompt(ctx, g, decider, "shot",
+                     "🔫 می‌خواهی امشب شات بزنی؟",
+                     _my_yesno("my_sh_yes", "my_sh_no", "🚫 امشب شات نمی‌زنم"))
+
+
+async def _my_ask_consort(ctx, g, co):
+    await _my_prompt(ctx, g, co, "consort",
+                     "🎭 می‌خواهی امشب کسی را کانسورتی کنی؟",
+                     _my_yesno("my_co_yes", "my_co_no"))
+
+
+async def _my_open_mafia(ctx, chat_id, g):
+    if "mafia_opened" in g.night_done:
+        return
+    g.night_done.add("mafia_opened")
+    gf = _my_seat(g, _R_MY_GF)
+    co = _my_seat(g, _R_MY_CONSORT)
+    nj = _my_seat(g, _R_MY_NINJA)
+    decider = gf or co or nj          # 🔫 وراثتِ شات: گادفادر → کانسورت → نینجا
+    g.my_decider_seat = decider
+    store.save(chat_id)
+
+    if decider is None:
+        g.night_done.update({"shot", "consort"})
+    elif _my_both_acts(g):
+        # هر سه در بازی‌اند → هم شات، هم کانسورت
+        await _my_ask_shot(ctx, g, decider)
+        await _my_ask_consort(ctx, g, co)
+    elif co is not None:
+        # فقط یکی از دو اکت — تصمیم با تصمیم‌گیرندهٔ تیم
+        await _my_prompt(
+            ctx, g, decider, "mchoice",
+            "🎭 امشب فقط یکی از این دو را دارید — کدام؟",
+            InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔫 شات", callback_data="my_ch_shot"),
+                InlineKeyboardButton("🎭 کانسورت", callback_data="my_ch_co")]]))
+        if "mchoice" in g.night_done:       # سوخته بود → هیچ اکتی نیست
+            g.night_done.update({"shot", "consort"})
+    else:
+        g.night_done.add("consort")         # کانسورتی در بازی نمانده
+        await _my_ask_shot(ctx, g, decider)
+    store.save(chat_id)
+    await _my_check_open_citizens(ctx, chat_id, g)
+
+
+def _my_will_kb(g):
+    rows = [[InlineKeyboardButton("📖 وصیت باز", callback_data="my_w_open")]]
+    # 🔒 وصیتِ بسته: یک‌بار در کلِ بازی و فقط تا وقتی رئیس در بازی است
+    if not getattr(g, "my_will_closed_used", False) and _my_seat(g, _R_MY_GF) is not None:
+        rows.append([InlineKeyboardButton("🔒 وصیت بسته", callback_data="my_w_closed")])
+    return InlineKeyboardMarkup(rows)
+
+
+# ── شبِ میتیک: مرحلهٔ ۲ — شهروندان (بدون اولویت) ────────────────
+async def _my_check_open_citizens(ctx, chat_id, g):
+    if "citizens_opened" in g.night_done:
+        return
+    if not ({"shot", "consort"} <= (g.night_done or set())):
+        return
+    g.night_done.add("citizens_opened")
+    store.save(chat_id)
+
+    ct = getattr(g, "my_consort_target", None)
+    for role, key, text in (
+        (_R_MY_DOC,  "doctor",    "💉 می‌خواهی امشب سیو بدهی؟"),
+        (_R_MY_BODY, "bodyguard", "🛡 می‌خواهی امشب از کسی محافظت کنی؟"),
+        (_R_MY_DET,  "detective", "🔎 می‌خواهی امشب استعلام بگیری؟"),
+    ):
+        s = _my_seat(g, role)
+        if s is None:
+            g.night_done.add(key)
+            continue
+        if s == ct:
+            await _my_consort_notice(ctx, g, s)
+            g.night_done.add(key)
+            continue
+        yes, no = {"doctor": ("my_dc_yes", "my_dc_no"),
+                   "bodyguard": ("my_bg_yes", "my_bg_no"),
+                   "detective": ("my_dt_yes", "my_dt_no")}[key]
+        await _my_prompt(ctx, g, s, key, text, _my_yesno(yes, no))
+
+    # 🎯 اسنایپر
+    sn = _my_seat(g, _R_MY_SNIPER)
+    if sn is None:
+        g.night_done.add("sniper")
+    elif getattr(g, "my_sniper_suicide_night", None) == g.night_number:
+        # ⚰️ شبِ خودکشی — نه اکتی دارد، نه انتخابی
+        g.night_done.add("sniper")
+        try:
+            await ctx.bot.send_message(
+                g.seats[sn][0],
+                "⚰️ تو شب گذشته یک شهروند را زدی — امشب خودکشی می‌کنی.\n"
+                "امشب حقِ اکت نداری.")
+        except Exception:
+            pass
+        await _night_report(ctx, g, f"⚰️ اسنایپر ({sn}) امشب خودکشی می‌کند.")
+    elif int(getattr(g, "my_sniper_shots", 0) or 0) >= 2:
+        g.night_done.add("sniper")
+    elif sn == ct:
+        await _my_consort_notice(ctx, g, sn)
+        g.night_done.add("sniper")
+    else:
+        await _my_prompt(ctx, g, sn, "sniper", "🎯 می‌خواهی امشب شلیک کنی؟",
+                         _my_yesno("my_sn_yes", "my_sn_no", "🚫 امشب شلیک نمی‌کنم"))
+    store.save(chat_id)
+
+
+# ── حلِ شبِ میتیک ──────────────────────────────────────────────
+async def _resolve_mythic(ctx, chat_id, g):
+    dead, reasons = set(), {}
+    gf = _my_seat(g, _R_MY_GF)
+    co = _my_seat(g, _R_MY_CONSORT)
+    nj = _my_seat(g, _R_MY_NINJA)
+    bg = _my_seat(g, _R_MY_BODY)
+    sn = _my_seat(g, _R_MY_SNIPER)
+    doc_saved = set(g.night_doc_saved or [])
+    bgs = getattr(g, "my_bg_save", None)
+    bg_self = (bg is not None and bgs == bg)
+    notes = []           # 📣 اعلانِ عمومیِ روزِ بعد (میتیک علت را عمومی می‌گوید)
+
+    def _nm(s):
+        return f"{s}. {escape(g.seats[s][1], quote=False)}"
+
+    # 🔫 شاتِ مافیا
+    st = getattr(g, "night_shot_target", None)
+    will = getattr(g, "my_shot_will", None)
+    will_txt = " با وصیت بسته" if will == "closed" else " با وصیت باز"
+    if st and st in g.seats and st not in (g.striked or set()):
+        if st in doc_saved:
+            await _night_report(ctx, g, f"💉 سیوِ دکتر جلوی شاتِ مافیا روی {st} را گرفت.")
+        elif bgs == st:
+            if bg_self or nj is not None:
+                # 🛡 سیوِ خودیِ بادیگارد، یا نینجای زنده → دقیقاً مثل سیوِ دکتر
+                await _night_report(
+                    ctx, g,
+                    f"🛡 سیوِ بادیگارد جلوی شاتِ مافیا روی {st} را گرفت "
+                    + ("(سیوِ خودش — درگیری ندارد)." if bg_self else "(نینجا در بازی است)."))
+            else:
+                foe = co if co is not None else gf
+                dead.add(bg); reasons[bg] = "شات مافیا"
+                notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(bg)}</b> — به شات مافیا")
+                if foe is not None:
+                    dead.add(foe); reasons[foe] = "اکت بادیگارد"
+                    notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(foe)}</b> — به اکت بادیگارد")
+        else:
+            dead.add(st); reasons[st] = "شات مافیا" + will_txt
+            notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(st)}</b> — به شات مافیا{will_txt}")
+            if will == "closed":
+                g.my_will_closed_used = True
+            g.my_wills[st] = will or "open"
+
+    # 🎯 شاتِ اسنایپر
+    snt = getattr(g, "my_sniper_target", None)
+    if snt and snt in g.seats and snt not in (g.striked or set()):
+        if gf is not None and snt == gf:
+            # 🎯 گادفادر با شاتِ اسنایپر نمی‌میرد. تیر مصرف می‌شود ولی چون
+            #    مافیا زده، خودکشی‌ای در کار نیست و شبِ بعد باز می‌تواند بزند.
+            await _night_report(
+                ctx, g, "🎯 اسنایپر گادفادر را زد — گادفادر نمی‌میرد و اسنایپر هم خودکشی ندارد.")
+        elif snt in doc_saved:
+            await _night_report(ctx, g, f"💉 سیوِ دکتر جلوی شاتِ اسنایپر روی {snt} را گرفت — خودکشی هم منتفی شد.")
+        elif bgs == snt and bg_self:
+            await _night_report(ctx, g, "🛡 بادیگارد خودش را سیو کرد — با اسنایپر درگیر نشد.")
+        elif bgs == snt:
+            # ⚔️ درگیریِ بادیگارد و اسنایپر — بدونِ شرطِ نینجا
+            if bg is not None and bg not in dead:
+                dead.add(bg); reasons[bg] = "شات اسنایپر"
+                notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(bg)}</b> — به شات اسنایپر")
+            if sn is not None and sn not in dead:
+                dead.add(sn); reasons[sn] = "اکت بادیگارد"
+                notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(sn)}</b> — به اکت بادیگارد")
+        else:
+            dead.add(snt); reasons[snt] = "شات اسنایپر"
+            notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(snt)}</b> — به شات اسنایپر (وصیت دارد)")
+            if snt not in _mafia_seats(g) and sn is not None and sn not in dead:
+                # 🎯 شهروند زد → شبِ بعد خودکشی
+                g.my_sniper_suicide_night = (g.night_number or 0) + 1
+                await _night_report(ctx, g, "🎯 اسنایپر شهروند زد — شبِ بعد خودکشی می‌کند.")
+
+    # ⚰️ خودکشیِ اسنایپر (شبی که برایش تعیین شده بود)
+    if (getattr(g, "my_sniper_suicide_night", None) == g.night_number
+            and sn is not None and sn not in dead):
+        dead.add(sn); reasons[sn] = "خودکشیِ اسنایپر"
+        notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(sn)}</b> — خودکشیِ اسنایپر")
+
+    _add_night_kick(g, dead, reasons)
+    store.save(chat_id)
+    await _apply_deaths(ctx, chat_id, g, dead, reasons)
+
+    # 📣 میتیک علتِ خروج را عمومی اعلام می‌کند
+    if notes:
+        try:
+            await ctx.bot.send_message(chat_id, "\n".join(notes), parse_mode="HTML")
+        except Exception:
+            pass
+
+
+# 🔀 مسیر در mafia_bot: callback_route('my_', after=_after_night_act)
+async def handle_mythic_callback(update, ctx):
+    q = update.callback_query
+    data = q.data
+    uid = _q_uid(q)   # 🎛 اکتِ دستیِ گاد
+
+    g, chat_id = _find_active_night_game(uid, q)
+    if g is None:
+        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
+        return
+    await safe_q_answer(q)
+    mid = q.message.message_id if q.message else None
+    me = _seat_of_uid(g, uid)
+
+    # ── انتخابِ «شات یا کانسورت» وقتی فقط یکی مجاز است ──
+    if data in ("my_ch_shot", "my_ch_co"):
+        if "mchoice" in g.night_done:
+            return
+        g.night_done.add("mchoice")
+        co = _my_seat(g, _R_MY_CONSORT)
+        if data == "my_ch_shot":
+            g.night_done.add("consort")
+            store.save(chat_id)
+            await _close_pm(ctx, uid, mid, "🔫 شات انتخاب شد.")
+            await _night_report(ctx, g, "🎭 تیمِ مافیا: شات را انتخاب کرد.")
+            await _my_ask_shot(ctx, g, g.my_decider_seat)
+        else:
+            g.night_done.add("shot")
+            store.save(chat_id)
+            await _close_pm(ctx, uid, mid, "🎭 کانسورت انتخاب شد.")
+            await _night_report(ctx, g, "🎭 تیمِ مافیا: کانسورت را انتخاب کرد.")
+            await _my_ask_consort(ctx, g, co)
+        await _my_check_open_citizens(ctx, chat_id, g)
+        return
+
+    # ── شاتِ مافیا ──
+    if data == "my_sh_no":
+        await _close_pm(ctx, uid, mid, "🚫 امشب شات نزدی.")
+        await _night_report(ctx, g, "🔫 مافیا → شات نزد")
+        g.night_done.add("shot")
+        store.save(chat_id)
+        await _my_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data == "my_sh_yes":
+        await _edit_pm(ctx, uid, mid, "📜 شات با وصیتِ باز باشد یا بسته؟", _my_will_kb(g))
+        return
+
+    if data in ("my_w_open", "my_w_closed"):
+        g.my_shot_will = "closed" if data == "my_w_closed" else "open"
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_night_seats(list(_alive_seats(g)), g, "my_st_",
+                                       confirm_cb="my_st_ok"))
+        return
+
+    if data == "my_st_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_shot_target = s
+        g.night_sel.pop(uid, None)
+        _tn = g.seats[s][1]
+        _w = "بسته" if g.my_shot_will == "closed" else "باز"
+        await _room_announce_shot(ctx, g, s, f" — وصیت {_w}")
+        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {_tn} (وصیت {_w})")
+        await _night_report(ctx, g,
+                            f"🔫 شلیک مافیا → <b>{s}. {escape(_tn, quote=False)}</b> (وصیت {_w})")
+        g.night_done.add("shot")
+        store.save(chat_id)
+        await _my_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data.startswith("my_st_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_night_seats(list(_alive_seats(g)), g, "my_st_",
+                                       selected=s, confirm_cb="my_st_ok"))
+        return
+
+    # ── کانسورت ──
+    if data == "my_co_no":
+        await _close_pm(ctx, uid, mid, "🚫 امشب کسی را کانسورتی نکردی.")
+        await _night_report(ctx, g, "🎭 کانسورت → اکت نزد")
+        g.night_done.add("consort")
+        store.save(chat_id)
+        await _my_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data == "my_co_yes":
+        # 🎭 هم‌تیمی مجاز است، خودش نه
+        targets = [s for s in _alive_seats(g) if s != me]
+        await _edit_pm(ctx, uid, mid, "🎭 چه کسی را کانسورتی می‌کنی؟",
+                       _kb_night_seats(targets, g, "my_ct_", confirm_cb="my_ct_ok"))
+        return
+
+    if data == "my_ct_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.my_consort_target = s
+        g.night_sel.pop(uid, None)
+        await _room_note(ctx, g, f"🎭 کانسورتی روی <b>{_room_who(g, s)}</b>")
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"🎭 کانسورت ثبت شد: {s}. {_tn}")
+        await _night_report(ctx, g, f"🎭 کانسورت → <b>{s}. {escape(_tn, quote=False)}</b>")
+        g.night_done.add("consort")
+        store.save(chat_id)
+        await _my_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data.startswith("my_ct_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x != me]
+        await _edit_pm(ctx, uid, mid, "🎭 چه کسی را کانسورتی می‌کنی؟",
+                       _kb_night_seats(targets, g, "my_ct_", selected=s, confirm_cb="my_ct_ok"))
+        return
+
+    # ── دکتر ──
+    if data == "my_dc_no":
+        await _close_pm(ctx, uid, mid, "🚫 امشب سیو ندادی.")
+        await _night_report(ctx, g, "💉 دکتر → سیو نداد")
+        g.night_done.add("doctor")
+        store.save(chat_id)
+        return
+
+    if data == "my_dc_yes":
+        await _edit_pm(ctx, uid, mid, "💉 چه کسی را سیو می‌دهی؟",
+                       _kb_night_seats(_my_doc_targets(g, me), g, "my_dt2_",
+                                       confirm_cb="my_dt2_ok"))
+        return
+
+    if data == "my_dt2_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        if s == me:
+            g.my_doc_self_used = True
+        g.night_doc_saved = [s]
+        g.night_sel.pop(uid, None)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {s}. {_tn}")
+        await _night_report(ctx, g, f"💉 دکتر → سیو: <b>{s}. {escape(_tn, quote=False)}</b>")
+        g.night_done.add("doctor")
+        store.save(chat_id)
+        return
+
+    if data.startswith("my_dt2_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "💉 چه کسی را سیو می‌دهی؟",
+                       _kb_night_seats(_my_doc_targets(g, me), g, "my_dt2_",
+                                       selected=s, confirm_cb="my_dt2_ok"))
+        return
+
+    # ── بادیگارد ──
+    if data == "my_bg_no":
+        await _close_pm(ctx, uid, mid, "🚫 امشب محافظت نکردی.")
+        await _night_report(ctx, g, "🛡 بادیگارد → اکت نزد")
+        g.night_done.add("bodyguard")
+        store.save(chat_id)
+        return
+
+    if data == "my_bg_yes":
+        await _edit_pm(ctx, uid, mid, "🛡 از چه کسی محافظت می‌کنی؟",
+                       _kb_night_seats(_my_bg_targets(g, me), g, "my_bgt_",
+                                       confirm_cb="my_bgt_ok"))
+        return
+
+    if data == "my_bgt_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        if s == me:
+            g.my_bg_self_used = True
+        g.my_bg_save = s
+        g.night_sel.pop(uid, None)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"🛡 محافظت ثبت شد: {s}. {_tn}")
+        await _night_report(ctx, g, f"🛡 بادیگارد → محافظت از <b>{s}. {escape(_tn, quote=False)}</b>")
+        g.night_done.add("bodyguard")
+        store.save(chat_id)
+        return
+
+    if data.startswith("my_bgt_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "🛡 از چه کسی محافظت می‌کنی؟",
+                       _kb_night_seats(_my_bg_targets(g, me), g, "my_bgt_",
+                                       selected=s, confirm_cb="my_bgt_ok"))
+        return
+
+    # ── کاراگاه ──
+    if data == "my_dt_no":
+        await _close_pm(ctx, uid, mid, "🚫 امشب استعلام نگرفتی.")
+        await _night_report(ctx, g, "🔎 کاراگاه → استعلام نگرفت")
+        g.night_done.add("detective")
+        store.save(chat_id)
+        return
+
+    if data == "my_dt_yes":
+        targets = [s for s in _alive_seats(g) if s != me]
+        await _edit_pm(ctx, uid, mid, "🔎 از چه کسی استعلام می‌گیری؟",
+                       _kb_night_seats(targets, g, "my_dtt_", confirm_cb="my_dtt_ok"))
+        return
+
+    if data == "my_dtt_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_sel.pop(uid, None)
+        pos = _my_detective_positive(g, s)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid,
+                        f"🔎 {s}. {_tn} → " + ("مثبت ✅" if pos else "منفی ❌"))
+        await _night_report(ctx, g, f"🔎 کاراگاه → {s}. {escape(_tn, quote=False)}: "
+                            + ("مثبت" if pos else "منفی"))
+        g.night_done.add("detective")
+        store.save(chat_id)
+        return
+
+    if data.startswith("my_dtt_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x != me]
+        await _edit_pm(ctx, uid, mid, "🔎 از چه کسی استعلام می‌گیری؟",
+                       _kb_night_seats(targets, g, "my_dtt_", selected=s, confirm_cb="my_dtt_ok"))
+        return
+
+    # ── اسنایپر ──
+    if data == "my_sn_no":
+        await _close_pm(ctx, uid, mid, "🚫 امشب شلیک نکردی.")
+        await _night_report(ctx, g, "🎯 اسنایپر → شلیک نکرد")
+        g.night_done.add("sniper")
+        store.save(chat_id)
+        return
+
+    if data == "my_sn_yes":
+        targets = [s for s in _alive_seats(g) if s != me]
+        await _edit_pm(ctx, uid, mid, "🎯 به چه کسی شلیک می‌کنی؟",
+                       _kb_night_seats(targets, g, "my_snt_", confirm_cb="my_snt_ok"))
+        return
+
+    if data == "my_snt_ok":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.my_sniper_target = s
+        g.my_sniper_shots = int(getattr(g, "my_sniper_shots", 0) or 0) + 1
+        g.night_sel.pop(uid, None)
+        _tn = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"🎯 شلیک ثبت شد: {s}. {_tn}")
+        await _night_report(ctx, g, f"🎯 اسنایپر → شلیک به <b>{s}. {escape(_tn, quote=False)}</b> "
+                            f"(تیرِ {g.my_sniper_shots} از ۲)")
+        g.night_done.add("sniper")
+        store.save(chat_id)
+        return
+
+    if data.startswith("my_snt_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x != me]
+        await _edit_pm(ctx, uid, mid, "🎯 به چه کسی شلیک می‌کنی؟",
+                       _kb_night_seats(targets, g, "my_snt_", selected=s, confirm_cb="my_snt_ok"))
+        return
+
+
+# ── 💣 ترورِ روز ────────────────────────────────────────────────
+async def _my_terror_start(ctx, chat_id, g, seat):
+    """💣 تروریست در روز «ترور» یا 💣 نوشت → سؤال کفِ گروه."""
+    g.my_terror_asking = True
+    store.save(chat_id)
+    await ctx.bot.send_message(
+        chat_id,
+        f"💣 <b>ترور!</b>\n{seat}. {escape(g.seats[seat][1], quote=False)} "
+        "چه کسی را با خودش می‌برد؟ فقط عدد بنویس.",
+        parse_mode="HTML")
+
+
+async def _my_terror_apply(ctx, chat_id, g, seat, target):
+    """💣 اجرای ترور — همان لحظه در روز، با اعلامِ عمومی."""
+    g.my_terror_asking = False
+    g.my_terror_used = True
+    dead = {seat}
+    lines = [f"💣 <b>{seat}. {escape(g.seats[seat][1], quote=False)}</b> خودش را منفجر کرد."]
+    if _my_role_is(g, target, _R_MY_SIMPLE):
+        lines.append(f"🤷 شهرِ ساده بود — دست خالی می‌روی. "
+                     f"{target}. {escape(g.seats[target][1], quote=False)} در بازی می‌ماند.")
+    else:
+        dead.add(target)
+        lines.append(f"🕊 خداحافظی می‌کنیم با <b>{target}. "
+                     f"{escape(g.seats[target][1], quote=False)}</b> — وصیت ندارد.")
+    for s in dead:
+        g.striked.add(s)
+    store.save(chat_id)
+    await ctx.bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML")
+    await _night_report(ctx, g, f"💣 ترور: {seat} → {target} | خارج‌شده‌ها: {sorted(dead)}")
+    try:
+        await publish_seating(ctx, chat_id, g, mode=CTRL)
+    except Exception:
+        pass
+    await _check_auto_end(ctx, chat_id, g)
@@ -0,0 +1,688 @@
+# 🧩 بدنه‌ی موتورِ سناریو «نماینده»
+# این فایل import نمی‌شود: mafia_bot._engine_load آن را (با اولین صدا زدنِ یکی از
+# توابعش) داخلِ فضای نامِ mafia_bot اجرا می‌کند؛ ثابت‌ها، _R_*ها و کمک‌تابع‌های
+# مشترک از همان‌جا دیده می‌شوند. ثبتِ callbackها و جانشین‌ها در mafia_bot است.
+from __future__ import annotations
+
+
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «نماینده»
+#  ترتیب اکت: مین‌گذار → (دن‌مافیا + هکر) → (وکیل/محافظ/پزشک/راهنما)
+# ═════════════════════════════════════════════════════════════
+# ── 💣 یاغیِ روز (نماینده) ──────────────────────────────────────
+def _nem_yaghi_unlocked(g) -> bool:
+    """💣 یاغی فقط وقتی می‌تواند که تیمِ سه‌نفره‌شان کامل نمانده باشد —
+    یعنی دن‌مافیا یا هکر به هر نحوی از بازی خارج شده باشد."""
+    for r in (_R_DON, _R_HACKER):
+        s = _find_seat_by_role(g, r, alive_only=False)
+        if s is not None and s in (g.striked or set()):
+            return True
+    return False
+
+
+async def _nem_yaghi_start(ctx, chat_id, g, seat):
+    """💣 «یاغی» یا 💣 کفِ گروه → تأیید و سؤالِ عدد."""
+    g.nem_yaghi_asking = True
+    store.save(chat_id)
+    await ctx.bot.send_message(
+        chat_id,
+        f"💣 <b>یاغی!</b>\n{seat}. {escape(g.seats[seat][1], quote=False)} — "
+        "چه کسی را با خودت می‌بری؟ فقط عدد بنویس.",
+        parse_mode="HTML")
+
+
+async def _nem_yaghi_apply(ctx, chat_id, g, seat, target):
+    """💣 اجرا: محافظ یا محافظت‌شده‌ی شبِ قبل → دست خالی؛ وگرنه هر دو خارج.
+    بدونِ وصیت، و بلافاصله شب باز می‌شود (گاد دکمهٔ شب را نمی‌زند)."""
+    g.nem_yaghi_asking = False
+    g.nem_yaghi_used = True
+    grd = _find_seat_by_role(g, _R_GUARD, alive_only=False)
+    prot = getattr(g, "nem_guard_target", None)
+    empty = ((grd is not None and target == grd)
+             or (prot is not None and target == prot))
+
+    me = f"{seat}. {escape(g.seats[seat][1], quote=False)}"
+    dead = {seat}
+    if empty:
+        lines = ["💣 <b>یاغی دست خالی می‌رود.</b>",
+                 f"🕊 {me} از بازی خارج شد."]
+    else:
+        dead.add(target)
+        nm_t = escape(g.seats[target][1], quote=False) if target in g.seats else "؟"
+        lines = [f"💣 <b>{target}. {nm_t}</b> با یاغی از بازی خارج شد — وصیت ندارد.",
+                 f"🕊 {me} هم از بازی خارج شد."]
+    for s in dead:
+        g.striked.add(s)
+    store.save(chat_id)
+    await ctx.bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML")
+    await _night_report(ctx, g, f"💣 یاغی: {seat} → {target} | "
+                        + ("دست خالی (محافظ/محافظت‌شده)" if empty else "هر دو خارج"))
+    try:
+        await publish_seating(ctx, chat_id, g, mode=CTRL)
+    except Exception:
+        pass
+    await _check_auto_end(ctx, chat_id, g)
+    await start_night(ctx, chat_id, g)   # 🌙 شبِ خودکار
+
+
+def _nem_guide_positive(g, seat) -> bool:
+    # استعلام راهنما: یاغی و هکر مثبت
+    return _seat_role_norm(g, seat) in (_R_YAGHI, _R_HACKER)
+
+
+def _nem_mine_kb(g, targets, selected=None):
+    kb = _kb_night_seats(targets, g, "nem_mine_", selected=selected, confirm_cb="nem_mine_confirm")
+    rows = list(kb.inline_keyboard) + [
+        [InlineKeyboardButton("⏭ امشب نه (بعداً)", callback_data="nem_mine_skip")]
+    ]
+    return InlineKeyboardMarkup(rows)
+
+
+async def _nem_open_mine(ctx, chat_id, g):
+    if g.mine_seat is not None:
+        g.night_done.add("mine")
+        store.save(chat_id)
+        await _nem_open_mafia(ctx, chat_id, g)
+        return
+    m_seat = _find_seat_by_role(g, _R_MINER)
+    if not m_seat:
+        g.night_done.add("mine")
+        store.save(chat_id)
+        await _nem_open_mafia(ctx, chat_id, g)
+        return
+    muid = g.seats[m_seat][0]
+    targets = [s for s in _alive_seats(g) if s != m_seat]
+    m = await _safe_pm(ctx, muid, "💣 جلوی چه کسی مین می‌گذاری؟ (تا آخر بازی می‌ماند)",
+                       _nem_mine_kb(g, targets, selected=g.night_sel.get(muid)))
+    if m:
+        g.night_pm_msgs[muid] = m.message_id
+    store.save(chat_id)
+
+
+async def _nem_open_mafia(ctx, chat_id, g):
+    # تصمیم‌گیرندهٔ مافیا: دن‌مافیا → یاغی → هکر
+    don_alive = _find_seat_by_role(g, _R_DON)
+    yaghi_alive = _find_seat_by_role(g, _R_YAGHI)
+    hacker_alive = _find_seat_by_role(g, _R_HACKER)
+    decider = don_alive or yaghi_alive or hacker_alive
+    if not decider:
+        # 🤝 اگر مافیای اصلی نمانده، جذب‌شده (مذاکره/یاکوزایی/خریداری) صاحبِ شات می‌شود
+        converted = sorted(_mafia_seats(g, alive_only=True))
+        decider = converted[0] if converted else None
+    if not decider:
+        g.night_done.add("mafia")
+    else:
+        g.nem_decider_seat = decider
+        duid = g.seats[decider][0]
+        rows = [[InlineKeyboardButton("🔫 شات", callback_data="nem_don_shot")]]
+        # ناتویی فقط وقتی دن‌مافیا زنده است (اکت خودِ دن‌مافیاست) و مصرف نشده
+        if don_alive is not None and not g.nato_used:
+            rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="nem_don_nato")])
+        m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:",
+                           InlineKeyboardMarkup(rows))
+        if m:
+            g.night_pm_msgs[duid] = m.message_id
+
+    # هکر (مرحله ۱: انتخاب فاعلِ اکت)
+    hk = _find_seat_by_role(g, _R_HACKER)
+    if not hk:
+        g.night_done.add("hacker")
+    else:
+        huid = g.seats[hk][0]
+        targets = [s for s in _alive_seats(g) if s != hk]   # خودش نباشد
+        m = await _safe_pm(ctx, huid, "💻 اکتِ چه کسی را هک می‌کنی؟ (مرحلهٔ ۱: فاعل)",
+                           _kb_night_seats(targets, g, "nem_hka_",
+                                           selected=g.night_sel.get(huid), confirm_cb="nem_hka_confirm"))
+        if m:
+            g.night_pm_msgs[huid] = m.message_id
+    store.save(chat_id)
+    await _nem_check_open_rest(ctx, chat_id, g)
+
+
+async def _nem_check_open_rest(ctx, chat_id, g):
+    if g.night_rest_opened:
+        return
+    if "mafia" not in g.night_done or "hacker" not in g.night_done:
+        return
+    g.night_rest_opened = True
+    store.save(chat_id)
+
+    # 🧑‍⚖️ وکیل (یکبار در بازی)
+    if not g.lawyer_used:
+        law = _find_seat_role_sub(g, _R_LAWYER)
+        if law:
+            luid = g.seats[law][0]
+            kb = InlineKeyboardMarkup([
+                [InlineKeyboardButton("✅ بله", callback_data="nem_law_yes")],
+                [InlineKeyboardButton("🚫 خیر", callback_data="nem_law_no")],
+            ])
+            m = await _safe_pm(ctx, luid, "🧑‍⚖️ امشب وکالت کسی را می‌گیری؟", kb)
+            if m:
+                g.night_pm_msgs[luid] = m.message_id
+
+    # 🛡 محافظ (هر شب)
+    grd = _find_seat_by_role(g, _R_GUARD)
+    if grd:
+        guid = g.seats[grd][0]
+        targets = [s for s in _alive_seats(g) if s != grd]
+        m = await _safe_pm(ctx, guid, "🛡 از چه کسی محافظت می‌کنی؟",
+                           _kb_night_seats(targets, g, "nem_grd_", confirm_cb="nem_grd_confirm"))
+        if m:
+            g.night_pm_msgs[guid] = m.message_id
+
+    # 💉 پزشک — در شب ناتویی استراحت
+    if not g.night_doctor_blocked:
+        doc = _find_seat_by_role(g, _R_DOCTOR)
+        if doc:
+            duid = g.seats[doc][0]
+            g.night_doc_need = 1
+            targets = _doctor_targets(g, doc)
+            m = await _safe_pm(ctx, duid, "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
+                               _kb_night_seats(targets, g, "nem_doc_", selected=set(),
+                                               confirm_cb="nem_doc_confirm"))
+            if m:
+                g.night_pm_msgs[duid] = m.message_id
+
+    # 🧭 راهنما (آخرین اکت)
+    gd = _find_seat_by_role(g, _R_GUIDE)
+    if gd:
+        gduid = g.seats[gd][0]
+        targets = [s for s in _alive_seats(g) if s != gd and s != g.guide_last_target]
+        m = await _safe_pm(ctx, gduid, "🧭 به چه کسی راهنمایی می‌دهی؟",
+                           _kb_night_seats(targets, g, "nem_guide_", confirm_cb="nem_guide_confirm"))
+        if m:
+            g.night_pm_msgs[gduid] = m.message_id
+    store.save(chat_id)
+    # ⏳ نگهبانِ مین: هر ۳ ثانیه چک می‌کند و فقط وقتی «همه‌ی اکت‌ها» تمام شد اعلام می‌کند
+    asyncio.create_task(_nem_mine_watch(ctx, chat_id, g))
+
+
+async def _nem_mine_watch(ctx, chat_id, g, timeout=1800):
+    """💥 تا وقتی همه‌ی اکت‌های شب تمام نشده، اعلامِ مین را نگه می‌دارد."""
+    try:
+        for _ in range(timeout // 3):
+            if getattr(g, "night_mine_handled", False) or not getattr(g, "night_active", False):
+                return
+            if _night_all_done(g):
+                await _nem_trigger_mine(ctx, chat_id, g)
+                return
+            await asyncio.sleep(3)
+    except Exception as e:
+        print("⚠️ mine watch err:", e)
+
+
+async def _nem_trigger_mine(ctx, chat_id, g):
+    """فقط بعد از تمام‌شدنِ همه‌ی اکت‌ها: اگر مین فعال شده باشد، به همه اعلام و از دن‌مافیا فدا می‌خواهد."""
+    if getattr(g, "night_mine_handled", False):
+        return
+    if not _night_all_done(g):
+        return   # ⏳ هنوز اکتی باز است — نگهبانِ مین بعداً دوباره صدا می‌زند
+    target = None
+    if g.night_don_act == "shot":
+        target = g.night_shot_target
+    elif g.night_don_act == "nato":
+        target = g.night_nato_seat
+    mine_hit = (target is not None and g.mine_seat is not None
+                and target == g.mine_seat and not g.night_don_defuse)
+    if not mine_hit:
+        return
+    g.night_mine_handled = True
+    store.save(chat_id)
+    for s in _alive_seats(g):
+        try:
+            await ctx.bot.send_message(g.seats[s][0], "💥 امشب مین فعال شد!")
+        except Exception:
+            pass
+    await _night_report(ctx, g, "💥 مین فعال شد")
+    mafia_alive = sorted(_mafia_seats(g, alive_only=True))
+    # تصمیم‌گیرندهٔ فدا: دن‌مافیا → یاغی → هکر
+    picker = (_find_seat_by_role(g, _R_DON)
+              or _find_seat_by_role(g, _R_YAGHI)
+              or _find_seat_by_role(g, _R_HACKER))
+    if not picker or not mafia_alive:
+        await _night_report(ctx, g, "⚠️ مافیایی برای فدا کردن نیست.")
+        return
+    g.night_awaiting_sacrifice = True
+    store.save(chat_id)
+    puid = g.seats[picker][0]
+    m = await _safe_pm(ctx, puid, "💥 مین فعال شد! چه کسی را از تیم خود فدا می‌کنی؟",
+                       _kb_night_seats(mafia_alive, g, "nem_fada_", confirm_cb="nem_fada_confirm"))
+    if m:
+        g.night_pm_msgs[puid] = m.message_id
+    store.save(chat_id)
+
+
+async def _nem_finalize_mafia(ctx, chat_id, g, uid, mid, defuse):
+    g.night_don_defuse = defuse
+    if defuse:
+        await _room_note(ctx, g, "💣 دن امشب «خنثی» را هم زد.")
+    dtxt = "با خنثی‌سازی" if defuse else "بدون خنثی‌سازی"
+    if g.night_don_act == "shot":
+        s = g.night_shot_target
+        tname = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {tname} ({dtxt})")
+        await _night_report(ctx, g, f"🔫 شلیک دن‌مافیا → <b>{s}. {escape(tname, quote=False)}</b> ({dtxt})")
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _nem_check_open_rest(ctx, chat_id, g)
+    else:  # nato
+        await _close_pm(ctx, uid, mid, f"✅ ناتویی ثبت شد ({dtxt}).")
+        await _night_report(ctx, g, f"   ↳ ناتویی {dtxt}")
+        g.night_doctor_blocked = True
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _bzp_broadcast_special(ctx, g, "ناتویی")
+        await _nem_check_open_rest(ctx, chat_id, g)
+
+
+async def _nem_ask_defuse(ctx, uid, mid):
+    kb = InlineKeyboardMarkup([
+        [InlineKeyboardButton("💥 با خنثی‌سازی", callback_data="nem_defuse_yes")],
+        [InlineKeyboardButton("➖ بدون خنثی‌سازی", callback_data="nem_defuse_no")],
+    ])
+    await _edit_pm(ctx, uid, mid, "تمایل به خنثی‌سازی داری؟", kb)
+
+
+# 🔀 مسیر در mafia_bot: callback_route('nem_', after=_after_night_act)
+async def handle_nemayande_callback(update, ctx):
+    q = update.callback_query
+    data = q.data
+    uid = _q_uid(q)   # 🎛 اکتِ دستی
+    g, chat_id = _find_active_night_game(uid, q)
+    if g is None:
+        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
+        return
+    await safe_q_answer(q)
+    mid = q.message.message_id if q.message else None
+
+    # ── فدای مین (بعد از اکت راهنما، فعال‌شدن مین) ──
+    if data == "nem_fada_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_mine_sacrifice = s
+        g.night_awaiting_sacrifice = False
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"💥 {s}. {tname} فدا شد.")
+        await _night_report(ctx, g, f"💥 دن‌مافیا فدا کرد: <b>{s}. {escape(tname, quote=False)}</b>")
+        store.save(chat_id)
+        return
+
+    if data.startswith("nem_fada_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        mafia_alive = sorted(_mafia_seats(g, alive_only=True))
+        await _edit_pm(ctx, uid, mid, "💥 مین فعال شد! چه کسی را از تیم خود فدا می‌کنی؟",
+                       _kb_night_seats(mafia_alive, g, "nem_fada_", selected=s, confirm_cb="nem_fada_confirm"))
+        return
+
+    # ── مین‌گذار ──
+    if data == "nem_mine_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.mine_seat = s
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"💣 مین جلوی {s}. {tname} گذاشته شد.")
+        await _night_report(ctx, g, f"💣 مین‌گذار → مین جلوی <b>{s}. {escape(tname, quote=False)}</b>")
+        g.night_done.add("mine")
+        store.save(chat_id)
+        await _nem_open_mafia(ctx, chat_id, g)
+        return
+
+    if data == "nem_mine_skip":
+        await _close_pm(ctx, uid, mid, "⏭ امشب مین نگذاشتی (می‌توانی شب بعد بگذاری).")
+        await _night_report(ctx, g, "💣 مین‌گذار → امشب مین نگذاشت")
+        g.night_done.add("mine")
+        store.save(chat_id)
+        await _nem_open_mafia(ctx, chat_id, g)
+        return
+
+    if data.startswith("nem_mine_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        mn = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != mn]
+        await _edit_pm(ctx, uid, mid, "💣 جلوی چه کسی مین می‌گذاری؟ (تا آخر بازی می‌ماند)",
+                       _nem_mine_kb(g, targets, selected=s))
+        return
+
+    # ── دن‌مافیا: تصمیم ──
+    if data == "nem_don_shot":
+        g.night_don_act = "shot"
+        store.save(chat_id)
+        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_night_seats(targets, g, "nem_shot_",
+                                       selected=g.night_sel.get(uid), confirm_cb="nem_shot_confirm"))
+        return
+
+    if data == "nem_don_nato":
+        # 🕵️ یک‌بار در کلِ بازی — نگهبان برای کیبوردِ کهنه‌ی شب‌های قبل
+        if g.nato_used:
+            await safe_q_answer(q, "ناتویی قبلاً استفاده شده.", show_alert=True)
+            return
+        g.night_don_act = "nato"
+        store.save(chat_id)
+        targets = [s for s in _alive_seats(g)
+                   if s not in _mafia_seats(g, alive_only=True) and s not in (g.nato_immune or set())]
+        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟",
+                       _kb_night_seats(targets, g, "nem_natt_",
+                                       selected=g.night_sel.get(uid), confirm_cb="nem_natt_confirm"))
+        return
+
+    # ── شلیک ──
+    if data == "nem_shot_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_shot_target = s
+        g.night_don_act = "shot"
+        await _room_announce_shot(ctx, g, s)
+        store.save(chat_id)
+        if g.defuse_used:
+            await _nem_finalize_mafia(ctx, chat_id, g, uid, mid, defuse=False)
+        else:
+            await _nem_ask_defuse(ctx, uid, mid)
+        return
+
+    if data.startswith("nem_shot_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_night_seats(targets, g, "nem_shot_", selected=s, confirm_cb="nem_shot_confirm"))
+        return
+
+    # ── ناتویی: انتخاب هدف، سپس حدس نقش ──
+    if data.startswith("nem_natrole_"):
+        i = int(data.rsplit("_", 1)[1])
+        names = _nem_citizen_role_names(g)
+        if i >= len(names):
+            return
+        guess_name = names[i]
+        s = g.night_nato_seat
+        if not s:
+            await safe_q_answer(q, "اول هدف را انتخاب کن.", show_alert=True)
+            return
+        _tu, tname = g.seats[s]
+        correct = (_nz(guess_name) == _seat_role_norm(g, s))
+        g.night_nato_correct = correct
+        g.night_nato_target = s
+        g.nato_used = True   # 🕵️ مصرف شد — از شبِ بعد دکمه‌اش نمی‌آید
+        tick = "✅" if correct else "❌"
+        await _night_report(ctx, g, f"🕵️ ناتویی دن‌مافیا → صندلی {s}. {escape(tname, quote=False)} | حدس: {guess_name} {tick}")
+        store.save(chat_id)
+        if g.defuse_used:
+            await _nem_finalize_mafia(ctx, chat_id, g, uid, mid, defuse=False)
+        else:
+            await _nem_ask_defuse(ctx, uid, mid)
+        return
+
+    if data == "nem_natt_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_nato_seat = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _room_note(ctx, g, f"🕵️ ناتویی روی <b>{_room_who(g, s)}</b>")
+        names = _nem_citizen_role_names(g)
+        rows = [[InlineKeyboardButton(rn, callback_data=f"nem_natrole_{i}")] for i, rn in enumerate(names)]
+        await _edit_pm(ctx, uid, mid, f"🕵️ نقش صندلی {s} را حدس بزن:", InlineKeyboardMarkup(rows))
+        return
+
+    if data.startswith("nem_natt_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g)
+                   if x not in _mafia_seats(g, alive_only=True) and x not in (g.nato_immune or set())]
+        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟",
+                       _kb_night_seats(targets, g, "nem_natt_", selected=s, confirm_cb="nem_natt_confirm"))
+        return
+
+    # ── خنثی‌سازی ──
+    if data == "nem_defuse_yes":
+        g.defuse_used = True
+        store.save(chat_id)
+        await _nem_finalize_mafia(ctx, chat_id, g, uid, mid, defuse=True)
+        return
+    if data == "nem_defuse_no":
+        await _nem_finalize_mafia(ctx, chat_id, g, uid, mid, defuse=False)
+        return
+
+    # ── هکر: مرحله ۱ فاعل، مرحله ۲ مفعول ──
+    if data == "nem_hka_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول فاعل را انتخاب کن.", show_alert=True)
+            return
+        g.night_hacker_actor = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        hk = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != hk and x != s]   # نه خودش، نه فاعل
+        await _edit_pm(ctx, uid, mid, "💻 اکتش روی چه کسی بسته شود؟ (مرحلهٔ ۲: مفعول)",
+                       _kb_night_seats(targets, g, "nem_hkt_", confirm_cb="nem_hkt_confirm"))
+        return
+
+    if data.startswith("nem_hka_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        hk = _seat_of_uid(g, uid)
+        await _edit_pm(ctx, uid, mid, "💻 اکتِ چه کسی را هک می‌کنی؟ (مرحلهٔ ۱: فاعل)",
+                       _kb_night_seats([x for x in _alive_seats(g) if x != hk], g, "nem_hka_",
+                                       selected=s, confirm_cb="nem_hka_confirm"))
+        return
+
+    if data == "nem_hkt_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول مفعول را انتخاب کن.", show_alert=True)
+            return
+        g.night_hacker_target = s
+        await _room_note(ctx, g, f"💻 هک: اکتِ <b>{_room_who(g, g.night_hacker_actor)}</b> "
+                         f"روی <b>{_room_who(g, s)}</b>")
+        a = g.night_hacker_actor
+        aname = g.seats[a][1] if a in g.seats else "—"
+        tname = g.seats[s][1]
+        await _close_pm(ctx, uid, mid, f"💻 هک ثبت شد: اکت {a}.{aname} روی {s}.{tname} بسته شد.")
+        await _night_report(ctx, g, f"💻 هکر → اکت <b>{a}. {escape(aname, quote=False)}</b> روی <b>{s}. {escape(tname, quote=False)}</b> بسته شد")
+        g.night_done.add("hacker")
+        store.save(chat_id)
+        await _nem_check_open_rest(ctx, chat_id, g)
+        return
+
+    if data.startswith("nem_hkt_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        hk = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != hk and x != g.night_hacker_actor]
+        await _edit_pm(ctx, uid, mid, "💻 اکتش روی چه کسی بسته شود؟ (مرحلهٔ ۲: مفعول)",
+                       _kb_night_seats(targets, g, "nem_hkt_", selected=s, confirm_cb="nem_hkt_confirm"))
+        return
+
+    # ── وکیل (یکبار) ──
+    if data == "nem_law_no":
+        await _close_pm(ctx, uid, mid, "🧑‍⚖️ امشب وکالت نگرفتی.")
+        await _night_report(ctx, g, "🧑‍⚖️ وکیل → استفاده نکرد")
+        g.night_done.add("lawyer")
+        store.save(chat_id)
+        return
+
+    if data == "nem_law_yes":
+        law = _seat_of_uid(g, uid)
+        targets = [s for s in _alive_seats(g) if s != law]
+        await _edit_pm(ctx, uid, mid, "🧑‍⚖️ وکالت چه کسی را می‌گیری؟",
+                       _kb_night_seats(targets, g, "nem_law_", confirm_cb="nem_law_confirm"))
+        return
+
+    if data == "nem_law_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        # وکالت فقط در صورتی «مصرف» می‌شود که موکل همان شب شات نشود (در مرحله ۲ تعیین می‌شود)
+        g.night_lawyer_target = s
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"🧑‍⚖️ وکالت {s}. {tname} ثبت شد.")
+        await _night_report(ctx, g, f"🧑‍⚖️ وکیل → وکالت <b>{s}. {escape(tname, quote=False)}</b>")
+        g.night_done.add("lawyer")
+        store.save(chat_id)
+        return
+
+    if data.startswith("nem_law_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        law = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != law]
+        await _edit_pm(ctx, uid, mid, "🧑‍⚖️ وکالت چه کسی را می‌گیری؟",
+                       _kb_night_seats(targets, g, "nem_law_", selected=s, confirm_cb="nem_law_confirm"))
+        return
+
+    # ── محافظ (هر شب، فقط گزارش) ──
+    if data == "nem_grd_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        _tu, tname = g.seats[s]
+        g.nem_guard_target = s     # 🛡 تا روزِ بعد می‌ماند (یاغی به آن نیاز دارد)
+        await _close_pm(ctx, uid, mid, f"🛡 محافظت از {s}. {tname} ثبت شد.")
+        await _night_report(ctx, g, f"🛡 محافظ → محافظت از <b>{s}. {escape(tname, quote=False)}</b>")
+        # 🏅 محافظت از مافیا = اکتِ اشتباه + فریبِ آن مافیا؛ از شهروند = اکتِ درست
+        _grd = _seat_of_uid(g, uid)
+        if _sc_side(g, s) == "مافیا":
+            _sc_add(g, _grd, "act", -5, f"محافظت از مافیا ({s})")
+            _sc_add(g, s, "farib2", 5, "محافظتِ اشتباهِ محافظ")
+        else:
+            _sc_add(g, _grd, "act", 15, f"محافظت از شهروند ({s})")
+        g.night_done.add("guard")
+        store.save(chat_id)
+        return
+
+    if data.startswith("nem_grd_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        grd = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != grd]
+        await _edit_pm(ctx, uid, mid, "🛡 از چه کسی محافظت می‌کنی؟",
+                       _kb_night_seats(targets, g, "nem_grd_", selected=s, confirm_cb="nem_grd_confirm"))
+        return
+
+    # ── پزشک (۱ نفر) ──
+    if data == "nem_doc_confirm":
+        sel = list(g.night_doc_sel.get(uid, []))
+        if not sel:
+            await safe_q_answer(q, "یک نفر را انتخاب کن.", show_alert=True)
+            return
+        doc = _seat_of_uid(g, uid)
+        if doc in sel:
+            g.doctor_self_saves = (g.doctor_self_saves or 0) + 1
+        g.night_doc_saved = list(sel)
+        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
+        await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {names}")
+        await _night_report(ctx, g, f"💉 پزشک → سیو: <b>{escape(names, quote=False)}</b>")
+        g.night_done.add("doctor")
+        store.save(chat_id)
+        return
+
+    if data.startswith("nem_doc_"):
+        s = int(data.rsplit("_", 1)[1])
+        sel = set(g.night_doc_sel.get(uid, []))
+        if s in sel:
+            sel.remove(s)
+        elif len(sel) >= 1:
+            await safe_q_answer(q, "فقط ۱ نفر.", show_alert=True)
+            return
+        else:
+            sel.add(s)
+        g.night_doc_sel[uid] = list(sel)
+        store.save(chat_id)
+        doc = _seat_of_uid(g, uid)
+        await _edit_pm(ctx, uid, mid, "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
+                       _kb_night_seats(_doctor_targets(g, doc), g, "nem_doc_",
+                                       selected=sel, confirm_cb="nem_doc_confirm"))
+        return
+
+    # ── راهنما (آخرین اکت) ──
+    if data == "nem_guide_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_guide_target = s
+        g.guide_last_target = s
+        _tu, tname = g.seats[s]
+        is_mafia = s in _mafia_seats(g, alive_only=True)
+        # هکِ راهنما روی همین هدف؟ → راهنمایی بی‌اثر می‌شود
+        hacked = (g.night_hacker_actor == _seat_of_uid(g, uid)
+                  and g.night_hacker_target == s)
+        if is_mafia:
+            try:
+                await ctx.bot.send_message(g.seats[s][0], f"🧭 سیت {_seat_of_uid(g, uid)} راهنماست.")
+            except Exception:
+                pass
+            g.nato_immune.add(_seat_of_uid(g, uid))
+            await _close_pm(ctx, uid, mid, f"🧭 راهنمایی به {s}. {tname} ثبت شد.")
+            await _night_report(ctx, g, f"🧭 راهنما → راهنمایی به مافیا {s}. {escape(tname, quote=False)} (راهنما از ناتویی مصون شد)")
+            g.night_done.add("guide")
+            store.save(chat_id)
+            await _nem_trigger_mine(ctx, chat_id, g)
+            return
+        # شهروند
+        if hacked:
+            await _close_pm(ctx, uid, mid, f"🧭 راهنمایی به {s}. {tname} ثبت شد.")
+            await _night_report(ctx, g, f"🧭 راهنما → راهنمایی به {s}. {escape(tname, quote=False)} (توسط هکر بی‌اثر شد، آن فرد متوجه نشد)")
+            g.night_done.add("guide")
+            store.save(chat_id)
+            await _nem_trigger_mine(ctx, chat_id, g)
+            return
+        # راهنمایی مؤثر: شهروند استعلام می‌گیرد
+        g.night_guide_recipient_inv = s
+        await _close_pm(ctx, uid, mid, f"🧭 راهنمایی به {s}. {tname} ثبت شد.")
+        await _night_report(ctx, g, f"🧭 راهنما → راهنمایی به {s}. {escape(tname, quote=False)}")
+        rec_uid = g.seats[s][0]
+        targets = [x for x in _alive_seats(g) if x != s]
+        m = await _safe_pm(ctx, rec_uid, "🔎 شما راهنمایی دارید! استعلام چه کسی را می‌گیری؟",
+                           _kb_night_seats(targets, g, "nem_ginv_"))
+        if m:
+            g.night_pm_msgs[rec_uid] = m.message_id
+        g.night_done.add("guide")
+        store.save(chat_id)
+        await _nem_trigger_mine(ctx, chat_id, g)
+        return
+
+    if data.startswith("nem_guide_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        gd = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != gd and x != g.guide_last_target]
+        await _edit_pm(ctx, uid, mid, "🧭 به چه کسی راهنمایی می‌دهی؟",
+                       _kb_night_seats(targets, g, "nem_guide_", selected=s, confirm_cb="nem_guide_confirm"))
+        return
+
+    # ── استعلامِ شهروندِ راهنمایی‌گرفته ──
+    if data.startswith("nem_ginv_"):
+        s = int(data.rsplit("_", 1)[1])
+        _tu, tname = g.seats[s]
+        res = "مثبت ✅" if _nem_guide_positive(g, s) else "منفی ❌"
+        if "مثبت" in res:
+            _sc_add(g, _seat_of_uid(g, uid), "inq", 5, f"استعلام مثبت ({s})")
+        await _close_pm(ctx, uid, mid, f"🔎 استعلام {s}. {tname}: {res}")
+        await _night_report(ctx, g, f"🔎 (راهنمایی) استعلام {s}. {escape(tname, quote=False)}: <b>{res}</b>")
+        store.save(chat_id)
+        return
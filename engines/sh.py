@@ -0,0 +1,1400 @@
+# 🧩 بدنه‌ی موتورِ سناریو «شاهنامه»
+# این فایل import نمی‌شود: mafia_bot._engine_load آن را (با اولین صدا زدنِ یکی از
+# توابعش) داخلِ فضای نامِ mafia_bot اجرا می‌کند؛ ثابت‌ها، _R_*ها و کمک‌تابع‌های
+# مشترک از همان‌جا دیده می‌شوند. ثبتِ callbackها و جانشین‌ها در mafia_bot است.
+from __future__ import annotations
+
+
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «شاهنامه»
+#  شب ۱ : کاوه → تیمِ اهریمن → افراسیاب → سیمرغ → صاحبانِ پر →
+#          رستم → جاماسب → آرش
+#  شب ۲ : حدسِ افراسیاب → تصمیمِ رستم (سایه) → اهریمن → سیمرغ →
+#          صاحبانِ پر → جاماسب
+#  شب ۳+: اهریمن → سیمرغ → صاحبانِ پر → جاماسب
+# ═════════════════════════════════════════════════════════════
+def _sh_dark_role_norms(g):
+    """نامِ نقش‌های تیمِ اهریمن، همان‌طور که در خودِ سناریو نوشته شده‌اند."""
+    out = set()
+    for rname in ((g.scenario.roles.keys() if getattr(g, "scenario", None) else []) or []):
+        n = _nz(rname)
+        if any(k in n for k in _SH_DARK):
+            out.add(n)
+    return tuple(out) if out else _SH_DARK
+
+
+def _sh_burned(g, seat) -> bool:
+    """🔥 اکتِ این صندلی را گاد سوزانده؟ (نقشش هست ولی امشب اکتی ندارد)"""
+    return seat is not None and seat in (getattr(g, "night_burned", set()) or set())
+
+
+def _sh_shadow_positive(g, seat) -> bool:
+    """🌑 استعلامِ سایه: سیمرغ، بوف، افراسیاب مثبت‌اند."""
+    rn = _seat_role_norm(g, seat)
+    return any(k in rn for k in (_R_SIMORGH, _R_BOOF, _R_AFRASIAB))
+
+
+def _sh_blood_positive(g, seat) -> bool:
+    """🩸 استعلامِ خون: رستم و ضحاک مثبت‌اند."""
+    rn = _seat_role_norm(g, seat)
+    return any(k in rn for k in (_R_ROSTAM, _R_ZAHHAK))
+
+
+def _sh_saved_seats(g):
+    """🪶 کسانی که پر سیمرغ روی‌شان نشسته (مصون در برابرِ شات و پر سمی)."""
+    fin = getattr(g, "sh_feather_final", {}) or {}
+    return {s for s, ks in fin.items() if "simorgh" in (ks or [])}
+
+
+def _sh_boof_victim(g):
+    """🪶 دارندهٔ نهاییِ پر سمی می‌میرد — مگر عضوِ اهریمن باشد،
+    یا پر سیمرغ هم دستش باشد (چه مستقیم گرفته باشد چه پاس‌شده)."""
+    fin = getattr(g, "sh_feather_final", {}) or {}
+    saved = _sh_saved_seats(g)
+    for s, ks in fin.items():
+        if "boof" not in (ks or []):
+            continue
+        if s not in g.seats or s in (g.striked or set()):
+            return None
+        if s in _mafia_seats(g):
+            return None
+        if s in saved:
+            return None      # 🪶 پر سیمرغ سیوش می‌کند
+        return s
+    return None
+
+
+def _sh_kaveh_blocks(g) -> bool:
+    """🔨 خشمِ کاوه — فقط شبِ بعد از اینکه کاوه با «شاتِ شب» کشته شود:
+    شاتِ تیمِ اهریمن کشته نمی‌گیرد، فرقی نمی‌کند شات دستِ چه کسی باشد."""
+    return getattr(g, "sh_kaveh_block_night", None) == g.night_number
+
+
+# ─────────────────── 🌙 مراحلِ شب ───────────────────
+async def _sh_start(ctx, chat_id, g):
+    if g.night_number == 1:
+        g.night_done.add("shadow")      # شبِ اول سایه‌ای برای تعیین‌تکلیف نیست
+        store.save(chat_id)
+        await _sh_open_kaveh(ctx, chat_id, g)
+        return
+    g.night_done.add("kaveh")           # سپرِ کاوه فقط شبِ اول داده می‌شود
+    store.save(chat_id)
+    await _sh_open_shadow_phase(ctx, chat_id, g)
+
+
+async def _sh_open_kaveh(ctx, chat_id, g):
+    kv = _sh_seat(g, _R_KAVEH)
+    if kv is None or getattr(g, "sh_kaveh_used", False) or _sh_burned(g, kv):
+        g.night_done.add("kaveh")
+        store.save(chat_id)
+        await _sh_check_open_mafia(ctx, chat_id, g)
+        return
+    kuid = g.seats[kv][0]
+    m = await _safe_pm(ctx, kuid, "🛡 سپرت را به چه کسی می‌دهی؟",
+                       _kb_night_seats(_sh_sel_targets(g, "sh_kv_", kv), g, "sh_kv_",
+                                       selected=g.night_sel.get(kuid), confirm_cb="sh_kv_confirm"))
+    if m:
+        g.night_pm_msgs[kuid] = m.message_id
+    store.save(chat_id)
+
+
+async def _sh_open_shadow_phase(ctx, chat_id, g):
+    """🌑 شب‌های ۲+: اول حدسِ افراسیاب، بعد تصمیمِ رستم دربارهٔ سایه.
+
+    اگر هدفِ سایه همان شب کشته شده باشد، سایه به رستم برنمی‌گردد؛ افراسیاب همچنان
+    حدسش را می‌زند، ولی رستم رأیی ندارد چون شخصی نمانده."""
+    tgt = getattr(g, "sh_shadow_seat", None)
+    pending = (tgt is not None and tgt in g.seats
+               and not getattr(g, "sh_shadow_resolved", False)
+               and (getattr(g, "sh_shadow_night", None) or 0) < g.night_number)
+    if not pending:
+        g.night_done.add("shadow")
+        store.save(chat_id)
+        await _sh_check_open_mafia(ctx, chat_id, g)
+        return
+    afr = _sh_seat(g, _R_AFRASIAB)
+    if afr is not None and not getattr(g, "sh_afr_guessed", False):
+        auid = g.seats[afr][0]
+        m = await _safe_pm(ctx, auid, "🕯 به‌نظرت رستم کیست؟",
+                           _kb_night_seats(_sh_sel_targets(g, "sh_afg_", afr), g, "sh_afg_",
+                                           selected=g.night_sel.get(auid),
+                                           confirm_cb="sh_afg_confirm"))
+        if m:
+            g.night_pm_msgs[auid] = m.message_id
+            store.save(chat_id)
+            return
+    await _sh_ask_rostam(ctx, chat_id, g)
+
+
+async def _sh_ask_rostam(ctx, chat_id, g):
+    tgt = getattr(g, "sh_shadow_seat", None)
+    # 🌑 هدفِ سایه دیگر در بازی نیست → رستم تصمیمی ندارد (سایه هم برنمی‌گردد)
+    if tgt is None or tgt not in g.seats or tgt in (g.striked or set()):
+        g.sh_shadow_resolved = True
+        g.night_done.add("shadow")
+        store.save(chat_id)
+        await _night_report(ctx, g, "🌑 هدفِ سایه در بازی نیست — رستم رأیی ندارد.")
+        await _sh_check_open_mafia(ctx, chat_id, g)
+        return
+    ros = _sh_seat(g, _R_ROSTAM)
+    if ros is not None:
+        kb = InlineKeyboardMarkup([[
+            InlineKeyboardButton("✅ بله، بماند", callback_data="sh_shd_keep"),
+            InlineKeyboardButton("🚫 خیر", callback_data="sh_shd_kill"),
+        ]])
+        m = await _safe_pm(ctx, g.seats[ros][0],
+                           f"🌑 سایه‌ات روی {tgt}. {g.seats[tgt][1]} است.\n"
+                           f"می‌خواهی زنده بماند؟", kb)
+        if m:
+            g.night_pm_msgs[g.seats[ros][0]] = m.message_id
+            store.save(chat_id)
+            return
+    # ⏳ رستم در بازی نیست (یا پیویش بسته است) → مکث تا کسی از سرعتِ کار چیزی نفهمد
+    asyncio.create_task(_sh_shadow_no_rostam(ctx, chat_id, g))
+
+
+async def _sh_shadow_no_rostam(ctx, chat_id, g, delay=30):
+    try:
+        await asyncio.sleep(delay)
+        if g.phase in ("idle", "ended") or getattr(g, "sh_shadow_resolved", False):
+            return
+        await _sh_apply_shadow(ctx, chat_id, g, keep=True, note="رستم اکتی نداد")
+    except Exception as e:
+        print("⚠️ sh shadow wait err:", e)
+
+
+async def _sh_apply_shadow(ctx, chat_id, g, keep: bool, note=""):
+    if getattr(g, "sh_shadow_resolved", False):
+        return
+    g.sh_shadow_resolved = True
+    store.save(chat_id)
+    tgt = getattr(g, "sh_shadow_seat", None)
+    killed = False
+    if tgt in g.seats and tgt not in (g.striked or set()):
+        rn = _seat_role_norm(g, tgt)
+        immune = (_R_ZAHHAK in rn) or getattr(g, "sh_afr_correct", False)
+        if (not keep) and not immune:
+            g.striked.add(tgt)
+            killed = True
+        store.save(chat_id)
+        nm = escape(g.seats[tgt][1], quote=False)
+        txt = (f"🌑 <b>نتیجهٔ سایه</b>: {tgt}. {nm} از بازی خارج شد."
+               if killed else f"🌑 <b>نتیجهٔ سایه</b>: {tgt}. {nm} کشته نشد.")
+        for s in sorted(g.seats):
+            try:
+                await ctx.bot.send_message(g.seats[s][0], txt, parse_mode="HTML")
+            except Exception:
+                pass
+        why = []
+        if note:
+            why.append(note)
+        if (not keep) and not killed:
+            why.append("مصون بود" if _R_ZAHHAK in rn else "حدسِ افراسیاب درست بود")
+        await _night_report(
+            ctx, g, f"🌑 سایهٔ رستم روی {tgt}. {nm} — " +
+            ("خارج شد" if killed else "ماند") + (f" ({'، '.join(why)})" if why else ""))
+        if killed:
+            try:
+                await publish_seating(ctx, chat_id, g, mode=CTRL)
+            except Exception:
+                pass
+    g.night_done.add("shadow")
+    store.save(chat_id)
+    if killed:
+        await _check_auto_end(ctx, chat_id, g)
+    await _sh_check_open_mafia(ctx, chat_id, g)
+
+
+async def _sh_check_open_mafia(ctx, chat_id, g):
+    if "sh_mafia_opened" in (g.night_done or set()):
+        return
+    if not ({"kaveh", "shadow"} <= (g.night_done or set())):
+        return
+    g.night_done.add("sh_mafia_opened")
+    store.save(chat_id)
+    zah  = _sh_seat(g, _R_ZAHHAK)
+    boof = _sh_seat(g, _R_BOOF)
+    afr  = _sh_seat(g, _R_AFRASIAB)
+    # ترتیبِ شات: ضحاک → بوف → افراسیاب (سوخته‌ها رد می‌شوند)
+    decider = next((x for x in (zah, boof, afr) if x and not _sh_burned(g, x)), None)
+    if not decider:
+        for _s in sorted(_mafia_seats(g, alive_only=True)):
+            if not _sh_burned(g, _s):
+                decider = _s
+                break
+    if not decider:
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _sh_check_open_mid(ctx, chat_id, g)
+        return
+    g.sh_decider_seat = decider
+    duid = g.seats[decider][0]
+    m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\nاکت تیم اهریمن را انتخاب کن:",
+                       _sh_dark_kb(g))
+    if m:
+        g.night_pm_msgs[duid] = m.message_id
+    store.save(chat_id)
+
+
+def _sh_dark_kb(g):
+    rows = [[InlineKeyboardButton("🔫 شات", callback_data="sh_act_shot")]]
+    boof = _sh_seat(g, _R_BOOF)
+    # 🪶 بوفِ سوخته/مرده گزینه‌ای ندارد، وگرنه شب پشتِ پرامپتِ بی‌جواب گیر می‌کند
+    if boof is not None and not getattr(g, "sh_boof_used", False) and not _sh_burned(g, boof):
+        rows.append([InlineKeyboardButton("🪶 پر بوف", callback_data="sh_act_boof")])
+    return InlineKeyboardMarkup(rows)
+
+
+async def _sh_check_open_mid(ctx, chat_id, g):
+    """🛡 سپرِ افراسیاب (شبِ اول) + 🪶 سیمرغ — بعد از ثبتِ اکتِ اهریمن."""
+    if "sh_mid_opened" in (g.night_done or set()):
+        return
+    if "mafia" not in (g.night_done or set()):
+        return
+    g.night_done.add("sh_mid_opened")
+    store.save(chat_id)
+    afr = _sh_seat(g, _R_AFRASIAB)
+    if (g.night_number == 1 and afr is not None
+            and not getattr(g, "sh_afr_used", False) and not _sh_burned(g, afr)):
+        auid = g.seats[afr][0]
+        m = await _safe_pm(ctx, auid, "🛡 سپرت را به چه کسی می‌دهی؟",
+                           _kb_night_seats(_sh_sel_targets(g, "sh_afs_", afr), g, "sh_afs_",
+                                           selected=g.night_sel.get(auid),
+                                           confirm_cb="sh_afs_confirm"))
+        if m:
+            g.night_pm_msgs[auid] = m.message_id
+    else:
+        g.night_done.add("afrasiab")
+    store.save(chat_id)
+    await _sh_open_simorgh(ctx, chat_id, g)
+
+
+async def _sh_open_simorgh(ctx, chat_id, g):
+    sim = _sh_seat(g, _R_SIMORGH)
+    left = int(getattr(g, "sh_simorgh_left", 0) or 0)
+    if sim is None or left <= 0 or _sh_burned(g, sim):
+        g.night_done.add("simorgh")
+        store.save(chat_id)
+        await _sh_check_open_feathers(ctx, chat_id, g)
+        return
+    rows = [[InlineKeyboardButton("۱ پر", callback_data="sh_sim_1")]]
+    if left >= 2:
+        rows.append([InlineKeyboardButton("۲ پر", callback_data="sh_sim_2")])
+    suid = g.seats[sim][0]
+    m = await _safe_pm(ctx, suid, f"🪶 امشب چند پر استفاده می‌کنی؟ (باقی‌مانده: {left})",
+                       InlineKeyboardMarkup(rows))
+    if m:
+        g.night_pm_msgs[suid] = m.message_id
+    store.save(chat_id)
+
+
+def _sh_sim_targets(g, sim):
+    """🪶 سیمرغ فقط یک‌بار در کلِ بازی می‌تواند به خودش پر بدهد."""
+    out = []
+    for s in _alive_seats(g):
+        if s == sim and getattr(g, "sh_simorgh_self_used", False):
+            continue
+        out.append(s)
+    return out
+
+
+def _sh_sim_text(n):
+    return "🪶 یک نفر را انتخاب کن و تأیید بزن." if n == 1 else "🪶 دو نفر را انتخاب کن و تأیید بزن."
+
+
+async def _sh_check_open_feathers(ctx, chat_id, g):
+    """🪶 پرسش از صاحبانِ پر — پیامِ هر دو نوعِ پر دقیقاً یکسان است."""
+    if "sh_feath_opened" in (g.night_done or set()):
+        return
+    if not ({"mafia", "simorgh"} <= (g.night_done or set())):
+        return
+    g.night_done.add("sh_feath_opened")
+    owners = {}
+    bh = getattr(g, "sh_boof_holder", None)
+    if bh and bh in g.seats and bh not in (g.striked or set()):
+        owners.setdefault(bh, []).append("boof")
+    for s in (getattr(g, "sh_sim_holders", []) or []):
+        if s in g.seats and s not in (g.striked or set()):
+            owners.setdefault(s, []).append("simorgh")
+    # 🪶 فقط همین‌جا (لحظهٔ توزیع) پر سیمرغ بر پر بوف ارجحیت دارد:
+    #    اگر هر دو به یک نفر رسیده باشد، پر بوف می‌سوزد و او فقط پر سیمرغ دارد.
+    for s, ks in owners.items():
+        if "boof" in ks and "simorgh" in ks:
+            ks.remove("boof")
+            await _night_report(
+                ctx, g,
+                f"🪶 هر دو پر به {s}. {escape(g.seats[s][1], quote=False)} رسید — "
+                f"پر سیمرغ ماند و پر بوف سوخت.")
+    owners = {s: k for s, k in owners.items() if not _sh_burned(g, s)}
+    g.sh_feather_own = {s: list(k) for s, k in owners.items()}
+    g.sh_feather_wait = set(owners.keys())
+    store.save(chat_id)
+    if not owners:
+        g.night_done.add("feathers")
+        store.save(chat_id)
+        await _sh_check_open_late(ctx, chat_id, g)
+        return
+    kb = InlineKeyboardMarkup([[
+        InlineKeyboardButton("🙋 خودم", callback_data="sh_fe_self"),
+        InlineKeyboardButton("👤 شخص دیگر", callback_data="sh_fe_other"),
+    ]])
+    for s in sorted(owners):
+        uid = g.seats[s][0]
+        m = await _safe_pm(ctx, uid,
+                           "🪶 شما پر دارید.\nبرای خودت استفاده می‌کنی یا به شخص دیگری می‌دهی؟", kb)
+        if m:
+            g.night_pm_msgs[uid] = m.message_id
+    store.save(chat_id)
+
+
+async def _sh_feather_resolve(ctx, chat_id, g, holder, target):
+    kinds = list((getattr(g, "sh_feather_own", {}) or {}).get(holder, []))
+    fin = dict(getattr(g, "sh_feather_final", {}) or {})
+    fin[target] = sorted(set(fin.get(target, [])) | set(kinds))
+    g.sh_feather_final = fin
+    w = set(getattr(g, "sh_feather_wait", set()) or set())
+    w.discard(holder)
+    g.sh_feather_wait = w
+    store.save(chat_id)
+    lbl = "خودش" if holder == target else f"{target}. {g.seats[target][1]}"
+    await _night_report(
+        ctx, g,
+        f"🪶 پرِ {holder}. {escape(g.seats[holder][1], quote=False)} → "
+        f"{escape(lbl, quote=False)} "
+        f"({'/'.join('سیمرغ' if k == 'simorgh' else 'بوف' for k in kinds)})")
+    if not w:
+        g.night_done.add("feathers")
+        store.save(chat_id)
+        await _sh_check_open_late(ctx, chat_id, g)
+
+
+async def _sh_check_open_late(ctx, chat_id, g):
+    """🌑 رستم + 🔎 جاماسب + 🏹 آرش (آرش فقط شبِ اول)."""
+    if "sh_late_opened" in (g.night_done or set()):
+        return
+    if "feathers" not in (g.night_done or set()):
+        return
+    g.night_done.add("sh_late_opened")
+    store.save(chat_id)
+
+    ros = _sh_seat(g, _R_ROSTAM)
+    if ros is not None and not getattr(g, "sh_shadow_used", False) and not _sh_burned(g, ros):
+        ruid = g.seats[ros][0]
+        kb = _kb_night_seats(_sh_sel_targets(g, "sh_ros_", ros), g, "sh_ros_",
+                             selected=g.night_sel.get(ruid), confirm_cb="sh_ros_confirm")
+        rows = list(kb.inline_keyboard) + [
+            [InlineKeyboardButton("⏭ امشب سایه نمی‌گذارم", callback_data="sh_ros_skip")]]
+        m = await _safe_pm(ctx, ruid, "🌑 روی چه کسی سایه می‌گذاری؟", InlineKeyboardMarkup(rows))
+        if m:
+            g.night_pm_msgs[ruid] = m.message_id
+    else:
+        g.night_done.add("rostam")
+
+    jam = _sh_seat(g, _R_JAMASB)
+    if jam is not None and not _sh_burned(g, jam):
+        juid = g.seats[jam][0]
+        if not getattr(g, "sh_blood_used", False):
+            kb = InlineKeyboardMarkup([[
+                InlineKeyboardButton("🌑 استعلام سایه", callback_data="sh_jam_shadow"),
+                InlineKeyboardButton("🩸 استعلام خون", callback_data="sh_jam_blood"),
+            ]])
+            m = await _safe_pm(ctx, juid, "🔎 کدام استعلام را می‌گیری؟", kb)
+        else:
+            m = await _safe_pm(ctx, juid, "🌑 استعلام سایهٔ چه کسی را می‌گیری؟",
+                               _kb_night_seats(_sh_sel_targets(g, "sh_jsh_", jam), g, "sh_jsh_"))
+        if m:
+            g.night_pm_msgs[juid] = m.message_id
+    else:
+        g.night_done.add("jamasb")
+
+    ar = _sh_seat(g, _R_ARASH)
+    if (g.night_number == 1 and ar is not None
+            and not getattr(g, "sh_arash_used", False) and not _sh_burned(g, ar)):
+        auid = g.seats[ar][0]
+        m = await _safe_pm(ctx, auid, "🏹 تیر و کمانت را به چه کسی می‌دهی؟",
+                           _kb_night_seats(_sh_sel_targets(g, "sh_ar_", ar), g, "sh_ar_",
+                                           selected=g.night_sel.get(auid),
+                                           confirm_cb="sh_ar_confirm"))
+        if m:
+            g.night_pm_msgs[auid] = m.message_id
+    else:
+        g.night_done.add("arash")
+    store.save(chat_id)
+    await _maybe_notify_god_done(ctx, g)
+
+
+def _sh_sel_targets(g, prefix, me):
+    if prefix == "sh_bf_":
+        # 🪶 بوف پرِ سمی را به یک روشنایی می‌دهد
+        out = [s for s in _alive_seats(g) if s != me and s not in _mafia_seats(g)]
+        return out or [s for s in _alive_seats(g) if s != me]
+    if prefix in ("sh_st_", "sh_ar_"):
+        return list(_alive_seats(g))
+    return [s for s in _alive_seats(g) if s != me]
+
+
+# 🔀 مسیر در mafia_bot: callback_route('sh_', after=_after_night_act)
+async def handle_shahname_callback(update, ctx):
+    q = update.callback_query
+    data = q.data
+    uid = _q_uid(q)   # 🎛 اکتِ دستی
+    g, chat_id = _find_active_night_game(uid, q)
+    if g is None:
+        g, chat_id = _sh_find_game(uid)
+    if g is None:
+        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
+        return
+    await safe_q_answer(q)
+    mid = q.message.message_id if q.message else None
+    me = _seat_of_uid(g, uid)
+
+    # ── 🏛 انجمن (روز — بیرون از اکت‌گیری) ──
+    if data.startswith("sh_cd_"):
+        # 🔒 نظرِ ثبت‌شده قابلِ تغییر نیست (دکمه‌ی کهنه هم کاری نکند)
+        if uid in (getattr(g, "sh_council_votes", {}) or {}):
+            await _close_pm(ctx, uid, mid, "🏛 نظرت قبلاً ثبت شده و قابلِ تغییر نیست.")
+            return
+        # ⏰ بعد از جمع‌بندی دیگر رأی پذیرفته نمی‌شود
+        if getattr(g, "sh_council_done", False):
+            await _close_pm(ctx, uid, mid, "⏰ نظرگیریِ انجمن تمام شده — دیر شد.")
+            return
+
+    if data == "sh_cd_ok":
+        sel = sorted(set((getattr(g, "sh_council_sel", {}) or {}).get(uid, []) or []))
+        cv = dict(getattr(g, "sh_council_votes", {}) or {})
+        cv[uid] = sel
+        g.sh_council_votes = cv
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, "✅ نظرت ثبت شد.")
+        rn = (g.assigned_roles or {}).get(me, "—")
+        parts = [("موافقِ " if i in sel else "مخالفِ ") + _sh_duel_label(g, d)
+                 for i, d in enumerate(getattr(g, "sh_duels", []) or [])]
+        _miss = _sh_council_missing(g)
+        _left = ("— همه جواب دادند ✅" if not _miss else
+                 "— مانده: " + "، ".join(f"{x}. {escape(g.seats[x][1], quote=False)}"
+                                          for x in _miss))
+        await _night_report(
+            ctx, g,
+            f"🏛 {escape(str(rn), quote=False)} ({me}. {escape(g.seats[me][1], quote=False)}): "
+            + "، ".join(parts) + f"\n{_left}")
+        return
+
+    if data.startswith("sh_cd_"):
+        try:
+            i = int(data.rsplit("_", 1)[1])
+        except Exception:
+            return
+        sel = set((getattr(g, "sh_council_sel", {}) or {}).get(uid, []) or [])
+        sel.discard(i) if i in sel else sel.add(i)
+        d = dict(getattr(g, "sh_council_sel", {}) or {})
+        d[uid] = sorted(sel)
+        g.sh_council_sel = d
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, _SH_COUNCIL_Q, _sh_council_kb(g, sel))
+        return
+
+    # ── 🌑 تصمیمِ رستم دربارهٔ سایه ──
+    if data in ("sh_shd_keep", "sh_shd_kill"):
+        await _close_pm(ctx, uid, mid, "✅ تصمیمت ثبت شد.")
+        await _sh_apply_shadow(ctx, chat_id, g, keep=(data == "sh_shd_keep"))
+        return
+
+    # ── 🩸 اکتِ تیمِ اهریمن ──
+    if data == "sh_act_back":
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid,
+                       f"🌙 شب {g.night_number}\nاکت تیم اهریمن را انتخاب کن:", _sh_dark_kb(g))
+        return
+
+    if data == "sh_act_shot":
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_add_back(_kb_night_seats(_sh_sel_targets(g, "sh_st_", me), g, "sh_st_",
+                                                    selected=g.night_sel.get(uid),
+                                                    confirm_cb="sh_st_confirm"), "sh_act_back"))
+        return
+
+    if data == "sh_act_boof":
+        boof = _sh_seat(g, _R_BOOF)
+        if boof is None or getattr(g, "sh_boof_used", False):
+            await safe_q_answer(q, "پر سمی در دسترس نیست.", show_alert=True)
+            return
+        g.sh_boof_used = True
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, "🪶 پر سمی انتخاب شد.")
+        buid = g.seats[boof][0]
+        m = await _safe_pm(ctx, buid, "🪶 پر سمی را به چه کسی می‌دهی؟",
+                           _kb_night_seats(_sh_sel_targets(g, "sh_bf_", boof), g, "sh_bf_",
+                                           selected=g.night_sel.get(buid),
+                                           confirm_cb="sh_bf_confirm"))
+        if m:
+            g.night_pm_msgs[buid] = m.message_id
+        store.save(chat_id)
+        return
+
+    if data == "sh_st_confirm":
+        t = g.night_sel.get(uid)
+        if not t:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_shot_target = t
+        await _room_announce_shot(ctx, g, t)
+        g.night_done.add("mafia")
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, f"🔫 شلیک به {t}. {g.seats[t][1]} ثبت شد.")
+        await _night_report(ctx, g,
+                            f"🔫 شلیکِ تیم اهریمن → {t}. {escape(g.seats[t][1], quote=False)}")
+        await _sh_check_open_mid(ctx, chat_id, g)
+        return
+
+    if data == "sh_bf_confirm":
+        t = g.night_sel.get(uid)
+        if not t:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.sh_boof_holder = t
+        await _room_note(ctx, g, f"🪶 پر بوف به <b>{_room_who(g, t)}</b>")
+        g.night_done.add("mafia")
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, "🪶 پر سمی داده شد.")
+        await _night_report(ctx, g,
+                            f"🪶 پر سمیِ بوف → {t}. {escape(g.seats[t][1], quote=False)}")
+        await _sh_check_open_mid(ctx, chat_id, g)
+        return
+
+    # ── 🛡 سپرها ──
+    if data in ("sh_kv_confirm", "sh_afs_confirm"):
+        t = g.night_sel.get(uid)
+        if not t:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.sh_shields = set(getattr(g, "sh_shields", set()) or set()) | {t}
+        if data == "sh_kv_confirm":
+            g.sh_kaveh_used = True
+            g.night_done.add("kaveh")
+            who = "کاوه"
+        else:
+            g.sh_afr_used = True
+            g.night_done.add("afrasiab")
+            who = "افراسیاب"
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, f"🛡 سپر به {t}. {g.seats[t][1]} داده شد.")
+        await _night_report(ctx, g,
+                            f"🛡 {who} → سپر به {t}. {escape(g.seats[t][1], quote=False)}")
+        # 🤫 به گیرندهٔ سپر چیزی گفته نمی‌شود — تازه وقتی تیر بهش بخورد،
+        #    وسطِ گروه معلوم می‌شود که سپر داشته
+        if data == "sh_kv_confirm":
+            await _sh_check_open_mafia(ctx, chat_id, g)
+        else:
+            await _maybe_notify_god_done(ctx, g)
+        return
+
+    # ── 🕯 حدسِ افراسیاب (بدون هیچ بازخوردی به خودش) ──
+    if data == "sh_afg_confirm":
+        t = g.night_sel.get(uid)
+        if not t:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        ros = _sh_seat(g, _R_ROSTAM, alive_only=False)
+        g.sh_afr_guess = t
+        g.sh_afr_guessed = True
+        g.sh_afr_correct = (ros is not None and ros == t)
+        await _room_note(ctx, g, f"🔗 حدسِ افراسیاب: <b>{_room_who(g, t)}</b> رستم است")
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, "✅ انتخابت ثبت شد.")
+        await _night_report(
+            ctx, g, f"🕯 حدسِ افراسیاب: {t}. {escape(g.seats[t][1], quote=False)} — "
+                    f"{'✅ درست (پیوند بسته شد)' if g.sh_afr_correct else '❌ غلط'}")
+        await _sh_ask_rostam(ctx, chat_id, g)
+        return
+
+    # ── 🪶 سیمرغ ──
+    if data in ("sh_sim_1", "sh_sim_2"):
+        n = 1 if data == "sh_sim_1" else 2
+        g.sh_sim_need = n
+        g.sh_sim_sel = []
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, _sh_sim_text(n),
+                       _kb_night_seats(_sh_sim_targets(g, me), g, "sh_sm_",
+                                       selected=set(), confirm_cb="sh_sm_confirm"))
+        return
+
+    if data == "sh_sm_confirm":
+        need = int(getattr(g, "sh_sim_need", 1) or 1)
+        sel = list(getattr(g, "sh_sim_sel", []) or [])
+        if len(sel) != need:
+            await safe_q_answer(q, f"باید دقیقاً {need} نفر انتخاب کنی.", show_alert=True)
+            return
+        g.sh_sim_holders = list(sel)
+        if me in sel:
+            g.sh_simorgh_self_used = True
+        g.sh_simorgh_left = max(0, int(getattr(g, "sh_simorgh_left", 0) or 0) - len(sel))
+        g.sh_sim_sel = []
+        g.night_done.add("simorgh")
+        store.save(chat_id)
+        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
+        await _close_pm(ctx, uid, mid,
+                        f"🪶 پر به {names} داده شد.\nپرهای باقی‌مانده: {g.sh_simorgh_left}")
+        await _night_report(ctx, g, f"🪶 سیمرغ → {escape(names, quote=False)} "
+                                    f"(باقی‌مانده: {g.sh_simorgh_left})")
+        await _sh_check_open_feathers(ctx, chat_id, g)
+        return
+
+    if data.startswith("sh_sm_"):
+        try:
+            s = int(data.rsplit("_", 1)[1])
+        except Exception:
+            return
+        need = int(getattr(g, "sh_sim_need", 1) or 1)
+        sel = list(getattr(g, "sh_sim_sel", []) or [])
+        if s in sel:
+            sel.remove(s)
+        else:
+            sel.append(s)
+        sel = sel[-need:]
+        g.sh_sim_sel = sel
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, _sh_sim_text(need),
+                       _kb_night_seats(_sh_sim_targets(g, me), g, "sh_sm_",
+                                       selected=set(sel), confirm_cb="sh_sm_confirm"))
+        return
+
+    # ── 🪶 صاحبانِ پر ──
+    if data == "sh_fe_self":
+        if me is None:
+            await safe_q_answer(q, "این دکمه مالِ خودِ بازیکن است.", show_alert=True)
+            return
+        await _close_pm(ctx, uid, mid, "🪶 پر برای خودت استفاده شد.")
+        await _sh_feather_resolve(ctx, chat_id, g, me, me)
+        return
+
+    if data == "sh_fe_other":
+        await _edit_pm(ctx, uid, mid, "🪶 پر را به چه کسی می‌دهی؟",
+                       _kb_night_seats(_sh_sel_targets(g, "sh_fo_", me), g, "sh_fo_",
+                                       selected=g.night_sel.get(uid), confirm_cb="sh_fo_confirm"))
+        return
+
+    if data == "sh_fo_confirm":
+        t = g.night_sel.get(uid)
+        if not t or me is None:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, f"🪶 پر به {t}. {g.seats[t][1]} داده شد.")
+        await _sh_feather_resolve(ctx, chat_id, g, me, t)
+        return
+
+    # ── 🌑 سایهٔ رستم ──
+    if data == "sh_ros_skip":
+        g.night_done.add("rostam")
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, "⏭ امشب سایه‌ای نگذاشتی.")
+        await _night_report(ctx, g, "🌑 رستم امشب سایه نگذاشت.")
+        await _maybe_notify_god_done(ctx, g)
+        return
+
+    if data == "sh_ros_confirm":
+        t = g.night_sel.get(uid)
+        if not t:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.sh_shadow_seat = t
+        g.sh_shadow_night = g.night_number
+        g.sh_shadow_used = True
+        g.sh_shadow_resolved = False
+        g.sh_shadow_announced = False
+        g.night_done.add("rostam")
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, f"🌑 سایه روی {t}. {g.seats[t][1]} گذاشته شد.")
+        await _night_report(ctx, g, f"🌑 سایهٔ رستم → {t}. {escape(g.seats[t][1], quote=False)}")
+        await _maybe_notify_god_done(ctx, g)
+        return
+
+    # ── 🔎 جاماسب ──
+    if data in ("sh_jam_shadow", "sh_jam_blood"):
+        blood = (data == "sh_jam_blood")
+        if blood:
+            g.sh_blood_used = True     # 🩸 فقط یک‌بار در کلِ بازی
+            store.save(chat_id)
+        pfx = "sh_jbl_" if blood else "sh_jsh_"
+        await _edit_pm(ctx, uid, mid,
+                       ("🩸 استعلام خونِ چه کسی را می‌گیری؟" if blood
+                        else "🌑 استعلام سایهٔ چه کسی را می‌گیری؟"),
+                       _kb_night_seats(_sh_sel_targets(g, pfx, me), g, pfx))
+        return
+
+    if data.startswith(("sh_jsh_", "sh_jbl_")):
+        try:
+            t = int(data.rsplit("_", 1)[1])
+        except Exception:
+            return
+        blood = data.startswith("sh_jbl_")
+        pos = _sh_blood_positive(g, t) if blood else _sh_shadow_positive(g, t)
+        g.night_done.add("jamasb")
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid,
+                        f"{'🩸 خون' if blood else '🌑 سایه'} — {t}. {g.seats[t][1]}: "
+                        + ("مثبت ✅" if pos else "منفی ❌"))
+        await _night_report(
+            ctx, g, f"🔎 جاماسب ({'خون' if blood else 'سایه'}) → "
+                    f"{t}. {escape(g.seats[t][1], quote=False)}: "
+                    f"{'مثبت' if pos else 'منفی'}")
+        await _maybe_notify_god_done(ctx, g)
+        return
+
+    # ── 🏹 آرش ──
+    if data == "sh_ar_confirm":
+        t = g.night_sel.get(uid)
+        if not t:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.sh_bow_holder = t
+        g.sh_bow_chain = []
+        g.sh_bow_aiming = None
+        g.sh_arash_used = True
+        g.night_done.add("arash")
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _close_pm(ctx, uid, mid, f"🏹 کمان به {t}. {g.seats[t][1]} داده شد.")
+        await _night_report(ctx, g, f"🏹 آرش → کمان به {t}. {escape(g.seats[t][1], quote=False)}")
+        try:
+            await ctx.bot.send_message(
+                g.seats[t][0],
+                "🏹 شما تیر و کمان دارید.\nدر روز با نوشتن «کمان» یا 🏹 در گروه می‌توانی شلیک کنی.")
+        except Exception:
+            pass
+        await _maybe_notify_god_done(ctx, g)
+        return
+
+    # ── انتخابِ صندلی (همهٔ منوهای بالا) ──
+    for _pfx, (_txt, _cfm, _back) in _SH_SEL.items():
+        if data.startswith(_pfx):
+            try:
+                s = int(data.rsplit("_", 1)[1])
+            except Exception:
+                return
+            g.night_sel[uid] = s
+            store.save(chat_id)
+            kb = _kb_night_seats(_sh_sel_targets(g, _pfx, me), g, _pfx,
+                                 selected=s, confirm_cb=_cfm)
+            if _pfx == "sh_ros_":
+                kb = InlineKeyboardMarkup(
+                    list(kb.inline_keyboard)
+                    + [[InlineKeyboardButton("⏭ امشب سایه نمی‌گذارم", callback_data="sh_ros_skip")]])
+            if _back:
+                kb = _kb_add_back(kb, _back)
+            await _edit_pm(ctx, uid, mid, _txt, kb)
+            return
+
+
+# ─────────────────── 💀 محاسبهٔ مرگِ شب ───────────────────
+async def _resolve_shahname(ctx, chat_id, g):
+    dead, reasons = set(), {}
+    saved = _sh_saved_seats(g)
+    blocked = _sh_kaveh_blocks(g)
+    st = g.night_shot_target
+    if st and st in g.seats:
+        if blocked:
+            await _night_report(ctx, g, "🔨 خشمِ کاوه: شاتِ امشبِ تیم اهریمن کشته نگرفت.")
+        elif st in saved:
+            pass                       # 🪶 پر سیمرغ
+        else:
+            dead.add(st)
+            reasons[st] = "شلیک تیم اهریمن"
+            # 🔨 خشمِ کاوه فقط با «شات‌شدنِ شب» فعال می‌شود —
+            #    رأیِ روز و کیک این اثر را ندارند.
+            if _sh_seat(g, _R_KAVEH, alive_only=False) == st:
+                g.sh_kaveh_out = True
+                g.sh_kaveh_block_night = (g.night_number or 0) + 1
+                store.save(chat_id)
+                await _night_report(
+                    ctx, g, "🔨 کاوه با شاتِ شب رفت — شبِ بعد شاتِ اهریمن کشته نمی‌گیرد.")
+    bv = _sh_boof_victim(g)
+    if bv:
+        dead.add(bv)
+        reasons[bv] = "پر سمی بوف"
+    _add_night_kick(g, dead, reasons)
+    await _apply_deaths(ctx, chat_id, g, dead, reasons)
+
+    # 🌑 اعلامِ سایه در روز (بدون لو رفتنِ خودِ رستم)
+    await _sh_announce_shadow(ctx, chat_id, g)
+
+    # 🏹 با رفتنِ دارندهٔ کمان، کمان هم از بین می‌رود
+    if getattr(g, "sh_bow_holder", None) and g.sh_bow_holder in (g.striked or set()):
+        g.sh_bow_holder = None
+        g.sh_bow_aiming = None
+        g.sh_bow_pending = None
+        g.sh_bow_changed = False
+        g.sh_bow_btn_mid = None
+        g.sh_bow_chain = []
+        store.save(chat_id)
+        await _night_report(ctx, g, "🏹 دارندهٔ کمان از بازی خارج شد — کمان از بین رفت.")
+
+
+async def _sh_announce_shadow(ctx, chat_id, g):
+    tgt = getattr(g, "sh_shadow_seat", None)
+    if not tgt or getattr(g, "sh_shadow_announced", False):
+        return
+    if (getattr(g, "sh_shadow_night", None) or 0) != g.night_number:
+        return
+    if tgt not in g.seats:
+        return
+    nm = escape(g.seats[tgt][1], quote=False)
+    if tgt in (g.striked or set()):
+        # 🌑 هدف همان شب رفت → سایه به رستم برمی‌گردد و در گروه هیچ اعلامی نمی‌شود
+        g.sh_shadow_seat = None
+        g.sh_shadow_night = None
+        g.sh_shadow_used = False
+        g.sh_shadow_resolved = False
+        g.sh_shadow_announced = False
+        store.save(chat_id)
+        await _night_report(
+            ctx, g,
+            f"🌑 هدفِ سایه ({tgt}. {nm}) همان شب از بازی خارج شد — "
+            f"سایه به رستم برگشت و چیزی در گروه اعلام نشد.")
+        return
+    g.sh_shadow_announced = True
+    store.save(chat_id)
+    await ctx.bot.send_message(
+        chat_id, f"🌑 <b>سایهٔ رستم روی {tgt}. {nm} است.</b>", parse_mode="HTML")
+
+
+async def _sh_check_link(ctx, chat_id, g):
+    """🔗 اگر افراسیاب رستم را درست بسته باشد، با خروجِ افراسیاب رستم هم می‌رود (جز کیک)."""
+    if not getattr(g, "sh_afr_correct", False) or getattr(g, "sh_link_done", False):
+        return
+    afr = _sh_seat(g, _R_AFRASIAB, alive_only=False)
+    ros = _sh_seat(g, _R_ROSTAM, alive_only=False)
+    if afr is None or ros is None:
+        return
+    if afr not in (g.striked or set()):
+        return
+    g.sh_link_done = True
+    store.save(chat_id)
+    if afr in (getattr(g, "score_kicked", set()) or set()):
+        await _night_report(ctx, g, "🔗 افراسیاب کیک شد — رستم با او خارج نمی‌شود.")
+        return
+    if ros in (g.striked or set()):
+        return
+    g.striked.add(ros)
+    store.save(chat_id)
+    try:
+        await ctx.bot.send_message(
+            chat_id,
+            f"🔗 با رفتنِ افراسیاب، <b>{ros}. {escape(g.seats[ros][1], quote=False)}</b> "
+            f"هم از بازی خارج شد.", parse_mode="HTML")
+    except Exception:
+        pass
+    await _night_report(ctx, g, f"🔗 پیوندِ افراسیاب–رستم: {ros} خط خورد.")
+    try:
+        await publish_seating(ctx, chat_id, g, mode=CTRL)
+    except Exception:
+        pass
+
+
+# ─────────────────── 🏹 کمانِ آرش (روز) ───────────────────
+def _sh_bow_shooter(g):
+    ch = list(getattr(g, "sh_bow_chain", []) or [])
+    return ch[-1] if ch else getattr(g, "sh_bow_holder", None)
+
+
+def _sh_bow_targets(g):
+    """هرکس که تا الان در زنجیرهٔ تیر بوده از هدف‌ها کنار می‌رود."""
+    used = set(getattr(g, "sh_bow_chain", []) or [])
+    h = getattr(g, "sh_bow_holder", None)
+    if h:
+        used.add(h)
+    return tuple(s for s in _alive_seats(g) if s not in used)
+
+
+async def _sh_bow_clear_buttons(ctx, chat_id, g):
+    mid = getattr(g, "sh_bow_btn_mid", None)
+    if not mid:
+        return
+    try:
+        await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=mid,
+                                                reply_markup=None)
+    except Exception:
+        pass
+    g.sh_bow_btn_mid = None
+    store.save(chat_id)
+
+
+async def _sh_arrow_aim(ctx, chat_id, g, shooter, target):
+    """🏹 نشانه‌گیریِ اولین کمان‌دار: هدف اعلام می‌شود تا دفاع کند؛ بعد از وقتِ دفاع،
+    دو دکمهٔ تصمیم می‌آید. فقط همین یک‌بار حقِ عوض‌کردنِ نظر دارد."""
+    g.sh_bow_pending = target
+    g.sh_bow_aiming = None
+    g.sh_bow_token = int(getattr(g, "sh_bow_token", 0) or 0) + 1
+    tok = g.sh_bow_token
+    store.save(chat_id)
+    tname = escape(g.seats[target][1], quote=False)
+    sname = escape(g.seats[shooter][1], quote=False)
+    await ctx.bot.send_message(
+        chat_id,
+        f"🏹 {shooter}. {sname} کمان را روی <b>{target}. {tname}</b> نشانه گرفت — "
+        f"او دفاع کند.\n"
+        f"<i>بعد از دفاع، دکمه‌های تصمیم برای {shooter}. {sname} می‌آید.</i>",
+        parse_mode="HTML")
+    await _night_report(ctx, g, f"🏹 نشانه‌گیریِ {shooter} → {target}. {tname} (منتظرِ دفاع)")
+    asyncio.create_task(_sh_bow_ask_later(ctx, chat_id, g, shooter, target, tok))
+
+
+async def _sh_bow_ask_later(ctx, chat_id, g, shooter, target, tok,
+                            delay=SH_BOW_DEFENSE_DELAY):
+    """⏳ بعد از وقتِ دفاع، دو دکمه‌ی «عوض می‌کنم / همینو می‌زنم» در گروه می‌آید."""
+    try:
+        await asyncio.sleep(delay)
+        if g.phase in ("idle", "ended") or getattr(g, "night_active", False):
+            return
+        if getattr(g, "sh_bow_token", None) != tok:
+            return
+        if getattr(g, "sh_bow_pending", None) != target:
+            return
+        kb = InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔁 عوض می‌کنم", callback_data="sh_bw_change"),
+            InlineKeyboardButton("🎯 همینو می‌زنم", callback_data="sh_bw_keep"),
+        ]])
+        m = await ctx.bot.send_message(
+            chat_id,
+            f"🏹 {shooter}. {escape(g.seats[shooter][1], quote=False)} — "
+            f"هدفت <b>{target}. {escape(g.seats[target][1], quote=False)}</b> است. تصمیمت؟",
+            parse_mode="HTML", reply_markup=kb)
+        g.sh_bow_btn_mid = m.message_id
+        store.save(chat_id)
+    except Exception as e:
+        print("⚠️ sh bow ask err:", e)
+
+
+# 🔀 مسیر در mafia_bot: callback_route('sh_bw_')
+async def handle_sh_bow_callback(update, ctx):
+    """🏹 دکمه‌های تصمیمِ کمان — فقط کسی که کمان دستش است."""
+    q = update.callback_query
+    uid = q.from_user.id
+    g, chat_id = _sh_find_game(uid)
+    if g is None or not getattr(g, "sh_bow_holder", None):
+        await safe_q_answer(q, "کمانی در جریان نیست.", show_alert=True)
+        return
+    seat = _seat_of_uid(g, uid)
+    if seat is None or seat != _sh_bow_shooter(g):
+        await safe_q_answer(q, "⛔ فقط کسی که کمان دستش است.", show_alert=True)
+        return
+    pend = getattr(g, "sh_bow_pending", None)
+    if pend is None:
+        await safe_q_answer(q, "تصمیم قبلاً گرفته شده.", show_alert=True)
+        return
+    await safe_q_answer(q)
+    await _sh_bow_clear_buttons(ctx, chat_id, g)
+    g.sh_bow_pending = None
+
+    if q.data == "sh_bw_keep":
+        store.save(chat_id)
+        await _sh_arrow_fire(ctx, chat_id, g, seat, pend)
+        return
+
+    # 🔁 عوض می‌کنم — تنها فرصتش؛ عددِ بعدی مستقیم شلیک می‌شود
+    g.sh_bow_changed = True
+    g.sh_bow_aiming = seat
+    store.save(chat_id)
+    await ctx.bot.send_message(
+        chat_id,
+        f"🔁 {seat}. {escape(g.seats[seat][1], quote=False)} نظرش را عوض کرد — "
+        f"حالا شماره‌ی صندلیِ جدید را بنویس.\n"
+        f"<i>این تیر دیگر برگشت ندارد.</i>", parse_mode="HTML")
+    await _night_report(ctx, g, f"🏹 {seat} نظرش را عوض کرد — منتظرِ عددِ جدید.")
+
+
+async def _sh_arrow_fire(ctx, chat_id, g, shooter, target):
+    chain = list(getattr(g, "sh_bow_chain", []) or [])
+    shielded = target in (getattr(g, "sh_shields", set()) or set())
+    tname = escape(g.seats[target][1], quote=False)
+    g.sh_bow_aiming = None
+    g.sh_bow_pending = None
+    g.sh_bow_changed = False
+    await _sh_bow_clear_buttons(ctx, chat_id, g)
+    # 🛡 سپردار: کمان به خودش می‌رسد — ولی نفرِ سوم دیگر منحرف نمی‌شود
+    if shielded and len(chain) < 2:
+        chain.append(target)
+        g.sh_bow_chain = chain
+        g.sh_bow_aiming = target
+        store.save(chat_id)
+        await ctx.bot.send_message(
+            chat_id,
+            f"🛡 {target}. {tname} <b>سپر دارد</b> — تیر کارگر نشد.\n"
+            f"🏹 حالا <b>کمان دستِ اوست</b>: فقط شماره‌ی صندلی را بنویسد "
+            f"(دیگر حقِ عوض‌کردنِ نظر نیست).",
+            parse_mode="HTML")
+        await _night_report(ctx, g, f"🏹 تیر به {target}. {tname} خورد ولی سپر داشت — "
+                                    f"کمان به او رسید.")
+        return
+    g.sh_bow_holder = None
+    g.sh_bow_pending = None
+    g.sh_bow_chain = []
+    g.striked.add(target)
+    store.save(chat_id)
+    await ctx.bot.send_message(chat_id, f"💥 تیرِ آرش — {target}. {tname} وصیت کند.",
+                               parse_mode="HTML")
+    try:
+        await publish_seating(ctx, chat_id, g, mode=CTRL)
+    except Exception:
+        pass
+    await _night_report(ctx, g, f"🏹 تیرِ آرش: {shooter} → {target}. {tname} "
+                                f"(خارج شد، {_sc_side(g, target)})")
+    await _check_auto_end(ctx, chat_id, g)   # 🏁
+
+    _tside = _sc_side(g, target)
+
+    async def _sh_side_later():
+        try:
+            await asyncio.sleep(SIDE_ANNOUNCE_DELAY)
+            if g.phase in ("idle", "ended"):
+                return
+            await ctx.bot.send_message(chat_id, f"ساید {target}. {tname}: <b>{_tside}</b>",
+                                       parse_mode="HTML")
+        except Exception as e:
+            print("⚠️ sh side announce err:", e)
+    asyncio.create_task(_sh_side_later())
+
+
+# ─────────────────── 🗳 رأی‌گیریِ شاهنامه (روز ۱) ───────────────────
+def _sh_find_game(uid):
+    """بازیِ شاهنامه‌ای که این کاربر بازیکن/گادِ آن است (برای دکمه‌های روز)."""
+    found = [(cid, game) for cid, game, _seat in store.index.player_games(uid)]
+    found += store.index.god_games(uid)
+    for cid, game in found:
+        if not _is_shahname_scenario(game):
+            continue
+        if game.phase in ("idle", "ended"):
+            continue
+        if _seat_of_uid(game, uid) is not None or game.god_id == uid:
+            return game, cid
+    return None, None
+
+
+def _sh_vote_end_kb():
+    return InlineKeyboardMarkup([[InlineKeyboardButton("✅ پایان شمارش", callback_data="shd_end")]])
+
+
+async def _sh_vote_msg(ctx, chat_id, g, text):
+    old = getattr(g, "sh_vote_kb_mid", None)
+    if old:
+        try:
+            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=old,
+                                                    reply_markup=None)
+        except Exception:
+            pass
+    m = await ctx.bot.send_message(chat_id, text, parse_mode="HTML",
+                                   reply_markup=_sh_vote_end_kb())
+    g.sh_vote_kb_mid = m.message_id
+    store.save(chat_id)
+
+
+async def _sh_vote_capture(ctx, g, msg, uid, text) -> bool:
+    vs = _seat_of_uid(g, uid)
+    if vs is None or vs in (g.striked or set()) or uid == g.god_id:
+        return False
+    v = _deng_parse_strict(text, tuple(s for s in _alive_seats(g) if s != vs))
+    if v is not None:
+        g.sh_vote_seq = int(getattr(g, "sh_vote_seq", 0) or 0) + 1
+        g.sh_vote_votes[uid] = (v, g.sh_vote_seq)
+        g.sh_vote_unread.discard(uid)
+        store.save(_game_chat_id(g))
+        if all(g.seats[s][0] in g.sh_vote_votes for s in _alive_seats(g)):
+            await _sh_vote_count(ctx, msg.chat.id, g)
+        return True
+    if uid not in (g.sh_vote_votes or {}):
+        _first = uid not in (g.sh_vote_unread or set())
+        g.sh_vote_unread.add(uid)
+        store.save(_game_chat_id(g))
+        if _first:
+            try:
+                await msg.reply_text(f"⚠️ {vs}. {g.seats[vs][1]} رأیت خوانده نشد — "
+                                     f"فقط شماره‌ی یکی از صندلی‌ها را بنویس (به‌جز خودت).")
+            except Exception:
+                pass
+        return True
+    return False
+
+
+async def _sh_vote_count(ctx, chat_id, g):
+    if not getattr(g, "sh_vote_active", False):
+        return
+    alive = set(_alive_seats(g))
+    picks = {}
+    for u, (t, _sq) in dict(g.sh_vote_votes or {}).items():
+        vs = _seat_of_uid(g, u)
+        if vs is None or vs not in alive or t not in alive or t == vs:
+            continue
+        picks[vs] = t
+    g.sh_vote_active = False
+    old = getattr(g, "sh_vote_kb_mid", None)
+    if old:
+        try:
+            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=old,
+                                                    reply_markup=None)
+        except Exception:
+            pass
+    g.sh_vote_kb_mid = None
+    store.save(chat_id)
+
+    duels = sorted((a, b) for a, b in picks.items() if a < b and picks.get(b) == a)
+    if duels:
+        g.sh_duels = [list(d) for d in duels]
+        g.sh_council_votes = {}
+        g.sh_council_sel = {}
+        g.sh_council_done = False
+        store.save(chat_id)
+        lines = ["⚔️ <b>مبارزهٔ تن‌به‌تن</b> شکل گرفت:"]
+        for a, b in duels:
+            lines.append(f"• {a}. {escape(g.seats[a][1], quote=False)} ⚔️ "
+                         f"{b}. {escape(g.seats[b][1], quote=False)}")
+        lines.append("\n🏛 حالا نظرِ انجمن گرفته می‌شود.")
+        kb = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🏛 پرسش از انجمن", callback_data="shd_cask")],
+            [InlineKeyboardButton("🏛 پایانِ نظرِ انجمن", callback_data="shd_cdone")],
+        ])
+        _dm = await ctx.bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML",
+                                         reply_markup=kb)
+        g.sh_duel_msg_id = _dm.message_id
+        store.save(chat_id)
+        await _night_report(ctx, g, "⚔️ مبارزه‌ها ثبت شد — با «باز کردن چت مافیا» (یا دکمهٔ "
+                                    "«پرسش از انجمن») نظرِ انجمن گرفته می‌شود.")
+        return
+
+    counts = {}
+    for _vs, t in picks.items():
+        counts[t] = counts.get(t, 0) + 1
+    high = sorted(s for s, c in counts.items() if c >= SH_VOTE_THRESHOLD)
+    g.sh_vote_high = high
+    store.save(chat_id)
+    if not high:
+        await ctx.bot.send_message(
+            chat_id, f"🗳 مبارزه‌ای شکل نگرفت و کسی هم به حدنصابِ {SH_VOTE_THRESHOLD} رأی نرسید.")
+        return
+    txt = "🗳 <b>به رأی‌گیریِ نهایی می‌روند:</b>\n" + "\n".join(
+        f"• {s}. {escape(g.seats[s][1], quote=False)} — {counts[s]} رأی" for s in high)
+    kb = InlineKeyboardMarkup([[InlineKeyboardButton("✅ تأیید و ساختِ رأی نهایی",
+                                                     callback_data="shd_ok")]])
+    await ctx.bot.send_message(chat_id, txt, parse_mode="HTML", reply_markup=kb)
+
+
+# ─────────────────── 🏛 انجمن ───────────────────
+def _sh_council_seats(g):
+    """اعضای زندهٔ انجمن: ضحاک، رستم، کاوه."""
+    out = set()
+    for key in (_R_ZAHHAK, _R_ROSTAM, _R_KAVEH):
+        s = _sh_seat(g, key)
+        if s is not None:
+            out.add(s)
+    return sorted(out)
+
+
+def _sh_duel_label(g, d):
+    return f"{d[0]} و {d[1]}"
+
+
+def _sh_council_kb(g, sel):
+    rows = []
+    for i, d in enumerate(getattr(g, "sh_duels", []) or []):
+        mark = "✅ " if i in sel else ""
+        rows.append([InlineKeyboardButton(f"{mark}{_sh_duel_label(g, d)}",
+                                          callback_data=f"sh_cd_{i}")])
+    rows.append([InlineKeyboardButton("✅ تأیید", callback_data="sh_cd_ok")])
+    return InlineKeyboardMarkup(rows)
+
+
+async def _sh_council_ask(ctx, chat_id, g):
+    duels = getattr(g, "sh_duels", []) or []
+    if not duels or getattr(g, "sh_council_done", False):
+        return
+    members = _sh_council_seats(g)
+    if not members:
+        await _night_report(ctx, g, "🏛 هیچ عضوِ زنده‌ای در انجمن نمانده.")
+        return
+    # 🔒 هرکس نظرش را داده دیگر پرسیده نمی‌شود (تا نتواند عوضش کند)
+    done = getattr(g, "sh_council_votes", {}) or {}
+    pending = [s for s in members if g.seats[s][0] not in done]
+    if not pending:
+        await _night_report(ctx, g, "🏛 همهٔ اعضای انجمن نظرشان را داده‌اند.")
+        return
+    unreachable = []
+    for s in pending:
+        uid = g.seats[s][0]
+        sel = set((getattr(g, "sh_council_sel", {}) or {}).get(uid, []) or [])
+        if not await _safe_pm(ctx, uid, _SH_COUNCIL_Q, _sh_council_kb(g, sel)):
+            unreachable.append(s)
+    rep = f"🏛 پرسشِ انجمن برای {len(pending)} نفر فرستاده شد."
+    if unreachable:
+        # ⚠️ پیامش نرسیده (آفلاین/پیویِ بسته) → گاد باید بداند، وگرنه «مخالف» حساب می‌شود
+        rep += ("\n⚠️ به این‌ها نرسید: "
+                + "، ".join(f"{s}. {escape(g.seats[s][1], quote=False)}" for s in unreachable)
+                + "\nمی‌توانی با «🎛 اکت دستی» جای‌شان جواب بدهی.")
+    await _night_report(ctx, g, rep)
+
+
+def _sh_council_missing(g):
+    """🏛 اعضای زندهٔ انجمن که هنوز نظرشان را نداده‌اند."""
+    votes = getattr(g, "sh_council_votes", {}) or {}
+    return [s for s in _sh_council_seats(g) if g.seats[s][0] not in votes]
+
+
+async def _sh_council_resolve(ctx, chat_id, g, force=False):
+    """🏛 جمع‌بندیِ نظرِ انجمن → ساختِ رأی نهایی، یا رفتن به شب.
+
+    ⚠️ اگر کسی هنوز جواب نداده (آفلاین/پیویِ بسته)، ساکت جمع‌بندی نمی‌کند —
+    اسمِ جامانده‌ها را به گاد می‌گوید و منتظرِ تأییدِ صریحش می‌ماند."""
+    duels = getattr(g, "sh_duels", []) or []
+    if not duels or getattr(g, "sh_council_done", False):
+        return
+    missing = _sh_council_missing(g)
+    if missing and not force:
+        nm = "\n".join(f"• {s}. {escape(g.seats[s][1], quote=False)} "
+                       f"({escape(str((g.assigned_roles or {}).get(s, '—')), quote=False)})"
+                       for s in missing)
+        # 📩 مستقیم به پیویِ گاد (نه _safe_pm — که اگر گاد خودش بازیکنِ سوخته باشد رد می‌شود)
+        try:
+            await ctx.bot.send_message(
+                g.god_id,
+                f"⚠️ <b>هنوز {len(missing)} نفر از انجمن نظر نداده‌اند:</b>\n{nm}\n\n"
+                f"<i>اگر آفلاین‌اند یا پیویشان بسته است، می‌توانی جای‌شان با «🎛 اکت دستی» "
+                f"جواب بدهی. اگر همین‌طور جمع‌بندی کنی، نظرنداده «مخالف» حساب می‌شود.</i>\n\n"
+                f"🏛 جمع‌بندی کنم؟",
+                parse_mode="HTML",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("✅ همین‌طور جمع‌بندی کن", callback_data="shd_cforce"),
+                    InlineKeyboardButton("⏳ صبر می‌کنم", callback_data="shd_cwait"),
+                ]]))
+        except Exception as e:
+            print("⚠️ council warn:", e)
+            # اگر پیویِ گاد بسته بود، دستِ‌کم در گروه بگو چرا جمع‌بندی نشد
+            try:
+                await ctx.bot.send_message(
+                    chat_id, "🏛 هنوز همهٔ اعضای انجمن نظر نداده‌اند — گاد پیویِ بات را چک کند.")
+            except Exception:
+                pass
+        return
+    g.sh_council_done = True
+    # 🧹 دکمه‌های «پرسش از انجمن / پایانِ نظرِ انجمن» از گروه برداشته شوند
+    _dm = getattr(g, "sh_duel_msg_id", None)
+    if _dm:
+        try:
+            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=_dm,
+                                                    reply_markup=None)
+        except Exception:
+            pass
+        g.sh_duel_msg_id = None
+    members = _sh_council_seats(g)
+    votes = getattr(g, "sh_council_votes", {}) or {}
+    total = len(members)
+    approved = []
+    tally = []
+    for i, _d in enumerate(duels):
+        yes = sum(1 for s in members if i in (votes.get(g.seats[s][0], []) or []))
+        okay = bool(total and yes * 2 > total)      # اکثریتِ اعضای زندهٔ انجمن
+        if okay:
+            approved.append(i)
+        tally.append(f"• {_sh_duel_label(g, duels[i])} → {yes} از {total} "
+                     + ("✅ تأیید" if okay else "❌ رد"))
+    store.save(chat_id)
+    # 📊 شمارشِ شفاف به گاد، تا هیچ‌وقت نتیجه مبهم نباشد
+    await _night_report(ctx, g, "🏛 <b>شمارشِ انجمن</b> (نظرنداده = مخالف):\n"
+                                + "\n".join(tally))
+
+    if not approved:
+        await ctx.bot.send_message(chat_id, "🏛 انجمن با هیچ مبارزه‌ای موافقت نکرد — شب می‌شود.")
+        await _night_report(ctx, g, "🏛 هیچ مبارزه‌ای تأیید نشد → شب خودکار شروع شد.")
+        await start_night(ctx, chat_id, g)
+        return
+
+    lines = ["🏛 <b>اعضای انجمن موافقِ برگزاری این مبارزه‌ها بودند:</b>"]
+    seats = []
+    for i in approved:
+        a, b = duels[i][0], duels[i][1]
+        lines.append(f"• {a}. {escape(g.seats[a][1], quote=False)} ⚔️ "
+                     f"{b}. {escape(g.seats[b][1], quote=False)}")
+        for s in (a, b):
+            if s in g.seats and s not in (g.striked or set()) and s not in seats:
+                seats.append(s)
+    await ctx.bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML")
+    await _sh_open_final_vote(ctx, chat_id, g, seats)
+
+
+async def _sh_open_final_vote(ctx, chat_id, g, seats):
+    seats = [s for s in seats if s in g.seats and s not in (g.striked or set())]
+    if not seats:
+        await ctx.bot.send_message(chat_id, "ℹ️ کسی برای رأی‌گیریِ نهایی نماند.")
+        return
+    g.votes_cast = {}
+    g.vote_logs = {}
+    g.current_vote_target = None
+    g.voted_targets = set()
+    g.defense_selection = []
+    g.defense_seats = list(seats)
+    g.vote_type = "defense_selected"
+    store.save(chat_id)
+    note = ("\n⚠️ چون فقط دو نفر در رأی‌گیریِ نهایی‌اند، به یکدیگر رأی نمی‌دهند."
+            if len(seats) == 2 else
+            "\nℹ️ چون بیش از دو نفر در رأی‌گیریِ نهایی‌اند، همه به همه می‌توانند رأی بدهند.")
+    await ctx.bot.send_message(
+        chat_id, f"🛡 صندلی‌های دفاع: {'، '.join(map(str, seats))}{note}")
+    await start_vote(ctx, chat_id, g, "final")
+    try:
+        await publish_seating(ctx, chat_id, g, mode=CTRL)
+    except Exception:
+        pass
+
+
+# 🔀 مسیر در mafia_bot: callback_route('shd_')
+async def handle_shahname_god_callback(update, ctx):
+    """⚔️ دکمه‌های گادِ شاهنامه (در گروه): پایانِ شمارش / تأیید / انجمن."""
+    q = update.callback_query
+    uid = q.from_user.id
+    g, chat_id = _sh_find_game(uid)
+    if g is None or uid != g.god_id:
+        await safe_q_answer(q, "⛔ فقط گادِ بازی.", show_alert=True)
+        return
+    await safe_q_answer(q)
+    data = q.data
+
+    if data == "shd_end":
+        await _sh_vote_count(ctx, chat_id, g)
+        return
+
+    if data == "shd_ok":
+        high = [s for s in (getattr(g, "sh_vote_high", []) or [])
+                if s in g.seats and s not in (g.striked or set())]
+        if not high:
+            await safe_q_answer(q, "کسی در فهرست نیست.", show_alert=True)
+            return
+        g.sh_vote_high = []
+        store.save(chat_id)
+        await _sh_open_final_vote(ctx, chat_id, g, high)
+        return
+
+    if data == "shd_cask":
+        await _sh_council_ask(ctx, chat_id, g)
+        return
+
+    if data == "shd_cdone":
+        await _sh_council_resolve(ctx, chat_id, g)
+        return
+
+    if data == "shd_cforce":
+        await _sh_council_resolve(ctx, chat_id, g, force=True)
+        return
+
+    if data == "shd_cwait":
+        _m = _sh_council_missing(g)
+        await _adm_send(ctx, uid, "⏳ باشد — هر وقت جواب دادند دوباره «🏛 پایانِ نظرِ انجمن» را بزن."
+                        + ("\nمانده: " + "، ".join(
+                            f"{s}. {escape(g.seats[s][1], quote=False)}" for s in _m)
+                           if _m else ""))
+        return
@@ -0,0 +1,735 @@
+# 🧩 بدنه‌ی موتورِ سناریو «تکاور»
+# این فایل import نمی‌شود: mafia_bot._engine_load آن را (با اولین صدا زدنِ یکی از
+# توابعش) داخلِ فضای نامِ mafia_bot اجرا می‌کند؛ ثابت‌ها، _R_*ها و کمک‌تابع‌های
+# مشترک از همان‌جا دیده می‌شوند. ثبتِ callbackها و جانشین‌ها در mafia_bot است.
+from __future__ import annotations
+
+
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «تکاور»
+#  ترتیب: (سوال شیلد از گاد) → نگهبان + گروگانگیر → مافیا →
+#          کاراگاه/پزشک/تکاور → تفنگدار (آخر از همه)
+# ═════════════════════════════════════════════════════════════
+def _tk_blocked(g, seat) -> bool:
+    """گرو گرفته شده و نگهبانی نشده → حق اکت ندارد."""
+    return (g.night_hostage_seat == seat) and (seat not in set(g.night_guard_seats or []))
+
+
+def _tk_guide_positive(g, seat) -> bool:
+    # استعلام کاراگاه: ناتو و گروگانگیر مثبت، بقیه منفی
+    return _seat_role_norm(g, seat) in (_R_NATO, _R_HOSTAGE)
+
+
+async def _tk_notify_hostaged(ctx, g, seat):
+    # پیامِ «گرو گرفته شدید» به‌صورت مرکزی در _tk_send_hostage_notice ارسال می‌شود
+    await _night_report(ctx, g, f"🔒 صندلی {seat} گرو گرفته شده و اکت نداد.")
+
+
+async def _tk_send_hostage_notice(ctx, g):
+    """پیامِ «گرو گرفته شدید» — فقط برای نقش‌دارهای اکت‌دار (کاراگاه/پزشک/تفنگدار/تکاور،
+    حتی تکاورِ شات‌نشده)؛ نگهبان مستثنی است و نگهبانی‌شده هم بی‌خبر می‌ماند."""
+    hs = getattr(g, "night_hostage_seat", None)
+    if not hs or hs not in g.seats:
+        return
+    if hs in set(g.night_guard_seats or []):
+        return   # نگهبانی شده → اکتِ عادی، بدون هیچ پیامی (گروگانگیر هم نمی‌فهمد)
+    rn = _seat_role_norm(g, hs)
+    if rn in (_R_DETECTIVE, _R_DOCTOR, _R_GUNMAN, _R_COMMANDO):
+        try:
+            await ctx.bot.send_message(g.seats[hs][0], "🔒 شما گرو گرفته شده‌اید و امشب حق اکت ندارید.")
+        except Exception:
+            pass
+        await _night_report(ctx, g, f"🔒 پیامِ گرو به {hs}. {escape(g.seats[hs][1], quote=False)} رفت.")
+
+
+async def _tk_open_shield(ctx, chat_id, g):
+    # 🛡 خودکار: شیلد فقط با اجماعِ رأی نهایی می‌افتد (tk_shield_lost) — سؤالی از گاد پرسیده نمی‌شود
+    g.night_shield = not getattr(g, "tk_shield_lost", False)
+    g.night_done.add("shield")
+    store.save(chat_id)
+    await _tk_open_first(ctx, chat_id, g)
+
+
+async def _tk_open_first(ctx, chat_id, g):
+    # 🛡 نگهبان (اگر شیلد دارد)
+    watch = _find_seat_by_role(g, _R_WATCHMAN)
+    if g.night_shield and watch:
+        wuid = g.seats[watch][0]
+        need = 2 if g.night_alive_at_start >= 8 else 1
+        g.tk_guard_need = need
+        targets = [s for s in _alive_seats(g) if s != watch]
+        m = await _safe_pm(ctx, wuid, f"🛡 از چه کسانی نگهبانی می‌دهی؟ (تا {need} نفر)",
+                           _kb_night_seats(targets, g, "tk_grd_", selected=set(), confirm_cb="tk_grd_confirm"))
+        if m:
+            g.night_pm_msgs[wuid] = m.message_id
+    else:
+        g.night_done.add("watchman")
+
+    # 🔒 گروگانگیر (اسپم ندارد: دو شب متوالی یک نفر ممنوع؛ رد شدن هم آزاد است)
+    host = _find_seat_by_role(g, _R_HOSTAGE)
+    if host:
+        huid = g.seats[host][0]
+        targets = [s for s in _alive_seats(g) if s != host and s != g.hostage_last_target]
+        kb = _kb_night_seats(targets, g, "tk_host_",
+                             selected=g.night_sel.get(huid), confirm_cb="tk_host_confirm")
+        rows = list(kb.inline_keyboard) + [
+            [InlineKeyboardButton("⏭ امشب گرو نمی‌گیرم", callback_data="tk_host_skip")]
+        ]
+        m = await _safe_pm(ctx, huid, "🔒 چه کسی را گرو می‌گیری؟", InlineKeyboardMarkup(rows))
+        if m:
+            g.night_pm_msgs[huid] = m.message_id
+    else:
+        g.night_done.add("hostage")
+    store.save(chat_id)
+    await _tk_check_open_mafia(ctx, chat_id, g)
+
+
+async def _tk_check_open_mafia(ctx, chat_id, g):
+    if "mafia_opened" in g.night_done:
+        return
+    if "watchman" not in g.night_done or "hostage" not in g.night_done:
+        return
+    g.night_done.add("mafia_opened")
+    store.save(chat_id)
+    # 🔒 حالا که هم نگهبان هم گروگانگیر مشخص شده‌اند، پیامِ گرو ارسال می‌شود
+    await _tk_send_hostage_notice(ctx, g)
+    await _tk_open_mafia(ctx, chat_id, g)
+
+
+async def _tk_open_mafia(ctx, chat_id, g):
+    gf = _find_seat_by_role(g, _R_GODFATHER)
+    nato = _find_seat_by_role(g, _R_NATO)
+    host = _find_seat_by_role(g, _R_HOSTAGE)
+    decider = gf or nato or host
+    if not decider:
+        # 🤝 اگر مافیای اصلی نمانده، جذب‌شده (مذاکره/یاکوزایی/خریداری) صاحبِ شات می‌شود
+        converted = sorted(_mafia_seats(g, alive_only=True))
+        decider = converted[0] if converted else None
+    if not decider:
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _tk_check_open_citizens(ctx, chat_id, g)
+        return
+    g.tk_decider_seat = decider
+    duid = g.seats[decider][0]
+    rows = [[InlineKeyboardButton("🔫 شات", callback_data="tk_shot")]]
+    if nato is not None and not g.nato_used:
+        rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="tk_nato")])
+    m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:",
+                       InlineKeyboardMarkup(rows))
+    if m:
+        g.night_pm_msgs[duid] = m.message_id
+    store.save(chat_id)
+
+
+async def _tk_check_open_citizens(ctx, chat_id, g):
+    if "citizens_opened" in g.night_done:
+        return
+    if "mafia" not in g.night_done:
+        return
+    g.night_done.add("citizens_opened")
+    store.save(chat_id)
+    await _tk_open_citizens(ctx, chat_id, g)
+
+
+async def _tk_open_citizens(ctx, chat_id, g):
+    # 🔎 کاراگاه
+    det = _find_seat_by_role(g, _R_DETECTIVE)
+    if not det:
+        g.night_done.add("detective")
+    elif _tk_blocked(g, det):
+        await _tk_notify_hostaged(ctx, g, det)
+        g.night_done.add("detective")
+    else:
+        duid = g.seats[det][0]
+        targets = [s for s in _alive_seats(g) if s != det]
+        m = await _safe_pm(ctx, duid, "🔎 استعلام چه کسی را می‌گیری؟",
+                           _kb_night_seats(targets, g, "tk_det_"))
+        if m:
+            g.night_pm_msgs[duid] = m.message_id
+
+    # 💉 پزشک
+    doc = _find_seat_by_role(g, _R_DOCTOR)
+    if not doc:
+        g.night_done.add("doctor")
+    elif _tk_blocked(g, doc):
+        await _tk_notify_hostaged(ctx, g, doc)
+        g.night_done.add("doctor")
+    else:
+        duid = g.seats[doc][0]
+        need = 2 if g.night_alive_at_start >= 8 else 1
+        g.night_doc_need = need
+        targets = _doctor_targets(g, doc)
+        m = await _safe_pm(ctx, duid, f"💉 چه کسی را سیو می‌دهی؟ (تا {need} نفر)",
+                           _kb_night_seats(targets, g, "tk_doc_", selected=set(),
+                                           confirm_cb="tk_doc_confirm"))
+        if m:
+            g.night_pm_msgs[duid] = m.message_id
+
+    # 🎖 تکاور — فقط اگر مافیا او را «شات» کرده باشد، بلاک نباشد و تیرش نسوخته باشد
+    com = _find_seat_by_role(g, _R_COMMANDO)
+    if (com and g.night_shot_target == com and not _tk_blocked(g, com)
+            and not getattr(g, "tk_com_burned", False)):
+        cuid = g.seats[com][0]
+        targets = [s for s in _alive_seats(g) if s != com]
+        m = await _safe_pm(ctx, cuid, "🎖 شما شات شدید! می‌توانید یک نفر را بزنید (یک‌بار):",
+                           _kb_night_seats(targets, g, "tk_com_",
+                                           selected=g.night_sel.get(cuid), confirm_cb="tk_com_confirm"))
+        if m:
+            g.night_pm_msgs[cuid] = m.message_id
+    else:
+        if com and g.night_shot_target == com and getattr(g, "tk_com_burned", False):
+            await _night_report(ctx, g, "🎖 تکاور دوباره شات شد، اما تیرش قبلاً سوخته — ضدشلیکی ندارد.")
+        g.night_done.add("commando")
+    store.save(chat_id)
+    await _tk_check_open_gunman(ctx, chat_id, g)
+
+
+async def _tk_check_open_gunman(ctx, chat_id, g):
+    if "gunman_opened" in g.night_done:
+        return
+    if not all(k in g.night_done for k in ("detective", "doctor", "commando")):
+        return
+    g.night_done.add("gunman_opened")
+    store.save(chat_id)
+    await _tk_open_gunman(ctx, chat_id, g)
+
+
+async def _tk_open_gunman(ctx, chat_id, g):
+    if g.war_gun_used:
+        g.night_done.add("gunman")
+        store.save(chat_id)
+        return
+    gun = _find_seat_by_role(g, _R_GUNMAN)
+    if not gun:
+        g.night_done.add("gunman")
+        store.save(chat_id)
+        return
+    if _tk_blocked(g, gun):
+        await _tk_notify_hostaged(ctx, g, gun)
+        g.night_done.add("gunman")
+        store.save(chat_id)
+        return
+    guid = g.seats[gun][0]
+    kb = InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ بله", callback_data="tk_gun_yes")],
+        [InlineKeyboardButton("🚫 خیر", callback_data="tk_gun_no")],
+    ])
+    m = await _safe_pm(ctx, guid, "🔫 آیا امشب تفنگ می‌دهی؟", kb)
+    if m:
+        g.night_pm_msgs[guid] = m.message_id
+    store.save(chat_id)
+
+
+def _tk_gun_type_kb(g, target, gun_num, gun_seat):
+    allow_war = (target != gun_seat)  # به خودش تفنگ جنگی نمی‌دهد
+    if gun_num == 2 and g.night_gun1_type == "war":
+        allow_war = False              # اگر تفنگ اول جنگی بود، دومی جنگی نمی‌شود
+    rows = []
+    if allow_war:
+        rows.append([InlineKeyboardButton("🔴 جنگی", callback_data=f"tk_g{gun_num}war")])
+    rows.append([InlineKeyboardButton("⚪ مشقی", callback_data=f"tk_g{gun_num}blank")])
+    return InlineKeyboardMarkup(rows)
+
+
+async def _tk_ask_gun2(ctx, uid, mid):
+    kb = InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ بله", callback_data="tk_gun2_yes")],
+        [InlineKeyboardButton("🚫 خیر", callback_data="tk_gun2_no")],
+    ])
+    await _edit_pm(ctx, uid, mid, "🔫 آیا تفنگ دوم هم می‌دهی؟", kb)
+
+
+async def _tk_finalize_gunman(ctx, chat_id, g, uid, mid):
+    recips = []
+    for t, typ in ((g.night_gun1_target, g.night_gun1_type), (g.night_gun2_target, g.night_gun2_type)):
+        if t and typ:
+            recips.append((t, typ))
+    # تفنگ جنگی → مصرف و ثبت دارنده
+    for t, typ in recips:
+        if typ == "war":
+            g.war_gun_used = True
+            g.war_gun_holder = t
+    # به گیرنده‌ها فقط بگو «تفنگ دارید» (بدون نوع)
+    for t, typ in recips:
+        try:
+            await ctx.bot.send_message(g.seats[t][0], "🔫 شما تفنگ دارید.")
+        except Exception:
+            pass
+    # گزارش کامل (با نوع) به گاد
+    def _lbl(t, typ):
+        nm = g.seats[t][1]
+        return f"{t}. {nm} ({'جنگی🔴' if typ == 'war' else 'مشقی⚪'})"
+    parts = [_lbl(t, typ) for t, typ in recips] or ["—"]
+    await _close_pm(ctx, uid, mid, "🔫 توزیع تفنگ ثبت شد.")
+    await _night_report(ctx, g, "🔫 تفنگدار → " + " | ".join(parts))
+    # 🔫 گان‌ها فردا (روزِ بعد) با نوشتنِ «گان» در گروه قابلِ شلیک‌اند
+    g.tk_day_guns = {t: typ for t, typ in recips}
+    g.tk_gun_aiming = None
+    g.night_done.add("gunman")
+    store.save(chat_id)
+
+
+async def _tk_day_gun_fire(ctx, chat_id, g, shooter, target):
+    """🔫 شلیکِ گانِ روز: مشقی = هیچ؛ جنگی = خروج (نگهبانِ شیلددار → فقط افتادنِ شیلد)."""
+    typ = (g.tk_day_guns or {}).pop(shooter, None)
+    g.tk_gun_aiming = None
+    store.save(chat_id)
+    if typ is None or target not in g.seats:
+        return
+    tname = escape(g.seats[target][1], quote=False)
+    sname = escape(g.seats[shooter][1], quote=False)
+    if typ != "war":
+        await ctx.bot.send_message(
+            chat_id, f"💨 تیر مشقی بود — {target}. {tname} وصیت نکند.", parse_mode="HTML")
+        await _night_report(ctx, g, f"💨 گانِ روز: {shooter}. {sname} → {target}. {tname} (مشقی)")
+        return
+    rn = _seat_role_norm(g, target)
+    if rn == _R_WATCHMAN and not getattr(g, "tk_shield_lost", False):
+        # 🛡 نگهبانِ شیلددار: نمی‌میرد — بعد از ۵۰ ثانیه اعلام می‌شود که زره‌اش افتاد
+        g.tk_shield_lost = True
+        store.save(chat_id)
+        await ctx.bot.send_message(
+            chat_id, f"💥 تیر جنگی — {target}. {tname} وصیت کند.", parse_mode="HTML")
+        await _night_report(ctx, g, f"🔫 گانِ روز: {shooter}. {sname} → {target}. {tname} "
+                                    f"(جنگی — شیلدِ نگهبان افتاد، در بازی ماند)")
+
+        async def _tk_shield_later():
+            try:
+                await asyncio.sleep(SIDE_ANNOUNCE_DELAY)
+                if g.phase in ("idle", "ended"):
+                    return
+                await ctx.bot.send_message(
+                    chat_id,
+                    f"🛡 {target}. {tname} زره داشت — <b>زره‌اش افتاد</b> و در بازی می‌ماند.",
+                    parse_mode="HTML")
+            except Exception as e:
+                print("⚠️ tk shield announce err:", e)
+        asyncio.create_task(_tk_shield_later())
+        return
+    g.striked.add(target)
+    store.save(chat_id)
+    await ctx.bot.send_message(
+        chat_id, f"💥 تیر جنگی — {target}. {tname} وصیت کند.", parse_mode="HTML")
+    try:
+        await publish_seating(ctx, chat_id, g, mode=CTRL)
+    except Exception:
+        pass
+    await _night_report(ctx, g, f"🔫 گانِ روز: {shooter}. {sname} → {target}. {tname} "
+                                f"(جنگی — خارج شد، {_sc_side(g, target)})")
+    await _check_auto_end(ctx, chat_id, g)   # 🏁
+
+    # ⏳ ساید بعد از وصیت اعلام می‌شود (۷۵ ثانیه بعد)
+    _tside = _sc_side(g, target)
+
+    async def _tk_side_later():
+        try:
+            await asyncio.sleep(SIDE_ANNOUNCE_DELAY)
+            if g.phase in ("idle", "ended"):
+                return
+            await ctx.bot.send_message(
+                chat_id, f"ساید {target}. {tname}: <b>{_tside}</b>", parse_mode="HTML")
+        except Exception as e:
+            print("⚠️ tk side announce err:", e)
+    asyncio.create_task(_tk_side_later())
+
+
+# 🔀 مسیر در mafia_bot: callback_route('tk_', after=_after_night_act)
+async def handle_takavar_callback(update, ctx):
+    q = update.callback_query
+    data = q.data
+    uid = _q_uid(q)   # 🎛 اکتِ دستی
+
+    # سوال شیلد از گادِ راوی (بازیکن نیست)
+    if data.startswith("tk_shield_"):
+        g = None
+        chat_id = None
+        for cid, game in store.index.god_games(uid):
+            if getattr(game, "night_active", False) and game.god_id == uid:
+                g, chat_id = game, cid
+                break
+        if g is None:
+            await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
+            return
+        await safe_q_answer(q)
+        mid = q.message.message_id if q.message else None
+        g.night_shield = (data == "tk_shield_yes")
+        g.night_done.add("shield")
+        if not g.night_shield:
+            g.tk_shield_lost = True   # افتادنِ شیلد دائمی است — دیگر نه سؤال، نه اکت
+        await _close_pm(ctx, uid, mid,
+                        "🛡 شیلد نگهبان: بله" if g.night_shield
+                        else "🚫 شیلد افتاد — نگهبان تا آخر بازی دیگر اکت ندارد.")
+        store.save(chat_id)
+        await _tk_open_first(ctx, chat_id, g)
+        return
+
+    g, chat_id = _find_active_night_game(uid, q)
+    if g is None:
+        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
+        return
+    await safe_q_answer(q)
+    mid = q.message.message_id if q.message else None
+
+    # ── نگهبان (چندانتخابی) ──
+    if data == "tk_grd_confirm":
+        sel = list(g.night_guard_sel.get(uid, []))
+        if not sel:
+            await safe_q_answer(q, "حداقل یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_guard_seats = list(sel)
+        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
+        await _close_pm(ctx, uid, mid, f"🛡 نگهبانی ثبت شد: {names}")
+        await _night_report(ctx, g, f"🛡 نگهبان → نگهبانی از: <b>{escape(names, quote=False)}</b>")
+        g.night_done.add("watchman")
+        store.save(chat_id)
+        await _tk_check_open_mafia(ctx, chat_id, g)
+        return
+
+    if data.startswith("tk_grd_"):
+        s = int(data.rsplit("_", 1)[1])
+        sel = set(g.night_guard_sel.get(uid, []))
+        need = g.tk_guard_need or 1
+        if s in sel:
+            sel.remove(s)
+        elif len(sel) >= need:
+            await safe_q_answer(q, f"حداکثر {need} نفر.", show_alert=True)
+            return
+        else:
+            sel.add(s)
+        g.night_guard_sel[uid] = list(sel)
+        store.save(chat_id)
+        watch = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != watch]
+        await _edit_pm(ctx, uid, mid, f"🛡 از چه کسانی نگهبانی می‌دهی؟ (تا {need} نفر)",
+                       _kb_night_seats(targets, g, "tk_grd_", selected=sel, confirm_cb="tk_grd_confirm"))
+        return
+
+    # ── گروگانگیر ──
+    if data == "tk_host_skip":
+        g.night_hostage_seat = None
+        g.hostage_last_target = None   # محدودیتِ نفرِ قبلی آزاد می‌شود
+        g.night_sel.pop(uid, None)
+        await _close_pm(ctx, uid, mid, "⏭ امشب گرو نگرفتی.")
+        await _night_report(ctx, g, "🔒 گروگانگیر → امشب گرو نگرفت")
+        g.night_done.add("hostage")
+        store.save(chat_id)
+        await _tk_check_open_mafia(ctx, chat_id, g)
+        return
+
+    if data == "tk_host_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_hostage_seat = s
+        g.hostage_last_target = s
+        await _room_note(ctx, g, f"🔒 گروگان: <b>{_room_who(g, s)}</b>")
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"🔒 گرو گرفتی: {s}. {tname}")
+        await _night_report(ctx, g, f"🔒 گروگانگیر → گرو گرفت: <b>{s}. {escape(tname, quote=False)}</b>")
+        g.night_done.add("hostage")
+        store.save(chat_id)
+        await _tk_check_open_mafia(ctx, chat_id, g)
+        return
+
+    if data.startswith("tk_host_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        host = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != host and x != g.hostage_last_target]
+        await _edit_pm(ctx, uid, mid, "🔒 چه کسی را گرو می‌گیری؟",
+                       _kb_night_seats(targets, g, "tk_host_", selected=s, confirm_cb="tk_host_confirm"))
+        return
+
+    # ── تصمیم مافیا ──
+    if data == "tk_act_back":
+        # ↩️ برگشت به منوی اکتِ مافیای تکاور
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        _nato = _find_seat_by_role(g, _R_NATO)
+        rows = [[InlineKeyboardButton("🔫 شات", callback_data="tk_shot")]]
+        if _nato is not None and not g.nato_used:
+            rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="tk_nato")])
+        kb = InlineKeyboardMarkup(rows)
+        dec = getattr(g, "tk_decider_seat", None)
+        dec_uid = g.seats[dec][0] if dec in g.seats else None
+        if dec_uid == uid or dec_uid is None:
+            await _edit_pm(ctx, uid, mid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
+        else:
+            await _close_pm(ctx, uid, mid, "↩️ تصمیم به تصمیم‌گیرِ مافیا برگشت.")
+            m = await _safe_pm(ctx, dec_uid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
+            if m:
+                g.night_pm_msgs[dec_uid] = m.message_id
+                store.save(chat_id)
+        return
+
+    if data == "tk_shot":
+        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_add_back(_kb_night_seats(targets, g, "tk_st_",
+                                                    selected=g.night_sel.get(uid),
+                                                    confirm_cb="tk_st_confirm"),
+                                    "tk_act_back"))
+        return
+
+    if data == "tk_nato":
+        # 🕵️ یک‌بار در کلِ بازی — نگهبان برای کیبوردِ کهنه‌ی شب‌های قبل
+        if g.nato_used:
+            await safe_q_answer(q, "ناتویی قبلاً استفاده شده.", show_alert=True)
+            return
+        nato = _find_seat_by_role(g, _R_NATO)
+        if nato is None:
+            await safe_q_answer(q, "ناتو زنده نیست.", show_alert=True)
+            return
+        nato_uid = g.seats[nato][0]
+        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
+        kb = _kb_add_back(_kb_night_seats(targets, g, "tk_nt_",
+                                          selected=g.night_sel.get(nato_uid),
+                                          confirm_cb="tk_nt_confirm"),
+                          "tk_act_back")
+        if nato_uid == uid:
+            await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟", kb)
+            g.night_pm_msgs[nato_uid] = mid
+        else:
+            await _close_pm(ctx, uid, mid, "🕵️ ناتویی انتخاب شد. منتظر ناتو بمانید.")
+            m = await _safe_pm(ctx, nato_uid, "🕵️ چه کسی را ناتویی می‌کنی؟", kb)
+            if m:
+                g.night_pm_msgs[nato_uid] = m.message_id
+        store.save(chat_id)
+        return
+
+    # ── شلیک مافیا ──
+    if data == "tk_st_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_shot_target = s
+        await _room_announce_shot(ctx, g, s)
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {tname}")
+        await _night_report(ctx, g, f"🔫 شلیک مافیا → <b>{s}. {escape(tname, quote=False)}</b>")
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _tk_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data.startswith("tk_st_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
+        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
+                       _kb_add_back(_kb_night_seats(targets, g, "tk_st_", selected=s,
+                                                    confirm_cb="tk_st_confirm"),
+                                    "tk_act_back"))
+        return
+
+    # ── ناتویی (حدس نقش) ──
+    if data.startswith("tk_nrole_"):
+        i = int(data.rsplit("_", 1)[1])
+        names = _nem_citizen_role_names(g)
+        if i >= len(names):
+            return
+        guess_name = names[i]
+        s = g.night_nato_seat
+        if not s:
+            await safe_q_answer(q, "اول هدف را انتخاب کن.", show_alert=True)
+            return
+        _tu, tname = g.seats[s]
+        correct = (_nz(guess_name) == _seat_role_norm(g, s))
+        g.night_nato_correct = correct
+        g.nato_used = True   # 🕵️ مصرف شد — از شبِ بعد دکمه‌اش نمی‌آید
+        tick = "✅" if correct else "❌"
+        await _close_pm(ctx, uid, mid, f"🕵️ ناتویی روی {s}. {tname} ثبت شد.")
+        await _night_report(ctx, g, f"🕵️ ناتو → صندلی {s}. {escape(tname, quote=False)} | حدس نقش: {guess_name} {tick}")
+        voice_god.say(chat_id, "nato")   # 🎙 (تکاور به همه پیامِ جداگانه نمی‌دهد)
+        g.night_done.add("mafia")
+        store.save(chat_id)
+        await _tk_check_open_citizens(ctx, chat_id, g)
+        return
+
+    if data == "tk_nt_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_nato_seat = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        await _room_note(ctx, g, f"🕵️ ناتویی روی <b>{_room_who(g, s)}</b>")
+        names = _nem_citizen_role_names(g)
+        rows = [[InlineKeyboardButton(rn, callback_data=f"tk_nrole_{i}")] for i, rn in enumerate(names)]
+        await _edit_pm(ctx, uid, mid, f"🕵️ نقش صندلی {s} را حدس بزن:", InlineKeyboardMarkup(rows))
+        return
+
+    if data.startswith("tk_nt_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
+        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟",
+                       _kb_add_back(_kb_night_seats(targets, g, "tk_nt_", selected=s,
+                                                    confirm_cb="tk_nt_confirm"),
+                                    "tk_act_back"))
+        return
+
+    # ── کاراگاه (مستقیم) ──
+    if data.startswith("tk_det_"):
+        s = int(data.rsplit("_", 1)[1])
+        _tu, tname = g.seats[s]
+        res = "مثبت ✅" if _tk_guide_positive(g, s) else "منفی ❌"
+        if "مثبت" in res:
+            _sc_add(g, _seat_of_uid(g, uid), "inq", 5, f"استعلام مثبت ({s})")
+        await _close_pm(ctx, uid, mid, f"🔎 استعلام {s}. {tname}: {res}")
+        await _night_report(ctx, g, f"🔎 کاراگاه → استعلام {s}. {escape(tname, quote=False)}: <b>{res}</b>")
+        g.night_done.add("detective")
+        store.save(chat_id)
+        await _tk_check_open_gunman(ctx, chat_id, g)
+        return
+
+    # ── پزشک ──
+    if data == "tk_doc_confirm":
+        sel = list(g.night_doc_sel.get(uid, []))
+        if not sel:
+            await safe_q_answer(q, "یک نفر را انتخاب کن.", show_alert=True)
+            return
+        doc = _seat_of_uid(g, uid)
+        if doc in sel:
+            g.doctor_self_saves = (g.doctor_self_saves or 0) + 1
+        g.night_doc_saved = list(sel)
+        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
+        await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {names}")
+        await _night_report(ctx, g, f"💉 پزشک → سیو: <b>{escape(names, quote=False)}</b>")
+        g.night_done.add("doctor")
+        store.save(chat_id)
+        await _tk_check_open_gunman(ctx, chat_id, g)
+        return
+
+    if data.startswith("tk_doc_"):
+        s = int(data.rsplit("_", 1)[1])
+        sel = set(g.night_doc_sel.get(uid, []))
+        need = g.night_doc_need or 1
+        if s in sel:
+            sel.remove(s)
+        elif len(sel) >= need:
+            await safe_q_answer(q, f"حداکثر {need} نفر.", show_alert=True)
+            return
+        else:
+            sel.add(s)
+        g.night_doc_sel[uid] = list(sel)
+        store.save(chat_id)
+        doc = _seat_of_uid(g, uid)
+        await _edit_pm(ctx, uid, mid, f"💉 چه کسی را سیو می‌دهی؟ (تا {need} نفر)",
+                       _kb_night_seats(_doctor_targets(g, doc), g, "tk_doc_",
+                                       selected=sel, confirm_cb="tk_doc_confirm"))
+        return
+
+    # ── تکاور (شلیک متقابل) ──
+    if data == "tk_com_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_commando_target = s
+        _tu, tname = g.seats[s]
+        await _close_pm(ctx, uid, mid, f"🎖 شلیک تکاور ثبت شد: {s}. {tname}")
+        await _night_report(ctx, g, f"🎖 تکاور → شلیک متقابل به <b>{s}. {escape(tname, quote=False)}</b>")
+        g.night_done.add("commando")
+        store.save(chat_id)
+        await _tk_check_open_gunman(ctx, chat_id, g)
+        return
+
+    if data.startswith("tk_com_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        com = _seat_of_uid(g, uid)
+        targets = [x for x in _alive_seats(g) if x != com]
+        await _edit_pm(ctx, uid, mid, "🎖 شما شات شدید! می‌توانید یک نفر را بزنید (یک‌بار):",
+                       _kb_night_seats(targets, g, "tk_com_", selected=s, confirm_cb="tk_com_confirm"))
+        return
+
+    # ── تفنگدار ──
+    if data == "tk_gun_no":
+        await _close_pm(ctx, uid, mid, "🔫 امشب تفنگ ندادی.")
+        await _night_report(ctx, g, "🔫 تفنگدار → تفنگ نداد")
+        g.night_done.add("gunman")
+        store.save(chat_id)
+        return
+
+    if data == "tk_gun_yes":
+        gun = _seat_of_uid(g, uid)
+        targets = _alive_seats(g)
+        await _edit_pm(ctx, uid, mid, "🔫 تفنگ اول را به چه کسی می‌دهی؟",
+                       _kb_night_seats(targets, g, "tk_g1_",
+                                       selected=g.night_sel.get(uid), confirm_cb="tk_g1_confirm"))
+        return
+
+    if data == "tk_g1_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_gun1_target = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        gun = _seat_of_uid(g, uid)
+        _tu, tname = g.seats[s]
+        await _edit_pm(ctx, uid, mid, f"🔫 تفنگ اول به {s}. {tname} — نوع؟",
+                       _tk_gun_type_kb(g, s, 1, gun))
+        return
+
+    if data.startswith("tk_g1_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "🔫 تفنگ اول را به چه کسی می‌دهی؟",
+                       _kb_night_seats(_alive_seats(g), g, "tk_g1_", selected=s, confirm_cb="tk_g1_confirm"))
+        return
+
+    if data in ("tk_g1war", "tk_g1blank"):
+        g.night_gun1_type = "war" if data == "tk_g1war" else "blank"
+        store.save(chat_id)
+        await _tk_ask_gun2(ctx, uid, mid)
+        return
+
+    if data == "tk_gun2_no":
+        await _tk_finalize_gunman(ctx, chat_id, g, uid, mid)
+        return
+
+    if data == "tk_gun2_yes":
+        await _edit_pm(ctx, uid, mid, "🔫 تفنگ دوم را به چه کسی می‌دهی؟",
+                       _kb_night_seats(_alive_seats(g), g, "tk_g2_",
+                                       selected=g.night_sel.get(uid), confirm_cb="tk_g2_confirm"))
+        return
+
+    if data == "tk_g2_confirm":
+        s = g.night_sel.get(uid)
+        if not s:
+            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
+            return
+        g.night_gun2_target = s
+        g.night_sel.pop(uid, None)
+        store.save(chat_id)
+        gun = _seat_of_uid(g, uid)
+        _tu, tname = g.seats[s]
+        await _edit_pm(ctx, uid, mid, f"🔫 تفنگ دوم به {s}. {tname} — نوع؟",
+                       _tk_gun_type_kb(g, s, 2, gun))
+        return
+
+    if data.startswith("tk_g2_"):
+        s = int(data.rsplit("_", 1)[1])
+        g.night_sel[uid] = s
+        store.save(chat_id)
+        await _edit_pm(ctx, uid, mid, "🔫 تفنگ دوم را به چه کسی می‌دهی؟",
+                       _kb_night_seats(_alive_seats(g), g, "tk_g2_", selected=s, confirm_cb="tk_g2_confirm"))
+        return
+
+    if data in ("tk_g2war", "tk_g2blank"):
+        g.night_gun2_type = "war" if data == "tk_g2war" else "blank"
+        store.save(chat_id)
+        await _tk_finalize_gunman(ctx, chat_id, g, uid, mid)
+        return
@@ -1,9 +1,11 @@
 ﻿from __future__ import annotations
 from dataclasses import dataclass
-import pickle, os, random, asyncio, time
+from typing import Callable
+import pickle, os, random, asyncio, time, hashlib, threading, signal, atexit, heapq
+_IMPORT_T0 = time.perf_counter()   # ⏱ شروعِ اجرای ماژول (برای گزارشِ بالا آمدن)
 import telegram.error
 import jdatetime
-import requests
+import importlib.util, importlib.machinery
 import json, httpx
 import sys
 import re
@@ -19,9 +21,9 @@ from telegram import (Update, InlineKeyboardButton, InlineKeyboardMarkup, ForceR
                       Message, ChatPermissions, ReplyKeyboardMarkup)
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, CallbackQueryHandler,
-    MessageHandler, ContextTypes, filters, TypeHandler, ApplicationHandlerStop
+    MessageHandler, ContextTypes, filters, TypeHandler, ApplicationHandlerStop, BaseRateLimiter
 )
-from collections import defaultdict
+from collections import defaultdict, deque
 
 # 🎙 گادِ صوتی — اگر ماژول یا تنظیماتش نباشد، یک بدلِ بی‌اثر جایش می‌نشیند
 try:
@@ -41,6 +43,15 @@ except Exception as _e:
 
         @staticmethod
         def ready(): return False
+
+        @staticmethod
+        def has_custom(*a, **k): return False
+
+        @staticmethod
+        def remove_custom(*a, **k): return False
+
+        @staticmethod
+        def status(): return {"enabled": False, "workers": []}
     voice_god = _VoiceStub()
 
 # --- CALLBACK DATA CONSTANTS ---
@@ -75,33 +86,6 @@ SLOW_UPDATE_SEC = float(os.environ.get("SLOW_UPDATE_SEC", "2"))
 _GIST_TIME = {"sec": 0.0, "calls": 0}
 
 
-def _wrap_gist_http(mod, name):
-    """⏱ زمانِ درخواست‌های api.github.com را جمع می‌زند.
-    بقیهٔ درخواست‌ها دست‌نخورده رد می‌شوند (هیچ رفتاری عوض نمی‌شود)."""
-    orig = getattr(mod, name)
-
-    def wrapper(*a, **k):
-        url = a[0] if a else k.get("url", "")
-        if "api.github.com" not in str(url):
-            return orig(*a, **k)
-        t0 = time.perf_counter()
-        try:
-            return orig(*a, **k)
-        finally:
-            _GIST_TIME["sec"] += time.perf_counter() - t0
-            _GIST_TIME["calls"] += 1
-
-    return wrapper
-
-
-for _mod, _fn in ((httpx, "get"), (httpx, "patch"), (httpx, "post"),
-                  (requests, "get"), (requests, "patch"), (requests, "post")):
-    try:
-        setattr(_mod, _fn, _wrap_gist_http(_mod, _fn))
-    except Exception as _e:
-        print("⚠️ gist timer wrap:", _fn, _e)
-
-
 def _update_label(update) -> str:
     """توضیحِ کوتاهِ آپدیت برای لاگ."""
     try:
@@ -131,19 +115,771 @@ def _log_slow_update(update, dt: float, gist_sec: float, gist_calls: int):
     except Exception as e:
         print("⚠️ slow log:", e)
 
+# ═══════════ 🚦 صف‌های آپدیت: هر چت یک صفِ FIFO، همه‌ی چت‌ها با هم ═══════════
+# وب‌هوک فوراً 200 برمی‌گرداند و آپدیت را در صفِ چتِ خودش می‌گذارد. آپدیت‌های یک چت
+# به ترتیبِ رسیدن و یکی‌یکی اجرا می‌شوند (رأی‌ها در _try_capture_vote جابه‌جا نمی‌شوند)،
+# ولی چت‌های مختلف موازی‌اند — با سقفِ سراسریِ UPDATE_CONCURRENCY هندلرِ همزمان.
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", "16"))
+UPDATE_DRAIN_SEC = 20.0     # سقفِ انتظار برای خالی‌شدنِ صف‌ها موقعِ خاموشی
+
+
+def _update_lane_key(update):
+    ch = getattr(update, "effective_chat", None)
+    if ch is not None:
+        return ch.id
+    us = getattr(update, "effective_user", None)   # poll_answer و امثالش چت ندارند
+    if us is not None:
+        return ("u", us.id)
+    return "misc"
+
+
+# 🚪 دروازه‌ی آمادگی: وب‌هوک از همان ثانیه‌ی اول جواب می‌دهد، ولی هیچ هندلری قبل از
+#    warm_start (بارِ store از دیسک + گیست + initialize) اجرا نمی‌شود — آپدیت‌ها در صف می‌مانند.
+_STARTUP = asyncio.Event()
+
+
+async def startup_ready():
+    if not _STARTUP.is_set():
+        await _STARTUP.wait()
+
+
+# ═══════════ ⏱ گزارشِ بالا آمدن ═══════════
+# هر مرحله‌ی شروع (import، دیسک، گیست، initialize، محرومان، وب‌هوک، گادِ صوتی …) با زمانِ
+# شروع و مدتش ثبت می‌شود؛ تا پایانِ warm_start هر درخواستِ گیست و Bot API هم شمرده می‌شود.
+# جدولش در لاگ چاپ می‌شود و JSONش در GET /startup است تا بشود نسخه‌ها را مقایسه کرد.
+class StartupTrace:
+    def __init__(self, t0: float):
+        self.t0 = t0
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.phases: list[dict] = []
+        self.calls: dict[str, dict] = {}     # "gist" یا "api:sendMessage" → {"n", "sec"}
+        self.active = True
+        self.ready_sec: float | None = None
+
+    def mark(self, name: str, start: float, ok: bool = True, error: str | None = None):
+        row = {"name": name, "at": round(start - self.t0, 3),
+               "sec": round(time.perf_counter() - start, 3), "ok": ok}
+        if error:
+            row["error"] = error[:200]
+        self.phases.append(row)
+
+    async def timed(self, name: str, aw):
+        """اجرای aw به‌عنوانِ یک مرحله؛ خطا ثبت و دوباره پرتاب می‌شود."""
+        start = time.perf_counter()
+        try:
+            res = await aw
+        except BaseException as e:
+            self.mark(name, start, ok=False, error=repr(e))
+            raise
+        self.mark(name, start)
+        return res
+
+    def call(self, kind: str, sec: float):
+        c = self.calls.setdefault(kind, {"n": 0, "sec": 0.0})
+        c["n"] += 1
+        c["sec"] += sec
+
+    def ready(self):
+        self.ready_sec = round(time.perf_counter() - self.t0, 3)
+
+    def report(self) -> dict:
+        return {
+            "started_at": self.started_at,
+            "ready": self.ready_sec is not None,
+            "ready_sec": self.ready_sec,
+            "phases": self.phases,
+            "calls": {k: {"n": v["n"], "sec": round(v["sec"], 3)}
+                      for k, v in sorted(self.calls.items())},
+        }
+
+    def table(self) -> str:
+        lines = ["⏱ بالا آمدن:", f"{'مرحله':<20}{'شروع':>8}{'مدت':>8}"]
+        for r in self.phases:
+            flag = "" if r["ok"] else "  ❌"
+            lines.append(f"{r['name']:<20}{r['at']:>8.2f}{r['sec']:>8.2f}{flag}")
+        for k, v in sorted(self.calls.items()):
+            lines.append(f"  {k:<26}{v['n']:>4} × → {v['sec']:.2f}s")
+        if self.ready_sec is not None:
+            lines.append(f"✅ آماده: {self.ready_sec:.2f}s")
+        return "\n".join(lines)
+
+
+BOOT = StartupTrace(_IMPORT_T0)
+
+
+class UpdateLanes:
+    def __init__(self, process, limit: int = UPDATE_CONCURRENCY):
+        self._process = process
+        self._limit = limit
+        self._sem: asyncio.Semaphore | None = None
+        self._lanes: dict = {}          # کلیدِ چت → deque از آپدیت‌های منتظر
+        self._tasks: set = set()
+
+    def submit(self, update):
+        key = _update_lane_key(update)
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append(update)         # همین الان یک درین روی این چت در جریان است
+            return
+        self._lanes[key] = lane = deque([update])
+        t = asyncio.create_task(self._drain(key, lane))
+        self._tasks.add(t)
+        t.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key, lane):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self._limit)
+        try:
+            while lane:
+                update = lane[0]
+                async with self._sem:
+                    await self._run(update)
+                lane.popleft()
+        finally:
+            self._lanes.pop(key, None)
+
+    async def _run(self, update):
+        await startup_ready()
+        # 🐌 سنجشِ زمانِ پردازش (سهمِ گیست تقریبی است — چت‌های دیگر هم همزمان می‌خوانند)
+        t0 = time.perf_counter()
+        g0, c0 = _GIST_TIME["sec"], _GIST_TIME["calls"]
+        try:
+            await self._process(update)
+        except Exception as e:
+            print("❌ update processing error:", e)
+        finally:
+            dt = time.perf_counter() - t0
+            if dt >= SLOW_UPDATE_SEC:
+                _log_slow_update(update, dt, _GIST_TIME["sec"] - g0, _GIST_TIME["calls"] - c0)
+
+    def backlog(self) -> int:
+        return sum(len(q) for q in self._lanes.values())
+
+    async def drain(self, timeout: float = UPDATE_DRAIN_SEC):
+        """خاموشی: صبر تا آپدیت‌های در صف تمام شوند (حداکثر timeout ثانیه)."""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+
+# ═══════════ 🚥 صفِ خروجی: همه‌ی درخواست‌ها به تلگرام از یک دروازه ═══════════
+# OutboundLimiter روی ctx.bot نشسته (ApplicationBuilder.rate_limiter) و هر ارسال/ویرایش/حذف
+# از آن رد می‌شود: یک سطلِ توکنِ سراسری (~۳۰ در ثانیه) + یک سطل برای هر چت (فقط پیامِ تازه).
+# وقتی سطلِ سراسری خالی است، منتظرها به ترتیبِ اولویت رد می‌شوند: دکمه‌های رأی و پرامپتِ شب
+# (OUT_HIGH) جلوی پاک‌سازی/اعلانِ هفتگی/آرشیو (OUT_LOW) می‌افتند. اولویت با
+# rate_limit_args=OUT_... روی هر متدِ بات داده می‌شود؛ پیش‌فرض OUT_NORMAL است.
+# یک RetryAfter کلِ صف را به اندازه‌ی خودش نگه می‌دارد، نه فقط همان درخواست را.
+# ⚠️ سطح‌ها از ۱ شروع می‌شوند: ExtBot آرگومانِ falsy (مثلِ 0) را بی‌صدا دور می‌ریزد.
+OUT_HIGH, OUT_NORMAL, OUT_LOW = 1, 2, 3
+OUT_GLOBAL_RATE = 28.0          # درخواست در ثانیه (کلِ بات)
+OUT_GLOBAL_BURST = 30
+OUT_CHAT_RATE = 1.0             # پیامِ تازه در ثانیه برای هر چت
+OUT_CHAT_BURST = 5
+OUT_MAX_RETRIES = 3
+_OUT_CHAT_LIMITED = ("send", "copy", "forward")
+_OUT_HIGH_ENDPOINTS = {"answerCallbackQuery"}
+
+
+class _TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "ts")
+
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.ts = float(burst), now
+
+    def _fill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def wait_time(self, now: float) -> float:
+        self._fill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self, now: float) -> float:
+        """یک توکن برمی‌دارد (حتی قرضی) و می‌گوید چقدر باید صبر کرد."""
+        self._fill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class OutboundLimiter(BaseRateLimiter):
+    def __init__(self):
+        self._global: _TokenBucket | None = None
+        self._chats: dict = {}              # chat_id → _TokenBucket
+        self._heap: list = []               # (اولویت, ترتیب, future)
+        self._seq = 0
+        self._pump: asyncio.Task | None = None
+        self._resume_at = 0.0               # تا این لحظه (RetryAfter) هیچ‌چیز رد نمی‌شود
+        self.stats = {"sent": 0, "queued": 0, "retry_after": 0, "paused_sec": 0.0}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._pump is not None:
+            self._pump.cancel()
+
+    def _chat_bucket(self, chat_id, now):
+        b = self._chats.get(chat_id)
+        if b is None:
+            if len(self._chats) > 2000:      # سطل‌های پر = چت‌های ساکت → دور ریخته شوند
+                for k in [k for k, v in self._chats.items() if v.wait_time(now) == 0 and v.tokens >= v.burst]:
+                    del self._chats[k]
+            b = self._chats[chat_id] = _TokenBucket(OUT_CHAT_RATE, OUT_CHAT_BURST, now)
+        return b
+
+    async def _admit(self, prio: int):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._global is None:
+            self._global = _TokenBucket(OUT_GLOBAL_RATE, OUT_GLOBAL_BURST, now)
+        if not self._heap and now >= self._resume_at and self._global.wait_time(now) == 0:
+            self._global.tokens -= 1
+            return
+        self._seq += 1
+        fut = loop.create_future()
+        heapq.heappush(self._heap, (prio, self._seq, fut))
+        self.stats["queued"] += 1
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run_pump())
+        await fut
+
+    async def _run_pump(self):
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            now = loop.time()
+            wait = max(self._resume_at - now, self._global.wait_time(now))
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _p, _n, fut = heapq.heappop(self._heap)
+            if fut.done():                   # صدازننده لغو شده
+                continue
+            self._global.tokens -= 1
+            fut.set_result(None)
+
+    def _pause(self, sec: float):
+        loop = asyncio.get_running_loop()
+        until = loop.time() + sec
+        if until > self._resume_at:
+            self.stats["paused_sec"] += until - max(self._resume_at, loop.time())
+            self._resume_at = until
+        self.stats["retry_after"] += 1
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if BOOT.active:
+            t0 = time.perf_counter()
+            try:
+                return await self._process(callback, args, kwargs, endpoint, data, rate_limit_args)
+            finally:
+                BOOT.call("api:" + endpoint, time.perf_counter() - t0)
+        return await self._process(callback, args, kwargs, endpoint, data, rate_limit_args)
+
+    async def _process(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint.startswith("get"):       # خواندن (getChat و …) محدودیتِ ارسال ندارد
+            return await callback(*args, **kwargs)
+        if rate_limit_args is not None:
+            prio = int(rate_limit_args)
+        else:
+            prio = OUT_HIGH if endpoint in _OUT_HIGH_ENDPOINTS else OUT_NORMAL
+        chat_id = data.get("chat_id")
+        per_chat = chat_id is not None and endpoint.startswith(_OUT_CHAT_LIMITED)
+        loop = asyncio.get_running_loop()
+        for attempt in range(OUT_MAX_RETRIES + 1):
+            # اول نوبتِ اولویت، بعد سطلِ چت: ارسال‌های کم‌اولویتِ صف‌کشیده نباید سطلِ همین چت را
+            # زودتر از یک پرامپتِ OUT_HIGH قرض بگیرند
+            await self._admit(prio)
+            if per_chat:
+                wait = self._chat_bucket(chat_id, loop.time()).reserve(loop.time())
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            try:
+                res = await callback(*args, **kwargs)
+                self.stats["sent"] += 1
+                if per_chat:
+                    _track_sent(chat_id, res)
+                return res
+            except RetryAfter as e:
+                if attempt == OUT_MAX_RETRIES:
+                    raise
+                self._pause(float(getattr(e, "retry_after", 1.0)) + 0.1)
+                print(f"⏳ RetryAfter {getattr(e, 'retry_after', '?')}s روی {endpoint} — کلِ صف مکث کرد")
+
+    def snapshot(self) -> dict:
+        now = asyncio.get_running_loop().time()
+        waiting = {"high": 0, "normal": 0, "low": 0}
+        for p, _n, fut in self._heap:
+            if not fut.done():
+                waiting[("high", "normal", "low")[min(max(p, OUT_HIGH), OUT_LOW) - OUT_HIGH]] += 1
+        return {**self.stats, "waiting": waiting, "chats": len(self._chats),
+                "paused_for": round(max(0.0, self._resume_at - now), 2)}
+
+
+outbound = OutboundLimiter()
+
+
+# ═══════════ 🗑 حذفِ گروهی: فقط پیام‌هایی که واقعاً دیده‌ایم، صدتا صدتا ═══════════
+# آیدیِ پیام‌های هر گروه (از آپدیت‌های ورودی + پیام‌هایی که خودِ بات فرستاده) در حافظه
+# نگه داشته می‌شود. پاک‌سازی به‌جای پیمودنِ هزاران آیدیِ خالی، همین‌ها را با
+# deleteMessages (تا ۱۰۰ آیدی در هر درخواست) و با اولویتِ OUT_LOW پاک می‌کند.
+# بخشی از بازه که قبل از اولین پیامِ دیده‌شده (قبل از ری‌استارت) است، کور پاک می‌شود.
+MSG_TRACK_MAX = 5000        # آیدیِ نگه‌داشته برای هر گروه
+DELETE_BATCH = 100          # سقفِ deleteMessages
+_MSG_IDS: dict[int, deque] = {}
+_MSG_FLOOR: dict[int, int] = {}     # زیرِ این آیدی چیزی نمی‌دانیم (قبل از بالاآمدن یا بیرون‌افتاده از deque)
+
+
+def track_message_id(chat_id, mid):
+    if not isinstance(chat_id, int) or chat_id >= 0 or not mid:
+        return
+    ids = _MSG_IDS.get(chat_id)
+    if ids is None:
+        ids = _MSG_IDS[chat_id] = deque(maxlen=MSG_TRACK_MAX)
+    evicted = ids[0] if len(ids) == ids.maxlen else None
+    ids.append(mid)
+    floor = _MSG_FLOOR.get(chat_id)
+    if floor is None or mid < floor:
+        _MSG_FLOOR[chat_id] = floor = mid
+    # آیدیِ بیرون‌افتاده دیگر ردگیری نمی‌شود → تا آن‌جا بخشِ کور می‌شود، نه «وجود ندارد»
+    if evicted is not None and evicted >= floor:
+        _MSG_FLOOR[chat_id] = evicted + 1
+
+
+def track_update_message(update):
+    msg = getattr(update, "message", None)     # فقط پیامِ تازه؛ ویرایش/دکمه آیدیِ قدیمی دارند
+    if msg is not None and getattr(msg, "chat", None) is not None:
+        track_message_id(msg.chat.id, msg.message_id)
+
+
+def _track_sent(chat_id, res):
+    try:
+        chat_id = int(chat_id)
+    except (TypeError, ValueError):
+        return
+    for r in (res if isinstance(res, list) else [res]):
+        if isinstance(r, dict) and r.get("message_id"):
+            track_message_id(chat_id, r["message_id"])
+
+
+def message_ids_between(chat_id, lo: int, hi: int) -> list[int]:
+    """آیدی‌های lo < id < hi که احتمالاً وجود دارند (دیده‌شده‌ها + بخشِ کورِ قبل از ری‌استارت)."""
+    floor = _MSG_FLOOR.get(chat_id, hi)
+    ids = set(range(lo + 1, min(hi, floor)))
+    ids.update(m for m in _MSG_IDS.get(chat_id, ()) if lo < m < hi)
+    return sorted(ids)
+
+
+def _untrack(chat_id, gone: set):
+    ids = _MSG_IDS.get(chat_id)
+    if ids:
+        _MSG_IDS[chat_id] = deque((m for m in ids if m not in gone), maxlen=MSG_TRACK_MAX)
+
+
+async def delete_messages_bulk(bot, chat_id, ids, prio=OUT_LOW) -> int:
+    """پاک کردنِ ids با deleteMessages (صدتا صدتا). خروجی: تعدادِ درخواست‌ها."""
+    ids = list(ids)
+    calls = 0
+    for i in range(0, len(ids), DELETE_BATCH):
+        chunk = ids[i:i + DELETE_BATCH]
+        calls += 1
+        try:
+            fn = getattr(bot, "delete_messages", None)
+            if fn is not None:
+                await fn(chat_id, chunk, rate_limit_args=prio)
+            else:   # PTB 20.3 هنوز متدش را ندارد؛ همان endpoint از مسیرِ عادیِ بات (و صفِ خروجی)
+                await bot._post("deleteMessages", {"chat_id": chat_id, "message_ids": chunk},
+                                api_kwargs=bot._merge_api_rl_kwargs(None, prio))
+        except Exception as e:
+            print(f"⚠️ deleteMessages {chat_id} ({len(chunk)}):", e)
+            for mid in chunk:        # مثلاً پیامِ قدیمی‌تر از ۴۸ ساعت — تک‌تک، همان اولویت
+                calls += 1
+                try:
+                    await bot.delete_message(chat_id, mid, rate_limit_args=prio)
+                except Exception:
+                    pass
+    _untrack(chat_id, set(ids))
+    return calls
+
+
+# ═══════════ 🧭 جدولِ مسیرِ دکمه‌ها (callback_router) ═══════════
+# هر هندلرِ مستقل با @callback_route("prefix_") خودش را ثبت می‌کند. مسیریابی «بلندترین
+# پیشوند» روی دیکشنری است: برای هر طولِ پیشوندِ ثبت‌شده یک lookup — نه زنجیره‌ای از
+# startswith که دکمه‌های تهِ لیست را برای همه گران کند.
+_CB_ROUTES: dict[str, dict] = {}
+_CB_PREFIX_LENS: list[int] = []
+_CB_GAME_HITS = {"n": 0}   # دکمه‌هایی که پیشوندِ ثبت‌شده نداشتند و به بدنه‌ی بازی رسیدند
+
+
+def callback_route(*prefixes: str, after=None):
+    """ثبتِ هندلر برای یک یا چند پیشوند. after: async (update, ctx) که بعد از هندلر اجرا می‌شود."""
+    def deco(fn):
+        for p in prefixes:
+            if p in _CB_ROUTES:
+                raise ValueError(f"callback prefix {p!r} already routed to "
+                                 f"{_CB_ROUTES[p]['handler'].__name__}")
+            _CB_ROUTES[p] = {"handler": fn, "after": after, "hits": 0}
+        _CB_PREFIX_LENS[:] = sorted({len(p) for p in _CB_ROUTES}, reverse=True)
+        return fn
+    return deco
+
+
+def _cb_route_for(data: str) -> dict | None:
+    for n in _CB_PREFIX_LENS:
+        r = _CB_ROUTES.get(data[:n])
+        if r is not None:
+            return r
+    return None
+
+
+def callback_routes_snapshot() -> dict:
+    """🔎 برای دیباگ: همه‌ی پیشوندها با هندلر و تعدادِ برخورد."""
+    return {
+        "routes": [
+            {"prefix": p, "handler": r["handler"].__name__,
+             "after": r["after"].__name__ if r["after"] else None, "hits": r["hits"]}
+            for p, r in sorted(_CB_ROUTES.items())
+        ],
+        "game_body_hits": _CB_GAME_HITS["n"],
+    }
+
+# ═══════════ 🗃 لایه‌ی گیست: یک دریافت، یک کش، برای همه‌ی load_*ها ═══════════
+# قبلاً هر load_* کلِ گیست را جدا می‌گرفت و فقط یک فایلش را برمی‌داشت. حالا یک تصویر
+# (snapshot) از همه‌ی فایل‌ها نگه می‌داریم: تا GIST_SNAPSHOT_TTL ثانیه بدونِ شبکه سرو
+# می‌شود و بعدش با If-None-Match تازه می‌شود (معمولاً 304، بدونِ بدنه). هر نوشتن هم
+# تصویر را همان‌جا به‌روز می‌کند، پس خواندنِ بعد از نوشتن همیشه دادهٔ تازه می‌بیند.
+#
+# 🔌 همه‌ی درخواست‌ها از دو کلاینتِ مشترک می‌روند (اتصالِ TLS زنده می‌ماند، HTTP/2 اگر
+# h2 نصب باشد): یک httpx.Client برای مسیرِ همزمان (ترد/زمانِ import) و یک
+# httpx.AsyncClient برای هندلرها — یک جوابِ کُندِ گیت‌هاب دیگر حلقه‌ی همه‌ی گروه‌ها را نمی‌بندد.
+GIST_SNAPSHOT_TTL = float(os.environ.get("GIST_SNAPSHOT_TTL", "5"))
+GIST_GET_TIMEOUT = 15.0
+GIST_PATCH_TIMEOUT = 20.0
+GIST_PATCH_ATTEMPTS = 3
+GIST_RETRY_BASE_SEC = 0.5
+_GIST_HTTP2 = importlib.util.find_spec("h2") is not None
+_GIST_LIMITS = httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=60.0)
+
+_GIST_SNAP = {"files": None, "etag": None, "ts": 0.0, "wgen": 0}   # wgen: شمارنده‌ی نوشتن‌ها
+_GIST_SNAP_LOCK = threading.RLock()   # فقط برای جابه‌جاییِ تصویر — هرگز روی شبکه نگه داشته نمی‌شود
+_GIST_FETCH_LOCK = threading.Lock()   # یک GETِ همزمانِ sync (از تردها)
+_GIST_RMW_LOCK = threading.Lock()     # خواندن-تغییر-نوشتن‌های sync (gist_run) پشتِ هم
+_GIST_REVALIDATE = {"task": None}
+_GIST_HTTP = {"sync": None, "async": None, "loop": None, "alock": None}
+
+
+def _gist_headers() -> dict:
+    return {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
+
+
+def _gist_timeout(read: float) -> httpx.Timeout:
+    return httpx.Timeout(read, connect=5.0)
+
+
+def _gist_client() -> httpx.Client:
+    c = _GIST_HTTP["sync"]
+    if c is None:
+        with _GIST_SNAP_LOCK:
+            c = _GIST_HTTP["sync"]
+            if c is None:
+                c = httpx.Client(http2=_GIST_HTTP2, limits=_GIST_LIMITS)
+                _GIST_HTTP["sync"] = c
+    return c
+
+
+def _gist_aclient() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    if _GIST_HTTP["async"] is None or _GIST_HTTP["loop"] is not loop:
+        _GIST_HTTP["async"] = httpx.AsyncClient(http2=_GIST_HTTP2, limits=_GIST_LIMITS)
+        _GIST_HTTP["loop"] = loop
+        _GIST_HTTP["alock"] = asyncio.Lock()
+    return _GIST_HTTP["async"]
+
+
+async def gist_aclose():
+    """بستنِ کلاینت‌های مشترک (موقعِ خاموشی)."""
+    c, _GIST_HTTP["async"] = _GIST_HTTP["async"], None
+    if c is not None:
+        await c.aclose()
+    s, _GIST_HTTP["sync"] = _GIST_HTTP["sync"], None
+    if s is not None:
+        s.close()
+
+
+def _gist_clock(t0: float):
+    """⏱ سهمِ گیت‌هاب در زمانِ آپدیت (برای لاگِ آپدیتِ کُند)."""
+    dt = time.perf_counter() - t0
+    _GIST_TIME["sec"] += dt
+    _GIST_TIME["calls"] += 1
+    if BOOT.active:
+        BOOT.call("gist", dt)
+
+
+def _gist_split(data: dict) -> tuple[dict[str, str], dict[str, str]]:
+    """JSONِ گیست → ({نامِ فایل: محتوا}, {فایل‌های بریده‌شده: raw_url}).
+    گیت‌هاب محتوای فایل‌های بزرگ‌تر از ۱ مگ را می‌بُرد؛ آن‌ها باید جدا از raw_url بیایند."""
+    files, truncated = {}, {}
+    for name, f in ((data or {}).get("files") or {}).items():
+        if not isinstance(f, dict):
+            continue
+        files[name] = f.get("content") or ""
+        if f.get("truncated") and f.get("raw_url"):
+            truncated[name] = f["raw_url"]
+    return files, truncated
+
+
+def _gist_fresh(now: float, force: bool) -> bool:
+    return (not force and _GIST_SNAP["files"] is not None
+            and now - _GIST_SNAP["ts"] < GIST_SNAPSHOT_TTL)
+
+
+def _gist_conditional_headers() -> dict:
+    headers = _gist_headers()
+    if _GIST_SNAP["etag"] and _GIST_SNAP["files"] is not None:
+        headers["If-None-Match"] = _GIST_SNAP["etag"]
+    return headers
+
+
+def _gist_store(files: dict[str, str], etag, now: float, wgen: int) -> dict[str, str]:
+    """جوابِ یک GET را در تصویر می‌گذارد — مگر اینکه از شروعِ آن GET نوشتنی انجام شده باشد
+    (wgen عوض شده): آن جواب ممکن است مالِ قبل از PATCH باشد و نوشته را برگرداند.
+    خروجی همان چیزی است که خواننده باید ببیند."""
+    with _GIST_SNAP_LOCK:
+        if _GIST_SNAP["wgen"] != wgen:
+            cur = _GIST_SNAP["files"]
+            return cur if cur is not None else files
+        _GIST_SNAP["files"] = files
+        _GIST_SNAP["etag"] = etag
+        _GIST_SNAP["ts"] = now
+        return files
+
+
+def _gist_merge_written(files: dict[str, str]):
+    with _GIST_SNAP_LOCK:
+        if _GIST_SNAP["files"] is not None:
+            _GIST_SNAP["files"] = {**_GIST_SNAP["files"], **files}
+        # ETag عوض شده؛ دفعهٔ بعد بعد از TTL یک دریافتِ کامل (نه 304) می‌آید
+        _GIST_SNAP["etag"] = None
+        _GIST_SNAP["wgen"] += 1   # GETهای در جریان دیگر حقِ جایگزینیِ تصویر را ندارند
+
+
+def _gist_revalidate_soon(loop):
+    t = _GIST_REVALIDATE["task"]
+    if t is None or t.done():
+        _GIST_REVALIDATE["task"] = loop.create_task(agist_files())
+
+
+def gist_files(force: bool = False) -> dict[str, str] | None:
+    """همه‌ی فایل‌های گیست از تصویرِ مشترک. None یعنی «خواندن شکست خورد» (نه «خالی»).
+    روی حلقه‌ی اصلی هرگز منتظرِ شبکه نمی‌ماند: تصویرِ کهنه برمی‌گردد و تازه‌کردنش در پس‌زمینه
+    (agist_files) صف می‌شود. فقط وقتی هنوز هیچ تصویری نیست، همین‌جا دریافت می‌شود."""
+    if not GH_TOKEN or not GIST_ID:
+        return None
+    if _gist_fresh(time.monotonic(), force):
+        return _GIST_SNAP["files"]
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None and not force and _GIST_SNAP["files"] is not None:
+        _gist_revalidate_soon(loop)
+        return _GIST_SNAP["files"]
+    with _GIST_FETCH_LOCK:
+        now = time.monotonic()
+        if _gist_fresh(now, force):
+            return _GIST_SNAP["files"]
+        with _GIST_SNAP_LOCK:
+            headers = _gist_conditional_headers()
+            wgen = _GIST_SNAP["wgen"]
+        t0 = time.perf_counter()
+        try:
+            client = _gist_client()
+            r = client.get(GIST_API_URL, headers=headers, timeout=_gist_timeout(GIST_GET_TIMEOUT))
+            if r.status_code == 304:
+                with _GIST_SNAP_LOCK:
+                    _GIST_SNAP["ts"] = now
+                return _GIST_SNAP["files"]
+            if r.status_code != 200:
+                print("❌ gist fetch failed:", r.status_code, str(r.text)[:200])
+                return None
+            files, truncated = _gist_split(r.json())
+            for name, url in truncated.items():
+                rr = client.get(url, headers=_gist_headers(), timeout=_gist_timeout(GIST_GET_TIMEOUT))
+                rr.raise_for_status()
+                files[name] = rr.text
+            return _gist_store(files, r.headers.get("ETag"), now, wgen)
+        except Exception as e:
+            print("❌ gist fetch error:", e)
+            return None
+        finally:
+            _gist_clock(t0)
+
+
+async def agist_files(force: bool = False) -> dict[str, str] | None:
+    """نسخه‌ی async از gist_files — با کلاینتِ مشترکِ async و همان تصویر."""
+    if not GH_TOKEN or not GIST_ID:
+        return None
+    if _gist_fresh(time.monotonic(), force):
+        return _GIST_SNAP["files"]
+    client = _gist_aclient()
+    async with _GIST_HTTP["alock"]:      # چند هندلرِ همزمان → فقط یک درخواست
+        now = time.monotonic()
+        if _gist_fresh(now, force):
+            return _GIST_SNAP["files"]
+        t0 = time.perf_counter()
+        wgen = _GIST_SNAP["wgen"]
+        try:
+            r = await client.get(GIST_API_URL, headers=_gist_conditional_headers(),
+                                 timeout=_gist_timeout(GIST_GET_TIMEOUT))
+            if r.status_code == 304:
+                _GIST_SNAP["ts"] = now
+                return _GIST_SNAP["files"]
+            if r.status_code != 200:
+                print("❌ gist fetch failed:", r.status_code, str(r.text)[:200])
+                return None
+            files, truncated = _gist_split(r.json())
+            for name, url in truncated.items():
+                rr = await client.get(url, headers=_gist_headers(), timeout=_gist_timeout(GIST_GET_TIMEOUT))
+                rr.raise_for_status()
+                files[name] = rr.text
+            return _gist_store(files, r.headers.get("ETag"), now, wgen)
+        except Exception as e:
+            print("❌ gist fetch error:", e)
+            return None
+        finally:
+            _gist_clock(t0)
+
+
+def gist_read(filename: str, default: str | None = None) -> str | None:
+    """محتوای یک فایلِ گیست؛ اگر فایل نباشد default، اگر خواندن شکست بخورد None."""
+    files = gist_files()
+    if files is None:
+        return None
+    return files.get(filename, default)
+
+
+async def gist_run(fn, *args, **kwargs):
+    """اجرای یک تابعِ sync که در گیست می‌نویسد (save_*/record_*) از داخلِ هندلر: در ترد، تا
+    گیت‌هابِ کُند حلقه را نبندد؛ و پشتِ هم، تا خواندن-تغییر-نوشتنِ دو هندلر همدیگر را پاک نکنند."""
+    def run():
+        with _GIST_RMW_LOCK:
+            return fn(*args, **kwargs)
+    return await asyncio.to_thread(run)
+
+
+async def gist_load(loader, *args, **kwargs):
+    """اجرای یک load_* از داخلِ هندلر بدونِ بستنِ حلقه: تصویر با کلاینتِ async تازه می‌شود
+    و loader فقط از حافظه می‌خواند. اگر تازه‌کردن نشد، loader در ترد اجرا می‌شود."""
+    if await agist_files() is not None and _gist_fresh(time.monotonic(), False):
+        return loader(*args, **kwargs)
+    return await asyncio.to_thread(loader, *args, **kwargs)
+
+
+def _gist_patch_result(r, names: str) -> tuple[bool, float | None]:
+    """جوابِ PATCH → (موفق؟، مکثِ پیشنهادی برای تلاشِ دوباره یا None اگر تکرار بی‌فایده است)."""
+    if r.status_code in (200, 201):
+        return True, None
+    print("❌ gist write failed:", names, r.status_code, str(r.text)[:200])
+    if r.status_code == 429 or r.status_code >= 500:
+        try:
+            return False, min(float(r.headers.get("Retry-After") or 0), 10.0)
+        except (TypeError, ValueError):
+            return False, 0.0
+    return False, None    # 4xx: تکرارش همان جواب را می‌گیرد
+
+
+def _gist_payload(files: dict[str, str]) -> dict:
+    return {"files": {name: {"content": content} for name, content in files.items()}}
+
+
+def gist_write(files: dict[str, str], timeout: float = GIST_PATCH_TIMEOUT,
+               attempts: int = 1) -> bool:
+    """نوشتنِ یک یا چند فایل در یک PATCH؛ موفق که شد، تصویرِ کش هم به‌روز می‌شود.
+    خطای شبکه/5xx/429 تا attempts بار با مکثِ نمایی دوباره امتحان می‌شود."""
+    if not GH_TOKEN or not GIST_ID:
+        return False
+    payload, names = _gist_payload(files), ", ".join(files)
+    for attempt in range(1, attempts + 1):
+        t0 = time.perf_counter()
+        try:
+            r = _gist_client().patch(GIST_API_URL, headers=_gist_headers(), json=payload,
+                                     timeout=_gist_timeout(timeout))
+            ok, wait = _gist_patch_result(r, names)
+        except Exception as e:
+            print("❌ gist write error:", names, e)
+            ok, wait = False, 0.0
+        finally:
+            _gist_clock(t0)
+        if ok:
+            _gist_merge_written(files)
+            return True
+        if wait is None or attempt == attempts:
+            return False
+        time.sleep(max(wait, GIST_RETRY_BASE_SEC * 2 ** (attempt - 1)))
+    return False
+
+
+async def agist_write(files: dict[str, str], timeout: float = GIST_PATCH_TIMEOUT,
+                      attempts: int = 1) -> bool:
+    """نسخه‌ی async از gist_write — مکثِ بینِ تلاش‌ها هم حلقه را نمی‌بندد."""
+    if not GH_TOKEN or not GIST_ID:
+        return False
+    payload, names = _gist_payload(files), ", ".join(files)
+    client = _gist_aclient()
+    for attempt in range(1, attempts + 1):
+        t0 = time.perf_counter()
+        try:
+            r = await client.patch(GIST_API_URL, headers=_gist_headers(), json=payload,
+                                   timeout=_gist_timeout(timeout))
+            ok, wait = _gist_patch_result(r, names)
+        except Exception as e:
+            print("❌ gist write error:", names, e)
+            ok, wait = False, 0.0
+        finally:
+            _gist_clock(t0)
+        if ok:
+            _gist_merge_written(files)
+            return True
+        if wait is None or attempt == attempts:
+            return False
+        await asyncio.sleep(max(wait, GIST_RETRY_BASE_SEC * 2 ** (attempt - 1)))
+    return False
+
+
+class GistBatch:
+    """🧾 واحدِ کارِ گیست: تغییرِ چند فایل جمع می‌شود و commit() همه را در یک PATCH می‌نویسد.
+    یا همه ثبت می‌شوند یا هیچ‌کدام — فایل‌ها (مثلاً آمار و تاریخچه) با هم ناسازگار نمی‌مانند."""
+
+    def __init__(self):
+        self.files: dict[str, str] = {}
+
+    def put(self, filename: str, content: str):
+        self.files[filename] = content
+
+    def commit(self, attempts: int = GIST_PATCH_ATTEMPTS) -> bool:
+        if not self.files:
+            return True
+        if not gist_write(self.files, attempts=attempts):
+            return False
+        self.files = {}
+        return True
+
+    async def acommit(self, attempts: int = GIST_PATCH_ATTEMPTS) -> bool:
+        if not self.files:
+            return True
+        if not await agist_write(self.files, attempts=attempts):
+            return False
+        self.files = {}
+        return True
+
+
 def load_active_groups() -> set[int]:
     try:
         if not GH_TOKEN or not GIST_ID:
             print("⚠️ GH_TOKEN/GIST_ID not set; load_active_groups -> empty set")
             return set()
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = requests.get(url, headers=headers, timeout=10)
-        if r.status_code != 200:
-            print("❌ load_active_groups failed:", r.status_code, r.text)
+        content = gist_read("active_groups.json", "[]")
+        if content is None:
+            print("❌ load_active_groups failed")
             return set()
-        data = r.json()
-        content = data["files"].get("active_groups.json", {}).get("content", "[]")
         arr = json.loads(content) if content else []
         return set(int(x) for x in arr)
     except Exception as e:
@@ -155,20 +891,9 @@ def save_active_groups(active_groups: set[int]) -> bool:
         if not GH_TOKEN or not GIST_ID:
             print("⚠️ GH_TOKEN/GIST_ID not set; save_active_groups skipped")
             return False
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        payload = {
-            "files": {
-                "active_groups.json": {
-                    "content": json.dumps(sorted(list(active_groups)), ensure_ascii=False, indent=2)
-                }
-            }
-        }
-        r = requests.patch(url, headers=headers, json=payload, timeout=10)
-        if r.status_code not in (200, 201):
-            print("❌ save_active_groups failed:", r.status_code, r.text)
-            return False
-        return True
+        return gist_write({
+            "active_groups.json": json.dumps(sorted(list(active_groups)), ensure_ascii=False, indent=2)
+        })
     except Exception as e:
         print("❌ save_active_groups error:", e)
         return False
@@ -293,6 +1018,8 @@ class GameState:
         self.purchased_player = getattr(self, "purchased_player", None)
         self.purchase_pm_msg_id = getattr(self, "purchase_pm_msg_id", None)
         self.seat_sides = getattr(self, "seat_sides", {})
+        # 🧩 موتورِ سناریو بعد از لود از نو بسته می‌شود (شاید موتورها عوض شده باشند)
+        self.scn_bound_to = 0
         # ── حالت شبِ خودکار (سناریو مذاکره) ──
         self.night_active = getattr(self, "night_active", False)
         self.maarefe_active = getattr(self, "maarefe_active", False)
@@ -601,65 +1328,430 @@ class GameState:
         self.rerandom_prompt_msg_id = getattr(self, "rerandom_prompt_msg_id", None)
 
 
+# 🗂 ذخیره‌ی تکه‌تکه: هر بازی یک فایلِ جدا + یک فایلِ «متا» (سناریوها، آمارِ گروه‌ها، گروه‌های فعال).
+#    فقط فایلی دوباره نوشته می‌شود که محتوایش واقعاً عوض شده — نوشتنِ هر دکمه دیگر
+#    با تعدادِ گروه‌های فعال بزرگ نمی‌شود. PERSIST_FILE فقط برای مهاجرتِ یک‌باره خوانده می‌شود.
+PERSIST_DIR = os.environ.get("PERSIST_DIR", "mafia_state")
+_META_KEY = "meta"
+
+
+def _atomic_write(path: str, data: bytes, durable: bool = False):
+    """نوشتنِ اتمیک: اول فایلِ موقت، بعد os.replace — فایلِ نیمه‌نوشته هیچ‌وقت جای اصلی نمی‌نشیند."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class GameIndex:
+    """🗂 ایندکس‌های ثانویه روی store.games: گاد/بازیکن → بازی، endqهای معلق، اکتِ دستی.
+    هر store.save(chat_id) فقط همان بازی را «کهنه» علامت می‌زند و اولین جست‌وجوی بعدی
+    همان یکی را دوباره ایندکس می‌کند (save() بدونِ chat_id → همه). خروجی‌ها نامزدند؛
+    صدازننده وضعیتِ زنده‌ی بازی را هنوز خودش چک می‌کند."""
+
+    def __init__(self, store: "Store"):
+        self._store = store
+        self._rows: dict = {}              # cid → (god_id, {uid: seat}, endq?, uid بازیکنِ اکتِ دستی)
+        self.by_god: dict = {}             # god_uid → {cid: None} (ترتیبِ درج حفظ می‌شود)
+        self.by_player: dict = {}          # uid → {cid: seat}
+        self.endq: set = set()             # بازی‌هایی با پاپ‌آپِ «بازی تمام شده؟» معلق
+        self.acting_god: dict = {}         # god_uid → cid (گاد در حالِ اکتِ دستی)
+        self.acting_player: dict = {}      # uid بازیکن → cid (گاد جایش اکت می‌زند)
+        self.by_obj: dict = {}             # id(بازی) → cid
+        self._stale: set = set()
+        self._stale_all = True
+
+    def touch(self, chat_id=None):
+        if chat_id is None:
+            self._stale_all = True
+        else:
+            self._stale.add(chat_id)
+
+    def _drop(self, cid):
+        row = self._rows.pop(cid, None)
+        if row is None:
+            return
+        god, players, _endq, acting_uid, oid = row
+        if self.by_obj.get(oid) == cid:
+            del self.by_obj[oid]
+        cids = self.by_god.get(god)
+        if cids is not None:
+            cids.pop(cid, None)
+            if not cids:
+                del self.by_god[god]
+        for uid in players:
+            seats = self.by_player.get(uid)
+            if seats is not None:
+                seats.pop(cid, None)
+                if not seats:
+                    del self.by_player[uid]
+        self.endq.discard(cid)
+        if self.acting_god.get(god) == cid:
+            del self.acting_god[god]
+        if acting_uid is not None and self.acting_player.get(acting_uid) == cid:
+            del self.acting_player[acting_uid]
+
+    def _add(self, cid, g):
+        god = g.god_id
+        seats = g.seats or {}
+        players = {}
+        for seat, (uid, _n) in seats.items():
+            players.setdefault(uid, seat)          # مثلِ _seat_of_uid: اولین صندلی
+        endq = bool(getattr(g, "endq_token", None) and getattr(g, "endq_alert", False))
+        acting_uid = None
+        s = getattr(g, "god_acting_as", None)
+        if s and s in seats:
+            acting_uid = seats[s][0]
+        self._rows[cid] = (god, players, endq, acting_uid, id(g))
+        self.by_obj[id(g)] = cid
+        if god is not None:
+            self.by_god.setdefault(god, {})[cid] = None
+        for uid, seat in players.items():
+            self.by_player.setdefault(uid, {})[cid] = seat
+        if endq:
+            self.endq.add(cid)
+        if acting_uid is not None:
+            self.acting_god[god] = cid
+            self.acting_player[acting_uid] = cid
+
+    def _refresh(self):
+        games = self._store.games
+        if self._stale_all:
+            self._stale_all = False
+            self._stale.clear()
+            for cid in list(self._rows):
+                self._drop(cid)
+            for cid, g in games.items():
+                if isinstance(g, GameState):
+                    self._add(cid, g)
+            return
+        while self._stale:
+            cid = self._stale.pop()
+            self._drop(cid)
+            g = games.get(cid)
+            if isinstance(g, GameState):
+                self._add(cid, g)
+
+    # ── جست‌وجو ──
+    def player_games(self, uid) -> list[tuple]:
+        """[(chat_id, بازی, صندلی)] برای همه‌ی بازی‌هایی که uid در آن‌ها نشسته."""
+        self._refresh()
+        games = self._store.games
+        return [(cid, games[cid], seat)
+                for cid, seat in (self.by_player.get(uid) or {}).items() if cid in games]
+
+    def god_games(self, uid) -> list[tuple]:
+        self._refresh()
+        games = self._store.games
+        return [(cid, games[cid]) for cid in (self.by_god.get(uid) or ()) if cid in games]
+
+    def pending_endq(self, god_uid) -> list[tuple]:
+        self._refresh()
+        if not self.endq:
+            return []
+        games = self._store.games
+        return [(cid, games[cid]) for cid in (self.by_god.get(god_uid) or ())
+                if cid in self.endq and cid in games]
+
+    def games_of(self, uid) -> list[tuple]:
+        """[(chat_id, بازی)] هر بازی‌ای که uid گادش است یا در آن نشسته (اول گادی‌ها)."""
+        self._refresh()
+        games = self._store.games
+        cids = dict.fromkeys(self.by_god.get(uid) or ())
+        cids.update(dict.fromkeys(self.by_player.get(uid) or ()))
+        return [(cid, games[cid]) for cid in cids if cid in games]
+
+    def chat_of(self, g):
+        self._refresh()
+        cid = self.by_obj.get(id(g))
+        if cid is not None and self._store.games.get(cid) is g:
+            return cid
+        # بازیِ تازه‌ای که هنوز save نشده
+        for cid, game in self._store.games.items():
+            if game is g:
+                return cid
+        return None
+
+    def acting_of_god(self, uid):
+        self._refresh()
+        cid = self.acting_god.get(uid)
+        return self._store.games.get(cid) if cid is not None else None
+
+    def acting_of_player(self, uid):
+        self._refresh()
+        cid = self.acting_player.get(uid)
+        return self._store.games.get(cid) if cid is not None else None
+
+
+class _StateUnpickler(pickle.Unpickler):
+    """pickleهای قدیمی کلاس‌ها را از __main__ می‌خواهند («python mafia_bot.py»)، تازه‌ها از
+    mafia_bot (start.py) — هر دو به همین ماژول نگاشت می‌شوند، هر طور که اجرا شده باشد."""
+
+    def find_class(self, module, name):
+        if module in ("__main__", "mafia_bot"):
+            return getattr(sys.modules[__name__], name)
+        return super().find_class(module, name)
+
+
+def _unpickle(f):
+    return _StateUnpickler(f).load()
+
+
 class Store:
-    def __init__(self, path=PERSIST_FILE):
+    def __init__(self, path=PERSIST_FILE, state_dir=PERSIST_DIR):
         self.path = path
+        self.dir = state_dir
         self.scenarios: list[Scenario] = []
         self.games: dict[int, GameState] = {}
         self.group_stats: dict[int, dict] = {}
         self.active_groups: set[int] = set()
-        self.load()
-
+        self.chat_meta: dict[int, dict] = {}   # 🏷 عنوان/یوزرنیمِ گروه‌ها (کش با TTL)
+        self._digests: dict = {}       # کلید (chat_id یا "meta") → هشِ آخرین نسخه‌ی نوشته‌شده
+        self._dirty: set = set()       # بازی‌هایی که منتظرِ نوشته‌شدن‌اند
+        self._dirty_all = False        # یک save() بدونِ chat_id آمده → همه + متا مقایسه شوند
+        self._flush_task: asyncio.Task | None = None
+        self._writes: set = set()      # نوشتن‌های durableِ در جریان (تسک‌های to_thread)
+        self._io_lock = threading.Lock()
+        self._gen = 0                  # شماره‌ی نسخه‌ی هر ورودیِ دسته
+        self._written: dict = {}       # کلید → نسخه‌ای که الان روی دیسک است (زیرِ _io_lock)
+        self.index = GameIndex(self)
+        self.loaded = False            # تا load() نیامده، هیچ چیزی روی دیسک نوشته نمی‌شود
+
+    # ── مسیرها ──
+    def _games_dir(self) -> str:
+        return os.path.join(self.dir, "games")
+
+    def _game_path(self, chat_id) -> str:
+        return os.path.join(self._games_dir(), f"{chat_id}.pkl")
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.dir, "meta.pkl")
+
+    # ── خواندن ──
     def load(self):
-        if os.path.exists(self.path):
+        if os.path.isdir(self._games_dir()):
+            self._load_dir()
+        elif os.path.exists(self.path):
+            # 🔁 مهاجرت از فایلِ یکپارچه‌ی قدیمی — یک‌بار، بعد همه‌چیز تکه‌تکه نوشته می‌شود
             with open(self.path, "rb") as f:
-                obj = pickle.load(f)
-                self.scenarios = obj.get("scenarios", [])
-                self.games = obj.get("games", {})
-                self.group_stats = obj.get("group_stats", {})
-                # ⬇️ منبع حقیقت: Gist
-                ag = load_active_groups()
-                self.active_groups = ag if ag else set(obj.get("active_groups", []))
-                for g in self.games.values():
-                    if isinstance(g, GameState):
-                        g.__post_init__()
+                obj = _unpickle(f)
+            self.scenarios = obj.get("scenarios", [])
+            self.games = obj.get("games", {})
+            self.group_stats = obj.get("group_stats", {})
+            self.chat_meta = obj.get("chat_meta", {})
+            self.active_groups = set(obj.get("active_groups", []))
+            self._post_load()
+            self.save(durable=True)
+            print(f"🗂 store migrated: {len(self.games)} games → {self.dir}/")
         else:
-          
             self.scenarios = []
             self.games = {}
             self.group_stats = {}
-            self.active_groups = load_active_groups()  
+            self.active_groups = set()
+            self.loaded = True
             self.save()  # بعداً روی دیسک ذخیره کن
 
-    def save(self):
-        with open(self.path, "wb") as f:
-            pickle.dump({
-                "scenarios": self.scenarios,
-                "games": self.games,
-                "group_stats": self.group_stats,
-                "active_groups": list(self.active_groups)
-            }, f)
+    def _load_dir(self):
+        meta = {}
+        try:
+            with open(self._meta_path(), "rb") as f:
+                meta = _unpickle(f) or {}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("❌ store meta load error:", e)
+        self.scenarios = meta.get("scenarios", [])
+        self.group_stats = meta.get("group_stats", {})
+        self.chat_meta = meta.get("chat_meta", {})
+        # نسخه‌ی دیسک فقط پشتیبان است؛ منبعِ حقیقت گیست است (sync_active_groups)
+        self.active_groups = set(meta.get("active_groups", []))
+        self.games = {}
+        for fn in os.listdir(self._games_dir()):
+            if not fn.endswith(".pkl"):
+                continue
+            try:
+                cid = int(fn[:-4])
+                with open(os.path.join(self._games_dir(), fn), "rb") as f:
+                    self.games[cid] = _unpickle(f)
+            except Exception as e:
+                # ⚠️ یک فایلِ خراب فقط همان بازی را از دست می‌دهد، نه همه را
+                print(f"❌ store game load error ({fn}):", e)
+        self._post_load()
+
+    def _post_load(self):
+        for g in self.games.values():
+            if isinstance(g, GameState):
+                g.__post_init__()
+        # None یعنی «روی دیسک هست ولی هشش را نداریم» — اولین ذخیره بازنویسی‌اش می‌کند
+        # و اگر بازی از حافظه حذف شود، فایلش هم پاک می‌شود.
+        self._digests = {cid: None for cid in self.games}
+        self._dirty.clear()
+        self._dirty_all = False
+        self.index.touch()
+        self.loaded = True
+
+    def sync_active_groups(self, ag: set[int]):
+        """⬇️ گروه‌های فعال از گیست (منبعِ حقیقت)؛ خالی/خطا یعنی نسخه‌ی دیسک بماند."""
+        if ag and ag != self.active_groups:
+            self.active_groups = ag
+            self.save(_META_KEY)
+
+    # ── نوشتن (write-behind) ──
+    # save() هیچ‌وقت روی دیسک منتظر نمی‌ماند: فقط «کثیف» علامت می‌زند و یک تسکِ پس‌زمینه
+    # حداکثر هر SAVE_DEBOUNCE_SEC یک‌بار همه‌ی تغییرها را یک‌جا می‌نویسد. pickle روی حلقه‌ی
+    # اصلی انجام می‌شود (تصویرِ سازگار از state)، نوشتنِ فایل‌ها در ترد.
+    # هر ورودیِ دسته شماره‌ی نسخه دارد: اگر دسته‌ای قدیمی دیرتر از یک نوشتنِ durable به ترد
+    # برسد، کلیدهایی که نسخه‌ی تازه‌ترشان روی دیسک است رد می‌شوند.
+    def _meta_obj(self) -> dict:
+        return {
+            "scenarios": self.scenarios,
+            "group_stats": self.group_stats,
+            "active_groups": list(self.active_groups),
+            "chat_meta": self.chat_meta,
+        }
+
+    def _stage(self, batch: list, key, obj, path):
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        if self._digests.get(key) == digest:
+            return
+        self._digests[key] = digest
+        self._gen += 1
+        batch.append((key, path, data, self._gen))
+
+    def _stage_delete(self, batch: list, key, path):
+        self._digests.pop(key, None)
+        self._gen += 1
+        batch.append((key, path, None, self._gen))
+
+    def _collect(self) -> list:
+        """تغییرهای معلق → لیستِ (کلید، مسیر، بایت‌ها). بایتِ None یعنی فایل پاک شود."""
+        if not self.loaded:
+            return []          # store هنوز خالی است؛ نوشتنش فایل‌های واقعی را پاک می‌کرد
+        full = self._dirty_all
+        meta = full or _META_KEY in self._dirty
+        keys = set(self.games) if full else set(self._dirty) - {_META_KEY}
+        self._dirty.clear()
+        self._dirty_all = False
+        batch = []
+        for cid in keys:
+            g = self.games.get(cid)
+            if g is not None:
+                self._stage(batch, cid, g, self._game_path(cid))
+            elif cid in self._digests:
+                self._stage_delete(batch, cid, self._game_path(cid))
+        if full:
+            for cid in [k for k in self._digests if k != _META_KEY and k not in self.games]:
+                self._stage_delete(batch, cid, self._game_path(cid))
+        if meta:
+            self._stage(batch, _META_KEY, self._meta_obj(), self._meta_path())
+        return batch
+
+    def _write_batch(self, batch: list, durable: bool = False) -> list:
+        """نوشتنِ یک دسته (امنِ اجرا در ترد). کلیدهایی که نوشته نشدند برگردانده می‌شوند."""
+        failed = []
+        with self._io_lock:
+            os.makedirs(self._games_dir(), exist_ok=True)
+            for key, path, data, gen in batch:
+                if self._written.get(key, 0) > gen:
+                    continue           # نسخه‌ی تازه‌تری زودتر نوشته شده؛ این یکی کهنه است
+                try:
+                    if data is None:
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+                    else:
+                        _atomic_write(path, data, durable=durable)
+                    self._written[key] = gen
+                except Exception as e:
+                    print(f"❌ store write error ({key}):", e)
+                    failed.append(key)
+        return failed
+
+    def _requeue(self, failed: list):
+        for key in failed:
+            self._digests[key] = None
+            self._dirty.add(key)
+
+    def mark_dirty(self, chat_id=None):
+        """این بازی (یا بدونِ آرگومان: همه‌چیز) عوض شده — در flushِ بعدی نوشته شود.
+        _META_KEY فقط فایلِ متا را کثیف می‌کند."""
+        if chat_id == _META_KEY:
+            self._dirty.add(_META_KEY)
+            return
+        self.index.touch(chat_id)
+        if chat_id is None:
+            self._dirty_all = True
+        else:
+            self._dirty.add(chat_id)      # اگر دیگر در games نیست، _collect فایلش را پاک می‌کند
+
+    def save(self, chat_id=None, durable: bool = False):
+        """علامتِ «عوض شد» + زمان‌بندیِ نوشتن در پس‌زمینه.
+        durable=True برای لحظه‌های حساس (پخشِ نقش، پایانِ بازی): بدونِ پنجره‌ی debounce و با
+        fsync، در ترد — همین حالا تصویر گرفته می‌شود و هیچ دسته‌ی قدیمی‌تری رویش نمی‌نشیند."""
+        self.mark_dirty(chat_id)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            self.flush(durable=durable)   # بیرون از حلقه (زمانِ import / ترد): همان روشِ همزمان
+            return
+        if durable:
+            batch = self._collect()
+            if batch:
+                t = loop.create_task(self._write_off_loop(batch, durable=True))
+                self._writes.add(t)
+                t.add_done_callback(self._writes.discard)
+            return
+        self._schedule(loop)
+
+    def _schedule(self, loop):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_loop())
+
+    def flush(self, durable: bool = False):
+        """نوشتنِ همزمانِ همه‌ی تغییرهای معلق (خاموشی، SIGTERM، لحظه‌های حساس)."""
+        self._requeue(self._write_batch(self._collect(), durable=durable))
+
+    async def _write_off_loop(self, batch: list, durable: bool = False):
+        try:
+            failed = await asyncio.to_thread(self._write_batch, batch, durable)
+        except Exception as e:
+            print("❌ store flush error:", e)
+            failed = [k for k, _p, _d, _g in batch]
+        if failed:
+            self._requeue(failed)
+            self._schedule(asyncio.get_running_loop())
+
+    async def _flush_loop(self):
+        while self._dirty or self._dirty_all:
+            await asyncio.sleep(SAVE_DEBOUNCE_SEC)     # پنجره‌ی جمع‌کردنِ تغییرها
+            batch = self._collect()
+            if batch:
+                await self._write_off_loop(batch)
+
+    async def drain(self):
+        """خاموشی: منتظرِ نوشتن‌های durableِ در جریان (flush بعدش بقیه را می‌نویسد)."""
+        if self._writes:
+            await asyncio.wait(list(self._writes))
+
+    def pending(self) -> bool:
+        return bool(self._dirty or self._dirty_all)
 
 
 def save_scenarios_to_gist(scenarios):
     if not GH_TOKEN or not GIST_ID:
         return
 
-    url = f"https://api.github.com/gists/{GIST_ID}"
-    headers = {
-        "Authorization": f"token {GH_TOKEN}",
-        "Accept": "application/vnd.github+json",
-    }
-    data = {
-        "files": {
-            GIST_FILENAME: {
-                "content": json.dumps({"scenarios": [s.__dict__ for s in scenarios]}, ensure_ascii=False, indent=2)
-            }
-        }
-    }
-
     try:
-        httpx.patch(url, headers=headers, json=data)
+        gist_write({
+            GIST_FILENAME: json.dumps({"scenarios": [s.__dict__ for s in scenarios]}, ensure_ascii=False, indent=2)
+        })
     except Exception as e:
         print("❌ save_scenarios error:", e)
 
@@ -667,44 +1759,26 @@ def load_scenarios_from_gist():
     if not GH_TOKEN or not GIST_ID:
         return []
 
-    url = f"https://api.github.com/gists/{GIST_ID}"
-    headers = {
-        "Authorization": f"token {GH_TOKEN}",
-        "Accept": "application/vnd.github+json",
-    }
-
     try:
-        response = httpx.get(url, headers=headers)
-        if response.status_code == 200:
-            gist_data = response.json()
-            content = gist_data["files"][GIST_FILENAME]["content"]
-            data = json.loads(content)
-            return [Scenario(name=s["name"], roles=s["roles"]) for s in data.get("scenarios", [])]
-        else:
-            print("❌ Gist fetch failed:", response.status_code)
+        content = gist_read(GIST_FILENAME)
+        if content is None:
+            print("❌ Gist fetch failed:", GIST_FILENAME)
             return []
+        data = json.loads(content)
+        return [Scenario(name=s["name"], roles=s["roles"]) for s in data.get("scenarios", [])]
     except Exception as e:
         print("❌ load_scenarios error:", e)
         return []
 def load_usernames_from_gist():
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {
-            "Authorization": f"token {GH_TOKEN}",
-            "Accept": "application/vnd.github+json",
-        }
-
-        response = httpx.get(url, headers=headers)
-        if response.status_code == 200:
-            gist_data = response.json()
-            content = gist_data["files"].get(USERNAMES_FILENAME, {}).get("content", "{}")
-            data = json.loads(content) or {}
-            out = {int(k): v for k, v in data.items()}  # 👈 کلیدها رو تبدیل کن به عدد
-            _UN_HIGH_WATER["n"] = max(_UN_HIGH_WATER["n"], len(out))
-            return out
-        else:
-            print("❌ user_names gist fetch failed:", response.status_code)
+        content = gist_read(USERNAMES_FILENAME, "{}")
+        if content is None:
+            print("❌ user_names gist fetch failed")
             return None   # ⚠️ خطا ≠ «خالی» — وگرنه ذخیره‌ی بعدی همه را پاک می‌کند
+        data = json.loads(content) or {}
+        out = {int(k): v for k, v in data.items()}  # 👈 کلیدها رو تبدیل کن به عدد
+        _UN_HIGH_WATER["n"] = max(_UN_HIGH_WATER["n"], len(out))
+        return out
     except Exception as e:
         print("❌ load_usernames error:", e)
         return None
@@ -724,20 +1798,7 @@ def save_usernames_to_gist(usernames: dict[int, str]):
         return False
     _UN_HIGH_WATER["n"] = max(hw, len(usernames))
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {
-            "Authorization": f"token {GH_TOKEN}",
-            "Accept": "application/vnd.github+json",
-        }
-        data = {
-            "files": {
-                USERNAMES_FILENAME: {
-                    "content": json.dumps(usernames, ensure_ascii=False, indent=2)
-                }
-            }
-        }
-        httpx.patch(url, headers=headers, json=data)
-        return True
+        return gist_write({USERNAMES_FILENAME: json.dumps(usernames, ensure_ascii=False, indent=2)})
     except Exception as e:
         print("❌ save_usernames error:", e)
         return False
@@ -748,52 +1809,27 @@ STATS_FILENAME = "player_stats.json"
 
 def load_player_stats() -> dict:
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {
-            "Authorization": f"token {GH_TOKEN}",
-            "Accept": "application/vnd.github+json",
-        }
-        response = httpx.get(url, headers=headers)
-        if response.status_code == 200:
-            gist_data = response.json()
-            content = gist_data["files"].get(STATS_FILENAME, {}).get("content", "{}")
-            return json.loads(content) or {}
-        else:
-            print("❌ player_stats gist fetch failed:", response.status_code)
+        content = gist_read(STATS_FILENAME, "{}")
+        if content is None:
+            print("❌ player_stats gist fetch failed")
             return None   # ⚠️ خطا ≠ «خالی»
+        return json.loads(content) or {}
     except Exception as e:
         print("❌ load_player_stats error:", e)
         return None
 
-def save_player_stats(stats: dict):
+def save_player_stats(stats: dict, batch: GistBatch | None = None):
     # ⛡ محافظ: هرگز آمارِ همه را با دادهٔ خالی بازنویسی نکن
     if not stats:
         print("⛔ save_player_stats skipped: دادهٔ خالی")
         return False
-    url = f"https://api.github.com/gists/{GIST_ID}"
-    headers = {
-        "Authorization": f"token {GH_TOKEN}",
-        "Accept": "application/vnd.github+json",
-    }
-    data = {
-        "files": {
-            STATS_FILENAME: {
-                "content": json.dumps(stats, ensure_ascii=False, indent=2)
-            }
-        }
-    }
+    content = json.dumps(stats, ensure_ascii=False, indent=2)
+    if batch is not None:
+        batch.put(STATS_FILENAME, content)
+        return True
     # ⚠️ وضعیتِ HTTP حتماً چک شود — وگرنه شکستِ نوشتن «موفق» گزارش می‌شد
     #    و آمارِ یک بازی بی‌سروصدا گم می‌شد.
-    for attempt in (1, 2):
-        try:
-            r = httpx.patch(url, headers=headers, json=data)
-            if getattr(r, "status_code", 0) in (200, 201):
-                return True
-            print(f"❌ save_player_stats failed (تلاش {attempt}):",
-                  getattr(r, "status_code", "?"), str(getattr(r, "text", ""))[:200])
-        except Exception as e:
-            print(f"❌ save_player_stats error (تلاش {attempt}):", e)
-    return False
+    return gist_write({STATS_FILENAME: content}, attempts=GIST_PATCH_ATTEMPTS)
 
 
 # ─── 🏁 فصل امتیازی (سقف ۲۰۰۰ → مدال + ریست) ────────────────────
@@ -803,30 +1839,26 @@ SEASON_TARGET = 1500.0
 
 def load_medals_log() -> dict | None:
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = httpx.get(url, headers=headers)
-        if r.status_code == 200:
-            content = r.json().get("files", {}).get(MEDALS_FILENAME, {}).get("content", "{}")
-            return json.loads(content) or {"seasons": []}
-        print("❌ medals fetch failed:", r.status_code)
-        return None   # ⚠️ خطا ≠ «خالی» — وگرنه تاریخچهٔ مدال‌ها پاک می‌شود
+        content = gist_read(MEDALS_FILENAME, "{}")
+        if content is None:
+            print("❌ medals fetch failed")
+            return None   # ⚠️ خطا ≠ «خالی» — وگرنه تاریخچهٔ مدال‌ها پاک می‌شود
+        return json.loads(content) or {"seasons": []}
     except Exception as e:
         print("❌ load_medals_log error:", e)
         return None
 
 
-def save_medals_log(data: dict):
+def save_medals_log(data: dict, batch: GistBatch | None = None):
     if not data or not data.get("seasons"):
         print("⛔ save_medals_log skipped: دادهٔ خالی")
         return False
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        payload = {"files": {MEDALS_FILENAME: {
-            "content": json.dumps(data, ensure_ascii=False, indent=2)}}}
-        r = httpx.patch(url, headers=headers, json=payload)
-        return r.status_code in (200, 201)
+        content = json.dumps(data, ensure_ascii=False, indent=2)
+        if batch is not None:
+            batch.put(MEDALS_FILENAME, content)
+            return True
+        return gist_write({MEDALS_FILENAME: content})
     except Exception as e:
         print("❌ save_medals_log error:", e)
         return False
@@ -887,9 +1919,9 @@ def medal_tag(uid) -> str:
     return f" {b}" if b else ""
 
 
-def _season_check_and_reset(stats: dict, date_str=None) -> str | None:
+def _season_check_and_reset(stats: dict, date_str=None, batch: GistBatch | None = None) -> str | None:
     """اگر امتیازِ نفرِ اول به سقف رسید: مدالِ ۳ نفر اول + ثبت در تاریخچه + صفر کردنِ همه.
-    متنِ اعلانِ گروه را برمی‌گرداند (یا None)."""
+    متنِ اعلانِ گروه را برمی‌گرداند (یا None). با batch، نوشتن‌ها فقط در آن صف می‌شوند."""
     rows = [(uid, d, _season_total(d)) for uid, d in stats.items()]
     rows = [r for r in rows if r[2] > 0]
     if not rows or max(r[2] for r in rows) < SEASON_TARGET:
@@ -918,7 +1950,7 @@ def _season_check_and_reset(stats: dict, date_str=None) -> str | None:
         seasons = mlog.get("seasons", [])
         seasons.append({"n": len(seasons) + 1, "date": date_str or "—", "winners": winners})
         mlog["seasons"] = seasons
-        if not save_medals_log(mlog):
+        if not save_medals_log(mlog, batch=batch):
             raise RuntimeError("ذخیرهٔ تاریخچهٔ مدال‌ها ناموفق بود")
     except Exception as e:
         print("❌ season medal log error:", e, "— بستنِ فصل به تعویق افتاد")
@@ -947,7 +1979,7 @@ def _season_check_and_reset(stats: dict, date_str=None) -> str | None:
         meta = load_weekly_meta()
         if isinstance(meta, dict):
             meta["snapshot"] = json.loads(json.dumps(stats))
-            save_weekly_meta(meta)
+            save_weekly_meta(meta, batch=batch)
     except Exception as e:
         print("❌ season weekly re-baseline error:", e)
 
@@ -979,11 +2011,11 @@ async def _broadcast_season_end(bot, text: str, first_chat_id=None):
     sent = 0
     for cid in targets:
         try:
-            m = await bot.send_message(cid, text, parse_mode="HTML")
+            m = await bot.send_message(cid, text, parse_mode="HTML", rate_limit_args=OUT_LOW)
             sent += 1
             try:
                 await bot.pin_chat_message(chat_id=cid, message_id=m.message_id,
-                                           disable_notification=True)
+                                           disable_notification=True, rate_limit_args=OUT_LOW)
             except Exception:
                 pass
         except Exception as e:
@@ -1009,6 +2041,10 @@ def update_player_stats(g: GameState, mafia_roles, indep_for_this, scores=None,
             return None
         hist_rows = []
 
+        # رجیستری مجموعه‌های نرمالایزشده می‌دهد؛ برای ورودیِ خام فقط یک بار نرمالایز کن
+        mafia_roles = mafia_roles if isinstance(mafia_roles, frozenset) else {_nz(x) for x in mafia_roles}
+        indep_for_this = indep_for_this if isinstance(indep_for_this, frozenset) else {_nz(x) for x in indep_for_this}
+
         for seat in sorted(g.seats):
             uid, name = g.seats[seat]
             role = g.assigned_roles.get(seat, "—")
@@ -1023,9 +2059,9 @@ def update_player_stats(g: GameState, mafia_roles, indep_for_this, scores=None,
             elif getattr(g, "seat_sides", None) and seat in g.seat_sides:
                 side = g.seat_sides[seat]
             # fallback: تشخیص لحظه‌ای (اگر کَش وجود نداشت) — با نرمالایز عربی/فارسی
-            elif _nz(role) in {_nz(x) for x in mafia_roles}:
+            elif _nz(role) in mafia_roles:
                 side = "مافیا"
-            elif _nz(role) in {_nz(x) for x in indep_for_this}:
+            elif _nz(role) in indep_for_this:
                 side = "مستقل"
             else:
                 side = "شهر"
@@ -1099,14 +2135,16 @@ def update_player_stats(g: GameState, mafia_roles, indep_for_this, scores=None,
             gp["god_games"] = gp.get("god_games", 0) + 1
             stats[god_key] = gp
 
+        # 🧾 آمار، تاریخچه، مدال‌ها و اسنپ‌شاتِ هفتگی همه در یک PATCH — یا همه یا هیچ
+        batch = GistBatch()
+
         # 🏁 پایان فصل؟ (مدال + ریستِ امتیازها، قبل از ذخیره)
         try:
-            season_msg = _season_check_and_reset(stats, date_str=date_str)
+            season_msg = _season_check_and_reset(stats, date_str=date_str, batch=batch)
         except Exception as e:
             print("❌ season check error:", e)
 
-        if not save_player_stats(stats):
-            g.stats_save_error = "نوشتنِ آمار روی گیست ناموفق بود (آمارِ این بازی ثبت نشد)."
+        save_player_stats(stats, batch=batch)
 
         # 🎮 ثبتِ تاریخچه‌ی بازی برای «بازی من» (تاریخ + گروه + ساید + نتیجه)
         if hist_rows and (group_title or date_str):
@@ -1120,12 +2158,17 @@ def update_player_stats(g: GameState, mafia_roles, indep_for_this, scores=None,
                     lst.append({"d": date_str or "—", "g": group_title or "—",
                                 "s": _s, "w": 1 if _w else 0})
                     hist[k] = lst[-50:]   # سقفِ ۵۰ بازیِ اخیر برای هر نفر
-                if not save_game_history(hist):
-                    raise RuntimeError("نوشتنِ تاریخچه ناموفق بود")
+                save_game_history(hist, batch=batch)
             except Exception as _e:
                 print("❌ game history save:", _e)
-                g.stats_save_error = ((g.stats_save_error or "")
-                                      + " | تاریخچهٔ «بازی من» هم ثبت نشد.").strip(" |")
+                g.stats_save_error = "تاریخچهٔ «بازی من» ثبت نشد."
+
+        if not batch.commit():
+            g.stats_save_error = "نوشتنِ آمار روی گیست ناموفق بود (آمار و تاریخچهٔ این بازی ثبت نشد)."
+            if season_msg:
+                # فصل روی گیست بسته نشد؛ نشان‌های کش‌شده را هم به حالتِ گیست برگردان
+                season_msg = None
+                _MEDAL_CACHE["ts"] = 0.0
     except Exception as e:
         print("❌ update_player_stats error:", e)
         g.stats_save_error = f"خطای غیرمنتظره در ثبتِ آمار: {e}"
@@ -1141,17 +2184,13 @@ GOD_MAX_ABANDONS = 3     # این تعداد ترکِ بازی در هفته →
 
 def load_god_bans() -> dict | None:
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        # ⏱ تایم‌اوت لازم است: این درخواست کلِ گیست را می‌آورد و اگر معلق بماند
-        #    تردِ پس‌زمینه تا ابد گیر می‌کند.
-        r = httpx.get(url, headers=headers, timeout=15.0)
-        if r.status_code != 200:
+        files = gist_files()
+        if files is None:
             return None
-        f = (r.json().get("files", {}) or {}).get(GOD_BANS_FILENAME)
-        if not f:
+        content = files.get(GOD_BANS_FILENAME)
+        if not content:
             return {"banned": {}}
-        return json.loads(f.get("content") or "{}") or {"banned": {}}
+        return json.loads(content) or {"banned": {}}
     except Exception as e:
         print("❌ load_god_bans:", e)
         return None
@@ -1159,10 +2198,7 @@ def load_god_bans() -> dict | None:
 
 def save_god_bans(data: dict):
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        httpx.patch(url, headers=headers, json={"files": {GOD_BANS_FILENAME: {
-            "content": json.dumps(data, ensure_ascii=False, indent=2)}}})
+        gist_write({GOD_BANS_FILENAME: json.dumps(data, ensure_ascii=False, indent=2)})
         _GOD_BAN_CACHE["data"] = data
         return True
     except Exception as e:
@@ -1458,7 +2494,7 @@ async def _god_unban_from_reply(ctx, msg, by_uid=None):
     if by_uid is not None and not _is_super_admin(by_uid) and target.id == by_uid:
         await msg.reply_text("⛔ محرومیتِ خودت را نمی‌توانی برداری.")
         return
-    ok, res = god_unban(target.id, unblock=_is_super_admin(by_uid))
+    ok, res = await gist_run(god_unban, target.id, unblock=_is_super_admin(by_uid))
     if not ok:
         await msg.reply_text(f"ℹ️ {res}")
         return
@@ -1485,7 +2521,7 @@ async def _block_from_reply(ctx, msg):
     if getattr(target, "is_bot", False):
         await msg.reply_text("ℹ️ بات را نمی‌شود محروم کرد.")
         return
-    ok, res = await asyncio.to_thread(set_blocked, target.id, target.full_name)
+    ok, res = await gist_run(set_blocked, target.id, target.full_name)
     if not ok:
         await msg.reply_text(f"ℹ️ {res}")
         return
@@ -1545,40 +2581,28 @@ HISTORY_FILENAME = "game_history.json"
 
 def load_game_history() -> dict | None:
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = httpx.get(url, headers=headers)
-        if r.status_code != 200:
-            print("❌ game_history fetch failed:", r.status_code)
+        files = gist_files()
+        if files is None:
+            print("❌ game_history fetch failed")
             return None   # ⚠️ خطا ≠ «خالی»
-        f = (r.json().get("files", {}) or {}).get(HISTORY_FILENAME)
-        if not f:
+        content = files.get(HISTORY_FILENAME)
+        if content is None:
             return {}     # فایل واقعاً وجود ندارد (اولین بار)
-        import json as _json
-        return _json.loads(f.get("content") or "{}") or {}
+        return json.loads(content or "{}") or {}
     except Exception as e:
         print("❌ load_game_history:", e)
         return None
 
 
-def save_game_history(h: dict) -> bool:
+def save_game_history(h: dict, batch: GistBatch | None = None) -> bool:
     if not h:
         print("⛔ save_game_history skipped: دادهٔ خالی")
         return False
-    import json as _json
-    url = f"https://api.github.com/gists/{GIST_ID}"
-    headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-    data = {"files": {HISTORY_FILENAME: {"content": _json.dumps(h, ensure_ascii=False)}}}
-    for attempt in (1, 2):
-        try:
-            r = httpx.patch(url, headers=headers, json=data)
-            if getattr(r, "status_code", 0) in (200, 201):
-                return True
-            print(f"❌ save_game_history failed (تلاش {attempt}):",
-                  getattr(r, "status_code", "?"))
-        except Exception as e:
-            print(f"❌ save_game_history error (تلاش {attempt}):", e)
-    return False
+    content = json.dumps(h, ensure_ascii=False)
+    if batch is not None:
+        batch.put(HISTORY_FILENAME, content)
+        return True
+    return gist_write({HISTORY_FILENAME: content}, attempts=GIST_PATCH_ATTEMPTS)
 
 
 def format_game_history(rows: list) -> str:
@@ -1809,6 +2833,7 @@ async def cmd_moveuser(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     await msg.reply_text(txt, parse_mode="HTML", reply_markup=kb)
 
 
+@callback_route("mvu_")
 async def handle_moveuser_callback(update, ctx):
     q = update.callback_query
     uid = q.from_user.id
@@ -1839,7 +2864,7 @@ async def handle_moveuser_callback(update, ctx):
     except Exception:
         pass
 
-    log = await asyncio.to_thread(_moveuser_apply, old_uid, new_uid)
+    log = await gist_run(_moveuser_apply, old_uid, new_uid)
     txt = (f"🔀 <b>{old_uid} → {new_uid}</b>\n\n" + "\n".join(log)
            + "\n\n<i>کشِ نشان‌ها تازه شد؛ مدال از همین حالا کنارِ اسم می‌آید.</i>")
     try:
@@ -1913,37 +2938,22 @@ WEEKLY_PERIOD_SEC = 7 * 24 * 3600           # هر ۷ روز
 
 def load_weekly_meta() -> dict:
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {
-            "Authorization": f"token {GH_TOKEN}",
-            "Accept": "application/vnd.github+json",
-        }
-        response = httpx.get(url, headers=headers)
-        if response.status_code == 200:
-            gist_data = response.json()
-            content = gist_data["files"].get(WEEKLY_META_FILENAME, {}).get("content", "{}")
-            return json.loads(content) or {}
-        print("❌ load_weekly_meta bad status:", response.status_code)
-        return None   # ⚠️ خطا ≠ «فایل خالی» — نباید ساعتِ هفتگی صفر شود
+        content = gist_read(WEEKLY_META_FILENAME, "{}")
+        if content is None:
+            print("❌ load_weekly_meta failed")
+            return None   # ⚠️ خطا ≠ «فایل خالی» — نباید ساعتِ هفتگی صفر شود
+        return json.loads(content) or {}
     except Exception as e:
         print("❌ load_weekly_meta error:", e)
         return None   # ⚠️ خطا ≠ «فایل خالی»
 
-def save_weekly_meta(meta: dict):
+def save_weekly_meta(meta: dict, batch: GistBatch | None = None):
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {
-            "Authorization": f"token {GH_TOKEN}",
-            "Accept": "application/vnd.github+json",
-        }
-        data = {
-            "files": {
-                WEEKLY_META_FILENAME: {
-                    "content": json.dumps(meta, ensure_ascii=False, indent=2)
-                }
-            }
-        }
-        httpx.patch(url, headers=headers, json=data)
+        content = json.dumps(meta, ensure_ascii=False, indent=2)
+        if batch is not None:
+            batch.put(WEEKLY_META_FILENAME, content)
+            return
+        gist_write({WEEKLY_META_FILENAME: content})
     except Exception as e:
         print("❌ save_weekly_meta error:", e)
 
@@ -2347,14 +3357,8 @@ def load_bot_settings(force=False) -> dict:
     if _SETTINGS_CACHE["data"] is not None and not force:
         return _SETTINGS_CACHE["data"]
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = httpx.get(url, headers=headers)
-        if r.status_code == 200:
-            content = r.json().get("files", {}).get(SETTINGS_FILENAME, {}).get("content", "{}")
-            _SETTINGS_CACHE["data"] = json.loads(content) or {}
-        else:
-            _SETTINGS_CACHE["data"] = {}
+        content = gist_read(SETTINGS_FILENAME, "{}")
+        _SETTINGS_CACHE["data"] = (json.loads(content) or {}) if content is not None else {}
     except Exception as e:
         print("❌ load_bot_settings:", e)
         _SETTINGS_CACHE["data"] = {}
@@ -2364,10 +3368,7 @@ def load_bot_settings(force=False) -> dict:
 def save_bot_settings(data: dict):
     _SETTINGS_CACHE["data"] = data
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        httpx.patch(url, headers=headers, json={"files": {SETTINGS_FILENAME: {
-            "content": json.dumps(data, ensure_ascii=False, indent=2)}}})
+        gist_write({SETTINGS_FILENAME: json.dumps(data, ensure_ascii=False, indent=2)})
     except Exception as e:
         print("❌ save_bot_settings:", e)
 
@@ -2378,7 +3379,7 @@ def get_archive_channel():
     return v or (os.getenv("ARCHIVE_CHANNEL") or None)
 
 
-async def _send_chunked(bot, chat_id, text, limit=3500):
+async def _send_chunked(bot, chat_id, text, limit=3500, prio=None):
     """ارسالِ متنِ بلند در چند تکه (محدودیتِ ۴۰۹۶ کاراکتریِ تلگرام)."""
     sent = []
     chunk = ""
@@ -2386,14 +3387,16 @@ async def _send_chunked(bot, chat_id, text, limit=3500):
         if len(chunk) + len(line) + 1 > limit:
             if chunk.strip():
                 try:
-                    sent.append(await bot.send_message(chat_id, chunk, parse_mode="HTML"))
+                    sent.append(await bot.send_message(chat_id, chunk, parse_mode="HTML",
+                                                       rate_limit_args=prio))
                 except Exception as e:
                     print(f"⚠️ chunk send failed ({chat_id}):", e)
             chunk = ""
         chunk += (line + "\n")
     if chunk.strip():
         try:
-            sent.append(await bot.send_message(chat_id, chunk, parse_mode="HTML"))
+            sent.append(await bot.send_message(chat_id, chunk, parse_mode="HTML",
+                                               rate_limit_args=prio))
         except Exception as e:
             print(f"⚠️ chunk send failed ({chat_id}):", e)
     return sent
@@ -2405,11 +3408,11 @@ async def archive_game_to_channel(bot, header, final_text, report_text=None, sco
     if not ch:
         return False
     try:
-        await _send_chunked(bot, ch, header + "\n" + final_text)
+        await _send_chunked(bot, ch, header + "\n" + final_text, prio=OUT_LOW)
         if report_text:
-            await _send_chunked(bot, ch, report_text)
+            await _send_chunked(bot, ch, report_text, prio=OUT_LOW)
         if score_text:
-            await _send_chunked(bot, ch, score_text)
+            await _send_chunked(bot, ch, score_text, prio=OUT_LOW)
         return True
     except Exception as e:
         print("⚠️ archive_game_to_channel:", e)
@@ -2418,36 +3421,17 @@ async def archive_game_to_channel(bot, header, final_text, report_text=None, sco
 
 def load_selected_list() -> dict:
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {
-            "Authorization": f"token {GH_TOKEN}",
-            "Accept": "application/vnd.github+json",
-        }
-        response = httpx.get(url, headers=headers)
-        if response.status_code == 200:
-            gist_data = response.json()
-            content = gist_data["files"].get(SELECTED_FILENAME, {}).get("content", "{}")
-            return json.loads(content) or {}
-        return {}
+        content = gist_read(SELECTED_FILENAME, "{}")
+        if content is None:
+            return {}
+        return json.loads(content) or {}
     except Exception as e:
         print("❌ load_selected_list error:", e)
         return {}
 
 def save_selected_list(data: dict):
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {
-            "Authorization": f"token {GH_TOKEN}",
-            "Accept": "application/vnd.github+json",
-        }
-        payload = {
-            "files": {
-                SELECTED_FILENAME: {
-                    "content": json.dumps(data, ensure_ascii=False, indent=2)
-                }
-            }
-        }
-        httpx.patch(url, headers=headers, json=payload)
+        gist_write({SELECTED_FILENAME: json.dumps(data, ensure_ascii=False, indent=2)})
     except Exception as e:
         print("❌ save_selected_list error:", e)
 
@@ -2481,7 +3465,7 @@ async def launch_selected_round(bot, candidates=None) -> int:
         "responses": {},
         "started_at": datetime.now().timestamp(),
     }
-    save_selected_list(data)
+    await gist_run(save_selected_list, data)
 
     kb = InlineKeyboardMarkup([[
         InlineKeyboardButton("✅ بله", callback_data="sel_yes"),
@@ -2606,7 +3590,7 @@ async def _maybe_send_full_report(bot, sl: dict):
         return
 
     sl["report_sent"] = True
-    save_selected_list(sl)
+    await gist_run(save_selected_list, sl)
     try:
         await bot.send_message(
             ADMIN_ID,
@@ -2629,7 +3613,7 @@ async def check_selected_deadline(bot):
         return
 
     sl["report_sent"] = True
-    save_selected_list(sl)
+    await gist_run(save_selected_list, sl)
     try:
         await bot.send_message(
             ADMIN_ID,
@@ -2640,6 +3624,7 @@ async def check_selected_deadline(bot):
         pass
 
 
+@callback_route("sel_", "selday_")
 async def handle_selected_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     data = q.data
@@ -2661,7 +3646,7 @@ async def handle_selected_callback(update: Update, ctx: ContextTypes.DEFAULT_TYP
 
     if data == "sel_no":
         responses[uid] = {"name": name, "participate": False, "days": [], "submitted": True}
-        save_selected_list(sl)
+        await gist_run(save_selected_list, sl)
         try:
             await ctx.bot.edit_message_reply_markup(
                 chat_id=int(uid), message_id=q.message.message_id, reply_markup=None
@@ -2675,7 +3660,7 @@ async def handle_selected_callback(update: Update, ctx: ContextTypes.DEFAULT_TYP
 
     if data == "sel_yes":
         responses[uid] = {"name": name, "participate": True, "days": [], "submitted": False}
-        save_selected_list(sl)
+        await gist_run(save_selected_list, sl)
         await ctx.bot.send_message(
             int(uid),
             "📅 کدام روزها می‌توانید بازی کنید؟ (می‌توانید چند روز انتخاب کنید)\n"
@@ -2700,7 +3685,7 @@ async def handle_selected_callback(update: Update, ctx: ContextTypes.DEFAULT_TYP
         else:
             days.add(day)
         r["days"] = [d for d in SELECTED_DAYS if d in days]  # حفظ ترتیب
-        save_selected_list(sl)
+        await gist_run(save_selected_list, sl)
         try:
             await ctx.bot.edit_message_reply_markup(
                 chat_id=int(uid),
@@ -2719,7 +3704,7 @@ async def handle_selected_callback(update: Update, ctx: ContextTypes.DEFAULT_TYP
             await safe_q_answer(q, "حداقل یک روز انتخاب کن.", show_alert=True)
             return
         r["submitted"] = True
-        save_selected_list(sl)
+        await gist_run(save_selected_list, sl)
         try:
             await ctx.bot.edit_message_reply_markup(
                 chat_id=int(uid), message_id=q.message.message_id, reply_markup=None
@@ -2749,7 +3734,7 @@ async def broadcast_weekly_stats(bot, force: bool = False):
     # اولین اجرا (فایل واقعاً خالی): فقط خط مبنا را ثبت کن و صبر کن تا هفتهٔ بعد
     if not last_sent and not force:
         print("📊 weekly baseline set (first run)")
-        save_weekly_meta({"last_sent": now, "snapshot": current})
+        await gist_run(save_weekly_meta, {"last_sent": now, "snapshot": current})
         return
 
     if not force and (now - last_sent) < WEEKLY_PERIOD_SEC:
@@ -2761,10 +3746,12 @@ async def broadcast_weekly_stats(bot, force: bool = False):
     if text:
         for chat_id in list(store.active_groups):
             try:
-                msg = await bot.send_message(chat_id, text, parse_mode="HTML")
+                msg = await bot.send_message(chat_id, text, parse_mode="HTML",
+                                             rate_limit_args=OUT_LOW)
                 try:
                     await bot.pin_chat_message(
-                        chat_id, msg.message_id, disable_notification=True
+                        chat_id, msg.message_id, disable_notification=True,
+                        rate_limit_args=OUT_LOW
                     )
                 except Exception as e:
                     print(f"⚠️ weekly pin failed for {chat_id}:", e)
@@ -2776,7 +3763,7 @@ async def broadcast_weekly_stats(bot, force: bool = False):
     try:
         _delta_all = _weekly_delta(current, snapshot)
         _banned = compute_god_bans(_delta_all)
-        save_god_bans({"set_at": now, "banned": _banned})
+        await gist_run(save_god_bans, {"set_at": now, "banned": _banned})
         if _banned:
             _bl = ["🚫 <b>محرومانِ گادی برای این هفته</b>", ""]
             for _u, _b in _banned.items():
@@ -2812,7 +3799,7 @@ async def broadcast_weekly_stats(bot, force: bool = False):
             print("⚠️ launch_selected_round error:", e)
 
     # ⏱ /weekly دستی هم مثل خودکار: ساعتِ هفته از همین لحظه ریست + اسنپ‌شاتِ تازه
-    save_weekly_meta({"last_sent": now, "snapshot": current})
+    await gist_run(save_weekly_meta, {"last_sent": now, "snapshot": current})
 
     if not text:
         reason = "no_data" if not current else "no_activity"
@@ -2835,15 +3822,66 @@ async def weekly_scheduler(app):
 
 
 store = Store()
-store.scenarios = load_scenarios_from_gist()
+atexit.register(store.flush, True)   # 💾 هر چه معلق مانده، قبل از خروج نوشته شود
 
-# لود کردن نام‌های کاربران از Gist برای تمام گیم‌ها
-usernames = load_usernames_from_gist() or {}
-for g in store.games.values():
-    g.user_names = usernames
 
+# ═══════════ 🏷 کشِ مشخصاتِ چت (عنوان/یوزرنیم) ═══════════
+# مشترکِ همه‌ی بازی‌ها و کنارِ store ذخیره می‌شود (بعد از ری‌استارت هم هست). هر آپدیتی که
+# می‌رسد چتش را تازه می‌کند، پس get_chat فقط برای گروهی لازم است که مدتی پیامی نداشته.
+# عوض‌شدنِ عنوان/یوزرنیم و مهاجرت به سوپرگروه همه از note_chat_update رد می‌شوند.
+CHAT_META_TTL = 12 * 3600
 
 
+@dataclass
+class ChatMeta:
+    id: int
+    title: str | None = None
+    username: str | None = None
+
+
+def remember_chat(chat):
+    if chat is None or getattr(chat, "type", None) == "private":
+        return
+    title, username = getattr(chat, "title", None), getattr(chat, "username", None)
+    cur = store.chat_meta.get(chat.id)
+    if cur and cur.get("title") == title and cur.get("username") == username:
+        cur["ts"] = time.time()       # فقط تازگی — لازم نیست روی دیسک برود
+        return
+    store.chat_meta[chat.id] = {"title": title, "username": username, "ts": time.time()}
+    store.save(_META_KEY)
+
+
+def forget_chat(chat_id):
+    if store.chat_meta.pop(chat_id, None) is not None:
+        store.save(_META_KEY)
+
+
+def note_chat_update(update):
+    """از هر آپدیت: کشِ چت را به‌روز کن (یا با مهاجرت به سوپرگروه، آیدیِ قدیمی را پاک کن)."""
+    if not store.loaded:
+        return
+    try:
+        msg = getattr(update, "effective_message", None)
+        if msg is not None and getattr(msg, "migrate_to_chat_id", None):
+            forget_chat(msg.chat.id)
+            return
+        remember_chat(getattr(update, "effective_chat", None))
+    except Exception as e:
+        print("⚠️ chat meta:", e)
+
+
+async def chat_meta(bot, chat_id) -> ChatMeta | None:
+    """عنوان/یوزرنیمِ چت از کش؛ فقط اگر نبود یا کهنه بود get_chat. None یعنی نشد."""
+    cur = store.chat_meta.get(chat_id)
+    if cur and time.time() - float(cur.get("ts", 0)) < CHAT_META_TTL:
+        return ChatMeta(chat_id, cur.get("title"), cur.get("username"))
+    try:
+        ch = await _retry(bot.get_chat(chat_id))
+    except Exception as e:
+        print("⚠️ get_chat:", chat_id, e)
+        return ChatMeta(chat_id, cur.get("title"), cur.get("username")) if cur else None
+    remember_chat(ch)
+    return ChatMeta(chat_id, getattr(ch, "title", None), getattr(ch, "username", None))
 def gs(chat_id):
     g = store.games.setdefault(chat_id, GameState())
     if not g.user_names:
@@ -2851,10 +3889,9 @@ def gs(chat_id):
     return g
 
 def load_event_numbers():
-    url = f"https://api.github.com/gists/{GIST_ID}"
-    res = requests.get(url, headers={"Authorization": f"token {GH_TOKEN}"})
-    data = res.json()
-    content = data["files"]["event_numbers.json"]["content"]
+    content = gist_read("event_numbers.json")
+    if content is None:
+        return None   # ⚠️ خطا ≠ «خالی» — شماره‌ی رویدادها نباید صفر شود
     try:
         return json.loads(content)
     except:
@@ -2865,18 +3902,7 @@ def save_event_numbers(event_numbers: dict) -> bool:
         if not GH_TOKEN or not GIST_ID:
             print("⚠️ GH_TOKEN/GIST_ID not set; save_event_numbers skipped")
             return False
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        payload = {
-            "files": {
-                "event_numbers.json": {
-                    "content": json.dumps(event_numbers, ensure_ascii=False, indent=2)
-                }
-            }
-        }
-        res = requests.patch(url, headers=headers, json=payload, timeout=10)
-        if res.status_code not in (200, 201):
-            print("❌ save_event_numbers PATCH failed:", res.status_code, res.text)
+        if not gist_write({"event_numbers.json": json.dumps(event_numbers, ensure_ascii=False, indent=2)}):
             return False
 
         # ✅ کش را همزمان به‌روز کن
@@ -2893,14 +3919,10 @@ def load_mafia_roles() -> set[str]:
         if not GH_TOKEN or not GIST_ID:
             print("⚠️ GH_TOKEN/GIST_ID not set; load_mafia_roles -> empty set")
             return set()
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = requests.get(url, headers=headers, timeout=10)
-        if r.status_code != 200:
-            print("❌ load_mafia_roles failed:", r.status_code, r.text)
+        content = gist_read(MAFIA_FILENAME, "[]")
+        if content is None:
+            print("❌ load_mafia_roles failed")
             return set()
-        data = r.json()
-        content = data["files"].get(MAFIA_FILENAME, {}).get("content", "[]")
         arr = json.loads(content) if content else []
         # رشته‌های خالی رو حذف کن
         clean = [x.strip() for x in arr if isinstance(x, str) and x.strip()]
@@ -2914,20 +3936,7 @@ def save_mafia_roles(roles: set[str]) -> bool:
         if not GH_TOKEN or not GIST_ID:
             print("⚠️ GH_TOKEN/GIST_ID not set; save_mafia_roles skipped")
             return False
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        payload = {
-            "files": {
-                MAFIA_FILENAME: {
-                    "content": json.dumps(sorted(list(roles)), ensure_ascii=False, indent=2)
-                }
-            }
-        }
-        r = requests.patch(url, headers=headers, json=payload, timeout=10)
-        if r.status_code not in (200, 201):
-            print("❌ save_mafia_roles failed:", r.status_code, r.text)
-            return False
-        return True
+        return gist_write({MAFIA_FILENAME: json.dumps(sorted(list(roles)), ensure_ascii=False, indent=2)})
     except Exception as e:
         print("❌ save_mafia_roles error:", e)
         return False
@@ -2940,14 +3949,10 @@ def load_indep_roles() -> dict[str, list[str]]:
         if not GH_TOKEN or not GIST_ID:
             print("⚠️ GH_TOKEN/GIST_ID not set; load_indep_roles -> empty dict")
             return {}
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = requests.get(url, headers=headers, timeout=10)
-        if r.status_code != 200:
-            print("❌ load_indep_roles failed:", r.status_code, r.text)
+        content = gist_read(INDEP_FILENAME, "{}")
+        if content is None:
+            print("❌ load_indep_roles failed")
             return {}
-        data = r.json()
-        content = data["files"].get("indep_roles.json", {}).get("content", "{}")
         roles = json.loads(content) if content else {}
         return roles  # ← حالا خروجی مثل جیستت هست
     except Exception as e:
@@ -2959,40 +3964,94 @@ def save_indep_roles(indep: dict[str, list[str]]) -> bool:
     try:
         if not GH_TOKEN or not GIST_ID:
             return False
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        payload = {
-            "files": {
-                INDEP_FILENAME: {"content": json.dumps(indep, ensure_ascii=False, indent=2)}
-            }
-        }
-        r = requests.patch(url, headers=headers, json=payload, timeout=10)
-        return r.status_code == 200
+        return gist_write({INDEP_FILENAME: json.dumps(indep, ensure_ascii=False, indent=2)})
     except Exception as e:
         print("❌ save_indep_roles error:", e)
         return False
 
 
+# 🗂 رجیستریِ نقش‌ها: مجموعه‌های نرمالایزشده‌ی مافیا و مستقل (برای هر سناریو) در حافظه.
+#    تشخیصِ سایدِ یک صندلی دیگر نه گیست می‌خواند نه هر بار {_nz(x) ...} می‌سازد؛
+#    فقط وقتی از نو ساخته می‌شود که متنِ mafia.json / indep_roles.json در تصویرِ گیست
+#    عوض شود (ETagِ تازه یا نوشتنِ خودمان) یا invalidate_role_registry صدا زده شود.
+_ROLE_REG = {"src": None, "version": 0, "mafia": frozenset(), "indep": {}}
 
 
-def load_stickers():
-    url = f"https://api.github.com/gists/{GIST_ID}"
-    res = requests.get(url, headers={"Authorization": f"token {GH_TOKEN}"})
-    data = res.json()
-    content = data["files"]["stickers.json"]["content"]
+def _role_registry_build(mafia_raw, indep_raw):
     try:
-        return json.loads(content)
-    except:
-        return {}
+        arr = json.loads(mafia_raw) if mafia_raw else []
+    except Exception as e:
+        print("❌ role registry (mafia) parse error:", e)
+        arr = []
+    try:
+        indep = json.loads(indep_raw) if indep_raw else {}
+    except Exception as e:
+        print("❌ role registry (indep) parse error:", e)
+        indep = {}
+    mafia = frozenset(_nz(x) for x in arr if isinstance(x, str) and x.strip())
+    per_scn = {}
+    if isinstance(indep, dict):
+        for scn, roles in indep.items():
+            if isinstance(roles, list):
+                per_scn[scn] = frozenset(_nz(x) for x in roles if isinstance(x, str) and x.strip())
+    _ROLE_REG["mafia"] = mafia
+    _ROLE_REG["indep"] = per_scn
+    _ROLE_REG["src"] = (mafia_raw, indep_raw)
+    _ROLE_REG["version"] += 1
+
+
+def role_registry() -> dict:
+    """رجیستریِ نقش‌ها، هم‌گام با تصویرِ گیست. فقط اولین بار (تصویر خالی) به شبکه می‌رود."""
+    files = _GIST_SNAP["files"]
+    if files is None:
+        files = gist_files()
+        if files is None:
+            return _ROLE_REG
+    src = (files.get(MAFIA_FILENAME), files.get(INDEP_FILENAME))
+    if _ROLE_REG["src"] != src:
+        _role_registry_build(*src)
+    return _ROLE_REG
+
+
+async def arole_registry() -> dict:
+    if _GIST_SNAP["files"] is None:
+        await agist_files()
+    return role_registry()
+
+
+def invalidate_role_registry():
+    _ROLE_REG["src"] = None
+
+
+def mafia_role_norms() -> frozenset:
+    return role_registry()["mafia"]
+
+
+def indep_role_norms(scenario_name: str | None) -> frozenset:
+    if not scenario_name:
+        return frozenset()
+    return role_registry()["indep"].get(scenario_name, frozenset())
+
+
+def role_side(role: str, scenario_name: str | None) -> str:
+    """سایدِ یک نقش: «مافیا» / «مستقل» / «شهر»."""
+    r = _nz(role)
+    if r in mafia_role_norms():
+        return "مافیا"
+    if r in indep_role_norms(scenario_name):
+        return "مستقل"
+    return "شهر"
+
+
+def load_stickers():
+    content = gist_read("stickers.json")
+    try:
+        return json.loads(content) if content else {}
+    except:
+        return {}
 
 def save_stickers(stickers):
-    url = f"https://api.github.com/gists/{GIST_ID}"
-    files = {
-        "stickers.json": {
-            "content": json.dumps(stickers, ensure_ascii=False, indent=2)
-        }
-    }
-    requests.patch(url, headers={"Authorization": f"token {GH_TOKEN}"}, json={"files": files})
+    gist_write({"stickers.json": json.dumps(stickers, ensure_ascii=False, indent=2)})
 
 
 def text_seating_keyboard(g: GameState) -> InlineKeyboardMarkup:
@@ -3055,14 +4114,10 @@ def load_cards() -> dict[str, list[str]]:
         if not GH_TOKEN or not GIST_ID:
             print("⚠️ GH_TOKEN/GIST_ID not set; load_cards -> empty dict")
             return {}
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = requests.get(url, headers=headers, timeout=10)
-        if r.status_code != 200:
-            print("❌ load_cards failed:", r.status_code, r.text)
+        content = gist_read(CARDS_FILENAME, "{}")
+        if content is None:
+            print("❌ load_cards failed")
             return {}
-        data = r.json()
-        content = data["files"].get(CARDS_FILENAME, {}).get("content", "{}")
         return json.loads(content) if content else {}
     except Exception as e:
         print("❌ load_cards error:", e)
@@ -3073,17 +4128,7 @@ def save_cards(cards: dict[str, list[str]]) -> bool:
         if not GH_TOKEN or not GIST_ID:
             print("⚠️ GH_TOKEN/GIST_ID not set; save_cards skipped")
             return False
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        payload = {
-            "files": {
-                CARDS_FILENAME: {
-                    "content": json.dumps(cards, ensure_ascii=False, indent=2)
-                }
-            }
-        }
-        r = requests.patch(url, headers=headers, json=payload, timeout=10)
-        return r.status_code in (200, 201)
+        return gist_write({CARDS_FILENAME: json.dumps(cards, ensure_ascii=False, indent=2)})
     except Exception as e:
         print("❌ save_cards error:", e)
         return False
@@ -3185,7 +4230,7 @@ async def _delete_rerandom_prompt_after(ctx, chat_id: int, g: GameState, msg_id:
             pass
         g.awaiting_rerandom_decision = False
         g.rerandom_prompt_msg_id = None
-        store.save()
+        store.save(chat_id)
 
 def warn_button_markup_plusminus(g: GameState) -> InlineKeyboardMarkup:
     # از dict بودن مطمئن شو
@@ -3217,8 +4262,6 @@ def warn_button_markup_plusminus(g: GameState) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
-
-
 def kb_endgame_root(g: GameState) -> InlineKeyboardMarkup:
     # 🌀 کی‌آسِ خودکار: فقط دو گزینه — بات خودش می‌داند چه کسانی کی‌آس‌اند (زنده‌ها)
     if getattr(g, "chaos_auto", False):
@@ -3236,15 +4279,13 @@ def kb_endgame_root(g: GameState) -> InlineKeyboardMarkup:
         [InlineKeyboardButton("😈 مافیا (کی‌آس)", callback_data="winner_mafia_chaos")],
     ]
 
-    indep_roles = load_indep_roles()
-    if g.scenario and g.scenario.name in indep_roles and indep_roles[g.scenario.name]:
+    if g.scenario and indep_role_norms(g.scenario.name):
         rows.append([InlineKeyboardButton("♦️ مستقل", callback_data="winner_indep")])
 
     rows.append([InlineKeyboardButton("⬅️ بازگشت", callback_data="back_endgame")])
     return InlineKeyboardMarkup(rows)
 
 
-
 def kb_pick_defense(g: GameState) -> InlineKeyboardMarkup:
     rows = []
 
@@ -3330,7 +4371,7 @@ async def safe_q_answer(q, text=None, show_alert=False):
         pass
 async def set_hint_and_kb(ctx, chat_id: int, g: GameState, hint: str | None, kb: InlineKeyboardMarkup, mode: str = CTRL):
     g.ui_hint = hint
-    store.save()
+    store.save(chat_id)
     await publish_seating(ctx, chat_id, g, mode=mode, custom_kb=kb)
 
 EVENT_NUMBERS_CACHE = None
@@ -3338,7 +4379,10 @@ EVENT_NUMBERS_CACHE = None
 def get_event_numbers():
     global EVENT_NUMBERS_CACHE
     if EVENT_NUMBERS_CACHE is None:
-        EVENT_NUMBERS_CACHE = load_event_numbers() or {}
+        nums = load_event_numbers()
+        if nums is None:
+            return {}     # خواندن نشد — کش نکن تا دفعهٔ بعد دوباره امتحان شود
+        EVENT_NUMBERS_CACHE = nums or {}
     return EVENT_NUMBERS_CACHE
 
 
@@ -3355,29 +4399,37 @@ def get_chat_lock(chat_id: int) -> asyncio.Lock:
     return lock
 
 
-_SAVE_TASK: asyncio.Task | None = None
-def save_debounced():
-    global _SAVE_TASK
-    if _SAVE_TASK and not _SAVE_TASK.done():
-        return
-    async def _do():
-        await asyncio.sleep(SAVE_DEBOUNCE_SEC)
-        try:
-            store.save()
-        except Exception as e:
-            print("save_debounced error:", e)
-    _SAVE_TASK = asyncio.create_task(_do())
-
 # Retry wrapper for Telegram rate limits
 async def _retry(coro):
-    try:
-        return await coro
-    except RetryAfter as e:
-        await asyncio.sleep(float(getattr(e, "retry_after", 1.0)) + 0.1)
-        return await coro
+    # ⏳ RetryAfter را خودِ OutboundLimiter (صفِ خروجی) برای همه صبر و تکرار می‌کند
+    return await coro
 
 
 # ─────── تابع اصلاح‌ شده ───────────────────────────────────
+# 🪞 آخرین رندرِ لیست در هر چت: آیدیِ پیام + هشِ متن + هشِ کیبورد (فقط در حافظه).
+#    هر جا کیبوردِ پیامِ لیست را مستقیم عوض کند، باید _seating_render_forget را صدا بزند.
+_SEATING_RENDER: dict[int, dict] = {}
+
+
+def _render_digest(obj) -> bytes:
+    if not isinstance(obj, str):
+        obj = json.dumps(obj, ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(obj.encode("utf-8"), digest_size=16).digest()
+
+
+def _seating_render_forget(chat_id):
+    seen = _SEATING_RENDER.get(chat_id)
+    if seen:
+        seen["kb"] = None
+
+
+# 🧺 جمع‌کننده‌ی رندرِ لیست: publish_seating فقط «لیست کثیف است، با این mode» را ثبت
+#    می‌کند. یک تسکِ تک برای هر چت بعد از DEBOUNCE_EDIT_SEC آخرین وضعیت را یک‌بار رندر
+#    می‌کند — پنج خط‌زدنِ پشتِ سرِ هم = یک ویرایش. قفلِ چت فقط دورِ خودِ رندر گرفته می‌شود.
+_SEATING_PENDING: dict[int, dict] = {}    # chat_id → آخرین درخواستِ رندرنشده
+_SEATING_RUNNERS: dict[int, asyncio.Task] = {}
+
+
 async def publish_seating(
     ctx,
     chat_id: int,
@@ -3385,159 +4437,235 @@ async def publish_seating(
     mode: str = REG,
     custom_kb: InlineKeyboardMarkup | None = None,
 ):
-    lock = get_chat_lock(chat_id)
-    async with lock:
-        await asyncio.sleep(DEBOUNCE_EDIT_SEC)
+    req = _SEATING_PENDING.get(chat_id)
+    if req is None:
+        req = {"fut": asyncio.get_running_loop().create_future(), "roles": False}
+        _SEATING_PENDING[chat_id] = req
+    # آخرین درخواست برنده است؛ فقط «لیستِ نقش‌ها هم لازم است» جمع می‌شود
+    req.update(ctx=ctx, g=g, mode=mode, custom_kb=custom_kb)
+    req["roles"] = req["roles"] or mode == REG
+    runner = _SEATING_RUNNERS.get(chat_id)
+    if runner is None or runner.done():
+        _SEATING_RUNNERS[chat_id] = asyncio.create_task(_seating_runner(chat_id))
+    await asyncio.shield(req["fut"])
+
+
+async def _seating_runner(chat_id: int):
+    try:
+        while chat_id in _SEATING_PENDING:
+            await asyncio.sleep(DEBOUNCE_EDIT_SEC)     # پنجره‌ی جمع‌کردن — بدونِ قفل
+            req = _SEATING_PENDING.pop(chat_id, None)
+            if req is None:
+                break
+            fut = req["fut"]
+            try:
+                async with get_chat_lock(chat_id):
+                    await _render_seating(req["ctx"], chat_id, req["g"], req["mode"],
+                                          req["custom_kb"], req["roles"])
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+                    fut.exception()      # صدازننده‌ای که لغو شده، هشدارِ «بازیابی‌نشده» نسازد
+            else:
+                if not fut.done():
+                    fut.set_result(None)
+    finally:
+        if _SEATING_RUNNERS.get(chat_id) is asyncio.current_task():
+            del _SEATING_RUNNERS[chat_id]
+
+
+# 🧩 خطِ رندرشده‌ی هر صندلی، با کلیدِ (uid، اسم، مدال، اخطار، وضعیت) — فقط در حافظه
+_SEAT_FRAGS: dict[int, dict[int, tuple]] = {}
+_TODAY_JALALI = {"day": None, "text": ""}
+
+
+def _today_jalali() -> str:
+    d = datetime.now().date()
+    if _TODAY_JALALI["day"] != d:
+        _TODAY_JALALI["day"] = d
+        _TODAY_JALALI["text"] = jdatetime.date.fromgregorian(date=d).strftime("%Y/%m/%d")
+    return _TODAY_JALALI["text"]
+
+
+def _seat_line(i: int, key: tuple) -> str:
+    if key[0] is None:
+        # صندلی خالی
+        return f"⬜{i} /{i}" if key[1] else f"♚{i} ⬜ /{i}"
+    uid, name, medal, wn, state = key
+    # 🎖 نشانِ مدال (اگر دارد) بلافاصله بعد از اسم
+    name_link = f"<a href='tg://user?id={uid}'>{escape(name, quote=False)}</a>{medal}"
+    warn_suffix = (" " + ("❗️" * wn)) if wn > 0 else ""
+    if state == "pre":
+        # قبل از بازی: حالت اصلی با تاج
+        return f"♚{i}  {name_link}{warn_suffix}"
+    if state in ("dead", "kick"):
+        # مرده: دایرهٔ قرمز، خط روی شماره و اسم، فونت عادی (+ نشانِ کیک)
+        _kick_mark = " ✖️کیک" if state == "kick" else ""
+        return f"🔴<s>{i}  {name_link}</s>{_kick_mark}{warn_suffix}"
+    # زنده: دایرهٔ سبز، فونت بولد
+    return f"🟢<b>{i}  {name_link}</b>{warn_suffix}"
+
+
+async def _render_seating(ctx, chat_id: int, g: GameState, mode: str,
+                          custom_kb: InlineKeyboardMarkup | None, with_roles: bool):
+    if not g.max_seats or g.max_seats <= 0:
+        await _retry(ctx.bot.send_message(chat_id, "برای شروع، ادمین باید /newgame <seats> بزند."))
+        return
 
-        if not g.max_seats or g.max_seats <= 0:
-            await _retry(ctx.bot.send_message(chat_id, "برای شروع، ادمین باید /newgame <seats> بزند."))
-            return
+    # 🎖 کشِ مدال‌ها (حداکثر هر نیم ساعت یک‌بار از گیست خوانده می‌شود — در ترد جدا)
+    try:
+        await asyncio.to_thread(ensure_medal_cache)
+    except Exception:
+        pass
 
-        # 🎖 کشِ مدال‌ها (حداکثر هر نیم ساعت یک‌بار از گیست خوانده می‌شود — در ترد جدا)
+    today = _today_jalali()
+
+    # آیدی/لینک گروه
+    group_id_or_link = f"🆔 {chat_id}"
+    if ctx.bot.username and chat_id < 0:
         try:
-            await asyncio.to_thread(ensure_medal_cache)
+            meta = await chat_meta(ctx.bot, chat_id)
+            username = meta.username if meta else None
+            title = meta.title if meta else None
+
+            if username:
+                group_id_or_link = f"🔗 <a href='https://t.me/{username}'>{title}</a>"
+            elif title:
+                group_id_or_link = f"🔒 {title}"
         except Exception:
             pass
 
-        today = jdatetime.date.today().strftime("%Y/%m/%d")
-        emoji_numbers = [
-            "⓿", "➊", "➋", "➌", "➍", "➎", "➏", "➐", "➑", "➒",
-            "➓", "⓫", "⓬", "⓭", "⓮", "⓯", "⓰", "⓱", "⓲", "⓳", "⓴"
-        ]
-
-        # آیدی/لینک گروه
-        if not hasattr(g, "_chat_cache"):
-            g._chat_cache = {}
-        group_id_or_link = f"🆔 {chat_id}"
-        if ctx.bot.username and chat_id < 0:
-            try:
-                if "username" in g._chat_cache and "title" in g._chat_cache:
-                    username = g._chat_cache["username"]
-                    title = g._chat_cache["title"]
-                else:
-                    chat_obj = await _retry(ctx.bot.get_chat(chat_id))
-                    username = getattr(chat_obj, "username", None)
-                    title = getattr(chat_obj, "title", None)
-                    g._chat_cache["username"] = username
-                    g._chat_cache["title"] = title
-
-                if username:
-                    group_id_or_link = f"🔗 <a href='https://t.me/{username}'>{title}</a>"
-                elif title:
-                    group_id_or_link = f"🔒 {title}"
-            except Exception:
-                pass
-
-        # متن اصلی
-        # تاج ♚ فقط قبل از شروع بازی (مرحلهٔ ثبت‌نام) نمایش داده می‌شود
-        game_started = g.phase != "idle"
-        cr = "" if game_started else "♚"
-        event_num = int(get_event_numbers().get(str(chat_id), 1))
-
-        lines = [
-            f"{group_id_or_link}",
-            f"{cr}🎯 <b>شماره رویداد:</b> {event_num}",
-            f"{cr}🎭 <b>{escape(g.event_title, quote=False) if g.event_title else 'رویداد مافیا'}</b>",
-            f"{cr}📆 <b>تاریخ:</b> {today}",
-            f"{cr}🕰 <b>زمان:</b> {g.event_time or '---'}",
-            f"{cr}🎩 <b>راوی:</b> <a href='tg://user?id={g.god_id}'>{g.god_name or '❓'}</a>"
-            f"{medal_tag(g.god_id)}",
-        ]
+    # متن اصلی
+    # تاج ♚ فقط قبل از شروع بازی (مرحلهٔ ثبت‌نام) نمایش داده می‌شود
+    game_started = g.phase != "idle"
+    cr = "" if game_started else "♚"
+    event_num = int(get_event_numbers().get(str(chat_id), 1))
 
-        if g.scenario:
-            lines.append(f"{cr}📜 <b>سناریو:</b> {g.scenario.name} | 👥 {sum(g.scenario.roles.values())} نفر")
+    lines = [
+        f"{group_id_or_link}",
+        f"{cr}🎯 <b>شماره رویداد:</b> {event_num}",
+        f"{cr}🎭 <b>{escape(g.event_title, quote=False) if g.event_title else 'رویداد مافیا'}</b>",
+        f"{cr}📆 <b>تاریخ:</b> {today}",
+        f"{cr}🕰 <b>زمان:</b> {g.event_time or '---'}",
+        f"{cr}🎩 <b>راوی:</b> <a href='tg://user?id={g.god_id}'>{g.god_name or '❓'}</a>"
+        f"{medal_tag(g.god_id)}",
+    ]
 
-        lines.append(f"\n\n{cr}📂 <b>بازیکنان:</b>\n")
+    if g.scenario:
+        lines.append(f"{cr}📜 <b>سناریو:</b> {g.scenario.name} | 👥 {sum(g.scenario.roles.values())} نفر")
 
-        # لیست صندلی‌ها
-        for i in range(1, g.max_seats + 1):
-            emoji_num = emoji_numbers[i] if i < len(emoji_numbers) else str(i)
-            if i in g.seats:
-                uid, name = g.seats[i]
-                safe_name = escape(name, quote=False)
-                # 🎖 نشانِ مدال (اگر دارد) بلافاصله بعد از اسم
-                name_link = (f"<a href='tg://user?id={uid}'>{safe_name}</a>"
-                             f"{medal_tag(uid)}")
+    lines.append(f"\n\n{cr}📂 <b>بازیکنان:</b>\n")
 
+    # لیست صندلی‌ها — هر خط فقط وقتی از نو ساخته می‌شود که کلیدش عوض شده باشد
+    frags = _SEAT_FRAGS.setdefault(chat_id, {})
+    warns = g.warnings if isinstance(getattr(g, "warnings", None), dict) else {}
+    kicked = getattr(g, "score_kicked", set()) or set()
+    for i in range(1, g.max_seats + 1):
+        if i in g.seats:
+            uid, name = g.seats[i]
+            try:
+                wn = max(0, int(warns.get(i, 0)))
+            except Exception:
                 wn = 0
-                if isinstance(getattr(g, "warnings", None), dict):
-                    wn = g.warnings.get(i, 0)
-                try:
-                    wn = int(wn)
-                except Exception:
-                    wn = 0
-                wn = max(0, wn)
-                warn_suffix = (" " + ("❗️" * wn)) if wn > 0 else ""
-
-                if not game_started:
-                    # قبل از بازی: حالت اصلی با تاج
-                    line = f"♚{i}  {name_link}{warn_suffix}"
-                elif i in g.striked:
-                    # مرده: دایرهٔ قرمز، خط روی شماره و اسم، فونت عادی (+ نشانِ کیک)
-                    _kick_mark = " ✖️کیک" if i in (getattr(g, "score_kicked", set()) or set()) else ""
-                    line = f"🔴<s>{i}  {name_link}</s>{_kick_mark}{warn_suffix}"
-                else:
-                    # زنده: دایرهٔ سبز، فونت بولد
-                    line = f"🟢<b>{i}  {name_link}</b>{warn_suffix}"
+            if not game_started:
+                state = "pre"
+            elif i in g.striked:
+                state = "kick" if i in kicked else "dead"
             else:
-                # صندلی خالی
-                line = f"⬜{i} /{i}" if game_started else f"♚{i} ⬜ /{i}"
-            lines.append(line)
+                state = "alive"
+            key = (uid, name, medal_tag(uid), wn, state)
+        else:
+            key = (None, game_started)
+        hit = frags.get(i)
+        if hit is None or hit[0] != key:
+            hit = frags[i] = (key, _seat_line(i, key))
+        lines.append(hit[1])
+    for i in [k for k in frags if k > g.max_seats]:
+        del frags[i]
+
+    # استعلام وضعیت
+    if g.status_counts.get("citizen", 0) > 0 or g.status_counts.get("mafia", 0) > 0:
+        c = g.status_counts.get("citizen", 0)
+        m = g.status_counts.get("mafia", 0)
+        lines.append(f"\n🧾 <i>استعلام وضعیت: {c} شهروند و {m} مافیا</i>")
+
+    if getattr(g, "ui_hint", None):
+        lines.append("")
+        lines.append(f"ℹ️ <i>{g.ui_hint}</i>")
 
-        # استعلام وضعیت
-        if g.status_counts.get("citizen", 0) > 0 or g.status_counts.get("mafia", 0) > 0:
-            c = g.status_counts.get("citizen", 0)
-            m = g.status_counts.get("mafia", 0)
-            lines.append(f"\n🧾 <i>استعلام وضعیت: {c} شهروند و {m} مافیا</i>")
+    text = "\n".join(lines)
 
-        if getattr(g, "ui_hint", None):
-            lines.append("")
-            lines.append(f"ℹ️ <i>{g.ui_hint}</i>")
+    # انتخاب کیبورد
+    if custom_kb is not None:
+        kb = custom_kb
+    else:
+        if mode == REG:
+            kb = text_seating_keyboard(g)
+        elif mode == "strike":
+            kb = strike_button_markup(g)
+        elif mode == "kick":
+            kb = kick_button_markup(g)
+        elif mode == "status":
+            kb = status_button_markup(g)
+        elif mode == "delete":
+            kb = delete_button_markup(g)
+        elif mode == "warn":
+            kb = warn_button_markup_plusminus(g)
+        else:
+            kb = control_keyboard(g)
 
-        text = "\n".join(lines)
+    # 🪞 هشِ رندر: اگر نه متن عوض شده نه کیبورد، اصلاً سراغِ تلگرام نمی‌رویم
+    kb_dict = kb.to_dict()
+    text_h, kb_h = _render_digest(text), _render_digest(kb_dict)
+    seen = _SEATING_RENDER.get(chat_id)
+    same_msg = bool(seen and g.last_seating_msg_id and seen["mid"] == g.last_seating_msg_id)
+    same_text = same_msg and seen["text"] == text_h
+    same_kb = same_msg and seen["kb"] == kb_h
 
-        # انتخاب کیبورد
-        if custom_kb is not None:
-            kb = custom_kb
-        else:
-            if mode == REG:
-                kb = text_seating_keyboard(g)
-            elif mode == "strike":
-                kb = strike_button_markup(g)
-            elif mode == "kick":
-                kb = kick_button_markup(g)
-            elif mode == "status":
-                kb = status_button_markup(g)
-            elif mode == "delete":
-                kb = delete_button_markup(g)
-            elif mode == "warn":
-                kb = warn_button_markup_plusminus(g)
-            else:
-                kb = control_keyboard(g)
+    def _remember():
+        _SEATING_RENDER[chat_id] = {"mid": g.last_seating_msg_id, "text": text_h, "kb": kb_h}
 
-        # --- ذخیره اسنپ‌شات آخرین لیست برای بازیابی با /lists ---
+    # --- ذخیره اسنپ‌شات آخرین لیست برای بازیابی با /lists ---
+    snap = getattr(g, "last_snapshot", None)
+    if not (isinstance(snap, dict) and snap.get("text") == text and snap.get("kb") == kb_dict):
         try:
             g.last_snapshot = {
                 "text": text,
-                "kb": kb.to_dict(),  # کیبورد رو به dict ذخیره می‌کنیم
+                "kb": kb_dict,  # کیبورد رو به dict ذخیره می‌کنیم
             }
-            store.save()
+            store.save(chat_id)
         except Exception as e:
             print("⚠️ snapshot save error:", e)
-        # پیام لیست
-        try:
-            if g.last_seating_msg_id:
-                try:
-                    await _retry(ctx.bot.edit_message_text(
-                        chat_id=chat_id,
-                        message_id=g.last_seating_msg_id,
-                        text=text,
-                        parse_mode="HTML",
-                        reply_markup=kb,
-                    ))
-                except BadRequest as e:
-                    s = str(e)
-                    if "message is not modified" in s:
+    # پیام لیست
+    try:
+        if g.last_seating_msg_id and same_text and same_kb:
+            pass  # همان رندرِ قبلی
+        elif g.last_seating_msg_id and same_text:
+            # فقط کیبورد عوض شده → یک درخواستِ سبک‌تر
+            try:
+                await _retry(ctx.bot.edit_message_reply_markup(
+                    chat_id=chat_id,
+                    message_id=g.last_seating_msg_id,
+                    reply_markup=kb
+                ))
+            except BadRequest as e:
+                if "message is not modified" not in str(e):
+                    raise
+            _remember()
+        elif g.last_seating_msg_id:
+            try:
+                await _retry(ctx.bot.edit_message_text(
+                    chat_id=chat_id,
+                    message_id=g.last_seating_msg_id,
+                    text=text,
+                    parse_mode="HTML",
+                    reply_markup=kb,
+                ))
+            except BadRequest as e:
+                s = str(e)
+                if "message is not modified" in s:
+                    if not same_msg:
+                        # حافظه‌ای از کیبوردِ فعلی نداریم (مثلاً بعد از ری‌استارت)
                         try:
                             await _retry(ctx.bot.edit_message_reply_markup(
                                 chat_id=chat_id,
@@ -3549,52 +4677,10 @@ async def publish_seating(
                                 pass
                             else:
                                 raise
-                    else:
-                        raise
-            else:
-                msg = await _retry(ctx.bot.send_message(
-                    chat_id,
-                    text,
-                    parse_mode="HTML",
-                    reply_markup=kb
-                ))
-                g.last_seating_msg_id = msg.message_id
-                if chat_id < 0:
-                    try:
-                        await _retry(ctx.bot.pin_chat_message(
-                            chat_id,
-                            msg.message_id,
-                            disable_notification=True
-                        ))
-                    except Exception:
-                        pass
-        except (TimedOut, RetryAfter):
-            pass  # خطای گذرا – پیام جدید نفرست
-        except telegram.error.BadRequest as e:
-            if "not modified" in str(e).lower():
-                pass  # محتوا تغییری نکرده (مثلاً شبِ بدون کشته) – پیام جدید نفرست
-            else:
-                old_msg_id = g.last_seating_msg_id
-                msg = await _retry(ctx.bot.send_message(
-                    chat_id,
-                    text,
-                    parse_mode="HTML",
-                    reply_markup=kb
-                ))
-                g.last_seating_msg_id = msg.message_id
-                if chat_id < 0:
-                    try:
-                        await _retry(ctx.bot.pin_chat_message(
-                            chat_id, msg.message_id, disable_notification=True))
-                    except Exception:
-                        pass
-                if old_msg_id:
-                    try:
-                        await ctx.bot.delete_message(chat_id, old_msg_id)
-                    except Exception:
-                        pass
-        except Exception:
-            old_msg_id = g.last_seating_msg_id
+                else:
+                    raise
+            _remember()
+        else:
             msg = await _retry(ctx.bot.send_message(
                 chat_id,
                 text,
@@ -3602,7 +4688,7 @@ async def publish_seating(
                 reply_markup=kb
             ))
             g.last_seating_msg_id = msg.message_id
-
+            _remember()
             if chat_id < 0:
                 try:
                     await _retry(ctx.bot.pin_chat_message(
@@ -3612,72 +4698,118 @@ async def publish_seating(
                     ))
                 except Exception:
                     pass
-
+    except (TimedOut, RetryAfter):
+        pass  # خطای گذرا – پیام جدید نفرست
+    except telegram.error.BadRequest as e:
+        if "not modified" in str(e).lower():
+            pass  # محتوا تغییری نکرده (مثلاً شبِ بدون کشته) – پیام جدید نفرست
+        else:
+            old_msg_id = g.last_seating_msg_id
+            msg = await _retry(ctx.bot.send_message(
+                chat_id,
+                text,
+                parse_mode="HTML",
+                reply_markup=kb
+            ))
+            g.last_seating_msg_id = msg.message_id
+            _remember()
+            if chat_id < 0:
+                try:
+                    await _retry(ctx.bot.pin_chat_message(
+                        chat_id, msg.message_id, disable_notification=True))
+                except Exception:
+                    pass
             if old_msg_id:
                 try:
                     await ctx.bot.delete_message(chat_id, old_msg_id)
                 except Exception:
                     pass
+    except Exception:
+        old_msg_id = g.last_seating_msg_id
+        msg = await _retry(ctx.bot.send_message(
+            chat_id,
+            text,
+            parse_mode="HTML",
+            reply_markup=kb
+        ))
+        g.last_seating_msg_id = msg.message_id
+        _remember()
+
+        if chat_id < 0:
+            try:
+                await _retry(ctx.bot.pin_chat_message(
+                    chat_id,
+                    msg.message_id,
+                    disable_notification=True
+                ))
+            except Exception:
+                pass
+
+        if old_msg_id:
+            try:
+                await ctx.bot.delete_message(chat_id, old_msg_id)
+            except Exception:
+                pass
 
   
-        # لیست نقش‌ها
-        if g.scenario and mode == REG:
-            if getattr(g, "last_roles_scenario_name", None) != g.scenario.name:
-                mafia_roles = {_nz(x) for x in load_mafia_roles()}
-                indep_roles = load_indep_roles()
-                indep_for_this = {_nz(x) for x in indep_roles.get(g.scenario.name, [])}
-                mafia_lines = ["<b>نقش‌های مافیا:</b>"]
-                citizen_lines = ["<b>نقش‌های شهروند:</b>"]
-                indep_lines = ["<b>نقش‌های مستقل:</b>"]
-
-                for role, count in g.scenario.roles.items():
-                    for _ in range(count):
-                        if _nz(role) in mafia_roles:
-                            mafia_lines.append(f"♠️ {role}")
-                        elif _nz(role) in indep_for_this:
-                            indep_lines.append(f"♦️ {role}")
-                        else:
-                            citizen_lines.append(f"♥️ {role}")
+    # لیست نقش‌ها
+    if g.scenario and with_roles:
+        if getattr(g, "last_roles_scenario_name", None) != g.scenario.name:
+            await arole_registry()
+            mafia_roles = mafia_role_norms()
+            indep_for_this = indep_role_norms(g.scenario.name)
+            mafia_lines = ["<b>نقش‌های مافیا:</b>"]
+            citizen_lines = ["<b>نقش‌های شهروند:</b>"]
+            indep_lines = ["<b>نقش‌های مستقل:</b>"]
+
+            for role, count in g.scenario.roles.items():
+                for _ in range(count):
+                    if _nz(role) in mafia_roles:
+                        mafia_lines.append(f"♠️ {role}")
+                    elif _nz(role) in indep_for_this:
+                        indep_lines.append(f"♦️ {role}")
+                    else:
+                        citizen_lines.append(f"♥️ {role}")
 
-                role_lines = ["📜 <b>لیست نقش‌های سناریو:</b>\n"]
-                role_lines.extend(mafia_lines)
+            role_lines = ["📜 <b>لیست نقش‌های سناریو:</b>\n"]
+            role_lines.extend(mafia_lines)
+            role_lines.append("")
+            role_lines.extend(citizen_lines)
+            if len(indep_lines) > 1:  # یعنی حداقل یک نقش مستقل هست
                 role_lines.append("")
-                role_lines.extend(citizen_lines)
-                if len(indep_lines) > 1:  # یعنی حداقل یک نقش مستقل هست
-                    role_lines.append("")
-                    role_lines.extend(indep_lines)
+                role_lines.extend(indep_lines)
 
-                role_text = "\n".join(role_lines)
+            role_text = "\n".join(role_lines)
 
-                try:
-                    if getattr(g, "last_roles_msg_id", None):
-                        try:
-                            await _retry(ctx.bot.edit_message_text(
-                                chat_id=chat_id,
-                                message_id=g.last_roles_msg_id,
-                                text=role_text,
-                                parse_mode="HTML",
-                            ))
-                        except BadRequest as e:
-                            if "message is not modified" in str(e):
-                                pass
-                            else:
-                                raise
-                    else:
-                        role_msg = await _retry(
-                            ctx.bot.send_message(chat_id, role_text, parse_mode="HTML")
-                        )
-                        g.last_roles_msg_id = role_msg.message_id
-                except Exception:
+            try:
+                if getattr(g, "last_roles_msg_id", None):
+                    try:
+                        await _retry(ctx.bot.edit_message_text(
+                            chat_id=chat_id,
+                            message_id=g.last_roles_msg_id,
+                            text=role_text,
+                            parse_mode="HTML",
+                        ))
+                    except BadRequest as e:
+                        if "message is not modified" in str(e):
+                            pass
+                        else:
+                            raise
+                else:
                     role_msg = await _retry(
                         ctx.bot.send_message(chat_id, role_text, parse_mode="HTML")
                     )
                     g.last_roles_msg_id = role_msg.message_id
+            except Exception:
+                role_msg = await _retry(
+                    ctx.bot.send_message(chat_id, role_text, parse_mode="HTML")
+                )
+                g.last_roles_msg_id = role_msg.message_id
 
-                g.last_roles_scenario_name = g.scenario.name
+            g.last_roles_scenario_name = g.scenario.name
 
 
-        save_debounced()
+    store.save(chat_id)
 
 
 # ─────────────────────────────────────────────────────────────
@@ -3745,7 +4877,7 @@ def _try_capture_vote(g, msg, uid, text) -> bool:
                 g.vote_logs = {}
             g.vote_logs.setdefault(win_target, [])
             g.vote_logs[win_target].append((uid, msg_ts - start))
-            store.save()
+            store.save(_game_chat_id(g))
         if not hasattr(g, "vote_cleanup_ids"):
             g.vote_cleanup_ids = []
         g.vote_cleanup_ids.append(msg.message_id)
@@ -3776,7 +4908,7 @@ def _bump_defense_history(g, seats):
         if s in (getattr(g, "seats", {}) or {}):
             hist[s] = hist.get(s, 0) + 1
     g.defense_history = hist
-    store.save()
+    store.save(_game_chat_id(g))
 
 
 SPEAK_ANCHOR_D3 = 6      # 🗣 روز ۳ از صندلی ۶ به سمتِ ۱ (نزولی)
@@ -3891,7 +5023,7 @@ async def _offer_auto_defense(ctx, chat_id, g, counts=None):
         return
 
     g.pending_defense = list(qualified)
-    store.save()
+    store.save(chat_id)
     lines.append("")
     lines.append("تأیید می‌کنید؟ (با «بله» رأی‌گیری نهایی برای همین افراد ساخته می‌شود)")
     kb = InlineKeyboardMarkup([[
@@ -3940,7 +5072,7 @@ def _score_votes_initial(g):
                 elif tside == "شهر":
                     _sc_add(g, vs, "tash", -2.5, "رأی اولیه به شهروند")
         g.score_day_initial = True
-        store.save()
+        store.save(_game_chat_id(g))
     except Exception as e:
         print("⚠️ score initial err:", e)
 
@@ -3985,7 +5117,7 @@ def _score_votes_final(g, targets, exit_seat, exited):
                 else:
                     _sc_add(g, t, "farib1", -10, "حضور در دفاع")
         g.score_day_final = True
-        store.save()
+        store.save(_game_chat_id(g))
     except Exception as e:
         print("⚠️ score final err:", e)
 
@@ -3995,7 +5127,7 @@ def _score_day_rollover(g):
     try:
         g.score_day_initial = False
         g.score_day_final = False
-        store.save()
+        store.save(_game_chat_id(g))
     except Exception as e:
         print("⚠️ score rollover err:", e)
 
@@ -4140,7 +5272,7 @@ def _score_night_acts(g, dead, reasons):
                         _sc_add(g, ml, "act", 15, f"مینِ موفق ({s})")
                     else:
                         _sc_add(g, ml, "act", -5, f"مین روی مافیا ({s})")
-        store.save()
+        store.save(_game_chat_id(g))
     except Exception as e:
         print("⚠️ score night acts err:", e)
 
@@ -4169,7 +5301,7 @@ async def _d1_guess_finish(ctx, g, timeout=False):
     pts = 15 * len(correct)
     if pts and seat in g.seats:
         _sc_add(g, seat, "guess", pts, f"{len(correct)} حدسِ درستِ مافیا")
-    store.save()
+    store.save(_game_chat_id(g))
     try:
         txt = "⏱ وقت تمام شد — " if timeout else ""
         await ctx.bot.send_message(g.seats[seat][0],
@@ -4190,7 +5322,7 @@ async def _d1_guess_start(ctx, g, seat):
     g.d1_guess_seat = seat
     g.d1_guess_picks = []
     g.d1_guess_done = False
-    store.save()
+    store.save(_game_chat_id(g))
     m = await _safe_pm(ctx, g.seats[seat][0],
                        "🎯 تو شهروندِ خروجیِ روزِ اولی!\n"
                        "۳ نفر را که فکر می‌کنی تیمِ مافیا هستند انتخاب کن.\n"
@@ -4198,7 +5330,7 @@ async def _d1_guess_start(ctx, g, seat):
                        _d1_guess_kb(g))
     if not m:
         g.d1_guess_done = True
-        store.save()
+        store.save(_game_chat_id(g))
         await _night_report(ctx, g, f"🎯 پیویِ شهروندِ خروجی ({seat}) بسته بود — حدسِ مافیا انجام نشد.")
         return
     await _night_report(ctx, g, f"🎯 حدسِ ۳ مافیا برای شهروندِ خروجی ({seat}) فرستاده شد — ⏱ ۲:۳۰")
@@ -4213,12 +5345,13 @@ async def _d1_guess_start(ctx, g, seat):
     asyncio.create_task(_d1_timer())
 
 
+@callback_route("d1g_")
 async def handle_d1_guess_callback(update, ctx):
     q = update.callback_query
     data = q.data
     uid = q.from_user.id
     g = None
-    for cid, game in store.games.items():
+    for cid, game in store.index.games_of(uid):
         ds = getattr(game, "d1_guess_seat", None)
         if (ds is not None and not getattr(game, "d1_guess_done", False)
                 and ds in game.seats and game.seats[ds][0] == uid):
@@ -4250,7 +5383,7 @@ async def handle_d1_guess_callback(update, ctx):
         return
     await safe_q_answer(q)
     g.d1_guess_picks = picks
-    store.save()
+    store.save(_game_chat_id(g))
     await _edit_pm(ctx, uid, mid,
                    "🎯 ۳ نفر را که فکر می‌کنی تیمِ مافیا هستند انتخاب کن:", _d1_guess_kb(g))
 # ═══════════════ پایانِ موتورِ امتیازدهی ═══════════════
@@ -4289,7 +5422,7 @@ async def _finalize_final_vote(ctx, chat_id, g):
             and isinstance(g.nem_ding, tuple) and g.nem_ding[1] != 0):
         idx, sign = g.nem_ding
         g.nem_ding_used = True
-        store.save()
+        store.save(chat_id)
         if g.night_number != 0:
             # ⏳ فقط روزِ ۱ اعتبار دارد — روزهای بعد بی‌صدا منقضی (فقط گاد می‌فهمد)
             await _night_report(ctx, g, "🗡 دنگ خیانت فقط برای روزِ ۱ بود — منقضی شد.")
@@ -4359,12 +5492,12 @@ async def _finalize_final_vote(ctx, chat_id, g):
             g.tk_shield_lost = True
         else:
             g.zereh_fallen = True
-        store.save()
+        store.save(chat_id)
         await _night_report(ctx, g,
                             f"🛡 {exiter}. {nm} با رأی خارج نشد — زره/شیلدش از همین حالا افتاد (فقط تو می‌دانی).")
     if not protected:
         g.striked.add(exiter)
-        store.save()
+        store.save(chat_id)
         try:
             await publish_seating(ctx, chat_id, g, mode=CTRL)
         except Exception:
@@ -4437,7 +5570,8 @@ async def start_vote(ctx, chat_id: int, g: GameState, stage: str):
     btns.append([InlineKeyboardButton("⬅️ بازگشت", callback_data=back_code)])
 
     title = "🗳 رأی‌گیری اولیه – انتخاب هدف:" if stage == "initial_vote" else "🗳 رأی‌گیری نهایی – انتخاب حذف:"
-    msg = await ctx.bot.send_message(chat_id, title, reply_markup=InlineKeyboardMarkup(btns))
+    msg = await ctx.bot.send_message(chat_id, title, reply_markup=InlineKeyboardMarkup(btns),
+                                     rate_limit_args=OUT_HIGH)
 
     g.vote_msg_id = msg.message_id
 
@@ -4448,7 +5582,7 @@ async def start_vote(ctx, chat_id: int, g: GameState, stage: str):
         g.first_vote_msg_id_final = msg.message_id
         g.last_vote_msg_id_final = msg.message_id
 
-    store.save()
+    store.save(chat_id)
 
 
 async def _finish_initial_vote(ctx, chat_id, g):
@@ -4464,7 +5598,7 @@ async def _finish_initial_vote(ctx, chat_id, g):
     g.vote_prev_bounds = None
     g.vote_has_ended_initial = True
     g.vote_order = []
-    store.save()
+    store.save(chat_id)
 
 
 async def _finish_final_vote(ctx, chat_id, g):
@@ -4479,7 +5613,7 @@ async def _finish_final_vote(ctx, chat_id, g):
     g.vote_prev_bounds = None
     g.vote_has_ended_final = True
     g.vote_order = []
-    store.save()
+    store.save(chat_id)
 
 
 AUTO_VOTE_GAP = 3         # ⏳ مکثِ ساکت بینِ دو نفر در رأی‌گیریِ اتومات
@@ -4512,7 +5646,7 @@ async def _run_auto_vote(ctx, chat_id, g, stage):
         return
 
     g.auto_vote_running = True
-    store.save()
+    store.save(chat_id)
     panel_mid = None
     stopped = False
     try:
@@ -4544,7 +5678,7 @@ async def _run_auto_vote(ctx, chat_id, g, stage):
             await handle_vote(ctx, chat_id, g, s, refresh_buttons=False)
     finally:
         g.auto_vote_running = False
-        store.save()
+        store.save(chat_id)
         # 🧹 پیامِ «شروع شد» با دکمهٔ توقف دیگر لازم نیست
         if panel_mid:
             try:
@@ -4599,7 +5733,8 @@ async def update_vote_buttons(ctx, chat_id: int, g: GameState):
         await ctx.bot.edit_message_reply_markup(
             chat_id=chat_id,
             message_id=g.vote_msg_id,  # 📌 فقط روی پیام دکمه‌های اصلی
-            reply_markup=InlineKeyboardMarkup(btns)
+            reply_markup=InlineKeyboardMarkup(btns),
+            rate_limit_args=OUT_HIGH
         )
     except:
         pass
@@ -4645,7 +5780,7 @@ async def handle_vote(ctx, chat_id: int, g: GameState, target_seat: int,
             g.vote_prev_bounds = None
     g.vote_window = (start_time, start_time + 30.0, target_seat)
     g.vote_bounds = (msg.message_id, None)
-    store.save()
+    store.save(chat_id)
 
     await asyncio.sleep(4)
 
@@ -4666,7 +5801,7 @@ async def handle_vote(ctx, chat_id: int, g: GameState, target_seat: int,
         g.vote_logs[target_seat] = [(u, rel) for (u, rel) in logs if rel <= dur + 0.001]
         for u, _r in removed:
             (g.votes_cast.get(target_seat) or set()).discard(u)
-    store.save()
+    store.save(chat_id)
 
     if g.vote_stage == "initial_vote":
         g.last_vote_msg_id_initial = end_msg.message_id
@@ -4678,14 +5813,7 @@ async def handle_vote(ctx, chat_id: int, g: GameState, target_seat: int,
     # در هر نوبت یعنی تلگرام دیرتر محدودمان می‌کند و پیام‌ها عقب نمی‌افتند
     if refresh_buttons:
         await update_vote_buttons(ctx, chat_id, g)
-    store.save()
-
-
-
-
-
-
-
+    store.save(chat_id)
 
 
 # ─── تایمر انقضای انتظار تغییر نام ──────────────────────────────
@@ -4703,7 +5831,7 @@ async def _expire_name_prompt(ctx, chat_id: int, uid: int, seat_no: int,
     g.waiting_name.pop(uid, None)
     if isinstance(getattr(g, "waiting_name_token", None), dict):
         g.waiting_name_token.pop(uid, None)
-    store.save()
+    store.save(chat_id)
 
     if prompt_msg_id:
         try:
@@ -4720,7 +5848,7 @@ def _start_name_wait(ctx, chat_id: int, g: GameState, uid: int,
         g.waiting_name_token = {}
     token = datetime.now().timestamp()
     g.waiting_name_token[uid] = token
-    store.save()
+    store.save(chat_id)
     prompt_id = getattr(prompt_msg, "message_id", None)
     asyncio.create_task(
         _expire_name_prompt(ctx, chat_id, uid, seat_no, prompt_id, token)
@@ -4778,6 +5906,7 @@ async def _expire_god_rating(ctx, prompts, token, delay=3600):
                 pass
 
 
+@callback_route("grate_")
 async def handle_god_rating_callback(update, ctx):
     """🎩 ثبتِ رأیِ بازیکن به گاد (۱ تا ۵)."""
     q = update.callback_query
@@ -4806,7 +5935,7 @@ async def handle_god_rating_callback(update, ctx):
         return
 
     await safe_q_answer(q)
-    ok = record_god_rating(god_uid, score)
+    ok = await gist_run(record_god_rating, god_uid, score)
     if not ok:
         try:
             await ctx.bot.edit_message_text(
@@ -4819,7 +5948,7 @@ async def handle_god_rating_callback(update, ctx):
     seen.add(key)
     if len(seen) > 5000:      # جلوگیری از رشدِ بی‌پایان
         store.god_rate_done = set(list(seen)[-2000:])
-    store.save()
+    store.save(_META_KEY)
     try:
         await ctx.bot.edit_message_text(
             chat_id=rater, message_id=q.message.message_id,
@@ -4859,9 +5988,9 @@ async def announce_winner(ctx, update, g: GameState):
         "",
     ]
 
-    mafia_roles = {_nz(x) for x in load_mafia_roles()}
-    indep_roles = load_indep_roles()
-    indep_for_this = {_nz(x) for x in indep_roles.get(g.scenario.name, [])}
+    await arole_registry()
+    mafia_roles = mafia_role_norms()
+    indep_for_this = indep_role_norms(g.scenario.name)
 
     for seat in sorted(g.seats):
         uid, name = g.seats[seat]
@@ -4918,7 +6047,7 @@ async def announce_winner(ctx, update, g: GameState):
 
     # ✅ افزایش شماره ایونت (کش + Gist)
     nums[key] = event_num + 1
-    ok = save_event_numbers(nums)
+    ok = await gist_run(save_event_numbers, dict(nums))
     if not ok:
         print(f"⚠️ save_event_numbers failed for chat {key}")
 
@@ -4930,8 +6059,9 @@ async def announce_winner(ctx, update, g: GameState):
         game_scores = {}
 
     # 📊 ثبت آمار برد/باخت بازیکنان در Gist (+ امتیاز کل + چکِ پایانِ فصل)
-    season_msg = update_player_stats(g, mafia_roles, indep_for_this, scores=game_scores,
-                                     group_title=group_title, date_str=date_str)
+    season_msg = await gist_run(update_player_stats, g, mafia_roles, indep_for_this,
+                                scores=game_scores, group_title=group_title,
+                                date_str=date_str)
 
     # ⚠️ اگر ثبتِ آمار شکست خورد، بی‌صدا رد نشو — به گاد و سازندهٔ بات خبر بده
     _serr = getattr(g, "stats_save_error", None)
@@ -4948,7 +6078,7 @@ async def announce_winner(ctx, update, g: GameState):
                 pass
 
     g.phase = "ended"
-    store.save()
+    store.save(chat.id, durable=True)   # 🏁 پایانِ بازی نباید با ری‌استارت گم شود
     await voice_god.leave(chat.id)     # 🎙 پایانِ بازی → خروج از وویس‌چت
 
     msg = await ctx.bot.send_message(chat.id, "\n".join(lines), parse_mode="HTML")
@@ -5009,8 +6139,6 @@ async def announce_winner(ctx, update, g: GameState):
     await _room_cleanup(ctx, g)
 
 
-
-
 def _apply_size_and_scenario(g: GameState, new_size: int, new_scenario: Scenario):
     # اگر کم می‌کنیم: صندلی‌های بالای ظرفیت جدید حذف شوند
     if new_size < g.max_seats:
@@ -5031,6 +6159,7 @@ def _apply_size_and_scenario(g: GameState, new_size: int, new_scenario: Scenario
     # فلگ‌های مربوط به تغییر سناریو
     g.awaiting_scenario_change = False
     g.pending_size = None
+    _scenario_bind(g)
 
 def _scenario_sizes_available() -> list[int]:
     sizes = sorted({sum(s.roles.values()) for s in store.scenarios})
@@ -5057,7 +6186,6 @@ def kb_choose_scenarios_for(size: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
-
 async def cleanup_after(ctx, chat_id: int, from_message_id: int, stop_message_id: int | None = None):
 
     try:
@@ -5068,31 +6196,14 @@ async def cleanup_after(ctx, chat_id: int, from_message_id: int, stop_message_id
             
             limit = from_message_id + 5000
 
-        batch = []
-        for msg_id in range(from_message_id + 1, limit):
-            batch.append(msg_id)
-            if len(batch) == 100:  # هر 100 تا
-                for mid in batch:
-                    try:
-                        await ctx.bot.delete_message(chat_id, mid)
-                    except Exception:
-                        pass
-                batch = []
-                await asyncio.sleep(1)  # جلوگیری از FloodLimit
-
-        # باقی‌مانده
-        for mid in batch:
-            try:
-                await ctx.bot.delete_message(chat_id, mid)
-            except Exception:
-                pass
+        ids = message_ids_between(chat_id, from_message_id, limit)
+        calls = await delete_messages_bulk(ctx.bot, chat_id, ids)
+        print(f"🧹 cleanup {chat_id}: {len(ids)} پیام در {calls} درخواست")
 
     except Exception as e:
         print(f"⚠️ cleanup_after error: {e}")
 
 
-
-
 # ═════════════════════════════════════════════════════════════
 #  موتور شبِ خودکار — سناریو «مذاکره»
 #  گاد با /شب اکت‌گیری را شروع و با /روز تمام می‌کند.
@@ -5127,8 +6238,116 @@ _R_REPORTER     = _nz("خبرنگار")
 _R_CITIZEN      = {_nz("شهرساده"), _nz("شهر ساده"), _nz("شهروند ساده"), _nz("شهروند")}
 
 
+# ═════════════════════════════════════════════════════════════
+#  🧩 رجیستریِ موتورهای سناریو
+#  موتورِ هر بازی یک‌بار (با _apply_size_and_scenario یا پخشِ نقش) بسته می‌شود؛
+#  بعد از آن _is_*_scenario و باز/جمع/حلِ شب فقط یک نگاه به g است، بدونِ _nz روی اسم.
+#  سناریوی خودکارِ تازه = یک register_scenario_engine (پایینِ بخش‌های سناریو).
+# ═════════════════════════════════════════════════════════════
+@dataclass
+class ScenarioEngine:
+    key: str                                   # برچسبِ داخلی: neg / bzp / nem / ...
+    match: Callable | None = None              # (نامِ نرمالِ سناریو, نقش‌ها) → bool
+    night_stage: str | None = None             # g.night_stage در شروعِ شب
+    open_night: Callable | None = None         # async (ctx, chat_id, g)
+    all_done: Callable | None = None           # (g) → همه‌ی اکت‌های امشب رسید؟
+    resolve: Callable | None = None            # async (ctx, chat_id, g)
+    primary: bool = True                       # False: فقط صفت است و موتورِ شب نمی‌گیرد
+
+
+SCENARIO_ENGINES: dict[str, ScenarioEngine] = {}   # ترتیبِ ثبت = اولویت
+MANUAL_ENGINE_KEY = "manual"
+
+
+def register_scenario_engine(engine: ScenarioEngine) -> ScenarioEngine:
+    SCENARIO_ENGINES[engine.key] = engine
+    return engine
+
+
+def _scenario_name_match(key: str) -> Callable:
+    k = _nz(key)
+    return lambda name, roles: bool(name) and k in name
+
+
+# ═══════════ 🧩 موتورهای سناریو: بارگذاریِ تنبل ═══════════
+# بدنه‌ی موتورهای بازپرس/نماینده/تکاور/کاپو/گیمر/میتیک/شاهنامه (هزاران خط) در engines/
+# است و فقط وقتی بازی‌ای به آن سناریو رسید کامپایل و اجرا می‌شود — نه در هر بالا آمدن.
+# هر فایل داخلِ همین فضای نام اجرا می‌شود (نه به‌عنوانِ ماژولِ جدا)، پس کدش بی‌تغییر
+# همان ثابت‌ها و کمک‌تابع‌ها را می‌بیند و توابعش جای جانشین‌ها را در globals می‌گیرند.
+# تطبیقِ سناریو (_is_*_scenario و match) و مذاکره در هسته می‌مانند.
+_ENGINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "engines")
+_ENGINE_LOADED: set[str] = set()
+_ENGINE_LOCK = threading.Lock()
+
+
+def _engine_load(mod: str) -> None:
+    if mod in _ENGINE_LOADED:
+        return
+    with _ENGINE_LOCK:
+        if mod in _ENGINE_LOADED:
+            return
+        t0 = time.perf_counter()
+        name = f"engines.{mod}"
+        # SourceFileLoader همان pyc در __pycache__ را می‌خواند/می‌نویسد (compileall در بیلد)
+        loader = importlib.machinery.SourceFileLoader(name, os.path.join(_ENGINE_DIR, f"{mod}.py"))
+        exec(loader.get_code(name), globals())
+        _ENGINE_LOADED.add(mod)
+        print(f"🧩 engine {mod}: {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+
+def _engine_fn(mod: str, name: str, coro: bool = False) -> Callable:
+    """جانشینِ name: موتور را بار می‌کند و همان صدا زدن را به تابعِ واقعی می‌دهد."""
+    def real():
+        _engine_load(mod)
+        fn = globals()[name]
+        if fn is stub:
+            raise RuntimeError(f"engines/{mod}.py has no {name}")
+        return fn
+
+    if coro:
+        async def stub(*a, **k):
+            return await real()(*a, **k)
+    else:
+        def stub(*a, **k):
+            return real()(*a, **k)
+    stub.__name__ = stub.__qualname__ = name
+    return stub
+
+
+def _scenario_bound_key(g) -> tuple:
+    """کلیدِ کشِ موتور: اسمِ سناریو + نقش‌ها. بعضی صفت‌ها (مثلاً گیمر) از روی نقش‌ها تشخیص
+    داده می‌شوند و نقش‌ها بعد از پخش هم عوض می‌شوند (ارثِ نقش، گادفادرِ تازه، …)."""
+    sc = getattr(g, "scenario", None)
+    roles = getattr(g, "assigned_roles", None) or {}
+    return (sc.name if sc else None, tuple(roles.items()))
+
+
+def _scenario_bind(g) -> frozenset:
+    """صفت‌ها و موتورِ بازی را از روی اسمِ سناریو و نقش‌ها حساب و روی g ثبت کن."""
+    sc = getattr(g, "scenario", None)
+    name = _nz(sc.name) if sc else ""
+    roles = getattr(g, "assigned_roles", None) or {}
+    traits = frozenset(k for k, e in SCENARIO_ENGINES.items() if e.match and e.match(name, roles))
+    g.scn_engine = next((k for k, e in SCENARIO_ENGINES.items() if e.primary and k in traits),
+                        MANUAL_ENGINE_KEY)
+    g.scn_traits = traits
+    g.scn_bound_to = _scenario_bound_key(g)
+    return traits
+
+
+def _scenario_traits(g) -> frozenset:
+    if getattr(g, "scn_bound_to", 0) != _scenario_bound_key(g):
+        return _scenario_bind(g)
+    return g.scn_traits
+
+
+def _scenario_engine(g) -> ScenarioEngine:
+    _scenario_traits(g)
+    return SCENARIO_ENGINES.get(g.scn_engine) or SCENARIO_ENGINES[MANUAL_ENGINE_KEY]
+
+
 def _is_neg_scenario(g) -> bool:
-    return bool(getattr(g, "scenario", None)) and (_nz(NEG_SCENARIO_KEY) in _nz(g.scenario.name))
+    return "neg" in _scenario_traits(g)
 
 def _alive_seats(g):
     return [s for s in sorted(g.seats) if s not in (g.striked or set())]
@@ -5136,10 +6355,7 @@ def _alive_seats(g):
 
 def _game_chat_id(g):
     """آیدیِ گروهِ این بازی (برای جاهایی که فقط g در دست است، مثل اعلامِ صوتی)."""
-    for cid, game in store.games.items():
-        if game is g:
-            return cid
-    return None
+    return store.index.chat_of(g)
 
 def _seat_role_norm(g, seat):
     return _nz((g.assigned_roles or {}).get(seat, ""))
@@ -5276,10 +6492,10 @@ def _kb_load(dump):
 def _god_impersonating(uid):
     """اگر این آیدی گادی است که در حالِ اکتِ دستی است → (بازی، صندلی، آیدیِ بازیکن)."""
     try:
-        for _g in store.games.values():
-            s = getattr(_g, "god_acting_as", None)
-            if _g.god_id == uid and s and s in _g.seats:
-                return _g, s, _g.seats[s][0]
+        _g = store.index.acting_of_god(uid)
+        s = getattr(_g, "god_acting_as", None)
+        if _g is not None and _g.god_id == uid and s and s in _g.seats:
+            return _g, s, _g.seats[s][0]
     except Exception:
         pass
     return None, None, None
@@ -5299,10 +6515,10 @@ def _q_uid(q):
 def _pm_target(uid):
     """اگر گاد دارد به‌جای این بازیکن اکت می‌زند، پیام‌هایش باید به پیویِ گاد برود."""
     try:
-        for _g in store.games.values():
-            s = getattr(_g, "god_acting_as", None)
-            if s and s in _g.seats and _g.seats[s][0] == uid:
-                return _g.god_id
+        _g = store.index.acting_of_player(uid)
+        s = getattr(_g, "god_acting_as", None)
+        if _g is not None and s and s in _g.seats and _g.seats[s][0] == uid:
+            return _g.god_id
     except Exception:
         pass
     return uid
@@ -5311,22 +6527,19 @@ def _pm_target(uid):
 async def _safe_pm(ctx, uid, text, kb=None):
     # 📥 پرامپت را همیشه کش کن — حتی اگر ارسال نشود (گوشی خاموش/پیوی بسته)،
     #    تا گاد بتواند با «اکتِ دستی» همین سؤال را جای بازیکن جواب بدهد
+    mine = store.index.player_games(uid)
     try:
-        for _g in store.games.values():
-            if any(u == uid for u, _n in _g.seats.values()):
-                _g.night_prompt_cache[uid] = (text, _kb_dump(kb))
-                break
+        for _cid, _g, _seat in mine[:1]:
+            _g.night_prompt_cache[uid] = (text, _kb_dump(kb))
     except Exception:
         pass
     # 🔥 اکتِ سوخته: مثل بازیکنِ با پیویِ بسته رفتار می‌شود — هیچ پرامپتی نمی‌گیرد
+    #    (فقط بازی‌هایی که uid در آن‌ها نشسته؛ night_burned_uids همیشه از صندلی‌ها پر می‌شود)
+    if any(uid in (getattr(_g, "night_burned_uids", None) or ()) for _cid, _g, _seat in mine):
+        return None
     try:
-        for _g in store.games.values():
-            if uid in (getattr(_g, "night_burned_uids", set()) or set()):
-                return None
-    except Exception:
-        pass
-    try:
-        return await ctx.bot.send_message(_pm_target(uid), text, reply_markup=kb)
+        return await ctx.bot.send_message(_pm_target(uid), text, reply_markup=kb,
+                                          rate_limit_args=OUT_HIGH)
     except Exception:
         return None
 
@@ -5352,15 +6565,13 @@ async def _report_unreachable(ctx, chat_id, g):
 
 async def _edit_pm(ctx, uid, msg_id, text, kb):
     try:
-        for _g in store.games.values():
-            if any(u == uid for u, _n in _g.seats.values()):
-                _g.night_prompt_cache[uid] = (text, _kb_dump(kb))
-                break
+        for _cid, _g, _seat in store.index.player_games(uid)[:1]:
+            _g.night_prompt_cache[uid] = (text, _kb_dump(kb))
     except Exception:
         pass
     try:
         await ctx.bot.edit_message_text(chat_id=_pm_target(uid), message_id=msg_id,
-                                        text=text, reply_markup=kb)
+                                        text=text, reply_markup=kb, rate_limit_args=OUT_HIGH)
     except Exception:
         pass
 
@@ -5368,15 +6579,14 @@ async def _close_pm(ctx, uid, msg_id, text):
     """ویرایش پیام به متن نهایی و حذف دکمه‌ها (تا نتوانند نظرشان را عوض کنند)."""
     target = _pm_target(uid)
     try:
-        for _g in store.games.values():
-            if any(u == uid for u, _n in _g.seats.values()):
-                _g.night_prompt_cache.pop(uid, None)   # اکت تمام شد → دیگر پرامپتی نمانده
-                # 🎛 اکتِ دستی با تمام‌شدنِ همین اکت خودکار بسته می‌شود،
-                #    وگرنه بقیه‌ی پیام‌های این بازیکن هم به پیویِ گاد می‌رفت
-                s = getattr(_g, "god_acting_as", None)
-                if s and s in _g.seats and _g.seats[s][0] == uid:
-                    _g.god_acting_as = None
-                break
+        for _cid, _g, _seat in store.index.player_games(uid)[:1]:
+            _g.night_prompt_cache.pop(uid, None)   # اکت تمام شد → دیگر پرامپتی نمانده
+            # 🎛 اکتِ دستی با تمام‌شدنِ همین اکت خودکار بسته می‌شود،
+            #    وگرنه بقیه‌ی پیام‌های این بازیکن هم به پیویِ گاد می‌رفت
+            s = getattr(_g, "god_acting_as", None)
+            if s and s in _g.seats and _g.seats[s][0] == uid:
+                _g.god_acting_as = None
+                store.save(_cid)
     except Exception:
         pass
     try:
@@ -5422,97 +6632,112 @@ async def _room_announce_shot(ctx, g, seat, extra=""):
 async def _night_report(ctx, g, text):
     """ثبت در لاگ پایان‌بازی + ارسال زندهٔ گزارش به پیوی گاد."""
     g.night_log.append(text)
-    store.save()
+    store.save(_game_chat_id(g))
     try:
         await ctx.bot.send_message(g.god_id, text, parse_mode="HTML")
     except Exception:
         pass
 
 
-def _night_all_done(g) -> bool:
-    """آیا همهٔ اکت‌های موردانتظارِ امشب انجام شده؟ (پویا بر اساس نقش‌های زنده و شرایط)"""
+def _role_alive(g, r) -> bool:
+    return _find_seat_by_role(g, r) is not None
+
+
+def _neg_night_done(g) -> bool:
+    d = g.night_done or set()
+    if "mafia" not in d:
+        return False
+    need = set()
+    if _role_alive(g, _R_DETECTIVE):
+        need.add("detective")
+    if not g.night_is_negotiation and _role_alive(g, _R_DOCTOR):
+        need.add("doctor")
+    if not g.sniper_used and _find_sniper(g) is not None:
+        need.add("sniper")
+    if getattr(g, "negotiation_used", False) and _role_alive(g, _R_REPORTER):
+        need.add("reporter")
+    return need <= d
+
+
+def _bzp_night_done(g) -> bool:
+    d = g.night_done or set()
+    if not ({"mafia", "shiad"} <= d):
+        return False
+    need = set()
+    if _role_alive(g, _R_DETECTIVE):
+        need.add("detective")
+    if not g.night_doctor_blocked and _role_alive(g, _R_DOCTOR):
+        need.add("doctor")
+    if not g.baazpors_used and _role_alive(g, _R_BAAZPORS):
+        need.add("baazpors")
+    if not g.sniper_used and _find_seat_by_role(g, _R_SNIPER_BZP) is not None:
+        need.add("sniper")
+    return need <= d
+
+
+def _nem_night_done(g) -> bool:
     d = g.night_done or set()
-    def alive(r):
-        return _find_seat_by_role(g, r) is not None
+    if getattr(g, "night_awaiting_sacrifice", False):
+        return False   # مین فعال شده و منتظر فدای دن‌مافیا هستیم
+    if not ({"mafia", "hacker"} <= d):
+        return False
+    need = set()
+    if not g.lawyer_used and _find_seat_role_sub(g, _R_LAWYER) is not None:
+        need.add("lawyer")
+    if _role_alive(g, _R_GUARD):
+        need.add("guard")
+    if not g.night_doctor_blocked and _role_alive(g, _R_DOCTOR):
+        need.add("doctor")
+    if _role_alive(g, _R_GUIDE):
+        need.add("guide")
+    return need <= d
 
-    if _is_takavar_scenario(g):
-        return "gunman" in d
 
-    if _is_neg_scenario(g):
-        if "mafia" not in d:
-            return False
-        need = set()
-        if alive(_R_DETECTIVE):
-            need.add("detective")
-        if not g.night_is_negotiation and alive(_R_DOCTOR):
-            need.add("doctor")
-        if not g.sniper_used and _find_sniper(g) is not None:
-            need.add("sniper")
-        if getattr(g, "negotiation_used", False) and alive(_R_REPORTER):
-            need.add("reporter")
-        return need <= d
+def _tk_night_done(g) -> bool:
+    return "gunman" in (g.night_done or set())
 
-    if _is_baazpors_scenario(g):
-        if not ({"mafia", "shiad"} <= d):
-            return False
-        need = set()
-        if alive(_R_DETECTIVE):
-            need.add("detective")
-        if not g.night_doctor_blocked and alive(_R_DOCTOR):
-            need.add("doctor")
-        if not g.baazpors_used and alive(_R_BAAZPORS):
-            need.add("baazpors")
-        if not g.sniper_used and _find_seat_by_role(g, _R_SNIPER_BZP) is not None:
-            need.add("sniper")
-        return need <= d
 
-    if _is_nemayande_scenario(g):
-        if getattr(g, "night_awaiting_sacrifice", False):
-            return False   # مین فعال شده و منتظر فدای دن‌مافیا هستیم
-        if not ({"mafia", "hacker"} <= d):
-            return False
-        need = set()
-        if not g.lawyer_used and _find_seat_role_sub(g, _R_LAWYER) is not None:
-            need.add("lawyer")
-        if alive(_R_GUARD):
-            need.add("guard")
-        if not g.night_doctor_blocked and alive(_R_DOCTOR):
-            need.add("doctor")
-        if alive(_R_GUIDE):
-            need.add("guide")
-        return need <= d
+def _kp_night_done(g) -> bool:
+    d = g.night_done or set()
+    if getattr(g, "poison_phase", False):
+        return False
+    if not ({"mafia", "witch"} <= d):
+        return False
+    need = set()
+    if _role_alive(g, _R_DETECTIVE):
+        need.add("detective")
+    if not g.night_doctor_blocked and _role_alive(g, _R_ARMORER):
+        need.add("armorer")
+    if not g.attar_poison_used and _role_alive(g, _R_ATTAR):
+        need.add("attar")
+    return need <= d
 
-    if _is_kapu_scenario(g):
-        if getattr(g, "poison_phase", False):
-            return False
-        if not ({"mafia", "witch"} <= d):
-            return False
-        need = set()
-        if alive(_R_DETECTIVE):
-            need.add("detective")
-        if not g.night_doctor_blocked and alive(_R_ARMORER):
-            need.add("armorer")
-        if not g.attar_poison_used and alive(_R_ATTAR):
-            need.add("attar")
-        return need <= d
 
-    if _is_gamer_scenario(g):
-        if getattr(g, "gm_gift_pending", False) or getattr(g, "gm_james_waiting_don", False):
-            return False
-        if "citizens_opened" not in d:
-            return False
-        return (getattr(g, "gm_expected", set()) or set()) <= d
+def _gm_night_done(g) -> bool:
+    d = g.night_done or set()
+    if getattr(g, "gm_gift_pending", False) or getattr(g, "gm_james_waiting_don", False):
+        return False
+    if "citizens_opened" not in d:
+        return False
+    return (getattr(g, "gm_expected", set()) or set()) <= d
 
-    if _is_shahname_scenario(g):
-        return ({"kaveh", "shadow", "mafia", "afrasiab", "simorgh",
-                 "feathers", "rostam", "jamasb", "arash"} <= d)
 
-    if _is_mythic_scenario(g):
-        if "citizens_opened" not in d:
-            return False
-        return (getattr(g, "my_expected", set()) or set()) <= d
+def _sh_night_done(g) -> bool:
+    return ({"kaveh", "shadow", "mafia", "afrasiab", "simorgh",
+             "feathers", "rostam", "jamasb", "arash"} <= (g.night_done or set()))
 
-    return False
+
+def _my_night_done(g) -> bool:
+    d = g.night_done or set()
+    if "citizens_opened" not in d:
+        return False
+    return (getattr(g, "my_expected", set()) or set()) <= d
+
+
+def _night_all_done(g) -> bool:
+    """آیا همهٔ اکت‌های موردانتظارِ امشب انجام شده؟ (پویا بر اساس نقش‌های زنده و شرایط)"""
+    done = _scenario_engine(g).all_done
+    return bool(done and done(g))
 
 
 async def _maybe_notify_god_done(ctx, g):
@@ -5524,7 +6749,7 @@ async def _maybe_notify_god_done(ctx, g):
     if not _night_all_done(g):
         return
     g.night_god_notified = True
-    store.save()
+    store.save(_game_chat_id(g))
     try:
         await ctx.bot.send_message(
             g.god_id, "✅ همهٔ اکت‌های امشب انجام شد. هر وقت خواستی «/روز» را بزن.")
@@ -5532,25 +6757,27 @@ async def _maybe_notify_god_done(ctx, g):
         pass
 
 
+async def _after_night_act(update, ctx):
+    """پس از هر اکت: اگر همه‌ی اکت‌ها تمام شد، به گاد اطلاع بده."""
+    try:
+        q = update.callback_query
+        g, _ = _find_active_night_game(_q_uid(q), q)
+        if g is not None:
+            await _maybe_notify_god_done(ctx, g)
+    except Exception:
+        pass
+
+
 def _is_manual_scenario(g) -> bool:
     """✋ سناریویی که موتورِ اکتِ خودکار ندارد — همه‌چیزش دستِ گاد است."""
-    return not (_is_neg_scenario(g) or _is_baazpors_scenario(g) or _is_nemayande_scenario(g)
-                or _is_takavar_scenario(g) or _is_kapu_scenario(g) or _is_gamer_scenario(g)
-                or _is_shahname_scenario(g) or _is_mythic_scenario(g))
+    return _scenario_engine(g).key == MANUAL_ENGINE_KEY
 
 
 async def start_night(ctx, chat_id, g):
-    is_neg = _is_neg_scenario(g)
-    is_bzp = _is_baazpors_scenario(g)
-    is_nem = _is_nemayande_scenario(g)
-    is_tk = _is_takavar_scenario(g)
-    is_kp = _is_kapu_scenario(g)
-    is_gm = _is_gamer_scenario(g)
-    is_sh = _is_shahname_scenario(g)
-    is_my = _is_mythic_scenario(g)
+    engine = _scenario_engine(g)
     # 🌙 سناریوهای بدونِ موتورِ خودکار: شب و روز مثل همیشه برقرار است،
     #    فقط اکت‌ها به‌جای دکمه‌های بات، در پیویِ گاد گرفته می‌شوند.
-    is_manual = _is_manual_scenario(g)
+    is_manual = engine.key == MANUAL_ENGINE_KEY
     # فازهای رأی‌گیریِ روز هم قابل قبول‌اند؛ فقط قبل از شروع/بعد از پایان بازی رد می‌شود
     if g.phase in ("idle", "ended", "awaiting_winner") or not getattr(g, "assigned_roles", None):
         await ctx.bot.send_message(chat_id, "⛔ ابتدا باید بازی شروع شده باشد.")
@@ -5582,7 +6809,7 @@ async def start_night(ctx, chat_id, g):
     g.kp_deng_active = False
     g.kp_deng_votes = {}
     g.kp_deng_unread = set()
-    store.save()
+    store.save(chat_id)
 
     g.night_active = True
     g.maarefe_active = False
@@ -5691,7 +6918,7 @@ async def start_night(ctx, chat_id, g):
     g.night_baz_targets = []
     g.night_pm_msgs = {}
     g.night_alive_at_start = len(_alive_seats(g))
-    store.save()
+    store.save(chat_id)
 
     god_link = f"<a href='tg://user?id={g.god_id}'>{escape(g.god_name or 'گاد', quote=False)}</a>"
     if is_manual:
@@ -5714,48 +6941,9 @@ async def start_night(ctx, chat_id, g):
 
         # 👢 کیکِ شب دیگر پرسیده نمی‌شود — دکمه‌اش در پنلِ گاد همیشه در دسترس است
 
-        if is_manual:
-            g.night_stage = "manual"
-            store.save()
-            await _night_report(
-                ctx, g,
-                "✋ این سناریو موتورِ اکتِ خودکار ندارد — اکت‌ها را خودت در پیوی بگیر.\n"
-                "هر وقت تمام شد «☀️ روز» را بزن.")
-        elif is_neg:
-            g.night_stage = "mafia_decision"
-            store.save()
-            await _night_open_mafia_decision(ctx, chat_id, g)
-        elif is_bzp:
-            g.night_stage = "hunter"
-            store.save()
-            await _bzp_open_hunter(ctx, chat_id, g)
-        elif is_nem:
-            g.night_stage = "mine"
-            store.save()
-            await _nem_open_mine(ctx, chat_id, g)
-        elif is_tk:
-            g.night_stage = "shield"
-            store.save()
-            await _tk_open_shield(ctx, chat_id, g)
-        elif is_kp:
-            g.night_stage = "don"
-            store.save()
-            if g.attar_poisoned_seat is not None:
-                await _kp_begin_poison(ctx, chat_id, g)
-            else:
-                await _kp_open_don(ctx, chat_id, g)
-        elif is_sh:
-            g.night_stage = "shahname"
-            store.save()
-            await _sh_start(ctx, chat_id, g)
-        elif is_my:
-            g.night_stage = "mythic"
-            store.save()
-            await _my_start(ctx, chat_id, g)
-        else:
-            g.night_stage = "robin"
-            store.save()
-            await _gm_open_robin(ctx, chat_id, g)
+        g.night_stage = engine.night_stage
+        store.save(chat_id)
+        await engine.open_night(ctx, chat_id, g)
     except Exception as e:
         import traceback
         tb = traceback.format_exc()
@@ -5778,7 +6966,7 @@ async def start_night(ctx, chat_id, g):
         ])
         _pm = await ctx.bot.send_message(g.god_id, f"🌙 شب {g.night_number} — پنلِ گاد", reply_markup=_kb)
         g.night_god_panel_mid = _pm.message_id
-        store.save()
+        store.save(chat_id)
     except Exception:
         pass
 
@@ -5806,7 +6994,7 @@ async def _night_open_mafia_decision(ctx, chat_id, g):
     g.night_decider_seat = decider
     can_negotiate = (not g.negotiation_used) and (neg is not None) and _dead_nonneg_mafia_exists(g)
     g.night_can_negotiate = can_negotiate
-    store.save()
+    store.save(chat_id)
 
     duid, _dn = g.seats[decider]
     if can_negotiate:
@@ -5821,7 +7009,7 @@ async def _night_open_mafia_decision(ctx, chat_id, g):
         m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\n🔫 هدف شلیک را انتخاب کن:", kb)
     if m:
         g.night_pm_msgs[duid] = m.message_id
-        store.save()
+        store.save(chat_id)
 
 
 async def _broadcast_negotiation_night(ctx, g):
@@ -5835,7 +7023,7 @@ async def _broadcast_negotiation_night(ctx, g):
 
 async def _night_open_citizens(ctx, chat_id, g):
     g.night_stage = "citizens"
-    store.save()
+    store.save(chat_id)
 
     # 🔎 کاراگاه
     det = _find_seat_by_role(g, _R_DETECTIVE)
@@ -5886,7 +7074,7 @@ async def _night_open_citizens(ctx, chat_id, g):
             if m:
                 g.night_pm_msgs[ruid] = m.message_id
 
-    store.save()
+    store.save(chat_id)
 
 
 async def end_night(ctx, chat_id, g):
@@ -5923,7 +7111,7 @@ async def end_night(ctx, chat_id, g):
     g.night_pm_msgs = {}
     g.night_sel = {}
     g.night_doc_sel = {}
-    store.save()
+    store.save(chat_id)
     voice_god.say(chat_id, "day")              # 🎙
     await ctx.bot.send_message(chat_id, f"☀️ روز شد. اکت‌گیری شب {g.night_number} پایان یافت.")
     await _night_report(ctx, g, f"☀️ پایان شب {g.night_number}")
@@ -6071,7 +7259,7 @@ def _burn_seat_acts(g, seat, force=False):
         except Exception:
             pass
 
-    store.save()
+    store.save(_game_chat_id(g))
     return cleared
 
 
@@ -6122,11 +7310,10 @@ async def _auto_end_game(ctx, chat_id, g, winner_side, clean, why):
     g.endq_alert = False
     g.winner_side = winner_side
     g.clean_win = bool(clean)
-    store.save()
-    try:
-        _chat = await ctx.bot.get_chat(chat_id)
-    except Exception as e:
-        print("⚠️ auto end get_chat:", e)
+    store.save(chat_id)
+    _chat = await chat_meta(ctx.bot, chat_id)
+    if _chat is None:
+        print("⚠️ auto end get_chat failed:", chat_id)
         return False
     _lbl = ("کلین‌شیت " if clean else "برد ") + winner_side
     try:
@@ -6221,7 +7408,7 @@ async def _expire_end_question(ctx, g, token, delay=300):
     g.endq_token = None
     g.endq_mid = None
     g.endq_alert = False
-    store.save()
+    store.save(_game_chat_id(g))
     if mid:
         try:
             await ctx.bot.delete_message(chat_id=g.god_id, message_id=mid)
@@ -6245,7 +7432,7 @@ async def _check_auto_end(ctx, chat_id, g, after_night=False):
             token = str(int(datetime.now(timezone.utc).timestamp()))[-8:]
             g.endq_token = token
             g.endq_alert = True      # اولین دکمه‌ای که گاد بزند، پاپ‌آپ می‌گیرد
-            store.save()
+            store.save(chat_id)
             lbl = ("کلین‌شیت " if clean else "برد ") + side
             kb = InlineKeyboardMarkup([[
                 InlineKeyboardButton("✅ بله، ببند", callback_data="endq_yes"),
@@ -6261,7 +7448,7 @@ async def _check_auto_end(ctx, chat_id, g, after_night=False):
                     f"بی‌پاسخ بماند، بعد از ۵ دقیقه این پیام پاک می‌شود.</i>",
                     parse_mode="HTML", reply_markup=kb)
                 g.endq_mid = m.message_id
-                store.save()
+                store.save(chat_id)
                 asyncio.create_task(_expire_end_question(ctx, g, token))
                 # 🔔 اگر همین الان خودِ گاد دکمه‌ای زده (پایان رأی‌گیری / روز / …)،
                 #    پاپ‌آپ روی همان دکمه بیاید — نه دکمهٔ بعدی
@@ -6270,12 +7457,12 @@ async def _check_auto_end(ctx, chat_id, g, after_night=False):
                             "🏁 به‌نظر می‌رسد بازی تمام شده!\n"
                             "همین حالا پیویِ بات را چک کن و بله/خیر را بزن."):
                         g.endq_alert = False
-                        store.save()
+                        store.save(chat_id)
             except Exception as e:
                 print("⚠️ end question send:", e)
                 g.endq_token = None
                 g.endq_alert = False
-                store.save()
+                store.save(chat_id)
 
         # 🌀 پایانِ شب با ۳ نفرِ باقی‌مانده (۲ شهر + ۱ مافیا) → حالتِ کی‌آس
         if (after_night and not cond and len(_alive_seats(g)) == 3
@@ -6283,7 +7470,7 @@ async def _check_auto_end(ctx, chat_id, g, after_night=False):
                 and g.phase not in ("idle", "ended", "awaiting_winner")
                 and not getattr(g, "chaos_auto", False)):
             g.chaos_auto = True
-            store.save()
+            store.save(chat_id)
             try:
                 await ctx.bot.send_message(
                     chat_id,
@@ -6308,12 +7495,13 @@ async def _check_auto_end(ctx, chat_id, g, after_night=False):
     return False
 
 
+@callback_route("endq_")
 async def handle_end_question_callback(update, ctx):
     """🏁 پاسخِ گاد به «آیا بازی تمام شده؟»"""
     q = update.callback_query
     uid = q.from_user.id
     g = None; chat_id = None
-    for cid, game in store.games.items():
+    for cid, game in store.index.god_games(uid):
         if game.god_id == uid and getattr(game, "endq_token", None):
             g, chat_id = game, cid
             break
@@ -6325,7 +7513,7 @@ async def handle_end_question_callback(update, ctx):
     g.endq_token = None
     g.endq_mid = None
     g.endq_alert = False
-    store.save()
+    store.save(chat_id)
 
     if q.data == "endq_no":
         try:
@@ -6362,7 +7550,7 @@ async def _apply_deaths(ctx, chat_id, g, dead, reasons, zereh_warn=None):
     _score_night_acts(g, dead, reasons)   # 🏅 قبل از خط‌خوردن — وضعیتِ سیو/زره هنوز سرِ جاست
     for s in dead:
         g.striked.add(s)
-    store.save()
+    store.save(chat_id)
 
     # 👢 اعلامِ عمومیِ کیکِ شب — حالا که روز شده، با ساید
     for s in sorted(dead):
@@ -6414,24 +7602,14 @@ async def _apply_deaths(ctx, chat_id, g, dead, reasons, zereh_warn=None):
 
 
 async def _resolve_night(ctx, chat_id, g):
-    if _is_neg_scenario(g):
-        await _resolve_mozakere(ctx, chat_id, g)
-    elif _is_baazpors_scenario(g):
-        await _resolve_baazpors(ctx, chat_id, g)
-    elif _is_nemayande_scenario(g):
-        await _resolve_nemayande(ctx, chat_id, g)
-    elif _is_takavar_scenario(g):
-        await _resolve_takavar(ctx, chat_id, g)
-    elif _is_kapu_scenario(g):
-        await _resolve_kapu(ctx, chat_id, g)
-    elif _is_gamer_scenario(g):
-        await _resolve_gamer(ctx, chat_id, g)
-    elif _is_shahname_scenario(g):
-        await _resolve_shahname(ctx, chat_id, g)
-    elif _is_mythic_scenario(g):
-        await _resolve_mythic(ctx, chat_id, g)
-    else:
-        await _resolve_manual(ctx, chat_id, g)
+    await _scenario_engine(g).resolve(ctx, chat_id, g)
+
+
+async def _manual_open_night(ctx, chat_id, g):
+    await _night_report(
+        ctx, g,
+        "✋ این سناریو موتورِ اکتِ خودکار ندارد — اکت‌ها را خودت در پیوی بگیر.\n"
+        "هر وقت تمام شد «☀️ روز» را بزن.")
 
 
 async def _resolve_manual(ctx, chat_id, g):
@@ -6506,7 +7684,7 @@ async def _resolve_gamer(ctx, chat_id, g):
         await _night_report(ctx, g, f"🛡 بمبِ جلوی صندلی {g.gm_bomb_seat} با محافظتِ الیوت بی‌اثر شد.")
         g.gm_bomb_seat = None
         g.gm_bomb_fuses = {}
-        store.save()
+        store.save(chat_id)
 
     _add_night_kick(g, dead, reasons)
     await _apply_deaths(ctx, chat_id, g, dead, reasons)
@@ -6554,7 +7732,7 @@ async def _resolve_takavar(ctx, chat_id, g):
             # 🎖 فرصتِ ضدشلیک ایجاد شد → تیر می‌سوزد؛ چه بزند چه نزند —
             #    حتی اگر سیوِ پزشک نجاتش دهد، فردا شب دیگر تیر ندارد
             g.tk_com_burned = True
-            store.save()
+            store.save(chat_id)
             if not countered:
                 await _night_report(ctx, g, "🎖 تکاور از ضدشلیک استفاده نکرد — تیرش سوخت.")
         if countered:
@@ -6584,7 +7762,7 @@ async def _resolve_takavar(ctx, chat_id, g):
     if g.war_gun_holder and g.war_gun_holder in (g.striked or set()):
         g.war_gun_used = False
         g.war_gun_holder = None
-        store.save()
+        store.save(chat_id)
         await _night_report(ctx, g, "🔫 دارندهٔ تفنگ جنگی کشته شد؛ تفنگ به تفنگدار برگشت.")
 
 
@@ -6698,7 +7876,7 @@ async def _resolve_nemayande(ctx, chat_id, g):
     if g.night_lawyer_target is not None:
         if g.night_lawyer_target not in dead:
             g.lawyer_used = True
-        store.save()
+        store.save(chat_id)
 
     await _apply_deaths(ctx, chat_id, g, dead, reasons, zereh)
 
@@ -6711,7 +7889,7 @@ async def _do_day(ctx, chat_id, g):
     elif getattr(g, "maarefe_active", False):
         # پایانِ شبِ معارفه: فقط بستن چت مافیا (بدون محاسبهٔ مرگ)
         g.maarefe_active = False
-        store.save()
+        store.save(chat_id)
         await _room_set_locked(ctx, g, True)
         voice_god.say(chat_id, "day")          # 🎙
         await ctx.bot.send_message(chat_id, "☀️ روز شد. چت گروه مافیا بسته شد.")
@@ -6789,7 +7967,7 @@ async def _do_room_open(ctx, chat_id, g):
         elif not g.nem_reps and not getattr(g, "nem_awaiting_reps", False):
             g.nem_awaiting_reps = True
             g.nem_reps_tmp = []
-            store.save()
+            store.save(chat_id)
             await _safe_pm(ctx, g.god_id,
                            "🗳 چه کسانی نماینده شدند؟ (به ترتیب: اولین انتخاب = نماینده اول)",
                            _nem_reps_kb(g, []))
@@ -6849,13 +8027,13 @@ async def _baz_trigger(ctx, chat_id, g):
                            f"🧑‍⚖️ بازپرسیِ {names} — ادامه یا ملغی؟", kb)
         if m:
             g.baz_awaiting_decision = True
-            store.save()
+            store.save(chat_id)
         else:
             await ctx.bot.send_message(chat_id, "⚠️ پیویِ بازپرس بسته است.")
     elif _find_seat_by_role(g, _R_BAAZPORS, alive_only=False) is not None:
         # ⚰️ بازپرس مُرده → ادامه‌ی خودکار (ملغی ممکن نیست) با ۳۰ ثانیه تأخیرِ ضدلورفتن
         g.baz_day_choice = "cont"
-        store.save()
+        store.save(chat_id)
         asyncio.create_task(_baz_dead_auto_continue(ctx, chat_id, g))
 
 
@@ -6878,7 +8056,7 @@ async def _baz_dead_auto_continue(ctx, chat_id, g, delay=15):
         g.baz_duel_votes = {}
         g.baz_duel_unread = set()
         g.baz_duel_pair = list(bt)
-        store.save()
+        store.save(chat_id)
         kb = InlineKeyboardMarkup([[InlineKeyboardButton("✅ پایان شمارش", callback_data="bzd_end")]])
         await ctx.bot.send_message(
             chat_id,
@@ -6893,13 +8071,14 @@ async def _baz_dead_auto_continue(ctx, chat_id, g, delay=15):
         print("⚠️ baz dead auto err:", e)
 
 
+@callback_route("buylink_")
 async def handle_buy_link_callback(update, ctx):
     """🔗 بعد از خریداری: ارسال (یا نه)ی لینکِ اتاق مافیا به فردِ خریداری‌شده — تصمیمِ گاد."""
     q = update.callback_query
     data = q.data
     uid = q.from_user.id
     g = None
-    for cid, game in store.games.items():
+    for cid, game in store.index.god_games(uid):
         if (game.god_id == uid and game.phase not in ("idle", "ended")
                 and getattr(game, "buy_link_seat", None) is not None):
             g = game
@@ -6910,7 +8089,7 @@ async def handle_buy_link_callback(update, ctx):
     mid = q.message.message_id if q.message else None
     seat = g.buy_link_seat
     g.buy_link_seat = None
-    store.save()
+    store.save(_game_chat_id(g))
 
     if data == "buylink_no" or seat not in g.seats:
         await safe_q_answer(q)
@@ -6937,7 +8116,7 @@ async def _baz_duel_count(ctx, chat_id, g):
     pair = list(getattr(g, "baz_duel_pair", []) or [])
     g.baz_duel_votes = {}
     g.baz_duel_unread = set()
-    store.save()
+    store.save(chat_id)
     if len(pair) != 2:
         return
 
@@ -6975,7 +8154,7 @@ async def _baz_duel_count(ctx, chat_id, g):
     # 🏅 مافیای خارج‌شده با رأیِ بازپرسی هم فریبش صفر می‌شود
     if _sc_side(g, loser) == "مافیا":
         _sc_add(g, loser, "farib1", -100, "خروج با رأی بازپرسی — فریب صفر")
-    store.save()
+    store.save(chat_id)
     await ctx.bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML")
     try:
         await publish_seating(ctx, chat_id, g, mode=CTRL)
@@ -7000,13 +8179,14 @@ async def _baz_duel_count(ctx, chat_id, g):
     asyncio.create_task(_side_after_will())
 
 
+@callback_route("bzd_")
 async def handle_baz_duel_callback(update, ctx):
     """🧑‍⚖️ تصمیمِ بازپرس (ادامه/ملغی) + پایانِ شمارشِ دوئل (گاد)."""
     q = update.callback_query
     data = q.data
     uid = q.from_user.id
     g = None; chat_id = None
-    for cid, game in store.games.items():
+    for cid, game in store.index.games_of(uid):
         if not _is_baazpors_scenario(game) or game.phase in ("idle", "ended"):
             continue
         if data == "bzd_end" and game.god_id == uid and getattr(game, "baz_duel_active", False):
@@ -7026,7 +8206,7 @@ async def handle_baz_duel_callback(update, ctx):
     if data == "bzd_cancel":
         g.baz_awaiting_decision = False
         g.baz_day_choice = "cancel"
-        store.save()
+        store.save(chat_id)
         await _close_pm(ctx, uid, mid, "🚫 ملغی ثبت شد.")
         await ctx.bot.send_message(chat_id, "🧑‍⚖️ بازپرس رأی به <b>ملغیِ</b> بازپرسی داد.",
                                    parse_mode="HTML")
@@ -7037,7 +8217,7 @@ async def handle_baz_duel_callback(update, ctx):
         g.baz_day_choice = "cont"
         bt = [t for t in (getattr(g, "night_baz_targets", []) or [])
               if t in g.seats and t not in (g.striked or set())]
-        store.save()
+        store.save(chat_id)
         await _close_pm(ctx, uid, mid, "▶️ ادامه ثبت شد.")
         await ctx.bot.send_message(chat_id, "🧑‍⚖️ بازپرس رأی به <b>ادامه‌ی</b> بازپرسی داد.",
                                    parse_mode="HTML")
@@ -7046,7 +8226,7 @@ async def handle_baz_duel_callback(update, ctx):
             g.baz_duel_votes = {}
             g.baz_duel_unread = set()
             g.baz_duel_pair = list(bt)
-            store.save()
+            store.save(chat_id)
             kb = InlineKeyboardMarkup([[InlineKeyboardButton("✅ پایان شمارش", callback_data="bzd_end")]])
             await ctx.bot.send_message(
                 chat_id,
@@ -7112,7 +8292,7 @@ async def _burn_advance(ctx, chat_id, g):
                     or _find_seat_by_role(g, _R_HOSTAGE))
             if _dec in burned:
                 g.night_done.add("mafia")
-        store.save()
+        store.save(chat_id)
 
         # ⛓ زنجیره‌های اولویت‌دار
         if _is_baazpors_scenario(g):
@@ -7120,7 +8300,7 @@ async def _burn_advance(ctx, chat_id, g):
             h = _find_seat_by_role(g, _R_HUNTER)
             if h in burned:
                 g.night_done.add("hunter")
-                store.save()
+                store.save(chat_id)
             if "hunter" in (g.night_done or set()) and "mafia" not in (g.night_done or set()):
                 await _bzp_open_gf_shiad(ctx, chat_id, g)   # خودش idempotent است
             # اگر مافیا/شیاد سوخته بودند، بقیه‌ی اکت‌ها هم باز شوند
@@ -7132,7 +8312,7 @@ async def _burn_advance(ctx, chat_id, g):
                     and "mafia" not in (g.night_done or set())
                     and "burn_mine_advanced" not in g.night_done):
                 g.night_done.add("burn_mine_advanced")
-                store.save()
+                store.save(chat_id)
                 await _nem_open_mafia(ctx, chat_id, g)
         elif _is_takavar_scenario(g):
             # چک‌کننده‌های تکاور idempotent هستند (با مارکرِ opened) — امن برای صدازدن
@@ -7157,7 +8337,7 @@ async def _burn_advance(ctx, chat_id, g):
             g.sh_feather_wait = _w
             if not _w and "sh_feath_opened" in (g.night_done or set()):
                 g.night_done.add("feathers")
-            store.save()
+            store.save(chat_id)
             await _sh_check_open_mafia(ctx, chat_id, g)
             await _sh_check_open_mid(ctx, chat_id, g)
             await _sh_check_open_feathers(ctx, chat_id, g)
@@ -7166,13 +8346,14 @@ async def _burn_advance(ctx, chat_id, g):
         print("⚠️ burn advance err:", e)
 
 
+@callback_route("nburn_")
 async def handle_burn_callback(update, ctx):
     """🔥 انتخاب و تأییدِ سوزوندنِ اکت توسط گاد (در پیوی)."""
     q = update.callback_query
     data = q.data
     uid = q.from_user.id
     g = None; burn_chat_id = None
-    for cid, game in store.games.items():
+    for cid, game in store.index.god_games(uid):
         if game.god_id == uid and game.phase not in ("idle", "ended") and getattr(game, "assigned_roles", None):
             g, burn_chat_id = game, cid
             break
@@ -7183,7 +8364,7 @@ async def handle_burn_callback(update, ctx):
     if data == "nburn_open":
         await safe_q_answer(q)
         g.burn_tmp = sorted(g.night_burned or set())
-        store.save()
+        store.save(burn_chat_id)
         await _safe_pm(ctx, uid, "🔥 اکتِ چه کسانی سوزانده شود؟ (تا پایانِ همین شب اعتبار دارد)",
                        _burn_kb(g))
         return
@@ -7198,7 +8379,7 @@ async def handle_burn_callback(update, ctx):
         for s in newly:
             _burn_seat_acts(g, s, force=True)
             g.god_acted_seats.discard(s)
-        store.save()
+        store.save(burn_chat_id)
         # پیویِ بازِ سوخته‌ها بسته شود تا دکمه‌ای برایشان نماند
         for s in newly:
             _u = g.seats.get(s, (None,))[0]
@@ -7221,7 +8402,7 @@ async def handle_burn_callback(update, ctx):
     else:
         tmp.append(s)
     g.burn_tmp = tmp
-    store.save()
+    store.save(burn_chat_id)
     await _edit_pm(ctx, uid, mid,
                    "🔥 اکتِ چه کسانی سوزانده شود؟ (تا پایانِ همین شب اعتبار دارد)", _burn_kb(g))
 
@@ -7271,11 +8452,7 @@ async def _gact_panel(ctx, uid, g, mid=None):
 async def _gact_try_open_stage(ctx, g, seat):
     """🔁 اگر مرحله‌ی این نقش هنوز باز نشده، بازش کن تا سؤالش ساخته و کش شود.
     همه‌ی این بازکننده‌ها idempotent هستند یا با مارکر محافظت شده‌اند."""
-    chat_id = None
-    for cid, game in store.games.items():
-        if game is g:
-            chat_id = cid
-            break
+    chat_id = store.index.chat_of(g)
     if chat_id is None:
         return
     if _is_baazpors_scenario(g):
@@ -7296,13 +8473,14 @@ async def _gact_try_open_stage(ctx, g, seat):
         await _sh_check_open_late(ctx, chat_id, g)
 
 
+@callback_route("gact_")
 async def handle_god_act_callback(update, ctx):
     """🎛 گاد به‌جای بازیکن اکت می‌زند — همان پرامپتِ خودِ بازیکن در پیویِ گاد باز می‌شود."""
     q = update.callback_query
     data = q.data
     uid = q.from_user.id
     g = None
-    for _cid, game in store.games.items():
+    for _cid, game in store.index.god_games(uid):
         if game.god_id == uid and game.phase not in ("idle", "ended"):
             g = game
             break
@@ -7314,20 +8492,20 @@ async def handle_god_act_callback(update, ctx):
 
     if data == "gact_open":
         g.god_act_tmp = None
-        store.save()
+        store.save(_game_chat_id(g))
         await _gact_panel(ctx, uid, g)
         return
 
     if data == "gact_end":
         g.god_acting_as = None
         g.god_act_tmp = None
-        store.save()
+        store.save(_game_chat_id(g))
         await _gact_panel(ctx, uid, g, mid)
         return
 
     if data.startswith("gact_pick_"):
         g.god_act_tmp = int(data.rsplit("_", 1)[1])
-        store.save()
+        store.save(_game_chat_id(g))
         await _gact_panel(ctx, uid, g, mid)
         return
 
@@ -7366,7 +8544,7 @@ async def handle_god_act_callback(update, ctx):
         g.god_acting_as = s
         g.god_acted_seats.add(s)   # 🎛 اکتِ دستی بر کیک اولویت دارد
         g.god_act_tmp = None
-        store.save()
+        store.save(_game_chat_id(g))
         await _gact_panel(ctx, uid, g, mid)
         text, kbd = cached
         m = await ctx.bot.send_message(
@@ -7377,7 +8555,7 @@ async def handle_god_act_callback(update, ctx):
             parse_mode="HTML", reply_markup=_kb_load(kbd))
         # پیویِ خودِ بازیکن هم به همین پیام وصل می‌شود تا ویرایش/بستن درست کار کند
         g.night_pm_msgs[puid] = m.message_id
-        store.save()
+        store.save(_game_chat_id(g))
         await _night_report(ctx, g, f"🎛 اکتِ دستی: گاد به‌جای <b>{s}. "
                                     f"{escape(g.seats[s][1], quote=False)}</b> اکت می‌زند.")
         return
@@ -7412,7 +8590,7 @@ async def _deng_round_msg(ctx, chat_id, g, text):
     m = await ctx.bot.send_message(chat_id, text, parse_mode="HTML",
                                    reply_markup=_nem_deng_end_kb())
     g.nem_deng_kb_mid = m.message_id
-    store.save()
+    store.save(chat_id)
 
 
 async def _deng_manual_fallback(ctx, chat_id, g, first, note):
@@ -7431,7 +8609,7 @@ async def _deng_manual_fallback(ctx, chat_id, g, first, note):
     g.nem_deng_result = None
     g.nem_awaiting_reps = True
     g.nem_reps_tmp = [first] if first else []
-    store.save()
+    store.save(chat_id)
     if note:
         await ctx.bot.send_message(chat_id, note, parse_mode="HTML")
     await _safe_pm(ctx, g.god_id,
@@ -7484,7 +8662,7 @@ async def _nem_deng_capture(ctx, g, msg, uid, text) -> bool:
         g.nem_deng_seq = int(getattr(g, "nem_deng_seq", 0) or 0) + 1
         g.nem_deng_votes[uid] = (v, g.nem_deng_seq)
         g.nem_deng_unread.discard(uid)
-        store.save()
+        store.save(_game_chat_id(g))
         # ✅ همه‌ی رأی‌دهندگانِ مجاز رأی دادند → شمارشِ خودکار
         if all(g.seats[s][0] in g.nem_deng_votes for s in voters):
             await _nem_deng_count(ctx, msg.chat.id, g)
@@ -7492,7 +8670,7 @@ async def _nem_deng_capture(ctx, g, msg, uid, text) -> bool:
     if uid not in (g.nem_deng_votes or {}):
         _first = uid not in (g.nem_deng_unread or set())
         g.nem_deng_unread.add(uid)
-        store.save()
+        store.save(_game_chat_id(g))
         if _first:
             try:
                 await msg.reply_text(f"⚠️ {vs}. {g.seats[vs][1]} دنگت خوانده نشد — "
@@ -7526,7 +8704,7 @@ async def _nem_deng_count(ctx, chat_id, g):
     # راند مصرف شد
     g.nem_deng_votes = {}
     g.nem_deng_unread = set()
-    store.save()
+    store.save(chat_id)
 
     def _frm_next():
         # 🔄 جهتِ متناوب: هر راندِ جدید از سمتِ مخالفِ راندِ قبلی (جایی که آخرین نفر رأی داده)
@@ -7543,7 +8721,7 @@ async def _nem_deng_count(ctx, chat_id, g):
         elif len(tops) == 1:
             g.nem_deng_first = tops[0]
             g.nem_deng_stage = 2
-            store.save()
+            store.save(chat_id)
             frm = _frm_next()
             await _deng_round_msg(
                 ctx, chat_id, g,
@@ -7559,7 +8737,7 @@ async def _nem_deng_count(ctx, chat_id, g):
                 return
             g.nem_deng_cands = list(tops)
             g.nem_deng_stage = 4
-            store.save()
+            store.save(chat_id)
             frm = _frm_next()
             await _deng_round_msg(
                 ctx, chat_id, g,
@@ -7580,7 +8758,7 @@ async def _nem_deng_count(ctx, chat_id, g):
             g.nem_deng_first = first
             g.nem_deng_cands = []
             g.nem_deng_stage = 2
-            store.save()
+            store.save(chat_id)
             frm = _frm_next()
             await _deng_round_msg(
                 ctx, chat_id, g,
@@ -7594,7 +8772,7 @@ async def _nem_deng_count(ctx, chat_id, g):
                     "⚖️ حذفی رأی‌دهنده ندارد — تعیینِ نماینده‌ها با گاد.")
                 return
             g.nem_deng_cands = list(tops)
-            store.save()
+            store.save(chat_id)
             frm = _frm_next()
             await _deng_round_msg(
                 ctx, chat_id, g,
@@ -7615,7 +8793,7 @@ async def _nem_deng_count(ctx, chat_id, g):
         return
     g.nem_deng_cands = list(tops)
     g.nem_deng_stage = 3
-    store.save()
+    store.save(chat_id)
     frm = _frm_next()
     await _deng_round_msg(
         ctx, chat_id, g,
@@ -7637,7 +8815,7 @@ async def _nem_deng_finish(ctx, chat_id, g, a, b, counts):
     g.nem_deng_stage = 0
     g.nem_deng_first = None
     g.nem_deng_cands = []
-    store.save()
+    store.save(chat_id)
     na = escape(g.seats[a][1], quote=False) if a in g.seats else "?"
     nb = escape(g.seats[b][1], quote=False) if b in g.seats else "?"
     await ctx.bot.send_message(
@@ -7648,6 +8826,7 @@ async def _nem_deng_finish(ctx, chat_id, g, a, b, counts):
                         f"🗳 دنگِ نمایندگی: اول {a}، دوم {b} — با «باز» ازت تأیید می‌گیرم.")
 
 
+@callback_route("nemd_", "nemc_")
 async def handle_nem_deng_callback(update, ctx):
     """🗳 پایانِ شمارش (گاد) + تأیید/ردِ نتیجه در «باز»."""
     q = update.callback_query
@@ -7670,7 +8849,7 @@ async def handle_nem_deng_callback(update, ctx):
 
     # nemc_*: دکمه‌ی پیوی → بازی‌ای که نتیجه‌ی معلق دارد (نه اولین بازیِ این گاد)
     g = None; chat_id = None
-    for cid, game in store.games.items():
+    for cid, game in store.index.god_games(uid):
         if (game.god_id == uid and game.phase not in ("idle", "ended")
                 and _is_nemayande_scenario(game)
                 and getattr(game, "nem_deng_result", None) and not game.nem_reps):
@@ -7692,7 +8871,7 @@ async def handle_nem_deng_callback(update, ctx):
         g.nem_deng_result = None
         g.nem_awaiting_reps = False
         g.nem_awaiting_ding = True
-        store.save()
+        store.save(chat_id)
         await _close_pm(ctx, uid, mid,
                         f"✅ نماینده‌ها ثبت شدند: اول {res[0]}. {g.seats[res[0]][1]} — "
                         f"دوم {res[1]}. {g.seats[res[1]][1]}")
@@ -7708,7 +8887,7 @@ async def handle_nem_deng_callback(update, ctx):
         g.nem_deng_result = None
         g.nem_awaiting_reps = True
         g.nem_reps_tmp = []
-        store.save()
+        store.save(chat_id)
         await _edit_pm(ctx, uid, mid,
                        "🗳 چه کسانی نماینده شدند؟ (به ترتیب: اولین انتخاب = نماینده اول)",
                        _nem_reps_kb(g, []))
@@ -7748,18 +8927,19 @@ async def _nem_ding_prompt_don(ctx, g):
     don = _find_seat_by_role(g, _R_DON)
     if don is None:
         g.nem_awaiting_ding = False
-        store.save()
+        store.save(_game_chat_id(g))
         await _night_report(ctx, g, "🗡 دن‌مافیا زنده نیست — دنگ خیانت منتفی شد.")
         return
     kb = _nem_ding_kb(g, don)
     if kb is None:
         g.nem_awaiting_ding = False
-        store.save()
+        store.save(_game_chat_id(g))
         await _night_report(ctx, g, "🗡 هر دو نماینده خودِ دن بودند؟! دنگ خیانت منتفی.")
         return
     await _safe_pm(ctx, g.seats[don][0], _NDING_ASK, kb)
 
 
+@callback_route("nrep_", "nding_", "ndsign_")
 async def handle_nem_ding_callback(update, ctx):
     """🗡 دنگ خیانت: انتخابِ نماینده‌ها (گاد) + انتخابِ دن (نماینده و مثبت/منفی)."""
     q = update.callback_query
@@ -7769,7 +8949,7 @@ async def handle_nem_ding_callback(update, ctx):
     # انتخاب نماینده‌ها توسط گاد
     if data.startswith("nrep_"):
         g = None; chat_id = None
-        for cid, game in store.games.items():
+        for cid, game in store.index.god_games(uid):
             if getattr(game, "nem_awaiting_reps", False) and game.god_id == uid:
                 g, chat_id = game, cid
                 break
@@ -7786,7 +8966,7 @@ async def handle_nem_ding_callback(update, ctx):
             g.nem_reps_tmp = []
             g.nem_awaiting_reps = False
             g.nem_awaiting_ding = True
-            store.save()
+            store.save(chat_id)
             r1, r2 = g.nem_reps
             await _close_pm(ctx, uid, mid,
                             f"✅ نماینده‌ها ثبت شدند:\nاول: {r1}. {g.seats[r1][1]}\nدوم: {r2}. {g.seats[r2][1]}")
@@ -7802,7 +8982,7 @@ async def handle_nem_ding_callback(update, ctx):
             await safe_q_answer(q, "حداکثر ۲ نفر.", show_alert=True)
             return
         g.nem_reps_tmp = tmp
-        store.save()
+        store.save(chat_id)
         await _edit_pm(ctx, uid, mid,
                        "🗳 چه کسانی نماینده شدند؟ (به ترتیب: اولین انتخاب = نماینده اول)",
                        _nem_reps_kb(g, tmp))
@@ -7810,7 +8990,7 @@ async def handle_nem_ding_callback(update, ctx):
 
     # انتخابِ دن: کدام نماینده + مثبت/منفی
     g = None; chat_id = None
-    for cid, game in store.games.items():
+    for cid, game in store.index.games_of(uid):
         if not getattr(game, "nem_awaiting_ding", False):
             continue
         don = _find_seat_by_role(game, _R_DON)
@@ -7826,7 +9006,7 @@ async def handle_nem_ding_callback(update, ctx):
     # ↩️ بازگشت به انتخابِ نماینده (تا قبل از ثبتِ مثبت/منفی)
     if data == "nding_back":
         g.nem_ding = None
-        store.save()
+        store.save(chat_id)
         don = _find_seat_by_role(g, _R_DON)
         kb = _nem_ding_kb(g, don) if don is not None else None
         if kb is None:
@@ -7838,7 +9018,7 @@ async def handle_nem_ding_callback(update, ctx):
     if data.startswith("nding_"):
         i = int(data.rsplit("_", 1)[1])
         g.nem_ding = (i, 0)   # علامت بعداً
-        store.save()
+        store.save(chat_id)
         kb = InlineKeyboardMarkup([
             [
                 InlineKeyboardButton("➕ مثبت", callback_data="ndsign_p"),
@@ -7857,7 +9037,7 @@ async def handle_nem_ding_callback(update, ctx):
         sign = 1 if data == "ndsign_p" else -1
         g.nem_ding = (i, sign)
         g.nem_awaiting_ding = False
-        store.save()
+        store.save(chat_id)
         lbl = "اول" if i == 0 else "دوم"
         s_lbl = "مثبت (+۱)" if sign > 0 else "منفی (−۱)"
         rep = g.nem_reps[i]
@@ -7891,7 +9071,7 @@ async def _do_room_close(ctx, chat_id, g):
             chat_id, "🔫 وقتی دفاعِ دو نفر تمام شد، گاد دکمه‌ی «اکت گان» را بزند.",
             reply_markup=kb)
         g.kp_gun_msg_id = m.message_id
-        store.save()
+        store.save(chat_id)
 
     # 🏛 شاهنامه: با «بسته»، نتیجهٔ نظرِ انجمن اعلام و رأیِ نهایی ساخته می‌شود
     if (_is_shahname_scenario(g) and (getattr(g, "sh_duels", []) or [])
@@ -7899,6 +9079,7 @@ async def _do_room_close(ctx, chat_id, g):
         await _sh_council_resolve(ctx, chat_id, g)
 
 
+@callback_route("night_", after=_after_night_act)
 async def handle_night_callback(update, ctx):
     q = update.callback_query
     data = q.data
@@ -7908,12 +9089,10 @@ async def handle_night_callback(update, ctx):
     g = None
     chat_id = None
     candidates = []
-    for cid, game in store.games.items():
-        if not (getattr(game, "night_active", False)
+    for cid, game, _seat in store.index.player_games(uid):
+        if (getattr(game, "night_active", False)
                 or getattr(game, "night_awaiting_sacrifice", False)
                 or getattr(game, "maarefe_active", False)):
-            continue
-        if _seat_of_uid(game, uid) is not None:
             candidates.append((cid, game))
     for cid, game in candidates:
         if q.message and (game.night_pm_msgs or {}).get(uid) == q.message.message_id:
@@ -7936,7 +9115,7 @@ async def handle_night_callback(update, ctx):
             g.night_is_negotiation = False
             g.negotiation_used = False
             g.night_stage = None
-        store.save()
+        store.save(chat_id)
         kb = InlineKeyboardMarkup([
             [InlineKeyboardButton("🤝 مذاکره", callback_data="night_dec_negotiate")],
             [InlineKeyboardButton("🔫 شات",    callback_data="night_dec_shoot")],
@@ -7950,12 +9129,12 @@ async def handle_night_callback(update, ctx):
             m = await _safe_pm(ctx, dec_uid, f"🌙 شب {g.night_number}\nمذاکره یا شات؟", kb)
             if m:
                 g.night_pm_msgs[dec_uid] = m.message_id
-                store.save()
+                store.save(chat_id)
         return
 
     if data == "night_dec_shoot":
         g.night_is_negotiation = False
-        store.save()
+        store.save(chat_id)
         targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
         await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
                        _kb_add_back(_kb_night_seats(targets, g, "night_shot_",
@@ -7973,7 +9152,7 @@ async def handle_night_callback(update, ctx):
         g.night_is_negotiation = True
         g.night_stage = "negotiator_pick"
         g.negotiation_used = True   # مذاکره مثل تک‌تیر؛ به‌محض انتخاب گادفادر مصرف می‌شود
-        store.save()
+        store.save(chat_id)
         neg_uid, _nn = g.seats[neg]
         targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
         kb = _kb_add_back(_kb_night_seats(targets, g, "night_neg_",
@@ -7988,7 +9167,7 @@ async def handle_night_callback(update, ctx):
             m = await _safe_pm(ctx, neg_uid, "🤝 با چه کسی مذاکره می‌کنی؟", kb)
             if m:
                 g.night_pm_msgs[neg_uid] = m.message_id
-        store.save()
+        store.save(chat_id)
         return
 
     # ── شلیک مافیا (decider) ──
@@ -8003,14 +9182,14 @@ async def handle_night_callback(update, ctx):
         await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {tname}")
         await _night_report(ctx, g, f"🔫 شلیک مافیا → <b>{s}. {escape(tname, quote=False)}</b>")
         g.night_done.add("mafia")
-        store.save()
+        store.save(chat_id)
         await _night_open_citizens(ctx, chat_id, g)
         return
 
     if data.startswith("night_shot_"):
         s = int(data.rsplit("_", 1)[1])
         g.night_sel[uid] = s
-        store.save()
+        store.save(chat_id)
         targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
         await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
                        _kb_add_back(_kb_night_seats(targets, g, "night_shot_", selected=s,
@@ -8044,7 +9223,7 @@ async def handle_night_callback(update, ctx):
             await _night_report(ctx, g, f"🤝 مذاکره با <b>{s}. {escape(tname, quote=False)}</b> → نقش قابل جذب نبود ❌")
         await _close_pm(ctx, uid, mid, "✅ مذاکره ثبت شد.")
         g.night_done.add("mafia")
-        store.save()
+        store.save(chat_id)
         await _broadcast_negotiation_night(ctx, g)
         await _night_open_citizens(ctx, chat_id, g)
         return
@@ -8052,7 +9231,7 @@ async def handle_night_callback(update, ctx):
     if data.startswith("night_neg_"):
         s = int(data.rsplit("_", 1)[1])
         g.night_sel[uid] = s
-        store.save()
+        store.save(chat_id)
         targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
         await _edit_pm(ctx, uid, mid, "🤝 با چه کسی مذاکره می‌کنی؟",
                        _kb_add_back(_kb_night_seats(targets, g, "night_neg_", selected=s,
@@ -8070,7 +9249,7 @@ async def handle_night_callback(update, ctx):
         await _close_pm(ctx, uid, mid, f"🔎 استعلام {s}. {tname}: {res}")
         await _night_report(ctx, g, f"🔎 کاراگاه → استعلام {s}. {escape(tname, quote=False)}: <b>{res}</b>")
         g.night_done.add("detective")
-        store.save()
+        store.save(chat_id)
         return
 
     # ── خبرنگار (مستقیم) ──
@@ -8083,7 +9262,7 @@ async def handle_night_callback(update, ctx):
         await _close_pm(ctx, uid, mid, f"📰 استعلام {s}. {tname}: {res}")
         await _night_report(ctx, g, f"📰 خبرنگار → استعلام {s}. {escape(tname, quote=False)}: <b>{res}</b>")
         g.night_done.add("reporter")
-        store.save()
+        store.save(chat_id)
         return
 
     # ── پزشک (چندانتخابی) ──
@@ -8100,7 +9279,7 @@ async def handle_night_callback(update, ctx):
         await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {names}")
         await _night_report(ctx, g, f"💉 پزشک → سیو: <b>{escape(names, quote=False)}</b>")
         g.night_done.add("doctor")
-        store.save()
+        store.save(chat_id)
         return
 
     if data.startswith("night_doc_"):
@@ -8115,7 +9294,7 @@ async def handle_night_callback(update, ctx):
         else:
             sel.add(s)
         g.night_doc_sel[uid] = list(sel)
-        store.save()
+        store.save(chat_id)
         doc = _seat_of_uid(g, uid)
         await _edit_pm(ctx, uid, mid, f"💉 چه کسی را سیو می‌دهی؟ (تا {need} نفر)",
                        _kb_night_seats(_doctor_targets(g, doc), g, "night_doc_",
@@ -8127,7 +9306,7 @@ async def handle_night_callback(update, ctx):
         await _close_pm(ctx, uid, mid, "🚫 از تیر استفاده نکردی.")
         await _night_report(ctx, g, "🎯 تک‌تیرانداز → شلیک نکرد")
         g.night_done.add("sniper")
-        store.save()
+        store.save(chat_id)
         return
 
     if data == "night_snipe_yes":
@@ -8149,13 +9328,13 @@ async def handle_night_callback(update, ctx):
         await _close_pm(ctx, uid, mid, f"🎯 شلیک ثبت شد: {s}. {tname}")
         await _night_report(ctx, g, f"🎯 تک‌تیرانداز → شلیک به <b>{s}. {escape(tname, quote=False)}</b>")
         g.night_done.add("sniper")
-        store.save()
+        store.save(chat_id)
         return
 
     if data.startswith("night_snipe_"):
         s = int(data.rsplit("_", 1)[1])
         g.night_sel[uid] = s
-        store.save()
+        store.save(chat_id)
         sn = _seat_of_uid(g, uid)
         targets = [x for x in _alive_seats(g) if x != sn]
         await _edit_pm(ctx, uid, mid, "🎯 به چه کسی شلیک می‌کنی؟",
@@ -8184,7 +9363,7 @@ def _find_sniper(g, alive_only=True):
 
 
 def _is_baazpors_scenario(g) -> bool:
-    return bool(getattr(g, "scenario", None)) and (_nz(BAAZPORS_KEY) in _nz(g.scenario.name))
+    return "bzp" in _scenario_traits(g)
 
 
 # ═════════════════════════════════════════════════════════════
@@ -8198,198 +9377,27 @@ _R_MAJHOOL = _nz("مجهول")
 
 
 def _is_cover_scenario(g) -> bool:
-    return bool(getattr(g, "scenario", None)) and (_nz(COVER_KEY) in _nz(g.scenario.name))
-
-
-def _cvb_find_game(uid):
-    """بازیِ کاوربازپرسِ این کاربر.
-    ⚠️ عمداً به night_active/maarefe_active وابسته نیست — ممکن است گاد «روز» را
-       زده باشد و دعوت‌شده تازه بعدش دکمه را بزند؛ نباید گم شود."""
-    for cid, game in store.games.items():
-        if game.phase in ("idle", "ended"):
-            continue
-        if _is_cover_scenario(game) and _seat_of_uid(game, uid) is not None:
-            return game, cid
-    return None, None
-
-
-def _cvb_pick_targets(g, nato):
-    """همهٔ بازیکن‌ها به‌جز خودِ ناتو و شیاد."""
-    shiad = _find_seat_by_role(g, _R_SHIAD, alive_only=False)
-    return [s for s in sorted(g.seats) if s != nato and s != shiad]
-
-
-async def _cvb_start(ctx, chat_id, g):
-    """🕵️ معارفهٔ کاوربازپرس: ناتو انتخاب می‌کند چه کسی به تیم اضافه شود."""
-    nato = _find_seat_by_role(g, _R_NATO, alive_only=False)
-    if nato is None:
-        await _night_report(ctx, g, "🕵️ ناتو در بازی نیست — دعوت‌نامهٔ کاوربازپرس انجام نشد.")
-        return
-    g.cvb_asking = True
-    g.cvb_invite_seat = None
-    store.save()
-    nuid = g.seats[nato][0]
-    m = await _safe_pm(ctx, nuid, "🕵️ کدام شماره را دوست داری به تیمت اضافه کنی؟",
-                       _kb_night_seats(_cvb_pick_targets(g, nato), g, "cvb_pick_",
-                                       selected=g.night_sel.get(nuid),
-                                       confirm_cb="cvb_pick_confirm"))
-    if m:
-        g.night_pm_msgs[nuid] = m.message_id
-    else:
-        await _night_report(ctx, g, "⚠️ پیویِ ناتو بسته است — دعوت‌نامه فرستاده نشد؛ "
-                                    "با «اکتِ دستی» می‌توانی جای او انتخاب کنی.")
-    store.save()
-
-
-async def _cvb_make_godfather(ctx, g, seat):
-    """😈 این صندلی گادفادرِ تیم می‌شود: نقش و ساید عوض، لینکِ اتاق، اعلام در اتاق."""
-    old = (g.assigned_roles or {}).get(seat, "—")
-    if not getattr(g, "cvb_orig_roles", None):
-        g.cvb_orig_roles = {}
-    g.cvb_orig_roles.setdefault(seat, old)
-    g.assigned_roles[seat] = "گادفادر"
-    if getattr(g, "seat_sides", None) is not None:
-        g.seat_sides[seat] = "مافیا"
-    g.cvb_gf_seat = seat
-    g.cvb_done = True
-    g.cvb_asking = False
-    g.cvb_invite_seat = None
-    store.save()
-    uid = g.seats[seat][0]
-    mates = [f"{m}. {g.seats[m][1]} — {g.assigned_roles.get(m, '—')}"
-             for m in sorted(_mafia_seats(g)) if m != seat]
-    try:
-        await ctx.bot.send_message(
-            uid, "😈 نقش شما: <b>گادفادر</b>\n\n😈 یاران مافیای شما:\n"
-                 + ("\n".join(mates) if mates else "—"), parse_mode="HTML")
-    except Exception:
-        pass
-    await _room_send_link(ctx, g, uid)
-    await _room_note(ctx, g, f"😈 <b>{_room_who(g, seat)}</b> به تیم اضافه شد — گادفادر.")
-    await _night_report(ctx, g, f"😈 گادفادرِ تیم: <b>{_room_who(g, seat)}</b> "
-                                f"(نقشِ قبلی: {escape(str(old), quote=False)})")
-
-
-async def _cvb_accept(ctx, g, seat):
-    """✅ دعوت پذیرفته شد: نقشِ شهروندیِ این نفر به مجهول می‌رسد و خودش گادفادر می‌شود."""
-    old = (g.assigned_roles or {}).get(seat, "—")
-    mj = _find_seat_by_role(g, _R_MAJHOOL, alive_only=False)
-    if mj is not None:
-        if not getattr(g, "cvb_orig_roles", None):
-            g.cvb_orig_roles = {}
-        g.cvb_orig_roles.setdefault(mj, (g.assigned_roles or {}).get(mj, "مجهول"))
-        g.assigned_roles[mj] = old
-        if getattr(g, "seat_sides", None) is not None:
-            g.seat_sides[mj] = "شهر"
-        store.save()
-        try:
-            await ctx.bot.send_message(g.seats[mj][0],
-                                       f"🎭 نقش شما: <b>{escape(str(old), quote=False)}</b>",
-                                       parse_mode="HTML")
-        except Exception:
-            pass
-        await _night_report(ctx, g, f"🎭 مجهول ({_room_who(g, mj)}) نقشِ "
-                                    f"<b>{escape(str(old), quote=False)}</b> را گرفت.")
-    else:
-        await _night_report(ctx, g, "⚠️ مجهولی در بازی نیست — نقشِ آزادشده به کسی نرسید.")
-    await _cvb_make_godfather(ctx, g, seat)
+    return "cover" in _scenario_traits(g)
 
 
-async def handle_cover_callback(update, ctx):
-    """🕵️ دعوت‌نامهٔ کاوربازپرس — انتخابِ ناتو و جوابِ دعوت‌شده."""
-    q = update.callback_query
-    data = q.data
-    uid = _q_uid(q)   # 🎛 اکتِ دستیِ گاد هم پشتیبانی می‌شود
-    g, chat_id = _cvb_find_game(uid)
-    if g is None:
-        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
-        return
-    await safe_q_answer(q)
-    mid = q.message.message_id if q.message else None
-
-    # ── انتخابِ ناتو ──
-    if data == "cvb_pick_confirm":
-        if getattr(g, "cvb_done", False) or not getattr(g, "cvb_asking", False):
-            return
-        if _seat_of_uid(g, uid) != _find_seat_by_role(g, _R_NATO, alive_only=False):
-            return
-        s = g.night_sel.get(uid)
-        if not s or s not in g.seats:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.cvb_asking = False
-        g.cvb_invite_seat = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        tname = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"🕵️ {s}. {tname} را انتخاب کردی.")
-        await _night_report(ctx, g, f"🕵️ ناتو → دعوت به تیم: <b>{s}. {escape(tname, quote=False)}</b>")
-        # 🎭 اگر خودِ مجهول انتخاب شود، دعوت‌نامه‌ای در کار نیست — مستقیم گادفادر می‌شود
-        if _seat_role_norm(g, s) == _R_MAJHOOL:
-            await _cvb_make_godfather(ctx, g, s)
-            return
-        kb = InlineKeyboardMarkup([
-            [InlineKeyboardButton("✅ بله", callback_data="cvb_ans_yes")],
-            [InlineKeyboardButton("🚫 خیر", callback_data="cvb_ans_no")],
-        ])
-        m = await _safe_pm(ctx, g.seats[s][0],
-                           "😈 شما دعوت به تیمِ مافیا شدید — آیا قبول می‌کنید؟", kb)
-        if m:
-            g.night_pm_msgs[g.seats[s][0]] = m.message_id
-        else:
-            await _night_report(ctx, g, "⚠️ پیویِ دعوت‌شده بسته است — دعوت‌نامه نرسید؛ "
-                                        "با «اکتِ دستی» می‌توانی جای او جواب بدهی.")
-        store.save()
-        return
+# 🧩 توابعِ این موتور در engines/bzp.py است و با اولین صدا زدن بار می‌شود؛
+# تا آن موقع این اسم‌ها فقط جانشین‌اند.
+_cvb_start = _engine_fn("bzp", "_cvb_start", coro=True)
+_bzp_open_hunter = _engine_fn("bzp", "_bzp_open_hunter", coro=True)
+_bzp_open_gf_shiad = _engine_fn("bzp", "_bzp_open_gf_shiad", coro=True)
+_bzp_check_open_rest = _engine_fn("bzp", "_bzp_check_open_rest", coro=True)
 
-    if data.startswith("cvb_pick_"):
-        if getattr(g, "cvb_done", False) or not getattr(g, "cvb_asking", False):
-            return
-        nato = _seat_of_uid(g, uid)
-        if nato != _find_seat_by_role(g, _R_NATO, alive_only=False):
-            return
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        await _edit_pm(ctx, uid, mid, "🕵️ کدام شماره را دوست داری به تیمت اضافه کنی؟",
-                       _kb_night_seats(_cvb_pick_targets(g, nato), g, "cvb_pick_",
-                                       selected=s, confirm_cb="cvb_pick_confirm"))
-        return
 
-    # ── جوابِ دعوت‌شده ──
-    if data in ("cvb_ans_yes", "cvb_ans_no"):
-        if getattr(g, "cvb_done", False):
-            return
-        s = _seat_of_uid(g, uid)
-        if s is None or s != getattr(g, "cvb_invite_seat", None):
-            return
-        if data == "cvb_ans_yes":
-            await _close_pm(ctx, uid, mid, "✅ دعوت را پذیرفتی — به تیمِ مافیا خوش آمدی.")
-            await _night_report(ctx, g, f"✅ {_room_who(g, s)} دعوت را پذیرفت.")
-            await _cvb_accept(ctx, g, s)
-            return
-        await _close_pm(ctx, uid, mid, "🚫 دعوت را نپذیرفتی — نقشت همان است که بود.")
-        await _night_report(ctx, g, f"🚫 {_room_who(g, s)} دعوت را نپذیرفت.")
-        mj = _find_seat_by_role(g, _R_MAJHOOL, alive_only=False)
-        if mj is None:
-            await _night_report(ctx, g, "⚠️ مجهولی در بازی نیست — گادفادری به کسی نرسید.")
-            g.cvb_done = True
-            g.cvb_invite_seat = None
-            store.save()
-            return
-        await _cvb_make_godfather(ctx, g, mj)
-        return
+callback_route('cvb_', after=_after_night_act)(_engine_fn("bzp", "handle_cover_callback", coro=True))
 
 
 def _find_active_night_game(uid, q):
     """پیدا کردن بازیِ فعالِ شب که این کاربر در آن بازیکن است (مشترک بین موتورها)."""
     candidates = []
-    for cid, game in store.games.items():
-        if not (getattr(game, "night_active", False)
+    for cid, game, _seat in store.index.player_games(uid):
+        if (getattr(game, "night_active", False)
                 or getattr(game, "night_awaiting_sacrifice", False)
                 or getattr(game, "maarefe_active", False)):
-            continue
-        if _seat_of_uid(game, uid) is not None:
             candidates.append((cid, game))
     for cid, game in candidates:
         if q.message and (game.night_pm_msgs or {}).get(uid) == q.message.message_id:
@@ -8399,19 +9407,6 @@ def _find_active_night_game(uid, q):
     return None, None
 
 
-def _bzp_detective_positive(g, seat) -> bool:
-    rn = _seat_role_norm(g, seat)
-    # نقش‌هایی که معمولاً مثبت‌اند: شیاد، ناتو، و فرد یاکوزایی‌شده
-    positive_role = (seat in (g.negotiated_seats or set())) or (rn in (_R_SHIAD, _R_NATO))
-    if not positive_role:
-        return False  # گادفادر و شهروندان منفی
-    # اگر شیاد کاراگاه را درست حدس زده باشد → استتار (هر سه منفی می‌شوند)
-    det = _find_seat_by_role(g, _R_DETECTIVE)
-    if g.night_shiad_guess is not None and det is not None and g.night_shiad_guess == det:
-        return False
-    return True
-
-
 HUNTER_DRAG_DELAY = 90   # ⏳ بعد از خروجِ روزِ هانتر، این‌قدر صبر (وصیت) و بعد اعلام
 
 
@@ -8450,7 +9445,7 @@ def _bzp_hunter_day_exit(ctx, chat_id, g, hunter_seat):
             if ht not in g.seats or ht in (g.striked or set()):
                 return          # بسته‌شده خودش قبلاً رفته
             g.striked.add(ht)
-            store.save()
+            store.save(chat_id)
             await ctx.bot.send_message(
                 chat_id,
                 f"🪢 {hunter_seat}. {hn} <b>هانتر</b> بود و {ht}. {tn} را با خودش برد — "
@@ -8490,6601 +9485,390 @@ async def _bzp_broadcast_special(ctx, g, kind):
             pass
 
 
-async def _bzp_open_hunter(ctx, chat_id, g):
-    h = _find_seat_by_role(g, _R_HUNTER)
-    if not h:
-        g.night_done.add("hunter")
-        store.save()
-        if _dead_priority_delay(g, _R_HUNTER):
-            # ⏳ هانترِ مرده — اکتِ مافیا/شیاد با ۱ دقیقه تأخیر (شیاد نفهمد هانتر نیست)
-            _open_next_delayed(ctx, chat_id, g, _bzp_open_gf_shiad)
-        else:
-            await _bzp_open_gf_shiad(ctx, chat_id, g)
-        return
-    huid, _hn = g.seats[h]
-    targets = [s for s in _alive_seats(g) if s != h]
-    m = await _safe_pm(ctx, huid, "🪢 خودت را به چه کسی می‌بندی؟",
-                       _kb_night_seats(targets, g, "bzp_hunt_",
-                                       selected=g.night_sel.get(huid), confirm_cb="bzp_hunt_confirm"))
-    if m:
-        g.night_pm_msgs[huid] = m.message_id
-    store.save()
-
-
-async def _bzp_open_gf_shiad(ctx, chat_id, g):
-    # 🔒 فقط یک‌بار در هر شب باز شود (مسیرِ عادی و مسیرِ سوزاندن هر دو صدایش می‌زنند)
-    if "bzp_mafia_opened" in (g.night_done or set()):
-        return
-    g.night_done.add("bzp_mafia_opened")
-    store.save()
-    # ── تصمیم‌گیرندهٔ مافیا: گادفادر → ناتو → شیاد → فرد یاکوزایی‌شده ──
-    gf_alive = _find_seat_by_role(g, _R_GODFATHER)
-    nato_alive = _find_seat_by_role(g, _R_NATO)
-    shiad_alive = _find_seat_by_role(g, _R_SHIAD)
-    converted = sorted(_mafia_seats(g, alive_only=True))
-    decider = gf_alive or nato_alive or shiad_alive or (converted[0] if converted else None)
-    if not decider:
-        g.night_done.add("mafia")
-    else:
-        g.bzp_decider_seat = decider
-        duid, _dn = g.seats[decider]
-        rows = [[InlineKeyboardButton("🔫 شات", callback_data="bzp_gf_shoot")]]
-        # یاکوزایی فقط وقتی گادفادر زنده است و مصرف نشده
-        if gf_alive is not None and not g.yakuza_used:
-            rows.append([InlineKeyboardButton("🥷 یاکوزایی", callback_data="bzp_gf_yakuza")])
-        # ناتویی فقط وقتی ناتو زنده است و یک‌بارِ مصرفش نرفته
-        if nato_alive is not None and not g.nato_used:
-            rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="bzp_gf_nato")])
-        m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:",
-                           InlineKeyboardMarkup(rows))
-        if m:
-            g.night_pm_msgs[duid] = m.message_id
+callback_route('bzp_', after=_after_night_act)(_engine_fn("bzp", "handle_baazpors_callback", coro=True))
 
-    # ── شیاد (حدس شمارهٔ کاراگاه) ──
-    sh = _find_seat_by_role(g, _R_SHIAD)
-    if not sh:
-        g.night_done.add("shiad")
-    else:
-        suid, _sn = g.seats[sh]
-        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
-        m = await _safe_pm(ctx, suid, "🎭 حدس بزن کدام شماره کاراگاه است:",
-                           _kb_night_seats(targets, g, "bzp_shiad_",
-                                           selected=g.night_sel.get(suid), confirm_cb="bzp_shiad_confirm"))
-        if m:
-            g.night_pm_msgs[suid] = m.message_id
-    store.save()
-    await _bzp_check_open_rest(ctx, chat_id, g)
 
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «نماینده»
+#  ترتیب اکت: مین‌گذار → (دن‌مافیا + هکر) → (وکیل/محافظ/پزشک/راهنما)
+# ═════════════════════════════════════════════════════════════
+NEMAYANDE_KEY = "نماینده"
+_R_DON    = _nz("دن‌مافیا")
+_R_HACKER = _nz("هکر")
+_R_YAGHI  = _nz("یاغی")
+_R_GUARD  = _nz("محافظ")
+_R_GUIDE  = _nz("راهنما")
+_R_MINER  = _nz("مین‌گذار")
+_R_LAWYER = _nz("وکیل")
 
-async def _bzp_check_open_rest(ctx, chat_id, g):
-    """بعد از اینکه هم اکت مافیا (گادفادر) و هم شیاد تمام شد، بقیهٔ اکت‌ها باز می‌شوند."""
-    if g.night_rest_opened:
-        return
-    if "mafia" not in g.night_done or "shiad" not in g.night_done:
-        return
-    g.night_rest_opened = True
-    store.save()
 
-    # 🔎 کاراگاه
-    det = _find_seat_by_role(g, _R_DETECTIVE)
-    if det:
-        duid, _dn = g.seats[det]
-        targets = [s for s in _alive_seats(g) if s != det]
-        if not targets:
-            await _night_report(ctx, g, "⚠️ کاراگاه هدفی برای استعلام ندارد (لیست خالی)!")
-        m = await _safe_pm(ctx, duid, "🔎 استعلام چه کسی را می‌گیری؟",
-                           _kb_night_seats(targets, g, "bzp_det_"))
-        if m:
-            g.night_pm_msgs[duid] = m.message_id
-        else:
-            await _night_report(ctx, g, "⚠️ سؤالِ اکتِ کاراگاه ارسال نشد (پیوی بسته یا خطای تلگرام) — "
-                                        "دوباره «شب» لازم نیست؛ اگر تکرار شد خبر بده.")
+def _is_nemayande_scenario(g) -> bool:
+    return "nem" in _scenario_traits(g)
 
-    # 💉 پزشک — در شب یاکوزایی/ناتویی حق سیو ندارد
-    if not g.night_doctor_blocked:
-        doc = _find_seat_by_role(g, _R_DOCTOR)
-        if doc:
-            duid, _dn = g.seats[doc]
-            g.night_doc_need = 1
-            targets = _doctor_targets(g, doc)
-            m = await _safe_pm(ctx, duid, "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
-                               _kb_night_seats(targets, g, "bzp_doc_", selected=set(),
-                                               confirm_cb="bzp_doc_confirm"))
-            if m:
-                g.night_pm_msgs[duid] = m.message_id
 
-    # 🧑‍⚖️ بازپرس — یکبار در کل بازی
-    if not g.baazpors_used:
-        bz = _find_seat_by_role(g, _R_BAAZPORS)
-        if bz:
-            buid, _bn = g.seats[bz]
-            kb = InlineKeyboardMarkup([
-                [InlineKeyboardButton("✅ بله", callback_data="bzp_baz_yes")],
-                [InlineKeyboardButton("🚫 خیر", callback_data="bzp_baz_no")],
-            ])
-            m = await _safe_pm(ctx, buid, "🧑‍⚖️ امشب از حق بازپرسی استفاده می‌کنی؟", kb)
-            if m:
-                g.night_pm_msgs[buid] = m.message_id
+# 🧩 توابعِ این موتور در engines/nem.py است و با اولین صدا زدن بار می‌شود؛
+# تا آن موقع این اسم‌ها فقط جانشین‌اند.
+_nem_yaghi_unlocked = _engine_fn("nem", "_nem_yaghi_unlocked")
+_nem_yaghi_start = _engine_fn("nem", "_nem_yaghi_start", coro=True)
+_nem_yaghi_apply = _engine_fn("nem", "_nem_yaghi_apply", coro=True)
+_nem_open_mine = _engine_fn("nem", "_nem_open_mine", coro=True)
+_nem_open_mafia = _engine_fn("nem", "_nem_open_mafia", coro=True)
+_nem_check_open_rest = _engine_fn("nem", "_nem_check_open_rest", coro=True)
 
-    # 🎯 اسنایپر (فقط ۱۲/۱۳ نفره) — یک تیر در کل بازی
-    if not g.sniper_used:
-        sn = _find_seat_by_role(g, _R_SNIPER_BZP)
-        if sn:
-            suid, _sn2 = g.seats[sn]
-            kb = InlineKeyboardMarkup([
-                [InlineKeyboardButton("🎯 بله، شلیک می‌کنم", callback_data="bzp_snipe_yes")],
-                [InlineKeyboardButton("🚫 خیر",            callback_data="bzp_snipe_no")],
-            ])
-            m = await _safe_pm(ctx, suid, "🎯 امشب از تیرت استفاده می‌کنی؟", kb)
-            if m:
-                g.night_pm_msgs[suid] = m.message_id
-    store.save()
 
+def _find_seat_role_sub(g, sub_norm, alive_only=True):
+    """یافتن صندلی که نقش نرمالایزش شامل sub_norm باشد (برای نقش‌هایی مثل «وکیل(شهر)»)."""
+    seats = _alive_seats(g) if alive_only else sorted(g.seats)
+    for s in seats:
+        if sub_norm in _seat_role_norm(g, s):
+            return s
+    return None
 
-async def handle_baazpors_callback(update, ctx):
-    q = update.callback_query
-    data = q.data
-    uid = _q_uid(q)   # 🎛 اکتِ دستی
-    g, chat_id = _find_active_night_game(uid, q)
-    if g is None:
-        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
-        return
-    await safe_q_answer(q)
-    mid = q.message.message_id if q.message else None
 
-    # ── هانتر ──
-    if data == "bzp_hunt_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_hunter_target = s
-        _tu, tname = g.seats[s]
-        # درست = هر مافیایی جز گادفادر (شیاد، ناتو، مافیا ساده، یاکوزایی‌شده)
-        correct = (s in _mafia_seats(g)) and (_seat_role_norm(g, s) != _R_GODFATHER)
-        tick = "✅" if correct else "❌"
-        await _close_pm(ctx, uid, mid, f"🪢 خودت را به {s}. {tname} بستی.")
-        await _night_report(ctx, g, f"🪢 هانتر → بست به {s}. {escape(tname, quote=False)} {tick}")
-        g.night_done.add("hunter")
-        store.save()
-        await _bzp_open_gf_shiad(ctx, chat_id, g)
-        return
+def _nem_citizen_role_names(g):
+    """نام دقیق نقش‌های شهروندی سناریو (برای دکمه‌های حدس نقشِ ناتویی)."""
+    mafia = set(_mafia_role_set(g))
+    names, seen = [], set()
+    for rname in (g.scenario.roles.keys() if g.scenario else []):
+        n = _nz(rname)
+        if n in mafia or n in seen:
+            continue
+        seen.add(n)
+        names.append(rname)
+    return names
 
-    if data.startswith("bzp_hunt_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        h = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != h]
-        await _edit_pm(ctx, uid, mid, "🪢 خودت را به چه کسی می‌بندی؟",
-                       _kb_night_seats(targets, g, "bzp_hunt_", selected=s, confirm_cb="bzp_hunt_confirm"))
-        return
 
-    # ── تصمیم گادفادر ──
-    if data == "bzp_act_back":
-        # ↩️ برگشت به منوی اکتِ مافیا — یاکوزاییِ تأییدنشده آزاد می‌شود
-        g.night_sel.pop(uid, None)
-        if getattr(g, "bzp_yak_tmp", False):
-            g.yakuza_used = False
-            g.night_yakuza_sacrifice = None
-            g.bzp_yak_tmp = False
-        store.save()
-        _gf = _find_seat_by_role(g, _R_GODFATHER)
-        _nato = _find_seat_by_role(g, _R_NATO)
-        rows = [[InlineKeyboardButton("🔫 شات", callback_data="bzp_gf_shoot")]]
-        if _gf is not None and not g.yakuza_used:
-            rows.append([InlineKeyboardButton("🥷 یاکوزایی", callback_data="bzp_gf_yakuza")])
-        if _nato is not None and not g.nato_used:
-            rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="bzp_gf_nato")])
-        kb = InlineKeyboardMarkup(rows)
-        dec = getattr(g, "bzp_decider_seat", None)
-        dec_uid = g.seats[dec][0] if dec in g.seats else None
-        if dec_uid == uid or dec_uid is None:
-            await _edit_pm(ctx, uid, mid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
-        else:
-            await _close_pm(ctx, uid, mid, "↩️ تصمیم به تصمیم‌گیرِ مافیا برگشت.")
-            m = await _safe_pm(ctx, dec_uid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
-            if m:
-                g.night_pm_msgs[dec_uid] = m.message_id
-                store.save()
-        return
+callback_route('nem_', after=_after_night_act)(_engine_fn("nem", "handle_nemayande_callback", coro=True))
 
-    if data == "bzp_gf_shoot":
-        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_add_back(_kb_night_seats(targets, g, "bzp_shot_",
-                                                    selected=g.night_sel.get(uid),
-                                                    confirm_cb="bzp_shot_confirm"),
-                                    "bzp_act_back"))
-        return
-
-    if data == "bzp_gf_yakuza":
-        g.yakuza_used = True
-        g.bzp_yak_tmp = True   # ↩️ تا تأیید، قابلِ برگشت
-        store.save()
-        me = _seat_of_uid(g, uid)
-        teammates = [s for s in _mafia_seats(g, alive_only=True) if s != me]
-        if not teammates:
-            g.night_yakuza_sacrifice = me
-            g.night_sel.pop(uid, None)
-            store.save()
-            targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
-            await _edit_pm(ctx, uid, mid, "🥷 یاری نداری؛ خودت فدا می‌شوی.\nبا چه کسی یاکوزایی می‌کنی؟",
-                           _kb_add_back(_kb_night_seats(targets, g, "bzp_yakrec_",
-                                                        confirm_cb="bzp_yakrec_confirm"),
-                                        "bzp_act_back"))
-        else:
-            await _edit_pm(ctx, uid, mid, "🥷 کدام یارت را فدا می‌کنی؟",
-                           _kb_add_back(_kb_night_seats(teammates, g, "bzp_yaksac_",
-                                                        selected=g.night_sel.get(uid),
-                                                        confirm_cb="bzp_yaksac_confirm"),
-                                        "bzp_act_back"))
-        return
 
-    if data == "bzp_gf_nato":
-        # 🕵️ یک‌بار در کلِ بازی — نگهبانِ اینجا برای کیبوردِ کهنه‌ی شب‌های قبل است
-        if g.nato_used:
-            await safe_q_answer(q, "ناتویی قبلاً استفاده شده.", show_alert=True)
-            return
-        nato = _find_seat_by_role(g, _R_NATO)
-        if nato is None:
-            await safe_q_answer(q, "ناتو زنده نیست.", show_alert=True)
-            return
-        nato_uid, _nn = g.seats[nato]
-        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
-        kb = _kb_add_back(_kb_night_seats(targets, g, "bzp_nato_",
-                                          selected=g.night_sel.get(nato_uid),
-                                          confirm_cb="bzp_nato_confirm"),
-                          "bzp_act_back")
-        if nato_uid == uid:
-            await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟", kb)
-            g.night_pm_msgs[nato_uid] = mid
-        else:
-            await _close_pm(ctx, uid, mid, "🕵️ ناتویی انتخاب شد. منتظر ناتو بمانید.")
-            m = await _safe_pm(ctx, nato_uid, "🕵️ چه کسی را ناتویی می‌کنی؟", kb)
-            if m:
-                g.night_pm_msgs[nato_uid] = m.message_id
-        store.save()
-        return
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «تکاور»
+#  ترتیب: (سوال شیلد از گاد) → نگهبان + گروگانگیر → مافیا →
+#          کاراگاه/پزشک/تکاور → تفنگدار (آخر از همه)
+# ═════════════════════════════════════════════════════════════
+TAKAVAR_KEY  = "تکاور"
+_R_HOSTAGE   = _nz("گروگانگیر")
+_R_WATCHMAN  = _nz("نگهبان")
+_R_GUNMAN    = _nz("تفنگدار")
+_R_COMMANDO  = _nz("تکاور")
 
-    # ── شلیک گادفادر ──
-    if data == "bzp_shot_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_shot_target = s
-        await _room_announce_shot(ctx, g, s)
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {tname}")
-        await _night_report(ctx, g, f"🔫 شلیک مافیا → <b>{s}. {escape(tname, quote=False)}</b>")
-        g.night_done.add("mafia")
-        store.save()
-        await _bzp_check_open_rest(ctx, chat_id, g)
-        return
 
-    if data.startswith("bzp_shot_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_add_back(_kb_night_seats(targets, g, "bzp_shot_", selected=s,
-                                                    confirm_cb="bzp_shot_confirm"),
-                                    "bzp_act_back"))
-        return
+def _is_takavar_scenario(g) -> bool:
+    return "tk" in _scenario_traits(g)
 
-    # ── یاکوزایی: فدا کردن یار ──
-    if data == "bzp_yaksac_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک یار را انتخاب کن.", show_alert=True)
-            return
-        g.night_yakuza_sacrifice = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
-        await _edit_pm(ctx, uid, mid, "🥷 با چه کسی یاکوزایی می‌کنی؟",
-                       _kb_night_seats(targets, g, "bzp_yakrec_", confirm_cb="bzp_yakrec_confirm"))
-        return
 
-    if data.startswith("bzp_yaksac_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        me = _seat_of_uid(g, uid)
-        teammates = [x for x in _mafia_seats(g, alive_only=True) if x != me]
-        await _edit_pm(ctx, uid, mid, "🥷 کدام یارت را فدا می‌کنی؟",
-                       _kb_add_back(_kb_night_seats(teammates, g, "bzp_yaksac_", selected=s,
-                                                    confirm_cb="bzp_yaksac_confirm"),
-                                    "bzp_act_back"))
-        return
+# 🧩 توابعِ این موتور در engines/tk.py است و با اولین صدا زدن بار می‌شود؛
+# تا آن موقع این اسم‌ها فقط جانشین‌اند.
+_tk_open_shield = _engine_fn("tk", "_tk_open_shield", coro=True)
+_tk_check_open_mafia = _engine_fn("tk", "_tk_check_open_mafia", coro=True)
+_tk_check_open_citizens = _engine_fn("tk", "_tk_check_open_citizens", coro=True)
+_tk_check_open_gunman = _engine_fn("tk", "_tk_check_open_gunman", coro=True)
+_tk_day_gun_fire = _engine_fn("tk", "_tk_day_gun_fire", coro=True)
 
-    # ── یاکوزایی: جذب شهروند ──
-    if data == "bzp_yakrec_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        tu, tname = g.seats[s]
-        rn = _seat_role_norm(g, s)
-        if rn in _R_CITIZEN:
-            converted = True
-        elif rn == _R_ROUIN:
-            converted = (g.max_seats != 12)  # در بازپرس ۱۲ نفره رویین‌تن خریداری نمی‌شود
-        else:
-            converted = False
-        sac = g.night_yakuza_sacrifice
-        sac_txt = f"{sac}. {g.seats[sac][1]}" if sac in g.seats else "—"
-        if converted:
-            g.negotiated_seats.add(s)
-            try:
-                await ctx.bot.send_message(tu, "🥷 با شما یاکوزایی شد. اکنون «مافیا ساده» هستید.")
-            except Exception:
-                pass
-            await _room_send_link(ctx, g, tu)   # لینک اتاق مافیا فوری
-            await _night_report(ctx, g, f"🥷 یاکوزایی → فدا: {sac_txt} | جذب: <b>{s}. {escape(tname, quote=False)}</b> → مافیا ساده ✅")
-        else:
-            await _night_report(ctx, g, f"🥷 یاکوزایی → فدا: {sac_txt} | جذب: <b>{s}. {escape(tname, quote=False)}</b> → ناموفق ❌")
-        # 📣 اتاقِ مافیا: بدونِ تیک/ضربدر و بدونِ «ناموفق» — هر دو حالت یک متنِ یکسان،
-        #    وگرنه تیم از روی همین پیام می‌فهمد اکت گرفته یا نه
-        await _room_note(ctx, g, f"🥷 یاکوزایی — فدا: <b>{escape(sac_txt, quote=False)}</b> | "
-                         f"جذب: <b>{_room_who(g, s)}</b>")
-        await _close_pm(ctx, uid, mid, "✅ یاکوزایی ثبت شد.")
-        g.night_doctor_blocked = True
-        g.night_done.add("mafia")
-        store.save()
-        await _bzp_broadcast_special(ctx, g, "یاکوزایی")
-        await _bzp_check_open_rest(ctx, chat_id, g)
-        return
-
-    if data.startswith("bzp_yakrec_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
-        await _edit_pm(ctx, uid, mid, "🥷 با چه کسی یاکوزایی می‌کنی؟",
-                       _kb_add_back(_kb_night_seats(targets, g, "bzp_yakrec_", selected=s,
-                                                    confirm_cb="bzp_yakrec_confirm"),
-                                    "bzp_act_back"))
-        return
-
-    # ── ناتویی: انتخاب هدف، سپس حدس نقش ──
-    if data.startswith("bzp_natorole_"):
-        i = int(data.rsplit("_", 1)[1])
-        guess_name = _BZP_CITIZEN_ROLE_NAMES[i]
-        s = g.night_nato_seat
-        if not s:
-            await safe_q_answer(q, "اول هدف را انتخاب کن.", show_alert=True)
-            return
-        _tu, tname = g.seats[s]
-        correct = (_nz(guess_name) == _seat_role_norm(g, s))
-        g.night_nato_correct = correct
-        tick = "✅" if correct else "❌"
-        g.night_nato_target = s
-        g.nato_used = True   # 🕵️ مصرف شد — از شبِ بعد دکمه‌اش نمی‌آید
-        await _close_pm(ctx, uid, mid, f"🕵️ ناتویی روی {s}. {tname} ثبت شد.")
-        await _night_report(ctx, g, f"🕵️ ناتو → صندلی {s}. {escape(tname, quote=False)} | حدس نقش: {guess_name} {tick}")
-        g.night_doctor_blocked = True
-        g.night_done.add("mafia")
-        store.save()
-        await _bzp_broadcast_special(ctx, g, "ناتویی")
-        await _bzp_check_open_rest(ctx, chat_id, g)
-        return
-
-    if data == "bzp_nato_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_nato_seat = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _room_note(ctx, g, f"🕵️ ناتویی روی <b>{_room_who(g, s)}</b>")
-        rows = [[InlineKeyboardButton(rn, callback_data=f"bzp_natorole_{i}")]
-                for i, rn in enumerate(_BZP_CITIZEN_ROLE_NAMES)]
-        await _edit_pm(ctx, uid, mid, f"🕵️ نقش صندلی {s} را حدس بزن:", InlineKeyboardMarkup(rows))
-        return
-
-    if data.startswith("bzp_nato_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
-        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟",
-                       _kb_add_back(_kb_night_seats(targets, g, "bzp_nato_", selected=s,
-                                                    confirm_cb="bzp_nato_confirm"),
-                                    "bzp_act_back"))
-        return
-
-    # ── شیاد: حدس کاراگاه ──
-    if data == "bzp_shiad_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_shiad_guess = s
-        det = _find_seat_by_role(g, _R_DETECTIVE)
-        correct = (det is not None and s == det)
-        tick = "✅" if correct else "❌"
-        # 🎭 اکتِ شیاد عمداً در اتاقِ مافیا اعلام نمی‌شود — فقط در پیویِ گاد
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, "🎭 حدس ثبت شد.")
-        await _night_report(ctx, g, f"🎭 شیاد → حدس کاراگاه: {s}. {escape(tname, quote=False)} {tick}")
-        g.night_done.add("shiad")
-        store.save()
-        await _bzp_check_open_rest(ctx, chat_id, g)
-        return
-
-    if data.startswith("bzp_shiad_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
-        await _edit_pm(ctx, uid, mid, "🎭 حدس بزن کدام شماره کاراگاه است:",
-                       _kb_night_seats(targets, g, "bzp_shiad_", selected=s, confirm_cb="bzp_shiad_confirm"))
-        return
-
-    # ── کاراگاه (مستقیم) ──
-    if data.startswith("bzp_det_"):
-        s = int(data.rsplit("_", 1)[1])
-        _tu, tname = g.seats[s]
-        res = "مثبت ✅" if _bzp_detective_positive(g, s) else "منفی ❌"
-        if "مثبت" in res:
-            _sc_add(g, _seat_of_uid(g, uid), "inq", 5, f"استعلام مثبت ({s})")
-        await _close_pm(ctx, uid, mid, f"🔎 استعلام {s}. {tname}: {res}")
-        await _night_report(ctx, g, f"🔎 کاراگاه → استعلام {s}. {escape(tname, quote=False)}: <b>{res}</b>")
-        g.night_done.add("detective")
-        store.save()
-        return
-
-    # ── پزشک (۱ نفر) ──
-    if data == "bzp_doc_confirm":
-        sel = list(g.night_doc_sel.get(uid, []))
-        if not sel:
-            await safe_q_answer(q, "یک نفر را انتخاب کن.", show_alert=True)
-            return
-        doc = _seat_of_uid(g, uid)
-        if doc in sel:
-            g.doctor_self_saves = (g.doctor_self_saves or 0) + 1
-        g.night_doc_saved = list(sel)
-        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
-        await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {names}")
-        await _night_report(ctx, g, f"💉 پزشک → سیو: <b>{escape(names, quote=False)}</b>")
-        g.night_done.add("doctor")
-        store.save()
-        return
-
-    if data.startswith("bzp_doc_"):
-        s = int(data.rsplit("_", 1)[1])
-        sel = set(g.night_doc_sel.get(uid, []))
-        if s in sel:
-            sel.remove(s)
-        elif len(sel) >= 1:
-            await safe_q_answer(q, "فقط ۱ نفر.", show_alert=True)
-            return
-        else:
-            sel.add(s)
-        g.night_doc_sel[uid] = list(sel)
-        store.save()
-        doc = _seat_of_uid(g, uid)
-        await _edit_pm(ctx, uid, mid, "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
-                       _kb_night_seats(_doctor_targets(g, doc), g, "bzp_doc_",
-                                       selected=sel, confirm_cb="bzp_doc_confirm"))
-        return
-
-    # ── بازپرس (یکبار: انتخاب ۲ نفر) ──
-    if data == "bzp_baz_no":
-        await _close_pm(ctx, uid, mid, "🧑‍⚖️ از حق بازپرسی استفاده نکردی.")
-        await _night_report(ctx, g, "🧑‍⚖️ بازپرس → استفاده نکرد")
-        g.night_done.add("baazpors")
-        store.save()
-        return
-
-    if data == "bzp_baz_yes":
-        bz = _seat_of_uid(g, uid)
-        targets = [s for s in _alive_seats(g) if s != bz]
-        await _edit_pm(ctx, uid, mid, "🧑‍⚖️ دو نفر را برای بازپرسی انتخاب کن:",
-                       _kb_night_seats(targets, g, "bzp_baz_",
-                                       selected=set(g.night_baz_sel.get(uid, [])), confirm_cb="bzp_baz_confirm"))
-        return
-
-    if data == "bzp_baz_confirm":
-        sel = list(g.night_baz_sel.get(uid, []))
-        if len(sel) != 2:
-            await safe_q_answer(q, "باید دقیقاً ۲ نفر را انتخاب کنی.", show_alert=True)
-            return
-        g.baazpors_used = True
-        g.night_baz_targets = list(sel)   # اگر یکی امشب کشته شود، حقِ بازپرسی برمی‌گردد
-        # 🏅 حداقل یک مافیا در احضارشده‌ها = اکتِ درست؛ هر دو شهروند = −۵
-        _bz = _seat_of_uid(g, uid)
-        _mf = [x for x in sel if _sc_side(g, x) == "مافیا"]
-        if _mf:
-            _sc_add(g, _bz, "act", 15, f"بازپرسیِ درست ({len(_mf)} مافیا)")
-        else:
-            _sc_add(g, _bz, "act", -5, "بازپرسیِ هر دو شهروند")
-        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
-        await _close_pm(ctx, uid, mid, f"🧑‍⚖️ بازپرسی: {names}")
-        await _night_report(ctx, g, f"🧑‍⚖️ بازپرس → احضار به بازپرسی: <b>{escape(names, quote=False)}</b>")
-        g.night_done.add("baazpors")
-        store.save()
-        return
-
-    if data.startswith("bzp_baz_"):
-        s = int(data.rsplit("_", 1)[1])
-        sel = set(g.night_baz_sel.get(uid, []))
-        if s in sel:
-            sel.remove(s)
-        elif len(sel) >= 2:
-            await safe_q_answer(q, "حداکثر ۲ نفر.", show_alert=True)
-            return
-        else:
-            sel.add(s)
-        g.night_baz_sel[uid] = list(sel)
-        store.save()
-        bz = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != bz]
-        await _edit_pm(ctx, uid, mid, "🧑‍⚖️ دو نفر را برای بازپرسی انتخاب کن:",
-                       _kb_night_seats(targets, g, "bzp_baz_", selected=sel, confirm_cb="bzp_baz_confirm"))
-        return
-
-    # ── اسنایپر (۱۲/۱۳ نفره) ──
-    if data == "bzp_snipe_no":
-        await _close_pm(ctx, uid, mid, "🚫 از تیر استفاده نکردی.")
-        await _night_report(ctx, g, "🎯 اسنایپر → شلیک نکرد")
-        g.night_done.add("sniper")
-        store.save()
-        return
-
-    if data == "bzp_snipe_yes":
-        sn = _seat_of_uid(g, uid)
-        targets = [s for s in _alive_seats(g) if s != sn]
-        await _edit_pm(ctx, uid, mid, "🎯 به چه کسی شلیک می‌کنی؟",
-                       _kb_night_seats(targets, g, "bzp_snipe_",
-                                       selected=g.night_sel.get(uid), confirm_cb="bzp_snipe_confirm"))
-        return
-
-    if data == "bzp_snipe_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.sniper_used = True
-        g.night_sniper_target = s
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"🎯 شلیک ثبت شد: {s}. {tname}")
-        await _night_report(ctx, g, f"🎯 اسنایپر → شلیک به <b>{s}. {escape(tname, quote=False)}</b>")
-        g.night_done.add("sniper")
-        store.save()
-        return
-
-    if data.startswith("bzp_snipe_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        sn = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != sn]
-        await _edit_pm(ctx, uid, mid, "🎯 به چه کسی شلیک می‌کنی؟",
-                       _kb_night_seats(targets, g, "bzp_snipe_", selected=s, confirm_cb="bzp_snipe_confirm"))
-        return
-
-
-# ═════════════════════════════════════════════════════════════
-#  موتور شبِ خودکار — سناریو «نماینده»
-#  ترتیب اکت: مین‌گذار → (دن‌مافیا + هکر) → (وکیل/محافظ/پزشک/راهنما)
-# ═════════════════════════════════════════════════════════════
-NEMAYANDE_KEY = "نماینده"
-_R_DON    = _nz("دن‌مافیا")
-_R_HACKER = _nz("هکر")
-_R_YAGHI  = _nz("یاغی")
-_R_GUARD  = _nz("محافظ")
-_R_GUIDE  = _nz("راهنما")
-_R_MINER  = _nz("مین‌گذار")
-_R_LAWYER = _nz("وکیل")
-
-
-def _is_nemayande_scenario(g) -> bool:
-    return bool(getattr(g, "scenario", None)) and (_nz(NEMAYANDE_KEY) in _nz(g.scenario.name))
-
-
-# ── 💣 یاغیِ روز (نماینده) ──────────────────────────────────────
-def _nem_yaghi_unlocked(g) -> bool:
-    """💣 یاغی فقط وقتی می‌تواند که تیمِ سه‌نفره‌شان کامل نمانده باشد —
-    یعنی دن‌مافیا یا هکر به هر نحوی از بازی خارج شده باشد."""
-    for r in (_R_DON, _R_HACKER):
-        s = _find_seat_by_role(g, r, alive_only=False)
-        if s is not None and s in (g.striked or set()):
-            return True
-    return False
-
-
-async def _nem_yaghi_start(ctx, chat_id, g, seat):
-    """💣 «یاغی» یا 💣 کفِ گروه → تأیید و سؤالِ عدد."""
-    g.nem_yaghi_asking = True
-    store.save()
-    await ctx.bot.send_message(
-        chat_id,
-        f"💣 <b>یاغی!</b>\n{seat}. {escape(g.seats[seat][1], quote=False)} — "
-        "چه کسی را با خودت می‌بری؟ فقط عدد بنویس.",
-        parse_mode="HTML")
-
-
-async def _nem_yaghi_apply(ctx, chat_id, g, seat, target):
-    """💣 اجرا: محافظ یا محافظت‌شده‌ی شبِ قبل → دست خالی؛ وگرنه هر دو خارج.
-    بدونِ وصیت، و بلافاصله شب باز می‌شود (گاد دکمهٔ شب را نمی‌زند)."""
-    g.nem_yaghi_asking = False
-    g.nem_yaghi_used = True
-    grd = _find_seat_by_role(g, _R_GUARD, alive_only=False)
-    prot = getattr(g, "nem_guard_target", None)
-    empty = ((grd is not None and target == grd)
-             or (prot is not None and target == prot))
-
-    me = f"{seat}. {escape(g.seats[seat][1], quote=False)}"
-    dead = {seat}
-    if empty:
-        lines = ["💣 <b>یاغی دست خالی می‌رود.</b>",
-                 f"🕊 {me} از بازی خارج شد."]
-    else:
-        dead.add(target)
-        nm_t = escape(g.seats[target][1], quote=False) if target in g.seats else "؟"
-        lines = [f"💣 <b>{target}. {nm_t}</b> با یاغی از بازی خارج شد — وصیت ندارد.",
-                 f"🕊 {me} هم از بازی خارج شد."]
-    for s in dead:
-        g.striked.add(s)
-    store.save()
-    await ctx.bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML")
-    await _night_report(ctx, g, f"💣 یاغی: {seat} → {target} | "
-                        + ("دست خالی (محافظ/محافظت‌شده)" if empty else "هر دو خارج"))
-    try:
-        await publish_seating(ctx, chat_id, g, mode=CTRL)
-    except Exception:
-        pass
-    await _check_auto_end(ctx, chat_id, g)
-    await start_night(ctx, chat_id, g)   # 🌙 شبِ خودکار
-
-
-def _find_seat_role_sub(g, sub_norm, alive_only=True):
-    """یافتن صندلی که نقش نرمالایزش شامل sub_norm باشد (برای نقش‌هایی مثل «وکیل(شهر)»)."""
-    seats = _alive_seats(g) if alive_only else sorted(g.seats)
-    for s in seats:
-        if sub_norm in _seat_role_norm(g, s):
-            return s
-    return None
-
-
-def _nem_citizen_role_names(g):
-    """نام دقیق نقش‌های شهروندی سناریو (برای دکمه‌های حدس نقشِ ناتویی)."""
-    mafia = set(_mafia_role_set(g))
-    names, seen = [], set()
-    for rname in (g.scenario.roles.keys() if g.scenario else []):
-        n = _nz(rname)
-        if n in mafia or n in seen:
-            continue
-        seen.add(n)
-        names.append(rname)
-    return names
-
-
-def _nem_guide_positive(g, seat) -> bool:
-    # استعلام راهنما: یاغی و هکر مثبت
-    return _seat_role_norm(g, seat) in (_R_YAGHI, _R_HACKER)
-
-
-def _nem_mine_kb(g, targets, selected=None):
-    kb = _kb_night_seats(targets, g, "nem_mine_", selected=selected, confirm_cb="nem_mine_confirm")
-    rows = list(kb.inline_keyboard) + [
-        [InlineKeyboardButton("⏭ امشب نه (بعداً)", callback_data="nem_mine_skip")]
-    ]
-    return InlineKeyboardMarkup(rows)
-
-
-async def _nem_open_mine(ctx, chat_id, g):
-    if g.mine_seat is not None:
-        g.night_done.add("mine")
-        store.save()
-        await _nem_open_mafia(ctx, chat_id, g)
-        return
-    m_seat = _find_seat_by_role(g, _R_MINER)
-    if not m_seat:
-        g.night_done.add("mine")
-        store.save()
-        await _nem_open_mafia(ctx, chat_id, g)
-        return
-    muid = g.seats[m_seat][0]
-    targets = [s for s in _alive_seats(g) if s != m_seat]
-    m = await _safe_pm(ctx, muid, "💣 جلوی چه کسی مین می‌گذاری؟ (تا آخر بازی می‌ماند)",
-                       _nem_mine_kb(g, targets, selected=g.night_sel.get(muid)))
-    if m:
-        g.night_pm_msgs[muid] = m.message_id
-    store.save()
-
-
-async def _nem_open_mafia(ctx, chat_id, g):
-    # تصمیم‌گیرندهٔ مافیا: دن‌مافیا → یاغی → هکر
-    don_alive = _find_seat_by_role(g, _R_DON)
-    yaghi_alive = _find_seat_by_role(g, _R_YAGHI)
-    hacker_alive = _find_seat_by_role(g, _R_HACKER)
-    decider = don_alive or yaghi_alive or hacker_alive
-    if not decider:
-        # 🤝 اگر مافیای اصلی نمانده، جذب‌شده (مذاکره/یاکوزایی/خریداری) صاحبِ شات می‌شود
-        converted = sorted(_mafia_seats(g, alive_only=True))
-        decider = converted[0] if converted else None
-    if not decider:
-        g.night_done.add("mafia")
-    else:
-        g.nem_decider_seat = decider
-        duid = g.seats[decider][0]
-        rows = [[InlineKeyboardButton("🔫 شات", callback_data="nem_don_shot")]]
-        # ناتویی فقط وقتی دن‌مافیا زنده است (اکت خودِ دن‌مافیاست) و مصرف نشده
-        if don_alive is not None and not g.nato_used:
-            rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="nem_don_nato")])
-        m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:",
-                           InlineKeyboardMarkup(rows))
-        if m:
-            g.night_pm_msgs[duid] = m.message_id
-
-    # هکر (مرحله ۱: انتخاب فاعلِ اکت)
-    hk = _find_seat_by_role(g, _R_HACKER)
-    if not hk:
-        g.night_done.add("hacker")
-    else:
-        huid = g.seats[hk][0]
-        targets = [s for s in _alive_seats(g) if s != hk]   # خودش نباشد
-        m = await _safe_pm(ctx, huid, "💻 اکتِ چه کسی را هک می‌کنی؟ (مرحلهٔ ۱: فاعل)",
-                           _kb_night_seats(targets, g, "nem_hka_",
-                                           selected=g.night_sel.get(huid), confirm_cb="nem_hka_confirm"))
-        if m:
-            g.night_pm_msgs[huid] = m.message_id
-    store.save()
-    await _nem_check_open_rest(ctx, chat_id, g)
-
-
-async def _nem_check_open_rest(ctx, chat_id, g):
-    if g.night_rest_opened:
-        return
-    if "mafia" not in g.night_done or "hacker" not in g.night_done:
-        return
-    g.night_rest_opened = True
-    store.save()
-
-    # 🧑‍⚖️ وکیل (یکبار در بازی)
-    if not g.lawyer_used:
-        law = _find_seat_role_sub(g, _R_LAWYER)
-        if law:
-            luid = g.seats[law][0]
-            kb = InlineKeyboardMarkup([
-                [InlineKeyboardButton("✅ بله", callback_data="nem_law_yes")],
-                [InlineKeyboardButton("🚫 خیر", callback_data="nem_law_no")],
-            ])
-            m = await _safe_pm(ctx, luid, "🧑‍⚖️ امشب وکالت کسی را می‌گیری؟", kb)
-            if m:
-                g.night_pm_msgs[luid] = m.message_id
-
-    # 🛡 محافظ (هر شب)
-    grd = _find_seat_by_role(g, _R_GUARD)
-    if grd:
-        guid = g.seats[grd][0]
-        targets = [s for s in _alive_seats(g) if s != grd]
-        m = await _safe_pm(ctx, guid, "🛡 از چه کسی محافظت می‌کنی؟",
-                           _kb_night_seats(targets, g, "nem_grd_", confirm_cb="nem_grd_confirm"))
-        if m:
-            g.night_pm_msgs[guid] = m.message_id
-
-    # 💉 پزشک — در شب ناتویی استراحت
-    if not g.night_doctor_blocked:
-        doc = _find_seat_by_role(g, _R_DOCTOR)
-        if doc:
-            duid = g.seats[doc][0]
-            g.night_doc_need = 1
-            targets = _doctor_targets(g, doc)
-            m = await _safe_pm(ctx, duid, "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
-                               _kb_night_seats(targets, g, "nem_doc_", selected=set(),
-                                               confirm_cb="nem_doc_confirm"))
-            if m:
-                g.night_pm_msgs[duid] = m.message_id
-
-    # 🧭 راهنما (آخرین اکت)
-    gd = _find_seat_by_role(g, _R_GUIDE)
-    if gd:
-        gduid = g.seats[gd][0]
-        targets = [s for s in _alive_seats(g) if s != gd and s != g.guide_last_target]
-        m = await _safe_pm(ctx, gduid, "🧭 به چه کسی راهنمایی می‌دهی؟",
-                           _kb_night_seats(targets, g, "nem_guide_", confirm_cb="nem_guide_confirm"))
-        if m:
-            g.night_pm_msgs[gduid] = m.message_id
-    store.save()
-    # ⏳ نگهبانِ مین: هر ۳ ثانیه چک می‌کند و فقط وقتی «همه‌ی اکت‌ها» تمام شد اعلام می‌کند
-    asyncio.create_task(_nem_mine_watch(ctx, chat_id, g))
-
-
-async def _nem_mine_watch(ctx, chat_id, g, timeout=1800):
-    """💥 تا وقتی همه‌ی اکت‌های شب تمام نشده، اعلامِ مین را نگه می‌دارد."""
-    try:
-        for _ in range(timeout // 3):
-            if getattr(g, "night_mine_handled", False) or not getattr(g, "night_active", False):
-                return
-            if _night_all_done(g):
-                await _nem_trigger_mine(ctx, chat_id, g)
-                return
-            await asyncio.sleep(3)
-    except Exception as e:
-        print("⚠️ mine watch err:", e)
-
-
-async def _nem_trigger_mine(ctx, chat_id, g):
-    """فقط بعد از تمام‌شدنِ همه‌ی اکت‌ها: اگر مین فعال شده باشد، به همه اعلام و از دن‌مافیا فدا می‌خواهد."""
-    if getattr(g, "night_mine_handled", False):
-        return
-    if not _night_all_done(g):
-        return   # ⏳ هنوز اکتی باز است — نگهبانِ مین بعداً دوباره صدا می‌زند
-    target = None
-    if g.night_don_act == "shot":
-        target = g.night_shot_target
-    elif g.night_don_act == "nato":
-        target = g.night_nato_seat
-    mine_hit = (target is not None and g.mine_seat is not None
-                and target == g.mine_seat and not g.night_don_defuse)
-    if not mine_hit:
-        return
-    g.night_mine_handled = True
-    store.save()
-    for s in _alive_seats(g):
-        try:
-            await ctx.bot.send_message(g.seats[s][0], "💥 امشب مین فعال شد!")
-        except Exception:
-            pass
-    await _night_report(ctx, g, "💥 مین فعال شد")
-    mafia_alive = sorted(_mafia_seats(g, alive_only=True))
-    # تصمیم‌گیرندهٔ فدا: دن‌مافیا → یاغی → هکر
-    picker = (_find_seat_by_role(g, _R_DON)
-              or _find_seat_by_role(g, _R_YAGHI)
-              or _find_seat_by_role(g, _R_HACKER))
-    if not picker or not mafia_alive:
-        await _night_report(ctx, g, "⚠️ مافیایی برای فدا کردن نیست.")
-        return
-    g.night_awaiting_sacrifice = True
-    store.save()
-    puid = g.seats[picker][0]
-    m = await _safe_pm(ctx, puid, "💥 مین فعال شد! چه کسی را از تیم خود فدا می‌کنی؟",
-                       _kb_night_seats(mafia_alive, g, "nem_fada_", confirm_cb="nem_fada_confirm"))
-    if m:
-        g.night_pm_msgs[puid] = m.message_id
-    store.save()
-
-
-async def _nem_finalize_mafia(ctx, chat_id, g, uid, mid, defuse):
-    g.night_don_defuse = defuse
-    if defuse:
-        await _room_note(ctx, g, "💣 دن امشب «خنثی» را هم زد.")
-    dtxt = "با خنثی‌سازی" if defuse else "بدون خنثی‌سازی"
-    if g.night_don_act == "shot":
-        s = g.night_shot_target
-        tname = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {tname} ({dtxt})")
-        await _night_report(ctx, g, f"🔫 شلیک دن‌مافیا → <b>{s}. {escape(tname, quote=False)}</b> ({dtxt})")
-        g.night_done.add("mafia")
-        store.save()
-        await _nem_check_open_rest(ctx, chat_id, g)
-    else:  # nato
-        await _close_pm(ctx, uid, mid, f"✅ ناتویی ثبت شد ({dtxt}).")
-        await _night_report(ctx, g, f"   ↳ ناتویی {dtxt}")
-        g.night_doctor_blocked = True
-        g.night_done.add("mafia")
-        store.save()
-        await _bzp_broadcast_special(ctx, g, "ناتویی")
-        await _nem_check_open_rest(ctx, chat_id, g)
-
-
-async def _nem_ask_defuse(ctx, uid, mid):
-    kb = InlineKeyboardMarkup([
-        [InlineKeyboardButton("💥 با خنثی‌سازی", callback_data="nem_defuse_yes")],
-        [InlineKeyboardButton("➖ بدون خنثی‌سازی", callback_data="nem_defuse_no")],
-    ])
-    await _edit_pm(ctx, uid, mid, "تمایل به خنثی‌سازی داری؟", kb)
-
-
-async def handle_nemayande_callback(update, ctx):
-    q = update.callback_query
-    data = q.data
-    uid = _q_uid(q)   # 🎛 اکتِ دستی
-    g, chat_id = _find_active_night_game(uid, q)
-    if g is None:
-        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
-        return
-    await safe_q_answer(q)
-    mid = q.message.message_id if q.message else None
-
-    # ── فدای مین (بعد از اکت راهنما، فعال‌شدن مین) ──
-    if data == "nem_fada_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_mine_sacrifice = s
-        g.night_awaiting_sacrifice = False
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"💥 {s}. {tname} فدا شد.")
-        await _night_report(ctx, g, f"💥 دن‌مافیا فدا کرد: <b>{s}. {escape(tname, quote=False)}</b>")
-        store.save()
-        return
-
-    if data.startswith("nem_fada_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        mafia_alive = sorted(_mafia_seats(g, alive_only=True))
-        await _edit_pm(ctx, uid, mid, "💥 مین فعال شد! چه کسی را از تیم خود فدا می‌کنی؟",
-                       _kb_night_seats(mafia_alive, g, "nem_fada_", selected=s, confirm_cb="nem_fada_confirm"))
-        return
-
-    # ── مین‌گذار ──
-    if data == "nem_mine_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.mine_seat = s
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"💣 مین جلوی {s}. {tname} گذاشته شد.")
-        await _night_report(ctx, g, f"💣 مین‌گذار → مین جلوی <b>{s}. {escape(tname, quote=False)}</b>")
-        g.night_done.add("mine")
-        store.save()
-        await _nem_open_mafia(ctx, chat_id, g)
-        return
-
-    if data == "nem_mine_skip":
-        await _close_pm(ctx, uid, mid, "⏭ امشب مین نگذاشتی (می‌توانی شب بعد بگذاری).")
-        await _night_report(ctx, g, "💣 مین‌گذار → امشب مین نگذاشت")
-        g.night_done.add("mine")
-        store.save()
-        await _nem_open_mafia(ctx, chat_id, g)
-        return
-
-    if data.startswith("nem_mine_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        mn = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != mn]
-        await _edit_pm(ctx, uid, mid, "💣 جلوی چه کسی مین می‌گذاری؟ (تا آخر بازی می‌ماند)",
-                       _nem_mine_kb(g, targets, selected=s))
-        return
-
-    # ── دن‌مافیا: تصمیم ──
-    if data == "nem_don_shot":
-        g.night_don_act = "shot"
-        store.save()
-        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_night_seats(targets, g, "nem_shot_",
-                                       selected=g.night_sel.get(uid), confirm_cb="nem_shot_confirm"))
-        return
-
-    if data == "nem_don_nato":
-        # 🕵️ یک‌بار در کلِ بازی — نگهبان برای کیبوردِ کهنه‌ی شب‌های قبل
-        if g.nato_used:
-            await safe_q_answer(q, "ناتویی قبلاً استفاده شده.", show_alert=True)
-            return
-        g.night_don_act = "nato"
-        store.save()
-        targets = [s for s in _alive_seats(g)
-                   if s not in _mafia_seats(g, alive_only=True) and s not in (g.nato_immune or set())]
-        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟",
-                       _kb_night_seats(targets, g, "nem_natt_",
-                                       selected=g.night_sel.get(uid), confirm_cb="nem_natt_confirm"))
-        return
-
-    # ── شلیک ──
-    if data == "nem_shot_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_shot_target = s
-        g.night_don_act = "shot"
-        await _room_announce_shot(ctx, g, s)
-        store.save()
-        if g.defuse_used:
-            await _nem_finalize_mafia(ctx, chat_id, g, uid, mid, defuse=False)
-        else:
-            await _nem_ask_defuse(ctx, uid, mid)
-        return
-
-    if data.startswith("nem_shot_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_night_seats(targets, g, "nem_shot_", selected=s, confirm_cb="nem_shot_confirm"))
-        return
-
-    # ── ناتویی: انتخاب هدف، سپس حدس نقش ──
-    if data.startswith("nem_natrole_"):
-        i = int(data.rsplit("_", 1)[1])
-        names = _nem_citizen_role_names(g)
-        if i >= len(names):
-            return
-        guess_name = names[i]
-        s = g.night_nato_seat
-        if not s:
-            await safe_q_answer(q, "اول هدف را انتخاب کن.", show_alert=True)
-            return
-        _tu, tname = g.seats[s]
-        correct = (_nz(guess_name) == _seat_role_norm(g, s))
-        g.night_nato_correct = correct
-        g.night_nato_target = s
-        g.nato_used = True   # 🕵️ مصرف شد — از شبِ بعد دکمه‌اش نمی‌آید
-        tick = "✅" if correct else "❌"
-        await _night_report(ctx, g, f"🕵️ ناتویی دن‌مافیا → صندلی {s}. {escape(tname, quote=False)} | حدس: {guess_name} {tick}")
-        store.save()
-        if g.defuse_used:
-            await _nem_finalize_mafia(ctx, chat_id, g, uid, mid, defuse=False)
-        else:
-            await _nem_ask_defuse(ctx, uid, mid)
-        return
-
-    if data == "nem_natt_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_nato_seat = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _room_note(ctx, g, f"🕵️ ناتویی روی <b>{_room_who(g, s)}</b>")
-        names = _nem_citizen_role_names(g)
-        rows = [[InlineKeyboardButton(rn, callback_data=f"nem_natrole_{i}")] for i, rn in enumerate(names)]
-        await _edit_pm(ctx, uid, mid, f"🕵️ نقش صندلی {s} را حدس بزن:", InlineKeyboardMarkup(rows))
-        return
-
-    if data.startswith("nem_natt_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g)
-                   if x not in _mafia_seats(g, alive_only=True) and x not in (g.nato_immune or set())]
-        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟",
-                       _kb_night_seats(targets, g, "nem_natt_", selected=s, confirm_cb="nem_natt_confirm"))
-        return
-
-    # ── خنثی‌سازی ──
-    if data == "nem_defuse_yes":
-        g.defuse_used = True
-        store.save()
-        await _nem_finalize_mafia(ctx, chat_id, g, uid, mid, defuse=True)
-        return
-    if data == "nem_defuse_no":
-        await _nem_finalize_mafia(ctx, chat_id, g, uid, mid, defuse=False)
-        return
-
-    # ── هکر: مرحله ۱ فاعل، مرحله ۲ مفعول ──
-    if data == "nem_hka_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول فاعل را انتخاب کن.", show_alert=True)
-            return
-        g.night_hacker_actor = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        hk = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != hk and x != s]   # نه خودش، نه فاعل
-        await _edit_pm(ctx, uid, mid, "💻 اکتش روی چه کسی بسته شود؟ (مرحلهٔ ۲: مفعول)",
-                       _kb_night_seats(targets, g, "nem_hkt_", confirm_cb="nem_hkt_confirm"))
-        return
-
-    if data.startswith("nem_hka_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        hk = _seat_of_uid(g, uid)
-        await _edit_pm(ctx, uid, mid, "💻 اکتِ چه کسی را هک می‌کنی؟ (مرحلهٔ ۱: فاعل)",
-                       _kb_night_seats([x for x in _alive_seats(g) if x != hk], g, "nem_hka_",
-                                       selected=s, confirm_cb="nem_hka_confirm"))
-        return
-
-    if data == "nem_hkt_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول مفعول را انتخاب کن.", show_alert=True)
-            return
-        g.night_hacker_target = s
-        await _room_note(ctx, g, f"💻 هک: اکتِ <b>{_room_who(g, g.night_hacker_actor)}</b> "
-                         f"روی <b>{_room_who(g, s)}</b>")
-        a = g.night_hacker_actor
-        aname = g.seats[a][1] if a in g.seats else "—"
-        tname = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"💻 هک ثبت شد: اکت {a}.{aname} روی {s}.{tname} بسته شد.")
-        await _night_report(ctx, g, f"💻 هکر → اکت <b>{a}. {escape(aname, quote=False)}</b> روی <b>{s}. {escape(tname, quote=False)}</b> بسته شد")
-        g.night_done.add("hacker")
-        store.save()
-        await _nem_check_open_rest(ctx, chat_id, g)
-        return
-
-    if data.startswith("nem_hkt_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        hk = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != hk and x != g.night_hacker_actor]
-        await _edit_pm(ctx, uid, mid, "💻 اکتش روی چه کسی بسته شود؟ (مرحلهٔ ۲: مفعول)",
-                       _kb_night_seats(targets, g, "nem_hkt_", selected=s, confirm_cb="nem_hkt_confirm"))
-        return
-
-    # ── وکیل (یکبار) ──
-    if data == "nem_law_no":
-        await _close_pm(ctx, uid, mid, "🧑‍⚖️ امشب وکالت نگرفتی.")
-        await _night_report(ctx, g, "🧑‍⚖️ وکیل → استفاده نکرد")
-        g.night_done.add("lawyer")
-        store.save()
-        return
-
-    if data == "nem_law_yes":
-        law = _seat_of_uid(g, uid)
-        targets = [s for s in _alive_seats(g) if s != law]
-        await _edit_pm(ctx, uid, mid, "🧑‍⚖️ وکالت چه کسی را می‌گیری؟",
-                       _kb_night_seats(targets, g, "nem_law_", confirm_cb="nem_law_confirm"))
-        return
-
-    if data == "nem_law_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        # وکالت فقط در صورتی «مصرف» می‌شود که موکل همان شب شات نشود (در مرحله ۲ تعیین می‌شود)
-        g.night_lawyer_target = s
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"🧑‍⚖️ وکالت {s}. {tname} ثبت شد.")
-        await _night_report(ctx, g, f"🧑‍⚖️ وکیل → وکالت <b>{s}. {escape(tname, quote=False)}</b>")
-        g.night_done.add("lawyer")
-        store.save()
-        return
-
-    if data.startswith("nem_law_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        law = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != law]
-        await _edit_pm(ctx, uid, mid, "🧑‍⚖️ وکالت چه کسی را می‌گیری؟",
-                       _kb_night_seats(targets, g, "nem_law_", selected=s, confirm_cb="nem_law_confirm"))
-        return
-
-    # ── محافظ (هر شب، فقط گزارش) ──
-    if data == "nem_grd_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        _tu, tname = g.seats[s]
-        g.nem_guard_target = s     # 🛡 تا روزِ بعد می‌ماند (یاغی به آن نیاز دارد)
-        await _close_pm(ctx, uid, mid, f"🛡 محافظت از {s}. {tname} ثبت شد.")
-        await _night_report(ctx, g, f"🛡 محافظ → محافظت از <b>{s}. {escape(tname, quote=False)}</b>")
-        # 🏅 محافظت از مافیا = اکتِ اشتباه + فریبِ آن مافیا؛ از شهروند = اکتِ درست
-        _grd = _seat_of_uid(g, uid)
-        if _sc_side(g, s) == "مافیا":
-            _sc_add(g, _grd, "act", -5, f"محافظت از مافیا ({s})")
-            _sc_add(g, s, "farib2", 5, "محافظتِ اشتباهِ محافظ")
-        else:
-            _sc_add(g, _grd, "act", 15, f"محافظت از شهروند ({s})")
-        g.night_done.add("guard")
-        store.save()
-        return
-
-    if data.startswith("nem_grd_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        grd = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != grd]
-        await _edit_pm(ctx, uid, mid, "🛡 از چه کسی محافظت می‌کنی؟",
-                       _kb_night_seats(targets, g, "nem_grd_", selected=s, confirm_cb="nem_grd_confirm"))
-        return
-
-    # ── پزشک (۱ نفر) ──
-    if data == "nem_doc_confirm":
-        sel = list(g.night_doc_sel.get(uid, []))
-        if not sel:
-            await safe_q_answer(q, "یک نفر را انتخاب کن.", show_alert=True)
-            return
-        doc = _seat_of_uid(g, uid)
-        if doc in sel:
-            g.doctor_self_saves = (g.doctor_self_saves or 0) + 1
-        g.night_doc_saved = list(sel)
-        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
-        await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {names}")
-        await _night_report(ctx, g, f"💉 پزشک → سیو: <b>{escape(names, quote=False)}</b>")
-        g.night_done.add("doctor")
-        store.save()
-        return
-
-    if data.startswith("nem_doc_"):
-        s = int(data.rsplit("_", 1)[1])
-        sel = set(g.night_doc_sel.get(uid, []))
-        if s in sel:
-            sel.remove(s)
-        elif len(sel) >= 1:
-            await safe_q_answer(q, "فقط ۱ نفر.", show_alert=True)
-            return
-        else:
-            sel.add(s)
-        g.night_doc_sel[uid] = list(sel)
-        store.save()
-        doc = _seat_of_uid(g, uid)
-        await _edit_pm(ctx, uid, mid, "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
-                       _kb_night_seats(_doctor_targets(g, doc), g, "nem_doc_",
-                                       selected=sel, confirm_cb="nem_doc_confirm"))
-        return
-
-    # ── راهنما (آخرین اکت) ──
-    if data == "nem_guide_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_guide_target = s
-        g.guide_last_target = s
-        _tu, tname = g.seats[s]
-        is_mafia = s in _mafia_seats(g, alive_only=True)
-        # هکِ راهنما روی همین هدف؟ → راهنمایی بی‌اثر می‌شود
-        hacked = (g.night_hacker_actor == _seat_of_uid(g, uid)
-                  and g.night_hacker_target == s)
-        if is_mafia:
-            try:
-                await ctx.bot.send_message(g.seats[s][0], f"🧭 سیت {_seat_of_uid(g, uid)} راهنماست.")
-            except Exception:
-                pass
-            g.nato_immune.add(_seat_of_uid(g, uid))
-            await _close_pm(ctx, uid, mid, f"🧭 راهنمایی به {s}. {tname} ثبت شد.")
-            await _night_report(ctx, g, f"🧭 راهنما → راهنمایی به مافیا {s}. {escape(tname, quote=False)} (راهنما از ناتویی مصون شد)")
-            g.night_done.add("guide")
-            store.save()
-            await _nem_trigger_mine(ctx, chat_id, g)
-            return
-        # شهروند
-        if hacked:
-            await _close_pm(ctx, uid, mid, f"🧭 راهنمایی به {s}. {tname} ثبت شد.")
-            await _night_report(ctx, g, f"🧭 راهنما → راهنمایی به {s}. {escape(tname, quote=False)} (توسط هکر بی‌اثر شد، آن فرد متوجه نشد)")
-            g.night_done.add("guide")
-            store.save()
-            await _nem_trigger_mine(ctx, chat_id, g)
-            return
-        # راهنمایی مؤثر: شهروند استعلام می‌گیرد
-        g.night_guide_recipient_inv = s
-        await _close_pm(ctx, uid, mid, f"🧭 راهنمایی به {s}. {tname} ثبت شد.")
-        await _night_report(ctx, g, f"🧭 راهنما → راهنمایی به {s}. {escape(tname, quote=False)}")
-        rec_uid = g.seats[s][0]
-        targets = [x for x in _alive_seats(g) if x != s]
-        m = await _safe_pm(ctx, rec_uid, "🔎 شما راهنمایی دارید! استعلام چه کسی را می‌گیری؟",
-                           _kb_night_seats(targets, g, "nem_ginv_"))
-        if m:
-            g.night_pm_msgs[rec_uid] = m.message_id
-        g.night_done.add("guide")
-        store.save()
-        await _nem_trigger_mine(ctx, chat_id, g)
-        return
-
-    if data.startswith("nem_guide_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        gd = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != gd and x != g.guide_last_target]
-        await _edit_pm(ctx, uid, mid, "🧭 به چه کسی راهنمایی می‌دهی؟",
-                       _kb_night_seats(targets, g, "nem_guide_", selected=s, confirm_cb="nem_guide_confirm"))
-        return
-
-    # ── استعلامِ شهروندِ راهنمایی‌گرفته ──
-    if data.startswith("nem_ginv_"):
-        s = int(data.rsplit("_", 1)[1])
-        _tu, tname = g.seats[s]
-        res = "مثبت ✅" if _nem_guide_positive(g, s) else "منفی ❌"
-        if "مثبت" in res:
-            _sc_add(g, _seat_of_uid(g, uid), "inq", 5, f"استعلام مثبت ({s})")
-        await _close_pm(ctx, uid, mid, f"🔎 استعلام {s}. {tname}: {res}")
-        await _night_report(ctx, g, f"🔎 (راهنمایی) استعلام {s}. {escape(tname, quote=False)}: <b>{res}</b>")
-        store.save()
-        return
-
-
-# ═════════════════════════════════════════════════════════════
-#  موتور شبِ خودکار — سناریو «تکاور»
-#  ترتیب: (سوال شیلد از گاد) → نگهبان + گروگانگیر → مافیا →
-#          کاراگاه/پزشک/تکاور → تفنگدار (آخر از همه)
-# ═════════════════════════════════════════════════════════════
-TAKAVAR_KEY  = "تکاور"
-_R_HOSTAGE   = _nz("گروگانگیر")
-_R_WATCHMAN  = _nz("نگهبان")
-_R_GUNMAN    = _nz("تفنگدار")
-_R_COMMANDO  = _nz("تکاور")
-
-
-def _is_takavar_scenario(g) -> bool:
-    return bool(getattr(g, "scenario", None)) and (_nz(TAKAVAR_KEY) in _nz(g.scenario.name))
-
-
-def _tk_blocked(g, seat) -> bool:
-    """گرو گرفته شده و نگهبانی نشده → حق اکت ندارد."""
-    return (g.night_hostage_seat == seat) and (seat not in set(g.night_guard_seats or []))
-
-
-def _tk_guide_positive(g, seat) -> bool:
-    # استعلام کاراگاه: ناتو و گروگانگیر مثبت، بقیه منفی
-    return _seat_role_norm(g, seat) in (_R_NATO, _R_HOSTAGE)
-
-
-async def _tk_notify_hostaged(ctx, g, seat):
-    # پیامِ «گرو گرفته شدید» به‌صورت مرکزی در _tk_send_hostage_notice ارسال می‌شود
-    await _night_report(ctx, g, f"🔒 صندلی {seat} گرو گرفته شده و اکت نداد.")
-
-
-async def _tk_send_hostage_notice(ctx, g):
-    """پیامِ «گرو گرفته شدید» — فقط برای نقش‌دارهای اکت‌دار (کاراگاه/پزشک/تفنگدار/تکاور،
-    حتی تکاورِ شات‌نشده)؛ نگهبان مستثنی است و نگهبانی‌شده هم بی‌خبر می‌ماند."""
-    hs = getattr(g, "night_hostage_seat", None)
-    if not hs or hs not in g.seats:
-        return
-    if hs in set(g.night_guard_seats or []):
-        return   # نگهبانی شده → اکتِ عادی، بدون هیچ پیامی (گروگانگیر هم نمی‌فهمد)
-    rn = _seat_role_norm(g, hs)
-    if rn in (_R_DETECTIVE, _R_DOCTOR, _R_GUNMAN, _R_COMMANDO):
-        try:
-            await ctx.bot.send_message(g.seats[hs][0], "🔒 شما گرو گرفته شده‌اید و امشب حق اکت ندارید.")
-        except Exception:
-            pass
-        await _night_report(ctx, g, f"🔒 پیامِ گرو به {hs}. {escape(g.seats[hs][1], quote=False)} رفت.")
-
-
-async def _tk_open_shield(ctx, chat_id, g):
-    # 🛡 خودکار: شیلد فقط با اجماعِ رأی نهایی می‌افتد (tk_shield_lost) — سؤالی از گاد پرسیده نمی‌شود
-    g.night_shield = not getattr(g, "tk_shield_lost", False)
-    g.night_done.add("shield")
-    store.save()
-    await _tk_open_first(ctx, chat_id, g)
-
-
-async def _tk_open_first(ctx, chat_id, g):
-    # 🛡 نگهبان (اگر شیلد دارد)
-    watch = _find_seat_by_role(g, _R_WATCHMAN)
-    if g.night_shield and watch:
-        wuid = g.seats[watch][0]
-        need = 2 if g.night_alive_at_start >= 8 else 1
-        g.tk_guard_need = need
-        targets = [s for s in _alive_seats(g) if s != watch]
-        m = await _safe_pm(ctx, wuid, f"🛡 از چه کسانی نگهبانی می‌دهی؟ (تا {need} نفر)",
-                           _kb_night_seats(targets, g, "tk_grd_", selected=set(), confirm_cb="tk_grd_confirm"))
-        if m:
-            g.night_pm_msgs[wuid] = m.message_id
-    else:
-        g.night_done.add("watchman")
-
-    # 🔒 گروگانگیر (اسپم ندارد: دو شب متوالی یک نفر ممنوع؛ رد شدن هم آزاد است)
-    host = _find_seat_by_role(g, _R_HOSTAGE)
-    if host:
-        huid = g.seats[host][0]
-        targets = [s for s in _alive_seats(g) if s != host and s != g.hostage_last_target]
-        kb = _kb_night_seats(targets, g, "tk_host_",
-                             selected=g.night_sel.get(huid), confirm_cb="tk_host_confirm")
-        rows = list(kb.inline_keyboard) + [
-            [InlineKeyboardButton("⏭ امشب گرو نمی‌گیرم", callback_data="tk_host_skip")]
-        ]
-        m = await _safe_pm(ctx, huid, "🔒 چه کسی را گرو می‌گیری؟", InlineKeyboardMarkup(rows))
-        if m:
-            g.night_pm_msgs[huid] = m.message_id
-    else:
-        g.night_done.add("hostage")
-    store.save()
-    await _tk_check_open_mafia(ctx, chat_id, g)
-
-
-async def _tk_check_open_mafia(ctx, chat_id, g):
-    if "mafia_opened" in g.night_done:
-        return
-    if "watchman" not in g.night_done or "hostage" not in g.night_done:
-        return
-    g.night_done.add("mafia_opened")
-    store.save()
-    # 🔒 حالا که هم نگهبان هم گروگانگیر مشخص شده‌اند، پیامِ گرو ارسال می‌شود
-    await _tk_send_hostage_notice(ctx, g)
-    await _tk_open_mafia(ctx, chat_id, g)
-
-
-async def _tk_open_mafia(ctx, chat_id, g):
-    gf = _find_seat_by_role(g, _R_GODFATHER)
-    nato = _find_seat_by_role(g, _R_NATO)
-    host = _find_seat_by_role(g, _R_HOSTAGE)
-    decider = gf or nato or host
-    if not decider:
-        # 🤝 اگر مافیای اصلی نمانده، جذب‌شده (مذاکره/یاکوزایی/خریداری) صاحبِ شات می‌شود
-        converted = sorted(_mafia_seats(g, alive_only=True))
-        decider = converted[0] if converted else None
-    if not decider:
-        g.night_done.add("mafia")
-        store.save()
-        await _tk_check_open_citizens(ctx, chat_id, g)
-        return
-    g.tk_decider_seat = decider
-    duid = g.seats[decider][0]
-    rows = [[InlineKeyboardButton("🔫 شات", callback_data="tk_shot")]]
-    if nato is not None and not g.nato_used:
-        rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="tk_nato")])
-    m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:",
-                       InlineKeyboardMarkup(rows))
-    if m:
-        g.night_pm_msgs[duid] = m.message_id
-    store.save()
-
-
-async def _tk_check_open_citizens(ctx, chat_id, g):
-    if "citizens_opened" in g.night_done:
-        return
-    if "mafia" not in g.night_done:
-        return
-    g.night_done.add("citizens_opened")
-    store.save()
-    await _tk_open_citizens(ctx, chat_id, g)
-
-
-async def _tk_open_citizens(ctx, chat_id, g):
-    # 🔎 کاراگاه
-    det = _find_seat_by_role(g, _R_DETECTIVE)
-    if not det:
-        g.night_done.add("detective")
-    elif _tk_blocked(g, det):
-        await _tk_notify_hostaged(ctx, g, det)
-        g.night_done.add("detective")
-    else:
-        duid = g.seats[det][0]
-        targets = [s for s in _alive_seats(g) if s != det]
-        m = await _safe_pm(ctx, duid, "🔎 استعلام چه کسی را می‌گیری؟",
-                           _kb_night_seats(targets, g, "tk_det_"))
-        if m:
-            g.night_pm_msgs[duid] = m.message_id
-
-    # 💉 پزشک
-    doc = _find_seat_by_role(g, _R_DOCTOR)
-    if not doc:
-        g.night_done.add("doctor")
-    elif _tk_blocked(g, doc):
-        await _tk_notify_hostaged(ctx, g, doc)
-        g.night_done.add("doctor")
-    else:
-        duid = g.seats[doc][0]
-        need = 2 if g.night_alive_at_start >= 8 else 1
-        g.night_doc_need = need
-        targets = _doctor_targets(g, doc)
-        m = await _safe_pm(ctx, duid, f"💉 چه کسی را سیو می‌دهی؟ (تا {need} نفر)",
-                           _kb_night_seats(targets, g, "tk_doc_", selected=set(),
-                                           confirm_cb="tk_doc_confirm"))
-        if m:
-            g.night_pm_msgs[duid] = m.message_id
-
-    # 🎖 تکاور — فقط اگر مافیا او را «شات» کرده باشد، بلاک نباشد و تیرش نسوخته باشد
-    com = _find_seat_by_role(g, _R_COMMANDO)
-    if (com and g.night_shot_target == com and not _tk_blocked(g, com)
-            and not getattr(g, "tk_com_burned", False)):
-        cuid = g.seats[com][0]
-        targets = [s for s in _alive_seats(g) if s != com]
-        m = await _safe_pm(ctx, cuid, "🎖 شما شات شدید! می‌توانید یک نفر را بزنید (یک‌بار):",
-                           _kb_night_seats(targets, g, "tk_com_",
-                                           selected=g.night_sel.get(cuid), confirm_cb="tk_com_confirm"))
-        if m:
-            g.night_pm_msgs[cuid] = m.message_id
-    else:
-        if com and g.night_shot_target == com and getattr(g, "tk_com_burned", False):
-            await _night_report(ctx, g, "🎖 تکاور دوباره شات شد، اما تیرش قبلاً سوخته — ضدشلیکی ندارد.")
-        g.night_done.add("commando")
-    store.save()
-    await _tk_check_open_gunman(ctx, chat_id, g)
-
-
-async def _tk_check_open_gunman(ctx, chat_id, g):
-    if "gunman_opened" in g.night_done:
-        return
-    if not all(k in g.night_done for k in ("detective", "doctor", "commando")):
-        return
-    g.night_done.add("gunman_opened")
-    store.save()
-    await _tk_open_gunman(ctx, chat_id, g)
-
-
-async def _tk_open_gunman(ctx, chat_id, g):
-    if g.war_gun_used:
-        g.night_done.add("gunman")
-        store.save()
-        return
-    gun = _find_seat_by_role(g, _R_GUNMAN)
-    if not gun:
-        g.night_done.add("gunman")
-        store.save()
-        return
-    if _tk_blocked(g, gun):
-        await _tk_notify_hostaged(ctx, g, gun)
-        g.night_done.add("gunman")
-        store.save()
-        return
-    guid = g.seats[gun][0]
-    kb = InlineKeyboardMarkup([
-        [InlineKeyboardButton("✅ بله", callback_data="tk_gun_yes")],
-        [InlineKeyboardButton("🚫 خیر", callback_data="tk_gun_no")],
-    ])
-    m = await _safe_pm(ctx, guid, "🔫 آیا امشب تفنگ می‌دهی؟", kb)
-    if m:
-        g.night_pm_msgs[guid] = m.message_id
-    store.save()
-
-
-def _tk_gun_type_kb(g, target, gun_num, gun_seat):
-    allow_war = (target != gun_seat)  # به خودش تفنگ جنگی نمی‌دهد
-    if gun_num == 2 and g.night_gun1_type == "war":
-        allow_war = False              # اگر تفنگ اول جنگی بود، دومی جنگی نمی‌شود
-    rows = []
-    if allow_war:
-        rows.append([InlineKeyboardButton("🔴 جنگی", callback_data=f"tk_g{gun_num}war")])
-    rows.append([InlineKeyboardButton("⚪ مشقی", callback_data=f"tk_g{gun_num}blank")])
-    return InlineKeyboardMarkup(rows)
-
-
-async def _tk_ask_gun2(ctx, uid, mid):
-    kb = InlineKeyboardMarkup([
-        [InlineKeyboardButton("✅ بله", callback_data="tk_gun2_yes")],
-        [InlineKeyboardButton("🚫 خیر", callback_data="tk_gun2_no")],
-    ])
-    await _edit_pm(ctx, uid, mid, "🔫 آیا تفنگ دوم هم می‌دهی؟", kb)
-
-
-async def _tk_finalize_gunman(ctx, chat_id, g, uid, mid):
-    recips = []
-    for t, typ in ((g.night_gun1_target, g.night_gun1_type), (g.night_gun2_target, g.night_gun2_type)):
-        if t and typ:
-            recips.append((t, typ))
-    # تفنگ جنگی → مصرف و ثبت دارنده
-    for t, typ in recips:
-        if typ == "war":
-            g.war_gun_used = True
-            g.war_gun_holder = t
-    # به گیرنده‌ها فقط بگو «تفنگ دارید» (بدون نوع)
-    for t, typ in recips:
-        try:
-            await ctx.bot.send_message(g.seats[t][0], "🔫 شما تفنگ دارید.")
-        except Exception:
-            pass
-    # گزارش کامل (با نوع) به گاد
-    def _lbl(t, typ):
-        nm = g.seats[t][1]
-        return f"{t}. {nm} ({'جنگی🔴' if typ == 'war' else 'مشقی⚪'})"
-    parts = [_lbl(t, typ) for t, typ in recips] or ["—"]
-    await _close_pm(ctx, uid, mid, "🔫 توزیع تفنگ ثبت شد.")
-    await _night_report(ctx, g, "🔫 تفنگدار → " + " | ".join(parts))
-    # 🔫 گان‌ها فردا (روزِ بعد) با نوشتنِ «گان» در گروه قابلِ شلیک‌اند
-    g.tk_day_guns = {t: typ for t, typ in recips}
-    g.tk_gun_aiming = None
-    g.night_done.add("gunman")
-    store.save()
-
-
-async def _tk_day_gun_fire(ctx, chat_id, g, shooter, target):
-    """🔫 شلیکِ گانِ روز: مشقی = هیچ؛ جنگی = خروج (نگهبانِ شیلددار → فقط افتادنِ شیلد)."""
-    typ = (g.tk_day_guns or {}).pop(shooter, None)
-    g.tk_gun_aiming = None
-    store.save()
-    if typ is None or target not in g.seats:
-        return
-    tname = escape(g.seats[target][1], quote=False)
-    sname = escape(g.seats[shooter][1], quote=False)
-    if typ != "war":
-        await ctx.bot.send_message(
-            chat_id, f"💨 تیر مشقی بود — {target}. {tname} وصیت نکند.", parse_mode="HTML")
-        await _night_report(ctx, g, f"💨 گانِ روز: {shooter}. {sname} → {target}. {tname} (مشقی)")
-        return
-    rn = _seat_role_norm(g, target)
-    if rn == _R_WATCHMAN and not getattr(g, "tk_shield_lost", False):
-        # 🛡 نگهبانِ شیلددار: نمی‌میرد — بعد از ۵۰ ثانیه اعلام می‌شود که زره‌اش افتاد
-        g.tk_shield_lost = True
-        store.save()
-        await ctx.bot.send_message(
-            chat_id, f"💥 تیر جنگی — {target}. {tname} وصیت کند.", parse_mode="HTML")
-        await _night_report(ctx, g, f"🔫 گانِ روز: {shooter}. {sname} → {target}. {tname} "
-                                    f"(جنگی — شیلدِ نگهبان افتاد، در بازی ماند)")
-
-        async def _tk_shield_later():
-            try:
-                await asyncio.sleep(SIDE_ANNOUNCE_DELAY)
-                if g.phase in ("idle", "ended"):
-                    return
-                await ctx.bot.send_message(
-                    chat_id,
-                    f"🛡 {target}. {tname} زره داشت — <b>زره‌اش افتاد</b> و در بازی می‌ماند.",
-                    parse_mode="HTML")
-            except Exception as e:
-                print("⚠️ tk shield announce err:", e)
-        asyncio.create_task(_tk_shield_later())
-        return
-    g.striked.add(target)
-    store.save()
-    await ctx.bot.send_message(
-        chat_id, f"💥 تیر جنگی — {target}. {tname} وصیت کند.", parse_mode="HTML")
-    try:
-        await publish_seating(ctx, chat_id, g, mode=CTRL)
-    except Exception:
-        pass
-    await _night_report(ctx, g, f"🔫 گانِ روز: {shooter}. {sname} → {target}. {tname} "
-                                f"(جنگی — خارج شد، {_sc_side(g, target)})")
-    await _check_auto_end(ctx, chat_id, g)   # 🏁
-
-    # ⏳ ساید بعد از وصیت اعلام می‌شود (۷۵ ثانیه بعد)
-    _tside = _sc_side(g, target)
-
-    async def _tk_side_later():
-        try:
-            await asyncio.sleep(SIDE_ANNOUNCE_DELAY)
-            if g.phase in ("idle", "ended"):
-                return
-            await ctx.bot.send_message(
-                chat_id, f"ساید {target}. {tname}: <b>{_tside}</b>", parse_mode="HTML")
-        except Exception as e:
-            print("⚠️ tk side announce err:", e)
-    asyncio.create_task(_tk_side_later())
-
-
-# ═══════════════ 🤝 موتورِ معتمدِ کاپو (کاپو — روز ۱) ═══════════════
-def _kp_deng_end_kb():
-    return InlineKeyboardMarkup([[InlineKeyboardButton("✅ پایان شمارش", callback_data="kpe_end")]])
-
-
-def _kp_deng_roles(g):
-    alive = set(_alive_seats(g))
-    if int(getattr(g, "kp_deng_stage", 0) or 0) <= 1:
-        return alive, alive
-    cands = set(getattr(g, "kp_deng_cands", []) or []) & alive
-    return alive - cands, cands
-
-
-async def _kp_round_msg(ctx, chat_id, g, text):
-    old = getattr(g, "kp_deng_kb_mid", None)
-    if old:
-        try:
-            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=old, reply_markup=None)
-        except Exception:
-            pass
-    m = await ctx.bot.send_message(chat_id, text, parse_mode="HTML", reply_markup=_kp_deng_end_kb())
-    g.kp_deng_kb_mid = m.message_id
-    store.save()
-
-
-async def _kp_deng_capture(ctx, g, msg, uid, text) -> bool:
-    vs = _seat_of_uid(g, uid)
-    if vs is None or vs in (g.striked or set()) or uid == g.god_id:
-        return False
-    voters, cands = _kp_deng_roles(g)
-    if vs not in voters:
-        return True
-    v = _deng_parse_strict(text, tuple(c for c in cands if c != vs))
-    if v is not None:
-        g.kp_deng_seq = int(getattr(g, "kp_deng_seq", 0) or 0) + 1
-        g.kp_deng_votes[uid] = (v, g.kp_deng_seq)
-        g.kp_deng_unread.discard(uid)
-        store.save()
-        if all(g.seats[s][0] in g.kp_deng_votes for s in voters):
-            await _kp_deng_count(ctx, msg.chat.id, g)
-        return True
-    if uid not in (g.kp_deng_votes or {}):
-        _first = uid not in (g.kp_deng_unread or set())
-        g.kp_deng_unread.add(uid)
-        store.save()
-        if _first:
-            try:
-                await msg.reply_text(f"⚠️ {vs}. {g.seats[vs][1]} دنگت خوانده نشد — "
-                                     f"فقط شماره‌ی یکی از صندلی‌ها را بنویس (به‌جز خودت).")
-            except Exception:
-                pass
-        return True
-    return False
-
-
-async def _kp_deng_count(ctx, chat_id, g):
-    """شمارشِ معتمدِ کاپو — یک برنده؛ هر تساوی‌ای → حذفی (متناوب از ۱ و ۱۰) تا یکتا شدن."""
-    if not getattr(g, "kp_deng_active", False):
-        return
-    voters_now, cands_now = _kp_deng_roles(g)
-    votes = {}
-    for u, (seat, seq) in dict(g.kp_deng_votes or {}).items():
-        vs = _seat_of_uid(g, u)
-        if vs is None or vs not in voters_now or seat == vs or seat not in cands_now:
-            continue
-        votes[u] = (seat, seq)
-    counts, tops = _nem_deng_tally(votes)
-    if not tops:
-        await ctx.bot.send_message(chat_id, "🗳 هنوز دنگِ معتبری ثبت نشده — رأی‌گیری ادامه دارد.")
-        return
-    g.kp_deng_votes = {}
-    g.kp_deng_unread = set()
-    store.save()
-    alive = set(_alive_seats(g))
-
-    if len(tops) == 1:
-        w = tops[0]
-        old = getattr(g, "kp_deng_kb_mid", None)
-        if old:
-            try:
-                await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=old, reply_markup=None)
-            except Exception:
-                pass
-        g.kp_deng_kb_mid = None
-        g.kp_deng_result = w
-        g.kp_deng_active = False
-        g.kp_deng_stage = 0
-        g.kp_deng_cands = []
-        store.save()
-        await ctx.bot.send_message(
-            chat_id, f"🤝 معتمدِ کاپو: <b>{w}. {escape(g.seats[w][1], quote=False)}</b> "
-                     f"({counts[w]} دنگ)", parse_mode="HTML")
-        await _night_report(ctx, g, f"🤝 معتمدِ کاپو: {w} — با «باز» ازت تأیید می‌گیرم.")
-        return
-
-    # تساوی (هر اندازه) → حذفی
-    if not (alive - set(tops)):
-        old = getattr(g, "kp_deng_kb_mid", None)
-        if old:
-            try:
-                await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=old, reply_markup=None)
-            except Exception:
-                pass
-        g.kp_deng_kb_mid = None
-        g.kp_deng_active = False
-        g.kp_deng_stage = 0
-        g.kp_deng_cands = []
-        g.kp_need_manual = True
-        store.save()
-        await ctx.bot.send_message(chat_id, "⚖️ حذفی رأی‌دهنده ندارد — تعیینِ معتمد با گاد.")
-        return
-    g.kp_deng_cands = list(tops)
-    g.kp_deng_stage = max(2, int(getattr(g, "kp_deng_stage", 1) or 1))
-    g.kp_deng_round = int(getattr(g, "kp_deng_round", 1) or 1) + 1
-    store.save()
-    frm = "۱" if (g.kp_deng_round % 2 == 1) else "۱۰"
-    lst = "، ".join(str(s) for s in tops)
-    await _kp_round_msg(
-        ctx, chat_id, g,
-        f"⚖️ تساوی بینِ: <b>{lst}</b>\n"
-        f"🗳 حذفی — از صندلی {frm}: فقط شماره‌ی یکی از همین‌ها را بنویسید "
-        f"(خودِ این افراد رأی نمی‌دهند).")
-
-
-async def _kp_ask_gun_type(ctx, g):
-    """🔫 از کاپو (یا اگر مرده، از گاد): گانِ اول چه باشد؟ دومی خودکار برعکس."""
-    kb = InlineKeyboardMarkup([[
-        InlineKeyboardButton("🔴 جنگی", callback_data="kpg_war"),
-        InlineKeyboardButton("⚪ مشقی", callback_data="kpg_blank"),
-    ]])
-    kapo = _sc_find_role(g, _SC_SHOOTER_ROLES)
-    target_uid = g.seats[kapo][0] if kapo is not None else g.god_id
-    m = await _safe_pm(ctx, target_uid,
-                       "🔫 گانِ اول چه باشد؟ (گانِ دوم خودکار برعکسِ آن است)", kb)
-    if not m and target_uid != g.god_id:
-        await _safe_pm(ctx, g.god_id,
-                       "🔫 پیویِ کاپو بسته بود — گانِ اول چه باشد؟ (دومی برعکس)", kb)
-
-
-async def _kp_pair_kb_update(ctx, chat_id, g):
-    """👥 روی پیامِ گان: انتخابِ دو نفرِ دفاع توسط گاد (با ✅ و تأیید)."""
-    tmp = getattr(g, "kp_pair_tmp", []) or []
-    rows = []
-    for s in _alive_seats(g):
-        mark = "✅ " if s in tmp else ""
-        rows.append([InlineKeyboardButton(f"{mark}{s} {g.seats[s][1]}", callback_data=f"kpd_{s}")])
-    rows.append([InlineKeyboardButton("✅ تأیید (۲ نفر)", callback_data="kpd_ok")])
-    txt = "👥 چه کسانی در دفاع هستند؟ دو نفر را انتخاب و تأیید کن (فقط گاد)."
-    mid = getattr(g, "kp_gun_msg_id", None)
-    try:
-        await ctx.bot.edit_message_text(chat_id=chat_id, message_id=mid, text=txt,
-                                        reply_markup=InlineKeyboardMarkup(rows))
-    except Exception:
-        try:
-            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=mid,
-                                                    reply_markup=InlineKeyboardMarkup(rows))
-        except Exception:
-            m = await ctx.bot.send_message(chat_id, txt, reply_markup=InlineKeyboardMarkup(rows))
-            g.kp_gun_msg_id = m.message_id
-            store.save()
-
-
-async def _kp_gun_prompt(ctx, chat_id, g):
-    """🔫 پرامپتِ اکتِ گان برای معتمد — با نامِ واقعیِ دو نفرِ انتخابیِ گاد."""
-    t = getattr(g, "kp_trust", None)
-    pair = list(getattr(g, "kp_gun_targets", []) or [])
-    if t is None or t not in g.seats or len(pair) != 2:
-        return
-    stage = int(getattr(g, "kp_gun_stage", 0) or 0)
-    used = getattr(g, "kp_gun_used_opt", None)
-    lbl = "اول" if stage == 1 else "دوم"
-    rows = []
-    if used != "t1" and pair[0] in g.seats:
-        rows.append([InlineKeyboardButton(f"{pair[0]}. {g.seats[pair[0]][1]}", callback_data="kpf_t1")])
-    if used != "t2" and pair[1] in g.seats:
-        rows.append([InlineKeyboardButton(f"{pair[1]}. {g.seats[pair[1]][1]}", callback_data="kpf_t2")])
-    if used != "air":
-        rows.append([InlineKeyboardButton("🌫 هوایی", callback_data="kpf_air")])
-    txt = (f"🤝 معتمدِ کاپو {t}. {escape(g.seats[t][1], quote=False)} — "
-           f"گانِ {lbl} را چگونه استفاده می‌کنی؟")
-    mid = getattr(g, "kp_gun_msg_id", None)
-    try:
-        await ctx.bot.edit_message_text(chat_id=chat_id, message_id=mid, text=txt,
-                                        parse_mode="HTML", reply_markup=InlineKeyboardMarkup(rows))
-    except Exception:
-        m = await ctx.bot.send_message(chat_id, txt, parse_mode="HTML",
-                                       reply_markup=InlineKeyboardMarkup(rows))
-        g.kp_gun_msg_id = m.message_id
-        store.save()
-
-
-async def _kp_gun_resolve(ctx, chat_id, g, opt):
-    """🔫 شلیک: مشقی=هیچ؛ جنگی به شخص=خطِ خودکار + ساید بعد از ۵۰ ثانیه؛ هوایی=هدر."""
-    stage = int(getattr(g, "kp_gun_stage", 0) or 0)
-    g1 = getattr(g, "kp_gun1_type", None) or "blank"
-    typ = g1 if stage == 1 else ("blank" if g1 == "war" else "war")
-    lbl = "اول" if stage == 1 else "دوم"
-    pair = list(getattr(g, "kp_gun_targets", []) or [])
-    hit_person = opt in ("t1", "t2") and len(pair) == 2
-    target = pair[0] if opt == "t1" else (pair[1] if opt == "t2" else None)
-
-    if not hit_person:
-        await ctx.bot.send_message(chat_id, f"🌫 گانِ {lbl} هوایی شلیک شد.", parse_mode="HTML")
-        await _night_report(ctx, g, f"🔫 گانِ {lbl} ({'جنگی' if typ == 'war' else 'مشقی'}) → هوایی")
-    elif typ != "war":
-        _tn = escape(g.seats[target][1], quote=False)
-        await ctx.bot.send_message(chat_id, f"💨 تفنگ مشقی بود — {target}. {_tn} وصیت نکند.",
-                                   parse_mode="HTML")
-        await _night_report(ctx, g, f"🔫 گانِ {lbl} (مشقی) → {target}. {_tn}")
-    else:
-        _tn = escape(g.seats[target][1], quote=False)
-        g.striked.add(target)
-        store.save()
-        await ctx.bot.send_message(chat_id, f"💥 گان جنگی — {target}. {_tn} وصیت کند.",
-                                   parse_mode="HTML")
-        try:
-            await publish_seating(ctx, chat_id, g, mode=CTRL)
-        except Exception:
-            pass
-        await _night_report(ctx, g, f"🔫 گانِ {lbl} (جنگی) → {target}. {_tn} خارج شد "
-                                    f"({_sc_side(g, target)})")
-        await _check_auto_end(ctx, chat_id, g)   # 🏁
-        _lside = _sc_side(g, target)
-
-        async def _kp_side_later():
-            try:
-                await asyncio.sleep(SIDE_ANNOUNCE_DELAY)
-                if g.phase in ("idle", "ended"):
-                    return
-                await ctx.bot.send_message(chat_id, f"ساید {target}. {_tn}: <b>{_lside}</b>",
-                                           parse_mode="HTML")
-            except Exception as e:
-                print("⚠️ kp side err:", e)
-        asyncio.create_task(_kp_side_later())
-
-    # پایان یا گانِ دوم
-    if stage == 1 and not (typ == "war" and hit_person):
-        g.kp_gun_stage = 2
-        g.kp_gun_used_opt = opt
-        store.save()
-        await _kp_gun_prompt(ctx, chat_id, g)
-        return
-    # جنگیِ خورده به شخص در گانِ اول، یا پایانِ گانِ دوم
-    g.kp_gun_done = True
-    store.save()
-    mid = getattr(g, "kp_gun_msg_id", None)
-    try:
-        await ctx.bot.edit_message_text(chat_id=chat_id, message_id=mid,
-                                        text="🔫 اکتِ گان تمام شد.", parse_mode="HTML")
-    except Exception:
-        pass
-
-
-async def handle_kapu_trust_callback(update, ctx):
-    """🤝 کاپو: پایانِ شمارش، تأیید/انتخابِ معتمد، نوعِ گان، انتخابِ جفتِ دفاع، اکتِ گان."""
-    q = update.callback_query
-    data = q.data
-    uid = _q_uid(q)   # 🎛 اکتِ دستی
-
-    # پایانِ شمارش — دکمه‌ی گروهی، چت-محور
-    if data == "kpe_end":
-        chat_id = q.message.chat.id if q.message else None
-        g = store.games.get(chat_id) if chat_id is not None else None
-        if (g is None or g.god_id != uid or not _is_kapu_scenario(g)
-                or not getattr(g, "kp_deng_active", False)):
-            await safe_q_answer(q, "شمارشِ فعالی نیست.", show_alert=True)
-            return
-        await safe_q_answer(q)
-        await _kp_deng_count(ctx, chat_id, g)
-        return
-
-    # اکتِ گان — دکمه‌ی گروهی
-    if data == "kpg_act":
-        chat_id = q.message.chat.id if q.message else None
-        g = store.games.get(chat_id) if chat_id is not None else None
-        if g is None or not _is_kapu_scenario(g) or getattr(g, "kp_gun_done", False):
-            await safe_q_answer(q, "درخواست معتبر نیست.", show_alert=True)
-            return
-        if uid != g.god_id:
-            await safe_q_answer(q, "⛔ فقط گادِ بازی.", show_alert=True)
-            return
-        if getattr(g, "kp_gun_stage", 0):
-            await safe_q_answer(q, "اکتِ گان در جریان است.", show_alert=True)
-            return
-        await safe_q_answer(q)
-        # 👥 دکمه‌ها تبدیل می‌شوند به انتخابِ دو نفرِ دفاع (وسطِ گروه، فقط گاد)
-        g.kp_pair_tmp = []
-        g.kp_gun_used_opt = None
-        store.save()
-        await _kp_pair_kb_update(ctx, chat_id, g)
-        return
-
-    # 👥 انتخاب/تأییدِ دو نفرِ دفاع — دکمه‌های گروهی، فقط گاد
-    if data.startswith("kpd_"):
-        chat_id = q.message.chat.id if q.message else None
-        g = store.games.get(chat_id) if chat_id is not None else None
-        if (g is None or not _is_kapu_scenario(g) or getattr(g, "kp_gun_done", False)
-                or getattr(g, "kp_gun_stage", 0)):
-            await safe_q_answer(q, "درخواست معتبر نیست.", show_alert=True)
-            return
-        if uid != g.god_id:
-            await safe_q_answer(q, "⛔ فقط گادِ بازی.", show_alert=True)
-            return
-        if data == "kpd_ok":
-            if len(g.kp_pair_tmp or []) != 2:
-                await safe_q_answer(q, "دقیقاً ۲ نفر را انتخاب کن.", show_alert=True)
-                return
-            await safe_q_answer(q)
-            g.kp_gun_targets = list(g.kp_pair_tmp)
-            g.kp_pair_tmp = []
-            g.kp_gun_stage = 1
-            _bump_defense_history(g, g.kp_gun_targets)   # 📜 جفتِ دفاعِ کاپویی سابقه‌دار می‌شوند
-            store.save()
-            await _kp_gun_prompt(ctx, chat_id, g)
-            return
-        await safe_q_answer(q)
-        s = int(data.rsplit("_", 1)[1])
-        if s in g.seats and s not in (g.striked or set()):
-            tmp = list(g.kp_pair_tmp or [])
-            if s in tmp:
-                tmp.remove(s)
-            elif len(tmp) < 2:
-                tmp.append(s)
-            g.kp_pair_tmp = tmp
-            store.save()
-            await _kp_pair_kb_update(ctx, chat_id, g)
-        return
-
-    # بقیه: پیویِ گاد/کاپو/معتمد → بازیِ کاپوی فعالِ مرتبط
-    g = None; chat_id = None
-    for cid, game in store.games.items():
-        if game.phase in ("idle", "ended") or not _is_kapu_scenario(game):
-            continue
-        if data.startswith("kpc_") and game.god_id == uid:
-            g, chat_id = game, cid
-            break
-        if data.startswith("kpg_"):
-            kapo = _sc_find_role(game, _SC_SHOOTER_ROLES)
-            if (game.god_id == uid or (kapo is not None and game.seats[kapo][0] == uid)) \
-                    and getattr(game, "kp_trust", None) and not getattr(game, "kp_gun1_type", None):
-                g, chat_id = game, cid
-                break
-        if data.startswith("kpf_"):
-            t = getattr(game, "kp_trust", None)
-            if (t is not None and t in game.seats and game.seats[t][0] == uid
-                    and getattr(game, "kp_gun_stage", 0)):
-                g, chat_id = game, cid
-                break
-    if g is None:
-        await safe_q_answer(q, "درخواستِ فعالی یافت نشد.", show_alert=True)
-        return
-    mid = q.message.message_id if q.message else None
-
-    if data == "kpc_yes":
-        res = getattr(g, "kp_deng_result", None)
-        if not res or res not in g.seats or res in (g.striked or set()) or getattr(g, "kp_trust", None):
-            await safe_q_answer(q, "درخواست معتبر نیست.", show_alert=True)
-            return
-        await safe_q_answer(q)
-        g.kp_trust = res
-        g.kp_deng_result = None
-        store.save()
-        await _close_pm(ctx, uid, mid, f"✅ معتمدِ کاپو: {res}. {g.seats[res][1]}")
-        await _kp_ask_gun_type(ctx, g)
-        return
-
-    if data == "kpc_no":
-        if getattr(g, "kp_trust", None):
-            await safe_q_answer(q, "درخواست معتبر نیست.", show_alert=True)
-            return
-        await safe_q_answer(q)
-        g.kp_deng_result = None
-        g.kp_need_manual = True
-        store.save()
-        rows = [[InlineKeyboardButton(f"{s} {g.seats[s][1]}", callback_data=f"kpc_p_{s}")]
-                for s in _alive_seats(g)]
-        await _edit_pm(ctx, uid, mid, "🤝 معتمدِ کاپو را انتخاب کن:", InlineKeyboardMarkup(rows))
-        return
-
-    if data.startswith("kpc_p_"):
-        if getattr(g, "kp_trust", None):
-            await safe_q_answer(q, "قبلاً ثبت شده.", show_alert=True)
-            return
-        await safe_q_answer(q)
-        s = int(data.rsplit("_", 1)[1])
-        if s not in g.seats or s in (g.striked or set()):
-            return
-        g.kp_trust = s
-        g.kp_need_manual = False
-        store.save()
-        await _close_pm(ctx, uid, mid, f"✅ معتمدِ کاپو: {s}. {g.seats[s][1]}")
-        await _kp_ask_gun_type(ctx, g)
-        return
-
-    if data in ("kpg_war", "kpg_blank"):
-        if getattr(g, "kp_gun1_type", None):
-            await safe_q_answer(q, "قبلاً ثبت شده.", show_alert=True)
-            return
-        await safe_q_answer(q)
-        g.kp_gun1_type = "war" if data == "kpg_war" else "blank"
-        store.save()
-        g2 = "مشقی" if g.kp_gun1_type == "war" else "جنگی"
-        g1 = "جنگی" if g.kp_gun1_type == "war" else "مشقی"
-        await _close_pm(ctx, uid, mid, f"🔫 گان اول: {g1} — گان دوم: {g2}")
-        await _night_report(ctx, g, f"🔫 گان‌های معتمد: اول {g1}، دوم {g2} — "
-                                    f"بعد از «بسته» دکمه‌ی اکتِ گان می‌آید.")
-        return
-
-    if data.startswith("kpf_"):
-        opt = data.rsplit("_", 1)[1]   # t1 / t2 / air
-        if opt == getattr(g, "kp_gun_used_opt", None) or opt not in ("t1", "t2", "air"):
-            await safe_q_answer(q, "گزینه معتبر نیست.", show_alert=True)
-            return
-        await safe_q_answer(q)
-        await _kp_gun_resolve(ctx, chat_id, g, opt)
-        return
-# ═══════════════ پایانِ موتورِ کاپو ═══════════════
-
-
-async def handle_takavar_callback(update, ctx):
-    q = update.callback_query
-    data = q.data
-    uid = _q_uid(q)   # 🎛 اکتِ دستی
-
-    # سوال شیلد از گادِ راوی (بازیکن نیست)
-    if data.startswith("tk_shield_"):
-        g = None
-        chat_id = None
-        for cid, game in store.games.items():
-            if getattr(game, "night_active", False) and game.god_id == uid:
-                g, chat_id = game, cid
-                break
-        if g is None:
-            await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
-            return
-        await safe_q_answer(q)
-        mid = q.message.message_id if q.message else None
-        g.night_shield = (data == "tk_shield_yes")
-        g.night_done.add("shield")
-        if not g.night_shield:
-            g.tk_shield_lost = True   # افتادنِ شیلد دائمی است — دیگر نه سؤال، نه اکت
-        await _close_pm(ctx, uid, mid,
-                        "🛡 شیلد نگهبان: بله" if g.night_shield
-                        else "🚫 شیلد افتاد — نگهبان تا آخر بازی دیگر اکت ندارد.")
-        store.save()
-        await _tk_open_first(ctx, chat_id, g)
-        return
-
-    g, chat_id = _find_active_night_game(uid, q)
-    if g is None:
-        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
-        return
-    await safe_q_answer(q)
-    mid = q.message.message_id if q.message else None
-
-    # ── نگهبان (چندانتخابی) ──
-    if data == "tk_grd_confirm":
-        sel = list(g.night_guard_sel.get(uid, []))
-        if not sel:
-            await safe_q_answer(q, "حداقل یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_guard_seats = list(sel)
-        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
-        await _close_pm(ctx, uid, mid, f"🛡 نگهبانی ثبت شد: {names}")
-        await _night_report(ctx, g, f"🛡 نگهبان → نگهبانی از: <b>{escape(names, quote=False)}</b>")
-        g.night_done.add("watchman")
-        store.save()
-        await _tk_check_open_mafia(ctx, chat_id, g)
-        return
-
-    if data.startswith("tk_grd_"):
-        s = int(data.rsplit("_", 1)[1])
-        sel = set(g.night_guard_sel.get(uid, []))
-        need = g.tk_guard_need or 1
-        if s in sel:
-            sel.remove(s)
-        elif len(sel) >= need:
-            await safe_q_answer(q, f"حداکثر {need} نفر.", show_alert=True)
-            return
-        else:
-            sel.add(s)
-        g.night_guard_sel[uid] = list(sel)
-        store.save()
-        watch = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != watch]
-        await _edit_pm(ctx, uid, mid, f"🛡 از چه کسانی نگهبانی می‌دهی؟ (تا {need} نفر)",
-                       _kb_night_seats(targets, g, "tk_grd_", selected=sel, confirm_cb="tk_grd_confirm"))
-        return
-
-    # ── گروگانگیر ──
-    if data == "tk_host_skip":
-        g.night_hostage_seat = None
-        g.hostage_last_target = None   # محدودیتِ نفرِ قبلی آزاد می‌شود
-        g.night_sel.pop(uid, None)
-        await _close_pm(ctx, uid, mid, "⏭ امشب گرو نگرفتی.")
-        await _night_report(ctx, g, "🔒 گروگانگیر → امشب گرو نگرفت")
-        g.night_done.add("hostage")
-        store.save()
-        await _tk_check_open_mafia(ctx, chat_id, g)
-        return
-
-    if data == "tk_host_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_hostage_seat = s
-        g.hostage_last_target = s
-        await _room_note(ctx, g, f"🔒 گروگان: <b>{_room_who(g, s)}</b>")
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"🔒 گرو گرفتی: {s}. {tname}")
-        await _night_report(ctx, g, f"🔒 گروگانگیر → گرو گرفت: <b>{s}. {escape(tname, quote=False)}</b>")
-        g.night_done.add("hostage")
-        store.save()
-        await _tk_check_open_mafia(ctx, chat_id, g)
-        return
-
-    if data.startswith("tk_host_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        host = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != host and x != g.hostage_last_target]
-        await _edit_pm(ctx, uid, mid, "🔒 چه کسی را گرو می‌گیری؟",
-                       _kb_night_seats(targets, g, "tk_host_", selected=s, confirm_cb="tk_host_confirm"))
-        return
-
-    # ── تصمیم مافیا ──
-    if data == "tk_act_back":
-        # ↩️ برگشت به منوی اکتِ مافیای تکاور
-        g.night_sel.pop(uid, None)
-        store.save()
-        _nato = _find_seat_by_role(g, _R_NATO)
-        rows = [[InlineKeyboardButton("🔫 شات", callback_data="tk_shot")]]
-        if _nato is not None and not g.nato_used:
-            rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="tk_nato")])
-        kb = InlineKeyboardMarkup(rows)
-        dec = getattr(g, "tk_decider_seat", None)
-        dec_uid = g.seats[dec][0] if dec in g.seats else None
-        if dec_uid == uid or dec_uid is None:
-            await _edit_pm(ctx, uid, mid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
-        else:
-            await _close_pm(ctx, uid, mid, "↩️ تصمیم به تصمیم‌گیرِ مافیا برگشت.")
-            m = await _safe_pm(ctx, dec_uid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
-            if m:
-                g.night_pm_msgs[dec_uid] = m.message_id
-                store.save()
-        return
-
-    if data == "tk_shot":
-        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_add_back(_kb_night_seats(targets, g, "tk_st_",
-                                                    selected=g.night_sel.get(uid),
-                                                    confirm_cb="tk_st_confirm"),
-                                    "tk_act_back"))
-        return
-
-    if data == "tk_nato":
-        # 🕵️ یک‌بار در کلِ بازی — نگهبان برای کیبوردِ کهنه‌ی شب‌های قبل
-        if g.nato_used:
-            await safe_q_answer(q, "ناتویی قبلاً استفاده شده.", show_alert=True)
-            return
-        nato = _find_seat_by_role(g, _R_NATO)
-        if nato is None:
-            await safe_q_answer(q, "ناتو زنده نیست.", show_alert=True)
-            return
-        nato_uid = g.seats[nato][0]
-        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
-        kb = _kb_add_back(_kb_night_seats(targets, g, "tk_nt_",
-                                          selected=g.night_sel.get(nato_uid),
-                                          confirm_cb="tk_nt_confirm"),
-                          "tk_act_back")
-        if nato_uid == uid:
-            await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟", kb)
-            g.night_pm_msgs[nato_uid] = mid
-        else:
-            await _close_pm(ctx, uid, mid, "🕵️ ناتویی انتخاب شد. منتظر ناتو بمانید.")
-            m = await _safe_pm(ctx, nato_uid, "🕵️ چه کسی را ناتویی می‌کنی؟", kb)
-            if m:
-                g.night_pm_msgs[nato_uid] = m.message_id
-        store.save()
-        return
-
-    # ── شلیک مافیا ──
-    if data == "tk_st_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_shot_target = s
-        await _room_announce_shot(ctx, g, s)
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {tname}")
-        await _night_report(ctx, g, f"🔫 شلیک مافیا → <b>{s}. {escape(tname, quote=False)}</b>")
-        g.night_done.add("mafia")
-        store.save()
-        await _tk_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data.startswith("tk_st_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_add_back(_kb_night_seats(targets, g, "tk_st_", selected=s,
-                                                    confirm_cb="tk_st_confirm"),
-                                    "tk_act_back"))
-        return
-
-    # ── ناتویی (حدس نقش) ──
-    if data.startswith("tk_nrole_"):
-        i = int(data.rsplit("_", 1)[1])
-        names = _nem_citizen_role_names(g)
-        if i >= len(names):
-            return
-        guess_name = names[i]
-        s = g.night_nato_seat
-        if not s:
-            await safe_q_answer(q, "اول هدف را انتخاب کن.", show_alert=True)
-            return
-        _tu, tname = g.seats[s]
-        correct = (_nz(guess_name) == _seat_role_norm(g, s))
-        g.night_nato_correct = correct
-        g.nato_used = True   # 🕵️ مصرف شد — از شبِ بعد دکمه‌اش نمی‌آید
-        tick = "✅" if correct else "❌"
-        await _close_pm(ctx, uid, mid, f"🕵️ ناتویی روی {s}. {tname} ثبت شد.")
-        await _night_report(ctx, g, f"🕵️ ناتو → صندلی {s}. {escape(tname, quote=False)} | حدس نقش: {guess_name} {tick}")
-        voice_god.say(chat_id, "nato")   # 🎙 (تکاور به همه پیامِ جداگانه نمی‌دهد)
-        g.night_done.add("mafia")
-        store.save()
-        await _tk_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data == "tk_nt_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_nato_seat = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _room_note(ctx, g, f"🕵️ ناتویی روی <b>{_room_who(g, s)}</b>")
-        names = _nem_citizen_role_names(g)
-        rows = [[InlineKeyboardButton(rn, callback_data=f"tk_nrole_{i}")] for i, rn in enumerate(names)]
-        await _edit_pm(ctx, uid, mid, f"🕵️ نقش صندلی {s} را حدس بزن:", InlineKeyboardMarkup(rows))
-        return
-
-    if data.startswith("tk_nt_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
-        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی را ناتویی می‌کنی؟",
-                       _kb_add_back(_kb_night_seats(targets, g, "tk_nt_", selected=s,
-                                                    confirm_cb="tk_nt_confirm"),
-                                    "tk_act_back"))
-        return
-
-    # ── کاراگاه (مستقیم) ──
-    if data.startswith("tk_det_"):
-        s = int(data.rsplit("_", 1)[1])
-        _tu, tname = g.seats[s]
-        res = "مثبت ✅" if _tk_guide_positive(g, s) else "منفی ❌"
-        if "مثبت" in res:
-            _sc_add(g, _seat_of_uid(g, uid), "inq", 5, f"استعلام مثبت ({s})")
-        await _close_pm(ctx, uid, mid, f"🔎 استعلام {s}. {tname}: {res}")
-        await _night_report(ctx, g, f"🔎 کاراگاه → استعلام {s}. {escape(tname, quote=False)}: <b>{res}</b>")
-        g.night_done.add("detective")
-        store.save()
-        await _tk_check_open_gunman(ctx, chat_id, g)
-        return
-
-    # ── پزشک ──
-    if data == "tk_doc_confirm":
-        sel = list(g.night_doc_sel.get(uid, []))
-        if not sel:
-            await safe_q_answer(q, "یک نفر را انتخاب کن.", show_alert=True)
-            return
-        doc = _seat_of_uid(g, uid)
-        if doc in sel:
-            g.doctor_self_saves = (g.doctor_self_saves or 0) + 1
-        g.night_doc_saved = list(sel)
-        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
-        await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {names}")
-        await _night_report(ctx, g, f"💉 پزشک → سیو: <b>{escape(names, quote=False)}</b>")
-        g.night_done.add("doctor")
-        store.save()
-        await _tk_check_open_gunman(ctx, chat_id, g)
-        return
-
-    if data.startswith("tk_doc_"):
-        s = int(data.rsplit("_", 1)[1])
-        sel = set(g.night_doc_sel.get(uid, []))
-        need = g.night_doc_need or 1
-        if s in sel:
-            sel.remove(s)
-        elif len(sel) >= need:
-            await safe_q_answer(q, f"حداکثر {need} نفر.", show_alert=True)
-            return
-        else:
-            sel.add(s)
-        g.night_doc_sel[uid] = list(sel)
-        store.save()
-        doc = _seat_of_uid(g, uid)
-        await _edit_pm(ctx, uid, mid, f"💉 چه کسی را سیو می‌دهی؟ (تا {need} نفر)",
-                       _kb_night_seats(_doctor_targets(g, doc), g, "tk_doc_",
-                                       selected=sel, confirm_cb="tk_doc_confirm"))
-        return
-
-    # ── تکاور (شلیک متقابل) ──
-    if data == "tk_com_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_commando_target = s
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"🎖 شلیک تکاور ثبت شد: {s}. {tname}")
-        await _night_report(ctx, g, f"🎖 تکاور → شلیک متقابل به <b>{s}. {escape(tname, quote=False)}</b>")
-        g.night_done.add("commando")
-        store.save()
-        await _tk_check_open_gunman(ctx, chat_id, g)
-        return
-
-    if data.startswith("tk_com_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        com = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != com]
-        await _edit_pm(ctx, uid, mid, "🎖 شما شات شدید! می‌توانید یک نفر را بزنید (یک‌بار):",
-                       _kb_night_seats(targets, g, "tk_com_", selected=s, confirm_cb="tk_com_confirm"))
-        return
-
-    # ── تفنگدار ──
-    if data == "tk_gun_no":
-        await _close_pm(ctx, uid, mid, "🔫 امشب تفنگ ندادی.")
-        await _night_report(ctx, g, "🔫 تفنگدار → تفنگ نداد")
-        g.night_done.add("gunman")
-        store.save()
-        return
-
-    if data == "tk_gun_yes":
-        gun = _seat_of_uid(g, uid)
-        targets = _alive_seats(g)
-        await _edit_pm(ctx, uid, mid, "🔫 تفنگ اول را به چه کسی می‌دهی؟",
-                       _kb_night_seats(targets, g, "tk_g1_",
-                                       selected=g.night_sel.get(uid), confirm_cb="tk_g1_confirm"))
-        return
-
-    if data == "tk_g1_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_gun1_target = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        gun = _seat_of_uid(g, uid)
-        _tu, tname = g.seats[s]
-        await _edit_pm(ctx, uid, mid, f"🔫 تفنگ اول به {s}. {tname} — نوع؟",
-                       _tk_gun_type_kb(g, s, 1, gun))
-        return
-
-    if data.startswith("tk_g1_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        await _edit_pm(ctx, uid, mid, "🔫 تفنگ اول را به چه کسی می‌دهی؟",
-                       _kb_night_seats(_alive_seats(g), g, "tk_g1_", selected=s, confirm_cb="tk_g1_confirm"))
-        return
-
-    if data in ("tk_g1war", "tk_g1blank"):
-        g.night_gun1_type = "war" if data == "tk_g1war" else "blank"
-        store.save()
-        await _tk_ask_gun2(ctx, uid, mid)
-        return
-
-    if data == "tk_gun2_no":
-        await _tk_finalize_gunman(ctx, chat_id, g, uid, mid)
-        return
-
-    if data == "tk_gun2_yes":
-        await _edit_pm(ctx, uid, mid, "🔫 تفنگ دوم را به چه کسی می‌دهی؟",
-                       _kb_night_seats(_alive_seats(g), g, "tk_g2_",
-                                       selected=g.night_sel.get(uid), confirm_cb="tk_g2_confirm"))
-        return
-
-    if data == "tk_g2_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_gun2_target = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        gun = _seat_of_uid(g, uid)
-        _tu, tname = g.seats[s]
-        await _edit_pm(ctx, uid, mid, f"🔫 تفنگ دوم به {s}. {tname} — نوع؟",
-                       _tk_gun_type_kb(g, s, 2, gun))
-        return
-
-    if data.startswith("tk_g2_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        await _edit_pm(ctx, uid, mid, "🔫 تفنگ دوم را به چه کسی می‌دهی؟",
-                       _kb_night_seats(_alive_seats(g), g, "tk_g2_", selected=s, confirm_cb="tk_g2_confirm"))
-        return
-
-    if data in ("tk_g2war", "tk_g2blank"):
-        g.night_gun2_type = "war" if data == "tk_g2war" else "blank"
-        store.save()
-        await _tk_finalize_gunman(ctx, chat_id, g, uid, mid)
-        return
-
-
-# ═════════════════════════════════════════════════════════════
-#  موتور شبِ خودکار — سناریو «کاپو» (مرحله ۱: هسته)
-#  ترتیب: دن (شات/یاکوزایی/جلادی) → جلاد → جادوگر → شهروندان
-# ═════════════════════════════════════════════════════════════
-KAPU_KEY       = "کاپو"
-_R_EXECUTIONER = _nz("جلاد")
-_R_WITCH       = _nz("جادوگر")
-_R_SUSPECT     = _nz("مظنون")
-_R_ATTAR       = _nz("عطار")
-_R_ARMORER     = _nz("زره‌ساز")
-_R_HEIR        = _nz("وارث")
-
-
-def _is_kapu_scenario(g) -> bool:
-    return bool(getattr(g, "scenario", None)) and (_nz(KAPU_KEY) in _nz(g.scenario.name))
-
-
-def _kp_heir_immune(g, seat) -> bool:
-    """وارث تا وقتی فردِ انتخابیِ شهروندش زنده است و هنوز ارث نبرده، نامیراست (جز جلادی)."""
-    if seat != g.heir_seat or g.heir_inherited:
-        return False
-    ht = g.heir_target
-    if ht is None or ht in (g.striked or set()):
-        return False
-    if ht in _mafia_seats(g):
-        return False  # اگر مافیا انتخاب کرده باشد نامیرا نیست
-    return True
-
-
-def _kp_detective_positive(g, seat) -> bool:
-    # مظنون، جلاد، جادوگر مثبت؛ دن‌مافیا همیشه منفی؛ بقیه منفی
-    rn = _seat_role_norm(g, seat)
-    if seat in (g.negotiated_seats or set()):
-        return True
-    return rn in (_R_SUSPECT, _R_EXECUTIONER, _R_WITCH)
-
-
-async def _kp_open_don(ctx, chat_id, g):
-    # ترتیب شات: دن → جادوگر → جلاد
-    don = _find_seat_by_role(g, _R_DON)
-    witch = _find_seat_by_role(g, _R_WITCH)
-    ex = _find_seat_by_role(g, _R_EXECUTIONER)
-    decider = don or witch or ex
-    if not decider:
-        # 🥷 اگر مافیای اصلی نمانده، یاکوزایی/جذب‌شده صاحبِ شات می‌شود
-        for _s in sorted(_mafia_seats(g, alive_only=True)):
-            decider = _s
-            break
-    if not decider:
-        g.night_done.add("mafia")
-        store.save()
-        await _kp_check_open_witch(ctx, chat_id, g)
-        return
-    g.kp_decider_seat = decider
-    duid = g.seats[decider][0]
-    rows = [[InlineKeyboardButton("🔫 شات", callback_data="kp_don_shot")]]
-    # یاکوزایی فقط اگر دن زنده و مصرف نشده
-    if don is not None and not g.yakuza_used:
-        rows.append([InlineKeyboardButton("🥷 یاکوزایی", callback_data="kp_don_yakuza")])
-    # جلادی فقط اگر جلاد زنده و مصرف نشده
-    if ex is not None and not g.jalad_used:
-        rows.append([InlineKeyboardButton("⚔️ جلادی", callback_data="kp_don_jalad")])
-    m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:",
-                       InlineKeyboardMarkup(rows))
-    if m:
-        g.night_pm_msgs[duid] = m.message_id
-    store.save()
-
-
-async def _kp_check_open_witch(ctx, chat_id, g):
-    if "witch_opened" in g.night_done:
-        return
-    if "mafia" not in g.night_done:
-        return
-    g.night_done.add("witch_opened")
-    store.save()
-    witch = _find_seat_by_role(g, _R_WITCH)
-    if not witch:
-        g.night_done.add("witch")
-        store.save()
-        await _kp_check_open_citizens(ctx, chat_id, g)
-        return
-    wuid = g.seats[witch][0]
-    targets = [s for s in _alive_seats(g) if s != witch]
-    m = await _safe_pm(ctx, wuid, "🔮 روی چه کسی جادو می‌کنی؟",
-                       _kb_night_seats(targets, g, "kp_witch_",
-                                       selected=g.night_sel.get(wuid), confirm_cb="kp_witch_confirm"))
-    if m:
-        g.night_pm_msgs[wuid] = m.message_id
-    store.save()
-
-
-async def _kp_check_open_citizens(ctx, chat_id, g):
-    if "citizens_opened" in g.night_done:
-        return
-    if "witch" not in g.night_done:
-        return
-    g.night_done.add("citizens_opened")
-    store.save()
-
-    # 🔎 کاراگاه
-    det = _find_seat_by_role(g, _R_DETECTIVE)
-    if det:
-        duid = g.seats[det][0]
-        targets = [s for s in _alive_seats(g) if s != det]
-        m = await _safe_pm(ctx, duid, "🔎 استعلام چه کسی را می‌گیری؟",
-                           _kb_night_seats(targets, g, "kp_det_"))
-        if m:
-            g.night_pm_msgs[duid] = m.message_id
-
-    # 🛡 زره‌ساز — در شب جلادی و یاکوزایی استراحت
-    if not g.night_doctor_blocked:
-        arm = _find_seat_by_role(g, _R_ARMORER)
-        if arm:
-            auid = g.seats[arm][0]
-            targets = _kp_armorer_targets(g, arm)
-            m = await _safe_pm(ctx, auid, "🛡 تن چه کسی را زره می‌پوشانی؟",
-                               _kb_night_seats(targets, g, "kp_arm_",
-                                               selected=g.night_sel.get(auid), confirm_cb="kp_arm_confirm"))
-            if m:
-                g.night_pm_msgs[auid] = m.message_id
-
-    # 🧪 عطار — سم فقط یک‌بار در کل بازی
-    attar = _find_seat_by_role(g, _R_ATTAR)
-    if attar and not g.attar_poison_used:
-        auid = g.seats[attar][0]
-        kb = InlineKeyboardMarkup([
-            [InlineKeyboardButton("✅ بله", callback_data="kp_attar_yes")],
-            [InlineKeyboardButton("🚫 خیر", callback_data="kp_attar_no")],
-        ])
-        m = await _safe_pm(ctx, auid, "🧪 امشب می‌خواهی به کسی سم بدهی؟", kb)
-        if m:
-            g.night_pm_msgs[auid] = m.message_id
-    store.save()
-
-
-def _kp_armorer_targets(g, arm_seat):
-    out = []
-    for s in _alive_seats(g):
-        if s == arm_seat and (g.doctor_self_saves or 0) >= 1:
-            continue  # خودش فقط یک‌بار در کل بازی
-        out.append(s)
-    return out
-
-
-async def handle_kapu_callback(update, ctx):
-    q = update.callback_query
-    data = q.data
-    uid = _q_uid(q)   # 🎛 اکتِ دستی
-    g, chat_id = _find_active_night_game(uid, q)
-    if g is None:
-        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
-        return
-    await safe_q_answer(q)
-    mid = q.message.message_id if q.message else None
-
-    # ── رأی پادزهر (همه به‌جز عطار) ──
-    if data in ("kp_anti_yes", "kp_anti_no"):
-        g.antidote_votes[uid] = (data == "kp_anti_yes")
-        await _close_pm(ctx, uid, mid, "✅ رأی شما ثبت شد.")
-        store.save()
-        await _kp_vote_report(ctx, g, voter_uid=uid)   # 🧪 گزارشِ زنده به گاد
-        # ✅ کیک‌شده/سوخته‌ها از انتظار خارج‌اند — فقط زنده‌های رأی‌نداده ملاک‌اند
-        if not _kp_antidote_pending(g):
-            await _kp_after_vote(ctx, chat_id, g)
-        return
-
-    # ── تصمیم عطار برای پادزهر ──
-    if data in ("kp_ag_yes", "kp_ag_no"):
-        survived = (data == "kp_ag_yes")
-        await _close_pm(ctx, uid, mid, "✅ تصمیم ثبت شد.")
-        await _kp_apply_poison(ctx, chat_id, g, g.attar_poisoned_seat, survived)
-        return
-
-    # ── تصمیم دن ──
-    if data == "kp_act_back":
-        # ↩️ برگشت به منوی اکتِ مافیا — یاکوزاییِ تأییدنشده هم آزاد می‌شود
-        g.night_sel.pop(uid, None)
-        if getattr(g, "kp_yak_tmp", False):
-            g.yakuza_used = False
-            g.night_yakuza_sacrifice = None
-            g.kp_yak_tmp = False
-        store.save()
-        _don = _find_seat_by_role(g, _R_DON)
-        _ex = _find_seat_by_role(g, _R_EXECUTIONER)
-        rows = [[InlineKeyboardButton("🔫 شات", callback_data="kp_don_shot")]]
-        if _don is not None and not g.yakuza_used:
-            rows.append([InlineKeyboardButton("🥷 یاکوزایی", callback_data="kp_don_yakuza")])
-        if _ex is not None and not g.jalad_used:
-            rows.append([InlineKeyboardButton("⚔️ جلادی", callback_data="kp_don_jalad")])
-        kb = InlineKeyboardMarkup(rows)
-        dec = getattr(g, "kp_decider_seat", None)
-        dec_uid = g.seats[dec][0] if dec in g.seats else None
-        if dec_uid == uid or dec_uid is None:
-            await _edit_pm(ctx, uid, mid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
-        else:
-            await _close_pm(ctx, uid, mid, "↩️ تصمیم به تصمیم‌گیرِ مافیا برگشت.")
-            m = await _safe_pm(ctx, dec_uid, f"🌙 شب {g.night_number}\nاکت مافیا را انتخاب کن:", kb)
-            if m:
-                g.night_pm_msgs[dec_uid] = m.message_id
-                store.save()
-        return
-
-    if data == "kp_don_shot":
-        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_add_back(_kb_night_seats(targets, g, "kp_st_",
-                                                    selected=g.night_sel.get(uid),
-                                                    confirm_cb="kp_st_confirm"),
-                                    "kp_act_back"))
-        return
-
-    if data == "kp_don_yakuza":
-        g.yakuza_used = True
-        g.kp_yak_tmp = True   # ↩️ تا تأیید، قابلِ برگشت
-        store.save()
-        me = _seat_of_uid(g, uid)
-        teammates = [s for s in _mafia_seats(g, alive_only=True) if s != me]
-        if not teammates:
-            g.night_yakuza_sacrifice = me
-            g.night_sel.pop(uid, None)
-            store.save()
-            targets = _kp_yakuza_recruit_targets(g)
-            await _edit_pm(ctx, uid, mid, "🥷 یاری نداری؛ خودت فدا می‌شوی.\nچه کسی را جذب می‌کنی؟",
-                           _kb_add_back(_kb_night_seats(targets, g, "kp_yakrec_",
-                                                        confirm_cb="kp_yakrec_confirm"),
-                                        "kp_act_back"))
-        else:
-            await _edit_pm(ctx, uid, mid, "🥷 کدام یارت را فدا می‌کنی؟",
-                           _kb_add_back(_kb_night_seats(teammates, g, "kp_yaksac_",
-                                                        selected=g.night_sel.get(uid),
-                                                        confirm_cb="kp_yaksac_confirm"),
-                                        "kp_act_back"))
-        return
-
-    if data == "kp_don_jalad":
-        # ⚔️ یک‌بار در کلِ بازی — نگهبان برای کیبوردِ کهنه‌ی شب‌های قبل
-        if g.jalad_used:
-            await safe_q_answer(q, "جلادی قبلاً استفاده شده.", show_alert=True)
-            return
-        ex = _find_seat_by_role(g, _R_EXECUTIONER)
-        if ex is None:
-            await safe_q_answer(q, "جلاد زنده نیست.", show_alert=True)
-            return
-        ex_uid = g.seats[ex][0]
-        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
-        kb = _kb_add_back(_kb_night_seats(targets, g, "kp_jt_",
-                                          selected=g.night_sel.get(ex_uid),
-                                          confirm_cb="kp_jt_confirm"),
-                          "kp_act_back")
-        if ex_uid == uid:
-            await _edit_pm(ctx, uid, mid, "⚔️ نقشِ چه کسی را حدس می‌زنی؟", kb)
-            g.night_pm_msgs[ex_uid] = mid
-        else:
-            await _close_pm(ctx, uid, mid, "⚔️ جلادی انتخاب شد. منتظر جلاد بمانید.")
-            m = await _safe_pm(ctx, ex_uid, "⚔️ نقشِ چه کسی را حدس می‌زنی؟", kb)
-            if m:
-                g.night_pm_msgs[ex_uid] = m.message_id
-        store.save()
-        return
-
-    # ── شلیک ──
-    if data == "kp_st_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_shot_target = s
-        g.night_don_act = "shot"
-        await _room_announce_shot(ctx, g, s)
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {tname}")
-        await _night_report(ctx, g, f"🔫 شلیک مافیا → <b>{s}. {escape(tname, quote=False)}</b>")
-        g.night_done.add("mafia")
-        store.save()
-        await _kp_check_open_witch(ctx, chat_id, g)
-        return
-
-    if data.startswith("kp_st_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_add_back(_kb_night_seats(targets, g, "kp_st_", selected=s,
-                                                    confirm_cb="kp_st_confirm"),
-                                    "kp_act_back"))
-        return
-
-    # ── یاکوزایی: فدا ──
-    if data == "kp_yaksac_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک یار را انتخاب کن.", show_alert=True)
-            return
-        g.night_yakuza_sacrifice = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        targets = _kp_yakuza_recruit_targets(g)
-        await _edit_pm(ctx, uid, mid, "🥷 چه کسی را جذب می‌کنی؟",
-                       _kb_night_seats(targets, g, "kp_yakrec_", confirm_cb="kp_yakrec_confirm"))
-        return
-
-    if data.startswith("kp_yaksac_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        me = _seat_of_uid(g, uid)
-        teammates = [x for x in _mafia_seats(g, alive_only=True) if x != me]
-        await _edit_pm(ctx, uid, mid, "🥷 کدام یارت را فدا می‌کنی؟",
-                       _kb_add_back(_kb_night_seats(teammates, g, "kp_yaksac_", selected=s,
-                                                    confirm_cb="kp_yaksac_confirm"),
-                                    "kp_act_back"))
-        return
-
-    # ── یاکوزایی: جذب (فقط شهرساده یا مظنون) ──
-    if data == "kp_yakrec_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_don_act = "yakuza"
-        tu, tname = g.seats[s]
-        rn = _seat_role_norm(g, s)
-        convertible = (rn in _R_CITIZEN or rn == _R_SUSPECT) and not (
-            s == g.heir_seat and g.heir_no_yakuza)
-        sac = g.night_yakuza_sacrifice
-        sac_txt = f"{sac}. {g.seats[sac][1]}" if sac in g.seats else "—"
-        if convertible:
-            g.negotiated_seats.add(s)
-            try:
-                await ctx.bot.send_message(tu, "🥷 با شما یاکوزایی انجام شده است. اکنون مافیا هستید.")
-            except Exception:
-                pass
-            await _room_send_link(ctx, g, tu)   # لینک اتاق مافیا فوری
-            await _night_report(ctx, g, f"🥷 یاکوزایی → فدا: {sac_txt} | جذب: <b>{s}. {escape(tname, quote=False)}</b> ✅")
-        else:
-            await _night_report(ctx, g, f"🥷 یاکوزایی → فدا: {sac_txt} | جذب: <b>{s}. {escape(tname, quote=False)}</b> → ناموفق ❌")
-        # 📣 اتاقِ مافیا: بدونِ تیک/ضربدر — هر دو حالت یک متنِ یکسان
-        await _room_note(ctx, g, f"🥷 یاکوزایی — فدا: <b>{escape(sac_txt, quote=False)}</b> | "
-                         f"جذب: <b>{_room_who(g, s)}</b>")
-        await _close_pm(ctx, uid, mid, "✅ یاکوزایی ثبت شد.")
-        # 🎙 اعلامِ صوتی در وویس‌چتِ گروه (کاپو جداگانه به همه پیام نمی‌دهد)
-        _cid = _game_chat_id(g)
-        if _cid is not None:
-            voice_god.say(_cid, "yakuza")
-        g.night_doctor_blocked = True   # 🥷 شبِ یاکوزایی → زره‌ساز حقِ سیو ندارد
-        g.night_done.add("mafia")
-        store.save()
-        await _kp_check_open_witch(ctx, chat_id, g)
-        return
-
-    if data.startswith("kp_yakrec_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = _kp_yakuza_recruit_targets(g)
-        await _edit_pm(ctx, uid, mid, "🥷 چه کسی را جذب می‌کنی؟",
-                       _kb_add_back(_kb_night_seats(targets, g, "kp_yakrec_", selected=s,
-                                                    confirm_cb="kp_yakrec_confirm"),
-                                    "kp_act_back"))
-        return
-
-    # ── جلادی (حدس نقش) ──
-    if data.startswith("kp_jrole_"):
-        i = int(data.rsplit("_", 1)[1])
-        names = _nem_citizen_role_names(g)
-        if i >= len(names):
-            return
-        guess_name = names[i]
-        s = g.night_jalad_seat
-        if not s:
-            await safe_q_answer(q, "اول هدف را انتخاب کن.", show_alert=True)
-            return
-        _tu, tname = g.seats[s]
-        correct = (_nz(guess_name) == _seat_role_norm(g, s))
-        g.night_jalad_correct = correct
-        g.night_jalad_target = s
-        tick = "✅" if correct else "❌"
-        await _room_note(ctx, g, f"⚔️ جلادی روی <b>{_room_who(g, s)}</b> — "
-                         f"حدس: «{escape(str(guess_name), quote=False)}»")
-        g.jalad_used = True
-        await _close_pm(ctx, uid, mid, f"⚔️ جلادی روی {s}. {tname} ثبت شد.")
-        await _night_report(ctx, g, f"⚔️ جلاد → صندلی {s}. {escape(tname, quote=False)} | حدس نقش: {guess_name} {tick}")
-        g.night_doctor_blocked = True
-        g.night_done.add("mafia")
-        store.save()
-        await _kp_broadcast_jalad(ctx, g)
-        await _kp_check_open_witch(ctx, chat_id, g)
-        return
-
-    if data == "kp_jt_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_jalad_seat = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        names = _nem_citizen_role_names(g)
-        rows = [[InlineKeyboardButton(rn, callback_data=f"kp_jrole_{i}")] for i, rn in enumerate(names)]
-        await _edit_pm(ctx, uid, mid, f"⚔️ نقش صندلی {s} را حدس بزن:", InlineKeyboardMarkup(rows))
-        return
-
-    if data.startswith("kp_jt_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
-        await _edit_pm(ctx, uid, mid, "⚔️ نقشِ چه کسی را حدس می‌زنی؟",
-                       _kb_add_back(_kb_night_seats(targets, g, "kp_jt_", selected=s,
-                                                    confirm_cb="kp_jt_confirm"),
-                                    "kp_act_back"))
-        return
-
-    # ── جادوگر ──
-    if data == "kp_witch_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_witch_target = s
-        await _room_note(ctx, g, f"🔮 جادو روی <b>{_room_who(g, s)}</b>")
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"🔮 جادو ثبت شد: {s}. {tname}")
-        await _night_report(ctx, g, f"🔮 جادوگر → جادو روی <b>{s}. {escape(tname, quote=False)}</b>")
-        g.night_done.add("witch")
-        store.save()
-        await _kp_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data.startswith("kp_witch_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        witch = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != witch]
-        await _edit_pm(ctx, uid, mid, "🔮 روی چه کسی جادو می‌کنی؟",
-                       _kb_night_seats(targets, g, "kp_witch_", selected=s, confirm_cb="kp_witch_confirm"))
-        return
-
-    # ── کاراگاه (با اثر جادو) ──
-    if data.startswith("kp_det_"):
-        s = int(data.rsplit("_", 1)[1])
-        det = _seat_of_uid(g, uid)
-        witched = (g.night_witch_target == det)
-        _tu, tname = g.seats[s]
-        if witched:
-            pos = False  # جادوشده → استعلامش همیشه منفی (روی خودش)
-        else:
-            pos = _kp_detective_positive(g, s)
-        res = "مثبت ✅" if pos else "منفی ❌"
-        if pos:
-            _sc_add(g, _seat_of_uid(g, uid), "inq", 5, f"استعلام مثبت ({s})")
-        await _close_pm(ctx, uid, mid, f"🔎 استعلام {s}. {tname}: {res}")
-        await _night_report(ctx, g, f"🔎 کاراگاه → استعلام {s}. {escape(tname, quote=False)}: <b>{res}</b>"
-                            + (f" (جادو شده — انتخابش {s}. {escape(tname, quote=False)} بود؛ "
-                               f"استعلام روی خودش برگشت و منفی شد)" if witched else ""))
-        g.night_done.add("detective")
-        store.save()
-        return
-
-    # ── زره‌ساز (با اثر جادو) ──
-    if data == "kp_arm_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        arm = _seat_of_uid(g, uid)
-        witched = (g.night_witch_target == arm)
-        if witched:
-            target = arm  # جادو → زره روی خودش (بدون مصرفِ تک‌سیو)
-        else:
-            target = s
-            if target == arm:
-                g.doctor_self_saves = (g.doctor_self_saves or 0) + 1
-        g.night_doc_saved = [target]
-        # ⚠️ به خودِ زره‌ساز همیشه «انتخابِ خودش» را نشان بده تا جادوشدن لو نرود
-        _sn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"🛡 زره ثبت شد: {s}. {_sn}")
-        _tn = g.seats[target][1]
-        await _night_report(ctx, g, f"🛡 زره‌ساز → زره روی <b>{target}. {escape(_tn, quote=False)}</b>"
-                            + (f" (جادو شده — انتخابش {s}. {escape(_sn, quote=False)} بود)" if witched else ""))
-        g.night_done.add("armorer")
-        store.save()
-        return
-
-    if data.startswith("kp_arm_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        arm = _seat_of_uid(g, uid)
-        await _edit_pm(ctx, uid, mid, "🛡 تن چه کسی را زره می‌پوشانی؟",
-                       _kb_night_seats(_kp_armorer_targets(g, arm), g, "kp_arm_", selected=s, confirm_cb="kp_arm_confirm"))
-        return
-
-    # ── عطار (مرحلهٔ ۱: ثبت سم؛ سازوکار کامل در مرحلهٔ ۲) ──
-    if data == "kp_attar_no":
-        await _close_pm(ctx, uid, mid, "🧪 امشب سم ندادی.")
-        await _night_report(ctx, g, "🧪 عطار → سم نداد")
-        g.night_done.add("attar")
-        store.save()
-        return
-
-    if data == "kp_attar_yes":
-        attar = _seat_of_uid(g, uid)
-        targets = [s for s in _alive_seats(g) if s != attar]
-        await _edit_pm(ctx, uid, mid, "🧪 به چه کسی سم می‌دهی؟",
-                       _kb_night_seats(targets, g, "kp_att_", confirm_cb="kp_att_confirm"))
-        return
-
-    if data == "kp_att_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        attar = _seat_of_uid(g, uid)
-        witched = (g.night_witch_target == attar)
-        target = attar if witched else s
-        g.night_attar_poison_target = target
-        g.attar_poisoned_seat = target      # شب بعد تعیین‌تکلیف می‌شود
-        g.attar_poison_used = True           # سم یک‌بار در کل بازی
-        _tu, tname = g.seats[target]
-        await _close_pm(ctx, uid, mid, "🧪 سم ثبت شد.")
-        await _night_report(ctx, g, f"🧪 عطار → سم به <b>{target}. {escape(tname, quote=False)}</b>"
-                            + (f" (جادو شده — انتخابش {s}. "
-                               f"{escape(g.seats[s][1], quote=False)} بود؛ سم روی خودش برگشت)"
-                               if witched else ""))
-        g.night_done.add("attar")
-        store.save()
-        return
-
-    if data.startswith("kp_att_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        attar = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != attar]
-        await _edit_pm(ctx, uid, mid, "🧪 به چه کسی سم می‌دهی؟",
-                       _kb_night_seats(targets, g, "kp_att_", selected=s, confirm_cb="kp_att_confirm"))
-        return
-
-    # ── انتخاب وارث (شب معارفه) ──
-    if data == "kp_heir_confirm":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.heir_seat = _seat_of_uid(g, uid)
-        g.heir_target = s
-        _tu, tname = g.seats[s]
-        await _close_pm(ctx, uid, mid, f"⚱️ انتخاب وارث ثبت شد: {s}. {tname}")
-        await _night_report(ctx, g, f"⚱️ وارث → انتخاب: <b>{s}. {escape(tname, quote=False)}</b>")
-        store.save()
-        return
-
-    if data.startswith("kp_heir_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        heir = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != heir]
-        await _edit_pm(ctx, uid, mid, "⚱️ چه کسی را انتخاب می‌کنی؟",
-                       _kb_night_seats(targets, g, "kp_heir_", selected=s, confirm_cb="kp_heir_confirm"))
-        return
-
-
-def _kp_yakuza_recruit_targets(g):
-    """🥷 همهٔ زنده‌های غیرِمافیا — دقیقاً مثلِ بازپرس.
-
-    ⚠️ این فهرست نباید فیلتر شود: اگر فقط «قابلِ جذب‌ها» را نشان بدهیم، دن از روی
-    بود‌ونبودِ اسم‌ها می‌فهمد چه کسانی نقش‌دارند. موفق/ناموفق بودنِ جذب موقعِ
-    تأیید (kp_yakrec_confirm) تعیین می‌شود، نه با پنهان‌کردنِ گزینه‌ها."""
-    return [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
-
-
-async def _kp_broadcast_jalad(ctx, g):
-    # 🎙 اعلامِ صوتی در وویس‌چتِ گروه
-    _cid = _game_chat_id(g)
-    if _cid is not None:
-        voice_god.say(_cid, "jalad")
-    for s in _alive_seats(g):
-        try:
-            await ctx.bot.send_message(g.seats[s][0], "🌙 امشب جلادی می‌شود.")
-        except Exception:
-            pass
-    arm = _find_seat_by_role(g, _R_ARMORER)
-    if arm:
-        try:
-            await ctx.bot.send_message(g.seats[arm][0], "💤 امشب استراحت کن — حق زره دادن نداری.")
-        except Exception:
-            pass
-
-
-def _kp_antidote_pending(g):
-    """رأی‌ندادگانِ «هنوز در بازی» — کیک‌شده/سوخته/خط‌خورده/سوزانده‌شده منتظر نمی‌مانیم."""
-    pending = []
-    skipped = getattr(g, "antidote_skipped", set()) or set()
-    for u in (g.antidote_expected or []):
-        if u in (g.antidote_votes or {}) or u in skipped:
-            continue
-        s = _seat_of_uid(g, u)
-        if s is None or s in (g.striked or set()) or s in (g.night_burned or set()):
-            continue
-        pending.append(u)
-    return pending
-
-
-def _kp_vote_panel_kb(g):
-    """دکمه‌های سوزاندنِ رأیِ کسانی که هنوز رأی نداده‌اند."""
-    rows = []
-    for u in _kp_antidote_pending(g):
-        s = _seat_of_uid(g, u)
-        if s is None:
-            continue
-        rows.append([InlineKeyboardButton(f"🔥 {s}. {g.seats[s][1]}", callback_data=f"kpv_b_{s}")])
-    if rows:
-        rows.append([InlineKeyboardButton("🔥 سوزاندنِ همه‌ی رأی‌های مانده", callback_data="kpv_all")])
-    return InlineKeyboardMarkup(rows) if rows else None
-
-
-async def _kp_vote_report(ctx, g, voter_uid=None):
-    """🧪 گزارشِ زنده‌ی رأی‌گیریِ پادزهر در پیویِ گاد (چه کسی رأی داد، چه کسی نداده)."""
-    votes = g.antidote_votes or {}
-    lines = ["🧪 <b>رأی‌گیریِ پادزهر</b>"]
-    if voter_uid is not None:
-        vs = _seat_of_uid(g, voter_uid)
-        if vs is not None:
-            v = votes.get(voter_uid)
-            lines.append(f"🗳 {vs}. {escape(g.seats[vs][1], quote=False)} رأی داد: "
-                         f"<b>{'بله (پادزهر)' if v else 'خیر'}</b>")
-    yes = sum(1 for v in votes.values() if v)
-    no = len(votes) - yes
-    lines.append(f"📊 تا اینجا: <b>{yes}</b> بله | <b>{no}</b> خیر")
-
-    burned = []
-    for u in (getattr(g, "antidote_skipped", set()) or set()):
-        s = _seat_of_uid(g, u)
-        if s is not None:
-            burned.append(f"{s}. {escape(g.seats[s][1], quote=False)}")
-    if burned:
-        lines.append("🔥 رأیِ سوزانده‌شده: " + "، ".join(burned))
-
-    pend = _kp_antidote_pending(g)
-    if pend:
-        names = []
-        for u in pend:
-            s = _seat_of_uid(g, u)
-            if s is not None:
-                names.append(f"{s}. {escape(g.seats[s][1], quote=False)}")
-        lines.append(f"⏳ <b>هنوز رأی نداده‌اند ({len(pend)})</b>: " + "، ".join(names))
-        lines.append("🔥 اگر کسی آفلاین است، رأیش را بسوزان تا شمارش معطل نماند.")
-    else:
-        lines.append("✅ همه تعیین‌تکلیف شدند.")
-
-    txt = "\n".join(lines)
-    kb = _kp_vote_panel_kb(g)
-    mid = getattr(g, "kp_vote_panel_mid", None)
-    if mid:
-        try:
-            await ctx.bot.edit_message_text(chat_id=g.god_id, message_id=mid, text=txt,
-                                            parse_mode="HTML", reply_markup=kb)
-            return
-        except Exception:
-            pass
-    try:
-        m = await ctx.bot.send_message(g.god_id, txt, parse_mode="HTML", reply_markup=kb)
-        g.kp_vote_panel_mid = m.message_id
-        store.save()
-    except Exception:
-        pass
-
-
-async def handle_kp_vote_callback(update, ctx):
-    """🔥 سوزاندنِ رأیِ پادزهر توسط گاد (برای آفلاین‌ها)."""
-    q = update.callback_query
-    data = q.data
-    uid = q.from_user.id
-    g = None; chat_id = None
-    for cid, game in store.games.items():
-        if game.god_id == uid and getattr(game, "poison_phase", False):
-            g, chat_id = game, cid
-            break
-    if g is None:
-        await safe_q_answer(q, "رأی‌گیریِ فعالی نیست.", show_alert=True)
-        return
-    await safe_q_answer(q)
-
-    if getattr(g, "antidote_done", False):
-        await _kp_vote_report(ctx, g)
-        return
-
-    targets = []
-    if data == "kpv_all":
-        targets = list(_kp_antidote_pending(g))
-    elif data.startswith("kpv_b_"):
-        s = int(data.rsplit("_", 1)[1])
-        if s in g.seats:
-            targets = [g.seats[s][0]]
-    if not targets:
-        await _kp_vote_report(ctx, g)
-        return
-
-    for u in targets:
-        g.antidote_skipped.add(u)
-        s = _seat_of_uid(g, u)
-        # پرامپتِ بازِ همان بازیکن بسته شود تا دکمه‌ای برایش نماند
-        pm = (g.night_pm_msgs or {}).get(u)
-        if pm:
-            try:
-                await _close_pm(ctx, u, pm, "🔥 گاد رأیت را سوزاند — این دور رأیی نداری.")
-            except Exception:
-                pass
-        if s is not None:
-            await _night_report(ctx, g, f"🔥 رأیِ پادزهرِ <b>{s}. "
-                                        f"{escape(g.seats[s][1], quote=False)}</b> سوزانده شد.")
-    store.save()
-    await _kp_vote_report(ctx, g)
-    if not _kp_antidote_pending(g):
-        await _kp_after_vote(ctx, chat_id, g)
-
-
-def _kp_antidote_holder(g):
-    """دارندهٔ پادزهر: دن‌مافیا اگر زنده باشد، وگرنه جادوگر."""
-    don = _find_seat_by_role(g, _R_DON)
-    if don is not None:
-        return don
-    return _find_seat_by_role(g, _R_WITCH)
-
-
-async def _kp_check_heir_inherit(ctx, g):
-    """اگر فردِ انتخابیِ وارث مُرده باشد، وارث صاحب نقش/شهرساده می‌شود."""
-    if not (g.heir_seat and not g.heir_inherited and g.heir_target):
-        return
-    if g.heir_target not in (g.striked or set()) or g.heir_target in _mafia_seats(g):
-        return
-    role = (g.assigned_roles or {}).get(g.heir_target)
-    rn = _nz(role or "")
-    g.heir_inherited = True
-    if rn in (_R_DETECTIVE, _R_ARMORER, _R_ATTAR):
-        g.assigned_roles[g.heir_seat] = role
-        new_txt = role
-    else:
-        g.assigned_roles[g.heir_seat] = "شهرساده"
-        g.heir_no_yakuza = True
-        new_txt = "شهرساده (بدون توانایی)"
-    store.save()
-    try:
-        await ctx.bot.send_message(g.seats[g.heir_seat][0], f"⚱️ شما اکنون «{new_txt}» هستید.")
-    except Exception:
-        pass
-    await _night_report(ctx, g, f"⚱️ وارث → نقشِ جدید: «{escape(new_txt, quote=False)}»")
-
-
-async def _kp_begin_poison(ctx, chat_id, g):
-    """شروع شب: اعلام سم + رأی‌گیری پادزهر از همه (جز عطار)."""
-    target = g.attar_poisoned_seat
-    # اگر فردِ سم‌دار پیش از تعیین‌تکلیف از بازی خارج شده → بدون رأی‌گیری
-    if target not in g.seats or target in (g.striked or set()):
-        if target in g.seats:
-            tname = g.seats[target][1]
-            for s in _alive_seats(g):
-                try:
-                    await ctx.bot.send_message(
-                        g.seats[s][0],
-                        f"🧪 سم در بدن {target}. {tname} بود، اما ایشان دیگر در بازی نیستند.")
-                except Exception:
-                    pass
-            await _night_report(ctx, g, f"🧪 سم در بدن {target}. {escape(tname, quote=False)} بود؛ از بازی خارج شده — رأی‌گیری لازم نیست.")
-        g.attar_poisoned_seat = None
-        store.save()
-        await _kp_open_don(ctx, chat_id, g)
-        return
-    g.poison_phase = True
-    g.antidote_votes = {}
-    g.antidote_skipped = set()
-    g.kp_vote_panel_mid = None
-    tname = g.seats[target][1]
-    attar = _find_seat_by_role(g, _R_ATTAR)
-    for s in _alive_seats(g):
-        try:
-            await ctx.bot.send_message(g.seats[s][0], f"🧪 سم عطار وارد خون سیت {target}. {tname} شده است.")
-        except Exception:
-            pass
-    kb = InlineKeyboardMarkup([[
-        InlineKeyboardButton("✅ بله (پادزهر)", callback_data="kp_anti_yes"),
-        InlineKeyboardButton("🚫 خیر", callback_data="kp_anti_no"),
-    ]])
-    expected = []
-    for s in _alive_seats(g):
-        if s == attar or s == target:
-            continue   # نه عطار، نه خودِ سم‌خورده حقِ رأی دارند
-        uid = g.seats[s][0]
-        m = await _safe_pm(ctx, uid, "آیا موافق دادنِ پادزهر هستید؟", kb)
-        if m:
-            g.night_pm_msgs[uid] = m.message_id
-            expected.append(uid)
-    g.antidote_expected = expected
-    store.save()
-    # 🧪 پنلِ زنده‌ی گاد: چه کسی رأی داده / نداده + دکمه‌ی سوزاندنِ رأیِ آفلاین‌ها
-    await _kp_vote_report(ctx, g)
-    if not expected:
-        await _kp_after_vote(ctx, chat_id, g)
-
-
-async def _kp_after_vote(ctx, chat_id, g):
-    # 🔒 فقط یک‌بار (رأیِ آخر و ماشه‌ی کیک ممکن است هم‌زمان برسند)
-    if getattr(g, "antidote_done", False):
-        return
-    g.antidote_done = True
-    store.save()
-    target = g.attar_poisoned_seat
-    votes = g.antidote_votes or {}
-    yes = sum(1 for v in votes.values() if v)
-    no = sum(1 for v in votes.values() if not v)
-    alive = len(_alive_seats(g))
-    threshold = alive // 2 + 1
-    majority_for = (yes >= threshold)
-
-    def _names(want):
-        out = []
-        for u, v in votes.items():
-            if v is want:
-                seat = _seat_of_uid(g, u)
-                if seat:
-                    out.append(f"{seat}. {g.seats[seat][1]}")
-        return "، ".join(out) if out else "—"
-
-    tname = g.seats[target][1] if target in g.seats else "—"
-    _burned = []
-    for u in (getattr(g, "antidote_skipped", set()) or set()):
-        _s = _seat_of_uid(g, u)
-        if _s:
-            _burned.append(f"{_s}. {g.seats[_s][1]}")
-    _bline = (f"\n🔥 رأیِ سوزانده‌شده: {escape('، '.join(_burned), quote=False)}"
-              if _burned else "")
-    await _night_report(
-        ctx, g,
-        f"🧪 <b>رأی پادزهر</b> (هدف {target}. {escape(tname, quote=False)})\n"
-        f"موافق: {yes} | مخالف: {no} (نصاب اکثریت: {threshold})\n"
-        f"✅ موافقان: {escape(_names(True), quote=False)}\n"
-        f"❌ مخالفان: {escape(_names(False), quote=False)}{_bline}"
-    )
-    # پنلِ زنده بی‌دکمه شود (رأی‌گیری تمام شد)
-    _pmid = getattr(g, "kp_vote_panel_mid", None)
-    if _pmid:
-        try:
-            await ctx.bot.edit_message_reply_markup(chat_id=g.god_id, message_id=_pmid,
-                                                    reply_markup=None)
-        except Exception:
-            pass
-
-    holder = _kp_antidote_holder(g)
-    attar = _find_seat_by_role(g, _R_ATTAR)
-    if target == holder:
-        # دن/دارندهٔ پادزهر → زنده (پنهان)
-        await _kp_apply_poison(ctx, chat_id, g, target, survived=True)
-    elif attar is None:
-        # عطار در بازی نیست → تصمیم با اکثریت
-        await _kp_apply_poison(ctx, chat_id, g, target, survived=majority_for)
-    else:
-        attar_uid = g.seats[attar][0]
-        mtxt = "اکثریت موافقِ دادن پادزهر هستند." if majority_for else "اکثریت مخالفِ دادن پادزهر هستند."
-        kb = InlineKeyboardMarkup([[
-            InlineKeyboardButton("✅ پادزهر می‌دهم", callback_data="kp_ag_yes"),
-            InlineKeyboardButton("🚫 نمی‌دهم", callback_data="kp_ag_no"),
-        ]])
-        m = await _safe_pm(ctx, attar_uid, f"🧪 {mtxt}\nآیا پادزهر می‌دهی؟", kb)
-        if m:
-            g.night_pm_msgs[attar_uid] = m.message_id
-        store.save()
-
-
-async def _kp_apply_poison(ctx, chat_id, g, target, survived):
-    recipients = list(_alive_seats(g))  # قبل از خط‌زدن
-    tname = g.seats[target][1] if target in g.seats else "—"
-    if survived:
-        msg = f"🧪 {target}. {tname} پادزهر گرفت و زنده ماند."
-        await _night_report(ctx, g, msg)
-    else:
-        if target in g.seats and target not in (g.striked or set()):
-            g.striked.add(target)
-        msg = f"🧪 {target}. {tname} پادزهر نگرفت و کشته شد."
-        await _night_report(ctx, g, msg + " (خط خورد)")
-    for s in recipients:
-        try:
-            await ctx.bot.send_message(g.seats[s][0], msg)
-        except Exception:
-            pass
-    g.attar_poisoned_seat = None
-    g.poison_phase = False
-    g.antidote_votes = {}
-    g.antidote_expected = []
-    g.antidote_done = False
-    g.antidote_skipped = set()
-    g.kp_vote_panel_mid = None
-    store.save()
-    # ⚠️ هیچ‌کدام از این‌ها نباید جلوی بازشدنِ اکت‌های شب را بگیرد
-    try:
-        await _kp_check_heir_inherit(ctx, g)   # وارث ممکن است عطار جدید شود
-    except Exception as e:
-        print("⚠️ heir inherit err:", e)
-    try:
-        await publish_seating(ctx, chat_id, g, mode=CTRL)
-    except Exception:
-        pass
-    await _kp_open_don(ctx, chat_id, g)     # حالا شبِ عادی باز می‌شود
-
-
-# ═════════════════════════════════════════════════════════════
-#  موتور شبِ خودکار — سناریو «گیمر» (۱۰/۱۲/۱۷ نفره)
-#  تشخیص بر اساس «نقش‌ها» است نه اسم سناریو (دن‌کارلئونه = گیمر)
-#  ترتیب: رابین‌هود → مسترهلمز → مافیا (دن/تووفیس/موریارتی) → شهروندان
-# ═════════════════════════════════════════════════════════════
-_R_DONC     = _nz("دن‌کارلئونه")
-_R_TWOFACE  = _nz("تووفیس")
-_R_MORIARTY = _nz("موریارتی")
-_R_ELLIOT   = _nz("الیوت")
-_R_RICK     = _nz("ریک‌گرایمز")
-_R_ROBIN    = _nz("رابین‌هود")
-_R_JAMES    = _nz("جیمزهالیدی")
-_R_LOGAN    = _nz("لوگان")
-_R_HOLMES   = _nz("مسترهلمز")
-_R_CASTIEL  = _nz("کستیل")
-_R_DEXTER   = _nz("دکستر")      # 🔪 قاتلِ تیمِ مافیا (گیمر ۱۲)
-_R_SMEAGOL  = _nz("اسمیگل")     # 🌀 شهروندِ دیوانه (گیمر ۱۲)
-
-_GM_FUSE_COLORS = ["زرد", "قرمز", "آبی"]
-_GM_FUSE_TYPES  = ["انفجار", "خنثی", "سرعت"]
-
-
-def _is_gamer_scenario(g) -> bool:
-    """تشخیص بر اساس نقش: اگر دن‌کارلئونه بین نقش‌ها باشد → گیمر (هر تعداد نفره)."""
-    roles = getattr(g, "assigned_roles", None) or {}
-    if any(_nz(r) == _R_DONC for r in roles.values()):
-        return True
-    sc = getattr(g, "scenario", None)
-    return bool(sc) and (_nz("گیمر") in _nz(sc.name))
-
-
-def _gm_actor_for(g, role_seat):
-    """چه صندلی‌ای امشب اکتِ این نقش را انجام می‌دهد؟ (انتقالِ رابین‌هود)"""
-    if role_seat is None:
-        return None
-    if g.gm_gift_accepted and g.gm_robbed_seat == role_seat:
-        return g.gm_gift_to
-    return role_seat
-
-
-def _gm_own_act_skipped(g, seat) -> bool:
-    """گیرنده‌ی هدیه، اکتِ نقشِ خودش را در آن شب از دست می‌دهد."""
-    return bool(g.gm_gift_accepted and g.gm_gift_to == seat and g.gm_robbed_seat != seat)
-
-
-def _gm_rick_unlocked(g) -> bool:
-    """ریک بعد از خروجِ ۲ شهروند آزاد می‌شود (شهروند = غیرمافیا، بر اساس نقش)."""
-    mafia = _mafia_seats(g)
-    return sum(1 for s in (g.striked or set()) if s not in mafia) >= 2
-
-
-def _gm_dexter_unlocked(g) -> bool:
-    """🔪 اکتِ دکستر تا وقتی یکی از مافیاها از بازی خارج نشده، اصلاً باز نمی‌شود."""
-    return bool(_mafia_seats(g) & (g.striked or set()))
-
-
-def _gm_dexter_targets(g):
-    """🔪 هدف‌های مجازِ دکستر: زنده‌های غیرمافیایی که در آخرین رأی‌گیریِ نهایی
-    به یک «شهروند» رأی داده‌اند. (چه کسی به چه کسی رأی داد، عمومی است — چیزی لو نمی‌رود.)"""
-    alive = set(_alive_seats(g))
-    mafia = _mafia_seats(g, alive_only=True)
-    out = []
-    for t, voters in (getattr(g, "last_final_votes", {}) or {}).items():
-        if t not in g.seats or _sc_side(g, t) == "مافیا":
-            continue                      # فقط رأی‌هایی که به شهروند داده شده
-        for v in (voters or []):
-            if v in alive and v not in mafia and v != t and v not in out:
-                out.append(v)
-    return sorted(out)
-
-
-async def _gm_smeagol_join(ctx, g, seat):
-    """🌀 پیوستنِ اسمیگل به تیمِ مافیا — کاملاً خاموش:
-    نه لینکِ اتاق می‌گیرد، نه تیمِ مافیا خبردار می‌شود، نه در شمارشِ ساید مافیا حساب می‌شود.
-    فقط خودش تیم را می‌شناسد و در لیستِ پایانی «مافیا» نمایش داده می‌شود."""
-    g.gm_smeagol_turned = True
-    store.save()
-    mates = []
-    for m in sorted(_mafia_seats(g)):
-        if m == seat or m not in g.seats:
-            continue
-        tag = " (خارج‌شده)" if m in (g.striked or set()) else ""
-        mates.append(f"{m}. {g.seats[m][1]} — {(g.assigned_roles or {}).get(m, '—')}{tag}")
-    try:
-        await ctx.bot.send_message(
-            g.seats[seat][0],
-            "🖤 از این لحظه به تیمِ مافیا خیانت‌شده‌ای و عضوِ آن‌ها هستی.\n\n"
-            "😈 تیمِ مافیا:\n" + ("\n".join(mates) if mates else "—")
-            + "\n\n⚠️ آن‌ها از پیوستنِ تو خبر ندارند و لینکِ اتاقِ مافیا هم به تو داده نمی‌شود.")
-    except Exception:
-        pass
-    await _night_report(
-        ctx, g,
-        f"🌀 اسمیگل ({seat}. {escape(g.seats[seat][1], quote=False)}) به تیمِ مافیا پیوست — "
-        "«مافیای خاموش» (در شمارش، شهروند؛ فقط در لیستِ پایانی مافیا).")
-
-
-def _gm_citizen_role_names(g):
-    mafia = set(_mafia_role_set(g))
-    names, seen = [], set()
-    for rname in (g.scenario.roles.keys() if g.scenario else []):
-        n = _nz(rname)
-        if n in mafia or n in seen:
-            continue
-        seen.add(n); names.append(rname)
-    return names
-
-
-async def _gm_prompt(ctx, g, seat, key, text, kb=None):
-    """پرامپت اکت به بازیکن + ثبت در فهرست انتظار."""
-    uid = g.seats[seat][0]
-    m = await _safe_pm(ctx, uid, text, kb)
-    if m:
-        g.night_pm_msgs[uid] = m.message_id
-    g.gm_expected.add(key)
-    store.save()
-    return m
-
-
-def _dead_priority_delay(g, role_norm) -> bool:
-    """⏳ آیا نقشِ اولویت‌دار «مُرده» است؟ (در ترکیب هست ولی خط خورده) → تأخیرِ ضدلو‌رفتن لازم است."""
-    try:
-        any_seat = _find_seat_by_role(g, role_norm, alive_only=False)
-        alive_seat = _find_seat_by_role(g, role_norm)
-        return any_seat is not None and alive_seat is None
-    except Exception:
-        return False
-
-
-def _open_next_delayed(ctx, chat_id, g, opener, delay=60):
-    """⏳ بازکردنِ مرحله‌ی بعد با تأخیر — تا زنده‌ها از سرعتِ بازشدن، مرگِ نقشِ قبلی را نفهمند."""
-    night_no = g.night_number
-
-    async def _t():
-        try:
-            await asyncio.sleep(delay)
-            if getattr(g, "night_active", False) and g.night_number == night_no:
-                await opener(ctx, chat_id, g)
-        except Exception as e:
-            print("⚠️ delayed open err:", e)
-    asyncio.create_task(_t())
-
-
-def _gm_yesno_kb(yes_cb, no_cb):
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("✅ بله", callback_data=yes_cb)],
-        [InlineKeyboardButton("🚫 خیر", callback_data=no_cb)],
-    ])
-
-
-# ── مرحله ۱: رابین‌هود ─────────────────────────────────────────
-async def _gm_open_robin(ctx, chat_id, g):
-    rb = _find_seat_by_role(g, _R_ROBIN)
-    if not rb or g.gm_robin_uses >= 2:
-        g.night_done.add("robin")
-        store.save()
-        if _dead_priority_delay(g, _R_ROBIN):
-            # ⏳ رابینِ مرده — مرحله‌ی بعد با ۱ دقیقه تأخیر تا غیبتش لو نرود
-            _open_next_delayed(ctx, chat_id, g, _gm_open_holmes)
-        else:
-            await _gm_open_holmes(ctx, chat_id, g)
-        return
-    await _gm_prompt(ctx, g, rb, "robin",
-                     f"🏹 شب {g.night_number} — می‌خواهی راهزنی کنی؟ (باقی‌مانده: {2 - g.gm_robin_uses})",
-                     _gm_yesno_kb("gm_rb_yes", "gm_rb_no"))
-
-
-# ── مرحله ۲: مسترهلمز ─────────────────────────────────────────
-async def _gm_open_holmes(ctx, chat_id, g):
-    hs = _find_seat_by_role(g, _R_HOLMES)
-    if not hs or g.gm_holmes_uses >= 3 or _gm_own_act_skipped(g, hs):
-        g.night_done.add("holmes")
-        store.save()
-        if _dead_priority_delay(g, _R_HOLMES):
-            # ⏳ هلمزِ مرده — مافیا با ۱ دقیقه تأخیر باز شود
-            _open_next_delayed(ctx, chat_id, g, _gm_open_mafia)
-        else:
-            await _gm_open_mafia(ctx, chat_id, g)
-        return
-    actor = _gm_actor_for(g, hs)
-    await _gm_prompt(ctx, g, actor, "holmes",
-                     f"🕵️ می‌خواهی حدس بزنی دن‌کارلئونه کیست؟ (باقی‌مانده: {3 - g.gm_holmes_uses})",
-                     _gm_yesno_kb("gm_hm_yes", "gm_hm_no"))
-
-
-# ── مرحله ۳: مافیا (موازی: شات / بمب / موریارتی) ─────────────
-async def _gm_open_mafia(ctx, chat_id, g):
-    if "mafia_opened" in g.night_done:
-        return
-    g.night_done.add("mafia_opened")
-    store.save()
-
-    don = _find_seat_by_role(g, _R_DONC)
-    tf = _find_seat_by_role(g, _R_TWOFACE)
-    mo = _find_seat_by_role(g, _R_MORIARTY)
-    dx = _find_seat_by_role(g, _R_DEXTER)
-
-    # 🔫 شات — دزدیده‌شدنِ دن یا حدسِ درستِ هلمز = بدون شات برای مافیا
-    don_robbed = (g.gm_gift_accepted and g.gm_robbed_seat == don and don is not None)
-    if g.gm_holmes_correct:
-        decider = don or mo or tf or dx
-        if decider:
-            await _safe_pm(ctx, g.seats[decider][0], "😶 امشب مافیا توانِ شات ندارد.")
-        await _night_report(ctx, g, "😶 مافیا امشب شات ندارد (حدسِ درستِ هلمز).")
-        g.night_done.add("shot")
-    elif don_robbed:
-        await _safe_pm(ctx, g.seats[don][0], "🏹 نقش شما دزدیده شده و حق شات ندارید.")
-        await _night_report(ctx, g, "🏹 شاتِ مافیا امشب دستِ گیرنده‌ی هدیه‌ی رابین‌هود است.")
-        # شات را گیرنده‌ی هدیه می‌زند — می‌تواند «هر کسی» را بزند، حتی مافیا (فقط خودش نه)
-        actor = g.gm_gift_to
-        targets = [s for s in _alive_seats(g) if s != actor]
-        await _gm_prompt(ctx, g, actor, "shot", "🔫 (اکتِ هدیه) هدف شلیک را انتخاب کن:",
-                         _kb_night_seats(targets, g, "gm_st_", confirm_cb="gm_st_ok"))
-    else:
-        decider = don or mo or tf or dx   # 🔫 وراثتِ شات: دن → موریارتی → تووفیس → دکستر
-        if not decider:
-            # 🤝 اگر مافیای اصلی نمانده، جذب‌شده (مذاکره/یاکوزایی/خریداری) صاحبِ شات می‌شود
-            converted = sorted(_mafia_seats(g, alive_only=True))
-            decider = converted[0] if converted else None
-        odd_n = (g.night_number % 2 == 1)
-        tf_dual = (decider is not None and tf is not None and decider == tf
-                   and odd_n and not _gm_own_act_skipped(g, tf))
-        if not decider:
-            g.night_done.add("shot")
-        elif tf_dual:
-            # 🔀 شات به تووفیس رسیده و شبِ بمبش هم هست → فقط یکی از دو اکت
-            kb = InlineKeyboardMarkup([[
-                InlineKeyboardButton("💣 بمب", callback_data="gm_tfc_bomb"),
-                InlineKeyboardButton("🔫 شات", callback_data="gm_tfc_shot"),
-            ]])
-            await _gm_prompt(ctx, g, tf, "tfchoice",
-                             "🔀 شات به تو رسیده و امشب شبِ بمب هم هست — فقط یکی: بمب یا شات؟",
-                             kb)
-        else:
-            targets = list(_alive_seats(g))   # شاملِ خودِ مافیا
-            await _gm_prompt(ctx, g, decider, "shot", "🔫 هدف شلیک را انتخاب کن:",
-                             _kb_night_seats(targets, g, "gm_st_", confirm_cb="gm_st_ok"))
-
-    # 💣 تووفیس — فقط شب‌های فرد
-    odd = (g.night_number % 2 == 1)
-    if ("tfchoice" in (getattr(g, "gm_expected", set()) or set())
-            and "tfchoice" not in (g.night_done or set())):
-        pass   # 🔀 منتظرِ انتخابِ تووفیس — بعد از انتخابش، شات «یا» بمب باز می‌شود
-    elif odd and tf and not _gm_own_act_skipped(g, tf):
-        actor = _gm_actor_for(g, tf)
-        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
-        await _gm_prompt(ctx, g, actor, "bomb", "💣 جلوی چه کسی بمب می‌گذاری؟",
-                         _kb_night_seats(targets, g, "gm_tf_", confirm_cb="gm_tf_ok"))
-    else:
-        g.night_done.add("bomb")
-
-    # 🎭 موریارتی — اختیاری، ۳ حدس در کل بازی
-    if mo and g.gm_moriarty_uses < 3 and not _gm_own_act_skipped(g, mo):
-        actor = _gm_actor_for(g, mo)
-        await _gm_prompt(ctx, g, actor, "moriarty",
-                         f"🎭 می‌خواهی حدس بزنی مسترهلمز کیست؟ (باقی‌مانده: {3 - g.gm_moriarty_uses})",
-                         _gm_yesno_kb("gm_mo_yes", "gm_mo_no"))
-    else:
-        g.night_done.add("moriarty")
-
-    # 🔪 دکستر — هم‌زمان با بقیهٔ تیمِ مافیا؛ فقط اگر یکی از مافیاها خارج شده باشد
-    #    و فقط یک‌بار در کلِ بازی (بار بعد که یارش بمیرد دیگر باز نمی‌شود).
-    dx_actor = _gm_actor_for(g, dx) if dx else None
-    if (dx and not getattr(g, "gm_dexter_used", False) and _gm_dexter_unlocked(g)
-            and not _gm_own_act_skipped(g, dx)
-            and dx_actor is not None
-            and dx_actor not in (g.night_burned or set())
-            and _gm_dexter_targets(g)):
-        await _gm_prompt(ctx, g, dx_actor, "dexter",
-                         "🔪 می‌خواهی امشب اکتت را بزنی؟ (فقط یک‌بار در کلِ بازی)",
-                         _gm_yesno_kb("gm_dx_yes", "gm_dx_no"))
-    else:
-        g.night_done.add("dexter")
-    store.save()
-    await _gm_check_open_citizens(ctx, chat_id, g)
-
-
-async def _gm_check_open_citizens(ctx, chat_id, g):
-    if "citizens_opened" in g.night_done:
-        return
-    if not ({"shot", "bomb", "moriarty", "dexter"} <= g.night_done):
-        return
-    g.night_done.add("citizens_opened")
-    store.save()
-
-    # 💉 کستیل (دکتر) — ۱ نفر در شب؛ خودش حداکثر ۲ بار در کل بازی
-    cs = _find_seat_by_role(g, _R_CASTIEL)
-    if cs and not _gm_own_act_skipped(g, cs):
-        actor = _gm_actor_for(g, cs)
-        targets = _doctor_targets(g, actor)
-        await _gm_prompt(ctx, g, actor, "doctor", "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
-                         _kb_night_seats(targets, g, "gm_doc_", confirm_cb="gm_doc_ok"))
-
-    # 🛡 الیوت — فقط شب‌های فرد، اختیاری
-    el = _find_seat_by_role(g, _R_ELLIOT)
-    if (g.night_number % 2 == 1) and el and not _gm_own_act_skipped(g, el):
-        actor = _gm_actor_for(g, el)
-        await _gm_prompt(ctx, g, actor, "eliot",
-                         "🛡 می‌خواهی امشب از کسی در برابر بمب محافظت کنی؟",
-                         _gm_yesno_kb("gm_el_yes", "gm_el_no"))
-
-    # 🎲 جیمزهالیدی — اختیاری، ۲ بار در کل بازی
-    jm = _find_seat_by_role(g, _R_JAMES)
-    if jm and g.gm_james_uses < 2 and not _gm_own_act_skipped(g, jm):
-        actor = _gm_actor_for(g, jm)
-        await _gm_prompt(ctx, g, actor, "james",
-                         f"🎲 می‌خواهی بازی کنی؟ (باقی‌مانده: {2 - g.gm_james_uses})",
-                         _gm_yesno_kb("gm_jm_yes", "gm_jm_no"))
-
-    # 🔫 ریک‌گرایمز — بعد از خروج ۲ شهروند، هر شب یک شات
-    rk = _find_seat_by_role(g, _R_RICK)
-    if rk and _gm_rick_unlocked(g) and not _gm_own_act_skipped(g, rk):
-        actor = _gm_actor_for(g, rk)
-        await _gm_prompt(ctx, g, actor, "rick", "🔫 می‌خواهی شات بزنی؟",
-                         _gm_yesno_kb("gm_rk_yes", "gm_rk_no"))
-    store.save()
-
-
-def _gm_james_nums_kb(g):
-    rows = []
-    row = []
-    for n in range(1, 7):
-        mark = "✅ " if n in (g.gm_james_nums or []) else ""
-        row.append(InlineKeyboardButton(f"{mark}{n}", callback_data=f"gm_jn_{n}"))
-        if len(row) == 3:
-            rows.append(row); row = []
-    if row:
-        rows.append(row)
-    rows.append([InlineKeyboardButton("✅ تأیید (دقیقاً ۲ عدد)", callback_data="gm_jn_ok")])
-    return InlineKeyboardMarkup(rows)
-
-
-async def handle_gamer_callback(update, ctx):
-    q = update.callback_query
-    data = q.data
-    uid = _q_uid(q)   # 🎛 اکتِ دستی
-
-    # 🔀 انتخابِ تووفیس (شات یا بمب) — وقتی شات از راهِ وراثت به او رسیده و شبِ فرد است
-    if data in ("gm_tfc_bomb", "gm_tfc_shot"):
-        g = None; chat_id = None
-        for cid, game in store.games.items():
-            if not getattr(game, "night_active", False) or not _is_gamer_scenario(game):
-                continue
-            tf = _find_seat_by_role(game, _R_TWOFACE)
-            if tf is None:
-                continue
-            actor = _gm_actor_for(game, tf)
-            if actor in game.seats and game.seats[actor][0] == uid:
-                g, chat_id = game, cid
-                break
-        if g is None:
-            await safe_q_answer(q, "درخواستِ فعالی یافت نشد.", show_alert=True)
-            return
-        if "tfchoice" in (g.night_done or set()):
-            await safe_q_answer(q, "قبلاً انتخاب شده.", show_alert=True)
-            return
-        await safe_q_answer(q)
-        mid = q.message.message_id if q.message else None
-        tf = _find_seat_by_role(g, _R_TWOFACE)
-        g.night_done.add("tfchoice")
-        if data == "gm_tfc_shot":
-            g.night_done.add("bomb")
-            store.save()
-            await _close_pm(ctx, uid, mid, "🔫 شات انتخاب شد.")
-            await _night_report(ctx, g, "🔀 تووفیس: شات را انتخاب کرد — بمبِ امشب ندارد.")
-            targets = list(_alive_seats(g))
-            await _gm_prompt(ctx, g, tf, "shot", "🔫 هدف شلیک را انتخاب کن:",
-                             _kb_night_seats(targets, g, "gm_st_", confirm_cb="gm_st_ok"))
-        else:
-            g.night_done.add("shot")
-            store.save()
-            await _close_pm(ctx, uid, mid, "💣 بمب انتخاب شد.")
-            await _night_report(ctx, g, "🔀 تووفیس: بمب را انتخاب کرد — شاتِ امشب ندارد.")
-            actor = _gm_actor_for(g, tf)
-            targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
-            await _gm_prompt(ctx, g, actor, "bomb", "💣 جلوی چه کسی بمب می‌گذاری؟",
-                             _kb_night_seats(targets, g, "gm_tf_", confirm_cb="gm_tf_ok"))
-        await _gm_check_open_citizens(ctx, chat_id, g)
-        return
-
-    # 💣 خنثی‌سازیِ روز (بعد از /باز) — خارج از شبِ فعال
-    if data.startswith(("gm_bz_", "gm_bc_")):
-        g = None; chat_id = None
-        for cid, game in store.games.items():
-            if getattr(game, "gm_bomb_seat", None) is None:
-                continue
-            el = _find_seat_by_role(game, _R_ELLIOT)
-            if el and game.seats[el][0] == uid:
-                g, chat_id = game, cid
-                break
-        if g is None:
-            await safe_q_answer(q, "بمبی فعال نیست.", show_alert=True)
-            return
-        await safe_q_answer(q)
-        mid = q.message.message_id if q.message else None
-        if data == "gm_bz_no":
-            await _close_pm(ctx, uid, mid, "🙅 کاری نکردی. بمب سرِ جای خودش است.")
-            await _night_report(ctx, g, "💣 الیوت کاری با بمب نکرد.")
-            return
-        if data == "gm_bz_yes":
-            rows = [[InlineKeyboardButton(c, callback_data=f"gm_bc_{i}")]
-                    for i, c in enumerate(_GM_FUSE_COLORS)]
-            await _edit_pm(ctx, uid, mid, "✂️ کدام رنگ را انتخاب می‌کنی؟", InlineKeyboardMarkup(rows))
-            return
-        if data.startswith("gm_bc_"):
-            i = int(data.rsplit("_", 1)[1])
-            color = _GM_FUSE_COLORS[i]
-            ftype = (g.gm_bomb_fuses or {}).get(color, "خنثی")
-            seat = g.gm_bomb_seat
-            tname = g.seats[seat][1] if seat in g.seats else "؟"
-            await _close_pm(ctx, uid, mid, f"✂️ رنگ {color} را انتخاب کردی.")
-            await ctx.bot.send_message(chat_id, f"💥 چاشنی «{ftype}» فعال شد!")
-            await _night_report(ctx, g, f"💣 الیوت رنگ {color} را زد → چاشنی «{ftype}»")
-            if ftype == "خنثی":
-                await ctx.bot.send_message(chat_id, "✅ الیوت با موفقیت بمب را خنثی کرد.")
-            elif ftype == "انفجار":
-                if seat in g.seats and seat not in (g.striked or set()):
-                    g.striked.add(seat)
-                await ctx.bot.send_message(chat_id, f"💥 بمب منفجر شد! {seat}. {tname} از بازی خارج شد.")
-                try:
-                    await publish_seating(ctx, chat_id, g, mode=CTRL)
-                except Exception:
-                    pass
-                await _check_auto_end(ctx, chat_id, g)   # 🏁
-            else:  # سرعت
-                await ctx.bot.send_message(
-                    chat_id, "⏩ چاشنی سرعت! بمب پس از صحبتِ نیمی از بازیکنان منفجر می‌شود (با گاد).")
-            g.gm_bomb_seat = None
-            g.gm_bomb_fuses = {}
-            store.save()
-            return
-        return
-
-    g, chat_id = _find_active_night_game(uid, q)
-    if g is None:
-        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
-        return
-    await safe_q_answer(q)
-    mid = q.message.message_id if q.message else None
-
-    # ── رابین‌هود ──
-    if data == "gm_rb_no":
-        await _close_pm(ctx, uid, mid, "🏹 امشب راهزنی نکردی.")
-        await _night_report(ctx, g, "🏹 رابین‌هود → راهزنی نکرد")
-        g.night_done.add("robin")
-        store.save()
-        await _gm_open_holmes(ctx, chat_id, g)
-        return
-
-    if data == "gm_rb_yes":
-        rb = _seat_of_uid(g, uid)
-        targets = [s for s in _alive_seats(g) if s != rb]
-        await _edit_pm(ctx, uid, mid, "🏹 اکتِ چه کسی را می‌دزدی؟",
-                       _kb_night_seats(targets, g, "gm_rbx_", confirm_cb="gm_rbx_ok"))
-        return
-
-    if data == "gm_rbx_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.gm_robin_steal_from = s
-        g.night_sel.pop(uid, None)
-        store.save()
-        rb = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != rb and x != s]
-        await _edit_pm(ctx, uid, mid, "🎁 به چه کسی هدیه می‌دهی؟",
-                       _kb_night_seats(targets, g, "gm_rby_", confirm_cb="gm_rby_ok"))
-        return
-
-    if data.startswith("gm_rbx_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        rb = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != rb]
-        await _edit_pm(ctx, uid, mid, "🏹 اکتِ چه کسی را می‌دزدی؟",
-                       _kb_night_seats(targets, g, "gm_rbx_", selected=s, confirm_cb="gm_rbx_ok"))
-        return
-
-    if data == "gm_rby_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        x = g.gm_robin_steal_from
-        g.gm_robbed_seat = x
-        g.gm_gift_to = s
-        g.gm_gift_pending = True
-        g.gm_robin_uses += 1
-        g.night_sel.pop(uid, None)
-        await _close_pm(ctx, uid, mid, "✅ راهزنی ثبت شد.")
-        await _night_report(ctx, g, f"🏹 رابین‌هود → اکتِ {x}. {escape(g.seats[x][1], quote=False)} "
-                            f"به {s}. {escape(g.seats[s][1], quote=False)} هدیه شد (منتظر پاسخ)")
-        g.night_done.add("robin")
-        store.save()
-        await _gm_prompt(ctx, g, s, "gift",
-                         "🎁 از رابین‌هود هدیه داری! آیا قبول می‌کنی؟",
-                         _gm_yesno_kb("gm_gift_yes", "gm_gift_no"))
-        return
-
-    if data.startswith("gm_rby_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        rb = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != rb and x != g.gm_robin_steal_from]
-        await _edit_pm(ctx, uid, mid, "🎁 به چه کسی هدیه می‌دهی؟",
-                       _kb_night_seats(targets, g, "gm_rby_", selected=s, confirm_cb="gm_rby_ok"))
-        return
-
-    # ── پاسخ هدیه ──
-    if data in ("gm_gift_yes", "gm_gift_no"):
-        accepted = (data == "gm_gift_yes")
-        g.gm_gift_accepted = accepted
-        g.gm_gift_pending = False
-        g.night_done.add("gift")
-        if accepted:
-            await _close_pm(ctx, uid, mid, "🎁 قبول کردی! اکتِ جدیدت به‌زودی برایت می‌آید.")
-            await _night_report(ctx, g, "🎁 هدیه‌ی رابین‌هود پذیرفته شد ✅")
-        else:
-            await _close_pm(ctx, uid, mid, "🙅 هدیه را رد کردی.")
-            await _night_report(ctx, g, "🎁 هدیه‌ی رابین‌هود رد شد ❌")
-            g.gm_robbed_seat = None
-            g.gm_gift_to = None
-        store.save()
-        await _gm_open_holmes(ctx, chat_id, g)
-        return
-
-    # ── هلمز ──
-    if data == "gm_hm_no":
-        await _close_pm(ctx, uid, mid, "🕵️ امشب حدس نزدی.")
-        await _night_report(ctx, g, "🕵️ هلمز → حدس نزد")
-        g.night_done.add("holmes")
-        store.save()
-        await _gm_open_mafia(ctx, chat_id, g)
-        return
-
-    if data == "gm_hm_yes":
-        actor = _seat_of_uid(g, uid)
-        targets = [s for s in _alive_seats(g) if s != actor]
-        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی دن‌کارلئونه است؟",
-                       _kb_night_seats(targets, g, "gm_hmg_", confirm_cb="gm_hmg_ok"))
-        return
-
-    if data == "gm_hmg_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_sel.pop(uid, None)
-        don = _find_seat_by_role(g, _R_DONC)
-        actor = _seat_of_uid(g, uid)
-        correct = (don is not None and s == don)
-        _tn = g.seats[s][1]
-        if correct:
-            g.gm_holmes_correct = True
-            await _close_pm(ctx, uid, mid, f"🕵️ حدس زدی: {s}. {_tn}")
-            try:
-                await ctx.bot.send_message(uid, "👍")
-            except Exception:
-                pass
-            await _night_report(ctx, g, f"🕵️ هلمز → حدس: {s}. {escape(_tn, quote=False)} ✅ (مافیا امشب شات ندارد)")
-        else:
-            g.gm_holmes_uses += 1
-            await _close_pm(ctx, uid, mid, f"🕵️ حدس زدی: {s}. {_tn}")
-            try:
-                await ctx.bot.send_message(uid, "👎")
-            except Exception:
-                pass
-            await _night_report(ctx, g, f"🕵️ هلمز → حدس: {s}. {escape(_tn, quote=False)} ❌ ({g.gm_holmes_uses}/3)")
-            if g.gm_holmes_uses >= 3:
-                g.gm_holmes_despair = actor
-                await _night_report(ctx, g, "⚰️ سومین حدسِ غلطِ هلمز — از غصه می‌میرد (قطعی).")
-        g.night_done.add("holmes")
-        store.save()
-        await _gm_open_mafia(ctx, chat_id, g)
-        return
-
-    if data.startswith("gm_hmg_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        actor = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != actor]
-        await _edit_pm(ctx, uid, mid, "🕵️ چه کسی دن‌کارلئونه است؟",
-                       _kb_night_seats(targets, g, "gm_hmg_", selected=s, confirm_cb="gm_hmg_ok"))
-        return
-
-    # ── شات مافیا ──
-    if data == "gm_st_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_shot_target = s
-        await _room_announce_shot(ctx, g, s)
-        g.night_sel.pop(uid, None)
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {_tn}")
-        await _night_report(ctx, g, f"🔫 شلیک مافیا → <b>{s}. {escape(_tn, quote=False)}</b>")
-        g.night_done.add("shot")
-        store.save()
-        await _gm_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data.startswith("gm_st_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        me = _seat_of_uid(g, uid)
-        if me in _mafia_seats(g, alive_only=True):
-            # تیرانداز مافیاست → همه‌ی زنده‌ها، شاملِ خودِ تیم (شاید بخواهند خودی بزنند)
-            targets = list(_alive_seats(g))
-        else:
-            # گیرنده‌ی هدیه‌ی رابین‌هود → همه به‌جز خودش (مافیا هم شامل)
-            targets = [x for x in _alive_seats(g) if x != me]
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_night_seats(targets, g, "gm_st_", selected=s, confirm_cb="gm_st_ok"))
-        return
-
-    # ── بمب تووفیس ──
-    if data == "gm_tf_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.gm_tf_target = s
-        g.gm_tf_map = {}
-        g.night_sel.pop(uid, None)
-        store.save()
-        rows = [[InlineKeyboardButton(t, callback_data=f"gm_fz_{i}")]
-                for i, t in enumerate(_GM_FUSE_TYPES)]
-        await _edit_pm(ctx, uid, mid, "🟡 چاشنیِ رنگ «زرد» کدام باشد؟", InlineKeyboardMarkup(rows))
-        return
-
-    if data.startswith("gm_tf_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
-        await _edit_pm(ctx, uid, mid, "💣 جلوی چه کسی بمب می‌گذاری؟",
-                       _kb_night_seats(targets, g, "gm_tf_", selected=s, confirm_cb="gm_tf_ok"))
-        return
-
-    if data.startswith("gm_fz_"):
-        i = int(data.rsplit("_", 1)[1])
-        g.gm_tf_map["زرد"] = _GM_FUSE_TYPES[i]
-        store.save()
-        remaining = [t for t in _GM_FUSE_TYPES if t not in g.gm_tf_map.values()]
-        rows = [[InlineKeyboardButton(t, callback_data=f"gm_fr_{_GM_FUSE_TYPES.index(t)}")]
-                for t in remaining]
-        await _edit_pm(ctx, uid, mid, "🔴 چاشنیِ رنگ «قرمز» کدام باشد؟", InlineKeyboardMarkup(rows))
-        return
-
-    if data.startswith("gm_fr_"):
-        i = int(data.rsplit("_", 1)[1])
-        g.gm_tf_map["قرمز"] = _GM_FUSE_TYPES[i]
-        last = [t for t in _GM_FUSE_TYPES if t not in g.gm_tf_map.values()][0]
-        g.gm_tf_map["آبی"] = last
-        g.gm_bomb_seat = g.gm_tf_target
-        g.gm_bomb_fuses = dict(g.gm_tf_map)
-        await _room_note(ctx, g, f"💣 بمب جلوی <b>{_room_who(g, g.gm_bomb_seat)}</b> | "
-                         f"زرد:{g.gm_tf_map['زرد']} · قرمز:{g.gm_tf_map['قرمز']} · آبی:{last}")
-        seat = g.gm_bomb_seat
-        _tn = g.seats[seat][1] if seat in g.seats else "؟"
-        await _close_pm(ctx, uid, mid,
-                        f"💣 بمب جلوی {seat}. {_tn} — زرد:{g.gm_tf_map['زرد']} | قرمز:{g.gm_tf_map['قرمز']} | آبی:{last}")
-        await _night_report(ctx, g,
-                            f"💣 تووفیس → بمب جلوی <b>{seat}. {escape(_tn, quote=False)}</b> | "
-                            f"زرد:{g.gm_tf_map['زرد']} · قرمز:{g.gm_tf_map['قرمز']} · آبی:{last}")
-        g.night_done.add("bomb")
-        store.save()
-        await _gm_check_open_citizens(ctx, chat_id, g)
-        return
-
-    # ── موریارتی ──
-    if data == "gm_mo_no":
-        await _close_pm(ctx, uid, mid, "🎭 امشب حدس نزدی.")
-        await _night_report(ctx, g, "🎭 موریارتی → حدس نزد")
-        g.night_done.add("moriarty")
-        store.save()
-        await _gm_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data == "gm_mo_yes":
-        actor = _seat_of_uid(g, uid)
-        targets = [s for s in _alive_seats(g) if s not in _mafia_seats(g, alive_only=True)]
-        await _edit_pm(ctx, uid, mid, "🎭 چه کسی مسترهلمز است؟",
-                       _kb_night_seats(targets, g, "gm_mog_", confirm_cb="gm_mog_ok"))
-        return
-
-    if data == "gm_mog_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_sel.pop(uid, None)
-        holmes = _find_seat_by_role(g, _R_HOLMES)
-        correct = (holmes is not None and s == holmes)
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"🎭 حدس ثبت شد: {s}. {_tn}")
-        if correct:
-            g.gm_moriarty_correct = True
-            await _night_report(ctx, g, f"🎭 موریارتی → حدس: {s}. {escape(_tn, quote=False)} ✅ (هلمز می‌میرد)")
-        else:
-            g.gm_moriarty_uses += 1
-            await _night_report(ctx, g, f"🎭 موریارتی → حدس: {s}. {escape(_tn, quote=False)} ❌ ({g.gm_moriarty_uses}/3)")
-            if g.gm_moriarty_uses >= 3:
-                g.gm_moriarty_despair = True
-                await _night_report(ctx, g, "⚰️ سومین حدسِ غلطِ موریارتی — می‌میرد (قطعی).")
-        g.night_done.add("moriarty")
-        store.save()
-        await _gm_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data.startswith("gm_mog_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g) if x not in _mafia_seats(g, alive_only=True)]
-        await _edit_pm(ctx, uid, mid, "🎭 چه کسی مسترهلمز است؟",
-                       _kb_night_seats(targets, g, "gm_mog_", selected=s, confirm_cb="gm_mog_ok"))
-        return
-
-    # ── دکستر (قاتلِ تیمِ مافیا) ──
-    if data == "gm_dx_no":
-        await _close_pm(ctx, uid, mid, "🔪 امشب اکت نزدی — اکتت هنوز دستِ خودت است.")
-        await _night_report(ctx, g, "🔪 دکستر → اکت نزد")
-        g.night_done.add("dexter")
-        store.save()
-        await _gm_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data == "gm_dx_yes":
-        targets = _gm_dexter_targets(g)
-        if not targets:
-            await _close_pm(ctx, uid, mid, "🔪 امشب کسی در دسترسِ تو نیست.")
-            await _night_report(ctx, g, "🔪 دکستر → هدفی برای انتخاب نبود")
-            g.night_done.add("dexter")
-            store.save()
-            await _gm_check_open_citizens(ctx, chat_id, g)
-            return
-        await _edit_pm(ctx, uid, mid, "🔪 چه کسی را به قتل می‌رسانی؟ (نجات پیدا نمی‌کند)",
-                       _kb_night_seats(targets, g, "gm_dxt_", confirm_cb="gm_dxt_ok"))
-        return
-
-    if data == "gm_dxt_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.gm_dexter_target = s
-        g.gm_dexter_used = True     # 🔒 سوخت — دیگر تا آخرِ بازی باز نمی‌شود
-        await _room_note(ctx, g, f"🔪 قتلِ دکستر روی <b>{_room_who(g, s)}</b> (غیرقابلِ نجات)")
-        g.night_sel.pop(uid, None)
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"🔪 ثبت شد: {s}. {_tn}")
-        await _night_report(ctx, g,
-                            f"🔪 دکستر → قتلِ <b>{s}. {escape(_tn, quote=False)}</b> (غیرقابلِ نجات)")
-        g.night_done.add("dexter")
-        store.save()
-        await _gm_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data.startswith("gm_dxt_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        await _edit_pm(ctx, uid, mid, "🔪 چه کسی را به قتل می‌رسانی؟ (نجات پیدا نمی‌کند)",
-                       _kb_night_seats(_gm_dexter_targets(g), g, "gm_dxt_",
-                                       selected=s, confirm_cb="gm_dxt_ok"))
-        return
-
-    # ── اسمیگل (شهروندِ دیوانه) — انتخاب بعد از شاتِ ریک‌گرایمز ──
-    if data in ("gm_sm_die", "gm_sm_maf"):
-        g.gm_smeagol_choice = "mafia" if data == "gm_sm_maf" else "die"
-        g.night_done.add("smeagol")
-        store.save()
-        if g.gm_smeagol_choice == "mafia":
-            await _close_pm(ctx, uid, mid, "🖤 انتخابت ثبت شد.")
-            await _night_report(ctx, g, "🌀 اسمیگل → خیانت را انتخاب کرد")
-        else:
-            await _close_pm(ctx, uid, mid, "🤍 انتخابت ثبت شد.")
-            await _night_report(ctx, g, "🌀 اسمیگل → مرگ برای شهروند را انتخاب کرد")
-        return
-
-    # ── کستیل (دکتر) ──
-    if data == "gm_doc_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        me = _seat_of_uid(g, uid)
-        if s == me:
-            g.doctor_self_saves = (g.doctor_self_saves or 0) + 1
-        g.night_doc_saved = [s]
-        g.night_sel.pop(uid, None)
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {s}. {_tn}")
-        await _night_report(ctx, g, f"💉 کستیل → سیو: <b>{s}. {escape(_tn, quote=False)}</b>")
-        g.night_done.add("doctor")
-        store.save()
-        return
-
-    if data.startswith("gm_doc_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        me = _seat_of_uid(g, uid)
-        await _edit_pm(ctx, uid, mid, "💉 چه کسی را سیو می‌دهی؟ (۱ نفر)",
-                       _kb_night_seats(_doctor_targets(g, me), g, "gm_doc_", selected=s, confirm_cb="gm_doc_ok"))
-        return
-
-    # ── الیوت ──
-    if data == "gm_el_no":
-        await _close_pm(ctx, uid, mid, "🛡 امشب محافظت نکردی.")
-        await _night_report(ctx, g, "🛡 الیوت → محافظت نکرد")
-        g.night_done.add("eliot")
-        store.save()
-        return
-
-    if data == "gm_el_yes":
-        actor = _seat_of_uid(g, uid)
-        targets = list(_alive_seats(g))
-        await _edit_pm(ctx, uid, mid, "🛡 از چه کسی در برابر بمب محافظت می‌کنی؟",
-                       _kb_night_seats(targets, g, "gm_el_", confirm_cb="gm_el_ok"))
-        return
-
-    if data == "gm_el_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.gm_eliot_protect = s
-        g.night_sel.pop(uid, None)
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"🛡 محافظت ثبت شد: {s}. {_tn}")
-        await _night_report(ctx, g, f"🛡 الیوت → محافظت از <b>{s}. {escape(_tn, quote=False)}</b>")
-        g.night_done.add("eliot")
-        store.save()
-        return
-
-    if data.startswith("gm_el_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        await _edit_pm(ctx, uid, mid, "🛡 از چه کسی در برابر بمب محافظت می‌کنی؟",
-                       _kb_night_seats(list(_alive_seats(g)), g, "gm_el_", selected=s, confirm_cb="gm_el_ok"))
-        return
-
-    # ── جیمزهالیدی ──
-    if data == "gm_jm_no":
-        await _close_pm(ctx, uid, mid, "🎲 امشب بازی نکردی.")
-        await _night_report(ctx, g, "🎲 جیمز → بازی نکرد")
-        g.night_done.add("james")
-        store.save()
-        return
-
-    if data == "gm_jm_yes":
-        g.gm_james_nums = []
-        store.save()
-        await _edit_pm(ctx, uid, mid, "🎲 دو عدد بین ۱ تا ۶ انتخاب کن:", _gm_james_nums_kb(g))
-        return
-
-    if data == "gm_jn_ok":
-        if len(g.gm_james_nums or []) != 2:
-            await safe_q_answer(q, "دقیقاً ۲ عدد انتخاب کن.", show_alert=True)
-            return
-        actor = _seat_of_uid(g, uid)
-        targets = [s for s in _alive_seats(g) if s != actor]
-        await _edit_pm(ctx, uid, mid, f"🎲 اعداد: {g.gm_james_nums[0]} و {g.gm_james_nums[1]} — با چه کسی بازی می‌کنی؟",
-                       _kb_night_seats(targets, g, "gm_jt_", confirm_cb="gm_jt_ok"))
-        return
-
-    if data.startswith("gm_jn_"):
-        n = int(data.rsplit("_", 1)[1])
-        nums = list(g.gm_james_nums or [])
-        if n in nums:
-            nums.remove(n)
-        elif len(nums) < 2:
-            nums.append(n)
-        else:
-            await safe_q_answer(q, "حداکثر ۲ عدد.", show_alert=True)
-            return
-        g.gm_james_nums = nums
-        store.save()
-        await _edit_pm(ctx, uid, mid, "🎲 دو عدد بین ۱ تا ۶ انتخاب کن:", _gm_james_nums_kb(g))
-        return
-
-    if data == "gm_jt_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.gm_james_target = s
-        g.gm_james_uses += 1
-        g.night_sel.pop(uid, None)
-        store.save()
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"🎲 تاس برای {s}. {_tn} انداخته شد...")
-        target_uid = g.seats[s][0]
-        val = None
-        try:
-            dm = await ctx.bot.send_dice(target_uid)
-            val = dm.dice.value
-        except Exception:
-            val = random.randint(1, 6)
-        await asyncio.sleep(4)
-        nums = list(g.gm_james_nums or [])
-        don = _find_seat_by_role(g, _R_DONC)
-        hit = (val in nums)
-        await _night_report(ctx, g, f"🎲 جیمز ({nums[0]} و {nums[1]}) با {s}. {escape(_tn, quote=False)} — تاس: {val} → "
-                            + ("گرفت ✅" if hit else "نگرفت ❌"))
-        if not hit:
-            await _safe_pm(ctx, uid, f"🎲 تاس {val} آمد — نگرفت!")
-            g.night_done.add("james")
-            store.save()
-            return
-        don_robbed = (g.gm_gift_accepted and g.gm_robbed_seat == don)
-        if don is not None and s == don and not don_robbed:
-            # دن دروغ می‌گوید: انتخاب نقش شهروندی
-            g.gm_james_waiting_don = True
-            g.gm_james_dice_val = val
-            store.save()
-            names = _gm_citizen_role_names(g)
-            rows = [[InlineKeyboardButton(rn, callback_data=f"gm_lie_{i}")] for i, rn in enumerate(names)]
-            await _safe_pm(ctx, g.seats[don][0],
-                           "🎲 جیمز با تو بازی کرد و تاس گرفت! کدام نقش شهروندی را به دروغ بفرستم؟",
-                           InlineKeyboardMarkup(rows))
-            return
-        real_role = (g.assigned_roles or {}).get(s, "؟")
-        await _safe_pm(ctx, uid, f"🎲 تاس {val} آمد — گرفتی! نقشِ {s}. {_tn}: «{real_role}»")
-        await _night_report(ctx, g, f"🎲 نقشِ واقعی «{escape(real_role, quote=False)}» برای جیمز فرستاده شد.")
-        g.night_done.add("james")
-        store.save()
-        return
-
-    if data.startswith("gm_jt_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        actor = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != actor]
-        await _edit_pm(ctx, uid, mid, "🎲 با چه کسی بازی می‌کنی؟",
-                       _kb_night_seats(targets, g, "gm_jt_", selected=s, confirm_cb="gm_jt_ok"))
-        return
-
-    if data.startswith("gm_lie_"):
-        i = int(data.rsplit("_", 1)[1])
-        names = _gm_citizen_role_names(g)
-        if i >= len(names):
-            return
-        lie = names[i]
-        await _close_pm(ctx, uid, mid, f"🤥 «{lie}» فرستاده شد.")
-        jm = _find_seat_by_role(g, _R_JAMES)
-        jm_actor = _gm_actor_for(g, jm)
-        t = g.gm_james_target
-        _tn = g.seats[t][1] if t in g.seats else "؟"
-        _v = g.gm_james_dice_val or "?"
-        if jm_actor:
-            # ⚠️ فرمتِ پیام باید دقیقاً مثل نقشِ واقعی باشد تا دروغِ دن لو نرود
-            await _safe_pm(ctx, g.seats[jm_actor][0], f"🎲 تاس {_v} آمد — گرفتی! نقشِ {t}. {_tn}: «{lie}»")
-        await _night_report(ctx, g, f"🤥 دن به دروغ «{escape(lie, quote=False)}» را برای جیمز فرستاد.")
-        g.gm_james_waiting_don = False
-        g.night_done.add("james")
-        store.save()
-        return
-
-    # ── ریک‌گرایمز ──
-    if data == "gm_rk_no":
-        await _close_pm(ctx, uid, mid, "🔫 امشب شات نزدی.")
-        await _night_report(ctx, g, "🔫 ریک → شات نزد")
-        g.night_done.add("rick")
-        store.save()
-        return
-
-    if data == "gm_rk_yes":
-        actor = _seat_of_uid(g, uid)
-        targets = [s for s in _alive_seats(g) if s != actor]
-        await _edit_pm(ctx, uid, mid, "🔫 به چه کسی شلیک می‌کنی؟",
-                       _kb_night_seats(targets, g, "gm_rk_", confirm_cb="gm_rk_ok"))
-        return
-
-    if data == "gm_rk_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.gm_rick_target = s
-        g.night_sel.pop(uid, None)
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"🔫 شلیک ثبت شد: {s}. {_tn}")
-        await _night_report(ctx, g, f"🔫 ریک‌گرایمز → شلیک به <b>{s}. {escape(_tn, quote=False)}</b>")
-        g.night_done.add("rick")
-        store.save()
-        # 🌀 اگر هدف اسمیگل باشد، خودش انتخاب می‌کند: برای شهروند بمیرد یا خیانت کند
-        _sm = _find_seat_by_role(g, _R_SMEAGOL)
-        if (_sm is not None and s == _sm and not getattr(g, "gm_smeagol_turned", False)
-                and _sm not in (g.night_burned or set())):
-            await _gm_prompt(
-                ctx, g, _sm, "smeagol",
-                "🌀 امشب به تو شلیک شد. انتخاب کن:",
-                InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🤍 برای شهروند می‌میرم", callback_data="gm_sm_die")],
-                    [InlineKeyboardButton("🖤 خیانت می‌کنم و مافیا می‌شوم", callback_data="gm_sm_maf")],
-                ]))
-        return
-
-    if data.startswith("gm_rk_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        actor = _seat_of_uid(g, uid)
-        targets = [x for x in _alive_seats(g) if x != actor]
-        await _edit_pm(ctx, uid, mid, "🔫 به چه کسی شلیک می‌کنی؟",
-                       _kb_night_seats(targets, g, "gm_rk_", selected=s, confirm_cb="gm_rk_ok"))
-        return
-
-
-async def handle_don_sentence_pm(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
-    """جمله‌ی معارفه‌ی دن‌کارلئونه (در پیوی) → برای مسترهلمز و گاد."""
-    msg = update.message
-    if not msg or not msg.text:
-        return
-    uid = msg.from_user.id
-    for cid, g in store.games.items():
-        if not getattr(g, "gm_awaiting_don_sentence", False):
-            continue
-        don = _find_seat_by_role(g, _R_DONC)
-        if don is None or g.seats[don][0] != uid:
-            continue
-        sentence = msg.text.strip()[:200]
-        g.gm_don_sentence = sentence
-        g.gm_awaiting_don_sentence = False
-        store.save()
-        holmes = _find_seat_by_role(g, _R_HOLMES)
-        if holmes:
-            try:
-                await ctx.bot.send_message(g.seats[holmes][0], f"📩 جمله‌ای به دستت رسید:\n«{sentence}»")
-            except Exception:
-                pass
-        await _night_report(ctx, g, f"📩 جملهٔ دن‌کارلئونه → هلمز: «{escape(sentence, quote=False)}»")
-        try:
-            await msg.reply_text("✅ جمله‌ات ثبت و برای مسترهلمز ارسال شد.")
-        except Exception:
-            pass
-        return
-
-    # ✍️ جمله‌ی مسترهلمز → موریارتی (هم‌زمان با جمله‌ی دن در معارفه)
-    for cid, g in store.games.items():
-        if not getattr(g, "gm_awaiting_holmes_sentence", False):
-            continue
-        hs = _find_seat_by_role(g, _R_HOLMES)
-        if hs is None or g.seats[hs][0] != uid:
-            continue
-        sentence = msg.text.strip()[:200]
-        g.gm_holmes_sentence = sentence
-        g.gm_awaiting_holmes_sentence = False
-        store.save()
-        mo = _find_seat_by_role(g, _R_MORIARTY)
-        if mo:
-            try:
-                await ctx.bot.send_message(g.seats[mo][0],
-                                           f"📩 جمله‌ای به دستت رسید:\n«{sentence}»")
-            except Exception:
-                pass
-        await _night_report(ctx, g, f"📩 جملهٔ هلمز → موریارتی: «{escape(sentence, quote=False)}»")
-        try:
-            await msg.reply_text("✅ جمله‌ات ثبت و برای موریارتی ارسال شد.")
-        except Exception:
-            pass
-        return
-
-
-def _mafia_decider_key(g):
-    """کلیدِ «تصمیم‌گیرندهٔ مافیا» در هر سناریو (گیمر وراثتِ شاتِ خودش را دارد)."""
-    if _is_nemayande_scenario(g):
-        return "nem_decider_seat"
-    if _is_baazpors_scenario(g):
-        return "bzp_decider_seat"
-    if _is_takavar_scenario(g):
-        return "tk_decider_seat"
-    if _is_kapu_scenario(g):
-        return "kp_decider_seat"
-    if _is_gamer_scenario(g):
-        return None
-    if _is_shahname_scenario(g):
-        return "sh_decider_seat"
-    return "night_decider_seat"
-
-
-async def _pass_shot_to_next_mafia(ctx, g, ks):
-    """👢→🔫 اگر کیک‌شده «تصمیم‌گیرندهٔ مافیا» بود و هنوز اکتش را ثبت نکرده،
-    نوبت به مافیای بعدی می‌رسد — با منویِ درستِ همان سناریو."""
-    try:
-        if getattr(g, "night_shot_target", None) or getattr(g, "night_don_act", None):
-            return   # اکتِ مافیا قبلاً ثبت شده
-        key = _mafia_decider_key(g)
-        if not key or getattr(g, key, None) != ks:
-            return   # ⚠️ این نفر تصمیم‌گیرندهٔ مافیا نبود (مثلاً هکر) → چیزی معطل نیست
-
-        nxt = None
-        for s in sorted(_alive_seats(g)):
-            if s != ks and s not in (g.night_burned or set()) and _sc_side(g, s) == "مافیا":
-                nxt = s
-                break
-        if nxt is None:
-            return
-        nuid = g.seats[nxt][0]
-        setattr(g, key, nxt)
-        head = "🔫 اکتِ مافیا به تو رسید (هم‌تیمی‌ات کیک شد)"
-
-        # ⚠️ هر سناریو باید منویِ خودش را بگیرد، وگرنه جریانِ بازی به‌هم می‌ریزد
-        if _is_nemayande_scenario(g):
-            rows = [[InlineKeyboardButton("🔫 شات", callback_data="nem_don_shot")]]
-            # ناتویی اکتِ خودِ دن است — دنِ کیک‌شده هنوز خط نخورده، پس دستی کنارش می‌گذاریم
-            _don = _find_seat_by_role(g, _R_DON)
-            if (_don is not None and _don != ks and not g.nato_used
-                    and _don not in (g.night_burned or set())):
-                rows.append([InlineKeyboardButton("🕵️ ناتویی", callback_data="nem_don_nato")])
-            kb = InlineKeyboardMarkup(rows)
-            text = f"{head}\nاکت مافیا را انتخاب کن:"
-        elif _is_shahname_scenario(g):
-            rows = [[InlineKeyboardButton("🔫 شات", callback_data="sh_act_shot")]]
-            _bf = _sh_seat(g, _R_BOOF)
-            if _bf is not None and _bf != ks and not getattr(g, "sh_boof_used", False):
-                rows.append([InlineKeyboardButton("🪶 پر بوف", callback_data="sh_act_boof")])
-            kb = InlineKeyboardMarkup(rows)
-            text = f"{head}\nاکت تیم اهریمن را انتخاب کن:"
-        else:
-            prefix, confirm = {
-                "bzp_decider_seat": ("bzp_shot_", "bzp_shot_confirm"),
-                "tk_decider_seat":  ("tk_st_", "tk_st_confirm"),
-                "kp_decider_seat":  ("kp_st_", "kp_st_confirm"),
-            }.get(key, ("night_shot_", "night_shot_confirm"))
-            kb = _kb_night_seats(list(_alive_seats(g)), g, prefix, confirm_cb=confirm)
-            text = f"{head} — هدف را انتخاب کن:"
-
-        m = await _safe_pm(ctx, nuid, text, kb)
-        if m:
-            g.night_pm_msgs[nuid] = m.message_id
-            store.save()
-            await _night_report(ctx, g, f"🔫 اکتِ مافیا از {ks} به {nxt} منتقل شد (کیک شب).")
-    except Exception as e:
-        print("⚠️ pass shot err:", e)
-
-
-# ═════════════════════════════════════════════════════════════
-#  موتور شبِ خودکار — سناریو «میتیک» (۱۲ نفره)
-#  شب: اول شاتِ مافیا (+ کانسورت) → بعد اکت‌های شهروندی، بدون اولویت
-# ═════════════════════════════════════════════════════════════
-MYTHIC_KEY   = "میتیک"
-MYTHIC_SEATS = 12                 # 🤖 رأی‌گیریِ اتومات فقط روی همین ظرفیت
-_R_MY_GF      = _nz("گادفادر")
-_R_MY_NINJA   = _nz("نینجا")
-_R_MY_CONSORT = _nz("کانسورت")
-_R_MY_TERROR  = _nz("تروریست")
-_R_MY_BODY    = _nz("بادیگارد")
-_R_MY_SNIPER  = _nz("اسنایپر")
-_R_MY_DOC     = _nz("دکتر")
-_R_MY_DET     = _nz("کاراگاه")
-_R_MY_SIMPLE  = _nz("شهرساده")
-_MY_MAFIA = (_R_MY_GF, _R_MY_NINJA, _R_MY_CONSORT, _R_MY_TERROR)
-
-
-def _is_mythic_scenario(g) -> bool:
-    return bool(getattr(g, "scenario", None)) and (_nz(MYTHIC_KEY) in _nz(g.scenario.name))
-
-
-def _my_rn(x) -> str:
-    """نرمالِ نقش برای میتیک — بی‌اعتنا به فاصله و نیم‌فاصله («شهرساده» == «شهر ساده»)."""
-    return _nz(x or "").replace(" ", "").replace("‌", "")
-
-
-def _my_seat(g, role, alive_only=True):
-    """صندلیِ یک نقش: اول تطبیقِ دقیق، بعد جزئی (تحملِ اسم‌های تزئین‌شده)."""
-    want = _my_rn(role)
-    seats = _alive_seats(g) if alive_only else sorted(g.seats)
-    for s in seats:
-        if _my_rn((g.assigned_roles or {}).get(s, "")) == want:
-            return s
-    for s in seats:
-        if want and want in _my_rn((g.assigned_roles or {}).get(s, "")):
-            return s
-    return None
-
-
-def _my_role_is(g, seat, role) -> bool:
-    return _my_rn((g.assigned_roles or {}).get(seat, "")) == _my_rn(role)
-
-
-def _my_burned(g, seat) -> bool:
-    return seat is not None and seat in (getattr(g, "night_burned", set()) or set())
-
-
-def _my_has_act(g, seat) -> bool:
-    """آیا این صندلی اصلاً اکتِ شبانه دارد؟ (برای پیامِ «کانسورتی شدی»)"""
-    return any(_my_role_is(g, seat, r) for r in
-               (_R_MY_GF, _R_MY_NINJA, _R_MY_CONSORT,
-                _R_MY_BODY, _R_MY_SNIPER, _R_MY_DOC, _R_MY_DET))
-
-
-def _my_yesno(yes_cb, no_cb, no_text="🚫 امشب اکت نمی‌زنم"):
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("✅ بله", callback_data=yes_cb)],
-        [InlineKeyboardButton(no_text, callback_data=no_cb)],
-    ])
-
-
-async def _my_prompt(ctx, g, seat, key, text, kb=None):
-    """پرامپتِ اکت + ثبت در فهرستِ انتظار. اکتِ سوخته همان‌جا «انجام‌شده» علامت می‌خورد."""
-    if seat is None or _my_burned(g, seat):
-        g.night_done.add(key)
-        store.save()
-        return None
-    uid = g.seats[seat][0]
-    m = await _safe_pm(ctx, uid, text, kb)
-    if m:
-        g.night_pm_msgs[uid] = m.message_id
-    g.my_expected.add(key)
-    store.save()
-    return m
-
-
-async def _my_consort_notice(ctx, g, seat):
-    """🎭 هدفِ کانسورت — اگر اکت‌دار باشد، در پیویش خبر می‌گیرد."""
-    if seat is None or seat not in g.seats or not _my_has_act(g, seat):
-        return
-    try:
-        await ctx.bot.send_message(g.seats[seat][0],
-                                   "🎭 شما کانسورتی شدید و امشب حق اکت ندارید.")
-    except Exception:
-        pass
-
-
-def _my_both_acts(g) -> bool:
-    """🔫+🎭 هر دو اکت فقط وقتی هر سهِ رئیس/کانسورت/نینجا در بازی‌اند."""
-    return all(_my_seat(g, r) is not None
-               for r in (_R_MY_GF, _R_MY_CONSORT, _R_MY_NINJA))
-
-
-def _my_doc_targets(g, doc_seat):
-    """💉 دکتر: خودش فقط یک‌بار در کلِ بازی، بقیه بی‌نهایت."""
-    return [s for s in _alive_seats(g)
-            if s != doc_seat or not getattr(g, "my_doc_self_used", False)]
-
-
-def _my_bg_targets(g, bg_seat):
-    """🛡 بادیگارد: خودش فقط یک‌بار در کلِ بازی، بقیه بی‌نهایت."""
-    return [s for s in _alive_seats(g)
-            if s != bg_seat or not getattr(g, "my_bg_self_used", False)]
-
-
-def _my_detective_positive(g, seat) -> bool:
-    """🔎 استعلام: گادفادر منفی؛ نینجا/کانسورت/تروریست مثبت؛ شهروندها منفی."""
-    return any(_my_role_is(g, seat, r)
-               for r in (_R_MY_NINJA, _R_MY_CONSORT, _R_MY_TERROR))
-
-
-# ── شبِ میتیک: مرحلهٔ ۱ — تیمِ مافیا ────────────────────────────
-async def _my_start(ctx, chat_id, g):
-    await _my_open_mafia(ctx, chat_id, g)
-
-
-async def _my_ask_shot(ctx, g, decider):
-    await _my_prompt(ctx, g, decider, "shot",
-                     "🔫 می‌خواهی امشب شات بزنی؟",
-                     _my_yesno("my_sh_yes", "my_sh_no", "🚫 امشب شات نمی‌زنم"))
-
-
-async def _my_ask_consort(ctx, g, co):
-    await _my_prompt(ctx, g, co, "consort",
-                     "🎭 می‌خواهی امشب کسی را کانسورتی کنی؟",
-                     _my_yesno("my_co_yes", "my_co_no"))
-
-
-async def _my_open_mafia(ctx, chat_id, g):
-    if "mafia_opened" in g.night_done:
-        return
-    g.night_done.add("mafia_opened")
-    gf = _my_seat(g, _R_MY_GF)
-    co = _my_seat(g, _R_MY_CONSORT)
-    nj = _my_seat(g, _R_MY_NINJA)
-    decider = gf or co or nj          # 🔫 وراثتِ شات: گادفادر → کانسورت → نینجا
-    g.my_decider_seat = decider
-    store.save()
-
-    if decider is None:
-        g.night_done.update({"shot", "consort"})
-    elif _my_both_acts(g):
-        # هر سه در بازی‌اند → هم شات، هم کانسورت
-        await _my_ask_shot(ctx, g, decider)
-        await _my_ask_consort(ctx, g, co)
-    elif co is not None:
-        # فقط یکی از دو اکت — تصمیم با تصمیم‌گیرندهٔ تیم
-        await _my_prompt(
-            ctx, g, decider, "mchoice",
-            "🎭 امشب فقط یکی از این دو را دارید — کدام؟",
-            InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔫 شات", callback_data="my_ch_shot"),
-                InlineKeyboardButton("🎭 کانسورت", callback_data="my_ch_co")]]))
-        if "mchoice" in g.night_done:       # سوخته بود → هیچ اکتی نیست
-            g.night_done.update({"shot", "consort"})
-    else:
-        g.night_done.add("consort")         # کانسورتی در بازی نمانده
-        await _my_ask_shot(ctx, g, decider)
-    store.save()
-    await _my_check_open_citizens(ctx, chat_id, g)
-
-
-def _my_will_kb(g):
-    rows = [[InlineKeyboardButton("📖 وصیت باز", callback_data="my_w_open")]]
-    # 🔒 وصیتِ بسته: یک‌بار در کلِ بازی و فقط تا وقتی رئیس در بازی است
-    if not getattr(g, "my_will_closed_used", False) and _my_seat(g, _R_MY_GF) is not None:
-        rows.append([InlineKeyboardButton("🔒 وصیت بسته", callback_data="my_w_closed")])
-    return InlineKeyboardMarkup(rows)
-
-
-# ── شبِ میتیک: مرحلهٔ ۲ — شهروندان (بدون اولویت) ────────────────
-async def _my_check_open_citizens(ctx, chat_id, g):
-    if "citizens_opened" in g.night_done:
-        return
-    if not ({"shot", "consort"} <= (g.night_done or set())):
-        return
-    g.night_done.add("citizens_opened")
-    store.save()
-
-    ct = getattr(g, "my_consort_target", None)
-    for role, key, text in (
-        (_R_MY_DOC,  "doctor",    "💉 می‌خواهی امشب سیو بدهی؟"),
-        (_R_MY_BODY, "bodyguard", "🛡 می‌خواهی امشب از کسی محافظت کنی؟"),
-        (_R_MY_DET,  "detective", "🔎 می‌خواهی امشب استعلام بگیری؟"),
-    ):
-        s = _my_seat(g, role)
-        if s is None:
-            g.night_done.add(key)
-            continue
-        if s == ct:
-            await _my_consort_notice(ctx, g, s)
-            g.night_done.add(key)
-            continue
-        yes, no = {"doctor": ("my_dc_yes", "my_dc_no"),
-                   "bodyguard": ("my_bg_yes", "my_bg_no"),
-                   "detective": ("my_dt_yes", "my_dt_no")}[key]
-        await _my_prompt(ctx, g, s, key, text, _my_yesno(yes, no))
-
-    # 🎯 اسنایپر
-    sn = _my_seat(g, _R_MY_SNIPER)
-    if sn is None:
-        g.night_done.add("sniper")
-    elif getattr(g, "my_sniper_suicide_night", None) == g.night_number:
-        # ⚰️ شبِ خودکشی — نه اکتی دارد، نه انتخابی
-        g.night_done.add("sniper")
-        try:
-            await ctx.bot.send_message(
-                g.seats[sn][0],
-                "⚰️ تو شب گذشته یک شهروند را زدی — امشب خودکشی می‌کنی.\n"
-                "امشب حقِ اکت نداری.")
-        except Exception:
-            pass
-        await _night_report(ctx, g, f"⚰️ اسنایپر ({sn}) امشب خودکشی می‌کند.")
-    elif int(getattr(g, "my_sniper_shots", 0) or 0) >= 2:
-        g.night_done.add("sniper")
-    elif sn == ct:
-        await _my_consort_notice(ctx, g, sn)
-        g.night_done.add("sniper")
-    else:
-        await _my_prompt(ctx, g, sn, "sniper", "🎯 می‌خواهی امشب شلیک کنی؟",
-                         _my_yesno("my_sn_yes", "my_sn_no", "🚫 امشب شلیک نمی‌کنم"))
-    store.save()
-
-
-# ── حلِ شبِ میتیک ──────────────────────────────────────────────
-async def _resolve_mythic(ctx, chat_id, g):
-    dead, reasons = set(), {}
-    gf = _my_seat(g, _R_MY_GF)
-    co = _my_seat(g, _R_MY_CONSORT)
-    nj = _my_seat(g, _R_MY_NINJA)
-    bg = _my_seat(g, _R_MY_BODY)
-    sn = _my_seat(g, _R_MY_SNIPER)
-    doc_saved = set(g.night_doc_saved or [])
-    bgs = getattr(g, "my_bg_save", None)
-    bg_self = (bg is not None and bgs == bg)
-    notes = []           # 📣 اعلانِ عمومیِ روزِ بعد (میتیک علت را عمومی می‌گوید)
-
-    def _nm(s):
-        return f"{s}. {escape(g.seats[s][1], quote=False)}"
-
-    # 🔫 شاتِ مافیا
-    st = getattr(g, "night_shot_target", None)
-    will = getattr(g, "my_shot_will", None)
-    will_txt = " با وصیت بسته" if will == "closed" else " با وصیت باز"
-    if st and st in g.seats and st not in (g.striked or set()):
-        if st in doc_saved:
-            await _night_report(ctx, g, f"💉 سیوِ دکتر جلوی شاتِ مافیا روی {st} را گرفت.")
-        elif bgs == st:
-            if bg_self or nj is not None:
-                # 🛡 سیوِ خودیِ بادیگارد، یا نینجای زنده → دقیقاً مثل سیوِ دکتر
-                await _night_report(
-                    ctx, g,
-                    f"🛡 سیوِ بادیگارد جلوی شاتِ مافیا روی {st} را گرفت "
-                    + ("(سیوِ خودش — درگیری ندارد)." if bg_self else "(نینجا در بازی است)."))
-            else:
-                foe = co if co is not None else gf
-                dead.add(bg); reasons[bg] = "شات مافیا"
-                notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(bg)}</b> — به شات مافیا")
-                if foe is not None:
-                    dead.add(foe); reasons[foe] = "اکت بادیگارد"
-                    notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(foe)}</b> — به اکت بادیگارد")
-        else:
-            dead.add(st); reasons[st] = "شات مافیا" + will_txt
-            notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(st)}</b> — به شات مافیا{will_txt}")
-            if will == "closed":
-                g.my_will_closed_used = True
-            g.my_wills[st] = will or "open"
-
-    # 🎯 شاتِ اسنایپر
-    snt = getattr(g, "my_sniper_target", None)
-    if snt and snt in g.seats and snt not in (g.striked or set()):
-        if gf is not None and snt == gf:
-            # 🎯 گادفادر با شاتِ اسنایپر نمی‌میرد. تیر مصرف می‌شود ولی چون
-            #    مافیا زده، خودکشی‌ای در کار نیست و شبِ بعد باز می‌تواند بزند.
-            await _night_report(
-                ctx, g, "🎯 اسنایپر گادفادر را زد — گادفادر نمی‌میرد و اسنایپر هم خودکشی ندارد.")
-        elif snt in doc_saved:
-            await _night_report(ctx, g, f"💉 سیوِ دکتر جلوی شاتِ اسنایپر روی {snt} را گرفت — خودکشی هم منتفی شد.")
-        elif bgs == snt and bg_self:
-            await _night_report(ctx, g, "🛡 بادیگارد خودش را سیو کرد — با اسنایپر درگیر نشد.")
-        elif bgs == snt:
-            # ⚔️ درگیریِ بادیگارد و اسنایپر — بدونِ شرطِ نینجا
-            if bg is not None and bg not in dead:
-                dead.add(bg); reasons[bg] = "شات اسنایپر"
-                notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(bg)}</b> — به شات اسنایپر")
-            if sn is not None and sn not in dead:
-                dead.add(sn); reasons[sn] = "اکت بادیگارد"
-                notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(sn)}</b> — به اکت بادیگارد")
-        else:
-            dead.add(snt); reasons[snt] = "شات اسنایپر"
-            notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(snt)}</b> — به شات اسنایپر (وصیت دارد)")
-            if snt not in _mafia_seats(g) and sn is not None and sn not in dead:
-                # 🎯 شهروند زد → شبِ بعد خودکشی
-                g.my_sniper_suicide_night = (g.night_number or 0) + 1
-                await _night_report(ctx, g, "🎯 اسنایپر شهروند زد — شبِ بعد خودکشی می‌کند.")
-
-    # ⚰️ خودکشیِ اسنایپر (شبی که برایش تعیین شده بود)
-    if (getattr(g, "my_sniper_suicide_night", None) == g.night_number
-            and sn is not None and sn not in dead):
-        dead.add(sn); reasons[sn] = "خودکشیِ اسنایپر"
-        notes.append(f"🕊 خداحافظی می‌کنیم با <b>{_nm(sn)}</b> — خودکشیِ اسنایپر")
-
-    _add_night_kick(g, dead, reasons)
-    store.save()
-    await _apply_deaths(ctx, chat_id, g, dead, reasons)
-
-    # 📣 میتیک علتِ خروج را عمومی اعلام می‌کند
-    if notes:
-        try:
-            await ctx.bot.send_message(chat_id, "\n".join(notes), parse_mode="HTML")
-        except Exception:
-            pass
-
-
-async def handle_mythic_callback(update, ctx):
-    q = update.callback_query
-    data = q.data
-    uid = _q_uid(q)   # 🎛 اکتِ دستیِ گاد
-
-    g, chat_id = _find_active_night_game(uid, q)
-    if g is None:
-        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
-        return
-    await safe_q_answer(q)
-    mid = q.message.message_id if q.message else None
-    me = _seat_of_uid(g, uid)
-
-    # ── انتخابِ «شات یا کانسورت» وقتی فقط یکی مجاز است ──
-    if data in ("my_ch_shot", "my_ch_co"):
-        if "mchoice" in g.night_done:
-            return
-        g.night_done.add("mchoice")
-        co = _my_seat(g, _R_MY_CONSORT)
-        if data == "my_ch_shot":
-            g.night_done.add("consort")
-            store.save()
-            await _close_pm(ctx, uid, mid, "🔫 شات انتخاب شد.")
-            await _night_report(ctx, g, "🎭 تیمِ مافیا: شات را انتخاب کرد.")
-            await _my_ask_shot(ctx, g, g.my_decider_seat)
-        else:
-            g.night_done.add("shot")
-            store.save()
-            await _close_pm(ctx, uid, mid, "🎭 کانسورت انتخاب شد.")
-            await _night_report(ctx, g, "🎭 تیمِ مافیا: کانسورت را انتخاب کرد.")
-            await _my_ask_consort(ctx, g, co)
-        await _my_check_open_citizens(ctx, chat_id, g)
-        return
-
-    # ── شاتِ مافیا ──
-    if data == "my_sh_no":
-        await _close_pm(ctx, uid, mid, "🚫 امشب شات نزدی.")
-        await _night_report(ctx, g, "🔫 مافیا → شات نزد")
-        g.night_done.add("shot")
-        store.save()
-        await _my_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data == "my_sh_yes":
-        await _edit_pm(ctx, uid, mid, "📜 شات با وصیتِ باز باشد یا بسته؟", _my_will_kb(g))
-        return
-
-    if data in ("my_w_open", "my_w_closed"):
-        g.my_shot_will = "closed" if data == "my_w_closed" else "open"
-        store.save()
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_night_seats(list(_alive_seats(g)), g, "my_st_",
-                                       confirm_cb="my_st_ok"))
-        return
-
-    if data == "my_st_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_shot_target = s
-        g.night_sel.pop(uid, None)
-        _tn = g.seats[s][1]
-        _w = "بسته" if g.my_shot_will == "closed" else "باز"
-        await _room_announce_shot(ctx, g, s, f" — وصیت {_w}")
-        await _close_pm(ctx, uid, mid, f"✅ شلیک ثبت شد: {s}. {_tn} (وصیت {_w})")
-        await _night_report(ctx, g,
-                            f"🔫 شلیک مافیا → <b>{s}. {escape(_tn, quote=False)}</b> (وصیت {_w})")
-        g.night_done.add("shot")
-        store.save()
-        await _my_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data.startswith("my_st_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_night_seats(list(_alive_seats(g)), g, "my_st_",
-                                       selected=s, confirm_cb="my_st_ok"))
-        return
-
-    # ── کانسورت ──
-    if data == "my_co_no":
-        await _close_pm(ctx, uid, mid, "🚫 امشب کسی را کانسورتی نکردی.")
-        await _night_report(ctx, g, "🎭 کانسورت → اکت نزد")
-        g.night_done.add("consort")
-        store.save()
-        await _my_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data == "my_co_yes":
-        # 🎭 هم‌تیمی مجاز است، خودش نه
-        targets = [s for s in _alive_seats(g) if s != me]
-        await _edit_pm(ctx, uid, mid, "🎭 چه کسی را کانسورتی می‌کنی؟",
-                       _kb_night_seats(targets, g, "my_ct_", confirm_cb="my_ct_ok"))
-        return
-
-    if data == "my_ct_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.my_consort_target = s
-        g.night_sel.pop(uid, None)
-        await _room_note(ctx, g, f"🎭 کانسورتی روی <b>{_room_who(g, s)}</b>")
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"🎭 کانسورت ثبت شد: {s}. {_tn}")
-        await _night_report(ctx, g, f"🎭 کانسورت → <b>{s}. {escape(_tn, quote=False)}</b>")
-        g.night_done.add("consort")
-        store.save()
-        await _my_check_open_citizens(ctx, chat_id, g)
-        return
-
-    if data.startswith("my_ct_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g) if x != me]
-        await _edit_pm(ctx, uid, mid, "🎭 چه کسی را کانسورتی می‌کنی؟",
-                       _kb_night_seats(targets, g, "my_ct_", selected=s, confirm_cb="my_ct_ok"))
-        return
-
-    # ── دکتر ──
-    if data == "my_dc_no":
-        await _close_pm(ctx, uid, mid, "🚫 امشب سیو ندادی.")
-        await _night_report(ctx, g, "💉 دکتر → سیو نداد")
-        g.night_done.add("doctor")
-        store.save()
-        return
-
-    if data == "my_dc_yes":
-        await _edit_pm(ctx, uid, mid, "💉 چه کسی را سیو می‌دهی؟",
-                       _kb_night_seats(_my_doc_targets(g, me), g, "my_dt2_",
-                                       confirm_cb="my_dt2_ok"))
-        return
-
-    if data == "my_dt2_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        if s == me:
-            g.my_doc_self_used = True
-        g.night_doc_saved = [s]
-        g.night_sel.pop(uid, None)
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"💉 سیو ثبت شد: {s}. {_tn}")
-        await _night_report(ctx, g, f"💉 دکتر → سیو: <b>{s}. {escape(_tn, quote=False)}</b>")
-        g.night_done.add("doctor")
-        store.save()
-        return
-
-    if data.startswith("my_dt2_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        await _edit_pm(ctx, uid, mid, "💉 چه کسی را سیو می‌دهی؟",
-                       _kb_night_seats(_my_doc_targets(g, me), g, "my_dt2_",
-                                       selected=s, confirm_cb="my_dt2_ok"))
-        return
-
-    # ── بادیگارد ──
-    if data == "my_bg_no":
-        await _close_pm(ctx, uid, mid, "🚫 امشب محافظت نکردی.")
-        await _night_report(ctx, g, "🛡 بادیگارد → اکت نزد")
-        g.night_done.add("bodyguard")
-        store.save()
-        return
-
-    if data == "my_bg_yes":
-        await _edit_pm(ctx, uid, mid, "🛡 از چه کسی محافظت می‌کنی؟",
-                       _kb_night_seats(_my_bg_targets(g, me), g, "my_bgt_",
-                                       confirm_cb="my_bgt_ok"))
-        return
-
-    if data == "my_bgt_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        if s == me:
-            g.my_bg_self_used = True
-        g.my_bg_save = s
-        g.night_sel.pop(uid, None)
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"🛡 محافظت ثبت شد: {s}. {_tn}")
-        await _night_report(ctx, g, f"🛡 بادیگارد → محافظت از <b>{s}. {escape(_tn, quote=False)}</b>")
-        g.night_done.add("bodyguard")
-        store.save()
-        return
-
-    if data.startswith("my_bgt_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        await _edit_pm(ctx, uid, mid, "🛡 از چه کسی محافظت می‌کنی؟",
-                       _kb_night_seats(_my_bg_targets(g, me), g, "my_bgt_",
-                                       selected=s, confirm_cb="my_bgt_ok"))
-        return
-
-    # ── کاراگاه ──
-    if data == "my_dt_no":
-        await _close_pm(ctx, uid, mid, "🚫 امشب استعلام نگرفتی.")
-        await _night_report(ctx, g, "🔎 کاراگاه → استعلام نگرفت")
-        g.night_done.add("detective")
-        store.save()
-        return
-
-    if data == "my_dt_yes":
-        targets = [s for s in _alive_seats(g) if s != me]
-        await _edit_pm(ctx, uid, mid, "🔎 از چه کسی استعلام می‌گیری؟",
-                       _kb_night_seats(targets, g, "my_dtt_", confirm_cb="my_dtt_ok"))
-        return
-
-    if data == "my_dtt_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_sel.pop(uid, None)
-        pos = _my_detective_positive(g, s)
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid,
-                        f"🔎 {s}. {_tn} → " + ("مثبت ✅" if pos else "منفی ❌"))
-        await _night_report(ctx, g, f"🔎 کاراگاه → {s}. {escape(_tn, quote=False)}: "
-                            + ("مثبت" if pos else "منفی"))
-        g.night_done.add("detective")
-        store.save()
-        return
-
-    if data.startswith("my_dtt_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g) if x != me]
-        await _edit_pm(ctx, uid, mid, "🔎 از چه کسی استعلام می‌گیری؟",
-                       _kb_night_seats(targets, g, "my_dtt_", selected=s, confirm_cb="my_dtt_ok"))
-        return
-
-    # ── اسنایپر ──
-    if data == "my_sn_no":
-        await _close_pm(ctx, uid, mid, "🚫 امشب شلیک نکردی.")
-        await _night_report(ctx, g, "🎯 اسنایپر → شلیک نکرد")
-        g.night_done.add("sniper")
-        store.save()
-        return
-
-    if data == "my_sn_yes":
-        targets = [s for s in _alive_seats(g) if s != me]
-        await _edit_pm(ctx, uid, mid, "🎯 به چه کسی شلیک می‌کنی؟",
-                       _kb_night_seats(targets, g, "my_snt_", confirm_cb="my_snt_ok"))
-        return
-
-    if data == "my_snt_ok":
-        s = g.night_sel.get(uid)
-        if not s:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.my_sniper_target = s
-        g.my_sniper_shots = int(getattr(g, "my_sniper_shots", 0) or 0) + 1
-        g.night_sel.pop(uid, None)
-        _tn = g.seats[s][1]
-        await _close_pm(ctx, uid, mid, f"🎯 شلیک ثبت شد: {s}. {_tn}")
-        await _night_report(ctx, g, f"🎯 اسنایپر → شلیک به <b>{s}. {escape(_tn, quote=False)}</b> "
-                            f"(تیرِ {g.my_sniper_shots} از ۲)")
-        g.night_done.add("sniper")
-        store.save()
-        return
-
-    if data.startswith("my_snt_"):
-        s = int(data.rsplit("_", 1)[1])
-        g.night_sel[uid] = s
-        store.save()
-        targets = [x for x in _alive_seats(g) if x != me]
-        await _edit_pm(ctx, uid, mid, "🎯 به چه کسی شلیک می‌کنی؟",
-                       _kb_night_seats(targets, g, "my_snt_", selected=s, confirm_cb="my_snt_ok"))
-        return
-
-
-# ── 💣 ترورِ روز ────────────────────────────────────────────────
-async def _my_terror_start(ctx, chat_id, g, seat):
-    """💣 تروریست در روز «ترور» یا 💣 نوشت → سؤال کفِ گروه."""
-    g.my_terror_asking = True
-    store.save()
-    await ctx.bot.send_message(
-        chat_id,
-        f"💣 <b>ترور!</b>\n{seat}. {escape(g.seats[seat][1], quote=False)} "
-        "چه کسی را با خودش می‌برد؟ فقط عدد بنویس.",
-        parse_mode="HTML")
-
-
-async def _my_terror_apply(ctx, chat_id, g, seat, target):
-    """💣 اجرای ترور — همان لحظه در روز، با اعلامِ عمومی."""
-    g.my_terror_asking = False
-    g.my_terror_used = True
-    dead = {seat}
-    lines = [f"💣 <b>{seat}. {escape(g.seats[seat][1], quote=False)}</b> خودش را منفجر کرد."]
-    if _my_role_is(g, target, _R_MY_SIMPLE):
-        lines.append(f"🤷 شهرِ ساده بود — دست خالی می‌روی. "
-                     f"{target}. {escape(g.seats[target][1], quote=False)} در بازی می‌ماند.")
-    else:
-        dead.add(target)
-        lines.append(f"🕊 خداحافظی می‌کنیم با <b>{target}. "
-                     f"{escape(g.seats[target][1], quote=False)}</b> — وصیت ندارد.")
-    for s in dead:
-        g.striked.add(s)
-    store.save()
-    await ctx.bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML")
-    await _night_report(ctx, g, f"💣 ترور: {seat} → {target} | خارج‌شده‌ها: {sorted(dead)}")
-    try:
-        await publish_seating(ctx, chat_id, g, mode=CTRL)
-    except Exception:
-        pass
-    await _check_auto_end(ctx, chat_id, g)
-
-
-# ═════════════════════════════════════════════════════════════
-#  موتور شبِ خودکار — سناریو «شاهنامه»
-#  شب ۱ : کاوه → تیمِ اهریمن → افراسیاب → سیمرغ → صاحبانِ پر →
-#          رستم → جاماسب → آرش
-#  شب ۲ : حدسِ افراسیاب → تصمیمِ رستم (سایه) → اهریمن → سیمرغ →
-#          صاحبانِ پر → جاماسب
-#  شب ۳+: اهریمن → سیمرغ → صاحبانِ پر → جاماسب
-# ═════════════════════════════════════════════════════════════
-SHAHNAME_KEY = "شاهنامه"
-_R_ZAHHAK   = _nz("ضحاک")
-_R_BOOF     = _nz("بوف")
-_R_AFRASIAB = _nz("افراسیاب")
-_R_SIMORGH  = _nz("سیمرغ")
-_R_JAMASB   = _nz("جاماسب")
-_R_ROSTAM   = _nz("رستم")
-_R_KAVEH    = _nz("کاوه")      # «کاوه آهنگر»
-_R_ARASH    = _nz("آرش")       # «آرش کمانگیر»
-_SH_DARK    = (_R_ZAHHAK, _R_BOOF, _R_AFRASIAB)
-
-
-def _is_shahname_scenario(g) -> bool:
-    return bool(getattr(g, "scenario", None)) and (_nz(SHAHNAME_KEY) in _nz(g.scenario.name))
-
-
-def _sh_dark_role_norms(g):
-    """نامِ نقش‌های تیمِ اهریمن، همان‌طور که در خودِ سناریو نوشته شده‌اند."""
-    out = set()
-    for rname in ((g.scenario.roles.keys() if getattr(g, "scenario", None) else []) or []):
-        n = _nz(rname)
-        if any(k in n for k in _SH_DARK):
-            out.add(n)
-    return tuple(out) if out else _SH_DARK
-
-
-def _sh_seat(g, key, alive_only=True):
-    """صندلیِ یک نقشِ شاهنامه (با تطبیقِ جزئی: «کاوه آهنگر»، «آرش کمانگیر»)."""
-    s = _find_seat_by_role(g, key, alive_only=alive_only)
-    if s is not None:
-        return s
-    return _find_seat_role_sub(g, key, alive_only=alive_only)
-
-
-def _sh_burned(g, seat) -> bool:
-    """🔥 اکتِ این صندلی را گاد سوزانده؟ (نقشش هست ولی امشب اکتی ندارد)"""
-    return seat is not None and seat in (getattr(g, "night_burned", set()) or set())
-
-
-def _sh_shadow_positive(g, seat) -> bool:
-    """🌑 استعلامِ سایه: سیمرغ، بوف، افراسیاب مثبت‌اند."""
-    rn = _seat_role_norm(g, seat)
-    return any(k in rn for k in (_R_SIMORGH, _R_BOOF, _R_AFRASIAB))
-
-
-def _sh_blood_positive(g, seat) -> bool:
-    """🩸 استعلامِ خون: رستم و ضحاک مثبت‌اند."""
-    rn = _seat_role_norm(g, seat)
-    return any(k in rn for k in (_R_ROSTAM, _R_ZAHHAK))
-
-
-def _sh_saved_seats(g):
-    """🪶 کسانی که پر سیمرغ روی‌شان نشسته (مصون در برابرِ شات و پر سمی)."""
-    fin = getattr(g, "sh_feather_final", {}) or {}
-    return {s for s, ks in fin.items() if "simorgh" in (ks or [])}
-
-
-def _sh_boof_victim(g):
-    """🪶 دارندهٔ نهاییِ پر سمی می‌میرد — مگر عضوِ اهریمن باشد،
-    یا پر سیمرغ هم دستش باشد (چه مستقیم گرفته باشد چه پاس‌شده)."""
-    fin = getattr(g, "sh_feather_final", {}) or {}
-    saved = _sh_saved_seats(g)
-    for s, ks in fin.items():
-        if "boof" not in (ks or []):
-            continue
-        if s not in g.seats or s in (g.striked or set()):
-            return None
-        if s in _mafia_seats(g):
-            return None
-        if s in saved:
-            return None      # 🪶 پر سیمرغ سیوش می‌کند
-        return s
-    return None
-
-
-def _sh_kaveh_blocks(g) -> bool:
-    """🔨 خشمِ کاوه — فقط شبِ بعد از اینکه کاوه با «شاتِ شب» کشته شود:
-    شاتِ تیمِ اهریمن کشته نمی‌گیرد، فرقی نمی‌کند شات دستِ چه کسی باشد."""
-    return getattr(g, "sh_kaveh_block_night", None) == g.night_number
-
-
-def _sh_final_pair(g):
-    """صندلی‌های زندهٔ رأی‌گیریِ نهایی — اگر دقیقاً دو نفر باشند."""
-    if getattr(g, "vote_stage", None) != "final":
-        return None
-    seats = [s for s in (getattr(g, "defense_seats", []) or [])
-             if s in g.seats and s not in (g.striked or set())]
-    return seats if len(seats) == 2 else None
-
-
-def _sh_duel_locked(g, voter_seat, target_seat) -> bool:
-    """⚔️ فقط وقتی دقیقاً «دو نفر» در رأی‌گیریِ نهایی‌اند، آن دو به هم رأی نمی‌دهند.
-    با سه نفر یا بیشتر همه به همه می‌توانند رأی بدهند.
-    ⚠️ اسمش شاهنامه‌ای مانده ولی قانونِ همهٔ سناریوهاست (به‌جز میتیک)."""
-    pair = _sh_final_pair(g)
-    if not pair:
-        return False
-    return voter_seat != target_seat and voter_seat in pair and target_seat in pair
-
-
-# ─────────────────── 🌙 مراحلِ شب ───────────────────
-async def _sh_start(ctx, chat_id, g):
-    if g.night_number == 1:
-        g.night_done.add("shadow")      # شبِ اول سایه‌ای برای تعیین‌تکلیف نیست
-        store.save()
-        await _sh_open_kaveh(ctx, chat_id, g)
-        return
-    g.night_done.add("kaveh")           # سپرِ کاوه فقط شبِ اول داده می‌شود
-    store.save()
-    await _sh_open_shadow_phase(ctx, chat_id, g)
-
-
-async def _sh_open_kaveh(ctx, chat_id, g):
-    kv = _sh_seat(g, _R_KAVEH)
-    if kv is None or getattr(g, "sh_kaveh_used", False) or _sh_burned(g, kv):
-        g.night_done.add("kaveh")
-        store.save()
-        await _sh_check_open_mafia(ctx, chat_id, g)
-        return
-    kuid = g.seats[kv][0]
-    m = await _safe_pm(ctx, kuid, "🛡 سپرت را به چه کسی می‌دهی؟",
-                       _kb_night_seats(_sh_sel_targets(g, "sh_kv_", kv), g, "sh_kv_",
-                                       selected=g.night_sel.get(kuid), confirm_cb="sh_kv_confirm"))
-    if m:
-        g.night_pm_msgs[kuid] = m.message_id
-    store.save()
-
-
-async def _sh_open_shadow_phase(ctx, chat_id, g):
-    """🌑 شب‌های ۲+: اول حدسِ افراسیاب، بعد تصمیمِ رستم دربارهٔ سایه.
-
-    اگر هدفِ سایه همان شب کشته شده باشد، سایه به رستم برنمی‌گردد؛ افراسیاب همچنان
-    حدسش را می‌زند، ولی رستم رأیی ندارد چون شخصی نمانده."""
-    tgt = getattr(g, "sh_shadow_seat", None)
-    pending = (tgt is not None and tgt in g.seats
-               and not getattr(g, "sh_shadow_resolved", False)
-               and (getattr(g, "sh_shadow_night", None) or 0) < g.night_number)
-    if not pending:
-        g.night_done.add("shadow")
-        store.save()
-        await _sh_check_open_mafia(ctx, chat_id, g)
-        return
-    afr = _sh_seat(g, _R_AFRASIAB)
-    if afr is not None and not getattr(g, "sh_afr_guessed", False):
-        auid = g.seats[afr][0]
-        m = await _safe_pm(ctx, auid, "🕯 به‌نظرت رستم کیست؟",
-                           _kb_night_seats(_sh_sel_targets(g, "sh_afg_", afr), g, "sh_afg_",
-                                           selected=g.night_sel.get(auid),
-                                           confirm_cb="sh_afg_confirm"))
-        if m:
-            g.night_pm_msgs[auid] = m.message_id
-            store.save()
-            return
-    await _sh_ask_rostam(ctx, chat_id, g)
-
-
-async def _sh_ask_rostam(ctx, chat_id, g):
-    tgt = getattr(g, "sh_shadow_seat", None)
-    # 🌑 هدفِ سایه دیگر در بازی نیست → رستم تصمیمی ندارد (سایه هم برنمی‌گردد)
-    if tgt is None or tgt not in g.seats or tgt in (g.striked or set()):
-        g.sh_shadow_resolved = True
-        g.night_done.add("shadow")
-        store.save()
-        await _night_report(ctx, g, "🌑 هدفِ سایه در بازی نیست — رستم رأیی ندارد.")
-        await _sh_check_open_mafia(ctx, chat_id, g)
-        return
-    ros = _sh_seat(g, _R_ROSTAM)
-    if ros is not None:
-        kb = InlineKeyboardMarkup([[
-            InlineKeyboardButton("✅ بله، بماند", callback_data="sh_shd_keep"),
-            InlineKeyboardButton("🚫 خیر", callback_data="sh_shd_kill"),
-        ]])
-        m = await _safe_pm(ctx, g.seats[ros][0],
-                           f"🌑 سایه‌ات روی {tgt}. {g.seats[tgt][1]} است.\n"
-                           f"می‌خواهی زنده بماند؟", kb)
-        if m:
-            g.night_pm_msgs[g.seats[ros][0]] = m.message_id
-            store.save()
-            return
-    # ⏳ رستم در بازی نیست (یا پیویش بسته است) → مکث تا کسی از سرعتِ کار چیزی نفهمد
-    asyncio.create_task(_sh_shadow_no_rostam(ctx, chat_id, g))
-
-
-async def _sh_shadow_no_rostam(ctx, chat_id, g, delay=30):
-    try:
-        await asyncio.sleep(delay)
-        if g.phase in ("idle", "ended") or getattr(g, "sh_shadow_resolved", False):
-            return
-        await _sh_apply_shadow(ctx, chat_id, g, keep=True, note="رستم اکتی نداد")
-    except Exception as e:
-        print("⚠️ sh shadow wait err:", e)
-
-
-async def _sh_apply_shadow(ctx, chat_id, g, keep: bool, note=""):
-    if getattr(g, "sh_shadow_resolved", False):
-        return
-    g.sh_shadow_resolved = True
-    store.save()
-    tgt = getattr(g, "sh_shadow_seat", None)
-    killed = False
-    if tgt in g.seats and tgt not in (g.striked or set()):
-        rn = _seat_role_norm(g, tgt)
-        immune = (_R_ZAHHAK in rn) or getattr(g, "sh_afr_correct", False)
-        if (not keep) and not immune:
-            g.striked.add(tgt)
-            killed = True
-        store.save()
-        nm = escape(g.seats[tgt][1], quote=False)
-        txt = (f"🌑 <b>نتیجهٔ سایه</b>: {tgt}. {nm} از بازی خارج شد."
-               if killed else f"🌑 <b>نتیجهٔ سایه</b>: {tgt}. {nm} کشته نشد.")
-        for s in sorted(g.seats):
-            try:
-                await ctx.bot.send_message(g.seats[s][0], txt, parse_mode="HTML")
-            except Exception:
-                pass
-        why = []
-        if note:
-            why.append(note)
-        if (not keep) and not killed:
-            why.append("مصون بود" if _R_ZAHHAK in rn else "حدسِ افراسیاب درست بود")
-        await _night_report(
-            ctx, g, f"🌑 سایهٔ رستم روی {tgt}. {nm} — " +
-            ("خارج شد" if killed else "ماند") + (f" ({'، '.join(why)})" if why else ""))
-        if killed:
-            try:
-                await publish_seating(ctx, chat_id, g, mode=CTRL)
-            except Exception:
-                pass
-    g.night_done.add("shadow")
-    store.save()
-    if killed:
-        await _check_auto_end(ctx, chat_id, g)
-    await _sh_check_open_mafia(ctx, chat_id, g)
-
-
-async def _sh_check_open_mafia(ctx, chat_id, g):
-    if "sh_mafia_opened" in (g.night_done or set()):
-        return
-    if not ({"kaveh", "shadow"} <= (g.night_done or set())):
-        return
-    g.night_done.add("sh_mafia_opened")
-    store.save()
-    zah  = _sh_seat(g, _R_ZAHHAK)
-    boof = _sh_seat(g, _R_BOOF)
-    afr  = _sh_seat(g, _R_AFRASIAB)
-    # ترتیبِ شات: ضحاک → بوف → افراسیاب (سوخته‌ها رد می‌شوند)
-    decider = next((x for x in (zah, boof, afr) if x and not _sh_burned(g, x)), None)
-    if not decider:
-        for _s in sorted(_mafia_seats(g, alive_only=True)):
-            if not _sh_burned(g, _s):
-                decider = _s
-                break
-    if not decider:
-        g.night_done.add("mafia")
-        store.save()
-        await _sh_check_open_mid(ctx, chat_id, g)
-        return
-    g.sh_decider_seat = decider
-    duid = g.seats[decider][0]
-    m = await _safe_pm(ctx, duid, f"🌙 شب {g.night_number}\nاکت تیم اهریمن را انتخاب کن:",
-                       _sh_dark_kb(g))
-    if m:
-        g.night_pm_msgs[duid] = m.message_id
-    store.save()
-
-
-def _sh_dark_kb(g):
-    rows = [[InlineKeyboardButton("🔫 شات", callback_data="sh_act_shot")]]
-    boof = _sh_seat(g, _R_BOOF)
-    # 🪶 بوفِ سوخته/مرده گزینه‌ای ندارد، وگرنه شب پشتِ پرامپتِ بی‌جواب گیر می‌کند
-    if boof is not None and not getattr(g, "sh_boof_used", False) and not _sh_burned(g, boof):
-        rows.append([InlineKeyboardButton("🪶 پر بوف", callback_data="sh_act_boof")])
-    return InlineKeyboardMarkup(rows)
-
-
-async def _sh_check_open_mid(ctx, chat_id, g):
-    """🛡 سپرِ افراسیاب (شبِ اول) + 🪶 سیمرغ — بعد از ثبتِ اکتِ اهریمن."""
-    if "sh_mid_opened" in (g.night_done or set()):
-        return
-    if "mafia" not in (g.night_done or set()):
-        return
-    g.night_done.add("sh_mid_opened")
-    store.save()
-    afr = _sh_seat(g, _R_AFRASIAB)
-    if (g.night_number == 1 and afr is not None
-            and not getattr(g, "sh_afr_used", False) and not _sh_burned(g, afr)):
-        auid = g.seats[afr][0]
-        m = await _safe_pm(ctx, auid, "🛡 سپرت را به چه کسی می‌دهی؟",
-                           _kb_night_seats(_sh_sel_targets(g, "sh_afs_", afr), g, "sh_afs_",
-                                           selected=g.night_sel.get(auid),
-                                           confirm_cb="sh_afs_confirm"))
-        if m:
-            g.night_pm_msgs[auid] = m.message_id
-    else:
-        g.night_done.add("afrasiab")
-    store.save()
-    await _sh_open_simorgh(ctx, chat_id, g)
-
-
-async def _sh_open_simorgh(ctx, chat_id, g):
-    sim = _sh_seat(g, _R_SIMORGH)
-    left = int(getattr(g, "sh_simorgh_left", 0) or 0)
-    if sim is None or left <= 0 or _sh_burned(g, sim):
-        g.night_done.add("simorgh")
-        store.save()
-        await _sh_check_open_feathers(ctx, chat_id, g)
-        return
-    rows = [[InlineKeyboardButton("۱ پر", callback_data="sh_sim_1")]]
-    if left >= 2:
-        rows.append([InlineKeyboardButton("۲ پر", callback_data="sh_sim_2")])
-    suid = g.seats[sim][0]
-    m = await _safe_pm(ctx, suid, f"🪶 امشب چند پر استفاده می‌کنی؟ (باقی‌مانده: {left})",
-                       InlineKeyboardMarkup(rows))
-    if m:
-        g.night_pm_msgs[suid] = m.message_id
-    store.save()
-
-
-def _sh_sim_targets(g, sim):
-    """🪶 سیمرغ فقط یک‌بار در کلِ بازی می‌تواند به خودش پر بدهد."""
-    out = []
-    for s in _alive_seats(g):
-        if s == sim and getattr(g, "sh_simorgh_self_used", False):
-            continue
-        out.append(s)
-    return out
-
-
-def _sh_sim_text(n):
-    return "🪶 یک نفر را انتخاب کن و تأیید بزن." if n == 1 else "🪶 دو نفر را انتخاب کن و تأیید بزن."
-
-
-async def _sh_check_open_feathers(ctx, chat_id, g):
-    """🪶 پرسش از صاحبانِ پر — پیامِ هر دو نوعِ پر دقیقاً یکسان است."""
-    if "sh_feath_opened" in (g.night_done or set()):
-        return
-    if not ({"mafia", "simorgh"} <= (g.night_done or set())):
-        return
-    g.night_done.add("sh_feath_opened")
-    owners = {}
-    bh = getattr(g, "sh_boof_holder", None)
-    if bh and bh in g.seats and bh not in (g.striked or set()):
-        owners.setdefault(bh, []).append("boof")
-    for s in (getattr(g, "sh_sim_holders", []) or []):
-        if s in g.seats and s not in (g.striked or set()):
-            owners.setdefault(s, []).append("simorgh")
-    # 🪶 فقط همین‌جا (لحظهٔ توزیع) پر سیمرغ بر پر بوف ارجحیت دارد:
-    #    اگر هر دو به یک نفر رسیده باشد، پر بوف می‌سوزد و او فقط پر سیمرغ دارد.
-    for s, ks in owners.items():
-        if "boof" in ks and "simorgh" in ks:
-            ks.remove("boof")
-            await _night_report(
-                ctx, g,
-                f"🪶 هر دو پر به {s}. {escape(g.seats[s][1], quote=False)} رسید — "
-                f"پر سیمرغ ماند و پر بوف سوخت.")
-    owners = {s: k for s, k in owners.items() if not _sh_burned(g, s)}
-    g.sh_feather_own = {s: list(k) for s, k in owners.items()}
-    g.sh_feather_wait = set(owners.keys())
-    store.save()
-    if not owners:
-        g.night_done.add("feathers")
-        store.save()
-        await _sh_check_open_late(ctx, chat_id, g)
-        return
-    kb = InlineKeyboardMarkup([[
-        InlineKeyboardButton("🙋 خودم", callback_data="sh_fe_self"),
-        InlineKeyboardButton("👤 شخص دیگر", callback_data="sh_fe_other"),
-    ]])
-    for s in sorted(owners):
-        uid = g.seats[s][0]
-        m = await _safe_pm(ctx, uid,
-                           "🪶 شما پر دارید.\nبرای خودت استفاده می‌کنی یا به شخص دیگری می‌دهی؟", kb)
-        if m:
-            g.night_pm_msgs[uid] = m.message_id
-    store.save()
-
-
-async def _sh_feather_resolve(ctx, chat_id, g, holder, target):
-    kinds = list((getattr(g, "sh_feather_own", {}) or {}).get(holder, []))
-    fin = dict(getattr(g, "sh_feather_final", {}) or {})
-    fin[target] = sorted(set(fin.get(target, [])) | set(kinds))
-    g.sh_feather_final = fin
-    w = set(getattr(g, "sh_feather_wait", set()) or set())
-    w.discard(holder)
-    g.sh_feather_wait = w
-    store.save()
-    lbl = "خودش" if holder == target else f"{target}. {g.seats[target][1]}"
-    await _night_report(
-        ctx, g,
-        f"🪶 پرِ {holder}. {escape(g.seats[holder][1], quote=False)} → "
-        f"{escape(lbl, quote=False)} "
-        f"({'/'.join('سیمرغ' if k == 'simorgh' else 'بوف' for k in kinds)})")
-    if not w:
-        g.night_done.add("feathers")
-        store.save()
-        await _sh_check_open_late(ctx, chat_id, g)
-
-
-async def _sh_check_open_late(ctx, chat_id, g):
-    """🌑 رستم + 🔎 جاماسب + 🏹 آرش (آرش فقط شبِ اول)."""
-    if "sh_late_opened" in (g.night_done or set()):
-        return
-    if "feathers" not in (g.night_done or set()):
-        return
-    g.night_done.add("sh_late_opened")
-    store.save()
-
-    ros = _sh_seat(g, _R_ROSTAM)
-    if ros is not None and not getattr(g, "sh_shadow_used", False) and not _sh_burned(g, ros):
-        ruid = g.seats[ros][0]
-        kb = _kb_night_seats(_sh_sel_targets(g, "sh_ros_", ros), g, "sh_ros_",
-                             selected=g.night_sel.get(ruid), confirm_cb="sh_ros_confirm")
-        rows = list(kb.inline_keyboard) + [
-            [InlineKeyboardButton("⏭ امشب سایه نمی‌گذارم", callback_data="sh_ros_skip")]]
-        m = await _safe_pm(ctx, ruid, "🌑 روی چه کسی سایه می‌گذاری؟", InlineKeyboardMarkup(rows))
-        if m:
-            g.night_pm_msgs[ruid] = m.message_id
-    else:
-        g.night_done.add("rostam")
-
-    jam = _sh_seat(g, _R_JAMASB)
-    if jam is not None and not _sh_burned(g, jam):
-        juid = g.seats[jam][0]
-        if not getattr(g, "sh_blood_used", False):
-            kb = InlineKeyboardMarkup([[
-                InlineKeyboardButton("🌑 استعلام سایه", callback_data="sh_jam_shadow"),
-                InlineKeyboardButton("🩸 استعلام خون", callback_data="sh_jam_blood"),
-            ]])
-            m = await _safe_pm(ctx, juid, "🔎 کدام استعلام را می‌گیری؟", kb)
-        else:
-            m = await _safe_pm(ctx, juid, "🌑 استعلام سایهٔ چه کسی را می‌گیری؟",
-                               _kb_night_seats(_sh_sel_targets(g, "sh_jsh_", jam), g, "sh_jsh_"))
-        if m:
-            g.night_pm_msgs[juid] = m.message_id
-    else:
-        g.night_done.add("jamasb")
-
-    ar = _sh_seat(g, _R_ARASH)
-    if (g.night_number == 1 and ar is not None
-            and not getattr(g, "sh_arash_used", False) and not _sh_burned(g, ar)):
-        auid = g.seats[ar][0]
-        m = await _safe_pm(ctx, auid, "🏹 تیر و کمانت را به چه کسی می‌دهی؟",
-                           _kb_night_seats(_sh_sel_targets(g, "sh_ar_", ar), g, "sh_ar_",
-                                           selected=g.night_sel.get(auid),
-                                           confirm_cb="sh_ar_confirm"))
-        if m:
-            g.night_pm_msgs[auid] = m.message_id
-    else:
-        g.night_done.add("arash")
-    store.save()
-    await _maybe_notify_god_done(ctx, g)
-
-
-# ─────────────────── 🎯 لیستِ هدف‌ها ───────────────────
-_SH_SEL = {
-    "sh_kv_":  ("🛡 سپرت را به چه کسی می‌دهی؟",        "sh_kv_confirm",  None),
-    "sh_afs_": ("🛡 سپرت را به چه کسی می‌دهی؟",        "sh_afs_confirm", None),
-    "sh_afg_": ("🕯 به‌نظرت رستم کیست؟",               "sh_afg_confirm", None),
-    "sh_bf_":  ("🪶 پر سمی را به چه کسی می‌دهی؟",      "sh_bf_confirm",  None),
-    "sh_st_":  ("🔫 هدف شلیک را انتخاب کن:",           "sh_st_confirm",  "sh_act_back"),
-    "sh_ros_": ("🌑 روی چه کسی سایه می‌گذاری؟",        "sh_ros_confirm", None),
-    "sh_ar_":  ("🏹 تیر و کمانت را به چه کسی می‌دهی؟", "sh_ar_confirm",  None),
-    "sh_fo_":  ("🪶 پر را به چه کسی می‌دهی؟",          "sh_fo_confirm",  None),
-}
-
-
-def _sh_sel_targets(g, prefix, me):
-    if prefix == "sh_bf_":
-        # 🪶 بوف پرِ سمی را به یک روشنایی می‌دهد
-        out = [s for s in _alive_seats(g) if s != me and s not in _mafia_seats(g)]
-        return out or [s for s in _alive_seats(g) if s != me]
-    if prefix in ("sh_st_", "sh_ar_"):
-        return list(_alive_seats(g))
-    return [s for s in _alive_seats(g) if s != me]
-
-
-async def handle_shahname_callback(update, ctx):
-    q = update.callback_query
-    data = q.data
-    uid = _q_uid(q)   # 🎛 اکتِ دستی
-    g, chat_id = _find_active_night_game(uid, q)
-    if g is None:
-        g, chat_id = _sh_find_game(uid)
-    if g is None:
-        await safe_q_answer(q, "بازی فعالی یافت نشد.", show_alert=True)
-        return
-    await safe_q_answer(q)
-    mid = q.message.message_id if q.message else None
-    me = _seat_of_uid(g, uid)
-
-    # ── 🏛 انجمن (روز — بیرون از اکت‌گیری) ──
-    if data.startswith("sh_cd_"):
-        # 🔒 نظرِ ثبت‌شده قابلِ تغییر نیست (دکمه‌ی کهنه هم کاری نکند)
-        if uid in (getattr(g, "sh_council_votes", {}) or {}):
-            await _close_pm(ctx, uid, mid, "🏛 نظرت قبلاً ثبت شده و قابلِ تغییر نیست.")
-            return
-        # ⏰ بعد از جمع‌بندی دیگر رأی پذیرفته نمی‌شود
-        if getattr(g, "sh_council_done", False):
-            await _close_pm(ctx, uid, mid, "⏰ نظرگیریِ انجمن تمام شده — دیر شد.")
-            return
-
-    if data == "sh_cd_ok":
-        sel = sorted(set((getattr(g, "sh_council_sel", {}) or {}).get(uid, []) or []))
-        cv = dict(getattr(g, "sh_council_votes", {}) or {})
-        cv[uid] = sel
-        g.sh_council_votes = cv
-        store.save()
-        await _close_pm(ctx, uid, mid, "✅ نظرت ثبت شد.")
-        rn = (g.assigned_roles or {}).get(me, "—")
-        parts = [("موافقِ " if i in sel else "مخالفِ ") + _sh_duel_label(g, d)
-                 for i, d in enumerate(getattr(g, "sh_duels", []) or [])]
-        _miss = _sh_council_missing(g)
-        _left = ("— همه جواب دادند ✅" if not _miss else
-                 "— مانده: " + "، ".join(f"{x}. {escape(g.seats[x][1], quote=False)}"
-                                          for x in _miss))
-        await _night_report(
-            ctx, g,
-            f"🏛 {escape(str(rn), quote=False)} ({me}. {escape(g.seats[me][1], quote=False)}): "
-            + "، ".join(parts) + f"\n{_left}")
-        return
-
-    if data.startswith("sh_cd_"):
-        try:
-            i = int(data.rsplit("_", 1)[1])
-        except Exception:
-            return
-        sel = set((getattr(g, "sh_council_sel", {}) or {}).get(uid, []) or [])
-        sel.discard(i) if i in sel else sel.add(i)
-        d = dict(getattr(g, "sh_council_sel", {}) or {})
-        d[uid] = sorted(sel)
-        g.sh_council_sel = d
-        store.save()
-        await _edit_pm(ctx, uid, mid, _SH_COUNCIL_Q, _sh_council_kb(g, sel))
-        return
-
-    # ── 🌑 تصمیمِ رستم دربارهٔ سایه ──
-    if data in ("sh_shd_keep", "sh_shd_kill"):
-        await _close_pm(ctx, uid, mid, "✅ تصمیمت ثبت شد.")
-        await _sh_apply_shadow(ctx, chat_id, g, keep=(data == "sh_shd_keep"))
-        return
-
-    # ── 🩸 اکتِ تیمِ اهریمن ──
-    if data == "sh_act_back":
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _edit_pm(ctx, uid, mid,
-                       f"🌙 شب {g.night_number}\nاکت تیم اهریمن را انتخاب کن:", _sh_dark_kb(g))
-        return
-
-    if data == "sh_act_shot":
-        await _edit_pm(ctx, uid, mid, "🔫 هدف شلیک را انتخاب کن:",
-                       _kb_add_back(_kb_night_seats(_sh_sel_targets(g, "sh_st_", me), g, "sh_st_",
-                                                    selected=g.night_sel.get(uid),
-                                                    confirm_cb="sh_st_confirm"), "sh_act_back"))
-        return
-
-    if data == "sh_act_boof":
-        boof = _sh_seat(g, _R_BOOF)
-        if boof is None or getattr(g, "sh_boof_used", False):
-            await safe_q_answer(q, "پر سمی در دسترس نیست.", show_alert=True)
-            return
-        g.sh_boof_used = True
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _close_pm(ctx, uid, mid, "🪶 پر سمی انتخاب شد.")
-        buid = g.seats[boof][0]
-        m = await _safe_pm(ctx, buid, "🪶 پر سمی را به چه کسی می‌دهی؟",
-                           _kb_night_seats(_sh_sel_targets(g, "sh_bf_", boof), g, "sh_bf_",
-                                           selected=g.night_sel.get(buid),
-                                           confirm_cb="sh_bf_confirm"))
-        if m:
-            g.night_pm_msgs[buid] = m.message_id
-        store.save()
-        return
-
-    if data == "sh_st_confirm":
-        t = g.night_sel.get(uid)
-        if not t:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_shot_target = t
-        await _room_announce_shot(ctx, g, t)
-        g.night_done.add("mafia")
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _close_pm(ctx, uid, mid, f"🔫 شلیک به {t}. {g.seats[t][1]} ثبت شد.")
-        await _night_report(ctx, g,
-                            f"🔫 شلیکِ تیم اهریمن → {t}. {escape(g.seats[t][1], quote=False)}")
-        await _sh_check_open_mid(ctx, chat_id, g)
-        return
-
-    if data == "sh_bf_confirm":
-        t = g.night_sel.get(uid)
-        if not t:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.sh_boof_holder = t
-        await _room_note(ctx, g, f"🪶 پر بوف به <b>{_room_who(g, t)}</b>")
-        g.night_done.add("mafia")
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _close_pm(ctx, uid, mid, "🪶 پر سمی داده شد.")
-        await _night_report(ctx, g,
-                            f"🪶 پر سمیِ بوف → {t}. {escape(g.seats[t][1], quote=False)}")
-        await _sh_check_open_mid(ctx, chat_id, g)
-        return
-
-    # ── 🛡 سپرها ──
-    if data in ("sh_kv_confirm", "sh_afs_confirm"):
-        t = g.night_sel.get(uid)
-        if not t:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.sh_shields = set(getattr(g, "sh_shields", set()) or set()) | {t}
-        if data == "sh_kv_confirm":
-            g.sh_kaveh_used = True
-            g.night_done.add("kaveh")
-            who = "کاوه"
-        else:
-            g.sh_afr_used = True
-            g.night_done.add("afrasiab")
-            who = "افراسیاب"
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _close_pm(ctx, uid, mid, f"🛡 سپر به {t}. {g.seats[t][1]} داده شد.")
-        await _night_report(ctx, g,
-                            f"🛡 {who} → سپر به {t}. {escape(g.seats[t][1], quote=False)}")
-        # 🤫 به گیرندهٔ سپر چیزی گفته نمی‌شود — تازه وقتی تیر بهش بخورد،
-        #    وسطِ گروه معلوم می‌شود که سپر داشته
-        if data == "sh_kv_confirm":
-            await _sh_check_open_mafia(ctx, chat_id, g)
-        else:
-            await _maybe_notify_god_done(ctx, g)
-        return
-
-    # ── 🕯 حدسِ افراسیاب (بدون هیچ بازخوردی به خودش) ──
-    if data == "sh_afg_confirm":
-        t = g.night_sel.get(uid)
-        if not t:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        ros = _sh_seat(g, _R_ROSTAM, alive_only=False)
-        g.sh_afr_guess = t
-        g.sh_afr_guessed = True
-        g.sh_afr_correct = (ros is not None and ros == t)
-        await _room_note(ctx, g, f"🔗 حدسِ افراسیاب: <b>{_room_who(g, t)}</b> رستم است")
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _close_pm(ctx, uid, mid, "✅ انتخابت ثبت شد.")
-        await _night_report(
-            ctx, g, f"🕯 حدسِ افراسیاب: {t}. {escape(g.seats[t][1], quote=False)} — "
-                    f"{'✅ درست (پیوند بسته شد)' if g.sh_afr_correct else '❌ غلط'}")
-        await _sh_ask_rostam(ctx, chat_id, g)
-        return
-
-    # ── 🪶 سیمرغ ──
-    if data in ("sh_sim_1", "sh_sim_2"):
-        n = 1 if data == "sh_sim_1" else 2
-        g.sh_sim_need = n
-        g.sh_sim_sel = []
-        store.save()
-        await _edit_pm(ctx, uid, mid, _sh_sim_text(n),
-                       _kb_night_seats(_sh_sim_targets(g, me), g, "sh_sm_",
-                                       selected=set(), confirm_cb="sh_sm_confirm"))
-        return
-
-    if data == "sh_sm_confirm":
-        need = int(getattr(g, "sh_sim_need", 1) or 1)
-        sel = list(getattr(g, "sh_sim_sel", []) or [])
-        if len(sel) != need:
-            await safe_q_answer(q, f"باید دقیقاً {need} نفر انتخاب کنی.", show_alert=True)
-            return
-        g.sh_sim_holders = list(sel)
-        if me in sel:
-            g.sh_simorgh_self_used = True
-        g.sh_simorgh_left = max(0, int(getattr(g, "sh_simorgh_left", 0) or 0) - len(sel))
-        g.sh_sim_sel = []
-        g.night_done.add("simorgh")
-        store.save()
-        names = "، ".join(f"{s}. {g.seats[s][1]}" for s in sel)
-        await _close_pm(ctx, uid, mid,
-                        f"🪶 پر به {names} داده شد.\nپرهای باقی‌مانده: {g.sh_simorgh_left}")
-        await _night_report(ctx, g, f"🪶 سیمرغ → {escape(names, quote=False)} "
-                                    f"(باقی‌مانده: {g.sh_simorgh_left})")
-        await _sh_check_open_feathers(ctx, chat_id, g)
-        return
-
-    if data.startswith("sh_sm_"):
-        try:
-            s = int(data.rsplit("_", 1)[1])
-        except Exception:
-            return
-        need = int(getattr(g, "sh_sim_need", 1) or 1)
-        sel = list(getattr(g, "sh_sim_sel", []) or [])
-        if s in sel:
-            sel.remove(s)
-        else:
-            sel.append(s)
-        sel = sel[-need:]
-        g.sh_sim_sel = sel
-        store.save()
-        await _edit_pm(ctx, uid, mid, _sh_sim_text(need),
-                       _kb_night_seats(_sh_sim_targets(g, me), g, "sh_sm_",
-                                       selected=set(sel), confirm_cb="sh_sm_confirm"))
-        return
-
-    # ── 🪶 صاحبانِ پر ──
-    if data == "sh_fe_self":
-        if me is None:
-            await safe_q_answer(q, "این دکمه مالِ خودِ بازیکن است.", show_alert=True)
-            return
-        await _close_pm(ctx, uid, mid, "🪶 پر برای خودت استفاده شد.")
-        await _sh_feather_resolve(ctx, chat_id, g, me, me)
-        return
-
-    if data == "sh_fe_other":
-        await _edit_pm(ctx, uid, mid, "🪶 پر را به چه کسی می‌دهی؟",
-                       _kb_night_seats(_sh_sel_targets(g, "sh_fo_", me), g, "sh_fo_",
-                                       selected=g.night_sel.get(uid), confirm_cb="sh_fo_confirm"))
-        return
-
-    if data == "sh_fo_confirm":
-        t = g.night_sel.get(uid)
-        if not t or me is None:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _close_pm(ctx, uid, mid, f"🪶 پر به {t}. {g.seats[t][1]} داده شد.")
-        await _sh_feather_resolve(ctx, chat_id, g, me, t)
-        return
-
-    # ── 🌑 سایهٔ رستم ──
-    if data == "sh_ros_skip":
-        g.night_done.add("rostam")
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _close_pm(ctx, uid, mid, "⏭ امشب سایه‌ای نگذاشتی.")
-        await _night_report(ctx, g, "🌑 رستم امشب سایه نگذاشت.")
-        await _maybe_notify_god_done(ctx, g)
-        return
-
-    if data == "sh_ros_confirm":
-        t = g.night_sel.get(uid)
-        if not t:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.sh_shadow_seat = t
-        g.sh_shadow_night = g.night_number
-        g.sh_shadow_used = True
-        g.sh_shadow_resolved = False
-        g.sh_shadow_announced = False
-        g.night_done.add("rostam")
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _close_pm(ctx, uid, mid, f"🌑 سایه روی {t}. {g.seats[t][1]} گذاشته شد.")
-        await _night_report(ctx, g, f"🌑 سایهٔ رستم → {t}. {escape(g.seats[t][1], quote=False)}")
-        await _maybe_notify_god_done(ctx, g)
-        return
-
-    # ── 🔎 جاماسب ──
-    if data in ("sh_jam_shadow", "sh_jam_blood"):
-        blood = (data == "sh_jam_blood")
-        if blood:
-            g.sh_blood_used = True     # 🩸 فقط یک‌بار در کلِ بازی
-            store.save()
-        pfx = "sh_jbl_" if blood else "sh_jsh_"
-        await _edit_pm(ctx, uid, mid,
-                       ("🩸 استعلام خونِ چه کسی را می‌گیری؟" if blood
-                        else "🌑 استعلام سایهٔ چه کسی را می‌گیری؟"),
-                       _kb_night_seats(_sh_sel_targets(g, pfx, me), g, pfx))
-        return
-
-    if data.startswith(("sh_jsh_", "sh_jbl_")):
-        try:
-            t = int(data.rsplit("_", 1)[1])
-        except Exception:
-            return
-        blood = data.startswith("sh_jbl_")
-        pos = _sh_blood_positive(g, t) if blood else _sh_shadow_positive(g, t)
-        g.night_done.add("jamasb")
-        store.save()
-        await _close_pm(ctx, uid, mid,
-                        f"{'🩸 خون' if blood else '🌑 سایه'} — {t}. {g.seats[t][1]}: "
-                        + ("مثبت ✅" if pos else "منفی ❌"))
-        await _night_report(
-            ctx, g, f"🔎 جاماسب ({'خون' if blood else 'سایه'}) → "
-                    f"{t}. {escape(g.seats[t][1], quote=False)}: "
-                    f"{'مثبت' if pos else 'منفی'}")
-        await _maybe_notify_god_done(ctx, g)
-        return
 
-    # ── 🏹 آرش ──
-    if data == "sh_ar_confirm":
-        t = g.night_sel.get(uid)
-        if not t:
-            await safe_q_answer(q, "اول یک نفر را انتخاب کن.", show_alert=True)
-            return
-        g.sh_bow_holder = t
-        g.sh_bow_chain = []
-        g.sh_bow_aiming = None
-        g.sh_arash_used = True
-        g.night_done.add("arash")
-        g.night_sel.pop(uid, None)
-        store.save()
-        await _close_pm(ctx, uid, mid, f"🏹 کمان به {t}. {g.seats[t][1]} داده شد.")
-        await _night_report(ctx, g, f"🏹 آرش → کمان به {t}. {escape(g.seats[t][1], quote=False)}")
-        try:
-            await ctx.bot.send_message(
-                g.seats[t][0],
-                "🏹 شما تیر و کمان دارید.\nدر روز با نوشتن «کمان» یا 🏹 در گروه می‌توانی شلیک کنی.")
-        except Exception:
-            pass
-        await _maybe_notify_god_done(ctx, g)
-        return
+# ═══════════════ 🤝 موتورِ معتمدِ کاپو (کاپو — روز ۱) ═══════════════
+# 🧩 توابعِ این موتور در engines/kp.py است و با اولین صدا زدن بار می‌شود؛
+# تا آن موقع این اسم‌ها فقط جانشین‌اند.
+_kp_round_msg = _engine_fn("kp", "_kp_round_msg", coro=True)
+_kp_deng_capture = _engine_fn("kp", "_kp_deng_capture", coro=True)
+_kp_heir_immune = _engine_fn("kp", "_kp_heir_immune")
+_kp_check_open_witch = _engine_fn("kp", "_kp_check_open_witch", coro=True)
+_kp_antidote_pending = _engine_fn("kp", "_kp_antidote_pending")
+_kp_check_heir_inherit = _engine_fn("kp", "_kp_check_heir_inherit", coro=True)
+_kp_open_night = _engine_fn("kp", "_kp_open_night", coro=True)
+_kp_after_vote = _engine_fn("kp", "_kp_after_vote", coro=True)
 
-    # ── انتخابِ صندلی (همهٔ منوهای بالا) ──
-    for _pfx, (_txt, _cfm, _back) in _SH_SEL.items():
-        if data.startswith(_pfx):
-            try:
-                s = int(data.rsplit("_", 1)[1])
-            except Exception:
-                return
-            g.night_sel[uid] = s
-            store.save()
-            kb = _kb_night_seats(_sh_sel_targets(g, _pfx, me), g, _pfx,
-                                 selected=s, confirm_cb=_cfm)
-            if _pfx == "sh_ros_":
-                kb = InlineKeyboardMarkup(
-                    list(kb.inline_keyboard)
-                    + [[InlineKeyboardButton("⏭ امشب سایه نمی‌گذارم", callback_data="sh_ros_skip")]])
-            if _back:
-                kb = _kb_add_back(kb, _back)
-            await _edit_pm(ctx, uid, mid, _txt, kb)
-            return
 
+callback_route('kpe_', 'kpc_', 'kpg_', 'kpd_', 'kpf_')(_engine_fn("kp", "handle_kapu_trust_callback", coro=True))
 
-# ─────────────────── 💀 محاسبهٔ مرگِ شب ───────────────────
-async def _resolve_shahname(ctx, chat_id, g):
-    dead, reasons = set(), {}
-    saved = _sh_saved_seats(g)
-    blocked = _sh_kaveh_blocks(g)
-    st = g.night_shot_target
-    if st and st in g.seats:
-        if blocked:
-            await _night_report(ctx, g, "🔨 خشمِ کاوه: شاتِ امشبِ تیم اهریمن کشته نگرفت.")
-        elif st in saved:
-            pass                       # 🪶 پر سیمرغ
-        else:
-            dead.add(st)
-            reasons[st] = "شلیک تیم اهریمن"
-            # 🔨 خشمِ کاوه فقط با «شات‌شدنِ شب» فعال می‌شود —
-            #    رأیِ روز و کیک این اثر را ندارند.
-            if _sh_seat(g, _R_KAVEH, alive_only=False) == st:
-                g.sh_kaveh_out = True
-                g.sh_kaveh_block_night = (g.night_number or 0) + 1
-                store.save()
-                await _night_report(
-                    ctx, g, "🔨 کاوه با شاتِ شب رفت — شبِ بعد شاتِ اهریمن کشته نمی‌گیرد.")
-    bv = _sh_boof_victim(g)
-    if bv:
-        dead.add(bv)
-        reasons[bv] = "پر سمی بوف"
-    _add_night_kick(g, dead, reasons)
-    await _apply_deaths(ctx, chat_id, g, dead, reasons)
 
-    # 🌑 اعلامِ سایه در روز (بدون لو رفتنِ خودِ رستم)
-    await _sh_announce_shadow(ctx, chat_id, g)
-
-    # 🏹 با رفتنِ دارندهٔ کمان، کمان هم از بین می‌رود
-    if getattr(g, "sh_bow_holder", None) and g.sh_bow_holder in (g.striked or set()):
-        g.sh_bow_holder = None
-        g.sh_bow_aiming = None
-        g.sh_bow_pending = None
-        g.sh_bow_changed = False
-        g.sh_bow_btn_mid = None
-        g.sh_bow_chain = []
-        store.save()
-        await _night_report(ctx, g, "🏹 دارندهٔ کمان از بازی خارج شد — کمان از بین رفت.")
-
-
-async def _sh_announce_shadow(ctx, chat_id, g):
-    tgt = getattr(g, "sh_shadow_seat", None)
-    if not tgt or getattr(g, "sh_shadow_announced", False):
-        return
-    if (getattr(g, "sh_shadow_night", None) or 0) != g.night_number:
-        return
-    if tgt not in g.seats:
-        return
-    nm = escape(g.seats[tgt][1], quote=False)
-    if tgt in (g.striked or set()):
-        # 🌑 هدف همان شب رفت → سایه به رستم برمی‌گردد و در گروه هیچ اعلامی نمی‌شود
-        g.sh_shadow_seat = None
-        g.sh_shadow_night = None
-        g.sh_shadow_used = False
-        g.sh_shadow_resolved = False
-        g.sh_shadow_announced = False
-        store.save()
-        await _night_report(
-            ctx, g,
-            f"🌑 هدفِ سایه ({tgt}. {nm}) همان شب از بازی خارج شد — "
-            f"سایه به رستم برگشت و چیزی در گروه اعلام نشد.")
-        return
-    g.sh_shadow_announced = True
-    store.save()
-    await ctx.bot.send_message(
-        chat_id, f"🌑 <b>سایهٔ رستم روی {tgt}. {nm} است.</b>", parse_mode="HTML")
+# ═══════════════ پایانِ موتورِ کاپو ═══════════════
 
 
-async def _sh_check_link(ctx, chat_id, g):
-    """🔗 اگر افراسیاب رستم را درست بسته باشد، با خروجِ افراسیاب رستم هم می‌رود (جز کیک)."""
-    if not getattr(g, "sh_afr_correct", False) or getattr(g, "sh_link_done", False):
-        return
-    afr = _sh_seat(g, _R_AFRASIAB, alive_only=False)
-    ros = _sh_seat(g, _R_ROSTAM, alive_only=False)
-    if afr is None or ros is None:
-        return
-    if afr not in (g.striked or set()):
-        return
-    g.sh_link_done = True
-    store.save()
-    if afr in (getattr(g, "score_kicked", set()) or set()):
-        await _night_report(ctx, g, "🔗 افراسیاب کیک شد — رستم با او خارج نمی‌شود.")
-        return
-    if ros in (g.striked or set()):
-        return
-    g.striked.add(ros)
-    store.save()
-    try:
-        await ctx.bot.send_message(
-            chat_id,
-            f"🔗 با رفتنِ افراسیاب، <b>{ros}. {escape(g.seats[ros][1], quote=False)}</b> "
-            f"هم از بازی خارج شد.", parse_mode="HTML")
-    except Exception:
-        pass
-    await _night_report(ctx, g, f"🔗 پیوندِ افراسیاب–رستم: {ros} خط خورد.")
-    try:
-        await publish_seating(ctx, chat_id, g, mode=CTRL)
-    except Exception:
-        pass
+callback_route('tk_', after=_after_night_act)(_engine_fn("tk", "handle_takavar_callback", coro=True))
 
 
-# ─────────────────── 🏹 کمانِ آرش (روز) ───────────────────
-def _sh_bow_shooter(g):
-    ch = list(getattr(g, "sh_bow_chain", []) or [])
-    return ch[-1] if ch else getattr(g, "sh_bow_holder", None)
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «کاپو» (مرحله ۱: هسته)
+#  ترتیب: دن (شات/یاکوزایی/جلادی) → جلاد → جادوگر → شهروندان
+# ═════════════════════════════════════════════════════════════
+KAPU_KEY       = "کاپو"
+_R_EXECUTIONER = _nz("جلاد")
+_R_WITCH       = _nz("جادوگر")
+_R_SUSPECT     = _nz("مظنون")
+_R_ATTAR       = _nz("عطار")
+_R_ARMORER     = _nz("زره‌ساز")
+_R_HEIR        = _nz("وارث")
 
 
-def _sh_bow_targets(g):
-    """هرکس که تا الان در زنجیرهٔ تیر بوده از هدف‌ها کنار می‌رود."""
-    used = set(getattr(g, "sh_bow_chain", []) or [])
-    h = getattr(g, "sh_bow_holder", None)
-    if h:
-        used.add(h)
-    return tuple(s for s in _alive_seats(g) if s not in used)
+def _is_kapu_scenario(g) -> bool:
+    return "kp" in _scenario_traits(g)
 
 
-async def _sh_bow_clear_buttons(ctx, chat_id, g):
-    mid = getattr(g, "sh_bow_btn_mid", None)
-    if not mid:
-        return
-    try:
-        await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=mid,
-                                                reply_markup=None)
-    except Exception:
-        pass
-    g.sh_bow_btn_mid = None
-    store.save()
+callback_route('kp_', after=_after_night_act)(_engine_fn("kp", "handle_kapu_callback", coro=True))
 
 
-async def _sh_arrow_aim(ctx, chat_id, g, shooter, target):
-    """🏹 نشانه‌گیریِ اولین کمان‌دار: هدف اعلام می‌شود تا دفاع کند؛ بعد از وقتِ دفاع،
-    دو دکمهٔ تصمیم می‌آید. فقط همین یک‌بار حقِ عوض‌کردنِ نظر دارد."""
-    g.sh_bow_pending = target
-    g.sh_bow_aiming = None
-    g.sh_bow_token = int(getattr(g, "sh_bow_token", 0) or 0) + 1
-    tok = g.sh_bow_token
-    store.save()
-    tname = escape(g.seats[target][1], quote=False)
-    sname = escape(g.seats[shooter][1], quote=False)
-    await ctx.bot.send_message(
-        chat_id,
-        f"🏹 {shooter}. {sname} کمان را روی <b>{target}. {tname}</b> نشانه گرفت — "
-        f"او دفاع کند.\n"
-        f"<i>بعد از دفاع، دکمه‌های تصمیم برای {shooter}. {sname} می‌آید.</i>",
-        parse_mode="HTML")
-    await _night_report(ctx, g, f"🏹 نشانه‌گیریِ {shooter} → {target}. {tname} (منتظرِ دفاع)")
-    asyncio.create_task(_sh_bow_ask_later(ctx, chat_id, g, shooter, target, tok))
+callback_route('kpv_')(_engine_fn("kp", "handle_kp_vote_callback", coro=True))
 
 
-async def _sh_bow_ask_later(ctx, chat_id, g, shooter, target, tok,
-                            delay=SH_BOW_DEFENSE_DELAY):
-    """⏳ بعد از وقتِ دفاع، دو دکمه‌ی «عوض می‌کنم / همینو می‌زنم» در گروه می‌آید."""
-    try:
-        await asyncio.sleep(delay)
-        if g.phase in ("idle", "ended") or getattr(g, "night_active", False):
-            return
-        if getattr(g, "sh_bow_token", None) != tok:
-            return
-        if getattr(g, "sh_bow_pending", None) != target:
-            return
-        kb = InlineKeyboardMarkup([[
-            InlineKeyboardButton("🔁 عوض می‌کنم", callback_data="sh_bw_change"),
-            InlineKeyboardButton("🎯 همینو می‌زنم", callback_data="sh_bw_keep"),
-        ]])
-        m = await ctx.bot.send_message(
-            chat_id,
-            f"🏹 {shooter}. {escape(g.seats[shooter][1], quote=False)} — "
-            f"هدفت <b>{target}. {escape(g.seats[target][1], quote=False)}</b> است. تصمیمت؟",
-            parse_mode="HTML", reply_markup=kb)
-        g.sh_bow_btn_mid = m.message_id
-        store.save()
-    except Exception as e:
-        print("⚠️ sh bow ask err:", e)
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «گیمر» (۱۰/۱۲/۱۷ نفره)
+#  تشخیص بر اساس «نقش‌ها» است نه اسم سناریو (دن‌کارلئونه = گیمر)
+#  ترتیب: رابین‌هود → مسترهلمز → مافیا (دن/تووفیس/موریارتی) → شهروندان
+# ═════════════════════════════════════════════════════════════
+_R_DONC     = _nz("دن‌کارلئونه")
+_R_TWOFACE  = _nz("تووفیس")
+_R_MORIARTY = _nz("موریارتی")
+_R_ELLIOT   = _nz("الیوت")
+_R_RICK     = _nz("ریک‌گرایمز")
+_R_ROBIN    = _nz("رابین‌هود")
+_R_JAMES    = _nz("جیمزهالیدی")
+_R_LOGAN    = _nz("لوگان")
+_R_HOLMES   = _nz("مسترهلمز")
+_R_CASTIEL  = _nz("کستیل")
+_R_DEXTER   = _nz("دکستر")      # 🔪 قاتلِ تیمِ مافیا (گیمر ۱۲)
+_R_SMEAGOL  = _nz("اسمیگل")     # 🌀 شهروندِ دیوانه (گیمر ۱۲)
 
+_GM_FUSE_COLORS = ["زرد", "قرمز", "آبی"]
+_GM_FUSE_TYPES  = ["انفجار", "خنثی", "سرعت"]
 
-async def handle_sh_bow_callback(update, ctx):
-    """🏹 دکمه‌های تصمیمِ کمان — فقط کسی که کمان دستش است."""
-    q = update.callback_query
-    uid = q.from_user.id
-    g, chat_id = _sh_find_game(uid)
-    if g is None or not getattr(g, "sh_bow_holder", None):
-        await safe_q_answer(q, "کمانی در جریان نیست.", show_alert=True)
-        return
-    seat = _seat_of_uid(g, uid)
-    if seat is None or seat != _sh_bow_shooter(g):
-        await safe_q_answer(q, "⛔ فقط کسی که کمان دستش است.", show_alert=True)
-        return
-    pend = getattr(g, "sh_bow_pending", None)
-    if pend is None:
-        await safe_q_answer(q, "تصمیم قبلاً گرفته شده.", show_alert=True)
-        return
-    await safe_q_answer(q)
-    await _sh_bow_clear_buttons(ctx, chat_id, g)
-    g.sh_bow_pending = None
 
-    if q.data == "sh_bw_keep":
-        store.save()
-        await _sh_arrow_fire(ctx, chat_id, g, seat, pend)
-        return
+def _gm_match(name, roles) -> bool:
+    """تشخیص بر اساس نقش: اگر دن‌کارلئونه بین نقش‌ها باشد → گیمر (هر تعداد نفره)."""
+    if any(_nz(r) == _R_DONC for r in roles.values()):
+        return True
+    return bool(name) and _nz("گیمر") in name
 
-    # 🔁 عوض می‌کنم — تنها فرصتش؛ عددِ بعدی مستقیم شلیک می‌شود
-    g.sh_bow_changed = True
-    g.sh_bow_aiming = seat
-    store.save()
-    await ctx.bot.send_message(
-        chat_id,
-        f"🔁 {seat}. {escape(g.seats[seat][1], quote=False)} نظرش را عوض کرد — "
-        f"حالا شماره‌ی صندلیِ جدید را بنویس.\n"
-        f"<i>این تیر دیگر برگشت ندارد.</i>", parse_mode="HTML")
-    await _night_report(ctx, g, f"🏹 {seat} نظرش را عوض کرد — منتظرِ عددِ جدید.")
 
+def _is_gamer_scenario(g) -> bool:
+    return "gm" in _scenario_traits(g)
 
-async def _sh_arrow_fire(ctx, chat_id, g, shooter, target):
-    chain = list(getattr(g, "sh_bow_chain", []) or [])
-    shielded = target in (getattr(g, "sh_shields", set()) or set())
-    tname = escape(g.seats[target][1], quote=False)
-    g.sh_bow_aiming = None
-    g.sh_bow_pending = None
-    g.sh_bow_changed = False
-    await _sh_bow_clear_buttons(ctx, chat_id, g)
-    # 🛡 سپردار: کمان به خودش می‌رسد — ولی نفرِ سوم دیگر منحرف نمی‌شود
-    if shielded and len(chain) < 2:
-        chain.append(target)
-        g.sh_bow_chain = chain
-        g.sh_bow_aiming = target
-        store.save()
-        await ctx.bot.send_message(
-            chat_id,
-            f"🛡 {target}. {tname} <b>سپر دارد</b> — تیر کارگر نشد.\n"
-            f"🏹 حالا <b>کمان دستِ اوست</b>: فقط شماره‌ی صندلی را بنویسد "
-            f"(دیگر حقِ عوض‌کردنِ نظر نیست).",
-            parse_mode="HTML")
-        await _night_report(ctx, g, f"🏹 تیر به {target}. {tname} خورد ولی سپر داشت — "
-                                    f"کمان به او رسید.")
-        return
-    g.sh_bow_holder = None
-    g.sh_bow_pending = None
-    g.sh_bow_chain = []
-    g.striked.add(target)
-    store.save()
-    await ctx.bot.send_message(chat_id, f"💥 تیرِ آرش — {target}. {tname} وصیت کند.",
-                               parse_mode="HTML")
+
+# 🧩 توابعِ این موتور در engines/gm.py است و با اولین صدا زدن بار می‌شود؛
+# تا آن موقع این اسم‌ها فقط جانشین‌اند.
+_gm_smeagol_join = _engine_fn("gm", "_gm_smeagol_join", coro=True)
+_gm_yesno_kb = _engine_fn("gm", "_gm_yesno_kb")
+_gm_open_robin = _engine_fn("gm", "_gm_open_robin", coro=True)
+_pass_shot_to_next_mafia = _engine_fn("gm", "_pass_shot_to_next_mafia", coro=True)
+
+
+def _dead_priority_delay(g, role_norm) -> bool:
+    """⏳ آیا نقشِ اولویت‌دار «مُرده» است؟ (در ترکیب هست ولی خط خورده) → تأخیرِ ضدلو‌رفتن لازم است."""
     try:
-        await publish_seating(ctx, chat_id, g, mode=CTRL)
+        any_seat = _find_seat_by_role(g, role_norm, alive_only=False)
+        alive_seat = _find_seat_by_role(g, role_norm)
+        return any_seat is not None and alive_seat is None
     except Exception:
-        pass
-    await _night_report(ctx, g, f"🏹 تیرِ آرش: {shooter} → {target}. {tname} "
-                                f"(خارج شد، {_sc_side(g, target)})")
-    await _check_auto_end(ctx, chat_id, g)   # 🏁
+        return False
+
 
-    _tside = _sc_side(g, target)
+def _open_next_delayed(ctx, chat_id, g, opener, delay=60):
+    """⏳ بازکردنِ مرحله‌ی بعد با تأخیر — تا زنده‌ها از سرعتِ بازشدن، مرگِ نقشِ قبلی را نفهمند."""
+    night_no = g.night_number
 
-    async def _sh_side_later():
+    async def _t():
         try:
-            await asyncio.sleep(SIDE_ANNOUNCE_DELAY)
-            if g.phase in ("idle", "ended"):
-                return
-            await ctx.bot.send_message(chat_id, f"ساید {target}. {tname}: <b>{_tside}</b>",
-                                       parse_mode="HTML")
+            await asyncio.sleep(delay)
+            if getattr(g, "night_active", False) and g.night_number == night_no:
+                await opener(ctx, chat_id, g)
         except Exception as e:
-            print("⚠️ sh side announce err:", e)
-    asyncio.create_task(_sh_side_later())
-
-
-# ─────────────────── 🗳 رأی‌گیریِ شاهنامه (روز ۱) ───────────────────
-def _sh_find_game(uid):
-    """بازیِ شاهنامه‌ای که این کاربر بازیکن/گادِ آن است (برای دکمه‌های روز)."""
-    for cid, game in store.games.items():
-        if not _is_shahname_scenario(game):
-            continue
-        if game.phase in ("idle", "ended"):
-            continue
-        if _seat_of_uid(game, uid) is not None or game.god_id == uid:
-            return game, cid
-    return None, None
+            print("⚠️ delayed open err:", e)
+    asyncio.create_task(_t())
 
 
-def _sh_vote_end_kb():
-    return InlineKeyboardMarkup([[InlineKeyboardButton("✅ پایان شمارش", callback_data="shd_end")]])
+callback_route('gm_', after=_after_night_act)(_engine_fn("gm", "handle_gamer_callback", coro=True))
 
 
-async def _sh_vote_msg(ctx, chat_id, g, text):
-    old = getattr(g, "sh_vote_kb_mid", None)
-    if old:
+async def handle_don_sentence_pm(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    """جمله‌ی معارفه‌ی دن‌کارلئونه (در پیوی) → برای مسترهلمز و گاد."""
+    msg = update.message
+    if not msg or not msg.text:
+        return
+    uid = msg.from_user.id
+    for cid, g in store.index.games_of(uid):
+        if not getattr(g, "gm_awaiting_don_sentence", False):
+            continue
+        don = _find_seat_by_role(g, _R_DONC)
+        if don is None or g.seats[don][0] != uid:
+            continue
+        sentence = msg.text.strip()[:200]
+        g.gm_don_sentence = sentence
+        g.gm_awaiting_don_sentence = False
+        store.save(cid)
+        holmes = _find_seat_by_role(g, _R_HOLMES)
+        if holmes:
+            try:
+                await ctx.bot.send_message(g.seats[holmes][0], f"📩 جمله‌ای به دستت رسید:\n«{sentence}»")
+            except Exception:
+                pass
+        await _night_report(ctx, g, f"📩 جملهٔ دن‌کارلئونه → هلمز: «{escape(sentence, quote=False)}»")
         try:
-            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=old,
-                                                    reply_markup=None)
+            await msg.reply_text("✅ جمله‌ات ثبت و برای مسترهلمز ارسال شد.")
         except Exception:
             pass
-    m = await ctx.bot.send_message(chat_id, text, parse_mode="HTML",
-                                   reply_markup=_sh_vote_end_kb())
-    g.sh_vote_kb_mid = m.message_id
-    store.save()
-
+        return
 
-async def _sh_vote_capture(ctx, g, msg, uid, text) -> bool:
-    vs = _seat_of_uid(g, uid)
-    if vs is None or vs in (g.striked or set()) or uid == g.god_id:
-        return False
-    v = _deng_parse_strict(text, tuple(s for s in _alive_seats(g) if s != vs))
-    if v is not None:
-        g.sh_vote_seq = int(getattr(g, "sh_vote_seq", 0) or 0) + 1
-        g.sh_vote_votes[uid] = (v, g.sh_vote_seq)
-        g.sh_vote_unread.discard(uid)
-        store.save()
-        if all(g.seats[s][0] in g.sh_vote_votes for s in _alive_seats(g)):
-            await _sh_vote_count(ctx, msg.chat.id, g)
-        return True
-    if uid not in (g.sh_vote_votes or {}):
-        _first = uid not in (g.sh_vote_unread or set())
-        g.sh_vote_unread.add(uid)
-        store.save()
-        if _first:
+    # ✍️ جمله‌ی مسترهلمز → موریارتی (هم‌زمان با جمله‌ی دن در معارفه)
+    for cid, g in store.index.games_of(uid):
+        if not getattr(g, "gm_awaiting_holmes_sentence", False):
+            continue
+        hs = _find_seat_by_role(g, _R_HOLMES)
+        if hs is None or g.seats[hs][0] != uid:
+            continue
+        sentence = msg.text.strip()[:200]
+        g.gm_holmes_sentence = sentence
+        g.gm_awaiting_holmes_sentence = False
+        store.save(cid)
+        mo = _find_seat_by_role(g, _R_MORIARTY)
+        if mo:
             try:
-                await msg.reply_text(f"⚠️ {vs}. {g.seats[vs][1]} رأیت خوانده نشد — "
-                                     f"فقط شماره‌ی یکی از صندلی‌ها را بنویس (به‌جز خودت).")
+                await ctx.bot.send_message(g.seats[mo][0],
+                                           f"📩 جمله‌ای به دستت رسید:\n«{sentence}»")
             except Exception:
                 pass
-        return True
-    return False
-
-
-async def _sh_vote_count(ctx, chat_id, g):
-    if not getattr(g, "sh_vote_active", False):
-        return
-    alive = set(_alive_seats(g))
-    picks = {}
-    for u, (t, _sq) in dict(g.sh_vote_votes or {}).items():
-        vs = _seat_of_uid(g, u)
-        if vs is None or vs not in alive or t not in alive or t == vs:
-            continue
-        picks[vs] = t
-    g.sh_vote_active = False
-    old = getattr(g, "sh_vote_kb_mid", None)
-    if old:
+        await _night_report(ctx, g, f"📩 جملهٔ هلمز → موریارتی: «{escape(sentence, quote=False)}»")
         try:
-            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=old,
-                                                    reply_markup=None)
+            await msg.reply_text("✅ جمله‌ات ثبت و برای موریارتی ارسال شد.")
         except Exception:
             pass
-    g.sh_vote_kb_mid = None
-    store.save()
-
-    duels = sorted((a, b) for a, b in picks.items() if a < b and picks.get(b) == a)
-    if duels:
-        g.sh_duels = [list(d) for d in duels]
-        g.sh_council_votes = {}
-        g.sh_council_sel = {}
-        g.sh_council_done = False
-        store.save()
-        lines = ["⚔️ <b>مبارزهٔ تن‌به‌تن</b> شکل گرفت:"]
-        for a, b in duels:
-            lines.append(f"• {a}. {escape(g.seats[a][1], quote=False)} ⚔️ "
-                         f"{b}. {escape(g.seats[b][1], quote=False)}")
-        lines.append("\n🏛 حالا نظرِ انجمن گرفته می‌شود.")
-        kb = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🏛 پرسش از انجمن", callback_data="shd_cask")],
-            [InlineKeyboardButton("🏛 پایانِ نظرِ انجمن", callback_data="shd_cdone")],
-        ])
-        _dm = await ctx.bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML",
-                                         reply_markup=kb)
-        g.sh_duel_msg_id = _dm.message_id
-        store.save()
-        await _night_report(ctx, g, "⚔️ مبارزه‌ها ثبت شد — با «باز کردن چت مافیا» (یا دکمهٔ "
-                                    "«پرسش از انجمن») نظرِ انجمن گرفته می‌شود.")
-        return
-
-    counts = {}
-    for _vs, t in picks.items():
-        counts[t] = counts.get(t, 0) + 1
-    high = sorted(s for s, c in counts.items() if c >= SH_VOTE_THRESHOLD)
-    g.sh_vote_high = high
-    store.save()
-    if not high:
-        await ctx.bot.send_message(
-            chat_id, f"🗳 مبارزه‌ای شکل نگرفت و کسی هم به حدنصابِ {SH_VOTE_THRESHOLD} رأی نرسید.")
         return
-    txt = "🗳 <b>به رأی‌گیریِ نهایی می‌روند:</b>\n" + "\n".join(
-        f"• {s}. {escape(g.seats[s][1], quote=False)} — {counts[s]} رأی" for s in high)
-    kb = InlineKeyboardMarkup([[InlineKeyboardButton("✅ تأیید و ساختِ رأی نهایی",
-                                                     callback_data="shd_ok")]])
-    await ctx.bot.send_message(chat_id, txt, parse_mode="HTML", reply_markup=kb)
 
 
-# ─────────────────── 🏛 انجمن ───────────────────
-def _sh_council_seats(g):
-    """اعضای زندهٔ انجمن: ضحاک، رستم، کاوه."""
-    out = set()
-    for key in (_R_ZAHHAK, _R_ROSTAM, _R_KAVEH):
-        s = _sh_seat(g, key)
-        if s is not None:
-            out.add(s)
-    return sorted(out)
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «میتیک» (۱۲ نفره)
+#  شب: اول شاتِ مافیا (+ کانسورت) → بعد اکت‌های شهروندی، بدون اولویت
+# ═════════════════════════════════════════════════════════════
+MYTHIC_KEY   = "میتیک"
+MYTHIC_SEATS = 12                 # 🤖 رأی‌گیریِ اتومات فقط روی همین ظرفیت
+_R_MY_GF      = _nz("گادفادر")
+_R_MY_NINJA   = _nz("نینجا")
+_R_MY_CONSORT = _nz("کانسورت")
+_R_MY_TERROR  = _nz("تروریست")
+_R_MY_BODY    = _nz("بادیگارد")
+_R_MY_SNIPER  = _nz("اسنایپر")
+_R_MY_DOC     = _nz("دکتر")
+_R_MY_DET     = _nz("کاراگاه")
+_R_MY_SIMPLE  = _nz("شهرساده")
+_MY_MAFIA = (_R_MY_GF, _R_MY_NINJA, _R_MY_CONSORT, _R_MY_TERROR)
 
 
-_SH_COUNCIL_Q = ("🏛 موافقِ برگزاری کدام مبارزه‌ها هستی؟\n"
-                 "⚠️ بعد از «تأیید» دیگر قابلِ تغییر نیست.")
+def _is_mythic_scenario(g) -> bool:
+    return "my" in _scenario_traits(g)
 
 
-def _sh_duel_label(g, d):
-    return f"{d[0]} و {d[1]}"
+# 🧩 توابعِ این موتور در engines/my.py است و با اولین صدا زدن بار می‌شود؛
+# تا آن موقع این اسم‌ها فقط جانشین‌اند.
+_my_seat = _engine_fn("my", "_my_seat")
+_my_role_is = _engine_fn("my", "_my_role_is")
+_my_start = _engine_fn("my", "_my_start", coro=True)
+_resolve_mythic = _engine_fn("my", "_resolve_mythic", coro=True)
+_my_terror_start = _engine_fn("my", "_my_terror_start", coro=True)
+_my_terror_apply = _engine_fn("my", "_my_terror_apply", coro=True)
 
 
-def _sh_council_kb(g, sel):
-    rows = []
-    for i, d in enumerate(getattr(g, "sh_duels", []) or []):
-        mark = "✅ " if i in sel else ""
-        rows.append([InlineKeyboardButton(f"{mark}{_sh_duel_label(g, d)}",
-                                          callback_data=f"sh_cd_{i}")])
-    rows.append([InlineKeyboardButton("✅ تأیید", callback_data="sh_cd_ok")])
-    return InlineKeyboardMarkup(rows)
+callback_route('my_', after=_after_night_act)(_engine_fn("my", "handle_mythic_callback", coro=True))
+
+
+# ═════════════════════════════════════════════════════════════
+#  موتور شبِ خودکار — سناریو «شاهنامه»
+#  شب ۱ : کاوه → تیمِ اهریمن → افراسیاب → سیمرغ → صاحبانِ پر →
+#          رستم → جاماسب → آرش
+#  شب ۲ : حدسِ افراسیاب → تصمیمِ رستم (سایه) → اهریمن → سیمرغ →
+#          صاحبانِ پر → جاماسب
+#  شب ۳+: اهریمن → سیمرغ → صاحبانِ پر → جاماسب
+# ═════════════════════════════════════════════════════════════
+SHAHNAME_KEY = "شاهنامه"
+_R_ZAHHAK   = _nz("ضحاک")
+_R_BOOF     = _nz("بوف")
+_R_AFRASIAB = _nz("افراسیاب")
+_R_SIMORGH  = _nz("سیمرغ")
+_R_JAMASB   = _nz("جاماسب")
+_R_ROSTAM   = _nz("رستم")
+_R_KAVEH    = _nz("کاوه")      # «کاوه آهنگر»
+_R_ARASH    = _nz("آرش")       # «آرش کمانگیر»
+_SH_DARK    = (_R_ZAHHAK, _R_BOOF, _R_AFRASIAB)
+
 
+def _is_shahname_scenario(g) -> bool:
+    return "sh" in _scenario_traits(g)
+
+
+# 🧩 توابعِ این موتور در engines/sh.py است و با اولین صدا زدن بار می‌شود؛
+# تا آن موقع این اسم‌ها فقط جانشین‌اند.
+_sh_dark_role_norms = _engine_fn("sh", "_sh_dark_role_norms")
+_sh_saved_seats = _engine_fn("sh", "_sh_saved_seats")
+_sh_kaveh_blocks = _engine_fn("sh", "_sh_kaveh_blocks")
+_sh_start = _engine_fn("sh", "_sh_start", coro=True)
+_sh_check_open_mafia = _engine_fn("sh", "_sh_check_open_mafia", coro=True)
+_sh_check_open_mid = _engine_fn("sh", "_sh_check_open_mid", coro=True)
+_sh_check_open_feathers = _engine_fn("sh", "_sh_check_open_feathers", coro=True)
+_sh_check_open_late = _engine_fn("sh", "_sh_check_open_late", coro=True)
+_resolve_shahname = _engine_fn("sh", "_resolve_shahname", coro=True)
+_sh_check_link = _engine_fn("sh", "_sh_check_link", coro=True)
+_sh_bow_shooter = _engine_fn("sh", "_sh_bow_shooter")
+_sh_bow_targets = _engine_fn("sh", "_sh_bow_targets")
+_sh_arrow_aim = _engine_fn("sh", "_sh_arrow_aim", coro=True)
+_sh_arrow_fire = _engine_fn("sh", "_sh_arrow_fire", coro=True)
+_sh_vote_msg = _engine_fn("sh", "_sh_vote_msg", coro=True)
+_sh_vote_capture = _engine_fn("sh", "_sh_vote_capture", coro=True)
+_sh_council_ask = _engine_fn("sh", "_sh_council_ask", coro=True)
+_sh_council_resolve = _engine_fn("sh", "_sh_council_resolve", coro=True)
 
-async def _sh_council_ask(ctx, chat_id, g):
-    duels = getattr(g, "sh_duels", []) or []
-    if not duels or getattr(g, "sh_council_done", False):
-        return
-    members = _sh_council_seats(g)
-    if not members:
-        await _night_report(ctx, g, "🏛 هیچ عضوِ زنده‌ای در انجمن نمانده.")
-        return
-    # 🔒 هرکس نظرش را داده دیگر پرسیده نمی‌شود (تا نتواند عوضش کند)
-    done = getattr(g, "sh_council_votes", {}) or {}
-    pending = [s for s in members if g.seats[s][0] not in done]
-    if not pending:
-        await _night_report(ctx, g, "🏛 همهٔ اعضای انجمن نظرشان را داده‌اند.")
-        return
-    unreachable = []
-    for s in pending:
-        uid = g.seats[s][0]
-        sel = set((getattr(g, "sh_council_sel", {}) or {}).get(uid, []) or [])
-        if not await _safe_pm(ctx, uid, _SH_COUNCIL_Q, _sh_council_kb(g, sel)):
-            unreachable.append(s)
-    rep = f"🏛 پرسشِ انجمن برای {len(pending)} نفر فرستاده شد."
-    if unreachable:
-        # ⚠️ پیامش نرسیده (آفلاین/پیویِ بسته) → گاد باید بداند، وگرنه «مخالف» حساب می‌شود
-        rep += ("\n⚠️ به این‌ها نرسید: "
-                + "، ".join(f"{s}. {escape(g.seats[s][1], quote=False)}" for s in unreachable)
-                + "\nمی‌توانی با «🎛 اکت دستی» جای‌شان جواب بدهی.")
-    await _night_report(ctx, g, rep)
 
+def _sh_seat(g, key, alive_only=True):
+    """صندلیِ یک نقشِ شاهنامه (با تطبیقِ جزئی: «کاوه آهنگر»، «آرش کمانگیر»)."""
+    s = _find_seat_by_role(g, key, alive_only=alive_only)
+    if s is not None:
+        return s
+    return _find_seat_role_sub(g, key, alive_only=alive_only)
 
-def _sh_council_missing(g):
-    """🏛 اعضای زندهٔ انجمن که هنوز نظرشان را نداده‌اند."""
-    votes = getattr(g, "sh_council_votes", {}) or {}
-    return [s for s in _sh_council_seats(g) if g.seats[s][0] not in votes]
 
+def _sh_final_pair(g):
+    """صندلی‌های زندهٔ رأی‌گیریِ نهایی — اگر دقیقاً دو نفر باشند."""
+    if getattr(g, "vote_stage", None) != "final":
+        return None
+    seats = [s for s in (getattr(g, "defense_seats", []) or [])
+             if s in g.seats and s not in (g.striked or set())]
+    return seats if len(seats) == 2 else None
 
-async def _sh_council_resolve(ctx, chat_id, g, force=False):
-    """🏛 جمع‌بندیِ نظرِ انجمن → ساختِ رأی نهایی، یا رفتن به شب.
 
-    ⚠️ اگر کسی هنوز جواب نداده (آفلاین/پیویِ بسته)، ساکت جمع‌بندی نمی‌کند —
-    اسمِ جامانده‌ها را به گاد می‌گوید و منتظرِ تأییدِ صریحش می‌ماند."""
-    duels = getattr(g, "sh_duels", []) or []
-    if not duels or getattr(g, "sh_council_done", False):
-        return
-    missing = _sh_council_missing(g)
-    if missing and not force:
-        nm = "\n".join(f"• {s}. {escape(g.seats[s][1], quote=False)} "
-                       f"({escape(str((g.assigned_roles or {}).get(s, '—')), quote=False)})"
-                       for s in missing)
-        # 📩 مستقیم به پیویِ گاد (نه _safe_pm — که اگر گاد خودش بازیکنِ سوخته باشد رد می‌شود)
-        try:
-            await ctx.bot.send_message(
-                g.god_id,
-                f"⚠️ <b>هنوز {len(missing)} نفر از انجمن نظر نداده‌اند:</b>\n{nm}\n\n"
-                f"<i>اگر آفلاین‌اند یا پیویشان بسته است، می‌توانی جای‌شان با «🎛 اکت دستی» "
-                f"جواب بدهی. اگر همین‌طور جمع‌بندی کنی، نظرنداده «مخالف» حساب می‌شود.</i>\n\n"
-                f"🏛 جمع‌بندی کنم؟",
-                parse_mode="HTML",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("✅ همین‌طور جمع‌بندی کن", callback_data="shd_cforce"),
-                    InlineKeyboardButton("⏳ صبر می‌کنم", callback_data="shd_cwait"),
-                ]]))
-        except Exception as e:
-            print("⚠️ council warn:", e)
-            # اگر پیویِ گاد بسته بود، دستِ‌کم در گروه بگو چرا جمع‌بندی نشد
-            try:
-                await ctx.bot.send_message(
-                    chat_id, "🏛 هنوز همهٔ اعضای انجمن نظر نداده‌اند — گاد پیویِ بات را چک کند.")
-            except Exception:
-                pass
-        return
-    g.sh_council_done = True
-    # 🧹 دکمه‌های «پرسش از انجمن / پایانِ نظرِ انجمن» از گروه برداشته شوند
-    _dm = getattr(g, "sh_duel_msg_id", None)
-    if _dm:
-        try:
-            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=_dm,
-                                                    reply_markup=None)
-        except Exception:
-            pass
-        g.sh_duel_msg_id = None
-    members = _sh_council_seats(g)
-    votes = getattr(g, "sh_council_votes", {}) or {}
-    total = len(members)
-    approved = []
-    tally = []
-    for i, _d in enumerate(duels):
-        yes = sum(1 for s in members if i in (votes.get(g.seats[s][0], []) or []))
-        okay = bool(total and yes * 2 > total)      # اکثریتِ اعضای زندهٔ انجمن
-        if okay:
-            approved.append(i)
-        tally.append(f"• {_sh_duel_label(g, duels[i])} → {yes} از {total} "
-                     + ("✅ تأیید" if okay else "❌ رد"))
-    store.save()
-    # 📊 شمارشِ شفاف به گاد، تا هیچ‌وقت نتیجه مبهم نباشد
-    await _night_report(ctx, g, "🏛 <b>شمارشِ انجمن</b> (نظرنداده = مخالف):\n"
-                                + "\n".join(tally))
-
-    if not approved:
-        await ctx.bot.send_message(chat_id, "🏛 انجمن با هیچ مبارزه‌ای موافقت نکرد — شب می‌شود.")
-        await _night_report(ctx, g, "🏛 هیچ مبارزه‌ای تأیید نشد → شب خودکار شروع شد.")
-        await start_night(ctx, chat_id, g)
-        return
-
-    lines = ["🏛 <b>اعضای انجمن موافقِ برگزاری این مبارزه‌ها بودند:</b>"]
-    seats = []
-    for i in approved:
-        a, b = duels[i][0], duels[i][1]
-        lines.append(f"• {a}. {escape(g.seats[a][1], quote=False)} ⚔️ "
-                     f"{b}. {escape(g.seats[b][1], quote=False)}")
-        for s in (a, b):
-            if s in g.seats and s not in (g.striked or set()) and s not in seats:
-                seats.append(s)
-    await ctx.bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML")
-    await _sh_open_final_vote(ctx, chat_id, g, seats)
+def _sh_duel_locked(g, voter_seat, target_seat) -> bool:
+    """⚔️ فقط وقتی دقیقاً «دو نفر» در رأی‌گیریِ نهایی‌اند، آن دو به هم رأی نمی‌دهند.
+    با سه نفر یا بیشتر همه به همه می‌توانند رأی بدهند.
+    ⚠️ اسمش شاهنامه‌ای مانده ولی قانونِ همهٔ سناریوهاست (به‌جز میتیک)."""
+    pair = _sh_final_pair(g)
+    if not pair:
+        return False
+    return voter_seat != target_seat and voter_seat in pair and target_seat in pair
 
 
-async def _sh_open_final_vote(ctx, chat_id, g, seats):
-    seats = [s for s in seats if s in g.seats and s not in (g.striked or set())]
-    if not seats:
-        await ctx.bot.send_message(chat_id, "ℹ️ کسی برای رأی‌گیریِ نهایی نماند.")
-        return
-    g.votes_cast = {}
-    g.vote_logs = {}
-    g.current_vote_target = None
-    g.voted_targets = set()
-    g.defense_selection = []
-    g.defense_seats = list(seats)
-    g.vote_type = "defense_selected"
-    store.save()
-    note = ("\n⚠️ چون فقط دو نفر در رأی‌گیریِ نهایی‌اند، به یکدیگر رأی نمی‌دهند."
-            if len(seats) == 2 else
-            "\nℹ️ چون بیش از دو نفر در رأی‌گیریِ نهایی‌اند، همه به همه می‌توانند رأی بدهند.")
-    await ctx.bot.send_message(
-        chat_id, f"🛡 صندلی‌های دفاع: {'، '.join(map(str, seats))}{note}")
-    await start_vote(ctx, chat_id, g, "final")
-    try:
-        await publish_seating(ctx, chat_id, g, mode=CTRL)
-    except Exception:
-        pass
+# ─────────────────── 🎯 لیستِ هدف‌ها ───────────────────
+_SH_SEL = {
+    "sh_kv_":  ("🛡 سپرت را به چه کسی می‌دهی؟",        "sh_kv_confirm",  None),
+    "sh_afs_": ("🛡 سپرت را به چه کسی می‌دهی؟",        "sh_afs_confirm", None),
+    "sh_afg_": ("🕯 به‌نظرت رستم کیست؟",               "sh_afg_confirm", None),
+    "sh_bf_":  ("🪶 پر سمی را به چه کسی می‌دهی؟",      "sh_bf_confirm",  None),
+    "sh_st_":  ("🔫 هدف شلیک را انتخاب کن:",           "sh_st_confirm",  "sh_act_back"),
+    "sh_ros_": ("🌑 روی چه کسی سایه می‌گذاری؟",        "sh_ros_confirm", None),
+    "sh_ar_":  ("🏹 تیر و کمانت را به چه کسی می‌دهی؟", "sh_ar_confirm",  None),
+    "sh_fo_":  ("🪶 پر را به چه کسی می‌دهی؟",          "sh_fo_confirm",  None),
+}
 
 
-async def handle_shahname_god_callback(update, ctx):
-    """⚔️ دکمه‌های گادِ شاهنامه (در گروه): پایانِ شمارش / تأیید / انجمن."""
-    q = update.callback_query
-    uid = q.from_user.id
-    g, chat_id = _sh_find_game(uid)
-    if g is None or uid != g.god_id:
-        await safe_q_answer(q, "⛔ فقط گادِ بازی.", show_alert=True)
-        return
-    await safe_q_answer(q)
-    data = q.data
+callback_route('sh_', after=_after_night_act)(_engine_fn("sh", "handle_shahname_callback", coro=True))
 
-    if data == "shd_end":
-        await _sh_vote_count(ctx, chat_id, g)
-        return
 
-    if data == "shd_ok":
-        high = [s for s in (getattr(g, "sh_vote_high", []) or [])
-                if s in g.seats and s not in (g.striked or set())]
-        if not high:
-            await safe_q_answer(q, "کسی در فهرست نیست.", show_alert=True)
-            return
-        g.sh_vote_high = []
-        store.save()
-        await _sh_open_final_vote(ctx, chat_id, g, high)
-        return
+callback_route('sh_bw_')(_engine_fn("sh", "handle_sh_bow_callback", coro=True))
 
-    if data == "shd_cask":
-        await _sh_council_ask(ctx, chat_id, g)
-        return
 
-    if data == "shd_cdone":
-        await _sh_council_resolve(ctx, chat_id, g)
-        return
+_SH_COUNCIL_Q = ("🏛 موافقِ برگزاری کدام مبارزه‌ها هستی؟\n"
+                 "⚠️ بعد از «تأیید» دیگر قابلِ تغییر نیست.")
 
-    if data == "shd_cforce":
-        await _sh_council_resolve(ctx, chat_id, g, force=True)
-        return
 
-    if data == "shd_cwait":
-        _m = _sh_council_missing(g)
-        await _adm_send(ctx, uid, "⏳ باشد — هر وقت جواب دادند دوباره «🏛 پایانِ نظرِ انجمن» را بزن."
-                        + ("\nمانده: " + "، ".join(
-                            f"{s}. {escape(g.seats[s][1], quote=False)}" for s in _m)
-                           if _m else ""))
-        return
+callback_route('shd_')(_engine_fn("sh", "handle_shahname_god_callback", coro=True))
 
 
+@callback_route("nkick_")
 async def handle_night_kick_callback(update, ctx):
     """👢 کیک شب — انتخابِ گاد در پیوی (همه‌ی سناریوها)."""
     q = update.callback_query
@@ -15092,7 +9876,7 @@ async def handle_night_kick_callback(update, ctx):
     uid = q.from_user.id
     g = None
     chat_id = None
-    for cid, game in store.games.items():
+    for cid, game in store.index.god_games(uid):
         if getattr(game, "night_active", False) and game.god_id == uid:
             g, chat_id = game, cid
             break
@@ -15141,7 +9925,7 @@ async def handle_night_kick_callback(update, ctx):
                 pass
         await _burn_advance(ctx, chat_id, g)   # ⛓ کیک هم صفِ اولویت‌دار را جلو ببرد
         _kside = _sc_side(g, s)
-        _bd = record_kick(g.seats[s][0], _tn)   # 👢 شمارشِ کیک + محرومیتِ احتمالی
+        _bd = await gist_run(record_kick, g.seats[s][0], _tn)   # 👢 شمارشِ کیک + محرومیتِ احتمالی
         await _close_pm(ctx, uid, mid,
                         f"👢 کیک شب ثبت شد: {s}. {_tn} ({_kside})\n"
                         f"(امشب اکت ندارد و هنگامِ روز خط می‌خورد)"
@@ -15150,18 +9934,52 @@ async def handle_night_kick_callback(update, ctx):
                            if _bd else ""))
         await _night_report(ctx, g, f"👢 کیک شب: <b>{s}. {escape(_tn, quote=False)}</b> ({_kside})")
         # 📢 اعلامِ عمومی (با ساید) موقعِ «روز» فرستاده می‌شود، نه الان — که شب چیزی لو نرود
-        store.save()
+        store.save(chat_id)
         return
 
     if data.startswith("nkick_"):
         s = int(data.rsplit("_", 1)[1])
         g.night_sel[uid] = s
-        store.save()
+        store.save(chat_id)
         await _edit_pm(ctx, uid, mid, "👢 چه کسی کیکِ شب می‌شود؟",
                        _kb_night_seats(_alive_seats(g), g, "nkick_", selected=s, confirm_cb="nkick_ok"))
         return
 
 
+# ─────────────────────────────────────────────────────────────
+#  🧩 ثبتِ موتورهای سناریو (ترتیب = اولویت وقتی اسمی به چند کلید بخورد)
+# ─────────────────────────────────────────────────────────────
+register_scenario_engine(ScenarioEngine(
+    "neg", _scenario_name_match(NEG_SCENARIO_KEY), "mafia_decision",
+    _night_open_mafia_decision, _neg_night_done, _resolve_mozakere))
+register_scenario_engine(ScenarioEngine(
+    "bzp", _scenario_name_match(BAAZPORS_KEY), "hunter",
+    _bzp_open_hunter, _bzp_night_done, _resolve_baazpors))
+# کاوربازپرس همان موتورِ بازپرس را می‌گیرد؛ فقط صفتِ اضافه است
+register_scenario_engine(ScenarioEngine("cover", _scenario_name_match(COVER_KEY), primary=False))
+register_scenario_engine(ScenarioEngine(
+    "nem", _scenario_name_match(NEMAYANDE_KEY), "mine",
+    _nem_open_mine, _nem_night_done, _resolve_nemayande))
+register_scenario_engine(ScenarioEngine(
+    "tk", _scenario_name_match(TAKAVAR_KEY), "shield",
+    _tk_open_shield, _tk_night_done, _resolve_takavar))
+register_scenario_engine(ScenarioEngine(
+    "kp", _scenario_name_match(KAPU_KEY), "don",
+    _kp_open_night, _kp_night_done, _resolve_kapu))
+register_scenario_engine(ScenarioEngine(
+    "gm", _gm_match, "robin",
+    _gm_open_robin, _gm_night_done, _resolve_gamer))
+register_scenario_engine(ScenarioEngine(
+    "sh", _scenario_name_match(SHAHNAME_KEY), "shahname",
+    _sh_start, _sh_night_done, _resolve_shahname))
+register_scenario_engine(ScenarioEngine(
+    "my", _scenario_name_match(MYTHIC_KEY), "mythic",
+    _my_start, _my_night_done, _resolve_mythic))
+# ✋ پیش‌فرض: هیچ کلیدی نخورد
+register_scenario_engine(ScenarioEngine(
+    MANUAL_ENGINE_KEY, None, "manual", _manual_open_night, None, _resolve_manual))
+
+
 # ─────────────────────────────────────────────────────────────
 # ─────────────────────────────────────────────────────────────
 #  CALL-BACK ROUTER – نسخهٔ کامل با فاصله‌گذاری درست
@@ -15180,11 +9998,11 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if _q and _q.data and not _q.data.startswith("endq_"):
         try:
             _uid = _q.from_user.id
-            for _cid, _gg in store.games.items():
+            for _cid, _gg in store.index.pending_endq(_uid):
                 if (_gg.god_id == _uid and getattr(_gg, "endq_token", None)
                         and getattr(_gg, "endq_alert", False)):
                     _gg.endq_alert = False
-                    store.save()
+                    store.save(_cid)
                     await safe_q_answer(
                         _q,
                         "🏁 به‌نظر می‌رسد بازی تمام شده!\n"
@@ -15193,136 +10011,16 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                     break
         except Exception:
             pass
-    if _q and _q.data and (_q.data.startswith("sel_") or _q.data.startswith("selday_")):
-        await handle_selected_callback(update, ctx)
-        return
-
-    # 👢 کیک شب (گاد در پیوی) — قبل از گارد پی‌وی
-    if _q and _q.data and _q.data.startswith("nkick_"):
-        await handle_night_kick_callback(update, ctx)
-        return
-
-    # 🗡 دنگ خیانت (نماینده — پیوی گاد و دن)
-    if _q and _q.data and _q.data.startswith(("nrep_", "nding_", "ndsign_")):
-        await handle_nem_ding_callback(update, ctx)
-        return
-
-    # 🎯 حدسِ ۳ مافیا (شهروندِ خروجیِ روز ۱ — پیوی)
-    if _q and _q.data and _q.data.startswith("d1g_"):
-        await handle_d1_guess_callback(update, ctx)
-        return
-
-    # 🔥 سوزوندنِ اکت (گاد — پیوی)
-    if _q and _q.data and _q.data.startswith("nburn_"):
-        await handle_burn_callback(update, ctx)
-        return
-
-    # 🎛 اکتِ دستیِ گاد (پیوی)
-    if _q and _q.data and _q.data.startswith("gact_"):
-        await handle_god_act_callback(update, ctx)
-        return
-
-    # 🧪 سوزاندنِ رأیِ پادزهر (کاپو — پیوی گاد)
-    if _q and _q.data and _q.data.startswith("kpv_"):
-        await handle_kp_vote_callback(update, ctx)
-        return
-
-    # 🎩 امتیازدهی به گاد (پیویِ بازیکنان)
-    if _q and _q.data and _q.data.startswith("grate_"):
-        await handle_god_rating_callback(update, ctx)
-        return
-
-    # 🏁 «آیا بازی تمام شده؟» (پیویِ گاد)
-    if _q and _q.data and _q.data.startswith("endq_"):
-        await handle_end_question_callback(update, ctx)
-        return
-
-    # 🧑‍⚖️ بازپرس: ادامه/ملغی + پایانِ دوئل
-    if _q and _q.data and _q.data.startswith("bzd_"):
-        await handle_baz_duel_callback(update, ctx)
-        return
-
-    # 🗳 دنگِ نمایندگی: پایانِ شمارش + تأیید/ردِ نتیجه
-    if _q and _q.data and _q.data.startswith(("nemd_", "nemc_")):
-        await handle_nem_deng_callback(update, ctx)
-        return
-
-    # 🔗 لینکِ اتاق مافیا برای خریداری‌شده (پیوی گاد)
-    if _q and _q.data and _q.data.startswith("buylink_"):
-        await handle_buy_link_callback(update, ctx)
-        return
-
-    # 🤝 کاپو: شمارش/تأیید/گان
-    if _q and _q.data and _q.data.startswith(("kpe_", "kpc_", "kpg_", "kpd_", "kpf_")):
-        await handle_kapu_trust_callback(update, ctx)
-        return
-
-    # ⏱ دکمه‌های تایمر
-    if _q and _q.data and _q.data.startswith("tmr_"):
-        await handle_timer_callback(update, ctx)
-        return
-
-
-    # 🛠 پنلِ مدیریت (پیویِ سازندهٔ بات)
-    if _q and _q.data and _q.data.startswith("adm_"):
-        await handle_admin_panel_callback(update, ctx)
-        return
-
-    # 🔀 تأییدِ انتقالِ آمار به آیدیِ جدید (پیویِ سازندهٔ بات)
-    if _q and _q.data and _q.data.startswith("mvu_"):
-        await handle_moveuser_callback(update, ctx)
-        return
-
-    # 🎙 انتخابِ جمله برای وویسِ آپلودشده (پیویِ سازندهٔ بات)
-    if _q and _q.data and _q.data.startswith("vset_"):
-        await handle_voice_set_callback(update, ctx)
-        return
-
-    # 🔗 انتخابِ گیرندگانِ لینکِ اتاقِ مافیا (پیویِ گاد — سناریوهای بدونِ موتور)
-    if _q and _q.data and _q.data.startswith("mlk_"):
-        await handle_mlink_callback(update, ctx)
-        return
-
-    # ⚔️ دکمه‌های گادِ شاهنامه (در گروه) — قبل از مسیرِ اکت‌های شب
-    if _q and _q.data and _q.data.startswith("shd_"):
-        await handle_shahname_god_callback(update, ctx)
-        return
-
-    # 🏹 تصمیمِ کمانِ آرش (در گروه، توسطِ کمان‌دار)
-    if _q and _q.data and _q.data.startswith("sh_bw_"):
-        await handle_sh_bow_callback(update, ctx)
-        return
-
-    # 🌙 اکت‌های شبِ خودکار (در پیوی بازیکنان) — قبل از گارد پی‌وی
-    if _q and _q.data and _q.data.startswith(("night_", "bzp_", "cvb_", "nem_", "tk_", "kp_",
-                                              "gm_", "sh_", "my_")):
-        _dt = _q.data
-        if _dt.startswith("my_"):
-            await handle_mythic_callback(update, ctx)
-        elif _dt.startswith("night_"):
-            await handle_night_callback(update, ctx)
-        elif _dt.startswith("cvb_"):
-            await handle_cover_callback(update, ctx)
-        elif _dt.startswith("bzp_"):
-            await handle_baazpors_callback(update, ctx)
-        elif _dt.startswith("nem_"):
-            await handle_nemayande_callback(update, ctx)
-        elif _dt.startswith("tk_"):
-            await handle_takavar_callback(update, ctx)
-        elif _dt.startswith("kp_"):
-            await handle_kapu_callback(update, ctx)
-        elif _dt.startswith("sh_"):
-            await handle_shahname_callback(update, ctx)
-        else:
-            await handle_gamer_callback(update, ctx)
-        # پس از هر اکت: اگر همه‌ی اکت‌ها تمام شد، به گاد اطلاع بده
-        try:
-            _gg, _ = _find_active_night_game(_q_uid(_q), _q)
-            if _gg is not None:
-                await _maybe_notify_god_done(ctx, _gg)
-        except Exception:
-            pass
-        return
+    # 🧭 هندلرهای مستقل (لیست منتخب، اکت‌های شب، پنل‌ها، …) — از جدولِ پیشوندها
+    if _q and _q.data:
+        _route = _cb_route_for(_q.data)
+        if _route is not None:
+            _route["hits"] += 1
+            await _route["handler"](update, ctx)
+            if _route["after"] is not None:
+                await _route["after"](update, ctx)
+            return
+        _CB_GAME_HITS["n"] += 1
 
     # 🔹 جلوگیری از اجرای کال‌بک‌ها در پی‌وی مگر برای راوی در حالت خریداری
     if update.effective_chat.type == "private":
@@ -15346,7 +10044,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         # اگر بالا پیدا نشد → جستجو بر اساس god_id (فازهای رأی‌گیریِ روز هم قبول)
         if not g:
-            for chat_id, game in store.games.items():
+            for chat_id, game in store.index.god_games(uid):
                 if game.god_id == uid and game.phase in (
                         "playing", "awaiting_winner", "voting_selection", "defense_selection"):
                     g = game
@@ -15377,7 +10075,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         if uid != g.god_id:
             return
         g.pending_delete = set()
-        store.save()
+        store.save(chat)
         await set_hint_and_kb(
             ctx, chat, g,
             "صندلی‌های دارای بازیکن را انتخاب کنید و در پایان «تأیید حذف» را بزنید.",
@@ -15396,7 +10094,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                 g.pending_delete.remove(seat)
             else:
                 g.pending_delete.add(seat)
-            store.save()
+            store.save(chat)
         await publish_seating(ctx, chat, g, mode="delete")
         return
 
@@ -15406,13 +10104,13 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             g.seats.pop(seat, None)
         g.pending_delete = set()
         g.ui_hint = None 
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode=REG)
         return
 
     if data == "delete_cancel" and uid == g.god_id:
         g.pending_delete = set()
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode=REG)
         return
 
@@ -15425,7 +10123,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         for seat, (player_uid, _) in g.seats.items():
             if player_uid == uid:
                 del g.seats[seat]
-                store.save()
+                store.save(chat)
                 await ctx.bot.send_message(chat, "❎ ثبت‌نام شما با موفقیت لغو شد.")
                 await publish_seating(ctx, chat, g)
                 break
@@ -15458,6 +10156,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
 
     if data == "settings_menu" and uid == g.god_id:
+        _seating_render_forget(chat)
         await ctx.bot.edit_message_reply_markup(
             chat_id=chat,
             message_id=g.last_seating_msg_id,
@@ -15466,6 +10165,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         return
 
     if data == "back_to_main" and uid == g.god_id:
+        _seating_render_forget(chat)
         await ctx.bot.edit_message_reply_markup(
             chat_id=chat,
             message_id=g.last_seating_msg_id,
@@ -15494,7 +10194,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         if uid != g.god_id:
             return
         g.vote_type = "awaiting_time"
-        store.save()
+        store.save(chat)
         await ctx.bot.send_message(
             chat,
             "🕒 ساعت شروع را بنویس (مثال: 22:30):",
@@ -15531,7 +10231,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             "ended": []
         })
         store.group_stats[chat]["started"].append(now)
-        store.save()
+        store.save(chat)
         if g.scenario:
             keyboard = InlineKeyboardMarkup([
                 [
@@ -15546,13 +10246,13 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             )
             g.shuffle_prompt_msg_id = msg.message_id
             g.awaiting_shuffle_decision = True
-            store.save()
+            store.save(chat)
             return
 
  
         g.awaiting_scenario = True
         g.from_startgame = False
-        store.save()
+        store.save(chat)
         await show_scenario_selection(ctx, chat, g)
         return
 
@@ -15565,7 +10265,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         g.awaiting_shuffle_decision = False
         g.from_startgame = False
-        store.save()
+        store.save(chat)
 
         prompt_id = g.shuffle_prompt_msg_id 
         if prompt_id:
@@ -15592,7 +10292,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         g.preview_uid_to_role = None
         g.shuffle_repeats = None
-        store.save()
+        store.save(chat)
         return
 
 
@@ -15605,7 +10305,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         g.awaiting_shuffle_decision = False
         g.from_startgame = False
-        store.save()
+        store.save(chat)
 
         prompt_id = g.shuffle_prompt_msg_id  
         if prompt_id:
@@ -15631,7 +10331,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         g.preview_uid_to_role = None
         g.shuffle_repeats = None
-        store.save()
+        store.save(chat)
         return
 
     # ورود به حالت اخطار
@@ -15642,7 +10342,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             g.warnings = {}
         g.warning_mode = True
         g.pending_warnings = dict(g.warnings)  # ویرایش روی کپی
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode="warn")
         return
 
@@ -15663,7 +10363,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             
             nxt = cur + 1
             g.pending_warnings[seat] = nxt
-            store.save()
+            store.save(chat)
             await publish_seating(ctx, chat, g, mode="warn")
         return
 
@@ -15685,7 +10385,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             nxt = max(cur - 1, 0) 
             
             g.pending_warnings[seat] = nxt
-            store.save()
+            store.save(chat)
             await publish_seating(ctx, chat, g, mode="warn")
         return
 
@@ -15701,7 +10401,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         }
         g.warning_mode = False
         g.pending_warnings = {}
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode=CTRL)
         return
 
@@ -15709,7 +10409,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if data == "warn_back" and g.warning_mode and uid == g.god_id:
         g.warning_mode = False
         g.pending_warnings = {}
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode=CTRL)
         return
 
@@ -15792,7 +10492,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             g.sh_council_votes = {}
             g.sh_council_sel = {}
             g.sh_council_done = False
-            store.save()
+            store.save(chat)
             await _sh_vote_msg(
                 ctx, chat, g,
                 "⚔️ <b>رأی‌گیریِ شاهنامه</b> — از صندلی ۱ به‌ترتیب: شماره‌ی صندلیِ موردِ نظرت "
@@ -15820,7 +10520,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             g.kp_deng_unread = set()
             g.kp_deng_cands = []
             g.kp_deng_result = None
-            store.save()
+            store.save(chat)
             await _kp_round_msg(
                 ctx, chat, g,
                 "🤝 <b>انتخابِ معتمدِ کاپو</b> — از صندلی ۱ به‌ترتیب: "
@@ -15849,7 +10549,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             g.nem_deng_first = None
             g.nem_deng_cands = []
             g.nem_deng_result = None
-            store.save()
+            store.save(chat)
             await _deng_round_msg(
                 ctx, chat, g,
                 "🗳 <b>شمارشِ دنگِ نمایندگی</b> — از صندلی ۱ به‌ترتیب: "
@@ -15865,7 +10565,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                 return
             g.baz_button_used = True   # ♻️ یک‌بارمصرف — دکمه از پنل غیب می‌شود
             g.baz_day_choice = None
-            store.save()
+            store.save(chat)
             await _baz_trigger(ctx, chat, g)
             try:
                 await publish_seating(ctx, chat, g, mode=CTRL)
@@ -15875,7 +10575,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         if data == "ctl_kick":
             # 👢 کیکِ روز — دکمه‌های پنل عوض می‌شوند (مثلِ خط‌زدن)
             g.pending_kicks = set()
-            store.save()
+            store.save(chat)
             await publish_seating(ctx, chat, g, mode="kick")
             return
         if data == "ctl_maarefe":
@@ -15905,7 +10605,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             return
         g.awaiting_scenario_change = True
         g.pending_size = None
-        store.save()
+        store.save(chat)
         await set_hint_and_kb(ctx, chat, g, "ابتدا ظرفیت را انتخاب کنید:", kb_choose_sizes(), mode=REG if g.phase=="idle" else CTRL)
         return
 
@@ -15914,7 +10614,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         g.awaiting_scenario_change = False
         g.pending_size = None
         g.ui_hint = None
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode=REG if g.phase=="idle" else CTRL)
         return
 
@@ -15925,7 +10625,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         except:
             return
         g.pending_size = size
-        store.save()
+        store.save(chat)
         await set_hint_and_kb(ctx, chat, g,
                               f"سناریوی {size}نفره را انتخاب کنید:",
                               kb_choose_scenarios_for(size),
@@ -15960,7 +10660,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         g.awaiting_scenario_change = False
         g.pending_size = None
         g.ui_hint = None
-        store.save()
+        store.save(chat)
 
         # نمایش لیست با ظرفیت/سناریوی جدید
         await set_hint_and_kb(
@@ -15974,13 +10674,11 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     # اگر وسط انتخاب سناریو بود و گفت «ظرفیت دیگر»
     if data == "scchange_again" and getattr(g, "awaiting_scenario_change", False):
         g.pending_size = None
-        store.save()
+        store.save(chat)
         await set_hint_and_kb(ctx, chat, g, "ظرفیت را انتخاب کنید:", kb_choose_sizes(), mode=REG if g.phase=="idle" else CTRL)
         return
 
  
-
-
     # ─── خریداری – شروع در پی‌وی گاد ─────────────────────────────
     if data == "purchase_menu" and uid == g.god_id:
         # حذف کیبورد قدیمی از پی‌وی گاد تا کلیک روی لیست قدیمی ممکن نباشد
@@ -15993,7 +10691,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         alive = [s for s in sorted(g.seats) if s not in (g.striked or set())]
         g.purchased_player = None
-        store.save()
+        store.save(chat)
 
         kb = kb_pick_purchase(alive, None)
 
@@ -16004,7 +10702,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                 reply_markup=kb
             )
             g.purchase_pm_msg_id = msg.message_id
-            store.save()
+            store.save(chat)
         except Exception:
             await ctx.bot.send_message(
                 chat,
@@ -16024,7 +10722,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             return
 
         g.purchased_player = s
-        store.save()
+        store.save(chat)
 
         try:
             await ctx.bot.edit_message_reply_markup(
@@ -16062,12 +10760,12 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         except Exception:
             pass
 
-        store.save()
+        store.save(chat)
 
         # 🔗 اگر اتاق مافیا فعال است: از گاد بپرس لینک برای خریداری‌شده برود یا نه
         if getattr(g, "mafia_room_id", None):
             g.buy_link_seat = seat
-            store.save()
+            store.save(chat)
             kb = InlineKeyboardMarkup([[
                 InlineKeyboardButton("✅ بله، لینک برود", callback_data="buylink_yes"),
                 InlineKeyboardButton("🚫 خیر", callback_data="buylink_no"),
@@ -16086,7 +10784,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             pass
 
         g.purchased_player = None
-        store.save()
+        store.save(chat)
         await ctx.bot.send_message(uid, "↩️ عملیات خریداری لغو شد.")
         return
 
@@ -16101,7 +10799,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         g.temp_winner = None
         g.chaos_mode = False
         g.chaos_selected = set()
-        store.save()
+        store.save(chat)
 
         await set_hint_and_kb(ctx, chat, g, "برنده را انتخاب کنید.", kb_endgame_root(g))
         return
@@ -16114,7 +10812,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         g.chaos_mode = False
         g.chaos_selected = set()
         g.ui_hint = None  # 👈 برای اینکه متن راهنما روی لیست اصلی باقی نمونه
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode=CTRL)
         return
     if data in {
@@ -16123,7 +10821,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     } and g.awaiting_winner:
         g.temp_winner = data
         g.chaos_mode = data.endswith("_chaos")
-        store.save()
+        store.save(chat)
 
         if data == "winner_indep":
             # مستقل → مستقیم تأیید (بدون خریداری یا کی‌آس)
@@ -16172,7 +10870,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         # 🌀 کی‌آسِ خودکار → کی‌آسی‌ها همان زنده‌ها هستند؛ مستقیم تأیید
         if getattr(g, "chaos_auto", False):
             g.chaos_selected = set(alive)
-            store.save()
+            store.save(chat)
             _names = "، ".join(f"{s}. {g.seats[s][1]}" for s in alive)
             kb = InlineKeyboardMarkup([
                 [InlineKeyboardButton("✅ تأیید", callback_data="confirm_winner")],
@@ -16212,7 +10910,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                     await safe_q_answer(q, "حداکثر ۳ نفر!", show_alert=True)
                 else:
                     g.chaos_selected.add(s)
-            store.save()
+            store.save(chat)
 
         kb = kb_pick_multi_seats(
             alive, g.chaos_selected, 3,
@@ -16265,14 +10963,13 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         # در صورت حالت کی‌آس، g.chaos_selected قبلاً تنظیم شده
         g.temp_winner = None
-        store.save()
+        store.save(chat)
 
         await announce_winner(ctx, update, g)
         await reset_game(update=update)
         return
 
 
-
     # ─── اگر بازی پایان یافته، دیگر ادامه نده ────────────────────
     if g.phase == "ended":
         return
@@ -16294,7 +10991,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     if data == "autovote_stop" and uid == g.god_id:
         g.auto_vote_running = False
-        store.save()
+        store.save(chat)
         await ctx.bot.send_message(chat, "⏹ رأی‌گیریِ اتومات بعد از همین نفر متوقف می‌شود.")
         return
 
@@ -16306,11 +11003,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         first_id = getattr(g, "first_vote_msg_id_initial", None)
         last_id  = getattr(g, "last_vote_msg_id_initial", None)
         if first_id and last_id:
-            for mid in range(first_id, last_id + 1):
-                try:
-                    await ctx.bot.delete_message(chat_id=chat, message_id=mid)
-                except:
-                    pass
+            await delete_messages_bulk(ctx.bot, chat, message_ids_between(chat, first_id - 1, last_id + 1))
         await ctx.bot.send_message(chat, "🧹 رأی‌گیری اولیه پاک شد.")
         return
     if data == "clear_vote_final" and uid == g.god_id:
@@ -16320,11 +11013,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         first_id = getattr(g, "first_vote_msg_id_final", None)
         last_id  = getattr(g, "last_vote_msg_id_final", None)
         if first_id and last_id:
-            for mid in range(first_id, last_id + 1):
-                try:
-                    await ctx.bot.delete_message(chat_id=chat, message_id=mid)
-                except:
-                    pass
+            await delete_messages_bulk(ctx.bot, chat, message_ids_between(chat, first_id - 1, last_id + 1))
         await ctx.bot.send_message(chat, "🧹 رأی‌گیری نهایی پاک شد.")
         return
     # ────────────────────────────────────────────────────────────
@@ -16350,21 +11039,19 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         choice = random.choice(deck)
         deck.remove(choice)
         g.remaining_cards[scn] = deck
-        store.save()
+        store.save(chat)
 
         await ctx.bot.send_message(chat, f"🃏 کارت انتخاب‌شده:\n<b>{choice}</b>", parse_mode="HTML")
         return
 
 
-
-
     # ────────────────────────────────────────────────────────────
     #  بخش‌های قدیمی (seat_ / cancel_ / strike_out / …)
     # ────────────────────────────────────────────────────────────
 
     if data == "strike_out" and uid == g.god_id:
         g.pending_strikes = set(g.striked)
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode="strike")
         return
 
@@ -16372,7 +11059,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         _newly = set(g.pending_strikes) - set(g.striked or set())
         g.striked = set(g.pending_strikes)
         g.pending_strikes = set()
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode=CTRL)
         # 🎯 خطِ دستیِ روزِ ۱ روی شهروند → حدسِ ۳ مافیا (گاردها داخل تابع)
         if getattr(g, "night_number", 0) == 0:
@@ -16387,7 +11074,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             g.pending_strikes.remove(seat)
         else:
             g.pending_strikes.add(seat)
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode="strike")
         return
 
@@ -16405,7 +11092,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             if g.seats[s][0] not in (g.night_burned_uids or set()):
                 g.night_burned.add(s)
                 g.night_burned_uids.add(g.seats[s][0])
-            _bd = record_kick(g.seats[s][0], g.seats[s][1])   # 👢 شمارشِ کیک
+            _bd = await gist_run(record_kick, g.seats[s][0], g.seats[s][1])   # 👢 شمارشِ کیک
             try:
                 await ctx.bot.send_message(
                     chat, f"👢 {s}. {escape(g.seats[s][1], quote=False)} کیک شد — ساید: <b>{_kside}</b>"
@@ -16415,14 +11102,14 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             except Exception:
                 pass
             await _night_report(ctx, g, f"👢 کیکِ روز: <b>{s}. {escape(g.seats[s][1], quote=False)}</b> ({_kside})")
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode=CTRL)
         await _check_auto_end(ctx, chat, g)   # 🏁
         return
 
     if data == "kick_back" and uid == g.god_id:
         g.pending_kicks = set()
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode=CTRL)
         return
 
@@ -16433,7 +11120,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                 g.pending_kicks.discard(seat)
             else:
                 g.pending_kicks.add(seat)
-            store.save()
+            store.save(chat)
             await publish_seating(ctx, chat, g, mode="kick")
         return
 
@@ -16464,7 +11151,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         except Exception:
             await ctx.bot.send_message(chat,"⚠️ خطا در رندوم نقش.")
 
-        store.save()
+        store.save(chat)
         return
 
     if data == "cleanup" and uid == g.god_id:
@@ -16483,7 +11170,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         g.adding_scenario_step = "name"
         g.adding_scenario_data = {}
         g.adding_scenario_last = datetime.now()
-        store.save()
+        store.save(chat)
         await ctx.bot.send_message(chat, "📝 نام سناریوی جدید را بفرستید (۵ دقیقه فرصت دارید).")
         return
 
@@ -16492,7 +11179,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         if not await _is_god_or_admin(ctx, chat, uid, g):
             return
         g.awaiting_event_title = True
-        store.save()
+        store.save(chat)
         await ctx.bot.send_message(
             chat,
             "📝 موضوع رویداد را بنویسید (مثلاً: تولد).\n"
@@ -16519,7 +11206,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         g.vote_logs = {}
         g.current_vote_target = None
         g.voted_targets = set()
-        store.save()
+        store.save(chat)
 
         await set_hint_and_kb(ctx, chat, g, None, control_keyboard(g), mode=CTRL)
         await start_vote(ctx, chat, g, "initial_vote")
@@ -16554,7 +11241,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                 )
                 polls.append((poll_msg.message_id, list(seats_chunk)))
                 g.last_poll_ids = getattr(g, "last_poll_ids", []) + [poll_msg.message_id]
-                store.save()
+                store.save(chat)
             except Exception as e:
                 print(f"❌ poll send error (part {idx}):", e)
 
@@ -16586,7 +11273,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         await ctx.bot.send_message(chat, "\n".join(lines), parse_mode="HTML")
 
         g.vote_order = list(alive)
-        store.save()
+        store.save(chat)
         await _offer_auto_defense(ctx, chat, g, counts=counts)
         return
 
@@ -16601,7 +11288,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if data == "back_vote_init" and uid == g.god_id:
         g.phase = "voting_selection"
         g.voted_targets = set()  # 🧹 پاک کردن صندلی‌های قبلاً رأی‌گیری‌شده
-        store.save()
+        store.save(chat)
         await ctx.bot.send_message(chat, "↩️ مجدداً کاندید رأی‌گیری را انتخاب کنید.")
         await start_vote(ctx, chat, g, "initial_vote")
         return
@@ -16618,7 +11305,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             pass
         if not seats_list:
             await ctx.bot.send_message(chat, "ℹ️ لیست دفاعیه خالی است؛ از دکمه‌ی «رأی نهایی» استفاده کن.")
-            store.save()
+            store.save(chat)
             return
         g.votes_cast = {}
         g.vote_logs = {}
@@ -16630,7 +11317,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         g.voted_targets = set()
         g.defense_seats = list(seats_list)
         g.vote_type = "defense_selected"
-        store.save()
+        store.save(chat)
         await ctx.bot.send_message(chat, f"🛡 صندلی‌های دفاع: {'، '.join(map(str, g.defense_seats))}")
         await start_vote(ctx, chat, g, "final")
         await publish_seating(ctx, chat, g, mode=CTRL)
@@ -16638,7 +11325,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     if data == "autofinal_no" and uid == g.god_id:
         g.pending_defense = []
-        store.save()
+        store.save(chat)
         try:
             await ctx.bot.edit_message_reply_markup(chat, q.message.message_id, reply_markup=None)
         except Exception:
@@ -16652,12 +11339,12 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         g.vote_logs = {}
         g.current_vote_target = None
         g.voted_targets = set()
-        store.save()
+        store.save(chat)
 
         # آماده‌سازی مرحله انتخاب دفاع
         g.vote_type = "awaiting_defense"
         g.defense_selection = []  # ترتیب انتخاب ذخیره میشه
-        store.save()
+        store.save(chat)
 
         await set_hint_and_kb(
             ctx, chat, g,
@@ -16679,7 +11366,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         else:
             g.defense_selection.append(seat)
 
-        store.save()
+        store.save(chat)
         await set_hint_and_kb(
             ctx, chat, g,
             "🧍 صندلی‌های دفاع را انتخاب کنید و سپس «تأیید» را بزنید:",
@@ -16695,7 +11382,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         g.defense_seats = list(g.defense_selection)
         g.vote_type = "defense_selected"
-        store.save()
+        store.save(chat)
 
         await ctx.bot.send_message(
             chat,
@@ -16711,7 +11398,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if data == "def_back" and uid == g.god_id and g.vote_type == "awaiting_defense":
         g.vote_type = None
         g.defense_selection = []
-        store.save()
+        store.save(chat)
         await publish_seating(ctx, chat, g, mode=CTRL)
         return
 
@@ -16769,7 +11456,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         elif data == "confirm_status":
             g.status_mode = False
-            store.save()
+            store.save(chat)
 
             c = g.status_counts.get("citizen", 0)
             m = g.status_counts.get("mafia", 0)
@@ -16782,7 +11469,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             return
 
         if changed:
-            store.save()
+            store.save(chat)
             await publish_seating(ctx, chat, g, mode="status")
         return
 
@@ -16790,7 +11477,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         if uid != g.god_id:
             return
 
-        mafia_roles = {_nz(x) for x in load_mafia_roles()}
+        mafia_roles = mafia_role_norms()
         dead_seats = [s for s in g.striked]
         mafia_count = 0
         citizen_count = 0
@@ -16805,7 +11492,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         # ذخیره برای نمایش در لیست
         g.status_counts = {"citizen": citizen_count, "mafia": mafia_count}
         g.status_mode = False
-        store.save()
+        store.save(chat)
 
         await ctx.bot.send_message(
             chat,
@@ -16837,7 +11524,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         g.phase = "defense_selection"
         g.vote_type = None
         g.voted_targets = set()
-        store.save()
+        store.save(chat)
         return
     if data.startswith("vote_"):
         if uid != g.god_id:
@@ -16870,7 +11557,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         g.awaiting_rerandom_decision = True
         g.rerandom_prompt_msg_id = msg.message_id
-        store.save()
+        store.save(chat)
 
         asyncio.create_task(_delete_rerandom_prompt_after(ctx, chat, g, msg.message_id, 30))
         return
@@ -16889,7 +11576,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         g.awaiting_rerandom_decision = False
         g.rerandom_prompt_msg_id = None
-        store.save()
+        store.save(chat)
         return
     if data == "rerandom_roles_yes":
         if uid != g.god_id:
@@ -16906,7 +11593,7 @@ async def callback_router(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         g.awaiting_rerandom_decision = False
         g.rerandom_prompt_msg_id = None
-        store.save()
+        store.save(chat)
 
         # ✅ رندوم مجدد نقش‌ها بدون شافل صندلی‌ها
         await shuffle_and_assign(
@@ -16974,6 +11661,37 @@ def kick_button_markup(g: GameState) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
+# 📨 پخشِ نقش در پیوی: همه‌ی بازیکن‌ها هم‌زمان، ولی حداکثر ROLE_DM_CONCURRENCY تا در جریان.
+#    سقفِ سرعت و RetryAfter با صفِ خروجی (OutboundLimiter) است.
+#    استیکر و متنِ هر بازیکن پشتِ سرِ هم می‌روند تا ترتیبشان در پیوی به هم نخورد.
+ROLE_DM_CONCURRENCY = 8
+
+
+async def _role_dm_fanout(ctx, jobs) -> dict:
+    """jobs: [(seat, uid, sticker_id | None, text)] → {seat: (رسید؟, ثانیه تا رسیدنِ متن)}."""
+    sem = asyncio.Semaphore(ROLE_DM_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+
+    async def _one(seat, uid, sticker, text):
+        async with sem:
+            if sticker:
+                try:
+                    await ctx.bot.send_sticker(uid, sticker, rate_limit_args=OUT_HIGH)
+                except Exception:
+                    pass
+            try:
+                await ctx.bot.send_message(uid, text, rate_limit_args=OUT_HIGH)
+                return seat, (True, loop.time() - t0)
+            except telegram.error.Forbidden:
+                return seat, (False, loop.time() - t0)
+            except Exception as e:
+                print("⚠️ role dm:", uid, e)
+                return seat, (False, loop.time() - t0)
+
+    return dict(await asyncio.gather(*(_one(*j) for j in jobs)))
+
+
 async def shuffle_and_assign(
     ctx,
     chat_id: int,
@@ -17002,7 +11720,7 @@ async def shuffle_and_assign(
     # 3) حالت پیش‌نمایش: فقط نگاشت را ذخیره کن و خارج شو (هیچ پیام/تغییری اعمال نکن)
     if preview_mode:
         g.preview_uid_to_role = uid_to_role
-        store.save()
+        store.save(chat_id)
         return uid_to_role
 
     # 4) نهایی‌سازی: در صورت نیاز، صندلی‌ها را به تعداد مشخص شافل کن
@@ -17018,20 +11736,15 @@ async def shuffle_and_assign(
         seat: uid_to_role[g.seats[seat][0]]
         for seat in g.seats
     }
+    _scenario_bind(g)   # 🧩 گیمر از روی نقش‌ها تشخیص داده می‌شود
 
     # کش ساید هر صندلی در لحظه تخصیص نقش (برای ثبت آمار قابل اعتماد در پایان بازی)
-    _mr = {_nz(x) for x in load_mafia_roles()}                    # نرمالایز (عربی/فارسی)
-    _ir_all = load_indep_roles()
-    _indep = {_nz(x) for x in (_ir_all.get(g.scenario.name, []) if g.scenario else [])}
-    g.seat_sides = {}
-    for _seat, (_uid, _name) in g.seats.items():
-        _role = _nz(g.assigned_roles.get(_seat, "—"))
-        if _role in _mr:
-            g.seat_sides[_seat] = "مافیا"
-        elif _role in _indep:
-            g.seat_sides[_seat] = "مستقل"
-        else:
-            g.seat_sides[_seat] = "شهر"
+    await arole_registry()
+    _scn_name = g.scenario.name if g.scenario else None
+    g.seat_sides = {
+        _seat: role_side(g.assigned_roles.get(_seat, "—"), _scn_name)
+        for _seat in g.seats
+    }
 
     # 🔄 نقش‌های جدید = صفرشدنِ هرچه به نقش/سایدِ قبلی وابسته بود
     #    (بارِ اول همه‌چیز خالی است و بی‌اثر؛ در رندوم/پخشِ مجدد ریستِ واقعی است)
@@ -17174,43 +11887,47 @@ async def shuffle_and_assign(
                 "🔄 نقش‌ها از نو پخش شد — اعضای قبلیِ اتاق مافیا حذف و لینک باطل شد؛ دوباره «🎭 معارفه» بزن.")
         except Exception:
             pass
-    store.save()
+    store.save(chat_id, durable=True)   # 🎭 نقش‌ها پخش شد — فوراً روی دیسک
 
-    # 6) ارسال نقش‌ها به بازیکن‌ها (اختیاری) و ساخت لاگ برای گاد
+    # 6) ارسال نقش‌ها به بازیکن‌ها (اختیاری، همه با هم) و ساخت لاگ برای گاد
     log, unreachable = [], []
-    stickers = load_stickers()
+    delivery, took = {}, 0.0
+    stickers = await gist_load(load_stickers)
     if notify_players:
-        try:
-            group_title = (await ctx.bot.get_chat(chat_id)).title or str(chat_id)
-        except Exception:
-            group_title = str(chat_id)
+        meta = await chat_meta(ctx.bot, chat_id)
+        group_title = (meta.title if meta else None) or str(chat_id)
         scenario_name = getattr(g.scenario, "name", "—")
+        jobs = []
         for seat in sorted(g.seats):
             uid, name = g.seats[seat]
             role = g.assigned_roles[seat]
-            if role in stickers:
-                try:
-                    await ctx.bot.send_sticker(uid, stickers[role])
-                except:
-                    pass
             role_msg = (
                 f"گروه: {group_title}\n"
                 f"سناریو: {scenario_name}\n"
                 f"نقش: {role}"
             )
-            try:
-                await ctx.bot.send_message(uid, role_msg)
-            except telegram.error.Forbidden:
-                unreachable.append(name)
+            jobs.append((seat, uid, stickers.get(role), role_msg))
+        t0 = time.perf_counter()
+        delivery = await _role_dm_fanout(ctx, jobs)
+        took = time.perf_counter() - t0
 
     for seat in sorted(g.seats):
         uid, name = g.seats[seat]
         role = g.assigned_roles[seat]
-        log.append(f"{seat:>2}. <a href='tg://user?id={uid}'>{name}</a> → {role}")
+        line = f"{seat:>2}. <a href='tg://user?id={uid}'>{name}</a> → {role}"
+        if seat in delivery:
+            ok, sec = delivery[seat]
+            line += f"  ✅ {sec:.1f}s" if ok else "  ⚠️"
+            if not ok:
+                unreachable.append(name)
+        log.append(line)
 
 
     if g.god_id:
         text = "👑 خلاصهٔ نقش‌ها:\n" + "\n".join(log)
+        if delivery:
+            sent = sum(1 for ok, _ in delivery.values() if ok)
+            text += f"\n📨 {sent}/{len(delivery)} پیام در {took:.1f} ثانیه"
         if unreachable:
             text += "\n⚠️ نشد برای این افراد پیام بفرستم: " + ", ".join(unreachable)
         try:
@@ -17220,15 +11937,12 @@ async def shuffle_and_assign(
 
     # 7) به‌روزرسانی فاز و UI
     g.phase = "playing"
-    store.save()
+    store.save(chat_id)
     await publish_seating(ctx, chat_id, g, mode=CTRL)
 
     return uid_to_role
 
 
-
-
-
 async def handle_simple_seat_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     msg = update.message
     chat_id = msg.chat.id
@@ -17267,7 +11981,7 @@ async def handle_simple_seat_command(update: Update, ctx: ContextTypes.DEFAULT_T
 
     name = g.user_names.get(uid, "ناشناس")
     g.seats[seat_no] = (uid, name)
-    store.save()
+    store.save(chat_id)
     await publish_seating(ctx, chat_id, g)
     await ctx.bot.send_message(chat_id, f"✅ ثبت‌نام برای صندلی {seat_no} با نام «{name}» انجام شد.")
 
@@ -17284,14 +11998,14 @@ async def _try_set_event_title(ctx, chat_id: int, uid: int, g: GameState, text:
 
     if text.strip() in ("حذف", "حذف موضوع", "پاک"):
         g.event_title = None
-        store.save()
+        store.save(chat_id)
         await publish_seating(ctx, chat_id, g, mode=mode)
         await ctx.bot.send_message(chat_id, "✅ موضوع رویداد حذف شد.")
         return True
 
     title = text.strip()[:40]
     g.event_title = title
-    store.save()
+    store.save(chat_id)
     await publish_seating(ctx, chat_id, g, mode=mode)
     await ctx.bot.send_message(
         chat_id, f"✅ موضوع رویداد روی «{escape(title, quote=False)}» تنظیم شد."
@@ -17335,7 +12049,7 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             if _bv is not None:
                 g.baz_duel_votes[uid] = _bv
                 g.baz_duel_unread.discard(uid)
-                store.save()
+                store.save(chat_id)
                 # ✅ همه‌ی زنده‌ها (به‌جز دو طرف) رأی دادند → شمارشِ خودکار، بدونِ نیاز به دکمه
                 _dp = getattr(g, "baz_duel_pair", []) or []
                 _need = [x for x in _alive_seats(g) if x not in _dp]
@@ -17345,7 +12059,7 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             if uid not in (g.baz_duel_votes or {}):
                 _first = uid not in (g.baz_duel_unread or set())
                 g.baz_duel_unread.add(uid)
-                store.save()
+                store.save(chat_id)
                 if _first:
                     _p = list(getattr(g, "baz_duel_pair", []) or [])
                     try:
@@ -17370,7 +12084,7 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                 and _gseat not in (g.striked or set())):
             if _nz(text) == _nz("گان") or "🔫" in text:
                 g.tk_gun_aiming = _gseat
-                store.save()
+                store.save(chat_id)
                 try:
                     await msg.reply_text(f"🔫 {_gseat}. {g.seats[_gseat][1]} — "
                                          f"چه شخصی را شلیک می‌کنی؟ (شماره‌ی صندلی)")
@@ -17404,7 +12118,7 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             if getattr(g, "sh_bow_pending", None) is None:
                 if _nz(text) == _nz("کمان") or "🏹" in text:
                     g.sh_bow_aiming = _bseat
-                    store.save()
+                    store.save(chat_id)
                     try:
                         await msg.reply_text(f"🏹 {_bseat}. {g.seats[_bseat][1]} — "
                                              f"به چه شخصی شلیک می‌کنی؟ (شماره‌ی صندلی)")
@@ -17458,7 +12172,7 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         g.event_time = text
         g.vote_type = None
-        store.save()
+        store.save(chat_id)
         await publish_seating(ctx, chat_id, g)
         await ctx.bot.send_message(chat_id, f"✅ ساعت رویداد روی {text} تنظیم شد.")
         return
@@ -17511,7 +12225,7 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                 # جابجایی
                 del g.seats[existing_seat]
                 g.seats[seat_no] = (uid, final_name)
-                store.save()
+                store.save(chat_id)
                 await publish_seating(ctx, chat_id, g)
                 await ctx.bot.send_message(
                     chat_id,
@@ -17521,7 +12235,7 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
             # ثبت‌نام جدید
             g.seats[seat_no] = (uid, final_name)
-            store.save()
+            store.save(chat_id)
             await publish_seating(ctx, chat_id, g)
             await ctx.bot.send_message(
                 chat_id,
@@ -17533,7 +12247,7 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         for seat, (player_uid, _) in list(g.seats.items()):
             if player_uid == uid:
                 del g.seats[seat]
-                store.save()
+                store.save(chat_id)
                 await ctx.bot.send_message(chat_id, "❎ ثبت‌نام شما با موفقیت لغو شد.")
                 await publish_seating(ctx, chat_id, g)
                 break
@@ -17566,12 +12280,12 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         # ── تغییر نام گاد (صندلی نمادین ۰) ──
         if target_seat == 0:
             g.god_name = text
-            store.save()
+            store.save(chat_id)
             mode = CTRL if g.phase != "idle" else REG
             await publish_seating(ctx, chat_id, g, mode=mode)
             await ctx.bot.send_message(chat_id, f"✅ نام راوی به «{text}» تغییر کرد.")
             try:
-                save_usernames_to_gist(g.user_names)
+                await gist_run(save_usernames_to_gist, dict(g.user_names))
             except Exception:
                 pass
             return
@@ -17589,7 +12303,7 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                     changed_seat = s
                     break
 
-        store.save()
+        store.save(chat_id)
         mode = CTRL if g.phase != "idle" else REG
         await publish_seating(ctx, chat_id, g, mode=mode)
  
@@ -17602,7 +12316,7 @@ async def name_reply(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
         # نوشتن روی Gist بعد از UI (برای جلوگیری از کندی)
         try:
-            save_usernames_to_gist(g.user_names)
+            await gist_run(save_usernames_to_gist, dict(g.user_names))
         except Exception:
             pass
 
@@ -17635,7 +12349,7 @@ async def show_scenario_selection(ctx, chat_id: int, g: GameState):
     # ذخیره message_id برای حذف بعدی
     g.scenario_prompt_msg_id = scenario_msg.message_id
     g.awaiting_scenario = True
-    store.save()
+    store.save(chat_id)
 
 
 async def newgame(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
@@ -17695,18 +12409,17 @@ async def newgame(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     now = datetime.now(timezone.utc).timestamp()
     store.group_stats.setdefault(chat, {"waiting_list": [], "started": [], "ended": []})
     store.group_stats[chat]["waiting_list"].append(now)
-    store.save()
+    store.save(chat)
 
     # انتشار لیست اولیه
     await publish_seating(ctx, chat, g, mode=REG)
     # اگر سناریو پیدا نشد، انتخاب سناریو را باز کن
     if g.awaiting_scenario:
         g.from_startgame = True
-        store.save()
+        store.save(chat)
         await show_scenario_selection(ctx, chat, g)
 
 
-
 async def reset_game(ctx: ContextTypes.DEFAULT_TYPE = None, update: Update = None, chat_id: int = None):
     """ریست بازی با حفظ نام‌ها – هم قابل استفاده برای /resetgame و هم از داخل بات"""
     if update:
@@ -17731,7 +12444,7 @@ async def reset_game(ctx: ContextTypes.DEFAULT_TYPE = None, update: Update = Non
     store.games[chat_id] = GameState()
     g = store.games[chat_id]
     g.user_names = usernames
-    store.save()
+    store.save(chat_id)
 
     # اگر از طریق دستور اومده، پیام بفرست
     if update and update.message:
@@ -17761,7 +12474,6 @@ async def resetgame_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     await reset_game(ctx=ctx, update=update)
 
 
-
 async def add_seat_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if not ctx.args or not ctx.args[0].isdigit():
         await update.message.reply_text("Usage: /add <seat>")
@@ -17800,7 +12512,7 @@ async def add_seat_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     # 🧠 بررسی نام ذخیره‌شده در gist
     name = g.user_names.get(target_uid, "ناشناس")
     g.seats[seat] = (target_uid, name)
-    store.save()
+    store.save(chat)
 
     await update.message.reply_text(f"✅ صندلی {seat} با نام '{name}' به لیست اضافه شد.")
 
@@ -17836,13 +12548,12 @@ async def addscenario(update: Update, ctx):
 
     new_scenario = Scenario(name, roles)
     store.scenarios.append(new_scenario)
-    store.save()
-    save_scenarios_to_gist(store.scenarios)
+    store.save(_META_KEY)
+    await gist_run(save_scenarios_to_gist, list(store.scenarios))
 
     await update.message.reply_text(f"✅ سناریو '{name}' اضافه شد با نقش‌ها: {roles}")
 
 
-
 async def list_scenarios(update: Update, ctx):
     store.scenarios = load_scenarios_from_gist()  # 👈 بارگذاری از Gist
 
@@ -17884,8 +12595,8 @@ async def remove_scenario(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if before == after:
         await update.message.reply_text(f"⚠️ سناریویی با نام «{name}» پیدا نشد.")
     else:
-        store.save()
-        save_scenarios_to_gist(store.scenarios)
+        store.save(_META_KEY)
+        await gist_run(save_scenarios_to_gist, list(store.scenarios))
         await update.message.reply_text(f"🗑️ سناریوی «{name}» با موفقیت حذف شد.")
 
 async def play_alarm_sound(ctx, chat_id: int):
@@ -17984,6 +12695,7 @@ async def run_timer(ctx, chat: int, seconds: int, token: int | None = None):
             pass
 
 
+@callback_route("tmr_")
 async def handle_timer_callback(update, ctx):
     """⏱ دکمه‌های ریزِ تایمر زیرِ «تایم تمام شد» — فقط گاد."""
     q = update.callback_query
@@ -18094,12 +12806,12 @@ async def transfer_god_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         if old_god_id not in g.god_abandon_logged:
             g.god_abandon_logged.add(old_god_id)
             _old_name = g.user_names.get(old_god_id) or getattr(g, "god_name", None)
-            if record_god_abandon(old_god_id, _old_name):
+            if await gist_run(record_god_abandon, old_god_id, _old_name):
                 print(f"🚪 god abandon logged for {old_god_id}")
 
     g.god_id = target.id
     g.god_name = new_name
-    store.save()
+    store.save(chat)
 
     # 🔗 اتاق مافیا: گادِ قبلی حذف + چرخش لینک، لینکِ جدید به گادِ جدید
     if getattr(g, "mafia_room_id", None):
@@ -18267,6 +12979,7 @@ async def open_admin_panel(ctx, uid):
         parse_mode="HTML", reply_markup=_adm_panel_kb())
 
 
+@callback_route("adm_")
 async def handle_admin_panel_callback(update, ctx):
     q = update.callback_query
     uid = q.from_user.id
@@ -18344,17 +13057,14 @@ async def handle_admin_panel_callback(update, ctx):
             return
         lines = [f"🌍 <b>گروه‌های فعال ({len(gs_)})</b>:"]
         for cid in gs_:
-            try:
-                ch = await bot.get_chat(cid)
-                nm = escape(ch.title or str(cid), quote=False)
-            except Exception:
-                nm = "—"
+            ch = await chat_meta(bot, cid)
+            nm = escape((ch.title if ch else None) or str(cid), quote=False) if ch else "—"
             lines.append(f"• <code>{cid}</code> — {nm}")
         await _adm_send(ctx, uid, "\n".join(lines))
         return
 
     if data == "adm_mafia":
-        roles = sorted(load_mafia_roles() or [])
+        roles = sorted((await gist_load(load_mafia_roles)) or [])
         await _adm_send(ctx, uid,
                         ("😈 <b>نقش‌های مافیا</b>:\n" + "\n".join(f"• {escape(r, quote=False)}"
                                                                   for r in roles))
@@ -18362,7 +13072,7 @@ async def handle_admin_panel_callback(update, ctx):
         return
 
     if data == "adm_indep":
-        d = load_indep_roles() or {}
+        d = (await gist_load(load_indep_roles)) or {}
         if not d:
             await _adm_send(ctx, uid, "🕵️ هیچ نقشِ مستقلی ثبت نشده.")
             return
@@ -18374,7 +13084,7 @@ async def handle_admin_panel_callback(update, ctx):
         return
 
     if data == "adm_cards":
-        d = load_cards() or {}
+        d = (await gist_load(load_cards)) or {}
         if not d:
             await _adm_send(ctx, uid, "🃏 هیچ کارتی ثبت نشده.")
             return
@@ -18385,7 +13095,7 @@ async def handle_admin_panel_callback(update, ctx):
         return
 
     if data == "adm_season":
-        stats = load_player_stats()
+        stats = (await gist_load(load_player_stats))
         if stats is None:
             await _adm_send(ctx, uid, "⚠️ آمار خوانده نشد (خطای جیست) — دوباره بزن.")
             return
@@ -18403,11 +13113,11 @@ async def handle_admin_panel_callback(update, ctx):
         return
 
     if data == "adm_bans":
-        bans = load_god_bans()
+        bans = (await gist_load(load_god_bans))
         if bans is None:
             await _adm_send(ctx, uid, "⚠️ فهرستِ محرومیت‌ها خوانده نشد (خطای جیست) — دوباره بزن.")
             return
-        stats = load_player_stats() or {}
+        stats = (await gist_load(load_player_stats)) or {}
         now = datetime.now(timezone.utc).timestamp()
 
         def _nm(k):
@@ -18461,28 +13171,28 @@ async def handle_stats_pm(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         return
     # دکمه‌های کیبورد ایموجی دارند («📊 آمار من») → تطبیقِ پسوندی
     if text.endswith("آمار من"):
-        stats = load_player_stats() or {}
+        stats = (await gist_load(load_player_stats)) or {}
         p = stats.get(str(uid))
         if not p or (p.get("games", 0) == 0 and p.get("god_games", 0) == 0):
             await msg.reply_text("📭 هنوز آماری برای شما ثبت نشده است.")
         else:
             await msg.reply_text(format_player_stats(p), parse_mode="HTML")
     elif text.endswith("آمار کل"):
-        board = build_alltime_leaderboard_text(load_player_stats() or {})
+        board = build_alltime_leaderboard_text((await gist_load(load_player_stats)) or {})
         if not board:
             await msg.reply_text("📭 هنوز آماری ثبت نشده است.")
         else:
             await msg.reply_text(board, parse_mode="HTML")
     elif text.endswith("بازی من"):
-        rows = (load_game_history() or {}).get(str(uid), [])
+        rows = ((await gist_load(load_game_history)) or {}).get(str(uid), [])
         if not rows:
             await msg.reply_text("📭 از زمانِ فعال‌شدنِ تاریخچه، بازی‌ای برای شما ثبت نشده است.")
         else:
             await msg.reply_text(format_game_history(rows), parse_mode="HTML")
     elif text.endswith("آمار هفتگی"):
-        meta = load_weekly_meta()
+        meta = (await gist_load(load_weekly_meta))
         snapshot = meta.get("snapshot", {}) if isinstance(meta, dict) else {}
-        board = build_weekly_leaderboard_text(load_player_stats() or {}, snapshot, require_weekly=False)
+        board = build_weekly_leaderboard_text((await gist_load(load_player_stats)) or {}, snapshot, require_weekly=False)
         if not board:
             await msg.reply_text("📭 هنوز آماری برای این هفته ثبت نشده است.")
         else:
@@ -18497,11 +13207,8 @@ ROOMS_FILENAME = "mafia_rooms.json"
 
 def load_mafia_rooms() -> list:
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = httpx.get(url, headers=headers)
-        if r.status_code == 200:
-            content = r.json()["files"].get(ROOMS_FILENAME, {}).get("content", "[]")
+        content = gist_read(ROOMS_FILENAME, "[]")
+        if content is not None:
             return json.loads(content) or []
     except Exception as e:
         print("❌ load_mafia_rooms error:", e)
@@ -18510,10 +13217,7 @@ def load_mafia_rooms() -> list:
 
 def save_mafia_rooms(rooms: list):
     try:
-        url = f"https://api.github.com/gists/{GIST_ID}"
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        data = {"files": {ROOMS_FILENAME: {"content": json.dumps(rooms, ensure_ascii=False, indent=2)}}}
-        httpx.patch(url, headers=headers, json=data)
+        gist_write({ROOMS_FILENAME: json.dumps(rooms, ensure_ascii=False, indent=2)})
     except Exception as e:
         print("❌ save_mafia_rooms error:", e)
 
@@ -18540,7 +13244,7 @@ async def _room_send_link(ctx, g, uid):
     except Exception:
         pass
     g.mafia_room_members.add(uid)
-    store.save()
+    store.save(_game_chat_id(g))
     try:
         await ctx.bot.send_message(uid, f"🔗 لینک گروه مافیا:\n{g.mafia_room_link}")
     except Exception:
@@ -18572,7 +13276,7 @@ async def _room_rotate_link(ctx, g):
     try:
         link = await ctx.bot.create_chat_invite_link(g.mafia_room_id, name=f"game-{g.god_id}")
         g.mafia_room_link = link.invite_link
-        store.save()
+        store.save(_game_chat_id(g))
     except Exception:
         return
     # 🔁 لینکِ قبلیِ کسانی که هنوز جوین نشده‌اند باطل شد — لینکِ جدید را برایشان بفرست
@@ -18605,7 +13309,7 @@ async def _room_set_locked(ctx, g, locked: bool):
                 can_send_other_messages=True, can_add_web_page_previews=True)
         await ctx.bot.set_chat_permissions(g.mafia_room_id, perms)
         g.mafia_room_locked = locked
-        store.save()
+        store.save(_game_chat_id(g))
     except Exception:
         pass
 
@@ -18660,7 +13364,7 @@ async def _room_allocate(ctx, g):
                 # اتاقِ مرده (مثلاً تبدیل به سوپرگروه و تغییر آیدی) → از فهرست حذف
                 try:
                     rooms.remove(room)
-                    save_mafia_rooms(rooms)
+                    await gist_run(save_mafia_rooms, rooms)
                     print(f"🗑 اتاق مرده {room} از فهرست حذف شد.")
                 except Exception:
                     pass
@@ -18693,12 +13397,12 @@ async def _room_allocate(ctx, g):
         g.mafia_room_pending_link = []
         g.mafia_room_kicked = set()
         g.mafia_room_taken_at = datetime.now().timestamp()
-        store.save()
+        store.save(_game_chat_id(g))
         # 🔁 چرخش اتاق‌ها: اتاقِ استفاده‌شده به تهِ فهرست می‌رود
         try:
             rooms.remove(room)
             rooms.append(room)
-            save_mafia_rooms(rooms)
+            await gist_run(save_mafia_rooms, rooms)
         except Exception:
             pass
         await _room_set_locked(ctx, g, False)   # شبِ معارفه باز باشد
@@ -18759,7 +13463,7 @@ async def _room_sync_on_night(ctx, g):
     for uid in list(g.mafia_room_pending_link or []):
         await _room_send_link(ctx, g, uid)
     g.mafia_room_pending_link = []
-    store.save()
+    store.save(_game_chat_id(g))
     # 👀 هر کس هنوز جوین نشده: رفعِ بن + ارسالِ دوباره‌ی لینک + گزارش به گاد
     _in, _out = await _room_membership(ctx, g)
     if _out:
@@ -18807,7 +13511,7 @@ async def _room_cleanup(ctx, g):
     g.mafia_room_pending_link = []
     g.mafia_room_kicked = set()
     g.mafia_room_taken_at = None
-    store.save()
+    store.save(_game_chat_id(g))
 
 
 async def addroom_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
@@ -18828,7 +13532,7 @@ async def addroom_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("ℹ️ این گروه از قبل به‌عنوان اتاق مافیا ثبت شده است.")
         return
     rooms.append(chat.id)
-    save_mafia_rooms(rooms)
+    await gist_run(save_mafia_rooms, rooms)
     await update.message.reply_text(
         "✅ این گروه به‌عنوان «اتاق چت مافیا» ثبت شد.\n"
         "این گروه را «/active» نکنید. بات باید ادمین با دسترسیِ «دعوت» و «حذف اعضا» باشد.")
@@ -18839,7 +13543,7 @@ async def rooms_status_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_ID:
         return
     # 🙈 اگر خودم بازیکنِ زنده‌ی یک بازیِ در جریانم، لیست اتاق‌ها نباید لو برود
-    for _cid, _game in store.games.items():
+    for _cid, _game in store.index.games_of(update.effective_user.id):
         if getattr(_game, "phase", "idle") in ("idle", "ended"):
             continue
         _seat = _seat_of_uid(_game, update.effective_user.id)
@@ -18883,7 +13587,7 @@ async def delroom_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     rooms = load_mafia_rooms()
     if chat.id in rooms:
         rooms.remove(chat.id)
-        save_mafia_rooms(rooms)
+        await gist_run(save_mafia_rooms, rooms)
         await update.message.reply_text("🗑 این گروه از فهرست اتاق‌های مافیا حذف شد.")
     else:
         await update.message.reply_text("ℹ️ این گروه در فهرست اتاق‌ها نبود.")
@@ -18924,11 +13628,12 @@ async def _mlink_panel(ctx, g, mid=None):
     try:
         m = await ctx.bot.send_message(g.god_id, text, parse_mode="HTML", reply_markup=kb)
         g.mlink_mid = m.message_id
-        store.save()
+        store.save(_game_chat_id(g))
     except Exception as e:
         print("⚠️ mlink panel:", e)
 
 
+@callback_route("mlk_")
 async def handle_mlink_callback(update, ctx):
     """🔗 انتخابِ گیرندگانِ لینکِ اتاقِ مافیا توسطِ گاد (سناریوهای بدونِ موتور)."""
     q = update.callback_query
@@ -18937,12 +13642,12 @@ async def handle_mlink_callback(update, ctx):
     mid = q.message.message_id if q.message else None
 
     g = None
-    for _cid, game in store.games.items():
+    for _cid, game in store.index.god_games(uid):
         if game.god_id == uid and getattr(game, "mlink_mid", None) == mid:
             g = game
             break
     if g is None:
-        for _cid, game in store.games.items():
+        for _cid, game in store.index.god_games(uid):
             if game.god_id == uid and getattr(game, "assigned_roles", None) \
                     and game.phase not in ("idle", "ended"):
                 g = game
@@ -18966,7 +13671,7 @@ async def handle_mlink_callback(update, ctx):
             names.append(f"• {s}. {g.seats[s][1]} — {(g.assigned_roles or {}).get(s, '—')}")
         g.mlink_sel = sel
         g.mlink_done = True
-        store.save()
+        store.save(_game_chat_id(g))
         try:
             await ctx.bot.edit_message_text(
                 chat_id=g.god_id, message_id=mid,
@@ -18995,7 +13700,7 @@ async def handle_mlink_callback(update, ctx):
 
     await safe_q_answer(q)
     g.mlink_sel = sel
-    store.save()
+    store.save(_game_chat_id(g))
     await _mlink_panel(ctx, g, mid=mid)
 
 
@@ -19006,7 +13711,7 @@ async def do_maarefe(ctx, chat_id, g):
         return
     manual = _is_manual_scenario(g)
     g.maarefe_active = True   # شبِ معارفه (بدون اکت) — با /روز بسته می‌شود
-    store.save()
+    store.save(chat_id)
     voice_god.say(chat_id, "maarefe")          # 🎙
     await ctx.bot.send_message(chat_id, "🎭 <b>شب معارفه</b>", parse_mode="HTML")
     sides = getattr(g, "seat_sides", {}) or {}
@@ -19033,7 +13738,7 @@ async def do_maarefe(ctx, chat_id, g):
             # ✋ لینک فقط برای کسانی می‌رود که خودِ گاد در پیویش انتخاب و تأیید کند
             g.mlink_sel = set()
             g.mlink_done = False
-            store.save()
+            store.save(chat_id)
             await _mlink_panel(ctx, g)
             await ctx.bot.send_message(chat_id, "🔗 لینک گروه مافیا به پیوی گاد ارسال شد.")
         else:
@@ -19041,7 +13746,7 @@ async def do_maarefe(ctx, chat_id, g):
                 await _room_send_link(ctx, g, g.seats[s][0])
             await ctx.bot.send_message(chat_id, "🔗 لینک گروه مافیا به پیوی گاد و مافیاها ارسال شد.")
         g.maarefe_done = True   # ✅ موفق → دکمه‌ی معارفه از پنل حذف می‌شود
-        store.save()
+        store.save(chat_id)
         # ⏰ بعد از ۵ دقیقه اگر کسی جوین نشده بود، لینکِ جدید بساز و بفرست
         asyncio.create_task(_room_join_check_later(ctx, g))
     else:
@@ -19054,7 +13759,7 @@ async def do_maarefe(ctx, chat_id, g):
             # ❗ ناموفق → دکمه‌ی معارفه می‌ماند تا دوباره امتحان شود
         else:
             g.maarefe_done = True   # اتاقی تعریف نشده → معارفه بدون اتاق انجام شد
-            store.save()
+            store.save(chat_id)
 
     # 🕵️ کاوربازپرس: ناتو یک نفر را به تیم دعوت می‌کند (بعد از ساختِ لینکِ اتاق،
     #    چون گادفادرِ تازه باید همان لینک را بگیرد)
@@ -19066,7 +13771,7 @@ async def do_maarefe(ctx, chat_id, g):
         don = _find_seat_by_role(g, _R_DONC)
         if don and not g.gm_don_sentence:
             g.gm_awaiting_don_sentence = True
-            store.save()
+            store.save(chat_id)
             try:
                 await ctx.bot.send_message(
                     g.seats[don][0],
@@ -19078,7 +13783,7 @@ async def do_maarefe(ctx, chat_id, g):
         _hs = _find_seat_by_role(g, _R_HOLMES)
         if _hs and not getattr(g, "gm_holmes_sentence", None):
             g.gm_awaiting_holmes_sentence = True
-            store.save()
+            store.save(chat_id)
             try:
                 await ctx.bot.send_message(
                     g.seats[_hs][0],
@@ -19098,7 +13803,7 @@ async def do_maarefe(ctx, chat_id, g):
                     huid, "⚱️ شب معارفه — چه کسی را انتخاب می‌کنی؟ (اجباری، یک‌بار)",
                     reply_markup=_kb_night_seats(targets, g, "kp_heir_", confirm_cb="kp_heir_confirm"))
                 g.night_pm_msgs[huid] = m.message_id   # maarefe_active قبلاً ست شده تا کال‌بک پیدا شود
-                store.save()
+                store.save(chat_id)
             except Exception:
                 pass
 
@@ -19158,7 +13863,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
             if _bv is not None:
                 g.baz_duel_votes[uid] = _bv
                 g.baz_duel_unread.discard(uid)
-                store.save()
+                store.save(chat_id)
                 # ✅ همه‌ی زنده‌ها (به‌جز دو طرف) رأی دادند → شمارشِ خودکار، بدونِ نیاز به دکمه
                 _dp = getattr(g, "baz_duel_pair", []) or []
                 _need = [x for x in _alive_seats(g) if x not in _dp]
@@ -19168,7 +13873,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
             if uid not in (g.baz_duel_votes or {}):
                 _first = uid not in (g.baz_duel_unread or set())
                 g.baz_duel_unread.add(uid)
-                store.save()
+                store.save(chat_id)
                 if _first:
                     _p = list(getattr(g, "baz_duel_pair", []) or [])
                     try:
@@ -19193,7 +13898,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
                 and _gseat not in (g.striked or set())):
             if _nz(text) == _nz("گان") or "🔫" in text:
                 g.tk_gun_aiming = _gseat
-                store.save()
+                store.save(chat_id)
                 try:
                     await msg.reply_text(f"🔫 {_gseat}. {g.seats[_gseat][1]} — "
                                          f"چه شخصی را شلیک می‌کنی؟ (شماره‌ی صندلی)")
@@ -19227,7 +13932,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
             if getattr(g, "sh_bow_pending", None) is None:
                 if _nz(text) == _nz("کمان") or "🏹" in text:
                     g.sh_bow_aiming = _bseat
-                    store.save()
+                    store.save(chat_id)
                     try:
                         await msg.reply_text(f"🏹 {_bseat}. {g.seats[_bseat][1]} — "
                                              f"به چه شخصی شلیک می‌کنی؟ (شماره‌ی صندلی)")
@@ -19351,7 +14056,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
     if g.vote_type == "awaiting_time" and uid == g.god_id:
         g.event_time = text
         g.vote_type = None
-        store.save()
+        store.save(chat_id)
         await publish_seating(ctx, chat_id, g)
         await ctx.bot.send_message(chat_id, f"✅ ساعت رویداد روی {text} تنظیم شد.")
         return
@@ -19368,8 +14073,8 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
 
         g.seats[seat_no] = (uid, text)
         g.user_names[uid] = text
-        save_usernames_to_gist(g.user_names)
-        store.save()
+        await gist_run(save_usernames_to_gist, dict(g.user_names))
+        store.save(chat_id)
 
         if uid in g.last_name_prompt_msg_id:
             try:
@@ -19385,7 +14090,6 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
         return
 
 
-
     # -------------- defense seats by God ------------------
     # if g.vote_type == "awaiting_defense" and uid == g.god_id:
      #    nums = [int(n) for n in text.split() if n.isdigit() and int(n) in g.seats]
@@ -19415,7 +14119,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
         for seat, (player_uid, _) in list(g.seats.items()):
             if player_uid == uid:
                 del g.seats[seat]
-                store.save()
+                store.save(chat_id)
                 await ctx.bot.send_message(chat_id, "❎ ثبت‌نام شما با موفقیت لغو شد.")
                 await publish_seating(ctx, chat_id, g)
                 break
@@ -19432,7 +14136,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
         if (datetime.now() - g.adding_scenario_last).total_seconds() > 300:
             g.adding_scenario_step = None
             g.adding_scenario_data = {}
-            store.save()
+            store.save(chat_id)
             await ctx.bot.send_message(chat_id, "⏱ زمان شما تمام شد. اضافه کردن سناریو لغو شد.")
             return
 
@@ -19443,7 +14147,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
             g.adding_scenario_data["name"] = text
             g.adding_scenario_step = "mafia"
             g.adding_scenario_last = datetime.now()
-            store.save()
+            store.save(chat_id)
             await ctx.bot.send_message(chat_id, " ♠️ آیا نقش مافیا دارد؟ اگر بله، لیست را بفرستید (نقش ها را با / از هم جدا کنید). اگر نه، «خیر».")
             return
 
@@ -19455,7 +14159,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
                 g.adding_scenario_data["mafia"] = []
             g.adding_scenario_step = "citizen"
             g.adding_scenario_last = datetime.now()
-            store.save()
+            store.save(chat_id)
             await ctx.bot.send_message(chat_id, "♥️ آیا نقش شهروند دارد؟ اگر بله، لیست را بفرستید (نقش ها را با / از هم جدا کنید). اگر نه، «خیر».")
             return
 
@@ -19467,7 +14171,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
                 g.adding_scenario_data["citizen"] = []
             g.adding_scenario_step = "indep"
             g.adding_scenario_last = datetime.now()
-            store.save()
+            store.save(chat_id)
             await ctx.bot.send_message(chat_id, "♦️ آیا نقش مستقل دارد؟ اگر بله، لیست را بفرستید. اگر نه، «خیر».")
             return
 
@@ -19479,7 +14183,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
                 g.adding_scenario_data["indep"] = []
             g.adding_scenario_step = "cards"
             g.adding_scenario_last = datetime.now()
-            store.save()
+            store.save(chat_id)
             await ctx.bot.send_message(chat_id, "♥️ آیا کارت دارد؟ اگر بله، لیست را بفرستید (نقش ها را با / از هم جدا کنید). اگر نه، «خیر».")
             return
 
@@ -19500,7 +14204,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
             # --- مافیا ---
             mafia_set = load_mafia_roles() or set()
             mafia_set |= set(mafia_roles)
-            save_mafia_roles(mafia_set)
+            await gist_run(save_mafia_roles, mafia_set)
 
             # --- مستقل ---
             indep_map = load_indep_roles() or {}
@@ -19508,7 +14212,8 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
             cur_indep |= set(indep_roles)
             if cur_indep:
                 indep_map[name] = sorted(cur_indep)
-            save_indep_roles(indep_map)
+            await gist_run(save_indep_roles, indep_map)
+            invalidate_role_registry()
 
             # --- کارت‌ها ---
             cards_map = load_cards() or {}
@@ -19516,7 +14221,7 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
             cur_cards |= set(cards)
             if cur_cards:
                 cards_map[name] = sorted(cur_cards)
-            save_cards(cards_map)
+            await gist_run(save_cards, cards_map)
 
             # --- سناریو ---
             def list_to_counts(role_list):
@@ -19536,21 +14241,18 @@ async def handle_direct_name_input(update: Update, ctx: ContextTypes.DEFAULT_TYP
 
             new_scenario = Scenario(name, roles)
             store.scenarios.append(new_scenario)
-            store.save()
-            save_scenarios_to_gist(store.scenarios)
+            store.save(chat_id)
+            await gist_run(save_scenarios_to_gist, list(store.scenarios))
 
             # پاکسازی وضعیت
             g.adding_scenario_step = None
             g.adding_scenario_data = {}
-            store.save()
+            store.save(chat_id)
 
             await ctx.bot.send_message(chat_id, f"✅ سناریوی «{name}» با موفقیت ذخیره شد.")
             return
 
 
-
-
-
 async def handle_stats_request(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     now = datetime.now(timezone.utc).timestamp()
     day_ago = now - 86400  # 24 ساعت گذشته
@@ -19566,7 +14268,9 @@ async def handle_stats_request(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         ended = sum(1 for t in stats.get("ended", []) if t > day_ago)
 
         try:
-            chat = await ctx.bot.get_chat(gid)
+            chat = await chat_meta(ctx.bot, gid)
+            if chat is None:
+                raise RuntimeError("chat meta unavailable")
             if chat.username:
                 name = f"<a href='https://t.me/{chat.username}'>{chat.title or chat.username}</a> (<code>{gid}</code>)"
                 is_private = False
@@ -19704,7 +14408,7 @@ async def channel_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     if arg in ("off", "حذف", "خاموش", "-"):
         st.pop("archive_channel", None)
-        save_bot_settings(st)
+        await gist_run(save_bot_settings, st)
         await update.message.reply_text("🚫 آرشیو در چنل خاموش شد.")
         return
 
@@ -19726,7 +14430,7 @@ async def channel_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         return
 
     st["archive_channel"] = target
-    save_bot_settings(st)
+    await gist_run(save_bot_settings, st)
     await update.message.reply_text(
         f"✅ ثبت شد. از این به بعد بعد از هر بازی، لیستِ پایانی + گزارشِ شب‌به‌شب + "
         f"کارنامه‌ی امتیاز به <code>{escape(str(target), quote=False)}</code> می‌رود.",
@@ -19764,7 +14468,7 @@ async def season_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     date_str = jdatetime.date.today().strftime("%Y/%m/%d")
     try:
-        msg = _season_check_and_reset(stats, date_str=date_str)
+        msg = await gist_run(_season_check_and_reset, stats, date_str=date_str)
     except Exception as e:
         await update.message.reply_text(f"❌ خطا در چکِ فصل: {e}")
         return
@@ -19776,7 +14480,7 @@ async def season_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             parse_mode="HTML")
         return
 
-    save_player_stats(stats)
+    await gist_run(save_player_stats, stats)
     await _broadcast_season_end(ctx.bot, msg)
     await update.message.reply_text("🏁 فصل بسته شد؛ مدال‌ها ثبت و اعلان در همهٔ گروه‌ها فرستاده شد.")
 
@@ -19849,8 +14553,8 @@ async def activate_group(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         return
 
     store.active_groups.add(chat.id)
-    store.save()
-    ok = save_active_groups(store.active_groups)
+    store.save(_META_KEY)
+    ok = await gist_run(save_active_groups, set(store.active_groups))
     if not ok:
         await update.message.reply_text("⚠️ گروه فعال شد، اما ذخیره در Gist ناموفق بود.")
         return
@@ -19871,8 +14575,8 @@ async def deactivate_group(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     if chat.id in store.active_groups:
         store.active_groups.remove(chat.id)
-        store.save()
-        ok = save_active_groups(store.active_groups)
+        store.save(_META_KEY)
+        ok = await gist_run(save_active_groups, set(store.active_groups))
         if not ok:
             await update.message.reply_text("⚠️ گروه از لیست محلی حذف شد، ولی ذخیره در Gist ناموفق بود.")
             return
@@ -19899,7 +14603,7 @@ async def set_event_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     # ✅ به جای load/save خام، از کش استفاده کن و همون رو به‌روز کن
     nums = get_event_numbers()             # ← از کش می‌خوانیم
     nums[chat_id] = num                    # ← کش را بلافاصله به‌روز می‌کنیم
-    save_event_numbers(nums)               # ← سپس یک PATCH به Gist
+    await gist_run(save_event_numbers, dict(nums))         # ← سپس یک PATCH به Gist
 
     # حالا لیست را ادیت کن؛ چون کش به‌روز شده، متن جدید می‌شود
     try:
@@ -19933,7 +14637,7 @@ async def add_sticker_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     stickers = load_stickers()
     stickers[role_name] = file_id
-    save_stickers(stickers)
+    await gist_run(save_stickers, stickers)
 
     await update.message.reply_text(f"✅ استیکر برای نقش «{role_name}» ذخیره شد.")
 
@@ -19975,7 +14679,8 @@ async def cmd_addmafia(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         return
 
     roles.add(role)
-    ok = save_mafia_roles(roles)
+    ok = await gist_run(save_mafia_roles, roles)
+    invalidate_role_registry()
     if ok:
         await update.message.reply_text(f"✅ نقش «{role}» به لیست مافیا اضافه شد.")
     else:
@@ -19998,8 +14703,6 @@ async def cmd_listmafia(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(txt)
 
 
-
-
 async def add_card(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     user_id = update.effective_user.id
@@ -20029,7 +14732,7 @@ async def add_card(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         return
 
     cards[scn].append(card_text)
-    save_cards(cards)
+    await gist_run(save_cards, cards)
     await update.message.reply_text(f"✅ کارت «{card_text}» به سناریو {scn} اضافه شد.")
 
 
@@ -20090,7 +14793,8 @@ async def add_indep_role(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         return
 
     indep[scn].append(role)
-    save_indep_roles(indep)
+    await gist_run(save_indep_roles, indep)
+    invalidate_role_registry()
     await update.message.reply_text(f"✅ نقش مستقل «{role}» به سناریو {scn} اضافه شد.")
 
 
@@ -20152,7 +14856,7 @@ async def sub_command(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     old_uid, _old_name = g.seats[seat_no]
 
     g.seats[seat_no] = (new_uid, new_name)
-    store.save()
+    store.save(chat_id)
     await publish_seating(ctx, chat_id, g, mode=CTRL)
 
     # 🔗 اتاق مافیا: اگر صندلیِ جایگزین‌شده مافیاست → قدیمی بیرون + لینکِ نو برای جدید
@@ -20227,7 +14931,7 @@ async def cmd_lists(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     # ✅ به‌روزرسانی آیدی پیام فعال
     g.last_seating_msg_id = msg.message_id
-    store.save()
+    store.save(chat.id)
 
     # 📌 پین کردن پیام (اختیاری ولی پیشنهاد می‌شود)
     try:
@@ -20240,11 +14944,11 @@ async def cmd_lists(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         print(f"⚠️ خطا در پین کردن لیست بازیابی‌شده: {e}")
 
 
-
 # ═══════════ 🎙 صدای سفارشیِ گادِ صوتی (آپلود در پیویِ سازنده) ═══════════
 # سازنده در پیوی یک وویس می‌فرستد → می‌پرسیم برای کدام جمله → دانلود، تبدیل به PCM،
 # ذخیره‌ی محلی + ثبتِ file_id در گیست. چون دیسکِ رندر پاک‌شدنی است، بعد از هر
-# بالا آمدن صداها از روی file_id دوباره دانلود می‌شوند.
+# بالا آمدن صداها دوباره دانلود می‌شوند — از conv (خروجیِ تبدیل‌شده که یک‌بار در پیویِ
+# سازنده آپلود شده) اگر هست، تا بعد از دیپلوی ffmpeg دوباره اجرا نشود.
 VOICE_CUSTOM_FILENAME = "voice_custom.json"
 VOICE_PHRASE_LABELS = {
     "time_up":        "تایم تمام شد",
@@ -20277,14 +14981,13 @@ def _voice_key_label(key: str):
 
 def load_voice_custom() -> dict | None:
     try:
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = httpx.get(GIST_API_URL, headers=headers, timeout=15.0)
-        if r.status_code != 200:
+        files = gist_files()
+        if files is None:
             return None
-        f = (r.json().get("files", {}) or {}).get(VOICE_CUSTOM_FILENAME)
-        if not f:
+        content = files.get(VOICE_CUSTOM_FILENAME)
+        if not content:
             return {}
-        return json.loads(f.get("content") or "{}") or {}
+        return json.loads(content or "{}") or {}
     except Exception as e:
         print("❌ load_voice_custom:", e)
         return None
@@ -20292,16 +14995,23 @@ def load_voice_custom() -> dict | None:
 
 def save_voice_custom(data: dict) -> bool:
     try:
-        headers = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github+json"}
-        r = httpx.patch(GIST_API_URL, headers=headers, timeout=20.0,
-                        json={"files": {VOICE_CUSTOM_FILENAME: {
-                            "content": json.dumps(data, ensure_ascii=False, indent=2)}}})
-        return r.status_code in (200, 201)
+        return gist_write({VOICE_CUSTOM_FILENAME: json.dumps(data, ensure_ascii=False, indent=2)})
     except Exception as e:
         print("❌ save_voice_custom:", e)
         return False
 
 
+def _voice_custom_update(change) -> tuple[bool, bool] | None:
+    """خواندن-تغییر-نوشتنِ voice_custom.json یک‌جا (از راهِ gist_run، پشتِ بقیه‌ی نویسنده‌ها).
+    change(cur) فهرست را درجا عوض می‌کند و می‌گوید چیزی عوض شد یا نه.
+    None یعنی «خواندن شکست خورد»؛ وگرنه (عوض شد؟, ذخیره شد؟)."""
+    cur = load_voice_custom()
+    if cur is None:
+        return None
+    changed = bool(change(cur))
+    return changed, (save_voice_custom(cur) if changed else True)
+
+
 def _voice_label_key(text: str):
     """متنِ فارسی → کلید. «رأی‌گیری برای» → vote_prefix | «رأی‌گیری صندلی ۳» → vote_3"""
     t = _nz(text or "")
@@ -20319,35 +15029,103 @@ def _voice_label_key(text: str):
     return None
 
 
-async def _voice_install_from_file_id(bot, key: str, file_id: str) -> tuple[bool, str]:
-    """دانلود از تلگرام + تبدیل + ذخیره‌ی محلی. (موفق؟, مسیر یا پیامِ خطا)"""
+VOICE_RESTORE_CONCURRENCY = 4     # دانلود/ffmpegِ هم‌زمان در بازیابیِ صداهای سفارشی
+
+
+async def _voice_fetch_converted(bot, conv: str):
+    """خروجیِ تبدیل‌شده‌ای که قبلاً در تلگرام گذاشته شده (بدونِ ffmpeg) — یا None."""
+    try:
+        f = await bot.get_file(conv)
+        enc = bytes(await f.download_as_bytearray())
+        return enc if len(enc) >= 1024 else None
+    except Exception as e:
+        print("⚠️ دانلودِ صدای تبدیل‌شده:", e)
+        return None
+
+
+async def _voice_upload_converted(bot, key: str, enc: bytes):
+    """📤 خروجیِ ffmpeg یک‌بار در پیویِ سازنده آپلود می‌شود؛ file_idش (conv) در گیست می‌نشیند
+    تا بعد از دیپلوی — که دیسک و کشِ تبدیل خالی‌اند — بدونِ تبدیلِ دوباره برگردد."""
+    lbl = _voice_key_label(key) or key
     try:
-        f = await bot.get_file(file_id)
-        data = bytes(await f.download_as_bytearray())
+        m = await bot.send_document(
+            ADMIN_ID, document=enc, filename=f"{key}.opus", disable_notification=True,
+            caption=f"♻️ نسخه‌ی آماده‌ی «{lbl}» — برای بازیابی بعد از دیپلوی؛ پاکش نکن.",
+            rate_limit_args=OUT_LOW)
+        return m.document.file_id if m and m.document else None
     except Exception as e:
-        return False, f"دانلود از تلگرام ناموفق: {e}"
-    raw = await voice_god.convert_to_raw(data)
-    if not raw:
-        return False, "تبدیلِ صدا ناموفق بود (ffmpeg در دسترس نیست یا فایل خراب است)."
-    return True, voice_god.save_custom(key, raw)
+        print(f"⚠️ آپلودِ صدای تبدیل‌شده‌ی «{key}»:", e)
+        return None
+
+
+async def _voice_install_from_file_id(bot, key: str, file_id: str, unique: str | None = None,
+                                      conv: str | None = None):
+    """دانلود از تلگرام + تبدیل + ذخیره‌ی محلی → (موفق؟, مسیر یا پیامِ خطا, file_unique_id, conv).
+    ترتیب: کشِ تبدیلِ محلی (همان کانتینر) → conv (خروجیِ آماده در تلگرام، بعد از دیپلوی) →
+    دانلودِ اصل + ffmpeg که خروجی‌اش یک‌بار آپلود می‌شود تا conv بسازد."""
+    enc = await asyncio.to_thread(voice_god.converted, unique) if unique else None
+    if enc is None and conv:
+        enc = await _voice_fetch_converted(bot, conv)
+        if enc is not None and unique:
+            await asyncio.to_thread(voice_god.remember_converted, unique, enc)
+    if enc is None:
+        try:
+            f = await bot.get_file(file_id)
+            unique = f.file_unique_id or unique
+            enc = await asyncio.to_thread(voice_god.converted, unique)
+            if enc is None:
+                data = bytes(await f.download_as_bytearray())
+        except Exception as e:
+            return False, f"دانلود از تلگرام ناموفق: {e}", unique, conv
+        if enc is None:
+            enc = await voice_god.convert_phrase(data)
+            if not enc:
+                return (False, "تبدیلِ صدا ناموفق بود (ffmpeg در دسترس نیست یا فایل خراب است).",
+                        unique, conv)
+            await asyncio.to_thread(voice_god.remember_converted, unique, enc)
+            conv = None                   # خروجیِ تازه — conv قبلی (اگر بود) دیگر مالِ این فایل نیست
+    if not conv:
+        conv = await _voice_upload_converted(bot, key, enc)
+    return True, await voice_god.asave_custom(key, enc), unique, conv
 
 
 async def _voice_custom_restore(bot):
-    """🔄 بعد از هر بالا آمدن: صداهای سفارشی از روی file_id دوباره نصب می‌شوند."""
+    """🔄 بعد از هر بالا آمدن: صداهای سفارشی دوباره نصب می‌شوند — هم‌زمان (حداکثر
+    VOICE_RESTORE_CONCURRENCY)؛ از کشِ محلی یا conv اگر هست، وگرنه دانلود + تبدیل."""
     try:
         data = await asyncio.to_thread(load_voice_custom)
         if not data:
             return
-        n = 0
-        for key, rec in data.items():
-            fid = (rec or {}).get("file_id")
-            if _voice_key_label(key) and fid:
-                ok, res = await _voice_install_from_file_id(bot, key, fid)
-                if ok:
-                    n += 1
-                else:
-                    print(f"⚠️ صدای سفارشیِ «{key}» بازیابی نشد: {res}")
-        print(f"🎙 صداهای سفارشی بازیابی شد: {n}/{len(data)}")
+        sem = asyncio.Semaphore(VOICE_RESTORE_CONCURRENCY)
+        backfill = {}
+
+        async def one(key, rec):
+            async with sem:
+                ok, res, uniq, conv = await _voice_install_from_file_id(
+                    bot, key, rec["file_id"], rec.get("unique"), rec.get("conv"))
+            if not ok:
+                print(f"⚠️ صدای سفارشیِ «{key}» بازیابی نشد: {res}")
+            elif (uniq, conv) != (rec.get("unique"), rec.get("conv")):
+                backfill[key] = {"unique": uniq, "conv": conv}
+            return ok
+
+        jobs = [one(key, rec) for key, rec in data.items()
+                if _voice_key_label(key) and isinstance(rec, dict) and rec.get("file_id")]
+        t0 = time.monotonic()
+        done = await asyncio.gather(*jobs)
+        print(f"🎙 صداهای سفارشی بازیابی شد: {sum(done)}/{len(data)} "
+              f"در {time.monotonic() - t0:.1f}s")
+        # 🏷 رکوردهای قدیمی file_unique_id یا conv ندارند — یک‌بار ثبت می‌شوند تا دیپلوی‌های بعدی
+        #    نه get_file بخواهند نه ffmpeg
+        if backfill:
+            def fill(cur):
+                hit = [k for k in backfill if isinstance(cur.get(k), dict)
+                       and cur[k].get("file_id") == data[k]["file_id"]]
+                for k in hit:
+                    cur[k].update({f: v for f, v in backfill[k].items() if v})
+                return hit
+
+            await gist_run(_voice_custom_update, fill)
     except Exception as e:
         print("⚠️ voice custom restore:", e)
 
@@ -20364,18 +15142,23 @@ def _voice_pick_kb():
 async def _voice_install_and_record(ctx, uid: int, key: str, fid: str):
     """نصبِ صدا برای یک کلید + ثبتِ file_id در گیست + گزارش به سازنده."""
     lbl = _voice_key_label(key) or key
-    ok, res = await _voice_install_from_file_id(ctx.bot, key, fid)
+    ok, res, uniq, conv = await _voice_install_from_file_id(ctx.bot, key, fid)
     if not ok:
         await ctx.bot.send_message(uid, f"⛔ {res}")
         return
-    cur = await asyncio.to_thread(load_voice_custom)
-    if cur is None:
+    rec = {"file_id": fid, "unique": uniq, "conv": conv, "label": lbl,
+           "at": datetime.now(timezone.utc).timestamp()}
+
+    def put(cur):
+        cur[key] = rec
+        return True
+
+    res = await gist_run(_voice_custom_update, put)
+    if res is None:
         await ctx.bot.send_message(
             uid, f"⚠️ صدای «{lbl}» نصب شد ولی فهرستِ گیست خوانده نشد — بعد از ری‌استارت می‌پرد؛ دوباره بفرست.")
         return
-    cur[key] = {"file_id": fid, "label": lbl,
-                "at": datetime.now(timezone.utc).timestamp()}
-    saved = await asyncio.to_thread(save_voice_custom, cur)
+    saved = res[1]
     note = "" if saved else "\n⚠️ ذخیره در گیست ناموفق — بعد از ری‌استارت می‌پرد؛ دوباره بفرست."
     await ctx.bot.send_message(
         uid, f"✅ صدای «{lbl}» ثبت شد — از همین الان به‌جای صدای پیش‌فرض پخش می‌شود.{note}")
@@ -20393,6 +15176,7 @@ async def handle_voice_upload_pm(update: Update, ctx: ContextTypes.DEFAULT_TYPE)
     await msg.reply_text("🎙 این صدا برای کدام جمله است؟", reply_markup=_voice_pick_kb())
 
 
+@callback_route("vset_")
 async def handle_voice_set_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     uid = q.from_user.id
@@ -20496,20 +15280,71 @@ async def handle_voice_text_pm(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                              + "\n• رأی‌گیری برای (پیشوند)\n• رأی‌گیری صندلی ۳")
         return
     lbl = _voice_key_label(key) or key
-    cur = await asyncio.to_thread(load_voice_custom)
-    if cur is None:
+    res = await gist_run(_voice_custom_update, lambda cur: cur.pop(key, None) is not None)
+    if res is None:
         await msg.reply_text("⚠️ فهرستِ گیست خوانده نشد — کمی بعد دوباره امتحان کن.")
         return
-    had = cur.pop(key, None) is not None
+    had, saved = res
     voice_god.remove_custom(key)
-    if had and not await asyncio.to_thread(save_voice_custom, cur):
+    if not saved:
         await msg.reply_text("⚠️ فایلِ محلی پاک شد ولی ذخیره در گیست ناموفق بود — بعد از ری‌استارت برمی‌گردد.")
         return
     await msg.reply_text(f"↩️ «{lbl}» به صدای پیش‌فرض برگشت." if had else f"ℹ️ «{lbl}» صدای سفارشی نداشت.")
 
 
+# ═══════════ 🚀 بالا آمدنِ مرحله‌ای ═══════════
+# main اول پورت را باز می‌کند (چکِ سلامتِ رندر همان لحظه 200 می‌گیرد)، بعد warm_start
+# در پس‌زمینه: دیسک، یک GETِ گیست و initializeِ تلگرام همزمان؛ بقیه‌ی لودرها از همان تصویرِ
+# گیست می‌خوانند. آخرش دروازه‌ی _STARTUP باز می‌شود. گادِ صوتی جدا و بدونِ معطل‌کردنِ دروازه.
+async def warm_start(app):
+    try:
+        await asyncio.gather(
+            BOOT.timed("store.load", asyncio.to_thread(store.load)),   # 💾 فقط دیسک
+            BOOT.timed("gist.snapshot", agist_files()),   # 🌐 یک درخواست برای همه‌ی فایل‌های گیست
+            BOOT.timed("app.initialize", app.initialize()),
+        )
+        start = time.perf_counter()
+        store.sync_active_groups(await gist_load(load_active_groups))
+        store.scenarios = await gist_load(load_scenarios_from_gist)
+        # لود کردن نام‌های کاربران از Gist برای تمام گیم‌ها
+        usernames = await gist_load(load_usernames_from_gist) or {}
+        for g in store.games.values():
+            g.user_names = usernames
+        BOOT.mark("gist.loaders", start)
+        # ⛔ لیستِ محرومان را همین‌جا بخوان — قبل از بازشدنِ دروازه، نه وسطِ بازی
+        await BOOT.timed("god_bans", _god_bans_prime())
+        await BOOT.timed("app.start", app.start())
+        _STARTUP.set()
+        BOOT.ready()
+
+        # 📡 تنظیم آدرس وب‌هوک
+        webhook_url = f"https://mafia-bot-259u.onrender.com/{TOKEN}"
+        await BOOT.timed("set_webhook", app.bot.set_webhook(webhook_url))
+    finally:
+        BOOT.active = False
+        print(BOOT.table())
+    print(f"✅ {len(store.games)} بازی بارگذاری شد")
+
+    # 📊 زمان‌بند آمار هفتگی
+    asyncio.create_task(weekly_scheduler(app))
+    asyncio.create_task(_voice_boot(app))
+
+
+async def _voice_boot(app):
+    # 🎙 گادِ صوتی — اختیاری؛ اگر بالا نیاید یا طول بکشد، بات بدونِ صدا ادامه می‌دهد
+    try:
+        await BOOT.timed("voice_god.start", asyncio.wait_for(voice_god.start(), timeout=45))
+    except asyncio.TimeoutError:
+        print("⚠️ گادِ صوتی: اتصال بیش از ۴۵ ثانیه طول کشید — بدونِ صدا ادامه می‌دهیم.")
+    except Exception as _ve:
+        print("⚠️ گادِ صوتی:", _ve)
+    # 🎙 صداهای سفارشی را در پس‌زمینه از تلگرام برگردان (دیسکِ رندر پاک‌شدنی است)
+    if voice_god.ready():
+        await BOOT.timed("voice.restore", _voice_custom_restore(app.bot))
+
+
 async def main():
-    app = ApplicationBuilder().token(TOKEN).build()
+    app = ApplicationBuilder().token(TOKEN).rate_limiter(outbound).build()
     app.add_error_handler(on_error)
     # ⛔ دروازهٔ محرومیتِ کامل — گروهِ منفی یعنی قبل از همهٔ هندلرهای دیگر
     app.add_handler(TypeHandler(Update, blocked_gate), group=-1)
@@ -20621,23 +15456,6 @@ async def main():
         )
     )
 
-      
-    # ✅ initialize application
-    await app.initialize()
-
-    # ⛔ لیستِ محرومان را همین‌جا بخوان — قبل از باز شدنِ وب‌هوک، نه وسطِ بازی
-    await _god_bans_prime()
-
-    # 🎙 گادِ صوتی — اختیاری؛ اگر بالا نیاید یا طول بکشد، بات بدونِ صدا ادامه می‌دهد
-    try:
-        await asyncio.wait_for(voice_god.start(), timeout=45)
-    except asyncio.TimeoutError:
-        print("⚠️ گادِ صوتی: اتصال بیش از ۴۵ ثانیه طول کشید — بدونِ صدا ادامه می‌دهیم.")
-    except Exception as _ve:
-        print("⚠️ گادِ صوتی:", _ve)
-    # 🎙 صداهای سفارشی را در پس‌زمینه از تلگرام برگردان (دیسکِ رندر پاک‌شدنی است)
-    if voice_god.ready():
-        asyncio.create_task(_voice_custom_restore(app.bot))
 
     # 🌐 ساخت aiohttp برای وب‌هوک
     from aiohttp import web
@@ -20645,43 +15463,88 @@ async def main():
 
     aio_app = web.Application()
     aio_app.router.add_get("/", lambda req: web.Response(text="OK"))
+    # ⏱ گزارشِ بالا آمدن (مرحله‌ها + درخواست‌های گیست/Bot API در طولِ boot)
+    aio_app.router.add_get("/startup", lambda req: web.json_response(BOOT.report()))
+
+    lanes = UpdateLanes(app.process_update)
 
     async def webhook_handler(request):
         data = await request.json()
         update = Update.de_json(data, app.bot)
-        # 🐌 سنجشِ زمانِ پردازش — همانی که تلگرام منتظرش می‌ماند
-        _t0 = time.perf_counter()
-        _g0, _c0 = _GIST_TIME["sec"], _GIST_TIME["calls"]
-        try:
-            await app.process_update(update)
-        finally:
-            _dt = time.perf_counter() - _t0
-            if _dt >= SLOW_UPDATE_SEC:
-                _log_slow_update(update, _dt,
-                                 _GIST_TIME["sec"] - _g0, _GIST_TIME["calls"] - _c0)
+        note_chat_update(update)         # 🏷 عنوان/یوزرنیمِ گروه از خودِ آپدیت
+        track_update_message(update)     # 🗑 برای پاک‌سازیِ گروهی
+        # 🚦 تلگرام دیگر منتظرِ هندلر نمی‌ماند؛ آپدیت در صفِ چتِ خودش اجرا می‌شود
+        lanes.submit(update)
         return web.Response()
 
     aio_app.router.add_post(f"/{TOKEN}", webhook_handler)
-
-    # 📡 تنظیم آدرس وب‌هوک
-    webhook_url = f"https://mafia-bot-259u.onrender.com/{TOKEN}"
-    await app.bot.set_webhook(webhook_url)
-
-    # 🟢 اجرای سرور aiohttp
+    # 🔎 دیباگ: پیشوندهای دکمه + هندلر + تعدادِ برخورد (پشتِ توکن، مثلِ خودِ وب‌هوک)
+    aio_app.router.add_get(f"/{TOKEN}/debug/callbacks",
+                           lambda req: web.json_response(callback_routes_snapshot()))
+    aio_app.router.add_get(f"/{TOKEN}/debug/outbound",
+                           lambda req: web.json_response(outbound.snapshot()))
+    aio_app.router.add_get(f"/{TOKEN}/debug/voice",
+                           lambda req: web.json_response(voice_god.status()))
+
+    # 🟢 اجرای سرور aiohttp — قبل از هر بارگذاری‌ای
+    start = time.perf_counter()
     runner = web.AppRunner(aio_app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", int(os.environ.get("PORT", 8080)))
     await site.start()
+    BOOT.mark("http.bind", start)
     print("✅ Webhook server is running...")
 
-    # ▶️ اجرای اپلیکیشن
-    await app.start()
+    # 🛑 رندر موقعِ دیپلوی SIGTERM می‌فرستد — اول تغییرهای معلق نوشته شوند، بعد خاموشی
+    stop = asyncio.Event()
 
-    # 📊 زمان‌بند آمار هفتگی
-    asyncio.create_task(weekly_scheduler(app))
+    # ▶️ بارگذاری و اجرای اپلیکیشن در پس‌زمینه؛ اگر شکست خورد، خارج شو تا رندر دوباره بالا بیاورد
+    def _warm_done(t: asyncio.Task):
+        if not t.cancelled() and t.exception() is not None:
+            print("❌ startup failed:", repr(t.exception()))
+            stop.set()
+
+    warm = asyncio.create_task(warm_start(app))
+    warm.add_done_callback(_warm_done)
+
+    def _on_sigterm():
+        print("🛑 SIGTERM — ذخیره‌ی نهایی…")
+        try:
+            store.flush(durable=True)
+        except Exception as e:
+            print("❌ final flush error:", e)
+        stop.set()
+
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, _on_sigterm)
+    except (NotImplementedError, RuntimeError):
+        pass
 
     # ⏳ جلوگیری از خاموشی برنامه
-    await asyncio.Event().wait()
+    await stop.wait()
+    if not warm.done():
+        warm.cancel()
+    # 🧹 هر مرحله جدا: اگر warm_start قبل از app.start() شکست خورده باشد، app.stop() خطا می‌دهد
+    #    ولی سوکت و کلاینت‌های گیست باید باز هم بسته شوند
+    steps = (
+        ("lanes.drain", lanes.drain),
+        ("store.drain", store.drain),
+        ("store.flush", lambda: store.flush(durable=True)),
+        ("app.stop", app.stop),
+        ("app.shutdown", app.shutdown),
+        ("runner.cleanup", runner.cleanup),
+        ("gist_aclose", gist_aclose),
+    )
+    for name, step in steps:
+        try:
+            res = step()
+            if asyncio.iscoroutine(res):
+                await res
+        except Exception as e:
+            print(f"⚠️ shutdown ({name}):", e)
+
+
+BOOT.mark("import", _IMPORT_T0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,17 @@
+"""
+🚀 نقطه‌ی شروعِ بات در رندر.
+
+چرا فایلِ جدا؟ «python mafia_bot.py» فایلِ اصلی را به‌عنوانِ __main__ اجرا می‌کند و پایتون
+بایت‌کدِ __main__ را هیچ‌وقت کش نمی‌کند — یعنی هر بالا آمدن کلِ ~۹۵۰ کیلوبایت از نو
+کامپایل می‌شود. اینجا mafia_bot یک ماژولِ معمولی است: بایت‌کدش یک‌بار (در build یا اولین
+اجرا) در __pycache__ نوشته می‌شود و از آن به بعد فقط خوانده می‌شود.
+
+اجرا:
+    python start.py
+"""
+import asyncio
+
+import mafia_bot
+
+if __name__ == "__main__":
+    asyncio.run(mafia_bot.main())
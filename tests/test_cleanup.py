@@ -0,0 +1,47 @@
+import asyncio
+
+import telegram
+from telegram.ext import ExtBot
+
+import mafia_bot as m
+
+
+def test_blind_range_below_first_seen(monkeypatch):
+    monkeypatch.setattr(m, "_MSG_IDS", {})
+    monkeypatch.setattr(m, "_MSG_FLOOR", {})
+    for mid in (50, 52, 55):
+        m.track_message_id(-1, mid)
+    assert m.message_ids_between(-1, 45, 60) == [46, 47, 48, 49, 50, 52, 55]
+
+
+def test_evicted_ids_fall_into_blind_range(monkeypatch):
+    monkeypatch.setattr(m, "_MSG_IDS", {})
+    monkeypatch.setattr(m, "_MSG_FLOOR", {})
+    monkeypatch.setattr(m, "MSG_TRACK_MAX", 5)
+    for mid in range(10, 30, 2):                 # ۱۰ آیدی، فقط ۵تای آخر می‌مانند
+        m.track_message_id(-1, mid)
+    ids = m.message_ids_between(-1, 0, 100)
+    assert set(range(10, 20, 2)) <= set(ids)     # بیرون‌افتاده‌ها هنوز پاک می‌شوند
+    assert set(range(20, 30, 2)) <= set(ids)
+    assert 21 not in ids                         # بالای کف فقط دیده‌شده‌ها
+
+
+def test_bulk_fallback_keeps_priority(monkeypatch):
+    seen = []
+
+    class Probe(m.OutboundLimiter):
+        async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+            seen.append((endpoint, len(data.get("message_ids") or ()), rate_limit_args))
+            return True
+
+    async def fake_post(self, endpoint, data, **_kw):
+        return True
+
+    monkeypatch.setattr(telegram.Bot, "_do_post", fake_post)
+    monkeypatch.setattr(m, "_MSG_IDS", {})
+
+    async def main():
+        bot = ExtBot("1:test", rate_limiter=Probe())
+        return await m.delete_messages_bulk(bot, -1, range(1, 151))
+    assert asyncio.run(main()) == 2
+    assert seen == [("deleteMessages", 100, m.OUT_LOW), ("deleteMessages", 50, m.OUT_LOW)]
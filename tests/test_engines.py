@@ -0,0 +1,89 @@
+import ast
+import builtins
+import dis
+import glob
+import os
+import subprocess
+import sys
+import types
+from types import SimpleNamespace
+
+import mafia_bot as m
+
+ROOT = os.path.dirname(os.path.abspath(m.__file__))
+ENGINES = sorted(os.path.splitext(os.path.basename(p))[0]
+                 for p in glob.glob(os.path.join(ROOT, "engines", "*.py")))
+
+
+def _tree(path):
+    with open(path, encoding="utf-8-sig") as f:
+        return ast.parse(f.read())
+
+
+def _defs(tree):
+    return {n.name: isinstance(n, ast.AsyncFunctionDef) for n in tree.body
+            if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))}
+
+
+def _stubs(tree):
+    out = {}
+    for n in ast.walk(tree):
+        if isinstance(n, ast.Call) and ast.unparse(n.func) == "_engine_fn":
+            mod, name = (a.value for a in n.args[:2])
+            coro = any(k.arg == "coro" and k.value.value for k in n.keywords)
+            out[name] = (mod, coro)
+    return out
+
+
+def test_import_loads_no_engine():
+    out = subprocess.run([sys.executable, "-c", "import mafia_bot; print(sorted(mafia_bot._ENGINE_LOADED))"],
+                         cwd=ROOT, env={**os.environ, "GH_TOKEN": "", "GIST_ID": ""},
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "[]"
+
+
+def test_names_used_outside_an_engine_have_stubs():
+    core = _tree(m.__file__)
+    stubs, core_defs = _stubs(core), _defs(core)
+    trees = {e: _tree(os.path.join(ROOT, "engines", f"{e}.py")) for e in ENGINES}
+    owner = {name: (e, coro) for e, t in trees.items() for name, coro in _defs(t).items()}
+    assert not set(owner) & set(core_defs)
+    for name, (mod, coro) in stubs.items():
+        assert owner[name] == (mod, coro), name
+    users = {"core": core, **trees}
+    missing = []
+    for where, t in users.items():
+        for n in ast.walk(t):
+            if (isinstance(n, ast.Name) and n.id in owner and owner[n.id][0] != where
+                    and n.id not in stubs):
+                missing.append((where, n.id))
+    assert missing == []
+
+
+def test_stub_loads_engine_and_is_replaced():
+    stub = m._sh_dark_role_norms
+    assert stub(SimpleNamespace(scenario=None)) == m._SH_DARK
+    assert "sh" in m._ENGINE_LOADED
+    real = m._sh_dark_role_norms
+    assert real is not stub
+    assert real.__code__.co_filename.endswith(os.path.join("engines", "sh.py"))
+
+
+def _globals_of(code):
+    for i in dis.get_instructions(code):
+        if i.opname in ("LOAD_GLOBAL", "STORE_GLOBAL"):
+            yield i.argval
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            yield from _globals_of(c)
+
+
+def test_engine_code_resolves_in_core_namespace():
+    for e in ENGINES:
+        m._engine_load(e)
+    unresolved = set()
+    for fn in list(vars(m).values()):
+        if isinstance(fn, types.FunctionType) and "engines" in fn.__code__.co_filename:
+            unresolved |= {n for n in _globals_of(fn.__code__)
+                           if n not in vars(m) and not hasattr(builtins, n)}
+    assert unresolved == set()
@@ -0,0 +1,139 @@
+import ast
+import asyncio
+import glob
+import os
+import threading
+
+import pytest
+
+import mafia_bot as m
+
+
+class _Resp:
+    status_code = 200
+    headers = {"ETag": "e2"}
+    text = ""
+
+    def json(self):
+        return {"files": {"a.json": {"content": "new"}}}
+
+
+class _Client:
+    def __init__(self):
+        self.calls = 0
+        self.lock_free = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls += 1
+        # از تردِ دیگری قفلِ تصویر باید آزاد باشد (GET زیرِ آن نیست)
+        got = []
+
+        def probe():
+            ok = m._GIST_SNAP_LOCK.acquire(timeout=1)
+            if ok:
+                m._GIST_SNAP_LOCK.release()
+            got.append(ok)
+
+        t = threading.Thread(target=probe)
+        t.start()
+        t.join()
+        self.lock_free.append(got[0])
+        return _Resp()
+
+
+@pytest.fixture
+def gist(monkeypatch):
+    monkeypatch.setattr(m, "GH_TOKEN", "t")
+    monkeypatch.setattr(m, "GIST_ID", "g")
+    monkeypatch.setattr(m, "_GIST_SNAP", {"files": None, "etag": None, "ts": 0.0, "wgen": 0})
+    monkeypatch.setattr(m, "_GIST_REVALIDATE", {"task": None})
+    c = _Client()
+    monkeypatch.setattr(m, "_gist_client", lambda: c)
+    return c
+
+
+def test_fetch_does_not_hold_snapshot_lock(gist):
+    assert m.gist_files() == {"a.json": "new"}
+    assert gist.calls == 1 and gist.lock_free == [True]
+    assert m._GIST_SNAP["etag"] == "e2"
+
+
+def test_fetch_started_before_a_write_does_not_revert_it(gist, monkeypatch):
+    m._GIST_SNAP.update(files={"a.json": "old"}, ts=0.0)
+    get = gist.get
+
+    def racing_get(*a, **k):
+        r = get(*a, **k)                          # گیت‌هاب نسخه‌ی قبل از PATCH را داد…
+        m._gist_merge_written({"a.json": "mine"})  # …و PATCH زودتر از این جواب برگشت
+        return r
+
+    monkeypatch.setattr(gist, "get", racing_get)
+    assert m.gist_files(force=True) == {"a.json": "mine"}
+    assert m._GIST_SNAP["files"] == {"a.json": "mine"}
+
+
+def test_stale_snapshot_on_loop_revalidates_in_background(gist, monkeypatch):
+    m._GIST_SNAP.update(files={"a.json": "old"}, ts=0.0)
+    refreshed = []
+
+    async def fake_agist(force=False):
+        refreshed.append(force)
+
+    monkeypatch.setattr(m, "agist_files", fake_agist)
+
+    async def main():
+        first = m.gist_files()
+        second = m.gist_files()
+        await asyncio.sleep(0)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second == {"a.json": "old"}
+    assert gist.calls == 0
+    assert refreshed == [False]
+
+
+def test_gist_run_runs_off_the_loop():
+    seen = []
+
+    def writer(x):
+        seen.append((threading.current_thread() is threading.main_thread(),
+                     m._GIST_RMW_LOCK.locked()))
+        return x + 1
+
+    assert asyncio.run(m.gist_run(writer, 1)) == 2
+    assert seen == [(False, True)]
+
+
+
+def _calls(fn):
+    return {ast.unparse(n.func) for n in ast.walk(fn) if isinstance(n, ast.Call)}
+
+
+def test_handlers_route_gist_writers_through_gist_run():
+    root = os.path.dirname(os.path.abspath(m.__file__))
+    tree = ast.Module(body=[], type_ignores=[])
+    for path in [m.__file__, *glob.glob(os.path.join(root, "engines", "*.py"))]:
+        with open(path, encoding="utf-8-sig") as f:
+            tree.body += ast.parse(f.read()).body          # موتورها در همان فضای نام اجرا می‌شوند
+    funcs = [n for n in tree.body if isinstance(n, ast.FunctionDef)]
+    # هر تابعِ syncی که (مستقیم یا غیرمستقیم) gist_write می‌زند، خواندن-تغییر-نوشتن است
+    writers, grew = {"gist_write"}, True
+    while grew:
+        new = {f.name for f in funcs if f.name not in writers and _calls(f) & writers}
+        writers |= new
+        grew = bool(new)
+    bad = []
+    for fn in ast.walk(tree):
+        if not isinstance(fn, ast.AsyncFunctionDef):
+            continue
+        for n in ast.walk(fn):
+            if not isinstance(n, ast.Call):
+                continue
+            callee = ast.unparse(n.func)
+            if callee == "asyncio.to_thread" and n.args:
+                callee = ast.unparse(n.args[0])
+            if callee in writers:
+                bad.append((fn.name, n.lineno, callee))
+    assert "update_player_stats" in writers
+    assert bad == []
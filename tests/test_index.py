@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+import mafia_bot as m
+
+
+@pytest.fixture
+def st(tmp_path, monkeypatch):
+    s = m.Store(path=str(tmp_path / "none.pkl"), state_dir=str(tmp_path / "state"))
+    s.load()
+    monkeypatch.setattr(m, "store", s)
+    return s
+
+
+def _game(god, seats):
+    g = m.GameState()
+    g.god_id = god
+    g.seats = dict(seats)
+    return g
+
+
+def test_lookups_follow_saves(st):
+    st.games[-1] = _game(100, {1: (7, "a"), 2: (8, "b")})
+    st.games[-2] = _game(200, {1: (8, "b")})
+    st.save()
+    assert [c for c, _g, _s in st.index.player_games(8)] == [-1, -2]
+    assert [c for c, _g in st.index.god_games(100)] == [-1]
+    st.games[-1].seats.pop(2)
+    st.games[-1].god_id = 300
+    st.save(-1)
+    assert [c for c, _g, _s in st.index.player_games(8)] == [-2]
+    assert st.index.god_games(100) == []
+    assert [c for c, _g in st.index.god_games(300)] == [-1]
+    assert st.index.chat_of(st.games[-2]) == -2
+    assert [c for c, _g in st.index.games_of(8)] == [-2]
+
+
+def test_per_chat_save_reindexes_only_that_game(st, monkeypatch):
+    for cid in range(-1, -21, -1):
+        st.games[cid] = _game(cid * -10, {1: (cid * -100, "x")})
+    st.save()
+    st.index.god_games(10)                       # ساختِ اولیه
+    added = []
+    real = m.GameIndex._add
+    monkeypatch.setattr(m.GameIndex, "_add", lambda self, cid, g: added.append(cid) or real(self, cid, g))
+    st.games[-5].god_id = 999
+    st.save(-5)
+    assert [c for c, _g in st.index.god_games(999)] == [-5]
+    assert added == [-5]
+
+
+def test_removed_game_leaves_index(st):
+    st.games[-1] = _game(100, {1: (7, "a")})
+    st.save(-1)
+    assert st.index.player_games(7)
+    del st.games[-1]
+    st.save(-1)
+    assert st.index.player_games(7) == []
+    assert st.index.god_games(100) == []
+
+
+def test_safe_pm_skips_burned_player(st):
+    st.games[-1] = _game(100, {1: (7, "a"), 2: (8, "b")})
+    st.games[-1].night_burned_uids = {7}
+    st.save(-1)
+    sent = []
+
+    class Bot:
+        async def send_message(self, chat_id, text, **kw):
+            sent.append(chat_id)
+            return True
+
+    class Ctx:
+        bot = Bot()
+
+    async def main():
+        return (await m._safe_pm(Ctx(), 7, "x"), await m._safe_pm(Ctx(), 8, "y"))
+    assert asyncio.run(main()) == (None, True)
+    assert sent == [8]
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import mafia_bot as m
+
+
+def _upd(chat, n):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat), effective_user=None, n=n)
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    evt = {}
+
+    async def ready():
+        await evt["e"].wait()
+
+    monkeypatch.setattr(m, "startup_ready", ready)
+    return evt
+
+
+def test_lane_key():
+    assert m._update_lane_key(_upd(-5, 0)) == -5
+    poll = SimpleNamespace(effective_chat=None, effective_user=SimpleNamespace(id=7))
+    assert m._update_lane_key(poll) == ("u", 7)
+    assert m._update_lane_key(SimpleNamespace()) == "misc"
+
+
+def test_same_chat_runs_in_order_one_at_a_time(gate):
+    seen, active = [], {"n": 0, "max": 0}
+
+    async def process(u):
+        active["n"] += 1
+        active["max"] = max(active["max"], active["n"])
+        await asyncio.sleep(0.01 * (3 - u.n))     # اولی از همه کُندتر
+        seen.append(u.n)
+        active["n"] -= 1
+
+    async def main():
+        gate["e"] = asyncio.Event()
+        gate["e"].set()
+        lanes = m.UpdateLanes(process)
+        for n in range(3):
+            lanes.submit(_upd(-1, n))
+        assert lanes.backlog() == 3
+        await lanes.drain(timeout=2)
+        return lanes
+
+    lanes = asyncio.run(main())
+    assert seen == [0, 1, 2]
+    assert active["max"] == 1
+    assert lanes.backlog() == 0
+
+
+def test_chats_run_concurrently_under_the_global_cap(gate):
+    active = {"n": 0, "max": 0}
+
+    async def process(u):
+        active["n"] += 1
+        active["max"] = max(active["max"], active["n"])
+        await asyncio.sleep(0.02)
+        active["n"] -= 1
+
+    async def main():
+        gate["e"] = asyncio.Event()
+        gate["e"].set()
+        lanes = m.UpdateLanes(process, limit=2)
+        for chat in range(5):
+            lanes.submit(_upd(chat, 0))
+        await lanes.drain(timeout=2)
+
+    asyncio.run(main())
+    assert active["max"] == 2
+
+
+def test_waits_for_startup_and_survives_handler_errors(gate):
+    seen = []
+
+    async def process(u):
+        seen.append(u.n)
+        if u.n == 0:
+            raise RuntimeError("boom")
+
+    async def main():
+        gate["e"] = asyncio.Event()
+        lanes = m.UpdateLanes(process)
+        lanes.submit(_upd(-1, 0))
+        lanes.submit(_upd(-1, 1))
+        await asyncio.sleep(0.02)
+        assert seen == []                          # دروازه هنوز بسته است
+        gate["e"].set()
+        await lanes.drain(timeout=2)
+
+    asyncio.run(main())
+    assert seen == [0, 1]
@@ -0,0 +1,76 @@
+import asyncio
+
+import telegram
+from telegram.ext import ExtBot
+
+import mafia_bot as m
+
+
+def _drained_limiter():
+    lim = m.OutboundLimiter()
+    lim._global = m._TokenBucket(m.OUT_GLOBAL_RATE, m.OUT_GLOBAL_BURST, 0.0)
+    return lim
+
+
+async def _send(lim, order, tag, prio, chat_id=-100):
+    async def cb(*_a, **_k):
+        order.append(tag)
+        return True
+    await lim.process_request(cb, (), {}, "sendMessage", {"chat_id": chat_id}, prio)
+
+
+def test_levels_survive_extbot_merge():
+    for prio in (m.OUT_HIGH, m.OUT_NORMAL, m.OUT_LOW):
+        assert ExtBot._merge_api_rl_kwargs(None, prio)
+
+
+def test_high_admitted_before_queued_low():
+    async def main():
+        lim = _drained_limiter()
+        loop = asyncio.get_running_loop()
+        lim._global.ts = loop.time()
+        lim._global.tokens = 0.0                 # سطلِ سراسری خالی → همه صف می‌کشند
+        order = []
+        lows = [asyncio.create_task(_send(lim, order, f"low{i}", m.OUT_LOW, chat_id=-i))
+                for i in range(1, 4)]
+        await asyncio.sleep(0)
+        high = asyncio.create_task(_send(lim, order, "high", m.OUT_HIGH, chat_id=-9))
+        await asyncio.gather(high, *lows)
+        return order
+    assert asyncio.run(main())[0] == "high"
+
+
+def test_low_traffic_in_chat_does_not_hold_its_high_send():
+    async def main():
+        lim = _drained_limiter()
+        loop = asyncio.get_running_loop()
+        lim._global.ts = loop.time()
+        lim._global.tokens = 0.0
+        order = []
+        lows = [asyncio.create_task(_send(lim, order, f"low{i}", m.OUT_LOW)) for i in range(8)]
+        await asyncio.sleep(0)
+        high = asyncio.create_task(_send(lim, order, "high", m.OUT_HIGH))
+        await asyncio.gather(high, *lows)
+        return order
+    assert asyncio.run(main())[0] == "high"
+
+
+def test_extbot_passes_priority_to_limiter(monkeypatch):
+    seen = []
+
+    class Probe(m.OutboundLimiter):
+        async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+            seen.append((endpoint, rate_limit_args))
+            return True
+
+    async def fake_post(self, endpoint, data, **_kw):
+        return True
+
+    monkeypatch.setattr(telegram.Bot, "_do_post", fake_post)
+
+    async def main():
+        bot = ExtBot("1:test", rate_limiter=Probe())
+        await bot.delete_message(-100, 5, rate_limit_args=m.OUT_HIGH)
+        await bot.delete_message(-100, 6)
+    asyncio.run(main())
+    assert seen == [("deleteMessage", m.OUT_HIGH), ("deleteMessage", None)]
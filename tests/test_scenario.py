@@ -0,0 +1,23 @@
+import mafia_bot as m
+
+
+def test_traits_follow_role_changes_after_dealing():
+    g = m.GameState()
+    g.scenario = m.Scenario(name="کلاسیک", roles={})
+    g.assigned_roles = {1: "پزشک", 2: "گادفادر"}
+    assert not m._is_gamer_scenario(g)
+    g.assigned_roles[2] = "دن‌کارلئونه"          # عوض‌شدنِ نقش بعد از پخش
+    assert m._is_gamer_scenario(g)
+
+
+def test_traits_are_cached_while_nothing_changes(monkeypatch):
+    g = m.GameState()
+    g.scenario = m.Scenario(name="کلاسیک", roles={})
+    g.assigned_roles = {1: "پزشک"}
+    m._scenario_traits(g)
+    calls = []
+    real = m._scenario_bind
+    monkeypatch.setattr(m, "_scenario_bind", lambda g: calls.append(1) or real(g))
+    for _ in range(3):
+        m._scenario_traits(g)
+    assert calls == []
@@ -0,0 +1,126 @@
+import ast
+import os
+import pickle
+
+import pytest
+
+import mafia_bot as m
+
+
+@pytest.fixture
+def st(tmp_path):
+    s = m.Store(path=str(tmp_path / "none.pkl"), state_dir=str(tmp_path / "state"))
+    s.load()
+    return s
+
+
+def _game(god=1, seats=None):
+    g = m.GameState()
+    g.god_id = god
+    g.seats = dict(seats or {})
+    return g
+
+
+def _read(st, cid):
+    with open(st._game_path(cid), "rb") as f:
+        return m._unpickle(f)
+
+
+def test_save_writes_only_that_game(st, monkeypatch):
+    st.games[-1] = _game(god=11)
+    st.games[-2] = _game(god=22)
+    st.save()
+    dumped = []
+    real = pickle.dumps
+    monkeypatch.setattr(m.pickle, "dumps", lambda obj, **kw: dumped.append(obj) or real(obj, **kw))
+    st.games[-1].god_id = 12
+    st.games[-2].god_id = 23                     # عوض شده ولی save نشده
+    st.save(-1)
+    assert dumped == [st.games[-1]]
+    assert _read(st, -1).god_id == 12
+    assert _read(st, -2).god_id == 22
+
+
+def test_unchanged_game_is_not_rewritten(st):
+    st.games[-1] = _game()
+    st.save(-1)
+    before = os.stat(st._game_path(-1)).st_mtime_ns
+    st.save(-1)
+    assert os.stat(st._game_path(-1)).st_mtime_ns == before
+
+
+def test_save_of_removed_game_deletes_its_file(st):
+    st.games[-1] = _game()
+    st.games[-2] = _game()
+    st.save()
+    del st.games[-1]
+    st.mark_dirty(-1)
+    assert not st._dirty_all
+    st.flush()
+    assert not os.path.exists(st._game_path(-1))
+    assert os.path.exists(st._game_path(-2))
+
+
+def test_meta_key_only_touches_meta(st):
+    st.games[-1] = _game()
+    st.save()
+    st.scenarios.append(m.Scenario("x", {"a": 1}))
+    st.games[-1].god_id = 99
+    st.save(m._META_KEY)
+    assert _read(st, -1).god_id != 99
+    with open(st._meta_path(), "rb") as f:
+        assert m._unpickle(f)["scenarios"][0].name == "x"
+
+
+def test_no_bare_store_save_call_sites():
+    path = os.path.join(os.path.dirname(m.__file__), "mafia_bot.py")
+    with open(path, encoding="utf-8-sig") as f:
+        tree = ast.parse(f.read())
+    bare = [n.lineno for n in ast.walk(tree)
+            if isinstance(n, ast.Call) and ast.unparse(n.func) == "store.save" and not n.args]
+    assert bare == []
+
+
+def test_stale_batch_does_not_overwrite_newer_write(st):
+    st.games[-1] = _game(god=1)
+    st.save(-1)
+    st.games[-1].god_id = 2
+    st.mark_dirty(-1)
+    older = st._collect()                        # دسته‌ی پس‌زمینه، هنوز به ترد نرسیده
+    st.games[-1].god_id = 3
+    st.mark_dirty(-1)
+    newer = st._collect()                        # مثلاً save(cid, durable=True)
+    assert st._write_batch(newer, durable=True) == []
+    assert st._write_batch(older) == []
+    assert _read(st, -1).god_id == 3
+
+
+def test_durable_save_writes_off_loop_and_wins(st, monkeypatch):
+    import asyncio
+    import threading
+
+    st.games[-1] = _game(god=1)
+    st.save(-1)
+    threads = []
+    real = m._atomic_write
+
+    def spy(path, data, durable=False):
+        threads.append((threading.current_thread() is threading.main_thread(), durable))
+        real(path, data, durable=durable)
+
+    monkeypatch.setattr(m, "_atomic_write", spy)
+    monkeypatch.setattr(m, "SAVE_DEBOUNCE_SEC", 0.0)
+
+    async def main():
+        st.games[-1].god_id = 2
+        st.save(-1)                              # write-behind
+        await asyncio.sleep(0.01)
+        st.games[-1].god_id = 3
+        st.save(-1, durable=True)
+        await st.drain()
+        if st._flush_task is not None:
+            await st._flush_task
+    asyncio.run(main())
+    assert _read(st, -1).god_id == 3
+    assert threads and not any(on_main for on_main, _d in threads)
+    assert threads[-1][1] is True
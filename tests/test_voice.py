@@ -0,0 +1,204 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import voice_worker as W
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_phrase_bank_reuses_and_clears_worker_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(W.os.path, "isdir", lambda p: False if p == "/dev/shm" else True)
+    monkeypatch.setattr(W.tempfile, "gettempdir", lambda: str(tmp_path))
+    monkeypatch.setenv("VOICE_WORKER_ID", "3")
+    first = W.PhraseBank()
+    (tmp_path / "mafia_voice_3" / "left.raw").write_bytes(b"x")   # کرش: close نرسید
+    second = W.PhraseBank()
+    assert first.dir == second.dir == str(tmp_path / "mafia_voice_3")
+    assert list((tmp_path / "mafia_voice_3").iterdir()) == []
+    second.close()
+    assert not (tmp_path / "mafia_voice_3").exists()
+
+
+def _voice_env(**env):
+    base = {k: v for k, v in os.environ.items()
+            if not k.startswith(("TG_SESSION", "VOICE_WORKERS"))}
+    code = "import voice_god as V; print(V.VOICE_WORKERS, len(V.TG_SESSIONS))"
+    r = subprocess.run([sys.executable, "-c", code], env={**base, **env}, cwd=ROOT,
+                       capture_output=True, text=True, check=True)
+    return r.stdout.strip().splitlines()[-1]
+
+
+def test_workers_clamped_to_unique_sessions():
+    assert _voice_env(TG_SESSION="a", TG_SESSION_2="a", VOICE_WORKERS="4") == "1 1"
+    assert _voice_env(TG_SESSION="a", TG_SESSION_2="b", VOICE_WORKERS="4") == "2 2"
+    assert _voice_env(TG_SESSION="a", TG_SESSION_2="b", TG_SESSION_3="c") == "3 3"
+
+
+def test_stub_status_when_voice_god_missing():
+    code = ("import sys; sys.modules['voice_god'] = None; import mafia_bot as m; "
+            "print(m.voice_god.status())")
+    r = subprocess.run([sys.executable, "-c", code], env={**os.environ, "TOKEN": "1:test"},
+                       cwd=ROOT, capture_output=True, text=True, check=True)
+    assert r.stdout.strip().splitlines()[-1] == "{'enabled': False, 'workers': []}"
+
+
+@pytest.fixture
+def vg(monkeypatch):
+    import voice_god as V
+    monkeypatch.setattr(V, "_workers", [])
+    monkeypatch.setattr(V, "_ring", [])
+    monkeypatch.setattr(V, "_placed", {})
+    monkeypatch.setattr(V, "_state", {"quitting": False})
+    monkeypatch.setattr(V, "TG_SESSIONS", ["a", "b"])
+    monkeypatch.setattr(V, "VOICE_WORKERS", 2)
+    monkeypatch.setattr(V, "enabled", lambda: True)
+    monkeypatch.setattr(V.os.path, "isfile", lambda p: True)
+    pinged = []
+
+    async def pinger(w):
+        pinged.append(w.wid)
+        await asyncio.Event().wait()
+
+    async def spawn(w):
+        V._ensure_pinger(w)
+        if w.wid == 0:
+            w.ready = True
+        else:
+            await asyncio.Event().wait()      # کارگرِ هنگ‌کرده
+        return w.ready
+
+    monkeypatch.setattr(V, "_pinger", pinger)
+    monkeypatch.setattr(V, "_spawn", spawn)
+    return V, pinged
+
+
+def _cancel_all(V):
+    for w in V._workers:
+        for t in (w.pinger, w.spawning):
+            if t is not None:
+                t.cancel()
+
+
+def test_start_returns_on_first_ready_worker(vg):
+    V, pinged = vg
+
+    async def main():
+        ok = await asyncio.wait_for(V.start(), timeout=1)
+        await asyncio.sleep(0)
+        _cancel_all(V)
+        return ok
+
+    assert asyncio.run(main()) is True
+    assert sorted(pinged) == [0, 1]
+
+
+def test_pingers_survive_a_cancelled_start(vg, monkeypatch):
+    V, pinged = vg
+    monkeypatch.setattr(V, "TG_SESSIONS", ["b"])
+    monkeypatch.setattr(V, "VOICE_WORKERS", 1)
+
+    async def main():
+        V._workers.append(V._Worker(1, "b"))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(V.start(), timeout=0.05)
+        await asyncio.sleep(0)
+        alive = [not w.pinger.done() and not w.spawning.done() for w in V._workers]
+        _cancel_all(V)
+        return alive
+
+    assert asyncio.run(main()) == [True]
+    assert pinged == [1]
+
+
+class _File:
+    def __init__(self, data, unique):
+        self.data, self.file_unique_id = data, unique
+
+    async def download_as_bytearray(self):
+        return bytearray(self.data)
+
+
+class _Bot:
+    def __init__(self, files):
+        self.files, self.docs = files, []
+
+    async def get_file(self, fid):
+        return self.files[fid]
+
+    async def send_document(self, chat_id, document=None, filename=None, **kw):
+        self.docs.append((chat_id, filename, len(document)))
+        return SimpleNamespace(document=SimpleNamespace(file_id="conv-new"))
+
+
+@pytest.fixture
+def install(tmp_path, monkeypatch):
+    import mafia_bot as m
+    import voice_god as V
+    monkeypatch.setattr(V, "CUSTOM_DIR", str(tmp_path / "custom"))
+    monkeypatch.setattr(V, "CONVERTED_DIR", str(tmp_path / "converted"))
+    monkeypatch.setattr(V, "_broadcast", lambda obj: None)
+    converts, threads = [], []
+    real_converted = V.converted
+
+    def converted(unique):
+        threads.append(threading.current_thread() is threading.main_thread())
+        return real_converted(unique)
+
+    async def convert(data):
+        converts.append(len(data))
+        return b"o" * 2048
+
+    monkeypatch.setattr(V, "converted", converted)
+    monkeypatch.setattr(V, "convert_phrase", convert)
+    monkeypatch.setattr(m, "voice_god", V)
+    return m, converts, threads, tmp_path
+
+
+def test_install_after_deploy_uses_conv_without_ffmpeg(install):
+    m, converts, threads, tmp = install
+    bot = _Bot({"orig": _File(b"x" * 4096, "U1"), "conv-old": _File(b"c" * 2048, "C1")})
+    ok, path, uniq, conv = asyncio.run(
+        m._voice_install_from_file_id(bot, "day", "orig", "U1", "conv-old"))
+    assert ok and conv == "conv-old" and uniq == "U1"
+    assert converts == [] and bot.docs == []
+    assert (tmp / "custom" / "day.opus").read_bytes() == b"c" * 2048
+    assert threads and not any(threads)
+
+
+def test_first_install_converts_once_and_uploads(install):
+    m, converts, _threads, tmp = install
+    bot = _Bot({"orig": _File(b"x" * 4096, "U1")})
+    ok, _path, uniq, conv = asyncio.run(m._voice_install_from_file_id(bot, "day", "orig"))
+    assert ok and uniq == "U1" and conv == "conv-new"
+    assert converts == [4096]
+    assert bot.docs == [(m.ADMIN_ID, "day.opus", 2048)]
+    assert (tmp / "converted" / "U1.opus").exists()
+
+
+def test_bank_miss_loads_off_the_loop_and_keeps_one_copy(tmp_path, monkeypatch):
+    import voice_god as V
+    monkeypatch.setattr(W.tempfile, "gettempdir", lambda: str(tmp_path))
+    monkeypatch.setattr(W.os.path, "isdir", lambda p: False if p == "/dev/shm" else True)
+    on_main = []
+
+    def phrase_bytes(key):
+        on_main.append(threading.current_thread() is threading.main_thread())
+        V._PCM["/x/" + key] = b"p" * 96000       # همان کشی که decode_pcm پر می‌کند
+        return b"p" * 96000
+
+    monkeypatch.setattr(V, "phrase_bytes", phrase_bytes)
+    bank = W.PhraseBank()
+    try:
+        path, sec = asyncio.run(bank.get("night"))
+        assert on_main == [False]
+        assert sec == pytest.approx(1.0) and os.path.getsize(path) == 96000
+        assert V._PCM == {} and V._VOTE_MEM == {}
+        assert asyncio.run(bank.get("night")) == (path, sec) and on_main == [False]
+    finally:
+        bank.close()
@@ -5,11 +5,16 @@
   دقیقاً مثلِ قبل کار می‌کند. هیچ خطایی از این ماژول به بیرون نشت نمی‌کند.
 - کارگر در پروسهٔ جدا اجرا می‌شود: کرش، هنگ یا قطعیِ اکانت فقط «صدا» را می‌برد،
   نه بات را؛ و همین‌جا خودکار دوباره بالا می‌آید (با سقفِ تلاش).
-- جمله‌ها از قبل ساخته شده‌اند (voice/<صدا>/<کلید>.raw — PCM خام ۴۸kHz مونو).
-- صدای سفارشی (وویسِ آپلودشده در پیویِ سازنده) در voice/custom/<کلید>.raw می‌نشیند
+- جمله‌ها از قبل ساخته شده‌اند (voice/<صدا>/<کلید>.opus — یا .rawِ قدیمی، PCM خام ۴۸kHz
+  مونو). کارگر موقعِ بالا آمدن همه را یک‌بار به PCM باز می‌کند؛ convert_voice.py .rawها
+  را به .opus تبدیل می‌کند.
+- صدای سفارشی (وویسِ آپلودشده در پیویِ سازنده) در voice/custom/<کلید>.opus می‌نشیند
   و بر صدای پیش‌فرض اولویت دارد. تبدیلش با ffmpegِ همراهِ imageio-ffmpeg است.
 - TG_VOICE = dilara (پیش‌فرض) | farid
 - TG_VOLUME = بلندیِ اکانت در وویس‌چت، ۱ تا ۲۰۰ (پیش‌فرض ۱۵۰)
+- چند کارگر: VOICE_WORKERS = تعدادِ پروسه‌ها؛ TG_SESSION_2، TG_SESSION_3، … اکانت‌های اضافه
+  (هر کارگر یک سشنِ یکتا؛ بیشتر از تعدادِ سشن‌ها کارگر بالا نمی‌آید).
+  هر گروه با هشِ سازگار به یک کارگر می‌رسد؛ اگر کارگری بیفتد گروه‌هایش به بقیه می‌روند.
 """
 import os
 import re
@@ -17,22 +22,52 @@ import sys
 import json
 import time
 import asyncio
+import bisect
+import hashlib
+import subprocess
 
 TG_API_ID = os.environ.get("TG_API_ID", "").strip()
 TG_API_HASH = os.environ.get("TG_API_HASH", "").strip()
 TG_SESSION = os.environ.get("TG_SESSION", "").strip()
+
+
+def _extra_sessions() -> list[str]:
+    """TG_SESSION_2، TG_SESSION_3، … — اکانت‌های اضافه برای کارگرهای بیشتر (اختیاری)."""
+    found, n = [], 2
+    while True:
+        s = os.environ.get(f"TG_SESSION_{n}", "").strip()
+        if not s:
+            return found
+        found.append(s)
+        n += 1
+
+
+# تکراری‌ها حذف (به همان ترتیب): یک StringSession در دو پروسه‌ی هم‌زمان → AUTH_KEY_DUPLICATED
+TG_SESSIONS = list(dict.fromkeys(([TG_SESSION] if TG_SESSION else []) + _extra_sessions()))
 TG_VOICE = (os.environ.get("TG_VOICE", "dilara").strip() or "dilara").lower()
 try:
     TG_VOLUME = max(1, min(200, int(os.environ.get("TG_VOLUME", "150"))))
 except ValueError:
     TG_VOLUME = 150
+# 🧩 تعدادِ پروسه‌های کارگر (پیش‌فرض: یکی به ازای هر سشن). هر کارگر سشنِ خودش را می‌خواهد —
+#    تلگرام یک کلیدِ احرازِ هویت را در دو اتصالِ هم‌زمان نمی‌پذیرد، پس سقف = تعدادِ سشن‌ها.
+try:
+    VOICE_WORKERS = max(1, min(8, int(os.environ.get("VOICE_WORKERS", "0")) or len(TG_SESSIONS) or 1))
+except ValueError:
+    VOICE_WORKERS = max(1, len(TG_SESSIONS))
+if TG_SESSIONS and VOICE_WORKERS > len(TG_SESSIONS):
+    print(f"⚠️ VOICE_WORKERS={VOICE_WORKERS} ولی فقط {len(TG_SESSIONS)} سشنِ یکتا هست "
+          f"(TG_SESSION، TG_SESSION_2، …) — {len(TG_SESSIONS)} کارگر بالا می‌آید.")
+    VOICE_WORKERS = len(TG_SESSIONS)
 
 _HERE = os.path.dirname(os.path.abspath(__file__))
 VOICE_DIR = os.path.join(_HERE, "voice")
 CUSTOM_DIR = os.path.join(VOICE_DIR, "custom")
-CACHE_DIR = os.path.join(VOICE_DIR, "cache")     # جمله‌های سرِهم‌شده (قابلِ بازسازی)
+CONVERTED_DIR = os.path.join(VOICE_DIR, "converted")   # خروجیِ convert_phrase، با نامِ file_unique_id
 WORKER_PATH = os.path.join(_HERE, "voice_worker.py")
 PCM_BYTES_PER_SEC = 48000 * 2          # s16le, mono
+PHRASE_EXTS = (".opus", ".raw")        # قالب‌های روی دیسک، به ترتیبِ ترجیح
+OPUS_BITRATE = "32k"                   # گفتار؛ ~۲۵ برابر کوچک‌تر از PCM
 
 # جمله‌های موجود (کلید → فایل)
 PHRASES = ("time_up", "day", "night", "temp_night", "temp_night_end",
@@ -49,103 +84,248 @@ RESTART_MAX = 6             # حداکثر تلاش در هر پنجره
 RESTART_WINDOW = 3600       # طولِ پنجره (ثانیه)
 PING_EVERY = 90             # هر چند ثانیه یک پینگ
 PING_TIMEOUT = 30           # بی‌جوابی بیش از این → کارگر هنگ کرده → کشته و دوباره ساخته می‌شود
+RING_REPLICAS = 64          # گره‌های مجازیِ هر کارگر روی حلقه‌ی هش
 
-_state = {
-    "proc": None, "ready": False, "info": {}, "quitting": False,
-    "ready_evt": None, "restarts": [], "ping_id": 0, "pong_id": 0,
-}
+
+class _Worker:
+    """یک پروسهٔ voice_worker.py با سشنِ خودش؛ وضعیتی که قبلاً سراسری بود، حالا به ازای هر کارگر."""
+
+    def __init__(self, wid: int, session: str):
+        self.wid = wid
+        self.session = session
+        self.proc = None
+        self.ready = False
+        self.info: dict = {}
+        self.ready_evt = None
+        self.restarts: list[float] = []
+        self.ping_id = 0
+        self.pong_id = 0
+        self.ping_at = 0.0
+        self.rtt = None               # زمانِ رفت‌وبرگشتِ آخرین پینگ (ثانیه)
+        self.health: dict = {}        # آخرین گزارشِ @@PONG
+        self.pinger = None            # تسکِ _pinger — از لحظه‌ی ساختِ کارگر، مستقل از start()
+        self.spawning = None          # تسکِ _spawnِ در جریان
+
+    @property
+    def tag(self) -> str:
+        return f"#{self.wid}"
+
+
+_state = {"quitting": False}
+_workers: list[_Worker] = []
+_ring: list[tuple[int, int]] = []      # (هش، wid) مرتب
+_placed: dict[int, int] = {}           # chat_id → wid؛ وویس‌چتِ در جریان روی همان کارگر می‌ماند
 
 
 def enabled() -> bool:
-    return bool(TG_API_ID and TG_API_HASH and TG_SESSION)
+    return bool(TG_API_ID and TG_API_HASH and TG_SESSIONS)
 
 
 def ready() -> bool:
-    return bool(_state["ready"])
+    return any(w.ready for w in _workers)
 
 
 # ─── فایل‌های صدا (مشترک با کارگر) ─────────────────────────────
-def custom_path(key: str) -> str:
-    return os.path.join(CUSTOM_DIR, f"{key}.raw")
+def _find(folder: str, key: str):
+    for ext in PHRASE_EXTS:
+        p = os.path.join(folder, key + ext)
+        if os.path.isfile(p) and os.path.getsize(p) > 0:
+            return p
+    return None
+
+
+def custom_path(key: str):
+    return _find(CUSTOM_DIR, key)
 
 
 def has_custom(key: str) -> bool:
-    p = custom_path(key)
-    return os.path.isfile(p) and os.path.getsize(p) > 0
+    return custom_path(key) is not None
 
 
 def _default_path(key: str):
     """فایلِ پیش‌فرضِ یک کلید: صدای انتخابی → dilara."""
     for voice in (TG_VOICE, "dilara"):
-        p = os.path.join(VOICE_DIR, voice, f"{key}.raw")
-        if os.path.isfile(p):
+        p = _find(os.path.join(VOICE_DIR, voice), key)
+        if p:
             return p
     return None
 
 
-def _vote_path(n: int):
-    """🗳 «رأی‌گیری برای صندلیِ n»: سفارشیِ کامل، وگرنه پیشوند + شماره را سرِ هم می‌کند."""
-    if has_custom(f"vote_{n}"):
-        return custom_path(f"vote_{n}")
-    prefix = custom_path("vote_prefix") if has_custom("vote_prefix") else _default_path("vote_prefix")
-    num = _default_path(f"num_{n}")
-    if not prefix or not num:
+# 🗜 PCMِ بازشده‌ی هر فایل (مسیر → bytes): هر .opus فقط یک‌بار از ffmpeg رد می‌شود، حتی اگر
+#    پیشوند در هر ۲۰ vote_N به کار برود. با عوض‌شدنِ صدای سفارشی، invalidate پاکش می‌کند.
+_PCM: dict[str, bytes] = {}
+
+
+def decode_pcm(path: str):
+    """فایلِ جمله → PCM خام (s16le ۴۸kHz مونو). .raw همان‌طور خوانده می‌شود."""
+    if path.endswith(".raw"):
+        with open(path, "rb") as f:
+            return f.read()
+    ff = ffmpeg_exe()
+    if not ff:
         return None
-    try:
-        os.makedirs(CACHE_DIR, exist_ok=True)
-        # 🔑 نامِ کش از «هویتِ» منابع ساخته می‌شود (سفارشی/پیش‌فرض + زمان + اندازه) —
-        #    پس با حذف یا تعویضِ پیشوندِ سفارشی، خودبه‌خود کشِ تازه ساخته می‌شود
-        sig = "_".join(f"{'c' if p.startswith(CUSTOM_DIR) else 'd'}{int(os.path.getmtime(p))}-{os.path.getsize(p)}"
-                       for p in (prefix, num))
-        out = os.path.join(CACHE_DIR, f"vote_{n}__{sig}.raw")
-        if os.path.isfile(out) and os.path.getsize(out) > 0:
-            return out
-        with open(prefix, "rb") as a, open(num, "rb") as b:
-            data = a.read() + b.read()
-        tmp = out + ".tmp"
-        with open(tmp, "wb") as f:
-            f.write(data)
-        os.replace(tmp, out)
-        # 🧹 کش‌های قدیمیِ همین صندلی
-        for fn in os.listdir(CACHE_DIR):
-            if fn.startswith(f"vote_{n}__") and fn != os.path.basename(out):
-                try:
-                    os.remove(os.path.join(CACHE_DIR, fn))
-                except Exception:
-                    pass
-        return out
-    except Exception as e:
-        print("⚠️ گادِ صوتی: ساختِ جملهٔ رأی‌گیری:", repr(e))
+    r = subprocess.run([ff, "-hide_banner", "-loglevel", "error", "-i", path,
+                        "-f", "s16le", "-acodec", "pcm_s16le", "-ar", "48000", "-ac", "1", "pipe:1"],
+                       capture_output=True, timeout=60)
+    if r.returncode != 0 or not r.stdout:
+        print("⚠️ گادِ صوتی: بازکردنِ", os.path.basename(path), (r.stderr or b"")[:200].decode("utf-8", "ignore"))
         return None
+    return r.stdout
+
+
+def _read(path: str):
+    data = _PCM.get(path)
+    if data is None:
+        data = decode_pcm(path)
+        if data is not None:
+            _PCM[path] = data
+    return data
+
+
+def _source_path(key: str):
+    """فایلِ یک کلیدِ ساده: سفارشی → صدای انتخابی → dilara."""
+    return custom_path(key) or _default_path(key)
+
+
+# 🗳 vote_Nهای سرِهم‌شده فقط در حافظه‌اند (نه فایلِ کش): یک‌بار ساخته می‌شوند و فقط
+#    وقتی یکی از ورودی‌هایشان (vote_N، پیشوند یا num_N) با save/remove_custom عوض شود، از نو.
+_VOTE_MEM: dict[int, bytes] = {}
+
+
+def _vote_bytes(n: int):
+    """🗳 «رأی‌گیری برای صندلیِ n»: سفارشیِ کامل، وگرنه پیشوند + شماره."""
+    data = _VOTE_MEM.get(n)
+    if data is not None:
+        return data
+    if has_custom(f"vote_{n}"):
+        data = _read(custom_path(f"vote_{n}"))
+    else:
+        prefix, num = _source_path("vote_prefix"), _default_path(f"num_{n}")
+        if not prefix or not num:
+            return None
+        a, b = _read(prefix), _read(num)
+        data = b"".join((a, b)) if a and b else None
+    if data is None:
+        return None
+    _VOTE_MEM[n] = data
+    return data
+
+
+def invalidate(key: str):
+    """ورودیِ key عوض شد → PCMِ سفارشی‌اش و vote_Nهایی که به آن وابسته‌اند از نو ساخته شوند."""
+    for ext in PHRASE_EXTS:
+        _PCM.pop(os.path.join(CUSTOM_DIR, key + ext), None)
+    m = _VOTE_RE.match(key or "")
+    if m:
+        _VOTE_MEM.pop(int(m.group(1)), None)
+    elif key == "vote_prefix":
+        _VOTE_MEM.clear()
+    elif key.startswith("num_"):
+        try:
+            _VOTE_MEM.pop(int(key[4:]), None)
+        except ValueError:
+            pass
+
+
+def drop_decoded():
+    """PCMهای بازشده و vote_Nهای سرِهم‌شده از حافظه بیرون — وقتی مصرف‌کننده (بانکِ کارگر)
+    نسخه‌ی خودش را دارد. دفعه‌ی بعد که لازم شوند، از نو ساخته می‌شوند."""
+    _PCM.clear()
+    _VOTE_MEM.clear()
 
 
-def phrase_path(key: str):
-    """مسیرِ فایلِ جمله: سفارشی → صدای انتخابی → dilara. (vote_N سرِ هم می‌شود)"""
+def phrase_bytes(key: str):
+    """PCMِ یک جمله: سفارشی → صدای انتخابی → dilara (vote_N در حافظه سرِ هم می‌شود)."""
     m = _VOTE_RE.match(key or "")
     if m:
         n = int(m.group(1))
-        return _vote_path(n) if 1 <= n <= VOTE_SEAT_MAX else None
-    if has_custom(key):
-        return custom_path(key)
-    return _default_path(key)
+        return _vote_bytes(n) if 1 <= n <= VOTE_SEAT_MAX else None
+    path = _source_path(key)
+    return _read(path) if path else None
 
 
-def save_custom(key: str, raw: bytes) -> str:
+def _write_custom(key: str, data: bytes, ext: str) -> str:
     os.makedirs(CUSTOM_DIR, exist_ok=True)
-    p = custom_path(key)
+    p = os.path.join(CUSTOM_DIR, key + ext)
     tmp = p + ".tmp"
     with open(tmp, "wb") as f:
-        f.write(raw)
+        f.write(data)
     os.replace(tmp, p)
+    for other in PHRASE_EXTS:
+        if other != ext:
+            try:
+                os.remove(os.path.join(CUSTOM_DIR, key + other))
+            except FileNotFoundError:
+                pass
     return p
 
 
-def remove_custom(key: str) -> bool:
+def save_custom(key: str, data: bytes, ext: str = ".opus") -> str:
+    """ذخیره‌ی صدای سفارشی (خروجیِ convert_phrase). نسخه‌ی قبلی با هر قالبی پاک می‌شود."""
+    p = _write_custom(key, data, ext)
+    invalidate(key)
+    _broadcast({"cmd": "reload", "key": key})      # بانکِ هر کارگر همین یک کلید را تازه کند
+    return p
+
+
+async def asave_custom(key: str, data: bytes, ext: str = ".opus") -> str:
+    """همان save_custom از داخلِ حلقه: نوشتنِ دیسک در ترد، خبر به کارگرها روی حلقه."""
+    p = await asyncio.to_thread(_write_custom, key, data, ext)
+    invalidate(key)
+    _broadcast({"cmd": "reload", "key": key})
+    return p
+
+
+# ♻️ کشِ تبدیلِ محلی: file_unique_id تلگرام برای یک فایل ثابت است، پس خروجیِ ffmpeg برای همان
+#    آپلود دوباره لازم نیست. این پوشه فقط ری‌استارت‌های داخلِ همان کانتینر را پوشش می‌دهد؛
+#    بعد از دیپلوی (دیسکِ تازه) خروجیِ تبدیل‌شده از روی conv (file_idِ آپلودشده) برمی‌گردد.
+def _converted_path(unique: str):
+    u = re.sub(r"[^A-Za-z0-9_-]", "", unique or "")
+    return os.path.join(CONVERTED_DIR, u + ".opus") if u else None
+
+
+def converted(unique: str):
+    """خروجیِ تبدیل‌شده‌ی قبلیِ یک فایلِ تلگرام (bytes) یا None."""
+    p = _converted_path(unique)
     try:
-        os.remove(custom_path(key))
-        return True
-    except FileNotFoundError:
+        with open(p, "rb") as f:
+            data = f.read()
+        return data if len(data) >= 1024 else None
+    except (OSError, TypeError):
+        return None
+
+
+def remember_converted(unique: str, data: bytes):
+    p = _converted_path(unique)
+    if not p or not data:
+        return
+    try:
+        os.makedirs(CONVERTED_DIR, exist_ok=True)
+        tmp = p + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, p)
+    except OSError as e:
+        print("⚠️ گادِ صوتی: کشِ تبدیل نوشته نشد:", e)
+
+
+def remove_custom(key: str) -> bool:
+    removed = False
+    for ext in PHRASE_EXTS:
+        try:
+            os.remove(os.path.join(CUSTOM_DIR, key + ext))
+            removed = True
+        except FileNotFoundError:
+            pass
+    if not removed:
         return False
+    invalidate(key)
+    _broadcast({"cmd": "reload", "key": key})
+    return True
+
+
+# ⚙️ تنظیمِ مشترکِ Opus برای آپلودها و convert_voice.py
+OPUS_ARGS = ("-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip")
 
 
 def ffmpeg_exe():
@@ -158,9 +338,9 @@ def ffmpeg_exe():
         return None
 
 
-async def convert_to_raw(data: bytes):
-    """هر فایلِ صوتی (ogg/mp3/m4a/…) → PCM خام ۴۸kHz مونو، با نرمال‌سازیِ بلندی.
-    خروجی bytes یا None. هرگز استثنا نمی‌اندازد."""
+async def convert_phrase(data: bytes):
+    """هر فایلِ صوتی (ogg/mp3/m4a/…) → Ogg/Opus ۴۸kHz مونو، با نرمال‌سازیِ بلندی
+    (برای save_custom). خروجی bytes یا None. هرگز استثنا نمی‌اندازد."""
     ff = ffmpeg_exe()
     if not ff or not data:
         return None
@@ -171,13 +351,13 @@ async def convert_to_raw(data: bytes):
     cmd = [ff, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
            "-af", f"{trim},areverse,{trim},areverse,"
                   "loudnorm=I=-14:TP=-1.5:LRA=11,adelay=150|150,apad=pad_dur=0.25",
-           "-f", "s16le", "-acodec", "pcm_s16le", "-ar", "48000", "-ac", "1", "pipe:1"]
+           "-ar", "48000", "-ac", "1", *OPUS_ARGS, "-f", "ogg", "pipe:1"]
     try:
         proc = await asyncio.create_subprocess_exec(
             *cmd, stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
         out, err = await asyncio.wait_for(proc.communicate(input=data), timeout=60)
-        if proc.returncode != 0 or len(out) < PCM_BYTES_PER_SEC // 4:
+        if proc.returncode != 0 or len(out) < 1024:
             print("⚠️ گادِ صوتی: ffmpeg:", (err or b"")[:300].decode("utf-8", "ignore"))
             return None
         return out
@@ -186,9 +366,44 @@ async def convert_to_raw(data: bytes):
         return None
 
 
-# ─── پروسهٔ کارگر ───────────────────────────────────────────
+# ─── پروسه‌های کارگر ─────────────────────────────────────────
+def _h(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+
+
+def _build_ring():
+    _ring[:] = sorted((_h(f"{w.wid}:{r}"), w.wid) for w in _workers for r in range(RING_REPLICAS))
+
+
+def _ring_pick(chat_id: int):
+    """هشِ سازگار: اولین گرهِ «آماده» بعد از هشِ گروه. کارگرِ مرده رد می‌شود، پس فقط
+    گروه‌های همان کارگر جابه‌جا می‌شوند و بقیه سرِ جایشان می‌مانند."""
+    if not _ring:
+        return None
+    i = bisect.bisect_left(_ring, (_h(str(chat_id)), -1))
+    for k in range(len(_ring)):
+        w = _workers[_ring[(i + k) % len(_ring)][1]]
+        if w.ready:
+            return w
+    return None
+
+
+def _worker_for(chat_id: int):
+    wid = _placed.get(chat_id)
+    if wid is not None and _workers[wid].ready:
+        return _workers[wid]
+    w = _ring_pick(chat_id)
+    if w is None:
+        _placed.pop(chat_id, None)
+        return None
+    _placed[chat_id] = w.wid
+    return w
+
+
 async def start() -> bool:
-    """بالا آوردنِ کارگر و انتظار برای آماده‌شدنش. هرگز استثنا نمی‌اندازد."""
+    """بالا آوردنِ همه‌ی کارگرها (هم‌زمان). هرگز استثنا نمی‌اندازد.
+    به محضِ آماده‌شدنِ اولین کارگر True برمی‌گردد؛ بقیه در پس‌زمینه بالا می‌آیند — حتی اگر
+    صدا‌زننده (wait_for) start را لغو کند، اسپاون‌ها و پینگرها زنده می‌مانند."""
     if not enabled():
         print("🎙 گادِ صوتی خاموش — TG_API_ID/TG_API_HASH/TG_SESSION تنظیم نشده.")
         return False
@@ -196,38 +411,57 @@ async def start() -> bool:
         print("🎙 گادِ صوتی خاموش — voice_worker.py پیدا نشد.")
         return False
     _state["quitting"] = False
-    ok = await _spawn()
-    if ok:
-        asyncio.get_running_loop().create_task(_pinger())
-    return ok
-
-
-async def _spawn() -> bool:
+    if not _workers:
+        _workers.extend(_Worker(i, TG_SESSIONS[i]) for i in range(VOICE_WORKERS))
+        _build_ring()
+    loop = asyncio.get_running_loop()
+    for w in _workers:
+        _ensure_pinger(w)
+        if w.proc is None and (w.spawning is None or w.spawning.done()):
+            w.spawning = loop.create_task(_spawn(w))
+    pending = {w.spawning for w in _workers if w.spawning is not None and not w.spawning.done()}
+    while not ready() and pending:
+        _done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    if len(_workers) > 1:
+        n = sum(w.ready for w in _workers)
+        print(f"🎙 گادِ صوتی: {n}/{len(_workers)} کارگر آماده"
+              + (" — بقیه در پس‌زمینه بالا می‌آیند." if n < len(_workers) and pending else "."))
+    return ready()
+
+
+def _ensure_pinger(w: _Worker):
+    if w.pinger is None or w.pinger.done():
+        w.pinger = asyncio.get_running_loop().create_task(_pinger(w))
+
+
+async def _spawn(w: _Worker) -> bool:
+    _ensure_pinger(w)                   # مسیرِ _restart_later هم پینگر را تضمین می‌کند
     evt = asyncio.Event()
-    _state.update(ready=False, ready_evt=evt, info={})
+    w.ready, w.ready_evt, w.info, w.health = False, evt, {}, {}
+    env = dict(os.environ, TG_SESSION=w.session, VOICE_WORKER_ID=str(w.wid))
     try:
         proc = await asyncio.create_subprocess_exec(
             sys.executable, "-u", WORKER_PATH,
             stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
             stderr=None,                        # stderr مستقیم به لاگِ رندر
-            cwd=_HERE)
+            cwd=_HERE, env=env)
     except Exception as e:
-        print("⛔ گادِ صوتی: کارگر اجرا نشد:", repr(e))
+        print(f"⛔ گادِ صوتی {w.tag}: کارگر اجرا نشد:", repr(e))
         return False
-    _state["proc"] = proc
-    asyncio.get_running_loop().create_task(_pump(proc))
+    w.proc = proc
+    asyncio.get_running_loop().create_task(_pump(w, proc))
     try:
         await asyncio.wait_for(evt.wait(), timeout=60)
     except asyncio.TimeoutError:
-        print("⚠️ گادِ صوتی: کارگر در ۶۰ ثانیه آماده نشد.")
-    if _state["ready"]:
-        info = _state["info"]
-        print(f"🎙 گادِ صوتی آماده: {info.get('name', '')} (@{info.get('username') or '—'}) — "
+        print(f"⚠️ گادِ صوتی {w.tag}: کارگر در ۶۰ ثانیه آماده نشد.")
+    if w.ready:
+        info = w.info
+        print(f"🎙 گادِ صوتی {w.tag} آماده: {info.get('name', '')} (@{info.get('username') or '—'}) — "
               f"صدا: {TG_VOICE} | بلندی: {TG_VOLUME} | پروسهٔ جدا pid={proc.pid}")
-    return bool(_state["ready"])
+    return w.ready
 
 
-async def _pump(proc):
+async def _pump(w: _Worker, proc):
     """خواندنِ stdoutِ کارگر: خط‌های @@ پروتکل‌اند، بقیه لاگ. با پایانِ پروسه → راه‌اندازیِ دوباره."""
     try:
         while True:
@@ -237,84 +471,103 @@ async def _pump(proc):
             line = raw.decode("utf-8", "ignore").rstrip("\n")
             if line.startswith("@@READY"):
                 try:
-                    _state["info"] = json.loads(line[len("@@READY"):].strip() or "{}")
+                    w.info = json.loads(line[len("@@READY"):].strip() or "{}")
                 except Exception:
-                    _state["info"] = {}
-                _state["ready"] = True
-                if _state["ready_evt"]:
-                    _state["ready_evt"].set()
+                    w.info = {}
+                w.ready = True
+                if w.ready_evt:
+                    w.ready_evt.set()
             elif line.startswith("@@FAILED"):
-                print("⛔ گادِ صوتی:", line[len("@@FAILED"):].strip())
-                if _state["ready_evt"]:
-                    _state["ready_evt"].set()
+                print(f"⛔ گادِ صوتی {w.tag}:", line[len("@@FAILED"):].strip())
+                if w.ready_evt:
+                    w.ready_evt.set()
             elif line.startswith("@@PONG"):
+                # @@PONG <id> [{"joined":…,"playing":…,…}] — گزارشِ سلامت همراهِ پونگ
+                parts = line.split(maxsplit=2)
                 try:
-                    _state["pong_id"] = int(line.split()[1])
+                    pid = int(parts[1])
+                    if pid == w.ping_id:
+                        w.rtt = time.monotonic() - w.ping_at
+                    w.pong_id = max(w.pong_id, pid)
+                    if len(parts) > 2:
+                        w.health = json.loads(parts[2])
                 except Exception:
                     pass
             elif line:
-                print("🎙│", line)
+                print(f"🎙{w.tag}│" if len(_workers) > 1 else "🎙│", line)
     except Exception as e:
-        print("⚠️ گادِ صوتی: خواندنِ خروجیِ کارگر:", repr(e))
+        print(f"⚠️ گادِ صوتی {w.tag}: خواندنِ خروجیِ کارگر:", repr(e))
     finally:
         code = None
         try:
             code = await asyncio.wait_for(proc.wait(), timeout=5)
         except Exception:
             pass
-        if _state["proc"] is proc:
-            _state["ready"] = False
-            _state["proc"] = None
-            if _state["ready_evt"]:
-                _state["ready_evt"].set()
+        if w.proc is proc:
+            w.ready = False
+            w.proc = None
+            if w.ready_evt:
+                w.ready_evt.set()
+            # ↪️ گروه‌های این کارگر با اولین say روی حلقه به کارگرِ آماده‌ی بعدی می‌روند
+            moved = [c for c, wid in _placed.items() if wid == w.wid]
+            for c in moved:
+                del _placed[c]
+            if moved and ready() and not _state["quitting"]:
+                print(f"↪️ گادِ صوتی {w.tag}: {len(moved)} گروه به کارگرهای دیگر می‌رود.")
         if not _state["quitting"]:
-            print(f"⚠️ گادِ صوتی: کارگر خارج شد (code={code}) — بات سالم است؛ فقط صدا قطع شد.")
-            asyncio.get_running_loop().create_task(_restart_later())
+            print(f"⚠️ گادِ صوتی {w.tag}: کارگر خارج شد (code={code}) — بات سالم است؛ فقط صدا قطع شد.")
+            asyncio.get_running_loop().create_task(_restart_later(w))
 
 
-async def _restart_later():
+async def _restart_later(w: _Worker):
     now = time.time()
-    _state["restarts"] = [t for t in _state["restarts"] if now - t < RESTART_WINDOW]
-    if len(_state["restarts"]) >= RESTART_MAX:
-        print(f"⛔ گادِ صوتی: {RESTART_MAX} بار در یک ساعت افتاد — دیگر تلاش نمی‌کنم "
+    w.restarts = [t for t in w.restarts if now - t < RESTART_WINDOW]
+    if len(w.restarts) >= RESTART_MAX:
+        print(f"⛔ گادِ صوتی {w.tag}: {RESTART_MAX} بار در یک ساعت افتاد — دیگر تلاش نمی‌کنم "
               f"(با دیپلوی/ری‌استارت دوباره امتحان می‌شود).")
         return
-    _state["restarts"].append(now)
+    w.restarts.append(now)
     await asyncio.sleep(RESTART_DELAY)
-    if _state["quitting"] or _state["proc"] is not None:
+    if _state["quitting"] or w.proc is not None:
         return
-    print("🔄 گادِ صوتی: بالا آوردنِ دوبارهٔ کارگر…")
-    await _spawn()
+    print(f"🔄 گادِ صوتی {w.tag}: بالا آوردنِ دوبارهٔ کارگر…")
+    await _spawn(w)
 
 
-async def _pinger():
+async def _pinger(w: _Worker):
     """هر چند ثانیه یک پینگ؛ اگر کارگر جواب نداد، هنگ کرده → کشته می‌شود (و _pump دوباره می‌سازد)."""
     while not _state["quitting"]:
         await asyncio.sleep(PING_EVERY)
-        proc = _state["proc"]
-        if proc is None or not _state["ready"]:
+        proc = w.proc
+        if proc is None or not w.ready:
             continue
-        _state["ping_id"] += 1
-        pid = _state["ping_id"]
-        _send({"cmd": "ping", "id": pid})
+        w.ping_id += 1
+        pid = w.ping_id
+        w.ping_at = time.monotonic()
+        _send(w, {"cmd": "ping", "id": pid})
         await asyncio.sleep(PING_TIMEOUT)
-        if _state["proc"] is proc and _state["pong_id"] < pid:
-            print("⚠️ گادِ صوتی: کارگر به پینگ جواب نداد — هنگ کرده؛ کشته می‌شود.")
+        if w.proc is proc and w.pong_id < pid:
+            print(f"⚠️ گادِ صوتی {w.tag}: کارگر به پینگ جواب نداد — هنگ کرده؛ کشته می‌شود.")
             try:
                 proc.kill()
             except Exception:
                 pass
 
 
-def _send(obj: dict):
-    proc = _state["proc"]
+def _send(w: _Worker, obj: dict):
+    proc = w.proc
     if proc is None or proc.stdin is None:
         return
     try:
         proc.stdin.write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
         asyncio.get_running_loop().create_task(_drain(proc))
     except Exception as e:
-        print("⚠️ گادِ صوتی: ارسال به کارگر:", repr(e))
+        print(f"⚠️ گادِ صوتی {w.tag}: ارسال به کارگر:", repr(e))
+
+
+def _broadcast(obj: dict):
+    for w in _workers:
+        _send(w, obj)
 
 
 async def _drain(proc):
@@ -327,26 +580,41 @@ async def _drain(proc):
 # ─── API برای بات ───────────────────────────────────────────
 def say(chat_id: int, key: str):
     """🔊 پخشِ یک جمله در وویس‌چتِ این گروه — غیرِمسدودکننده، بی‌خطا.
-    اگر کارگر آماده نباشد یا وویس‌چت باز نباشد، بی‌صدا رد می‌شود."""
-    if not _state["ready"]:
+    اگر هیچ کارگری آماده نباشد یا وویس‌چت باز نباشد، بی‌صدا رد می‌شود."""
+    w = _worker_for(int(chat_id))
+    if w is None:
         return
-    _send({"cmd": "say", "chat": int(chat_id), "key": str(key)})
+    _send(w, {"cmd": "say", "chat": int(chat_id), "key": str(key)})
 
 
 async def leave(chat_id: int):
     """🚪 خروج از وویس‌چتِ این گروه (پایانِ بازی). بی‌خطا."""
-    if not _state["ready"]:
+    wid = _placed.pop(int(chat_id), None)
+    if wid is None or not _workers[wid].ready:
         return
-    _send({"cmd": "leave", "chat": int(chat_id)})
+    _send(_workers[wid], {"cmd": "leave", "chat": int(chat_id)})
+
+
+def status() -> dict:
+    """🩺 سلامتِ هر کارگر (آخرین @@PONG) — برای /debug/voice."""
+    return {"enabled": enabled(), "workers": [{
+        "worker": w.wid, "pid": w.proc.pid if w.proc else None, "ready": w.ready,
+        "account": w.info.get("username") or w.info.get("name") or None,
+        "chats": sum(1 for wid in _placed.values() if wid == w.wid),
+        "rtt_ms": round(w.rtt * 1000, 1) if w.rtt is not None else None,
+        "health": w.health, "restarts_1h": len(w.restarts),
+    } for w in _workers]}
 
 
 async def stop():
-    """خاموش‌کردنِ کارگر (هنگامِ پایانِ بات)."""
+    """خاموش‌کردنِ همه‌ی کارگرها (هنگامِ پایانِ بات)."""
     _state["quitting"] = True
-    proc = _state["proc"]
-    if proc is None:
-        return
-    _send({"cmd": "quit"})
+    await asyncio.gather(*(_stop_one(w) for w in _workers if w.proc is not None))
+
+
+async def _stop_one(w: _Worker):
+    proc = w.proc
+    _send(w, {"cmd": "quit"})
     try:
         await asyncio.wait_for(proc.wait(), timeout=10)
     except Exception:
@@ -14,14 +14,23 @@
 پروتکل (هر خط یک JSON):
   ← {"cmd":"say","chat":-100…,"key":"time_up"}
   ← {"cmd":"leave","chat":-100…}
+  ← {"cmd":"reload","key":"vote_prefix"}   (صدای سفارشی عوض شد)
   ← {"cmd":"ping","id":7}
   ← {"cmd":"quit"}
-  → @@READY {"name":…}   |  @@FAILED <دلیل>  |  @@PONG 7  |  هر خطِ دیگر = لاگ
+  → @@READY {"name":…}   |  @@FAILED <دلیل>  |  هر خطِ دیگر = لاگ
+  → @@PONG 7 {"joined":2,"playing":1,…}   (سلامتِ همین کارگر، برای /debug/voice)
+
+ممکن است چند کارگر هم‌زمان بالا باشند (VOICE_WORKERS)؛ هر کدام TG_SESSION و
+VOICE_WORKER_ID خودش را از محیط می‌گیرد و فقط گروه‌هایی را می‌بیند که گاد به آن سپرده.
 """
 import os
 import sys
 import json
+import time
+import shutil
 import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import voice_god as VG   # فقط برای مسیرِ فایل‌ها و تنظیمات — هیچ پروسه‌ای نمی‌سازد
@@ -32,6 +41,115 @@ _locks: dict[int, asyncio.Lock] = {}
 _warned_no_call: set[int] = set()
 _volume_set: set[int] = set()
 _joined: set[int] = set()
+_started = time.monotonic()
+_said = 0
+
+
+# ─── بانکِ جمله‌ها ─────────────────────────────────────────
+# همه‌ی جمله‌ها (و هر ۲۰ vote_Nِ سرِهم‌شده) یک‌بار، موقعِ بالا آمدن، در حافظه ساخته می‌شوند:
+# هر کلید → (فایل در /dev/shm که tmpfs است، مدت به ثانیه). پخش دیگر نه isfile/getsize می‌زند،
+# نه vote_N را سرِ هم می‌کند — فاصله‌ی جمله‌ها در رأی‌گیریِ اتومات فقط به خودِ پخش بسته است.
+# ntgcalls منبعِ FILE می‌خواهد؛ فایلِ روی tmpfs همان بافرِ حافظه است با یک مسیر.
+class PhraseBank:
+    def __init__(self):
+        self._items: dict[str, tuple[str, float]] = {}
+        # مسیرِ ثابت برای هر ورکر: اگر پروسه‌ی قبلی کرش کرد و close نرسید، بانکِ جاماندهِ همان
+        # ورکر همین‌جا پاک می‌شود و tmpfs (که RAM است) با هر ری‌استارت پُرتر نمی‌شود
+        base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        self.dir = os.path.join(base, f"mafia_voice_{os.environ.get('VOICE_WORKER_ID', '0')}")
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _keys(self) -> set[str]:
+        keys = {f"vote_{n}" for n in range(1, VG.VOTE_SEAT_MAX + 1)}
+        for d in (os.path.join(VG.VOICE_DIR, VG.TG_VOICE), os.path.join(VG.VOICE_DIR, "dilara"),
+                  VG.CUSTOM_DIR):
+            try:
+                keys.update(os.path.splitext(fn)[0] for fn in os.listdir(d)
+                            if fn.endswith(VG.PHRASE_EXTS))
+            except FileNotFoundError:
+                pass
+        return keys
+
+    def _load(self, key: str):
+        data = VG.phrase_bytes(key)
+        if not data:
+            self._items.pop(key, None)
+            return None
+        dst = os.path.join(self.dir, f"{key}.raw")
+        tmp = dst + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, dst)              # پخشِ در جریان فایلِ قبلی را تا آخر می‌خواند
+        item = self._items[key] = (dst, len(data) / VG.PCM_BYTES_PER_SEC)
+        return item
+
+    def _try_load(self, key: str) -> bool:
+        try:
+            return self._load(key) is not None
+        except Exception as e:
+            out(f"⚠️ بانکِ صدا ({key}): {e}")
+            return False
+
+    def load_all(self):
+        # .opusها با ffmpeg باز می‌شوند — کلیدهای ساده موازی، بعد vote_Nها که فقط سرِ هم کردنِ
+        # همان PCMهای بازشده‌اند
+        keys = self._keys()
+        votes = sorted(k for k in keys if VG._VOTE_RE.match(k))
+        plain = sorted(keys - set(votes))
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            n = sum(pool.map(self._try_load, plain))
+        n += sum(map(self._try_load, votes))
+        total = sum(sec for _p, sec in self._items.values())
+        out(f"🎙 بانکِ صدا: {n} جمله ({total:.0f}s) در {self.dir}")
+        VG.drop_decoded()                 # نسخه‌ی پخش همان فایلِ tmpfs است؛ دومی در heap لازم نیست
+
+    def _load_miss(self, key: str):
+        try:
+            return self._load(key)
+        except Exception as e:
+            out(f"⚠️ بانکِ صدا ({key}): {e}")
+            return None
+        finally:
+            VG.drop_decoded()
+
+    async def get(self, key: str):
+        item = self._items.get(key)
+        if item is None:                  # کلیدِ تازه (مثلاً صدای سفارشیِ جدید) — ffmpeg در ترد،
+            item = await asyncio.to_thread(self._load_miss, key)   # نه روی حلقه‌ی همه‌ی چت‌ها
+        return item
+
+    def reload(self, key: str):
+        """صدای سفارشیِ key عوض/حذف شد. پیشوند یا شماره → همه‌ی vote_N هم از نو."""
+        VG.invalidate(key)
+        keys = {key}
+        if key == "vote_prefix":
+            keys.update(k for k in list(self._items) if k.startswith("vote_"))
+        elif key.startswith("num_"):
+            keys.add("vote_" + key[4:])
+        for k in keys:
+            try:
+                self._load(k)
+            except Exception as e:
+                out(f"⚠️ بانکِ صدا ({k}): {e}")
+        VG.drop_decoded()
+
+    def close(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+_bank: PhraseBank | None = None
+
+
+def _health() -> str:
+    return json.dumps({
+        "worker": os.environ.get("VOICE_WORKER_ID", "0"),
+        "joined": len(_joined),
+        "playing": sum(1 for lk in _locks.values() if lk.locked()),
+        "said": _said,
+        "phrases": len(_bank._items) if _bank is not None else 0,
+        "uptime": round(time.monotonic() - _started),
+    })
 
 
 def out(line: str):
@@ -76,10 +194,13 @@ async def _start() -> bool:
 
 
 async def _say(chat_id: int, key: str):
-    path = VG.phrase_path(key)
-    if not path:
+    item = await _bank.get(key)
+    if not item:
         out(f"⚠️ فایلِ «{key}» نیست.")
         return
+    global _said
+    path, sec = item
+    _said += 1
     lock = _locks.setdefault(chat_id, asyncio.Lock())
     async with lock:                     # جمله‌ها پشتِ هم، نه روی هم
         try:
@@ -97,7 +218,7 @@ async def _say(chat_id: int, key: str):
                     await _calls.change_volume_call(chat_id, VG.TG_VOLUME)
                 except Exception as e:
                     out(f"⚠️ تنظیمِ بلندی در {chat_id}: {type(e).__name__}: {e}")
-            await asyncio.sleep(os.path.getsize(path) / VG.PCM_BYTES_PER_SEC + 0.4)
+            await asyncio.sleep(sec + 0.4)
         except Exception as e:
             name = type(e).__name__
             if name == "NoActiveGroupCall":
@@ -126,13 +247,19 @@ async def _shutdown():
             await _client.disconnect()
     except Exception:
         pass
+    if _bank is not None:
+        _bank.close()
 
 
 async def main():
+    global _bank
     if not VG.enabled():
         out("@@FAILED TG_API_ID/TG_API_HASH/TG_SESSION تنظیم نشده.")
         return
+    _bank = PhraseBank()
+    await asyncio.to_thread(_bank.load_all)
     if not await _start():
+        _bank.close()
         return
     # 📥 دستورها از stdin — در ترد، که روی همهٔ سیستم‌عامل‌ها کار کند
     while True:
@@ -150,8 +277,10 @@ async def main():
                 asyncio.create_task(_say(int(cmd["chat"]), str(cmd["key"])))
             elif c == "leave":
                 asyncio.create_task(_leave(int(cmd["chat"])))
+            elif c == "reload":
+                await asyncio.to_thread(_bank.reload, str(cmd["key"]))
             elif c == "ping":
-                out(f"@@PONG {cmd.get('id', 0)}")
+                out(f"@@PONG {cmd.get('id', 0)} {_health()}")
             elif c == "quit":
                 break
         except Exception as e: